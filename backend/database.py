@@ -16,6 +16,30 @@ async def close_database():
     """Close database connection"""
     client.close()
 
+async def create_inventory_indexes():
+    """
+    Unique stock_id index on inventory. Duplicate documents left by the old
+    per-stock upserts are collapsed first; a failure here is reported without
+    skipping the indexes that follow.
+    """
+    from services.inventory_service import dedupe_inventory_documents
+    try:
+        await dedupe_inventory_documents()
+        await db.inventory.create_index("stock_id", unique=True)
+    except Exception as e:
+        print(f"Error creating inventory stock_id index: {e}")
+
+async def create_cash_flow_indexes():
+    """
+    Unique (isin, date, type) index on materialized cash flows; a failure here
+    is reported without skipping the indexes that follow.
+    """
+    from fixed_income.cash_flow_store import create_cash_flow_row_index
+    try:
+        await create_cash_flow_row_index()
+    except Exception as e:
+        print(f"Error creating fi_cash_flows unique index: {e}")
+
 async def create_indexes():
     """Create database indexes for better query performance"""
     try:
@@ -31,6 +55,7 @@ async def create_indexes():
         await db.clients.create_index("approval_status")
         await db.clients.create_index("is_vendor")
         await db.clients.create_index([("name", 1), ("is_active", 1)])
+        await db.clients.create_index([("created_at", -1), ("id", -1)])  # keyset pagination
         
         # Bookings collection indexes
         await db.bookings.create_index("booking_number", unique=True)
@@ -40,8 +65,12 @@ async def create_indexes():
         await db.bookings.create_index("approval_status")
         await db.bookings.create_index("created_by")
         await db.bookings.create_index([("created_at", -1)])
+        await db.bookings.create_index([("created_at", -1), ("id", -1)])  # keyset pagination
         await db.bookings.create_index("referral_partner_id", sparse=True)
         
+        # Purchases collection indexes
+        await db.purchases.create_index([("created_at", -1), ("id", -1)])  # keyset pagination
+        
         # Referral Partners collection indexes
         await db.referral_partners.create_index("rp_code", unique=True)
         await db.referral_partners.create_index("pan_number", unique=True)
@@ -52,11 +81,17 @@ async def create_indexes():
         await db.stocks.create_index("symbol", unique=True)
         await db.stocks.create_index("isin_number", sparse=True)
         
-        # Audit logs collection indexes
-        await db.audit_logs.create_index([("created_at", -1)])
-        await db.audit_logs.create_index("user_id")
-        await db.audit_logs.create_index("entity_type")
-        await db.audit_logs.create_index("action")
+        # Audit logs collection indexes (entries are stamped with "timestamp";
+        # the id suffix serves the viewer's (timestamp, id) cursor pagination)
+        await db.audit_logs.create_index([("timestamp", -1), ("id", -1)])
+        await db.audit_logs.create_index([("entity_type", 1), ("entity_id", 1), ("timestamp", -1), ("id", -1)])
+        await db.audit_logs.create_index([("user_id", 1), ("timestamp", -1), ("id", -1)])
+        await db.audit_logs.create_index([("action", 1), ("timestamp", -1)])
+        for obsolete in ("created_at_-1", "user_id_1", "entity_type_1", "action_1"):
+            try:
+                await db.audit_logs.drop_index(obsolete)
+            except Exception:
+                pass  # already dropped
         
         # Notifications collection indexes
         await db.notifications.create_index("user_id")
@@ -77,14 +112,101 @@ async def create_indexes():
         await db.email_logs.create_index("status")
         await db.email_logs.create_index("template_key", sparse=True)
         await db.email_logs.create_index("to_email")
+        await db.email_logs.create_index("id")
         await db.email_logs.create_index([("related_entity_type", 1), ("related_entity_id", 1)], sparse=True)
         
+        # Email outbox (claimed in batches by the outbox worker)
+        await db.email_outbox.create_index("id", unique=True)
+        await db.email_outbox.create_index([("status", 1), ("next_attempt_at", 1)])
+        await db.email_outbox.create_index("claim_id", sparse=True)
+        await db.email_outbox.create_index("expires_at", expireAfterSeconds=0)
+        
         # Blocked threats collection indexes
         await db.blocked_threats.create_index([("timestamp", -1)])
         await db.blocked_threats.create_index("ip_address")
         await db.blocked_threats.create_index("threat_type")
         await db.blocked_threats.create_index([("ip_address", 1), ("timestamp", -1)])
         
+        # Shared rate limits / lockouts / captcha (expire via TTL)
+        await db.rate_limit_counters.create_index("expires_at", expireAfterSeconds=0)
+        await db.rate_limit_counters.create_index([("counter", 1), ("key", 1)])
+        await db.security_blocks.create_index("blocked_until", expireAfterSeconds=0)
+        await db.security_blocks.create_index([("kind", 1), ("blocked_until", -1)])
+        await db.captcha_challenges.create_index("expires_at", expireAfterSeconds=0)
+        
+        # Inventory ledger indexes (one materialized document per stock)
+        await create_inventory_indexes()
+        await db.inventory_ledger.create_index([("stock_id", 1), ("created_at", -1)])
+        await db.inventory_ledger.create_index("type")
+        
+        # FI optimization jobs (polled by id, purged after retention period)
+        await db.fi_optimization_jobs.create_index("id", unique=True)
+        await db.fi_optimization_jobs.create_index("expires_at", expireAfterSeconds=0)
+        
+        # Background export jobs (artifacts in GridFS, purged after retention period)
+        await db.export_jobs.create_index("id", unique=True)
+        await db.export_jobs.create_index("expires_at", expireAfterSeconds=0)
+        
+        # Contract notes (missing-note lookups by booking, next number per financial year)
+        await db.contract_notes.create_index("booking_id")
+        await db.contract_notes.create_index("contract_note_number")
+        await db.vendor_contract_notes.create_index("contract_note_number")
+        await db.contract_note_jobs.create_index("id", unique=True)
+        await db.contract_note_jobs.create_index("expires_at", expireAfterSeconds=0)
+        
+        # Booking event outbox (side effects of booking state changes)
+        await db.booking_events.create_index("id", unique=True)
+        await db.booking_events.create_index("idempotency_key", unique=True)
+        await db.booking_events.create_index([("status", 1), ("next_attempt_at", 1)])
+        await db.booking_events.create_index("claim_id", sparse=True)
+        await db.booking_events.create_index("expires_at", expireAfterSeconds=0)
+        
+        # OCR result cache (sha256 of file bytes + doc type)
+        await db.ocr_cache.create_index("key", unique=True)
+        await db.ocr_cache.create_index("expires_at", expireAfterSeconds=0)
+        
+        # Org-hierarchy closure (one row per manager/subordinate pair)
+        await db.hierarchy_closure.create_index([("ancestor_id", 1), ("descendant_id", 1)], unique=True)
+        await db.hierarchy_closure.create_index([("descendant_id", 1), ("depth", 1)])
+        await db.users.create_index("reports_to", sparse=True)
+        
+        # Search index (n-gram keys per searchable document, see services/search_index.py)
+        await db.search_index.create_index([("collection", 1), ("keys", 1)])
+        # Candidate ids are resolved with {"id": {"$in": [...]}}
+        await db.clients.create_index("id")
+        await db.stocks.create_index("id")
+        await db.bookings.create_index("id")
+        await db.fi_instruments.create_index("id")
+        
+        # Database backups (chunked backups are read back in sequence per collection)
+        await db.database_backups.create_index("id", unique=True)
+        await db.database_backups.create_index([("created_at", -1)])
+        await db.database_backups.create_index("base_backup_id", sparse=True)
+        await db.database_backup_chunks.create_index([("backup_id", 1), ("collection", 1), ("kind", 1), ("seq", 1)])
+        
+        # Native datetime twins of the string dates (range filters, see utils/dates.py)
+        await db.bookings.create_index([("created_at_dt", -1)])
+        await db.bookings.create_index([("created_by", 1), ("created_at_dt", -1)])
+        await db.bookings.create_index([("referral_partner_id", 1), ("created_at_dt", -1)], sparse=True)
+        await db.clients.create_index([("created_at_dt", -1)])
+        await db.purchases.create_index([("created_at_dt", -1)])
+        await db.purchase_payments.create_index([("created_at_dt", -1)])
+        await db.payment_logs.create_index([("recorded_by", 1), ("created_at_dt", -1)])
+        await db.audit_logs.create_index([("timestamp_dt", -1)])
+        await db.audit_logs.create_index([("action", 1), ("timestamp_dt", -1)])
+        await db.security_logs.create_index([("event_type", 1), ("timestamp_dt", -1)])
+        await db.notifications.create_index([("user_id", 1), ("created_at_dt", -1)])
+        await db.email_logs.create_index([("created_at_dt", -1)])
+        await db.email_logs.create_index([("status", 1), ("created_at_dt", -1)])
+        
+        # Materialized fixed income cash flows (see fixed_income/cash_flow_store.py):
+        # date windows across all instruments; the unique (isin, date, type)
+        # index serves per held ISIN lookups
+        await db.fi_cash_flows.create_index([("date", 1), ("isin", 1)])
+        await create_cash_flow_indexes()
+        await db.fi_holdings.create_index([("isin", 1), ("client_id", 1)])
+        await db.fi_holdings.create_index("client_id")
+        
         print("Database indexes created successfully")
     except Exception as e:
         print(f"Error creating indexes: {e}")
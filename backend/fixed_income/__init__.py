@@ -41,6 +41,11 @@ from .calculations import (
     calculate_modified_duration
 )
 
+from .batch_calculations import (
+    BondBatch,
+    to_decimal
+)
+
 from .bond_scraping_service import (
     BondScrapingService,
     BondData,
@@ -70,6 +75,8 @@ __all__ = [
     "generate_cash_flow_schedule",
     "calculate_duration",
     "calculate_modified_duration",
+    "BondBatch",
+    "to_decimal",
     # Scraping Service
     "BondScrapingService",
     "BondData",
@@ -19,21 +19,26 @@ References:
 - Key Rate Duration Hedging
 """
 
+import asyncio
+import hashlib
+import json
 import numpy as np
 from scipy import optimize
-from decimal import Decimal, ROUND_HALF_UP
+from decimal import ROUND_HALF_UP
 from datetime import date, datetime, timedelta
 from typing import List, Dict, Any, Optional, Tuple
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, asdict
 from enum import Enum
 import logging
 
 from database import db
 from .calculations import (
-    calculate_duration, calculate_modified_duration,
+    calculate_modified_duration,
     calculate_ytm, calculate_accrued_interest
 )
+from .batch_calculations import BondBatch
 from .models import CouponFrequency, DayCountConvention
+from .optimization_pool import optimization_pool
 
 logger = logging.getLogger(__name__)
 
@@ -175,6 +180,7 @@ class AdvancedPortfolioOptimizer:
             for h in holdings
         )
         
+        rows = []
         for h in holdings:
             isin = h["isin"]
             inst = inst_map.get(isin, {})
@@ -191,41 +197,53 @@ class AdvancedPortfolioOptimizer:
             except (ValueError, TypeError):
                 mat_date = today + timedelta(days=365)
             
-            # Calculate metrics
-            face = float(inst.get("face_value", 100))
             coupon = float(inst.get("coupon_rate", 0))
-            ytm = float(inst.get("ytm", coupon)) or coupon
-            freq = CouponFrequency(inst.get("coupon_frequency", "annual"))
-            
-            dur = float(calculate_duration(
-                clean_price=Decimal(str(price)),
-                face_value=Decimal(str(face)),
-                coupon_rate=Decimal(str(coupon)),
-                ytm=Decimal(str(ytm)),
-                settlement_date=today,
-                maturity_date=mat_date,
-                frequency=freq
-            ))
-            
+            rows.append({
+                "isin": isin,
+                "inst": inst,
+                "quantity": qty,
+                "value": value,
+                "weight": weight,
+                "maturity_date": mat_date,
+                "face": float(inst.get("face_value", 100)),
+                "coupon": coupon,
+                "ytm": float(inst.get("ytm", coupon)) or coupon,
+                "frequency": CouponFrequency(inst.get("coupon_frequency", "annual"))
+            })
+        
+        if not rows:
+            return True
+        
+        # Duration and convexity for all holdings in one vectorized batch
+        batch = BondBatch(
+            face_values=[r["face"] for r in rows],
+            coupon_rates=[r["coupon"] for r in rows],
+            frequencies=[r["frequency"] for r in rows],
+            maturity_dates=[r["maturity_date"] for r in rows],
+            settlement_date=today
+        )
+        ytms = np.array([r["ytm"] for r in rows])
+        durations = np.nan_to_num(np.round(batch.duration(ytms), 4))
+        convexities = np.nan_to_num(batch.convexity(ytms))
+        
+        for r, dur, convexity in zip(rows, durations, convexities):
+            ytm = r["ytm"]
+            dur = float(dur)
             mod_dur = dur / (1 + ytm / 100)
             
-            # Approximate convexity
-            years = (mat_date - today).days / 365.25
-            convexity = years * (years + 1) / ((1 + ytm / 100) ** 2)
-            
             self.positions.append(PortfolioPosition(
-                isin=isin,
-                issuer=inst.get("issuer_name", "Unknown"),
-                weight=weight,
-                quantity=qty,
-                market_value=value,
+                isin=r["isin"],
+                issuer=r["inst"].get("issuer_name", "Unknown"),
+                weight=r["weight"],
+                quantity=r["quantity"],
+                market_value=r["value"],
                 yield_pct=ytm,
                 duration=dur,
                 modified_duration=mod_dur,
-                convexity=convexity,
-                rating=inst.get("credit_rating", "UNRATED"),
-                maturity_date=mat_date,
-                coupon_rate=coupon
+                convexity=float(convexity),
+                rating=r["inst"].get("credit_rating", "UNRATED"),
+                maturity_date=r["maturity_date"],
+                coupon_rate=r["coupon"]
             ))
         
         return True
@@ -604,7 +622,13 @@ class AdvancedPortfolioOptimizer:
         if not self.available_instruments:
             return []
         
-        n = len(self.available_instruments)
+        return self.solve_frontier_segment(
+            self.frontier_risk_targets(n_points),
+            max_duration
+        )
+    
+    def _frontier_inputs(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Yield, duration and rating-risk vectors for the available instruments"""
         today = date.today()
         
         yields = np.array([
@@ -620,31 +644,61 @@ class AdvancedPortfolioOptimizer:
         ratings = [i.get("credit_rating", "UNRATED") for i in self.available_instruments]
         risk_scores = np.array([self.RATING_RISK.get(r, 8.0) for r in ratings])
         
+        return yields, durations, risk_scores
+    
+    def frontier_risk_targets(self, n_points: int) -> List[float]:
+        """Risk levels at which the frontier is solved, in ascending order"""
+        if not self.available_instruments:
+            return []
+        
+        ratings = [i.get("credit_rating", "UNRATED") for i in self.available_instruments]
+        risk_scores = [self.RATING_RISK.get(r, 8.0) for r in ratings]
+        
         # Find range of achievable risk
         min_risk = min(risk_scores)
         max_risk = max(risk_scores) * 0.7  # Don't go to maximum risk
         
+        return [float(t) for t in np.linspace(min_risk, max_risk, n_points)]
+    
+    def solve_frontier_segment(
+        self,
+        targets: List[float],
+        max_duration: float = 10.0
+    ) -> List[Dict]:
+        """
+        Solve the frontier at the given (ascending) risk levels.
+        
+        Warm start: once the risk constraint is slack at the optimum, the same
+        portfolio stays optimal for every looser risk level, so the remaining
+        points reuse it instead of calling the solver again.
+        """
+        if not self.available_instruments or not targets:
+            return []
+        
+        n = len(self.available_instruments)
+        yields, durations, risk_scores = self._frontier_inputs()
+        
+        c = -yields  # Maximize yield
+        A_eq = np.ones((1, n))
+        b_eq = np.array([1.0])
+        A_ub = np.vstack([
+            risk_scores,  # Risk <= target_risk
+            durations     # Duration <= max_duration
+        ])
+        bounds = [(0, 0.3) for _ in range(n)]
+        
         frontier_points = []
+        risk_constraint_slack = False
         
-        for target_risk in np.linspace(min_risk, max_risk, n_points):
-            # Optimize yield for this risk level
-            c = -yields  # Maximize yield
-            
-            A_eq = np.ones((1, n))
-            b_eq = np.array([1.0])
-            
-            A_ub = np.vstack([
-                risk_scores,  # Risk <= target_risk
-                durations     # Duration <= max_duration
-            ])
-            b_ub = np.array([target_risk, max_duration])
-            
-            bounds = [(0, 0.3) for _ in range(n)]
+        for target_risk in targets:
+            if risk_constraint_slack:
+                frontier_points.append(dict(frontier_points[-1]))
+                continue
             
             try:
                 result = optimize.linprog(
-                    c, A_ub=A_ub, b_ub=b_ub, A_eq=A_eq, b_eq=b_eq,
-                    bounds=bounds, method='highs'
+                    c, A_ub=A_ub, b_ub=np.array([target_risk, max_duration]),
+                    A_eq=A_eq, b_eq=b_eq, bounds=bounds, method='highs'
                 )
                 
                 if result.success:
@@ -658,6 +712,7 @@ class AdvancedPortfolioOptimizer:
                         "expected_duration": round(exp_dur, 3),
                         "n_instruments": sum(1 for w in result.x if w > 0.001)
                     })
+                    risk_constraint_slack = actual_risk < target_risk - 1e-6
             except Exception:
                 continue
         
@@ -730,6 +785,89 @@ class AdvancedPortfolioOptimizer:
         return trades
 
 
+# ==================== Worker Entry Points ====================
+# Module-level so the optimization pool can pickle them into worker processes.
+
+def run_optimization(
+    instruments: List[Dict],
+    positions: List[PortfolioPosition],
+    objective: str,
+    parameters: Dict
+) -> Dict[str, Any]:
+    """Solve one optimization objective (runs in a worker process)"""
+    optimizer = AdvancedPortfolioOptimizer()
+    optimizer.available_instruments = instruments
+    optimizer.positions = positions
+    params = parameters or {}
+    
+    if objective == "maximize_yield":
+        result = optimizer.optimize_max_yield(
+            max_duration=params.get("max_duration", 10.0),
+            max_single_issuer=params.get("max_single_issuer", 0.25),
+            min_rating=params.get("min_rating", "BBB")
+        )
+    elif objective == "target_duration":
+        result = optimizer.optimize_target_duration(
+            target_duration=params.get("target_duration", 5.0),
+            tolerance=params.get("tolerance", 0.5),
+            max_single_issuer=params.get("max_single_issuer", 0.25)
+        )
+    else:
+        result = optimizer.optimize_min_risk(
+            min_yield=params.get("min_yield", 6.0),
+            max_duration=params.get("max_duration", 7.0)
+        )
+    
+    return {
+        "objective": result.objective,
+        "status": result.status,
+        "optimal_portfolio": result.target_weights,
+        "expected_metrics": {
+            "yield": float(result.expected_yield),
+            "duration": float(result.expected_duration),
+            "risk_score": float(result.expected_risk)
+        },
+        "trades_required": result.trades_required,
+        "improvement": {k: float(v) for k, v in result.improvement.items()}
+    }
+
+
+def run_frontier_segment(
+    instruments: List[Dict],
+    targets: List[float],
+    max_duration: float
+) -> List[Dict]:
+    """Solve a contiguous run of frontier points (runs in a worker process)"""
+    optimizer = AdvancedPortfolioOptimizer()
+    optimizer.available_instruments = instruments
+    return [
+        {k: float(v) if isinstance(v, np.floating) else v for k, v in point.items()}
+        for point in optimizer.solve_frontier_segment(targets, max_duration)
+    ]
+
+
+def universe_hash(instruments: List[Dict]) -> str:
+    """Stable hash of the instrument fields the optimizers read"""
+    rows = sorted(
+        (
+            str(i.get("isin")),
+            str(i.get("ytm")),
+            str(i.get("coupon_rate")),
+            str(i.get("maturity_date"))[:10],
+            str(i.get("credit_rating")),
+            str(i.get("issuer_name"))
+        )
+        for i in instruments
+    )
+    return hashlib.sha256(json.dumps(rows).encode()).hexdigest()
+
+
+def _cache_key(*parts: Any) -> str:
+    # date.today() is part of every key: durations are measured from today
+    payload = json.dumps([date.today().isoformat(), *parts], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
 # ==================== API Functions ====================
 
 async def get_portfolio_analysis(client_id: str) -> Dict[str, Any]:
@@ -807,11 +945,21 @@ async def optimize_portfolio(
     """
     Run portfolio optimization.
     
+    The solve runs in the optimization process pool; identical requests
+    (same holdings, instrument universe and parameters) are served from cache.
+    
     Args:
         client_id: Client ID
         objective: Optimization objective
         parameters: Optimization parameters
     """
+    supported = ["maximize_yield", "target_duration", "minimize_risk"]
+    if objective not in supported:
+        return {
+            "error": f"Unknown objective: {objective}",
+            "supported_objectives": supported
+        }
+    
     optimizer = AdvancedPortfolioOptimizer(client_id)
     
     await optimizer.load_portfolio()
@@ -824,42 +972,28 @@ async def optimize_portfolio(
         }
     
     params = parameters or {}
+    key = _cache_key(
+        "optimize",
+        universe_hash(optimizer.available_instruments),
+        [asdict(p) for p in optimizer.positions],
+        objective,
+        params
+    )
     
-    if objective == "maximize_yield":
-        result = optimizer.optimize_max_yield(
-            max_duration=params.get("max_duration", 10.0),
-            max_single_issuer=params.get("max_single_issuer", 0.25),
-            min_rating=params.get("min_rating", "BBB")
+    result = await optimization_pool.cached(
+        key,
+        lambda: optimization_pool.run(
+            run_optimization,
+            optimizer.available_instruments,
+            optimizer.positions,
+            objective,
+            params
         )
-    elif objective == "target_duration":
-        result = optimizer.optimize_target_duration(
-            target_duration=params.get("target_duration", 5.0),
-            tolerance=params.get("tolerance", 0.5),
-            max_single_issuer=params.get("max_single_issuer", 0.25)
-        )
-    elif objective == "minimize_risk":
-        result = optimizer.optimize_min_risk(
-            min_yield=params.get("min_yield", 6.0),
-            max_duration=params.get("max_duration", 7.0)
-        )
-    else:
-        return {
-            "error": f"Unknown objective: {objective}",
-            "supported_objectives": ["maximize_yield", "target_duration", "minimize_risk"]
-        }
+    )
     
     return {
         "client_id": client_id,
-        "objective": result.objective,
-        "status": result.status,
-        "optimal_portfolio": result.target_weights,
-        "expected_metrics": {
-            "yield": result.expected_yield,
-            "duration": result.expected_duration,
-            "risk_score": result.expected_risk
-        },
-        "trades_required": result.trades_required,
-        "improvement": result.improvement,
+        **result,
         "generated_at": datetime.now().isoformat()
     }
 
@@ -871,11 +1005,36 @@ async def get_efficient_frontier(
 ) -> Dict[str, Any]:
     """
     Calculate and return efficient frontier data.
+    
+    The risk levels are split into contiguous segments that are solved in
+    parallel by the optimization pool; each segment warm-starts from its
+    previous point (see solve_frontier_segment).
     """
     optimizer = AdvancedPortfolioOptimizer()
     await optimizer.load_available_instruments(filters)
     
-    frontier = optimizer.calculate_efficient_frontier(n_points, max_duration)
+    async def solve() -> List[Dict]:
+        targets = optimizer.frontier_risk_targets(n_points)
+        if not targets:
+            return []
+        
+        n_segments = min(optimization_pool.workers_per_job, len(targets))
+        segments = [list(chunk) for chunk in np.array_split(targets, n_segments) if len(chunk)]
+        results = await asyncio.gather(*[
+            optimization_pool.run(
+                run_frontier_segment,
+                optimizer.available_instruments,
+                segment,
+                max_duration
+            )
+            for segment in segments
+        ])
+        return [point for segment_points in results for point in segment_points]
+    
+    frontier = await optimization_pool.cached(
+        _cache_key("frontier", universe_hash(optimizer.available_instruments), n_points, max_duration),
+        solve
+    )
     
     return {
         "frontier_points": frontier,
@@ -902,5 +1061,8 @@ __all__ = [
     'RiskMetric',
     'get_portfolio_analysis',
     'optimize_portfolio',
-    'get_efficient_frontier'
+    'get_efficient_frontier',
+    'run_optimization',
+    'run_frontier_segment',
+    'universe_hash'
 ]
@@ -0,0 +1,336 @@
+"""
+Vectorized Bond Analytics Engine
+
+Batch counterpart of calculations.py for listing pages and optimizers that
+price many instruments at once. YTM, price-from-yield, Macaulay/modified
+duration and convexity are solved for the whole batch in float64 NumPy
+arrays instead of one Decimal Newton-Raphson loop per bond.
+
+The engine follows the same conventions as the scalar functions (period
+count approximation, zero-coupon day counts, Newton-Raphson starting from
+current yield), so results agree with them to 1e-6. Use to_decimal() at the
+edge when values go into compliance output, contract notes or stored records.
+
+Usage:
+    batch = BondBatch.from_instruments(instruments, settlement_date=date.today())
+    ytms = batch.ytm(batch.prices)
+    durations = batch.duration(ytms)
+    for inst, ytm in zip(instruments, to_decimal(ytms)):
+        ...
+"""
+
+from decimal import Decimal, ROUND_HALF_UP
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+
+from .models import CouponFrequency, DayCountConvention
+from .calculations import _coupon_periods_per_year, _months_between_coupons, _day_count
+
+
+def _parse_date(value: Any) -> Optional[date]:
+    """Parse an ISO date string (or date) as stored on fi_instruments."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def to_decimal(values: Iterable[float], places: str = "0.0001") -> List[Optional[Decimal]]:
+    """
+    Convert float64 results to Decimal at the output edge.
+
+    Values are quantized with ROUND_HALF_UP like the scalar engine.
+    NaN (unpriceable rows) becomes None.
+    """
+    quantum = Decimal(places)
+    result = []
+    for value in values:
+        if value is None or not np.isfinite(value):
+            result.append(None)
+        else:
+            result.append(Decimal(repr(float(value))).quantize(quantum, rounding=ROUND_HALF_UP))
+    return result
+
+
+class BondBatch:
+    """
+    A batch of bonds described by parallel arrays.
+
+    Coupon bonds are laid out on a padded (bonds x periods) cash-flow matrix so
+    every analytic is a handful of array operations. Zero-coupon bonds use the
+    closed-form day-count formulas of the scalar engine.
+    """
+
+    def __init__(
+        self,
+        face_values: Sequence[float],
+        coupon_rates: Sequence[float],
+        frequencies: Sequence[Union[CouponFrequency, str]],
+        maturity_dates: Sequence[Optional[date]],
+        settlement_date: Union[date, Sequence[date]],
+        conventions: Optional[Sequence[Union[DayCountConvention, str]]] = None,
+        prices: Optional[Sequence[Optional[float]]] = None
+    ):
+        """
+        Args:
+            face_values: Face value per bond
+            coupon_rates: Annual coupon rate per bond (percentage, e.g. 8.5)
+            frequencies: Coupon frequency per bond
+            maturity_dates: Maturity date per bond (None marks the row invalid)
+            settlement_date: A single settlement date or one per bond
+            conventions: Day count convention per bond (default ACT/365)
+            prices: Optional clean prices per bond (None/0 marks no price)
+        """
+        size = len(face_values)
+        self.size = size
+        if isinstance(settlement_date, date):
+            settlement_dates = [settlement_date] * size
+        else:
+            settlement_dates = list(settlement_date)
+        if conventions is None:
+            conventions = [DayCountConvention.ACTUAL_365] * size
+
+        self.face = np.asarray(face_values, dtype=np.float64)
+        self.coupon_rate = np.asarray(coupon_rates, dtype=np.float64)
+        self.prices = np.array(
+            [np.nan if not p else float(p) for p in prices] if prices is not None else [np.nan] * size,
+            dtype=np.float64
+        )
+
+        self.periods_per_year = np.zeros(size, dtype=np.float64)
+        self.remaining_periods = np.zeros(size, dtype=np.int64)
+        self.is_zero_coupon = np.zeros(size, dtype=bool)
+        self.valid = np.ones(size, dtype=bool)
+        # Zero-coupon time to maturity in years (per day count convention)
+        self.years_to_maturity = np.zeros(size, dtype=np.float64)
+
+        for i in range(size):
+            maturity = maturity_dates[i]
+            if maturity is None:
+                self.valid[i] = False
+                continue
+            settlement = settlement_dates[i]
+            freq = CouponFrequency(frequencies[i])
+            if freq == CouponFrequency.ZERO_COUPON:
+                self.is_zero_coupon[i] = True
+                days, days_in_year = _day_count(settlement, maturity, DayCountConvention(conventions[i]))
+                self.years_to_maturity[i] = days / days_in_year
+                continue
+            self.periods_per_year[i] = _coupon_periods_per_year(freq)
+            days_to_maturity = (maturity - settlement).days
+            self.remaining_periods[i] = int(days_to_maturity / (30.4375 * _months_between_coupons(freq))) + 1
+
+        # Padded cash-flow matrix for coupon bonds
+        coupon_rows = ~self.is_zero_coupon & self.valid
+        max_periods = int(self.remaining_periods[coupon_rows].max()) if coupon_rows.any() else 0
+        max_periods = max(max_periods, 1)
+        n = np.where(self.periods_per_year > 0, self.periods_per_year, 1.0)
+
+        self.coupon_payment = np.where(coupon_rows, self.face * (self.coupon_rate / 100.0) / n, 0.0)
+        self._n = n
+        self._t = np.arange(1, max_periods + 1, dtype=np.float64)[None, :]
+        periods = self.remaining_periods[:, None]
+        in_schedule = (self._t <= periods) & coupon_rows[:, None]
+        self._cash_flows = np.where(in_schedule, self.coupon_payment[:, None], 0.0)
+        self._cash_flows += np.where(in_schedule & (self._t == periods), self.face[:, None], 0.0)
+        self._coupon_rows = coupon_rows
+
+    @classmethod
+    def from_instruments(
+        cls,
+        instruments: List[Dict[str, Any]],
+        settlement_date: date,
+        price_field: str = "current_market_price"
+    ) -> "BondBatch":
+        """
+        Build a batch from fi_instruments documents.
+
+        Rows with unparseable dates or enums are marked invalid and produce NaN.
+        """
+        faces, coupons, freqs, maturities, convs, prices = [], [], [], [], [], []
+        for inst in instruments:
+            try:
+                maturity = _parse_date(inst.get("maturity_date"))
+                freq = CouponFrequency(inst.get("coupon_frequency", "annual"))
+                conv = DayCountConvention(inst.get("day_count_convention", "ACT/365"))
+                face = float(inst.get("face_value", 100) or 100)
+                coupon = float(inst.get("coupon_rate", 0) or 0)
+            except (ValueError, TypeError):
+                maturity, freq, conv, face, coupon = None, CouponFrequency.ANNUAL, DayCountConvention.ACTUAL_365, 100.0, 0.0
+            faces.append(face)
+            coupons.append(coupon)
+            freqs.append(freq)
+            maturities.append(maturity)
+            convs.append(conv)
+            price = inst.get(price_field) if price_field else None
+            try:
+                prices.append(float(price) if price else None)
+            except (ValueError, TypeError):
+                prices.append(None)
+        return cls(faces, coupons, freqs, maturities, settlement_date, convs, prices)
+
+    # ==================== CORE KERNELS ====================
+
+    def _period_yield(self, ytm_pct: np.ndarray) -> np.ndarray:
+        return (ytm_pct / 100.0) / self._n
+
+    def _discount_factors(self, ytm_pct: np.ndarray) -> np.ndarray:
+        """(1 + y/n)^-t for every bond and period."""
+        return (1.0 + self._period_yield(ytm_pct))[:, None] ** -self._t
+
+    def _as_array(self, values: Union[float, Sequence[float], np.ndarray]) -> np.ndarray:
+        arr = np.asarray(values, dtype=np.float64)
+        if arr.ndim == 0:
+            arr = np.full(self.size, float(arr))
+        return arr
+
+    # ==================== ANALYTICS ====================
+
+    def price(self, ytm_pct: Union[float, Sequence[float], np.ndarray]) -> np.ndarray:
+        """
+        Clean price from yield for every bond (vectorized price_from_yield).
+
+        Args:
+            ytm_pct: Yield(s) to maturity as percentages
+
+        Returns:
+            Array of clean prices
+        """
+        ytm_pct = self._as_array(ytm_pct)
+        coupon_price = (self._cash_flows * self._discount_factors(ytm_pct)).sum(axis=1)
+
+        years = self.years_to_maturity
+        with np.errstate(divide="ignore", invalid="ignore"):
+            zero_price = np.where(years > 0, self.face / (1.0 + ytm_pct / 100.0) ** years, self.face)
+
+        result = np.where(self.is_zero_coupon, zero_price, coupon_price)
+        return np.where(self.valid, result, np.nan)
+
+    def ytm(
+        self,
+        clean_prices: Optional[Union[Sequence[float], np.ndarray]] = None,
+        max_iterations: int = 100,
+        tolerance: float = 1e-7
+    ) -> np.ndarray:
+        """
+        Yield to maturity for every bond (vectorized calculate_ytm).
+
+        Newton-Raphson runs on the whole batch at once; each row stops updating
+        once its price error is below tolerance.
+
+        Args:
+            clean_prices: Clean prices (defaults to the prices given at construction)
+            max_iterations: Maximum Newton-Raphson iterations
+            tolerance: Convergence tolerance on price
+
+        Returns:
+            Array of YTMs as annual percentages (NaN where no price)
+        """
+        prices = self.prices if clean_prices is None else self._as_array(clean_prices)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # Initial guess: current yield (as a fraction)
+            guess = (self.coupon_payment * self._n) / prices
+            active = self._coupon_rows & np.isfinite(guess) & (prices > 0)
+            guess = np.where(active, guess, 0.0)
+
+            t = self._t
+            for _ in range(max_iterations):
+                if not active.any():
+                    break
+                one_plus_y = 1.0 + guess / self._n
+                discount = one_plus_y[:, None] ** t
+                pv = self._cash_flows / discount
+                model_price = pv.sum(axis=1)
+                derivative = -(t * pv).sum(axis=1) / one_plus_y / self._n
+
+                error = model_price - prices
+                converged = np.abs(error) < tolerance
+                stalled = derivative == 0
+                step = np.where(active & ~converged & ~stalled, error / np.where(stalled, 1.0, derivative), 0.0)
+                guess = guess - step
+                active = active & ~converged & ~stalled
+
+            coupon_ytm = guess * 100.0
+
+            years = self.years_to_maturity
+            zero_ytm = np.where(
+                (years > 0) & (prices > 0),
+                ((self.face / prices) ** (1.0 / np.where(years > 0, years, 1.0)) - 1.0) * 100.0,
+                0.0
+            )
+
+        result = np.where(self.is_zero_coupon, zero_ytm, coupon_ytm)
+        priced = np.isfinite(prices) & (prices > 0)
+        return np.where(self.valid & priced, result, np.nan)
+
+    def duration(self, ytm_pct: Union[float, Sequence[float], np.ndarray]) -> np.ndarray:
+        """
+        Macaulay duration in years for every bond (vectorized calculate_duration).
+
+        Args:
+            ytm_pct: Yield(s) to maturity as percentages
+        """
+        ytm_pct = self._as_array(ytm_pct)
+        pv = self._cash_flows * self._discount_factors(ytm_pct)
+        total_pv = pv.sum(axis=1)
+        weighted_pv = (pv * (self._t / self._n[:, None])).sum(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            coupon_duration = np.where(total_pv != 0, weighted_pv / total_pv, 0.0)
+
+        result = np.where(self.is_zero_coupon, self.years_to_maturity, coupon_duration)
+        return np.where(self.valid, result, np.nan)
+
+    def modified_duration(
+        self,
+        durations: Union[Sequence[float], np.ndarray],
+        ytm_pct: Union[float, Sequence[float], np.ndarray]
+    ) -> np.ndarray:
+        """
+        Modified duration = Macaulay duration / (1 + y/n) (vectorized calculate_modified_duration).
+
+        Zero-coupon bonds return the Macaulay duration unchanged, as in the scalar engine.
+        """
+        durations = self._as_array(durations)
+        ytm_pct = self._as_array(ytm_pct)
+        modified = durations / (1.0 + self._period_yield(ytm_pct))
+        return np.where(self.is_zero_coupon, durations, modified)
+
+    def convexity(self, ytm_pct: Union[float, Sequence[float], np.ndarray]) -> np.ndarray:
+        """
+        Convexity in years^2 for every bond.
+
+        Coupon bonds: sum(CF_t * t * (t + 1) / (1 + y/n)^(t + 2)) / (P * n^2)
+        Zero-coupon bonds (annual compounding): T * (T + 1) / (1 + y)^2
+        """
+        ytm_pct = self._as_array(ytm_pct)
+        one_plus_y = 1.0 + self._period_yield(ytm_pct)
+        pv = self._cash_flows * self._discount_factors(ytm_pct)
+        total_pv = pv.sum(axis=1)
+        weighted = (pv * self._t * (self._t + 1.0)).sum(axis=1) / one_plus_y ** 2
+        with np.errstate(divide="ignore", invalid="ignore"):
+            coupon_convexity = np.where(total_pv != 0, weighted / (total_pv * self._n ** 2), 0.0)
+
+        years = self.years_to_maturity
+        zero_convexity = years * (years + 1.0) / (1.0 + ytm_pct / 100.0) ** 2
+
+        result = np.where(self.is_zero_coupon, zero_convexity, coupon_convexity)
+        return np.where(self.valid, result, np.nan)
+
+    def analytics(self, clean_prices: Optional[Union[Sequence[float], np.ndarray]] = None) -> Dict[str, np.ndarray]:
+        """
+        Solve YTM from price and derive the risk measures at that yield.
+
+        Returns:
+            Dict of arrays: ytm, macaulay_duration, modified_duration, convexity
+        """
+        ytm = self.ytm(clean_prices)
+        duration = self.duration(ytm)
+        return {
+            "ytm": ytm,
+            "macaulay_duration": duration,
+            "modified_duration": self.modified_duration(duration, ytm),
+            "convexity": self.convexity(ytm)
+        }
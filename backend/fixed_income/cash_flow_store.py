@@ -0,0 +1,266 @@
+"""
+Fixed Income - Materialized Cash Flow Schedules
+
+Coupon and principal dates depend only on an instrument's terms (face value,
+coupon rate and frequency, issue and maturity date), so each instrument's
+schedule is generated once with generate_cash_flow_schedule and stored as one
+row per payment date in fi_cash_flows, with per-unit coupon and principal
+amounts. Reports join those rows with holding quantities at query time:
+"payments between D1 and D2" is a single range query on the indexed date, and
+the work scales with the payments in the window, not with the portfolio.
+
+Rows are unique on (isin, date, type), carry the terms key they were generated
+from, and fi_cash_flow_state records the key per ISIN, so
+refresh_cash_flow_schedules() only regenerates instruments whose terms
+changed. Instrument writes call it with the ISINs they touched, bulk imports
+once afterwards for all instruments, and ensure_cash_flow_schedules() runs it
+at startup.
+
+Configuration (environment):
+    FI_CASH_FLOW_BATCH_SIZE - instruments per bulk_write when materializing (default 200)
+"""
+import logging
+import os
+from collections import defaultdict
+from datetime import date, datetime, timezone
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import DeleteMany, UpdateOne
+from pymongo.errors import OperationFailure
+
+from database import db
+from .calculations import _coupon_periods_per_year, generate_cash_flow_schedule
+from .models import CouponFrequency
+
+logger = logging.getLogger(__name__)
+
+FI_CASH_FLOW_BATCH_SIZE = int(os.environ.get("FI_CASH_FLOW_BATCH_SIZE", "200"))
+
+# Bump when the row layout or the schedule generation changes
+SCHEDULE_VERSION = 1
+SCHEDULE_TERMS = ("face_value", "coupon_rate", "coupon_frequency", "issue_date", "maturity_date")
+TERMS_PROJECTION = {"_id": 0, "isin": 1, **{field: 1 for field in SCHEDULE_TERMS}}
+
+
+def schedule_terms_key(instrument: Dict) -> str:
+    return "|".join([f"v{SCHEDULE_VERSION}"] + [str(instrument.get(field)) for field in SCHEDULE_TERMS])
+
+
+def _as_date(value: Any) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def schedule_rows(instrument: Dict) -> List[Dict]:
+    """Per-unit cash flow rows over the whole life of an instrument"""
+    isin = instrument["isin"]
+    terms_key = schedule_terms_key(instrument)
+    try:
+        issue_date = _as_date(instrument["issue_date"])
+        maturity_date = _as_date(instrument["maturity_date"])
+        face_value = Decimal(str(instrument.get("face_value") or 100))
+        coupon_rate = Decimal(str(instrument.get("coupon_rate") or 0))
+        frequency = CouponFrequency(instrument.get("coupon_frequency") or "annual")
+    except (KeyError, TypeError, ValueError, ArithmeticError) as e:
+        logger.warning(f"No cash flow schedule for {isin}: {e}")
+        return []
+
+    entries = generate_cash_flow_schedule(
+        face_value=face_value,
+        coupon_rate=coupon_rate,
+        settlement_date=issue_date,
+        issue_date=issue_date,
+        maturity_date=maturity_date,
+        frequency=frequency,
+        quantity=1
+    )
+    periods = _coupon_periods_per_year(frequency)
+    # Unrounded, so amount = (per_unit * quantity) rounds exactly as the
+    # schedule generated for the holding's quantity would
+    coupon_per_unit = face_value * (coupon_rate / Decimal("100")) / Decimal(periods) if periods else Decimal("0")
+
+    return [
+        {
+            "isin": isin,
+            "date": entry.date.isoformat(),
+            "type": entry.type,
+            "coupon_per_unit": str(coupon_per_unit if entry.type in ("coupon", "both") else Decimal("0")),
+            "principal_per_unit": str(face_value if entry.type in ("principal", "both") else Decimal("0")),
+            "description": entry.description,
+            "terms_key": terms_key
+        }
+        for entry in entries
+    ]
+
+
+def cash_flow_amounts(row: Dict, quantity: int) -> Tuple[Decimal, Decimal]:
+    """(coupon, principal) paid on a schedule row for a holding of quantity units"""
+    coupon = (Decimal(row["coupon_per_unit"]) * quantity).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+    principal = Decimal(row["principal_per_unit"]) * quantity
+    return coupon, principal
+
+
+# ==================== MATERIALIZATION ====================
+
+async def _materialize(instruments: List[Dict]) -> int:
+    """
+    Upsert the rows of the given instruments on their unique (isin, date, type)
+    key, then drop rows generated from other terms. Overlapping refreshes of
+    the same instrument overwrite each other's rows instead of duplicating them.
+    """
+    operations = []
+    states = []
+    now = datetime.now(timezone.utc).isoformat()
+    for instrument in instruments:
+        rows = schedule_rows(instrument)
+        terms_key = schedule_terms_key(instrument)
+        operations.extend(
+            UpdateOne({"isin": row["isin"], "date": row["date"], "type": row["type"]}, {"$set": row}, upsert=True)
+            for row in rows
+        )
+        operations.append(DeleteMany({"isin": instrument["isin"], "terms_key": {"$ne": terms_key}}))
+        states.append(UpdateOne(
+            {"_id": instrument["isin"]},
+            {"$set": {"terms_key": terms_key, "rows": len(rows), "materialized_at": now}},
+            upsert=True
+        ))
+    if not states:
+        return 0
+    # Ordered, so each instrument's stale rows are dropped after its new rows are written
+    await db.fi_cash_flows.bulk_write(operations, ordered=True)
+    await db.fi_cash_flow_state.bulk_write(states, ordered=False)
+    return len(states)
+
+
+async def _remove(isins: List[str]):
+    if isins:
+        await db.fi_cash_flows.delete_many({"isin": {"$in": isins}})
+        await db.fi_cash_flow_state.delete_many({"_id": {"$in": isins}})
+
+
+async def refresh_cash_flow_schedules(isins: Optional[Iterable[str]] = None) -> Dict[str, int]:
+    """
+    Re-materialize schedules whose instrument terms changed, for the given
+    ISINs or (None) every instrument. Schedules of deleted instruments are dropped.
+    """
+    report = {"materialized": 0, "unchanged": 0, "removed": 0}
+    try:
+        wanted = list(dict.fromkeys(isins)) if isins is not None else None
+        if wanted == []:
+            return report
+        query = {"isin": {"$in": wanted}} if wanted is not None else {}
+        state_query = {"_id": {"$in": wanted}} if wanted is not None else {}
+
+        instruments = [
+            i async for i in db.fi_instruments.find(query, TERMS_PROJECTION) if i.get("isin")
+        ]
+        stored = {
+            s["_id"]: s.get("terms_key")
+            async for s in db.fi_cash_flow_state.find(state_query, {"_id": 1, "terms_key": 1})
+        }
+
+        changed = [i for i in instruments if stored.get(i["isin"]) != schedule_terms_key(i)]
+        report["unchanged"] = len(instruments) - len(changed)
+        for start in range(0, len(changed), FI_CASH_FLOW_BATCH_SIZE):
+            report["materialized"] += await _materialize(changed[start:start + FI_CASH_FLOW_BATCH_SIZE])
+
+        existing = {i["isin"] for i in instruments}
+        removed = [isin for isin in stored if isin not in existing]
+        await _remove(removed)
+        report["removed"] = len(removed)
+
+        if report["materialized"] or report["removed"]:
+            logger.info(f"Cash flow schedules refreshed: {report}")
+    except Exception as e:
+        logger.error(f"Cash flow schedule refresh failed: {e}")
+    return report
+
+
+async def create_cash_flow_row_index():
+    """
+    Unique (isin, date, type) index on fi_cash_flows. The rows are derived
+    data: if duplicates left by the earlier delete-and-insert refresh block
+    the index, they are cleared with their state and rebuilt by
+    ensure_cash_flow_schedules().
+    """
+    keys = [("isin", 1), ("date", 1), ("type", 1)]
+    try:
+        await db.fi_cash_flows.create_index(keys, unique=True)
+    except OperationFailure as e:
+        if e.code != 11000:
+            raise
+        logger.warning("Duplicate cash flow rows found; clearing materialized schedules")
+        await db.fi_cash_flows.delete_many({})
+        await db.fi_cash_flow_state.delete_many({})
+        await db.fi_cash_flows.create_index(keys, unique=True)
+
+
+async def ensure_cash_flow_schedules():
+    """Materialize every instrument whose schedule is missing or stale (e.g. first deploy)."""
+    await refresh_cash_flow_schedules()
+
+
+# ==================== QUERIES ====================
+
+async def get_scheduled_cash_flows(
+    from_date: date,
+    to_date: date,
+    holdings: Optional[List[Dict]] = None,
+    holding_query: Optional[Dict] = None
+) -> List[Dict]:
+    """
+    Payments between from_date and to_date (inclusive), one entry per
+    (schedule row, holding), sorted by date.
+
+    Pass the holdings when they are already loaded (one range query for their
+    ISINs); otherwise the window is read first and only the holdings
+    (matching holding_query) of instruments paying in it are fetched.
+    """
+    date_filter = {"$gte": from_date.isoformat(), "$lte": to_date.isoformat()}
+
+    if holdings is not None:
+        isins = list({h.get("isin") for h in holdings if h.get("isin")})
+        if not isins:
+            return []
+        rows = await db.fi_cash_flows.find(
+            {"isin": {"$in": isins}, "date": date_filter}, {"_id": 0}
+        ).sort([("date", 1), ("isin", 1)]).to_list(length=None)
+    else:
+        rows = await db.fi_cash_flows.find(
+            {"date": date_filter}, {"_id": 0}
+        ).sort([("date", 1), ("isin", 1)]).to_list(length=None)
+        isins = list({row["isin"] for row in rows})
+        if not isins:
+            return []
+        holdings = await db.fi_holdings.find(
+            {**(holding_query or {}), "isin": {"$in": isins}, "quantity": {"$gt": 0}},
+            {"_id": 0}
+        ).to_list(length=None)
+
+    holdings_by_isin = defaultdict(list)
+    for holding in holdings:
+        holdings_by_isin[holding.get("isin")].append(holding)
+
+    cash_flows = []
+    for row in rows:
+        for holding in holdings_by_isin.get(row["isin"], ()):
+            quantity = int(holding.get("quantity") or 0)
+            if quantity <= 0:
+                continue
+            coupon, principal = cash_flow_amounts(row, quantity)
+            cash_flows.append({
+                "date": date.fromisoformat(row["date"]),
+                "isin": row["isin"],
+                "type": row["type"],
+                "coupon": coupon,
+                "principal": principal,
+                "amount": coupon + principal,
+                "description": row["description"],
+                "quantity": quantity,
+                "holding": holding
+            })
+    return cash_flows
@@ -0,0 +1,113 @@
+"""
+Fitted Yield Curve Cache
+
+Process-wide LRU of fitted YieldCurve objects keyed by
+(curve_kind, curve_date, interpolation_method), where curve_kind is "gsec",
+"forward" or a corporate rating.
+
+Fitting a curve means querying fi_instruments and (for Nelson-Siegel/Svensson)
+running a least-squares fit, so curves are built once and then evaluated in
+memory by the chart, spread and forward-curve endpoints.
+
+Any write to fi_instruments should call invalidate_yield_curves(). Entries
+also expire after FI_CURVE_CACHE_TTL_SECONDS so writes made by other workers
+are picked up.
+
+Configuration (environment):
+    FI_CURVE_CACHE_TTL_SECONDS   - entry lifetime (default 300)
+    FI_CURVE_CACHE_MAX_ENTRIES   - LRU bound (default 64)
+"""
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+FI_CURVE_CACHE_TTL_SECONDS = float(os.environ.get("FI_CURVE_CACHE_TTL_SECONDS", "300"))
+FI_CURVE_CACHE_MAX_ENTRIES = int(os.environ.get("FI_CURVE_CACHE_MAX_ENTRIES", "64"))
+
+
+class CurveCache:
+    """LRU of fitted curves with a TTL and a generation counter for invalidation."""
+
+    def __init__(self, ttl_seconds: float = FI_CURVE_CACHE_TTL_SECONDS,
+                 max_entries: int = FI_CURVE_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[float, int, Any]]" = OrderedDict()
+        # Bumped on every invalidation; builds started before a bump are not stored
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(kind: str, curve_date: date, method: str) -> Tuple[str, str, str]:
+        return (kind, curve_date.isoformat(), method)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, generation, curve = entry
+        if expires_at < time.monotonic() or generation != self.generation:
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return curve
+
+    def set(self, key: Hashable, curve: Any, generation: Optional[int] = None):
+        """
+        Store a fitted curve.
+
+        Pass the generation read before the build started; if an invalidation
+        happened meanwhile the (possibly stale) curve is not cached.
+        """
+        if self.ttl_seconds <= 0:
+            return
+        if generation is not None and generation != self.generation:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, self.generation, curve)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self):
+        self.generation += 1
+        self.invalidations += 1
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "invalidations": self.invalidations,
+            "generation": self.generation,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+curve_cache = CurveCache()
+
+
+def invalidate_yield_curves(reason: str = ""):
+    """Drop all fitted curves after fi_instruments changed."""
+    curve_cache.invalidate()
+    if reason:
+        logger.debug(f"Yield curve cache invalidated: {reason}")
+
+
+def get_curve_cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters for the fitted curve cache."""
+    return curve_cache.stats()
@@ -22,6 +22,9 @@ from typing import Dict, Optional, List, Any
 from bs4 import BeautifulSoup
 
 from database import db
+from services.search_index import refresh_search_index
+from .curve_cache import invalidate_yield_curves
+from .cash_flow_store import refresh_cash_flow_schedules
 
 logger = logging.getLogger(__name__)
 
@@ -432,6 +435,9 @@ async def live_lookup_and_import(isin: str) -> Dict:
     # Insert into database
     try:
         await db.fi_instruments.insert_one(instrument_doc)
+        invalidate_yield_curves("live lookup import")
+        await refresh_search_index("fi_instruments", [instrument_doc["id"]])
+        await refresh_cash_flow_schedules([instrument_doc["isin"]])
         logger.info(f"Successfully imported {isin} via live lookup from {result.get('sources_found', [])}")
         
         return {
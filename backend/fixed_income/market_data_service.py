@@ -9,20 +9,55 @@ Integrates with:
 
 Note: Actual API integration requires subscription to data providers.
 This module provides the interface and mock data for development.
+
+A refresh asks each provider for quotes in batches of MARKET_DATA_BATCH_SIZE
+ISINs and writes every batch with one unordered bulk_write on fi_instruments
+plus one insert_many into the price history. ISINs nobody quoted are tracked
+in a set and fall through to the mock provider, again in batches.
+
+Price history lives in fi_price_ticks, a MongoDB time-series collection
+(timeField "ts", metaField "isin"), so ticks of one ISIN are stored in
+compressed time buckets. Charts and as-of MTM read it with aggregations:
+daily OHLC bars with a moving average, and the last price per ISIN at a
+date. ensure_price_history() creates the collection at startup (a regular
+collection with the same index on servers without time-series support) and
+copies the rows of the old fi_price_history collection over once, tagged
+source="legacy" so an interrupted copy can be cleared and redone.
+
+Configuration (environment):
+    MARKET_DATA_BATCH_SIZE              - ISINs per provider call and per bulk write (default 500)
+    FI_PRICE_TICKS_RETENTION_DAYS       - expire ticks after this many days (default 0, keep)
+    FI_PRICE_HISTORY_COPY_LEASE_SECONDS - legacy copy claim lease, renewed per batch (default 600)
 """
 
 import logging
 import asyncio
+import os
+import random
+import uuid
 from decimal import Decimal
-from datetime import date, datetime, timedelta
-from typing import Dict, List, Optional, Any
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Any
 from pydantic import BaseModel, Field
 import httpx
+from bson.decimal128 import Decimal128
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, CollectionInvalid, DuplicateKeyError, OperationFailure
 
 from database import db
+from utils.dates import IST_OFFSET, ist_day_start, parse_datetime
 
 logger = logging.getLogger(__name__)
 
+MARKET_DATA_BATCH_SIZE = int(os.environ.get("MARKET_DATA_BATCH_SIZE", "500"))
+FI_PRICE_TICKS_RETENTION_DAYS = int(os.environ.get("FI_PRICE_TICKS_RETENTION_DAYS", "0"))
+FI_PRICE_HISTORY_COPY_LEASE_SECONDS = float(os.environ.get("FI_PRICE_HISTORY_COPY_LEASE_SECONDS", "600"))
+
+PRICE_TICKS_COLLECTION = "fi_price_ticks"
+PRICE_TICKS_TIMESERIES = {"timeField": "ts", "metaField": "isin", "granularity": "minutes"}
+LEGACY_TICK_SOURCE = "legacy"
+MOVING_AVERAGE_DAYS = 5
+
 
 # ==================== MODELS ====================
 
@@ -76,18 +111,33 @@ class BaseMarketDataProvider:
 class MockMarketDataProvider(BaseMarketDataProvider):
     """Mock provider for development and testing"""
     
+    INSTRUMENT_FIELDS = {"_id": 0, "isin": 1, "issuer_code": 1, "current_market_price": 1,
+                         "face_value": 1, "coupon_rate": 1}
+    
     async def get_quote(self, isin: str) -> Optional[MarketQuote]:
         """Generate mock quote based on stored instrument data"""
-        instrument = await db.fi_instruments.find_one({"isin": isin}, {"_id": 0})
+        instrument = await db.fi_instruments.find_one({"isin": isin}, self.INSTRUMENT_FIELDS)
         
         if not instrument:
             return None
         
+        return self._quote_from_instrument(instrument)
+    
+    async def get_bulk_quotes(self, isins: List[str]) -> List[MarketQuote]:
+        """Get quotes for multiple ISINs (one instrument query for the whole batch)"""
+        if not isins:
+            return []
+        instruments = await db.fi_instruments.find(
+            {"isin": {"$in": list(isins)}},
+            self.INSTRUMENT_FIELDS
+        ).to_list(length=len(isins))
+        return [self._quote_from_instrument(instrument) for instrument in instruments]
+    
+    def _quote_from_instrument(self, instrument: Dict) -> MarketQuote:
         # Use stored price or generate from face value
         base_price = Decimal(str(instrument.get("current_market_price") or instrument.get("face_value", 100)))
         
         # Add small random variation (±0.5%)
-        import random
         variation = Decimal(str(random.uniform(-0.005, 0.005)))
         last_price = (base_price * (1 + variation)).quantize(Decimal("0.01"))
         
@@ -104,7 +154,7 @@ class MockMarketDataProvider(BaseMarketDataProvider):
         ask_yield = ((coupon_rate * face_value / 100) / ask_price * 100).quantize(Decimal("0.01"))
         
         return MarketQuote(
-            isin=isin,
+            isin=instrument["isin"],
             symbol=instrument.get("issuer_code"),
             last_price=last_price,
             bid_price=bid_price,
@@ -118,15 +168,6 @@ class MockMarketDataProvider(BaseMarketDataProvider):
             exchange="MOCK"
         )
     
-    async def get_bulk_quotes(self, isins: List[str]) -> List[MarketQuote]:
-        """Get quotes for multiple ISINs"""
-        quotes = []
-        for isin in isins:
-            quote = await self.get_quote(isin)
-            if quote:
-                quotes.append(quote)
-        return quotes
-    
     async def get_historical_prices(self, isin: str, from_date: date, to_date: date) -> List[Dict]:
         """Generate mock historical prices"""
         instrument = await db.fi_instruments.find_one({"isin": isin}, {"_id": 0})
@@ -138,7 +179,6 @@ class MockMarketDataProvider(BaseMarketDataProvider):
         
         prices = []
         current_date = from_date
-        import random
         
         while current_date <= to_date:
             # Skip weekends
@@ -303,34 +343,36 @@ class MarketDataService:
         if not instruments:
             return {"updated": 0, "errors": 0}
         
-        isins = [i["isin"] for i in instruments]
+        # Ordered, de-duplicated ISINs; "remaining" tracks those still unquoted
+        isins = list(dict.fromkeys(i["isin"] for i in instruments if i.get("isin")))
+        remaining = set(isins)
         
         updated = 0
         errors = 0
         
-        # Try bulk first
+        # Try bulk first, one batch per provider call and per write
         for provider in self.providers:
-            try:
-                quotes = await provider.get_bulk_quotes(isins)
-                for quote in quotes:
-                    await self._save_quote(quote)
-                    updated += 1
-                    # Remove from list
-                    if quote.isin in isins:
-                        isins.remove(quote.isin)
-            except Exception as e:
-                logger.error(f"Bulk quote fetch failed: {e}")
+            for batch in _batches([isin for isin in isins if isin in remaining]):
+                try:
+                    quotes = await provider.get_bulk_quotes(batch)
+                except Exception as e:
+                    logger.error(f"Bulk quote fetch failed ({provider.config.provider}): {e}")
+                    continue
+                quotes = [q for q in quotes if q.isin in remaining]
+                try:
+                    updated += await self.save_quotes(quotes)
+                    remaining.difference_update(q.isin for q in quotes)
+                except Exception as e:
+                    logger.error(f"Saving {len(quotes)} quotes failed: {e}")
         
-        # Fetch remaining individually
-        for isin in isins:
+        # Fall back to mock for the rest, still in batches
+        for batch in _batches([isin for isin in isins if isin in remaining]):
             try:
-                quote = await self.get_quote(isin)
-                if quote:
-                    await self._save_quote(quote)
-                    updated += 1
+                quotes = await self.mock_provider.get_bulk_quotes(batch)
+                updated += await self.save_quotes(quotes)
             except Exception as e:
-                logger.error(f"Error fetching {isin}: {e}")
-                errors += 1
+                logger.error(f"Error fetching {len(batch)} quotes: {e}")
+                errors += len(batch)
         
         logger.info(f"Market data update complete: {updated} updated, {errors} errors")
         
@@ -340,40 +382,279 @@ class MarketDataService:
             "timestamp": datetime.now().isoformat()
         }
     
-    async def _save_quote(self, quote: MarketQuote):
-        """Save quote to database"""
-        await db.fi_instruments.update_one(
-            {"isin": quote.isin},
-            {
-                "$set": {
-                    "current_market_price": str(quote.last_price),
-                    "last_traded_price": str(quote.last_price),
-                    "last_traded_date": quote.trade_date.isoformat() if quote.trade_date else None,
-                    "market_data": {
-                        "bid_price": str(quote.bid_price) if quote.bid_price else None,
-                        "ask_price": str(quote.ask_price) if quote.ask_price else None,
-                        "bid_yield": str(quote.bid_yield) if quote.bid_yield else None,
-                        "ask_yield": str(quote.ask_yield) if quote.ask_yield else None,
-                        "last_yield": str(quote.last_yield) if quote.last_yield else None,
-                        "volume": quote.volume,
-                        "exchange": quote.exchange,
-                        "updated_at": datetime.now().isoformat()
-                    },
-                    "updated_at": datetime.now()
-                }
+    async def save_quotes(self, quotes: List[MarketQuote]) -> int:
+        """
+        Save a batch of quotes: one unordered bulk_write on fi_instruments and
+        one insert_many into the price history. Returns the number of ISINs saved.
+        """
+        latest = {quote.isin: quote for quote in quotes}
+        if not latest:
+            return 0
+        
+        recorded_at = datetime.now(timezone.utc)
+        try:
+            await db.fi_instruments.bulk_write(
+                [_instrument_update(quote) for quote in latest.values()],
+                ordered=False
+            )
+        except BulkWriteError as e:
+            # Unordered: the other updates were applied
+            logger.error(f"Market data bulk write had {len(e.details.get('writeErrors', []))} errors")
+        
+        await db[PRICE_TICKS_COLLECTION].insert_many(
+            [_price_tick(quote, recorded_at) for quote in latest.values()],
+            ordered=False
+        )
+        return len(latest)
+
+
+def _batches(items: List[str], size: Optional[int] = None) -> Iterable[List[str]]:
+    size = size or MARKET_DATA_BATCH_SIZE
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _instrument_update(quote: MarketQuote) -> UpdateOne:
+    """Current price and market data of the instrument"""
+    return UpdateOne(
+        {"isin": quote.isin},
+        {
+            "$set": {
+                "current_market_price": str(quote.last_price),
+                "last_traded_price": str(quote.last_price),
+                "last_traded_date": quote.trade_date.isoformat() if quote.trade_date else None,
+                "market_data": {
+                    "bid_price": str(quote.bid_price) if quote.bid_price else None,
+                    "ask_price": str(quote.ask_price) if quote.ask_price else None,
+                    "bid_yield": str(quote.bid_yield) if quote.bid_yield else None,
+                    "ask_yield": str(quote.ask_yield) if quote.ask_yield else None,
+                    "last_yield": str(quote.last_yield) if quote.last_yield else None,
+                    "volume": quote.volume,
+                    "exchange": quote.exchange,
+                    "updated_at": datetime.now().isoformat()
+                },
+                "updated_at": datetime.now()
             }
+        }
+    )
+
+
+def _price_tick(quote: MarketQuote, recorded_at: datetime) -> Dict:
+    """Price history measurement; prices are Decimal128 so aggregations stay exact"""
+    return {
+        "ts": recorded_at,
+        "isin": quote.isin,
+        "price": Decimal128(str(quote.last_price)),
+        "yield": Decimal128(str(quote.last_yield)) if quote.last_yield else None,
+        "volume": quote.volume,
+        "exchange": quote.exchange,
+        "trade_date": quote.trade_date.isoformat() if quote.trade_date else date.today().isoformat()
+    }
+
+
+def _decimal(value: Any) -> Optional[Decimal]:
+    if value is None:
+        return None
+    if isinstance(value, Decimal128):
+        return value.to_decimal()
+    return Decimal(str(value))
+
+
+def _price_str(value: Any) -> Optional[str]:
+    value = _decimal(value)
+    return str(value.quantize(Decimal("0.01"))) if value is not None else None
+
+
+# ==================== PRICE HISTORY (TIME SERIES) ====================
+
+async def create_price_ticks_collection():
+    """Create fi_price_ticks as a time-series collection (no-op if it exists)."""
+    existing = await db.list_collection_names(filter={"name": PRICE_TICKS_COLLECTION})
+    if not existing:
+        options = {"timeseries": PRICE_TICKS_TIMESERIES}
+        if FI_PRICE_TICKS_RETENTION_DAYS > 0:
+            options["expireAfterSeconds"] = FI_PRICE_TICKS_RETENTION_DAYS * 86400
+        try:
+            await db.create_collection(PRICE_TICKS_COLLECTION, **options)
+        except CollectionInvalid:
+            # Created by another worker in the meantime
+            pass
+        except OperationFailure as e:
+            # MongoDB < 5.0: a regular collection with the same documents and index
+            logger.warning(f"Time-series collections unsupported, {PRICE_TICKS_COLLECTION} is a regular collection: {e}")
+    await db[PRICE_TICKS_COLLECTION].create_index([("isin", 1), ("ts", -1)])
+
+
+async def _renew_copy_lease(claim_id: str):
+    renewed = await db.market_data_state.update_one(
+        {"_id": "price_history", "claim_id": claim_id},
+        {"$set": {"lease_until": datetime.now(timezone.utc) + timedelta(seconds=FI_PRICE_HISTORY_COPY_LEASE_SECONDS)}}
+    )
+    if renewed.matched_count == 0:
+        raise RuntimeError("Legacy price history copy was taken over by another worker")
+
+
+async def copy_legacy_price_history(claim_id: Optional[str] = None) -> int:
+    """
+    Copy the rows of the old fi_price_history collection into fi_price_ticks.
+
+    Copied ticks are tagged source="legacy" and removed before copying, so a
+    retry after a failed or killed copy does not duplicate them. With a
+    claim_id the copy lease is renewed after every batch.
+    """
+    await db[PRICE_TICKS_COLLECTION].delete_many({"source": LEGACY_TICK_SOURCE})
+    copied = 0
+    ticks = []
+    cursor = db.fi_price_history.find({}, {"_id": 0}).batch_size(MARKET_DATA_BATCH_SIZE)
+    async for row in cursor:
+        ts = parse_datetime(row.get("recorded_at")) or parse_datetime(row.get("date"))
+        if ts is None or not row.get("isin") or row.get("price") is None:
+            continue
+        ticks.append({
+            "ts": ts,
+            "isin": row["isin"],
+            "price": Decimal128(str(row["price"])),
+            "yield": Decimal128(str(row["yield"])) if row.get("yield") else None,
+            "volume": row.get("volume"),
+            "exchange": row.get("exchange"),
+            "trade_date": row.get("date"),
+            "source": LEGACY_TICK_SOURCE
+        })
+        if len(ticks) >= MARKET_DATA_BATCH_SIZE:
+            await db[PRICE_TICKS_COLLECTION].insert_many(ticks, ordered=False)
+            copied += len(ticks)
+            ticks = []
+            if claim_id:
+                await _renew_copy_lease(claim_id)
+    if ticks:
+        await db[PRICE_TICKS_COLLECTION].insert_many(ticks, ordered=False)
+        copied += len(ticks)
+    return copied
+
+
+async def _claim_price_history_copy() -> Optional[str]:
+    """Claim the legacy copy; returns the claim id, or None if done or held."""
+    now = datetime.now(timezone.utc)
+    claim_id = str(uuid.uuid4())
+    claim = {
+        "status": "copying",
+        "claim_id": claim_id,
+        "started_at": now.isoformat(),
+        "lease_until": now + timedelta(seconds=FI_PRICE_HISTORY_COPY_LEASE_SECONDS)
+    }
+    try:
+        await db.market_data_state.insert_one({"_id": "price_history", **claim})
+        return claim_id
+    except DuplicateKeyError:
+        pass
+    # Copied already, being copied, or left behind by a worker that died mid-copy
+    taken = await db.market_data_state.find_one_and_update(
+        {"_id": "price_history", "status": "copying", "lease_until": {"$lt": now}},
+        {"$set": claim}
+    )
+    if taken is None:
+        return None
+    logger.warning(f"Taking over the legacy price history copy started at {taken.get('started_at')}")
+    return claim_id
+
+
+async def ensure_price_history():
+    """
+    Create the time-series collection and copy the legacy history over once.
+    The copy is claimed by inserting its state document first, so only one
+    worker runs it. The claim holds a lease that the copy renews; a failed
+    copy releases it, and a claim whose lease ran out (the worker was killed)
+    is taken over by the next startup.
+    """
+    try:
+        await create_price_ticks_collection()
+        claim_id = await _claim_price_history_copy()
+        if claim_id is None:
+            return
+        try:
+            copied = await copy_legacy_price_history(claim_id)
+        except Exception:
+            await db.market_data_state.delete_one({"_id": "price_history", "claim_id": claim_id})
+            raise
+        await db.market_data_state.update_one(
+            {"_id": "price_history", "claim_id": claim_id},
+            {"$set": {
+                "status": "copied",
+                "legacy_copied_at": datetime.now(timezone.utc).isoformat(),
+                "legacy_rows": copied
+            }, "$unset": {"lease_until": ""}},
         )
-        
-        # Also save to price history
-        await db.fi_price_history.insert_one({
-            "isin": quote.isin,
-            "date": quote.trade_date.isoformat() if quote.trade_date else date.today().isoformat(),
-            "price": str(quote.last_price),
-            "yield": str(quote.last_yield) if quote.last_yield else None,
-            "volume": quote.volume,
-            "exchange": quote.exchange,
-            "recorded_at": datetime.now()
+        logger.info(f"Copied {copied} legacy price history rows into {PRICE_TICKS_COLLECTION}")
+    except Exception as e:
+        logger.error(f"Price history setup failed: {e}")
+
+
+def daily_price_stages(isin: str, from_date: date, to_date: date) -> List[Dict]:
+    """Daily OHLC bars (IST days) with a moving average and the previous close."""
+    return [
+        {"$match": {
+            "isin": isin,
+            "ts": {"$gte": ist_day_start(from_date), "$lt": ist_day_start(to_date + timedelta(days=1))}
+        }},
+        {"$sort": {"ts": 1}},
+        {"$group": {
+            "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$ts", "timezone": IST_OFFSET}},
+            "open": {"$first": "$price"},
+            "high": {"$max": "$price"},
+            "low": {"$min": "$price"},
+            "close": {"$last": "$price"},
+            "yield": {"$last": "$yield"},
+            "volume": {"$sum": {"$ifNull": ["$volume", 0]}},
+            "exchange": {"$last": "$exchange"}
+        }},
+        {"$setWindowFields": {
+            "sortBy": {"_id": 1},
+            "output": {
+                "moving_average": {"$avg": "$close", "window": {"documents": [-(MOVING_AVERAGE_DAYS - 1), 0]}},
+                "previous_close": {"$shift": {"output": "$close", "by": -1}}
+            }
+        }},
+        {"$sort": {"_id": 1}}
+    ]
+
+
+async def get_daily_prices(isin: str, from_date: date, to_date: Optional[date] = None) -> List[Dict]:
+    """Daily price bars for an ISIN from the time-series history"""
+    to_date = to_date or date.today()
+    rows = await db[PRICE_TICKS_COLLECTION].aggregate(
+        daily_price_stages(isin, from_date, to_date)
+    ).to_list(length=None)
+    
+    history = []
+    for row in rows:
+        close = _decimal(row["close"])
+        previous = _decimal(row.get("previous_close"))
+        history.append({
+            "date": row["_id"],
+            "open": _price_str(row["open"]),
+            "high": _price_str(row["high"]),
+            "low": _price_str(row["low"]),
+            "close": _price_str(close),
+            "price": _price_str(close),
+            "yield": _price_str(row.get("yield")),
+            "volume": row.get("volume", 0),
+            "exchange": row.get("exchange"),
+            f"sma_{MOVING_AVERAGE_DAYS}": _price_str(row.get("moving_average")),
+            "change": _price_str(close - previous) if previous is not None else None
         })
+    return history
+
+
+async def get_prices_as_of(isins: List[str], as_of: date) -> Dict[str, Decimal]:
+    """Last recorded price of each ISIN up to the end of the as_of IST day"""
+    if not isins:
+        return {}
+    rows = await db[PRICE_TICKS_COLLECTION].aggregate([
+        {"$match": {"isin": {"$in": list(isins)}, "ts": {"$lt": ist_day_start(as_of + timedelta(days=1))}}},
+        {"$sort": {"isin": 1, "ts": 1}},
+        {"$group": {"_id": "$isin", "price": {"$last": "$price"}}}
+    ]).to_list(length=None)
+    return {row["_id"]: _decimal(row["price"]) for row in rows if row.get("price") is not None}
 
 
 # Singleton instance
@@ -443,14 +724,8 @@ async def get_price_history(
     """Get historical price data for an ISIN"""
     from_date = date.today() - timedelta(days=days)
     
-    # Check stored history first
-    history = await db.fi_price_history.find(
-        {
-            "isin": isin,
-            "date": {"$gte": from_date.isoformat()}
-        },
-        {"_id": 0}
-    ).sort("date", 1).to_list(length=1000)
+    # Stored history first (daily bars from the time series)
+    history = await get_daily_prices(isin, from_date)
     
     if not history:
         # Generate mock history
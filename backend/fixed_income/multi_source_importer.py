@@ -274,6 +274,9 @@ async def import_all_to_database() -> Dict:
     Returns import statistics.
     """
     from database import db
+    from .curve_cache import invalidate_yield_curves
+    from .cash_flow_store import refresh_cash_flow_schedules
+    from services.search_index import rebuild_search_index
     
     scraper = BondDataScraper()
     await scraper.scrape_all_sources()
@@ -350,6 +353,11 @@ async def import_all_to_database() -> Dict:
             stats["errors"].append({"isin": isin, "error": str(e)})
             logger.error(f"Error importing {isin}: {e}")
     
+    if stats["imported"] or stats["updated"]:
+        invalidate_yield_curves("multi-source import")
+        await rebuild_search_index(["fi_instruments"])
+        await refresh_cash_flow_schedules()
+    
     logger.info(f"Import complete: {stats['imported']} new, {stats['updated']} updated, {len(stats['errors'])} errors")
     return stats
 
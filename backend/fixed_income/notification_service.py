@@ -18,8 +18,7 @@ from typing import List, Dict, Any
 
 from database import db
 from services.email_service import send_email
-from .calculations import generate_cash_flow_schedule
-from .models import CouponFrequency
+from .cash_flow_store import get_scheduled_cash_flows
 
 logger = logging.getLogger(__name__)
 
@@ -36,68 +35,36 @@ class CouponNotificationService:
         today = date.today()
         end_date = today + timedelta(days=days_ahead)
         
-        # Get all holdings
-        holdings = await db.fi_holdings.find({}, {"_id": 0}).to_list(length=10000)
+        # Payments in the window from the materialized schedules, joined with
+        # the holdings of the paying instruments only
+        scheduled = await get_scheduled_cash_flows(today, end_date)
         
-        if not holdings:
+        if not scheduled:
             return []
         
-        # Get instruments
-        isins = list(set(h.get("isin") for h in holdings))
-        instruments = await db.fi_instruments.find(
-            {"isin": {"$in": isins}},
-            {"_id": 0}
-        ).to_list(length=1000)
-        
-        instrument_map = {i["isin"]: i for i in instruments}
-        
-        upcoming_payments = []
+        isins = list({cf["isin"] for cf in scheduled})
+        issuer_names = {
+            i["isin"]: i.get("issuer_name", "Unknown")
+            for i in await db.fi_instruments.find(
+                {"isin": {"$in": isins}},
+                {"_id": 0, "isin": 1, "issuer_name": 1}
+            ).to_list(length=None)
+        }
         
-        for holding in holdings:
-            isin = holding.get("isin")
-            inst = instrument_map.get(isin)
-            if not inst:
-                continue
-            
-            client_id = holding.get("client_id")
-            quantity = holding.get("quantity", 0)
-            
-            # Parse dates
-            try:
-                issue_dt = date.fromisoformat(inst["issue_date"]) if isinstance(inst["issue_date"], str) else inst["issue_date"]
-                maturity_dt = date.fromisoformat(inst["maturity_date"]) if isinstance(inst["maturity_date"], str) else inst["maturity_date"]
-            except:
-                continue
-            
-            face_value = Decimal(str(inst.get("face_value", 100)))
-            coupon_rate = Decimal(str(inst.get("coupon_rate", 0)))
-            freq = CouponFrequency(inst.get("coupon_frequency", "annual"))
-            
-            # Generate cash flows
-            cash_flows = generate_cash_flow_schedule(
-                face_value=face_value,
-                coupon_rate=coupon_rate,
-                settlement_date=today,
-                issue_date=issue_dt,
-                maturity_date=maturity_dt,
-                frequency=freq,
-                quantity=quantity
-            )
-            
-            # Filter to upcoming payments
-            for cf in cash_flows:
-                if today <= cf.date <= end_date:
-                    upcoming_payments.append({
-                        "client_id": client_id,
-                        "isin": isin,
-                        "issuer_name": inst.get("issuer_name", "Unknown"),
-                        "payment_date": cf.date,
-                        "payment_type": cf.type,
-                        "amount": cf.amount,
-                        "description": cf.description,
-                        "quantity": quantity,
-                        "days_until": (cf.date - today).days
-                    })
+        upcoming_payments = [
+            {
+                "client_id": cf["holding"].get("client_id"),
+                "isin": cf["isin"],
+                "issuer_name": issuer_names.get(cf["isin"], "Unknown"),
+                "payment_date": cf["date"],
+                "payment_type": cf["type"],
+                "amount": cf["amount"],
+                "description": cf["description"],
+                "quantity": cf["quantity"],
+                "days_until": (cf["date"] - today).days
+            }
+            for cf in scheduled
+        ]
         
         # Sort by date
         upcoming_payments.sort(key=lambda x: x["payment_date"])
@@ -20,6 +20,9 @@ from typing import List, Dict, Optional
 import re
 
 from database import db
+from services.search_index import refresh_search_index
+from .curve_cache import invalidate_yield_curves
+from .cash_flow_store import refresh_cash_flow_schedules
 
 logger = logging.getLogger(__name__)
 
@@ -231,6 +234,9 @@ async def import_from_nsdl(isin: str) -> Dict:
     
     # Insert into database
     await db.fi_instruments.insert_one(instrument_doc)
+    invalidate_yield_curves("NSDL import")
+    await refresh_search_index("fi_instruments", [instrument_doc["id"]])
+    await refresh_cash_flow_schedules([instrument_doc["isin"]])
     
     return {
         "success": True,
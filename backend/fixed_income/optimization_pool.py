@@ -0,0 +1,223 @@
+"""
+Portfolio Optimization Execution Pool
+=====================================
+
+Runs scipy solves (linprog / minimize) in a process pool
+(utils/process_pool.py) so a long efficient frontier does not block the event
+loop of the API worker.
+
+- Bounded concurrency: at most FI_OPTIMIZER_MAX_CONCURRENCY solves run at
+  once; further requests wait their turn.
+- Per-job timeout: callers get OptimizationTimeout after
+  FI_OPTIMIZER_TIMEOUT_SECONDS. The solve itself cannot be interrupted, so its
+  concurrency slot is only released when the worker process finishes.
+- Result cache: finished results are kept per cache key (instrument-universe
+  hash + constraints), and identical requests in flight share one solve.
+- Background jobs: submit_job() runs a coroutine as a task and records its
+  status/result in db.fi_optimization_jobs so any API worker can answer a poll.
+
+Configuration (environment):
+    FI_OPTIMIZER_WORKERS              - worker processes (default min(4, cpu count))
+    FI_OPTIMIZER_MAX_CONCURRENCY      - concurrent solves (default = workers)
+    FI_OPTIMIZER_TIMEOUT_SECONDS      - per-solve timeout (default 60)
+    FI_OPTIMIZER_CACHE_TTL_SECONDS    - result cache lifetime (default 600)
+    FI_OPTIMIZER_JOB_RETENTION_HOURS  - how long job documents are kept (default 24)
+"""
+import asyncio
+import copy
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone, timedelta
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from database import db
+from utils.process_pool import WorkerPool, WorkerPoolTimeout
+
+logger = logging.getLogger(__name__)
+
+FI_OPTIMIZER_WORKERS = int(os.environ.get("FI_OPTIMIZER_WORKERS", str(max(1, min(4, os.cpu_count() or 1)))))
+FI_OPTIMIZER_MAX_CONCURRENCY = int(os.environ.get("FI_OPTIMIZER_MAX_CONCURRENCY", str(FI_OPTIMIZER_WORKERS)))
+FI_OPTIMIZER_TIMEOUT_SECONDS = float(os.environ.get("FI_OPTIMIZER_TIMEOUT_SECONDS", "60"))
+FI_OPTIMIZER_CACHE_TTL_SECONDS = float(os.environ.get("FI_OPTIMIZER_CACHE_TTL_SECONDS", "600"))
+FI_OPTIMIZER_JOB_RETENTION_HOURS = float(os.environ.get("FI_OPTIMIZER_JOB_RETENTION_HOURS", "24"))
+
+
+class OptimizationTimeout(WorkerPoolTimeout):
+    """Raised when a solve does not finish within the configured timeout."""
+
+
+class ResultCache:
+    """
+    LRU of finished optimization results with a TTL.
+
+    Kept local rather than reusing services.auth_cache so worker processes,
+    which import this module, do not pull in the whole services package.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 256):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return copy.deepcopy(entry[1])
+
+    def set(self, key: Hashable, value: Any):
+        if self.ttl_seconds <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, copy.deepcopy(value))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+class OptimizationPool(WorkerPool):
+    """Process pool + semaphore + result cache for optimization solves."""
+
+    timeout_error = OptimizationTimeout
+    timeout_message = "Optimization did not finish within {timeout:.0f}s"
+
+    def __init__(self, workers: int = FI_OPTIMIZER_WORKERS,
+                 max_concurrency: int = FI_OPTIMIZER_MAX_CONCURRENCY,
+                 timeout_seconds: float = FI_OPTIMIZER_TIMEOUT_SECONDS,
+                 cache_ttl_seconds: float = FI_OPTIMIZER_CACHE_TTL_SECONDS):
+        super().__init__(max(1, workers), max_concurrency, timeout_seconds)
+        self.cache = ResultCache(cache_ttl_seconds)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    @property
+    def workers_per_job(self) -> int:
+        """How many segments a parallelisable job (e.g. a frontier) should be split into."""
+        return min(self.workers, self.max_concurrency)
+
+    async def cached(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Return the cached result for key, or compute it with factory().
+
+        Concurrent callers with the same key share a single computation.
+        """
+        result = self.cache.get(key)
+        if result is not None:
+            return result
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await factory()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else is waiting
+            raise
+        else:
+            self.cache.set(key, result)
+            future.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+    # ==================== Background Jobs ====================
+
+    async def submit_job(self, kind: str, factory: Callable[[], Awaitable[Dict]],
+                         submitted_by: Optional[str] = None, parameters: Dict = None) -> Dict:
+        """Start factory() in the background and return the job document."""
+        now = datetime.now(timezone.utc)
+        job = {
+            "id": str(uuid.uuid4()),
+            "kind": kind,
+            "status": "queued",
+            "parameters": parameters or {},
+            "submitted_by": submitted_by,
+            "created_at": now.isoformat(),
+            "started_at": None,
+            "completed_at": None,
+            "result": None,
+            "error": None,
+            "expires_at": now + timedelta(hours=FI_OPTIMIZER_JOB_RETENTION_HOURS)
+        }
+        await db.fi_optimization_jobs.insert_one(job.copy())
+
+        task = asyncio.create_task(self._run_job(job["id"], factory))
+        self._tasks[job["id"]] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job["id"], None))
+
+        job.pop("expires_at")
+        return job
+
+    async def _run_job(self, job_id: str, factory: Callable[[], Awaitable[Dict]]):
+        await db.fi_optimization_jobs.update_one(
+            {"id": job_id},
+            {"$set": {"status": "running", "started_at": datetime.now(timezone.utc).isoformat()}}
+        )
+        update = {}
+        try:
+            result = await factory()
+            if isinstance(result, dict) and "error" in result:
+                update.update({"status": "failed", "error": result["error"]})
+            else:
+                update.update({"status": "completed", "result": result})
+        except OptimizationTimeout as e:
+            update.update({"status": "timeout", "error": str(e)})
+        except Exception as e:
+            logger.error(f"Optimization job {job_id} failed: {e}")
+            update.update({"status": "failed", "error": str(e)})
+
+        update["completed_at"] = datetime.now(timezone.utc).isoformat()
+        await db.fi_optimization_jobs.update_one({"id": job_id}, {"$set": update})
+
+    async def get_job(self, job_id: str) -> Optional[Dict]:
+        return await db.fi_optimization_jobs.find_one({"id": job_id}, {"_id": 0, "expires_at": 0})
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **super().stats(),
+            "background_jobs": len(self._tasks),
+            "cache": self.cache.stats()
+        }
+
+    def shutdown(self):
+        """Stop worker processes (called on application shutdown)."""
+        for task in list(self._tasks.values()):
+            task.cancel()
+        super().shutdown()
+
+
+optimization_pool = OptimizationPool()
+
+
+def get_optimization_pool_stats() -> Dict[str, Any]:
+    """Counters for the optimization pool and its result cache."""
+    return optimization_pool.stats()
+
+
+def shutdown_optimization_pool():
+    optimization_pool.shutdown()
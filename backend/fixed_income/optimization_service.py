@@ -19,9 +19,10 @@ from dataclasses import dataclass
 
 from database import db
 from .calculations import (
-    calculate_duration, calculate_modified_duration,
+    calculate_modified_duration,
     calculate_ytm, calculate_accrued_interest
 )
+from .batch_calculations import BondBatch, to_decimal
 from .models import CouponFrequency, DayCountConvention
 
 logger = logging.getLogger(__name__)
@@ -91,6 +92,7 @@ class PortfolioOptimizer:
         weighted_duration = Decimal("0")
         duration_details = []
         
+        rows = []
         for h in self.holdings:
             isin = h.get("isin")
             inst = self.instruments.get(isin, {})
@@ -106,30 +108,40 @@ class PortfolioOptimizer:
             except:
                 maturity_dt = today + timedelta(days=365)
             
-            # Calculate duration
-            face_value = Decimal(str(inst.get("face_value", 100)))
             coupon_rate = Decimal(str(inst.get("coupon_rate", 0)))
-            ytm = Decimal(str(inst.get("ytm", coupon_rate)))
-            freq = CouponFrequency(inst.get("coupon_frequency", "annual"))
-            
-            duration = calculate_duration(
-                clean_price=price,
-                face_value=face_value,
-                coupon_rate=coupon_rate,
-                ytm=ytm,
-                settlement_date=today,
-                maturity_date=maturity_dt,
-                frequency=freq
+            rows.append({
+                "isin": isin,
+                "inst": inst,
+                "weight": weight,
+                "maturity_dt": maturity_dt,
+                "face_value": float(inst.get("face_value", 100)),
+                "coupon_rate": float(coupon_rate),
+                "ytm": float(Decimal(str(inst.get("ytm", coupon_rate)))),
+                "frequency": CouponFrequency(inst.get("coupon_frequency", "annual"))
+            })
+        
+        # Calculate durations for all holdings in one vectorized batch
+        durations = []
+        if rows:
+            batch = BondBatch(
+                face_values=[r["face_value"] for r in rows],
+                coupon_rates=[r["coupon_rate"] for r in rows],
+                frequencies=[r["frequency"] for r in rows],
+                maturity_dates=[r["maturity_dt"] for r in rows],
+                settlement_date=today
             )
-            
-            weighted_duration += duration * weight
+            durations = to_decimal(batch.duration([r["ytm"] for r in rows]))
+        
+        for r, duration in zip(rows, durations):
+            duration = duration if duration is not None else Decimal("0")
+            weighted_duration += duration * r["weight"]
             
             duration_details.append({
-                "isin": isin,
-                "issuer": inst.get("issuer_name", "Unknown"),
+                "isin": r["isin"],
+                "issuer": r["inst"].get("issuer_name", "Unknown"),
                 "duration": duration,
-                "weight": weight,
-                "years_to_maturity": (maturity_dt - today).days / 365
+                "weight": r["weight"],
+                "years_to_maturity": (r["maturity_dt"] - today).days / 365
             })
         
         # Sort by duration
@@ -21,6 +21,9 @@ import re
 from decimal import Decimal
 
 from database import db
+from services.search_index import rebuild_search_index
+from .curve_cache import invalidate_yield_curves
+from .cash_flow_store import refresh_cash_flow_schedules
 
 logger = logging.getLogger(__name__)
 
@@ -592,6 +595,11 @@ async def import_public_instruments(
         "timestamp": datetime.now(timezone.utc).isoformat()
     }
     
+    if imported or updated:
+        invalidate_yield_curves("public data import")
+        await rebuild_search_index(["fi_instruments"])
+        await refresh_cash_flow_schedules()
+    
     logger.info(f"Import complete: {result}")
     return result
 
@@ -4,7 +4,7 @@ Fixed Income Analytics Router
 
 API endpoints for:
 - Yield Curve Analytics
-- Portfolio Optimization
+- Portfolio Optimization (synchronous, or as background jobs polled via /analytics/jobs/{job_id})
 - Risk Metrics
 """
 
@@ -26,6 +26,7 @@ from .advanced_portfolio_optimizer import (
     optimize_portfolio,
     get_efficient_frontier
 )
+from .optimization_pool import optimization_pool, OptimizationTimeout
 
 router = APIRouter(prefix="/analytics", tags=["FI Analytics"])
 
@@ -192,11 +193,14 @@ async def api_optimize_portfolio(
             detail=f"Invalid objective. Must be one of: {valid_objectives}"
         )
     
-    result = await optimize_portfolio(
-        client_id=request.client_id,
-        objective=request.objective,
-        parameters=request.parameters
-    )
+    try:
+        result = await optimize_portfolio(
+            client_id=request.client_id,
+            objective=request.objective,
+            parameters=request.parameters
+        )
+    except OptimizationTimeout as e:
+        raise HTTPException(status_code=504, detail=f"{e}. Use POST /analytics/jobs/optimize for long runs.")
     
     if "error" in result:
         raise HTTPException(status_code=400, detail=result["error"])
@@ -216,11 +220,103 @@ async def api_get_efficient_frontier(
     Returns points representing optimal portfolios at different risk levels.
     Useful for understanding the best achievable yield for a given risk tolerance.
     """
-    return await get_efficient_frontier(
-        n_points=request.n_points,
-        max_duration=request.max_duration,
-        filters=request.filters
+    try:
+        return await get_efficient_frontier(
+            n_points=request.n_points,
+            max_duration=request.max_duration,
+            filters=request.filters
+        )
+    except OptimizationTimeout as e:
+        raise HTTPException(status_code=504, detail=f"{e}. Use POST /analytics/jobs/efficient-frontier for long runs.")
+
+
+# ==================== Optimization Job Endpoints ====================
+
+@router.post("/jobs/optimize", status_code=202)
+async def api_submit_optimization_job(
+    request: OptimizationRequest,
+    current_user: dict = Depends(get_current_user),
+    _: None = Depends(require_permission("fixed_income.instrument_edit", "optimize portfolio"))
+):
+    """
+    Submit a portfolio optimization as a background job.
+    
+    Same body as POST /analytics/portfolio/optimize. Returns a job id to poll
+    with GET /analytics/jobs/{job_id}.
+    """
+    valid_objectives = ["maximize_yield", "target_duration", "minimize_risk"]
+    if request.objective not in valid_objectives:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid objective. Must be one of: {valid_objectives}"
+        )
+    
+    job = await optimization_pool.submit_job(
+        "optimize",
+        lambda: optimize_portfolio(
+            client_id=request.client_id,
+            objective=request.objective,
+            parameters=request.parameters
+        ),
+        submitted_by=current_user.get("id"),
+        parameters=request.dict()
     )
+    
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "poll_url": f"/api/analytics/jobs/{job['id']}"
+    }
+
+
+@router.post("/jobs/efficient-frontier", status_code=202)
+async def api_submit_frontier_job(
+    request: EfficientFrontierRequest,
+    current_user: dict = Depends(get_current_user),
+    _: None = Depends(require_permission("fixed_income.view", "view efficient frontier"))
+):
+    """
+    Submit an efficient frontier calculation as a background job.
+    
+    Same body as POST /analytics/efficient-frontier. Returns a job id to poll
+    with GET /analytics/jobs/{job_id}.
+    """
+    job = await optimization_pool.submit_job(
+        "efficient_frontier",
+        lambda: get_efficient_frontier(
+            n_points=request.n_points,
+            max_duration=request.max_duration,
+            filters=request.filters
+        ),
+        submitted_by=current_user.get("id"),
+        parameters=request.dict()
+    )
+    
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "poll_url": f"/api/analytics/jobs/{job['id']}"
+    }
+
+
+@router.get("/jobs/{job_id}")
+async def api_get_optimization_job(
+    job_id: str,
+    current_user: dict = Depends(get_current_user),
+    _: None = Depends(require_permission("fixed_income.view", "view optimization jobs"))
+):
+    """
+    Poll an optimization job.
+    
+    Status: queued, running, completed, failed or timeout. The result is
+    included once the job has completed.
+    """
+    job = await optimization_pool.get_job(job_id)
+    
+    if not job or job.get("submitted_by") != current_user.get("id"):
+        raise HTTPException(status_code=404, detail="Optimization job not found")
+    
+    return job
 
 
 @router.get("/risk-metrics/{client_id}")
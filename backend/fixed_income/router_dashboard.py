@@ -18,6 +18,7 @@ from database import db
 from utils.auth import get_current_user
 from services.permission_service import require_permission, has_permission
 from middleware.license_enforcement import license_enforcer
+from .cash_flow_store import get_scheduled_cash_flows
 
 logger = logging.getLogger(__name__)
 
@@ -124,30 +125,26 @@ async def get_fi_dashboard(
         
         upcoming_maturities.sort(key=lambda x: x["days_to_maturity"])
         
+        # Coupons and redemptions of the next 12 months from the materialized
+        # schedules (one range query over the held ISINs)
+        calendar_start = today.replace(day=1)
+        calendar_end = (calendar_start + timedelta(days=32 * 12)).replace(day=1) - timedelta(days=1)
+        scheduled = await get_scheduled_cash_flows(calendar_start, calendar_end, holdings=holdings)
+        
         # Upcoming coupons (next 30 days)
         coupon_cutoff = today + timedelta(days=30)
         upcoming_coupons = []
         
-        for h in holdings:
-            inst = instruments.get(h.get("isin"), {})
-            # Simplified: use next coupon date from instrument or calculate based on frequency
-            coupon_rate = float(inst.get("coupon_rate", 0))
-            face_value = float(h.get("face_value", 0)) * int(h.get("quantity", 0))
-            
-            if coupon_rate > 0:
-                # Estimate next coupon as quarterly/semi-annual
-                coupon_amount = face_value * (coupon_rate / 100) / 2  # Semi-annual
-                # Mock next coupon date within 30 days
-                next_coupon = today + timedelta(days=(hash(h.get("isin", "")) % 30) + 1)
-                
-                if next_coupon <= coupon_cutoff:
-                    upcoming_coupons.append({
-                        "isin": h.get("isin"),
-                        "issuer": inst.get("issuer_name", "Unknown"),
-                        "coupon_date": str(next_coupon),
-                        "coupon_amount": coupon_amount,
-                        "days_to_coupon": (next_coupon - today).days
-                    })
+        for cf in scheduled:
+            if cf["coupon"] > 0 and today <= cf["date"] <= coupon_cutoff:
+                inst = instruments.get(cf["isin"], {})
+                upcoming_coupons.append({
+                    "isin": cf["isin"],
+                    "issuer": inst.get("issuer_name", "Unknown"),
+                    "coupon_date": str(cf["date"]),
+                    "coupon_amount": float(cf["coupon"]),
+                    "days_to_coupon": (cf["date"] - today).days
+                })
         
         upcoming_coupons.sort(key=lambda x: x["days_to_coupon"])
         
@@ -271,52 +268,21 @@ async def get_fi_dashboard(
         ]
         
         # Cash Flow Calendar (next 12 months)
+        monthly_flows = {}
+        for cf in scheduled:
+            month = monthly_flows.setdefault(cf["date"].strftime("%Y-%m"), {"coupons": 0, "maturities": 0})
+            month["coupons"] += float(cf["coupon"])
+            month["maturities"] += float(cf["principal"])
+        
         cash_flow_calendar = []
         for month_offset in range(12):
             month_start = (today.replace(day=1) + timedelta(days=32 * month_offset)).replace(day=1)
             if month_offset == 0:
                 month_start = today.replace(day=1)
-            month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-            
-            month_coupons = 0
-            month_maturities = 0
             
-            for h in holdings:
-                inst = instruments.get(h.get("isin"), {})
-                value = float(h.get("face_value", 0)) * int(h.get("quantity", 0))
-                coupon_rate = float(inst.get("coupon_rate", 0))
-                
-                # Estimate coupon (simplified - assume semi-annual)
-                if coupon_rate > 0:
-                    # Check if this month might have a coupon
-                    issue_date_str = inst.get("issue_date")
-                    if issue_date_str:
-                        try:
-                            if isinstance(issue_date_str, str):
-                                issue_date = datetime.fromisoformat(issue_date_str.replace("Z", "+00:00")).date()
-                            else:
-                                issue_date = issue_date_str
-                            
-                            # Check if coupon falls in this month (simplified)
-                            months_since_issue = (month_start.year - issue_date.year) * 12 + (month_start.month - issue_date.month)
-                            if months_since_issue >= 0 and months_since_issue % 6 == 0:
-                                month_coupons += value * (coupon_rate / 100) / 2
-                        except:
-                            pass
-                
-                # Check for maturity
-                maturity_str = inst.get("maturity_date")
-                if maturity_str:
-                    try:
-                        if isinstance(maturity_str, str):
-                            maturity_date = datetime.fromisoformat(maturity_str.replace("Z", "+00:00")).date()
-                        else:
-                            maturity_date = maturity_str
-                        
-                        if month_start <= maturity_date <= month_end:
-                            month_maturities += value
-                    except:
-                        pass
+            month = monthly_flows.get(month_start.strftime("%Y-%m"), {"coupons": 0, "maturities": 0})
+            month_coupons = month["coupons"]
+            month_maturities = month["maturities"]
             
             cash_flow_calendar.append({
                 "month": month_start.strftime("%b %Y"),
@@ -26,6 +26,10 @@ from .calculations import (
     calculate_accrued_interest, calculate_ytm,
     calculate_dirty_price, price_from_yield
 )
+from .batch_calculations import BondBatch, to_decimal
+from services.search_index import rebuild_search_index, refresh_search_index, search_condition
+from .curve_cache import invalidate_yield_curves
+from .cash_flow_store import refresh_cash_flow_schedules
 
 logger = logging.getLogger(__name__)
 
@@ -100,6 +104,9 @@ async def create_instrument(
     
     # Store in MongoDB
     await db.fi_instruments.insert_one(instrument_dict)
+    invalidate_yield_curves("instrument created")
+    await refresh_search_index("fi_instruments", [instrument_dict["id"]])
+    await refresh_cash_flow_schedules([instrument_dict["isin"]])
     
     logger.info(f"Created fixed income instrument: {instrument.isin} by {current_user.get('name')}")
     
@@ -133,7 +140,7 @@ async def list_instruments(
         query["instrument_type"] = instrument_type.value
     
     if issuer:
-        query["issuer_name"] = {"$regex": issuer, "$options": "i"}
+        query["$and"] = [await search_condition("fi_instruments", issuer, ["issuer_name"])]
     
     if credit_rating:
         query["credit_rating"] = credit_rating.value
@@ -163,10 +170,12 @@ async def list_instruments(
     cursor = db.fi_instruments.find(query, {"_id": 0}).sort("issuer_name", 1).skip(skip).limit(limit)
     instruments = await cursor.to_list(length=limit)
     
-    # Calculate live pricing for each instrument
+    # Calculate live pricing for the whole page (YTM solved in one vectorized batch)
     today = date.today()
-    for inst in instruments:
-        if inst.get("current_market_price"):
+    priced = [inst for inst in instruments if inst.get("current_market_price")]
+    if priced:
+        batch_ytm = to_decimal(BondBatch.from_instruments(priced, settlement_date=today).ytm())
+        for inst, ytm in zip(priced, batch_ytm):
             try:
                 # Parse dates
                 issue_dt = date.fromisoformat(inst["issue_date"]) if isinstance(inst["issue_date"], str) else inst["issue_date"]
@@ -189,20 +198,10 @@ async def list_instruments(
                     convention=conv
                 )
                 
-                # Calculate YTM
-                ytm = calculate_ytm(
-                    clean_price=cmp,
-                    face_value=face_value,
-                    coupon_rate=coupon_rate,
-                    settlement_date=today,
-                    maturity_date=maturity_dt,
-                    frequency=freq,
-                    convention=conv
-                )
-                
                 inst["accrued_interest"] = str(accrued)
                 inst["dirty_price"] = str(cmp + accrued)
-                inst["ytm"] = str(ytm)
+                if ytm is not None:
+                    inst["ytm"] = str(ytm)
             except Exception as e:
                 logger.warning(f"Error calculating pricing for {inst.get('isin')}: {e}")
     
@@ -632,6 +631,9 @@ async def update_instrument(
         {"$or": [{"id": instrument_id}, {"isin": instrument_id}]},
         {"$set": update_dict}
     )
+    invalidate_yield_curves("instrument updated")
+    await refresh_search_index("fi_instruments", [existing.get("id")])
+    await refresh_cash_flow_schedules([existing.get("isin")])
     
     logger.info(f"Updated instrument {instrument_id} by {current_user.get('name')}")
     
@@ -686,11 +688,13 @@ async def delete_instrument(
         raise HTTPException(status_code=403, detail="Only PE Desk can permanently delete instruments")
     
     if permanent:
-        result = await db.fi_instruments.delete_one(
-            {"$or": [{"id": instrument_id}, {"isin": instrument_id}]}
+        deleted = await db.fi_instruments.find_one_and_delete(
+            {"$or": [{"id": instrument_id}, {"isin": instrument_id}]},
+            projection={"_id": 0, "isin": 1}
         )
-        if result.deleted_count == 0:
+        if not deleted:
             raise HTTPException(status_code=404, detail="Instrument not found")
+        await refresh_cash_flow_schedules([deleted.get("isin")])
         message = "Instrument permanently deleted"
     else:
         result = await db.fi_instruments.update_one(
@@ -701,6 +705,8 @@ async def delete_instrument(
             raise HTTPException(status_code=404, detail="Instrument not found")
         message = "Instrument deactivated"
     
+    invalidate_yield_curves("instrument deleted")
+    
     logger.info(f"{message}: {instrument_id} by {current_user.get('name')}")
     
     return {"message": message}
@@ -952,6 +958,11 @@ async def bulk_upload_instruments(
                 errors.append(f"Row {row_num}: {str(e)}")
                 continue
         
+        if created or updated:
+            invalidate_yield_curves("instrument bulk upload")
+            await rebuild_search_index(["fi_instruments"])
+            await refresh_cash_flow_schedules()
+        
         logger.info(f"Bulk upload: {created} created, {updated} updated, {len(errors)} errors by {current_user.get('name')}")
         
         return {
@@ -23,6 +23,7 @@ from database import db
 from utils.auth import get_current_user
 from services.permission_service import require_permission, has_permission
 from services.email_service import send_email
+from services.settings_cache import get_setting
 from config import is_pe_level, ROLES
 from middleware.license_enforcement import license_enforcer
 
@@ -343,7 +344,7 @@ async def send_deal_sheet(
         raise HTTPException(status_code=404, detail="Instrument not found")
     
     # Get company bank details for payment instructions
-    company = await db.company_master.find_one({"_id": "company_settings"})
+    company = await get_setting("company")
     bank_details = {
         "bank_name": company.get("company_bank_name", "N/A") if company else "N/A",
         "bank_account": company.get("company_bank_account", "N/A") if company else "N/A",
@@ -28,13 +28,14 @@ from utils.auth import get_current_user
 from services.permission_service import require_permission
 from config import is_pe_level
 
-from .models import CouponFrequency, DayCountConvention
+from .models import DayCountConvention
 from .calculations import (
-    generate_cash_flow_schedule,
     calculate_mark_to_market,
     calculate_accrued_interest,
     calculate_ytm
 )
+from .market_data_service import get_prices_as_of
+from .cash_flow_store import get_scheduled_cash_flows
 
 logger = logging.getLogger(__name__)
 
@@ -46,11 +47,13 @@ router = APIRouter(prefix="/fixed-income/reports", tags=["Fixed Income - Reports
 @router.get("/holdings", response_model=dict)
 async def get_holdings_report(
     client_id: Optional[str] = None,
+    as_of: Optional[date] = Query(None, description="Value holdings at the last recorded price on this date"),
     current_user: dict = Depends(get_current_user),
     _: None = Depends(require_permission("fixed_income.report_view", "view holdings report"))
 ):
     """
     Get consolidated holdings report with current valuation (Mark-to-Market).
+    With as_of, prices come from the price history at that date.
     
     Returns:
     - Portfolio summary
@@ -99,6 +102,8 @@ async def get_holdings_report(
         isin: Decimal(str(inst.get("current_market_price") or inst.get("face_value", 100)))
         for isin, inst in instrument_map.items()
     }
+    if as_of:
+        market_prices.update(await get_prices_as_of(isins, as_of))
     
     # Calculate MTM for each holding
     today = date.today()
@@ -152,6 +157,7 @@ async def get_holdings_report(
             "pnl_percentage": str(total_pnl_pct.quantize(Decimal("0.01"))),
             "total_holdings": len(enriched_holdings)
         },
+        "as_of": as_of.isoformat() if as_of else None,
         "generated_at": datetime.now().isoformat()
     }
 
@@ -188,79 +194,36 @@ async def get_cash_flow_calendar(
             }
         }
     
-    # Get all instruments
-    isins = [h.get("isin") for h in holdings]
-    instruments = await db.fi_instruments.find(
-        {"isin": {"$in": isins}},
-        {"_id": 0}
-    ).to_list(length=1000)
-    
-    instrument_map = {i["isin"]: i for i in instruments}
-    
-    # Generate cash flows for each holding
-    all_cash_flows = []
     today = date.today()
     end_date = today + timedelta(days=months_ahead * 30)
     
-    for holding in holdings:
-        isin = holding.get("isin")
-        inst = instrument_map.get(isin)
-        if not inst:
-            continue
-        
-        quantity = holding.get("quantity", 0)
-        
-        # Parse dates
-        issue_dt = date.fromisoformat(inst["issue_date"]) if isinstance(inst["issue_date"], str) else inst["issue_date"]
-        maturity_dt = date.fromisoformat(inst["maturity_date"]) if isinstance(inst["maturity_date"], str) else inst["maturity_date"]
-        
-        face_value = Decimal(str(inst.get("face_value", 100)))
-        coupon_rate = Decimal(str(inst.get("coupon_rate", 0)))
-        freq = CouponFrequency(inst.get("coupon_frequency", "annual"))
-        
-        # Generate cash flow schedule
-        cash_flows = generate_cash_flow_schedule(
-            face_value=face_value,
-            coupon_rate=coupon_rate,
-            settlement_date=today,
-            issue_date=issue_dt,
-            maturity_date=maturity_dt,
-            frequency=freq,
-            quantity=quantity
-        )
-        
-        # Filter to requested period and add instrument info
-        for cf in cash_flows:
-            if today <= cf.date <= end_date:
-                all_cash_flows.append({
-                    "date": cf.date.isoformat(),
-                    "isin": isin,
-                    "issuer_name": inst.get("issuer_name", "Unknown"),
-                    "type": cf.type,
-                    "amount": str(cf.amount),
-                    "description": cf.description
-                })
-    
-    # Sort by date
-    all_cash_flows.sort(key=lambda x: x["date"])
-    
-    # Calculate totals
-    total_coupon = sum(
-        Decimal(cf["amount"]) for cf in all_cash_flows 
-        if cf["type"] == "coupon"
-    )
-    total_principal = sum(
-        Decimal(cf["amount"]) for cf in all_cash_flows 
-        if cf["type"] in ["principal", "both"]
-    )
-    # Adjust for "both" type
-    for cf in all_cash_flows:
-        if cf["type"] == "both":
-            # Split into coupon and principal portions
-            total_amount = Decimal(cf["amount"])
-            # Approximate: assume coupon portion based on description
-            total_coupon += total_amount * Decimal("0.1")  # Rough estimate
-            total_principal += total_amount * Decimal("0.9")
+    # One range query over the materialized schedules of the held ISINs
+    scheduled = await get_scheduled_cash_flows(today, end_date, holdings=holdings)
+    
+    # Issuer names for the instruments that actually pay in the period
+    paying_isins = list({cf["isin"] for cf in scheduled})
+    issuer_names = {
+        i["isin"]: i.get("issuer_name", "Unknown")
+        for i in await db.fi_instruments.find(
+            {"isin": {"$in": paying_isins}},
+            {"_id": 0, "isin": 1, "issuer_name": 1}
+        ).to_list(length=None)
+    } if paying_isins else {}
+    
+    all_cash_flows = [
+        {
+            "date": cf["date"].isoformat(),
+            "isin": cf["isin"],
+            "issuer_name": issuer_names.get(cf["isin"], "Unknown"),
+            "type": cf["type"],
+            "amount": str(cf["amount"]),
+            "description": cf["description"]
+        }
+        for cf in scheduled
+    ]
+    
+    total_coupon = sum((cf["coupon"] for cf in scheduled), Decimal("0"))
+    total_principal = sum((cf["principal"] for cf in scheduled), Decimal("0"))
     
     return {
         "client_id": client_id,
@@ -14,6 +14,10 @@ Features:
 - Curve shift analysis (parallel, twist, butterfly)
 - Spread analysis (credit spreads, G-spread, Z-spread)
 
+Fitted curves are cached per (curve_date, rating, method) in curve_cache and
+evaluated for whole tenor arrays at once (YieldCurve.get_rates), so chart,
+spread and forward-curve requests do not re-query or re-fit.
+
 Reference: Fixed income securities typically use government bonds as the risk-free
 benchmark, with corporate/NCD spreads measured against this benchmark.
 """
@@ -22,12 +26,13 @@ import numpy as np
 from scipy import interpolate, optimize
 from datetime import date, datetime, timedelta
 from decimal import Decimal, ROUND_HALF_UP
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Sequence, Union
 from dataclasses import dataclass, field
 from enum import Enum
 import logging
 
 from database import db
+from .curve_cache import CurveCache, curve_cache
 
 logger = logging.getLogger(__name__)
 
@@ -67,30 +72,45 @@ class YieldCurve:
     interpolation_method: InterpolationMethod = InterpolationMethod.CUBIC_SPLINE
     model_params: Dict = field(default_factory=dict)
     
-    def get_rate(self, tenor: float) -> float:
-        """Get interpolated rate for any tenor"""
-        if not self.points:
-            return 0.0
-        
-        tenors = [p.tenor for p in self.points]
-        rates = [p.rate for p in self.points]
+    # Fitted interpolator, built on first evaluation (points are fixed once the curve is built)
+    _interpolator: Any = field(default=None, init=False, repr=False, compare=False)
+    
+    def _build_interpolator(self):
+        """Fit the interpolator once for this curve."""
+        tenors = np.array([p.tenor for p in self.points], dtype=float)
+        rates = np.array([p.rate for p in self.points], dtype=float)
         
-        if self.interpolation_method == InterpolationMethod.LINEAR:
-            return np.interp(tenor, tenors, rates)
+        if self.interpolation_method == InterpolationMethod.CUBIC_SPLINE and len(tenors) >= 4:
+            return interpolate.CubicSpline(tenors, rates)
         
-        elif self.interpolation_method == InterpolationMethod.CUBIC_SPLINE:
-            if len(tenors) >= 4:
-                cs = interpolate.CubicSpline(tenors, rates)
-                return float(cs(tenor))
-            return np.interp(tenor, tenors, rates)
+        if self.interpolation_method in (InterpolationMethod.NELSON_SIEGEL, InterpolationMethod.SVENSSON):
+            return self._parametric_rates
         
-        elif self.interpolation_method in (InterpolationMethod.NELSON_SIEGEL, InterpolationMethod.SVENSSON):
-            return self._parametric_rate(tenor)
+        # Linear (and cubic spline with too few points)
+        return lambda t: np.interp(t, tenors, rates)
+    
+    def get_rates(self, tenors: Union[Sequence[float], np.ndarray]) -> np.ndarray:
+        """Get interpolated rates for an array of tenors in one call"""
+        tenors = np.asarray(tenors, dtype=float)
+        if not self.points:
+            return np.zeros_like(tenors)
         
-        return np.interp(tenor, tenors, rates)
+        if self._interpolator is None:
+            self._interpolator = self._build_interpolator()
+        return np.asarray(self._interpolator(tenors), dtype=float)
+    
+    def get_rate(self, tenor: float) -> float:
+        """Get interpolated rate for any tenor"""
+        if not self.points:
+            return 0.0
+        return float(self.get_rates(np.array([tenor]))[0])
     
     def _parametric_rate(self, tenor: float) -> float:
         """Calculate rate using Nelson-Siegel or Svensson model"""
+        return float(self._parametric_rates(np.array([tenor], dtype=float))[0])
+    
+    def _parametric_rates(self, tenors: np.ndarray) -> np.ndarray:
+        """Vectorized Nelson-Siegel / Svensson evaluation"""
         params = self.model_params
         
         if self.interpolation_method == InterpolationMethod.NELSON_SIEGEL:
@@ -99,11 +119,9 @@ class YieldCurve:
             beta2 = params.get("beta2", 0.5)
             tau1 = params.get("tau1", 2.0)
             
-            if tenor == 0:
-                return beta0 + beta1
-            
-            x = tenor / tau1
-            return beta0 + beta1 * (1 - np.exp(-x)) / x + beta2 * ((1 - np.exp(-x)) / x - np.exp(-x))
+            x = np.where(tenors == 0, 1.0, tenors / tau1)
+            rates = beta0 + beta1 * (1 - np.exp(-x)) / x + beta2 * ((1 - np.exp(-x)) / x - np.exp(-x))
+            return np.where(tenors == 0, beta0 + beta1, rates)
         
         elif self.interpolation_method == InterpolationMethod.SVENSSON:
             beta0 = params.get("beta0", 7.0)
@@ -113,20 +131,17 @@ class YieldCurve:
             tau1 = params.get("tau1", 2.0)
             tau2 = params.get("tau2", 5.0)
             
-            if tenor == 0:
-                return beta0 + beta1
-            
-            x1 = tenor / tau1
-            x2 = tenor / tau2
+            x1 = np.where(tenors == 0, 1.0, tenors / tau1)
+            x2 = np.where(tenors == 0, 1.0, tenors / tau2)
             
             term1 = beta0
             term2 = beta1 * (1 - np.exp(-x1)) / x1
             term3 = beta2 * ((1 - np.exp(-x1)) / x1 - np.exp(-x1))
             term4 = beta3 * ((1 - np.exp(-x2)) / x2 - np.exp(-x2))
             
-            return term1 + term2 + term3 + term4
+            return np.where(tenors == 0, beta0 + beta1, term1 + term2 + term3 + term4)
         
-        return 0.0
+        return np.zeros_like(tenors)
     
     def to_dict(self) -> Dict:
         """Convert to dictionary for API response"""
@@ -240,6 +255,24 @@ class YieldCurveAnalytics:
         
         return self.gsec_curve
     
+    async def get_gsec_curve(
+        self,
+        curve_date: date = None,
+        interpolation: InterpolationMethod = InterpolationMethod.CUBIC_SPLINE
+    ) -> YieldCurve:
+        """G-Sec curve from the fitted curve cache, building it on a miss."""
+        curve_date = curve_date or date.today()
+        key = CurveCache.key("gsec", curve_date, interpolation.value)
+        
+        curve = curve_cache.get(key)
+        if curve is None:
+            generation = curve_cache.generation
+            curve = await self.build_gsec_curve(curve_date, interpolation)
+            curve_cache.set(key, curve, generation)
+        
+        self.gsec_curve = curve
+        return curve
+    
     def _get_benchmark_gsec_points(self) -> List[YieldPoint]:
         """Get benchmark G-Sec yields (approximate current market rates)"""
         # These are approximate Indian G-Sec rates - would be updated with live data
@@ -356,6 +389,44 @@ class YieldCurveAnalytics:
         self.corporate_curves[rating] = curve
         return curve
     
+    async def get_corporate_curve(
+        self,
+        rating: str,
+        curve_date: date = None,
+        interpolation: InterpolationMethod = InterpolationMethod.CUBIC_SPLINE
+    ) -> YieldCurve:
+        """
+        Corporate curve from the fitted curve cache, building it on a miss.
+        
+        The G-Sec curve for the same date and method is loaded first since
+        sparse ratings are estimated as a spread over it.
+        """
+        curve_date = curve_date or date.today()
+        key = CurveCache.key(rating, curve_date, interpolation.value)
+        
+        curve = curve_cache.get(key)
+        if curve is None:
+            generation = curve_cache.generation
+            gsec = self.gsec_curve
+            if gsec is None or gsec.curve_date != curve_date or gsec.interpolation_method != interpolation:
+                await self.get_gsec_curve(curve_date, interpolation)
+            curve = await self.build_corporate_curve(rating, curve_date, interpolation)
+            curve_cache.set(key, curve, generation)
+        
+        self.corporate_curves[rating] = curve
+        return curve
+    
+    def get_forward_curve(self, spot_curve: YieldCurve) -> YieldCurve:
+        """Forward curve derived from a cached spot curve (cached alongside it)."""
+        key = CurveCache.key("forward", spot_curve.curve_date, spot_curve.interpolation_method.value)
+        
+        curve = curve_cache.get(key)
+        if curve is None:
+            generation = curve_cache.generation
+            curve = self.calculate_forward_curve(spot_curve)
+            curve_cache.set(key, curve, generation)
+        return curve
+    
     def _get_typical_spread(self, rating: str) -> float:
         """Get typical credit spread over G-Sec for a rating"""
         spreads = {
@@ -474,13 +545,14 @@ class YieldCurveAnalytics:
         
         forward_points = []
         tenors = sorted([p.tenor for p in spot_curve.points])
+        spot_rates = spot_curve.get_rates(tenors) / 100
         
         for i in range(1, len(tenors)):
             t1 = tenors[i-1]
             t2 = tenors[i]
             
-            s1 = spot_curve.get_rate(t1) / 100
-            s2 = spot_curve.get_rate(t2) / 100
+            s1 = float(spot_rates[i-1])
+            s2 = float(spot_rates[i])
             
             if t2 > t1 and s1 > 0 and s2 > 0:
                 # Forward rate calculation
@@ -517,11 +589,10 @@ class YieldCurveAnalytics:
         Calculate credit spreads between corporate and benchmark curve.
         """
         spreads = []
+        corp_rates = corporate_curve.get_rates(self.STANDARD_TENORS)
+        bench_rates = benchmark_curve.get_rates(self.STANDARD_TENORS)
         
-        for tenor in self.STANDARD_TENORS:
-            corp_rate = corporate_curve.get_rate(tenor)
-            bench_rate = benchmark_curve.get_rate(tenor)
-            
+        for tenor, corp_rate, bench_rate in zip(self.STANDARD_TENORS, corp_rates.tolist(), bench_rates.tolist()):
             spread = corp_rate - bench_rate
             
             spreads.append({
@@ -580,8 +651,8 @@ class YieldCurveAnalytics:
         """
         tenors = [1, 5, 10]  # Short, medium, long
         
-        old_rates = [old_curve.get_rate(t) for t in tenors]
-        new_rates = [new_curve.get_rate(t) for t in tenors]
+        old_rates = old_curve.get_rates(tenors).tolist()
+        new_rates = new_curve.get_rates(tenors).tolist()
         
         shifts = [new_rates[i] - old_rates[i] for i in range(3)]
         
@@ -646,17 +717,17 @@ async def get_yield_curves(
     
     analytics = YieldCurveAnalytics()
     
-    # Build G-Sec curve
-    gsec = await analytics.build_gsec_curve(curve_date, interp_method)
+    # G-Sec curve (cached per date and method)
+    gsec = await analytics.get_gsec_curve(curve_date, interp_method)
     
-    # Build corporate curves
+    # Corporate curves
     corp_curves = {}
     for rating in ratings:
-        curve = await analytics.build_corporate_curve(rating, curve_date, interp_method)
+        curve = await analytics.get_corporate_curve(rating, curve_date, interp_method)
         corp_curves[rating] = curve.to_dict()
     
-    # Calculate forward curve
-    forward = analytics.calculate_forward_curve(gsec)
+    # Forward curve
+    forward = analytics.get_forward_curve(gsec)
     
     return {
         "curve_date": curve_date.isoformat(),
@@ -675,8 +746,8 @@ async def get_spread_analysis(rating: str, curve_date: date = None) -> Dict[str,
     curve_date = curve_date or date.today()
     
     analytics = YieldCurveAnalytics()
-    gsec = await analytics.build_gsec_curve(curve_date)
-    corp = await analytics.build_corporate_curve(rating, curve_date)
+    gsec = await analytics.get_gsec_curve(curve_date)
+    corp = await analytics.get_corporate_curve(rating, curve_date)
     
     spreads = analytics.calculate_spreads(corp, gsec)
     krds = analytics.calculate_key_rate_durations(gsec)
@@ -705,14 +776,18 @@ async def get_curve_chart_data(
     ratings = ratings or ["AAA", "AA", "A"]
     
     analytics = YieldCurveAnalytics()
-    gsec = await analytics.build_gsec_curve(curve_date)
+    gsec = await analytics.get_gsec_curve(curve_date)
     
-    # Generate smooth curve points for charting
+    # Generate smooth curve points for charting (evaluated in one call per curve)
     chart_tenors = [i * 0.5 for i in range(1, 61)]  # 0.5 to 30 years
     
+    def chart_points(curve: YieldCurve) -> List[Dict[str, float]]:
+        rates = np.round(curve.get_rates(chart_tenors), 3).tolist()
+        return [{"x": t, "y": y} for t, y in zip(chart_tenors, rates)]
+    
     series = [{
         "name": "G-Sec (Risk-Free)",
-        "data": [{"x": t, "y": round(gsec.get_rate(t), 3)} for t in chart_tenors],
+        "data": chart_points(gsec),
         "color": "#10b981"
     }]
     
@@ -724,10 +799,10 @@ async def get_curve_chart_data(
     }
     
     for rating in ratings:
-        corp = await analytics.build_corporate_curve(rating, curve_date)
+        corp = await analytics.get_corporate_curve(rating, curve_date)
         series.append({
             "name": f"{rating} Corporate",
-            "data": [{"x": t, "y": round(corp.get_rate(t), 3)} for t in chart_tenors],
+            "data": chart_points(corp),
             "color": rating_colors.get(rating, "#6b7280")
         })
     
@@ -2,16 +2,16 @@
 Bot & Attack Protection Middleware
 Blocks search engine crawlers, bots, and various attack patterns
 """
-import re
 import time
 from collections import defaultdict
 from datetime import datetime, timezone
-from typing import Dict, List, Tuple
-from fastapi import Request
+from typing import Dict, List, Optional, Tuple
 from fastapi.responses import JSONResponse, Response
-from starlette.middleware.base import BaseHTTPMiddleware
 import logging
 
+from middleware.patterns import PatternSet
+from middleware.shared_limits import SharedBlockList, SlidingWindowCounter, register
+
 logger = logging.getLogger(__name__)
 
 # ============== Blocked Threats Database ==============
@@ -20,9 +20,17 @@ class ThreatDatabase:
     In-memory database for tracking blocked threats
     Syncs with MongoDB periodically
     """
+    # Violations within this window before an IP is blocked (for the same duration)
+    AUTO_BLOCK_THRESHOLD = 5
+    AUTO_BLOCK_WINDOW = 3600
+    # Unsynced records kept in memory at most (oldest dropped while MongoDB is down)
+    MAX_PENDING_RECORDS = 10000
+    
     def __init__(self):
         self.blocked_requests: List[dict] = []
-        self.blocked_ips: Dict[str, dict] = {}
+        # Violations and auto-blocks are shared across workers
+        self.violations = register(SlidingWindowCounter("threat_violations", self.AUTO_BLOCK_WINDOW))
+        self.auto_blocked = register(SharedBlockList("threat_ip"))
         self.threat_counts: Dict[str, int] = defaultdict(int)
         self.last_sync: float = 0
         self.sync_interval: int = 60  # Sync to DB every 60 seconds
@@ -48,15 +56,18 @@ class ThreatDatabase:
         }
         
         self.blocked_requests.append(record)
+        if len(self.blocked_requests) > self.MAX_PENDING_RECORDS:
+            del self.blocked_requests[:len(self.blocked_requests) - self.MAX_PENDING_RECORDS]
         self.threat_counts[threat_type] += 1
         
         # Auto-block IP after multiple violations
         if auto_block:
-            if ip_address not in self.blocked_ips:
-                self.blocked_ips[ip_address] = {"count": 0, "first_seen": time.time()}
-            self.blocked_ips[ip_address]["count"] += 1
-            self.blocked_ips[ip_address]["last_seen"] = time.time()
-            self.blocked_ips[ip_address]["last_threat"] = threat_type
+            violations = self.violations.hit(ip_address)
+            if violations >= self.AUTO_BLOCK_THRESHOLD and not self.auto_blocked.is_blocked(ip_address):
+                self.auto_blocked.block(
+                    ip_address, self.AUTO_BLOCK_WINDOW,
+                    violations=int(violations), last_threat=threat_type
+                )
         
         # Log to console
         logger.warning(f"THREAT BLOCKED: {threat_type} from {ip_address} - {path}")
@@ -79,14 +90,13 @@ class ThreatDatabase:
         except Exception as e:
             logger.error(f"Failed to sync threats to database: {e}")
     
-    def is_ip_blocked(self, ip_address: str, threshold: int = 5) -> bool:
-        """Check if IP should be blocked based on violation count"""
-        if ip_address in self.blocked_ips:
-            info = self.blocked_ips[ip_address]
-            # Block if exceeded threshold within last hour
-            if info["count"] >= threshold and (time.time() - info["first_seen"]) < 3600:
-                return True
-        return False
+    def is_ip_blocked(self, ip_address: str) -> bool:
+        """Check if IP is blocked after repeated violations (on any worker)"""
+        return self.auto_blocked.is_blocked(ip_address)
+    
+    @property
+    def blocked_ips(self) -> Dict[str, dict]:
+        return self.auto_blocked.active()
     
     def get_stats(self) -> dict:
         """Get threat statistics"""
@@ -155,6 +165,19 @@ class BotDetector:
         r"^40\.77\.",   # Bing
     ]
     
+    # Suspicious user agent patterns and the reason reported for each
+    SUSPICIOUS_UA_PATTERNS = [
+        (r"<script", "XSS attempt in user agent"),
+        (r"\.\./", "Path traversal in user agent"),
+        (r"etc/passwd", "Path traversal in user agent"),
+        (r"cmd\.exe", "Command injection in user agent"),
+        (r"/bin/", "Command injection in user agent"),
+    ]
+    
+    _BOT_USER_AGENTS = PatternSet(BOT_USER_AGENTS)
+    _SUSPICIOUS_UA = PatternSet([pattern for pattern, _ in SUSPICIOUS_UA_PATTERNS])
+    _SUSPICIOUS_UA_REASONS = dict(SUSPICIOUS_UA_PATTERNS)
+    
     @classmethod
     def is_bot(cls, user_agent: str) -> Tuple[bool, str]:
         """
@@ -164,25 +187,23 @@ class BotDetector:
         if not user_agent:
             return True, "empty_user_agent"
         
-        ua_lower = user_agent.lower()
-        
-        for pattern in cls.BOT_USER_AGENTS:
-            if re.search(pattern, ua_lower):
-                # Determine bot category
-                if any(x in pattern for x in ["googlebot", "bingbot", "yandex", "baidu"]):
-                    return True, "search_engine_crawler"
-                elif any(x in pattern for x in ["facebook", "twitter", "linkedin", "whatsapp"]):
-                    return True, "social_media_crawler"
-                elif any(x in pattern for x in ["semrush", "ahrefs", "moz", "majestic"]):
-                    return True, "seo_tool"
-                elif any(x in pattern for x in ["nikto", "nmap", "sqlmap", "burp", "acunetix"]):
-                    return True, "security_scanner"
-                elif any(x in pattern for x in ["scrapy", "wget", "curl", "python", "java"]):
-                    return True, "web_scraper"
-                elif any(x in pattern for x in ["headless", "phantom", "puppeteer", "selenium"]):
-                    return True, "headless_browser"
-                else:
-                    return True, "generic_bot"
+        pattern = cls._BOT_USER_AGENTS.first_match(user_agent.lower())
+        if pattern:
+            # Determine bot category
+            if any(x in pattern for x in ["googlebot", "bingbot", "yandex", "baidu"]):
+                return True, "search_engine_crawler"
+            elif any(x in pattern for x in ["facebook", "twitter", "linkedin", "whatsapp"]):
+                return True, "social_media_crawler"
+            elif any(x in pattern for x in ["semrush", "ahrefs", "moz", "majestic"]):
+                return True, "seo_tool"
+            elif any(x in pattern for x in ["nikto", "nmap", "sqlmap", "burp", "acunetix"]):
+                return True, "security_scanner"
+            elif any(x in pattern for x in ["scrapy", "wget", "curl", "python", "java"]):
+                return True, "web_scraper"
+            elif any(x in pattern for x in ["headless", "phantom", "puppeteer", "selenium"]):
+                return True, "headless_browser"
+            else:
+                return True, "generic_bot"
         
         return False, ""
     
@@ -199,17 +220,9 @@ class BotDetector:
             return True, "User agent too long"
         
         # Check for common attack patterns in UA
-        attack_patterns = [
-            (r"<script", "XSS attempt in user agent"),
-            (r"\.\./", "Path traversal in user agent"),
-            (r"etc/passwd", "Path traversal in user agent"),
-            (r"cmd\.exe", "Command injection in user agent"),
-            (r"/bin/", "Command injection in user agent"),
-        ]
-        
-        for pattern, reason in attack_patterns:
-            if re.search(pattern, user_agent, re.IGNORECASE):
-                return True, reason
+        pattern = cls._SUSPICIOUS_UA.first_match(user_agent)
+        if pattern:
+            return True, cls._SUSPICIOUS_UA_REASONS[pattern]
         
         return False, ""
 
@@ -320,201 +333,188 @@ class AttackDetector:
         r"instance-data",
     ]
     
+    _PATH_TRAVERSAL = PatternSet(PATH_TRAVERSAL_PATTERNS)
+    _DIRECTORY_ENUM = PatternSet(DIRECTORY_ENUM_PATTERNS)
+    _COMMAND_INJECTION = PatternSet(COMMAND_INJECTION_PATTERNS)
+    _FILE_INCLUSION = PatternSet(FILE_INCLUSION_PATTERNS)
+    _SSRF = PatternSet(SSRF_PATTERNS)
+    
     @classmethod
     def detect_path_traversal(cls, path: str) -> Tuple[bool, str]:
         """Detect path traversal attack"""
-        path_lower = path.lower()
-        for pattern in cls.PATH_TRAVERSAL_PATTERNS:
-            if re.search(pattern, path_lower, re.IGNORECASE):
-                return True, f"Path traversal detected: {pattern}"
+        pattern = cls._PATH_TRAVERSAL.first_match(path.lower())
+        if pattern:
+            return True, f"Path traversal detected: {pattern}"
         return False, ""
     
     @classmethod
     def detect_directory_enumeration(cls, path: str) -> Tuple[bool, str]:
         """Detect directory/file enumeration attempt"""
-        path_lower = path.lower()
-        for pattern in cls.DIRECTORY_ENUM_PATTERNS:
-            if re.search(pattern, path_lower, re.IGNORECASE):
-                return True, f"Directory enumeration: {pattern}"
+        pattern = cls._DIRECTORY_ENUM.first_match(path.lower())
+        if pattern:
+            return True, f"Directory enumeration: {pattern}"
         return False, ""
     
     @classmethod
     def detect_command_injection(cls, value: str) -> Tuple[bool, str]:
         """Detect command injection attempt"""
-        for pattern in cls.COMMAND_INJECTION_PATTERNS:
-            if re.search(pattern, value, re.IGNORECASE):
-                return True, "Command injection detected"
+        if cls._COMMAND_INJECTION.matches(value):
+            return True, "Command injection detected"
         return False, ""
     
     @classmethod
     def detect_file_inclusion(cls, value: str) -> Tuple[bool, str]:
         """Detect LFI/RFI attack"""
-        for pattern in cls.FILE_INCLUSION_PATTERNS:
-            if re.search(pattern, value, re.IGNORECASE):
-                return True, f"File inclusion attempt: {pattern}"
+        pattern = cls._FILE_INCLUSION.first_match(value)
+        if pattern:
+            return True, f"File inclusion attempt: {pattern}"
         return False, ""
     
     @classmethod
     def detect_ssrf(cls, value: str) -> Tuple[bool, str]:
         """Detect SSRF attempt"""
-        for pattern in cls.SSRF_PATTERNS:
-            if re.search(pattern, value, re.IGNORECASE):
-                return True, "SSRF attempt detected"
+        if cls._SSRF.matches(value):
+            return True, "SSRF attempt detected"
         return False, ""
 
 
-# ============== Bot Protection Middleware ==============
-class BotProtectionMiddleware(BaseHTTPMiddleware):
+# ============== Bot Protection ==============
+# Paths that are allowed without bot check (like health checks)
+ALLOWED_PATHS = (
+    "/api/health",
+    "/api/ping",
+    "/api/demo/init",  # Demo mode initialization needs to work from frontend
+    "/api/demo/cleanup",  # Demo mode cleanup
+    "/api/demo/status",  # Demo status check
+    "/api/demo/verify-isolation",  # Demo isolation verification
+    "/api/auth/login",  # Allow login from curl/scripts
+    "/api/auth/register",  # Allow registration
+    "/api/whatsapp/webhook",  # Wati.io webhook endpoint - external service callback
+)
+
+
+def _blocked_response(message: str, status_code: int = 403) -> Response:
+    """Return a blocked response"""
+    return JSONResponse(
+        status_code=status_code,
+        content={"detail": message}
+    )
+
+
+async def check_bot_protection(
+    path: str,
+    full_url: str,
+    query_string: str,
+    client_ip: str,
+    user_agent: str,
+    authorization: str
+) -> Optional[Response]:
     """
-    Middleware to block bots, crawlers, and various attacks
+    Block bots, crawlers, and various attacks.
+    Returns the blocking response, or None if the request passed all checks.
     """
+    # Skip protection for allowed paths
+    if path.startswith(ALLOWED_PATHS):
+        return None
     
-    # Paths that are allowed without bot check (like health checks)
-    ALLOWED_PATHS = [
-        "/api/health",
-        "/api/ping",
-        "/api/demo/init",  # Demo mode initialization needs to work from frontend
-        "/api/demo/cleanup",  # Demo mode cleanup
-        "/api/demo/status",  # Demo status check
-        "/api/demo/verify-isolation",  # Demo isolation verification
-        "/api/auth/login",  # Allow login from curl/scripts
-        "/api/auth/register",  # Allow registration
-        "/api/whatsapp/webhook",  # Wati.io webhook endpoint - external service callback
-    ]
-    
-    async def dispatch(self, request: Request, call_next):
-        path = request.url.path
-        client_ip = self._get_client_ip(request)
-        user_agent = request.headers.get("user-agent", "")
-        
-        # Skip protection for allowed paths
-        if any(path.startswith(p) for p in self.ALLOWED_PATHS):
-            return await call_next(request)
-        
-        # Skip bot detection for authenticated requests (have valid Authorization header)
-        auth_header = request.headers.get("authorization", "")
-        if auth_header.startswith("Bearer ") and len(auth_header) > 20:
-            # Authenticated request - still check for attacks but skip bot detection
-            # This allows curl/script access for authenticated API calls
-            pass
-        else:
-            # Check if IP is already blocked from previous violations
-            if threat_db.is_ip_blocked(client_ip):
-                return self._blocked_response("IP blocked due to repeated violations")
-            
-            # 1. Check for bots/crawlers (only for unauthenticated requests)
-            is_bot, bot_type = BotDetector.is_bot(user_agent)
-            if is_bot:
-                await threat_db.record_blocked_request(
-                    ip_address=client_ip,
-                    threat_type=bot_type,
-                    user_agent=user_agent,
-                    path=path,
-                    details=f"Bot detected: {bot_type}"
-                )
-                return self._blocked_response("Access denied")
-            
-            # 2. Check for suspicious user agent
-            is_suspicious, reason = BotDetector.is_suspicious_user_agent(user_agent)
-            if is_suspicious:
-                await threat_db.record_blocked_request(
-                    ip_address=client_ip,
-                    threat_type="suspicious_user_agent",
-                    user_agent=user_agent,
-                    path=path,
-                    details=reason
-                )
-                return self._blocked_response("Access denied")
-        
-        # 3. Check for path traversal
-        is_attack, details = AttackDetector.detect_path_traversal(path)
-        if is_attack:
+    # Skip bot detection for authenticated requests (have valid Authorization header)
+    if authorization.startswith("Bearer ") and len(authorization) > 20:
+        # Authenticated request - still check for attacks but skip bot detection
+        # This allows curl/script access for authenticated API calls
+        pass
+    else:
+        # Check if IP is already blocked from previous violations
+        if threat_db.is_ip_blocked(client_ip):
+            return _blocked_response("IP blocked due to repeated violations")
+        
+        # 1. Check for bots/crawlers (only for unauthenticated requests)
+        is_bot, bot_type = BotDetector.is_bot(user_agent)
+        if is_bot:
             await threat_db.record_blocked_request(
                 ip_address=client_ip,
-                threat_type="path_traversal",
+                threat_type=bot_type,
                 user_agent=user_agent,
                 path=path,
-                details=details
+                details=f"Bot detected: {bot_type}"
             )
-            return self._blocked_response("Invalid request")
+            return _blocked_response("Access denied")
         
-        # 4. Check for directory enumeration
-        is_attack, details = AttackDetector.detect_directory_enumeration(path)
-        if is_attack:
+        # 2. Check for suspicious user agent
+        is_suspicious, reason = BotDetector.is_suspicious_user_agent(user_agent)
+        if is_suspicious:
             await threat_db.record_blocked_request(
                 ip_address=client_ip,
-                threat_type="directory_enumeration",
+                threat_type="suspicious_user_agent",
                 user_agent=user_agent,
                 path=path,
-                details=details
+                details=reason
             )
-            return self._blocked_response("Not found", status_code=404)
-        
-        # 5. Check query parameters for attacks
-        full_url = str(request.url)
-        
-        # Command injection in URL
-        is_attack, details = AttackDetector.detect_command_injection(full_url)
-        if is_attack:
-            await threat_db.record_blocked_request(
-                ip_address=client_ip,
-                threat_type="command_injection",
-                user_agent=user_agent,
-                path=path,
-                details=details
-            )
-            return self._blocked_response("Invalid request")
-        
-        # File inclusion in URL
-        is_attack, details = AttackDetector.detect_file_inclusion(full_url)
-        if is_attack:
-            await threat_db.record_blocked_request(
-                ip_address=client_ip,
-                threat_type="file_inclusion",
-                user_agent=user_agent,
-                path=path,
-                details=details
-            )
-            return self._blocked_response("Invalid request")
-        
-        # SSRF in URL - only check query parameters, not the host
-        # The host is under our control, SSRF check is for query params that might contain URLs
-        query_string = str(request.query_params) if request.query_params else ""
-        is_attack, details = AttackDetector.detect_ssrf(query_string)
-        if is_attack:
-            await threat_db.record_blocked_request(
-                ip_address=client_ip,
-                threat_type="ssrf_attempt",
-                user_agent=user_agent,
-                path=path,
-                details=details
-            )
-            return self._blocked_response("Invalid request")
-        
-        # Request passed all checks
-        return await call_next(request)
+            return _blocked_response("Access denied")
     
-    def _get_client_ip(self, request: Request) -> str:
-        """Extract real client IP"""
-        forwarded_for = request.headers.get("X-Forwarded-For")
-        if forwarded_for:
-            return forwarded_for.split(",")[0].strip()
-        
-        real_ip = request.headers.get("X-Real-IP")
-        if real_ip:
-            return real_ip
-        
-        if request.client:
-            return request.client.host
-        
-        return "unknown"
+    # 3. Check for path traversal
+    is_attack, details = AttackDetector.detect_path_traversal(path)
+    if is_attack:
+        await threat_db.record_blocked_request(
+            ip_address=client_ip,
+            threat_type="path_traversal",
+            user_agent=user_agent,
+            path=path,
+            details=details
+        )
+        return _blocked_response("Invalid request")
     
-    def _blocked_response(self, message: str, status_code: int = 403) -> Response:
-        """Return a blocked response"""
-        return JSONResponse(
-            status_code=status_code,
-            content={"detail": message}
+    # 4. Check for directory enumeration
+    is_attack, details = AttackDetector.detect_directory_enumeration(path)
+    if is_attack:
+        await threat_db.record_blocked_request(
+            ip_address=client_ip,
+            threat_type="directory_enumeration",
+            user_agent=user_agent,
+            path=path,
+            details=details
         )
+        return _blocked_response("Not found", status_code=404)
+    
+    # 5. Check query parameters for attacks
+    # Command injection in URL
+    is_attack, details = AttackDetector.detect_command_injection(full_url)
+    if is_attack:
+        await threat_db.record_blocked_request(
+            ip_address=client_ip,
+            threat_type="command_injection",
+            user_agent=user_agent,
+            path=path,
+            details=details
+        )
+        return _blocked_response("Invalid request")
+    
+    # File inclusion in URL
+    is_attack, details = AttackDetector.detect_file_inclusion(full_url)
+    if is_attack:
+        await threat_db.record_blocked_request(
+            ip_address=client_ip,
+            threat_type="file_inclusion",
+            user_agent=user_agent,
+            path=path,
+            details=details
+        )
+        return _blocked_response("Invalid request")
+    
+    # SSRF in URL - only check query parameters, not the host
+    # The host is under our control, SSRF check is for query params that might contain URLs
+    is_attack, details = AttackDetector.detect_ssrf(query_string)
+    if is_attack:
+        await threat_db.record_blocked_request(
+            ip_address=client_ip,
+            threat_type="ssrf_attempt",
+            user_agent=user_agent,
+            path=path,
+            details=details
+        )
+        return _blocked_response("Invalid request")
+    
+    # Request passed all checks
+    return None
 
 
 # ============== Robots.txt Handler ==============
@@ -692,7 +692,8 @@ __all__ = [
     'threat_db',
     'BotDetector',
     'AttackDetector',
-    'BotProtectionMiddleware',
+    'ALLOWED_PATHS',
+    'check_bot_protection',
     'ROBOTS_TXT_CONTENT',
     'get_threat_statistics'
 ]
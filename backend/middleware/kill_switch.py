@@ -1,14 +1,15 @@
 """
-Kill Switch Middleware
+Kill Switch
 Blocks all API requests when kill switch is active (except allowed endpoints)
 """
-from fastapi import Request
+from typing import Optional
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
 import jwt
 import os
 
 from database import db
+from services.auth_cache import user_cache
+from services.settings_cache import get_kill_switch
 
 # Endpoints that are always allowed even when kill switch is active
 ALLOWED_ENDPOINTS = [
@@ -24,62 +25,64 @@ ALLOWED_ENDPOINTS = [
 ]
 
 # Endpoints that start with these prefixes are allowed
-ALLOWED_PREFIXES = [
+ALLOWED_PREFIXES = (
     "/api/uploads/",  # Static files
-]
+)
 
 
-class KillSwitchMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        # Skip for non-API routes
-        if not request.url.path.startswith("/api"):
-            return await call_next(request)
-        
-        # Always allow certain endpoints
-        if request.url.path in ALLOWED_ENDPOINTS:
-            return await call_next(request)
+async def check_kill_switch(path: str, authorization: Optional[str]) -> Optional[JSONResponse]:
+    """Return a 503 response if the system is frozen for this request, else None"""
+    # Skip for non-API routes
+    if not path.startswith("/api"):
+        return None
+    
+    # Always allow certain endpoints
+    if path in ALLOWED_ENDPOINTS:
+        return None
+    
+    # Allow endpoints with certain prefixes
+    if path.startswith(ALLOWED_PREFIXES):
+        return None
+    
+    # Kill switch state comes from the process-local settings cache
+    try:
+        status = await get_kill_switch()
         
-        # Allow endpoints with certain prefixes
-        for prefix in ALLOWED_PREFIXES:
-            if request.url.path.startswith(prefix):
-                return await call_next(request)
-        
-        # Check kill switch status
-        try:
-            status = await db.system_settings.find_one({"setting": "kill_switch"}, {"_id": 0})
+        if status and status.get("is_active"):
+            # Check if user is PE Desk (role 1) - they can still access the system
+            if authorization and authorization.startswith("Bearer "):
+                token = authorization.split(" ")[1]
+                try:
+                    payload = jwt.decode(
+                        token, 
+                        os.environ.get("JWT_SECRET", "your-secret-key"),
+                        algorithms=["HS256"]
+                    )
+                    user_id = payload.get("user_id")
+                    if user_id:
+                        user = user_cache.get(user_id)
+                        if user is None:
+                            user = await db.users.find_one({"id": user_id}, {"_id": 0})
+                            if user:
+                                user_cache.set(user_id, user)
+                        if user and user.get("role") == 1:
+                            # PE Desk can access everything
+                            return None
+                except:
+                    pass
             
-            if status and status.get("is_active"):
-                # Check if user is PE Desk (role 1) - they can still access the system
-                auth_header = request.headers.get("Authorization")
-                if auth_header and auth_header.startswith("Bearer "):
-                    token = auth_header.split(" ")[1]
-                    try:
-                        payload = jwt.decode(
-                            token, 
-                            os.environ.get("JWT_SECRET", "your-secret-key"),
-                            algorithms=["HS256"]
-                        )
-                        user_id = payload.get("user_id")
-                        if user_id:
-                            user = await db.users.find_one({"id": user_id}, {"_id": 0, "role": 1})
-                            if user and user.get("role") == 1:
-                                # PE Desk can access everything
-                                return await call_next(request)
-                    except:
-                        pass
-                
-                # System is frozen for this user
-                return JSONResponse(
-                    status_code=503,
-                    content={
-                        "detail": "System is temporarily frozen",
-                        "kill_switch_active": True,
-                        "activated_by": status.get("activated_by_name"),
-                        "reason": status.get("reason")
-                    }
-                )
-        except Exception:
-            # If we can't check, allow the request (fail open for safety)
-            pass
-        
-        return await call_next(request)
+            # System is frozen for this user
+            return JSONResponse(
+                status_code=503,
+                content={
+                    "detail": "System is temporarily frozen",
+                    "kill_switch_active": True,
+                    "activated_by": status.get("activated_by_name"),
+                    "reason": status.get("reason")
+                }
+            )
+    except Exception:
+        # If we can't check, allow the request (fail open for safety)
+        pass
+    
+    return None
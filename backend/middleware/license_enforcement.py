@@ -236,8 +236,8 @@ class LicenseEnforcer:
             return await db.clients.count_documents(query)
         
         elif limit_type == "max_bookings_per_month":
-            month_start = datetime.now(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            return await db.bookings.count_documents({"created_at": {"$gte": month_start.isoformat()}})
+            from utils.dates import date_range, ist_today
+            return await db.bookings.count_documents(date_range("created_at", ist_today().replace(day=1)))
         
         elif limit_type == "max_fi_orders_per_month":
             month_start = datetime.now(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
@@ -0,0 +1,34 @@
+"""
+Combined Regex Pattern Sets
+Precompiles a list of attack/bot patterns into a single alternation so a clean
+value is rejected with one regex scan instead of one re.search per pattern.
+"""
+import re
+from typing import List, Optional
+
+
+class PatternSet:
+    """
+    A list of regex patterns matched as one compiled alternation.
+
+    matches() answers "does any pattern match" in a single pass. first_match()
+    returns the first pattern *in list order* that matches, exactly like the old
+    per-pattern loop, but only runs that loop after the combined scan has hit -
+    which is the rare case for legitimate traffic.
+    """
+
+    def __init__(self, patterns: List[str], flags: int = re.IGNORECASE):
+        self.patterns = list(patterns)
+        self._combined = re.compile("|".join(f"(?:{p})" for p in self.patterns), flags)
+        self._compiled = [re.compile(p, flags) for p in self.patterns]
+
+    def matches(self, value: str) -> bool:
+        return bool(value) and self._combined.search(value) is not None
+
+    def first_match(self, value: str) -> Optional[str]:
+        if not self.matches(value):
+            return None
+        for pattern, compiled in zip(self.patterns, self._compiled):
+            if compiled.search(value):
+                return pattern
+        return None
@@ -5,57 +5,56 @@ Provides comprehensive security features for the application
 import time
 import hashlib
 import re
-from collections import defaultdict
 from datetime import datetime, timezone
-from typing import Dict, List, Optional
-from fastapi import Request
+from typing import Dict, List, Optional, Tuple
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import Headers, QueryParams
 import logging
 
+from middleware.patterns import PatternSet
+from middleware.shared_limits import SharedBlockList, SlidingWindowCounter, register
+
 logger = logging.getLogger(__name__)
 
 # ============== Rate Limiting ==============
 class RateLimiter:
     """
-    Token bucket rate limiter with sliding window
+    Sliding-window rate limiter with fixed memory, shared across workers
+    (bucketed counters and IP blocks from middleware.shared_limits)
     """
     def __init__(self):
-        self.requests: Dict[str, List[float]] = defaultdict(list)
-        self.blocked_ips: Dict[str, float] = {}
-        
-    def is_rate_limited(self, identifier: str, max_requests: int = 100, window_seconds: int = 60) -> bool:
-        """Check if identifier has exceeded rate limit"""
-        now = time.time()
-        window_start = now - window_seconds
-        
-        # Clean old requests
-        self.requests[identifier] = [
-            req_time for req_time in self.requests[identifier] 
-            if req_time > window_start
-        ]
+        # One counter per window length
+        self.counters: Dict[int, SlidingWindowCounter] = {}
+        self.blocked = register(SharedBlockList("ip"))
         
-        # Check rate limit
-        if len(self.requests[identifier]) >= max_requests:
-            return True
+    def _counter(self, window_seconds: int) -> SlidingWindowCounter:
+        counter = self.counters.get(window_seconds)
+        if counter is None:
+            counter = register(SlidingWindowCounter(f"rate_limit_{window_seconds}s", window_seconds))
+            self.counters[window_seconds] = counter
+        return counter
         
-        # Record this request
-        self.requests[identifier].append(now)
-        return False
+    def is_rate_limited(self, identifier: str, max_requests: int = 100, window_seconds: int = 60) -> bool:
+        """Check if identifier has exceeded rate limit (records the request if not)"""
+        return not self._counter(window_seconds).allow(identifier, max_requests)
     
     def block_ip(self, ip: str, duration_seconds: int = 3600):
         """Block an IP address for a duration"""
-        self.blocked_ips[ip] = time.time() + duration_seconds
+        self.blocked.block(ip, duration_seconds)
         logger.warning(f"Blocked IP {ip} for {duration_seconds} seconds")
     
+    def unblock_ip(self, ip: str) -> bool:
+        """Lift an IP block; returns True if the IP was blocked"""
+        return self.blocked.unblock(ip)
+    
     def is_ip_blocked(self, ip: str) -> bool:
         """Check if IP is currently blocked"""
-        if ip in self.blocked_ips:
-            if time.time() < self.blocked_ips[ip]:
-                return True
-            else:
-                del self.blocked_ips[ip]
-        return False
+        return self.blocked.is_blocked(ip)
+    
+    @property
+    def blocked_ips(self) -> Dict[str, dict]:
+        """Currently blocked IPs (all workers, as of the last sync)"""
+        return self.blocked.active()
 
 # Global rate limiter instance
 rate_limiter = RateLimiter()
@@ -63,33 +62,24 @@ rate_limiter = RateLimiter()
 # ============== Login Attempt Tracking ==============
 class LoginAttemptTracker:
     """
-    Track failed login attempts and lock accounts
+    Track failed login attempts and lock accounts.
+    Attempts and lockouts are read and written in MongoDB directly, so they
+    hold across workers.
     """
     def __init__(self):
-        self.failed_attempts: Dict[str, List[float]] = defaultdict(list)
-        self.locked_accounts: Dict[str, float] = {}
         self.max_attempts = 5
         self.lockout_duration = 900  # 15 minutes
         self.attempt_window = 300  # 5 minutes
+        self.failed_attempts = register(SlidingWindowCounter("login_failures", self.attempt_window))
+        self.locks = register(SharedBlockList("account"))
         
-    def record_failed_attempt(self, identifier: str, ip_address: str = None) -> int:
+    async def record_failed_attempt(self, identifier: str, ip_address: str = None) -> int:
         """Record a failed login attempt, return remaining attempts"""
-        now = time.time()
-        window_start = now - self.attempt_window
-        
-        # Clean old attempts
-        self.failed_attempts[identifier] = [
-            attempt for attempt in self.failed_attempts[identifier]
-            if attempt > window_start
-        ]
-        
-        # Record this attempt
-        self.failed_attempts[identifier].append(now)
-        attempts = len(self.failed_attempts[identifier])
+        attempts = int(await self.failed_attempts.hit_shared(identifier))
         
         # Lock account if max attempts exceeded
         if attempts >= self.max_attempts:
-            self.locked_accounts[identifier] = now + self.lockout_duration
+            await self.locks.block_shared(identifier, self.lockout_duration, ip_address=ip_address)
             logger.warning(f"Account locked due to too many failed attempts: {identifier}")
             
             # Send security alert email (async, fire and forget)
@@ -108,35 +98,26 @@ class LoginAttemptTracker:
         
         return max(0, self.max_attempts - attempts)
     
-    def get_failed_attempts_count(self, identifier: str) -> int:
+    async def get_failed_attempts_count(self, identifier: str) -> int:
         """Get current failed attempts count for an identifier"""
-        now = time.time()
-        window_start = now - self.attempt_window
-        
-        # Count attempts within window
-        attempts = [
-            attempt for attempt in self.failed_attempts.get(identifier, [])
-            if attempt > window_start
-        ]
-        return len(attempts)
+        return int(await self.failed_attempts.count_shared(identifier))
     
-    def is_account_locked(self, identifier: str) -> tuple[bool, int]:
+    async def is_account_locked(self, identifier: str) -> tuple[bool, int]:
         """Check if account is locked, return (is_locked, remaining_seconds)"""
-        if identifier in self.locked_accounts:
-            remaining = self.locked_accounts[identifier] - time.time()
-            if remaining > 0:
-                return True, int(remaining)
-            else:
-                del self.locked_accounts[identifier]
-                self.failed_attempts[identifier] = []
+        remaining = await self.locks.remaining_shared(identifier)
+        if remaining > 0:
+            return True, int(remaining)
         return False, 0
     
-    def clear_attempts(self, identifier: str):
-        """Clear failed attempts after successful login"""
-        if identifier in self.failed_attempts:
-            del self.failed_attempts[identifier]
-        if identifier in self.locked_accounts:
-            del self.locked_accounts[identifier]
+    async def clear_attempts(self, identifier: str):
+        """Clear failed attempts (and any lock) after successful login or manual unlock"""
+        await self.failed_attempts.reset_shared(identifier)
+        await self.locks.unblock_shared(identifier)
+    
+    @property
+    def locked_accounts(self) -> Dict[str, dict]:
+        """Currently locked accounts (all workers, as of the last sync)"""
+        return self.locks.active()
 
 # Global login tracker instance
 login_tracker = LoginAttemptTracker()
@@ -173,35 +154,31 @@ class InputSanitizer:
         r"\$and",
     ]
     
+    # Each list compiled once into a single alternation
+    _SQL_INJECTION = PatternSet(SQL_INJECTION_PATTERNS)
+    _XSS = PatternSet(XSS_PATTERNS)
+    _NOSQL_INJECTION = PatternSet(NOSQL_INJECTION_PATTERNS)
+    
     @classmethod
     def detect_sql_injection(cls, value: str) -> bool:
         """Detect potential SQL injection"""
         if not isinstance(value, str):
             return False
-        for pattern in cls.SQL_INJECTION_PATTERNS:
-            if re.search(pattern, value, re.IGNORECASE):
-                return True
-        return False
+        return cls._SQL_INJECTION.matches(value)
     
     @classmethod
     def detect_xss(cls, value: str) -> bool:
         """Detect potential XSS attack"""
         if not isinstance(value, str):
             return False
-        for pattern in cls.XSS_PATTERNS:
-            if re.search(pattern, value, re.IGNORECASE):
-                return True
-        return False
+        return cls._XSS.matches(value)
     
     @classmethod
     def detect_nosql_injection(cls, value: str) -> bool:
         """Detect potential NoSQL injection"""
         if not isinstance(value, str):
             return False
-        for pattern in cls.NOSQL_INJECTION_PATTERNS:
-            if re.search(pattern, value, re.IGNORECASE):
-                return True
-        return False
+        return cls._NOSQL_INJECTION.matches(value)
     
     @classmethod
     def sanitize_string(cls, value: str, max_length: int = 10000) -> str:
@@ -214,157 +191,158 @@ class InputSanitizer:
         value = value.replace('\x00', '')
         return value
 
-# ============== Security Headers Middleware ==============
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
-    """
-    Add security headers to all responses
-    """
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
-        
-        # Security Headers
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-XSS-Protection"] = "1; mode=block"
-        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-        response.headers["Permissions-Policy"] = "geolocation=(), microphone=(), camera=()"
-        
-        # Content Security Policy (relaxed for API)
-        response.headers["Content-Security-Policy"] = (
-            "default-src 'self'; "
-            "script-src 'self' 'unsafe-inline' 'unsafe-eval'; "
-            "style-src 'self' 'unsafe-inline'; "
-            "img-src 'self' data: https:; "
-            "font-src 'self' data:; "
-            "connect-src 'self' wss: https:;"
-        )
-        
-        # Cache-Control headers to prevent browser caching of API responses
-        # This ensures users always get fresh data after deployments
-        path = request.url.path
-        if path.startswith("/api/"):
-            # API responses should not be cached
-            response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-            response.headers["Pragma"] = "no-cache"
-            response.headers["Expires"] = "0"
-        
-        # Remove server identification
-        if "server" in response.headers:
-            del response.headers["server"]
-        
-        return response
+# ============== Security Headers ==============
+SECURITY_HEADERS = {
+    "X-Content-Type-Options": "nosniff",
+    "X-Frame-Options": "DENY",
+    "X-XSS-Protection": "1; mode=block",
+    "Referrer-Policy": "strict-origin-when-cross-origin",
+    "Permissions-Policy": "geolocation=(), microphone=(), camera=()",
+    # Content Security Policy (relaxed for API)
+    "Content-Security-Policy": (
+        "default-src 'self'; "
+        "script-src 'self' 'unsafe-inline' 'unsafe-eval'; "
+        "style-src 'self' 'unsafe-inline'; "
+        "img-src 'self' data: https:; "
+        "font-src 'self' data:; "
+        "connect-src 'self' wss: https:;"
+    ),
+}
 
-# ============== Rate Limiting Middleware ==============
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    """
-    Apply rate limiting to all requests
-    """
-    # Rate limits per endpoint type
-    RATE_LIMITS = {
-        "/api/auth/login": (10, 60),      # 10 requests per minute
-        "/api/auth/register": (5, 60),     # 5 requests per minute
-        "/api/auth/forgot-password": (3, 60),  # 3 requests per minute
-        "/api/auth/reset-password": (5, 60),   # 5 requests per minute
-        "default": (200, 60),              # 200 requests per minute for other endpoints
-    }
+# API responses should not be cached, so users always get fresh data after deployments
+API_NO_CACHE_HEADERS = {
+    "Cache-Control": "no-cache, no-store, must-revalidate",
+    "Pragma": "no-cache",
+    "Expires": "0",
+}
+
+# Auth pages outside /api must not be cached either
+AUTH_NO_CACHE_HEADERS = {
+    "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
+    "Pragma": "no-cache",
+    "Expires": "0",
+}
+
+
+def response_security_headers(path: str) -> Dict[str, str]:
+    """Headers added to every HTTP response for this path"""
+    headers = dict(SECURITY_HEADERS)
+    if path.startswith("/api/"):
+        headers.update(API_NO_CACHE_HEADERS)
+    else:
+        path_lower = path.lower()
+        if '/auth/' in path_lower or '/register' in path_lower or '/login' in path_lower:
+            headers.update(AUTH_NO_CACHE_HEADERS)
+    return headers
+
+
+def get_client_ip(headers: Headers, client: Optional[Tuple[str, int]] = None) -> str:
+    """Extract real client IP from request headers / ASGI client"""
+    # Check X-Forwarded-For header (for proxies/load balancers)
+    forwarded_for = headers.get("x-forwarded-for")
+    if forwarded_for:
+        # Take the first IP in the chain
+        return forwarded_for.split(",")[0].strip()
     
-    async def dispatch(self, request: Request, call_next):
-        # Get client IP
-        client_ip = self._get_client_ip(request)
-        
-        # Check if IP is blocked
-        if rate_limiter.is_ip_blocked(client_ip):
-            logger.warning(f"Blocked request from banned IP: {client_ip}")
-            return JSONResponse(
-                status_code=403,
-                content={"detail": "Your IP has been temporarily blocked due to suspicious activity"}
-            )
-        
-        # Get rate limit for this endpoint
-        path = request.url.path
-        max_requests, window = self.RATE_LIMITS.get(path, self.RATE_LIMITS["default"])
-        
-        # Create identifier (IP + endpoint for more granular control)
-        identifier = f"{client_ip}:{path}"
-        
-        # Check rate limit
-        if rate_limiter.is_rate_limited(identifier, max_requests, window):
-            logger.warning(f"Rate limit exceeded for {client_ip} on {path}")
-            return JSONResponse(
-                status_code=429,
-                content={"detail": "Too many requests. Please try again later."},
-                headers={"Retry-After": str(window)}
-            )
-        
-        return await call_next(request)
+    # Check X-Real-IP header
+    real_ip = headers.get("x-real-ip")
+    if real_ip:
+        return real_ip
     
-    def _get_client_ip(self, request: Request) -> str:
-        """Extract real client IP from request"""
-        # Check X-Forwarded-For header (for proxies/load balancers)
-        forwarded_for = request.headers.get("X-Forwarded-For")
-        if forwarded_for:
-            # Take the first IP in the chain
-            return forwarded_for.split(",")[0].strip()
-        
-        # Check X-Real-IP header
-        real_ip = request.headers.get("X-Real-IP")
-        if real_ip:
-            return real_ip
-        
-        # Fall back to direct client IP
-        if request.client:
-            return request.client.host
-        
-        return "unknown"
+    # Fall back to direct client IP
+    if client:
+        return client[0]
+    
+    return "unknown"
 
-# ============== Request Validation Middleware ==============
-class RequestValidationMiddleware(BaseHTTPMiddleware):
-    """
-    Validate and sanitize incoming requests
-    """
-    MAX_CONTENT_LENGTH = 10 * 1024 * 1024  # 10MB max request size
+# ============== Rate Limiting ==============
+# Rate limits per endpoint type
+RATE_LIMITS = {
+    "/api/auth/login": (10, 60),      # 10 requests per minute
+    "/api/auth/register": (5, 60),     # 5 requests per minute
+    "/api/auth/forgot-password": (3, 60),  # 3 requests per minute
+    "/api/auth/reset-password": (5, 60),   # 5 requests per minute
+    "default": (200, 60),              # 200 requests per minute for other endpoints
+}
+
+
+def check_rate_limit(client_ip: str, path: str) -> Optional[JSONResponse]:
+    """Return a 403/429 response if the request must be rejected, else None"""
+    # Check if IP is blocked
+    if rate_limiter.is_ip_blocked(client_ip):
+        logger.warning(f"Blocked request from banned IP: {client_ip}")
+        return JSONResponse(
+            status_code=403,
+            content={"detail": "Your IP has been temporarily blocked due to suspicious activity"}
+        )
     
-    # Paths that allow larger uploads
-    LARGE_UPLOAD_PATHS = [
-        "/api/company-master/upload",
-        "/api/clients/upload",
-        "/api/bulk-upload",
-        "/api/database/restore",
-    ]
+    # Get rate limit for this endpoint
+    max_requests, window = RATE_LIMITS.get(path, RATE_LIMITS["default"])
     
-    async def dispatch(self, request: Request, call_next):
-        # Check content length
-        content_length = request.headers.get("content-length")
-        if content_length:
+    # Create identifier (IP + endpoint for more granular control)
+    identifier = f"{client_ip}:{path}"
+    
+    # Check rate limit
+    if rate_limiter.is_rate_limited(identifier, max_requests, window):
+        logger.warning(f"Rate limit exceeded for {client_ip} on {path}")
+        return JSONResponse(
+            status_code=429,
+            content={"detail": "Too many requests. Please try again later."},
+            headers={"Retry-After": str(window)}
+        )
+    
+    return None
+
+# ============== Request Validation ==============
+MAX_CONTENT_LENGTH = 10 * 1024 * 1024  # 10MB max request size
+MAX_UPLOAD_CONTENT_LENGTH = 100 * 1024 * 1024  # 100MB for file uploads
+
+# Paths that allow larger uploads
+LARGE_UPLOAD_PATHS = (
+    "/api/company-master/upload",
+    "/api/clients/upload",
+    "/api/bulk-upload",
+    "/api/database/restore",
+)
+
+
+def check_request_validation(path: str, content_length: Optional[str],
+                             query_params: QueryParams) -> Optional[JSONResponse]:
+    """Validate request size and query parameters; return an error response or None"""
+    # Check content length
+    if content_length:
+        try:
             length = int(content_length)
-            max_size = self.MAX_CONTENT_LENGTH
-            
-            # Allow larger uploads for specific paths
-            if any(request.url.path.startswith(p) for p in self.LARGE_UPLOAD_PATHS):
-                max_size = 100 * 1024 * 1024  # 100MB for file uploads
-            
-            if length > max_size:
-                return JSONResponse(
-                    status_code=413,
-                    content={"detail": f"Request too large. Maximum size is {max_size // (1024*1024)}MB"}
-                )
+        except ValueError:
+            return JSONResponse(status_code=400, content={"detail": "Invalid Content-Length header"})
+        max_size = MAX_CONTENT_LENGTH
         
-        # Check for suspicious patterns in query params
-        for key, value in request.query_params.items():
-            if InputSanitizer.detect_sql_injection(value):
-                logger.warning(f"Potential SQL injection detected in query: {key}={value[:100]}")
-                return JSONResponse(
-                    status_code=400,
-                    content={"detail": "Invalid request parameters"}
-                )
-            if InputSanitizer.detect_xss(value):
-                logger.warning(f"Potential XSS detected in query: {key}={value[:100]}")
-                return JSONResponse(
-                    status_code=400,
-                    content={"detail": "Invalid request parameters"}
-                )
+        # Allow larger uploads for specific paths
+        if path.startswith(LARGE_UPLOAD_PATHS):
+            max_size = MAX_UPLOAD_CONTENT_LENGTH
         
-        return await call_next(request)
+        if length > max_size:
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"Request too large. Maximum size is {max_size // (1024*1024)}MB"}
+            )
+    
+    # Check for suspicious patterns in query params
+    for key, value in query_params.multi_items():
+        if InputSanitizer.detect_sql_injection(value):
+            logger.warning(f"Potential SQL injection detected in query: {key}={value[:100]}")
+            return JSONResponse(
+                status_code=400,
+                content={"detail": "Invalid request parameters"}
+            )
+        if InputSanitizer.detect_xss(value):
+            logger.warning(f"Potential XSS detected in query: {key}={value[:100]}")
+            return JSONResponse(
+                status_code=400,
+                content={"detail": "Invalid request parameters"}
+            )
+    
+    return None
 
 # ============== Audit Logger ==============
 class SecurityAuditLogger:
@@ -380,6 +358,7 @@ class SecurityAuditLogger:
     ):
         """Log a security event to the database"""
         from database import db
+        from utils.dates import with_native_dates
         
         event = {
             "event_type": event_type,
@@ -390,7 +369,7 @@ class SecurityAuditLogger:
         }
         
         try:
-            await db.security_logs.insert_one(event)
+            await db.security_logs.insert_one(with_native_dates("security_logs", event))
         except Exception as e:
             logger.error(f"Failed to log security event: {e}")
         
@@ -496,9 +475,12 @@ __all__ = [
     'LoginAttemptTracker', 
     'login_tracker',
     'InputSanitizer',
-    'SecurityHeadersMiddleware',
-    'RateLimitMiddleware',
-    'RequestValidationMiddleware',
+    'SECURITY_HEADERS',
+    'response_security_headers',
+    'get_client_ip',
+    'RATE_LIMITS',
+    'check_rate_limit',
+    'check_request_validation',
     'SecurityAuditLogger',
     'PasswordValidator',
     'SessionManager',
@@ -0,0 +1,101 @@
+"""
+Security Pipeline Middleware
+One raw-ASGI middleware that runs every request-level security policy in a
+single pass:
+
+1. Kill switch (503 while the system is frozen, except PE Desk)
+2. Bot / attack protection (bots, suspicious UAs, traversal, enumeration,
+   command injection, file inclusion, SSRF)
+3. Request validation (Content-Length limits, SQL injection / XSS in query)
+4. Rate limiting (blocked IPs, per IP+path windows)
+5. Security headers on every response, and no-cache headers unless the route
+   chose its own Cache-Control
+
+The order is the order the separate BaseHTTPMiddleware layers used to run in.
+Unlike BaseHTTPMiddleware, nothing here wraps the response body: only the
+http.response.start message is touched, so streaming responses (GridFS
+downloads, exports) pass through chunk by chunk. Non-HTTP scopes (websocket,
+lifespan) are passed straight to the app.
+"""
+from typing import List, Tuple
+
+from starlette.datastructures import URL, Headers, MutableHeaders, QueryParams
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from middleware.bot_protection import check_bot_protection
+from middleware.kill_switch import check_kill_switch
+from middleware.security import (
+    check_rate_limit,
+    check_request_validation,
+    get_client_ip,
+    response_security_headers,
+)
+
+CACHE_HEADERS = {"cache-control", "pragma", "expires"}
+
+
+class SecurityPipelineMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        extra_headers = list(response_security_headers(path).items())
+
+        async def send_with_headers(message: Message):
+            if message["type"] == "http.response.start":
+                _apply_headers(message, extra_headers)
+            await send(message)
+
+        response = await self._check(scope, path)
+        if response is not None:
+            await response(scope, receive, send_with_headers)
+            return
+
+        await self.app(scope, receive, send_with_headers)
+
+    async def _check(self, scope: Scope, path: str):
+        headers = Headers(scope=scope)
+        authorization = headers.get("authorization", "")
+
+        response = await check_kill_switch(path, authorization)
+        if response is not None:
+            return response
+
+        client_ip = get_client_ip(headers, scope.get("client"))
+        query_params = QueryParams(scope.get("query_string", b""))
+        response = await check_bot_protection(
+            path=path,
+            full_url=str(URL(scope=scope)),
+            query_string=str(query_params) if query_params else "",
+            client_ip=client_ip,
+            user_agent=headers.get("user-agent", ""),
+            authorization=authorization,
+        )
+        if response is not None:
+            return response
+
+        response = check_request_validation(path, headers.get("content-length"), query_params)
+        if response is not None:
+            return response
+
+        return check_rate_limit(client_ip, path)
+
+
+def _apply_headers(message: Message, extra_headers: List[Tuple[str, str]]):
+    message.setdefault("headers", [])
+    headers = MutableHeaders(scope=message)
+    # A route that set its own Cache-Control (e.g. immutable files served with
+    # an ETag) keeps it, without the no-cache Pragma/Expires
+    route_caching = "cache-control" in headers
+    for name, value in extra_headers:
+        if route_caching and name.lower() in CACHE_HEADERS:
+            continue
+        headers[name] = value
+    # Remove server identification
+    if "server" in headers:
+        del headers["server"]
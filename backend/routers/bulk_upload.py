@@ -12,10 +12,14 @@ import io
 
 from database import db
 from routers.auth import get_current_user
+from services.dashboard_rollups import refresh_booking_rollups, refresh_purchase_rollups
+from services.search_index import refresh_search_index
+from services.inventory_service import apply_purchase
 from services.permission_service import (
     require_permission,
     is_pe_desk
 )
+from utils.dates import with_native_dates
 
 router = APIRouter(prefix="/bulk-upload", tags=["Bulk Upload"])
 
@@ -225,7 +229,8 @@ async def bulk_upload_clients(
                 "created_by_role": current_user.get("role", 1)
             }
             
-            await db.clients.insert_one(client_doc)
+            await db.clients.insert_one(with_native_dates("clients", client_doc))
+            await refresh_search_index("clients", [client_doc["id"]])
             results["added"] += 1
             
         except Exception as e:
@@ -301,7 +306,8 @@ async def bulk_upload_vendors(
                 "created_by_role": current_user.get("role", 1)
             }
             
-            await db.clients.insert_one(vendor_doc)
+            await db.clients.insert_one(with_native_dates("clients", vendor_doc))
+            await refresh_search_index("clients", [vendor_doc["id"]])
             results["added"] += 1
             
         except Exception as e:
@@ -376,6 +382,7 @@ async def bulk_upload_stocks(
             }
             
             await db.stocks.insert_one(stock_doc)
+            await refresh_search_index("stocks", [stock_doc["id"]])
             results["added"] += 1
             
         except Exception as e:
@@ -455,36 +462,10 @@ async def bulk_upload_purchases(
                 "payment_status": "pending"
             }
             
-            await db.purchases.insert_one(purchase_doc)
-            
-            # Update inventory
-            existing_inv = await db.inventory.find_one({"stock_id": stock["id"]})
-            if existing_inv:
-                new_qty = existing_inv["available_quantity"] + qty
-                old_value = existing_inv["available_quantity"] * existing_inv["weighted_avg_price"]
-                new_value = old_value + total
-                new_avg = new_value / new_qty if new_qty > 0 else 0
-                
-                await db.inventory.update_one(
-                    {"stock_id": stock["id"]},
-                    {"$set": {
-                        "available_quantity": new_qty,
-                        "weighted_avg_price": new_avg,
-                        "total_value": new_qty * new_avg
-                    }}
-                )
-            else:
-                inv_doc = {
-                    "id": str(uuid.uuid4()),
-                    "stock_id": stock["id"],
-                    "stock_symbol": stock["symbol"],
-                    "stock_name": stock["name"],
-                    "available_quantity": qty,
-                    "blocked_quantity": 0,
-                    "weighted_avg_price": price,
-                    "total_value": total
-                }
-                await db.inventory.insert_one(inv_doc)
+            # Add to the inventory ledger, then persist the purchase
+            await apply_purchase(purchase_doc)
+            await db.purchases.insert_one(with_native_dates("purchases", purchase_doc))
+            await refresh_purchase_rollups(purchase_doc["id"])
             
             results["added"] += 1
             
@@ -573,7 +554,9 @@ async def bulk_upload_bookings(
                 "payment_completed": False
             }
             
-            await db.bookings.insert_one(booking_doc)
+            await db.bookings.insert_one(with_native_dates("bookings", booking_doc))
+            await refresh_booking_rollups(booking_doc["id"])
+            await refresh_search_index("bookings", [booking_doc["id"]])
             results["added"] += 1
             
         except Exception as e:
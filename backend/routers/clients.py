@@ -3,12 +3,12 @@ Clients Router
 
 Handles all client and vendor management operations.
 """
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form, Query
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form, Query, Request, Response
 from fastapi.responses import FileResponse
 from typing import List, Optional
 from datetime import datetime, timezone
+import asyncio
 import uuid
-import os
 import aiofiles
 from pathlib import Path
 
@@ -28,9 +28,14 @@ from services.permission_service import (
 from services.notification_service import notify_roles, create_notification
 from services.audit_service import create_audit_log
 from services.email_service import send_email, get_email_template
-from services.ocr_service import process_document_ocr
+from services.ocr_service import ocr_document_bytes
 from services.file_storage import upload_file_to_gridfs, get_file_url
+from services.batch_loader import BatchLoader, get_batch_loader
+from services.export_engine import ExportSheet, cursor_batches, stream_export, submit_export_job
+from services.search_index import and_search, refresh_search_index, search_condition
+from utils.dates import with_native_dates
 from utils.demo_isolation import add_demo_filter, mark_as_demo, require_demo_access
+from utils.pagination import keyset_query, keyset_sort, ndjson_response, set_next_cursor, wants_ndjson
 from middleware.license_enforcement import license_enforcer
 
 router = APIRouter(tags=["Clients"])
@@ -183,7 +188,8 @@ async def create_client(
     # Mark as demo data if created by demo user
     client_doc = mark_as_demo(client_doc, current_user)
     
-    await db.clients.insert_one(client_doc)
+    await db.clients.insert_one(with_native_dates("clients", client_doc))
+    await refresh_search_index("clients", [client_doc["id"]])
     
     # Create audit log
     await create_audit_log(
@@ -250,14 +256,25 @@ SMIFS Private Equity Team"""
 
 @router.get("/clients", response_model=List[Client])
 async def get_clients(
+    request: Request,
+    response: Response,
     search: Optional[str] = None,
     is_vendor: Optional[bool] = None,
     pending_approval: Optional[bool] = None,
     include_unmapped: Optional[bool] = False,
+    cursor: Optional[str] = None,
+    limit: int = Query(10000, ge=1, le=10000),
+    format: Optional[str] = Query(None, description="ndjson to stream all rows as newline-delimited JSON"),
     current_user: dict = Depends(get_current_user),
     _: None = Depends(require_permission("clients.view", "view clients"))
 ):
-    """Get all clients with optional filters based on hierarchy."""
+    """Get all clients with optional filters based on hierarchy.
+    
+    Args:
+        cursor: Continuation token from the X-Next-Cursor header of the previous page
+        limit: Maximum number of records to return
+        format: "ndjson" (or Accept: application/x-ndjson) streams every matching client
+    """
     from services.hierarchy_service import get_team_user_ids
     
     query = {}
@@ -323,45 +340,44 @@ async def get_clients(
     
     # Search filter
     if search:
-        search_regex = {"$regex": search, "$options": "i"}
-        search_conditions = [
-            {"name": search_regex},
-            {"pan_number": search_regex},
-            {"email": search_regex},
-            {"phone": search_regex}
-        ]
-        if "$or" in query:
-            # Combine with existing $or using $and
-            query = {"$and": [{"$or": query["$or"]}, {"$or": search_conditions}]}
-        else:
-            query["$or"] = search_conditions
+        # Combined with the visibility filter using $and
+        query = and_search(query, await search_condition(
+            "clients", search, ["name", "pan_number", "email", "phone"]
+        ))
     
     # CRITICAL: Add demo data isolation filter
     # Demo users only see demo data, live users don't see demo data
     query = add_demo_filter(query, current_user)
     
-    clients = await db.clients.find(query, {"_id": 0}).sort("created_at", -1).to_list(10000)
+    query = keyset_query(query, cursor)
     
     # Add can_book field to each client
     # PE Level and Partners Desk can book for any client they can see
     # Others can only book for clients mapped to them OR created by them
-    result = []
-    for c in clients:
-        client_data = dict(c)
-        if is_pe_level(user_role) or is_partners_desk:
-            # PE Level and Partners Desk can book for any client they can see
-            client_data["can_book"] = True
-        else:
-            # User can book if:
-            # 1. Client is mapped to them
-            # 2. OR they created the client (and it's approved)
-            mapped_to_user = c.get("mapped_employee_id") == user_id
-            created_by_user = c.get("created_by") == user_id
-            is_approved = c.get("approval_status") == "approved"
-            client_data["can_book"] = mapped_to_user or (created_by_user and is_approved)
-        result.append(Client(**client_data))
-    
-    return result
+    async def to_rows(clients: List[dict]) -> List[Client]:
+        result = []
+        for c in clients:
+            client_data = dict(c)
+            if is_pe_level(user_role) or is_partners_desk:
+                # PE Level and Partners Desk can book for any client they can see
+                client_data["can_book"] = True
+            else:
+                # User can book if:
+                # 1. Client is mapped to them
+                # 2. OR they created the client (and it's approved)
+                mapped_to_user = c.get("mapped_employee_id") == user_id
+                created_by_user = c.get("created_by") == user_id
+                is_approved = c.get("approval_status") == "approved"
+                client_data["can_book"] = mapped_to_user or (created_by_user and is_approved)
+            result.append(Client(**client_data))
+        return result
+    
+    if wants_ndjson(request, format):
+        return ndjson_response(db.clients.find(query, {"_id": 0}).sort(keyset_sort()), to_rows)
+    
+    clients = await db.clients.find(query, {"_id": 0}).sort(keyset_sort()).limit(limit).to_list(limit)
+    set_next_cursor(response, clients, limit)
+    return await to_rows(clients)
 
 
 @router.get("/clients/pending-approval", response_model=List[Client])
@@ -412,13 +428,9 @@ async def get_clients_by_module(
     
     # Add search filter
     if search:
-        query["$and"] = query.get("$and", []) + [{
-            "$or": [
-                {"name": {"$regex": search, "$options": "i"}},
-                {"pan_number": {"$regex": search, "$options": "i"}},
-                {"otc_ucc": {"$regex": search, "$options": "i"}}
-            ]
-        }]
+        query["$and"] = query.get("$and", []) + [
+            await search_condition("clients", search, ["name", "pan_number", "otc_ucc"])
+        ]
     
     # Add demo isolation filter
     query = add_demo_filter(query, current_user)
@@ -476,6 +488,7 @@ async def update_client(
     }
     
     await db.clients.update_one({"id": client_id}, {"$set": update_data})
+    await refresh_search_index("clients", [client_id])
     
     updated = await db.clients.find_one({"id": client_id}, {"_id": 0})
     return Client(**updated)
@@ -852,7 +865,7 @@ async def create_client_with_documents(
             if not file_id:
                 raise Exception(f"Failed to store {doc_type} in GridFS")
             
-            # Save locally for OCR processing
+            # Keep a local copy alongside the GridFS original
             client_dir = UPLOAD_DIR / client_id
             client_dir.mkdir(exist_ok=True)
             file_path = client_dir / filename
@@ -860,8 +873,8 @@ async def create_client_with_documents(
             async with aiofiles.open(file_path, 'wb') as f:
                 await f.write(content)
             
-            # Process OCR
-            ocr_data = await process_document_ocr(str(file_path), doc_type)
+            # Process OCR (cached by file hash)
+            ocr_data = await ocr_document_bytes(content, doc_type, file_ext)
             
             return {
                 "doc_type": doc_type,
@@ -878,20 +891,11 @@ async def create_client_with_documents(
             upload_errors.append(f"{doc_type}: {str(e)}")
             return None
     
-    # Upload mandatory documents
-    pan_doc = await upload_doc_to_gridfs(pan_card, "pan_card")
-    if pan_doc:
-        documents.append(pan_doc)
-    
-    cml_doc = await upload_doc_to_gridfs(cml_copy, "cml_copy")
-    if cml_doc:
-        documents.append(cml_doc)
-    
-    # Upload optional cancelled cheque
+    # Upload mandatory documents (plus the optional cancelled cheque) and OCR them concurrently
+    uploads = [upload_doc_to_gridfs(pan_card, "pan_card"), upload_doc_to_gridfs(cml_copy, "cml_copy")]
     if cancelled_cheque and cancelled_cheque.filename:
-        cheque_doc = await upload_doc_to_gridfs(cancelled_cheque, "cancelled_cheque")
-        if cheque_doc:
-            documents.append(cheque_doc)
+        uploads.append(upload_doc_to_gridfs(cancelled_cheque, "cancelled_cheque"))
+    documents.extend(doc for doc in await asyncio.gather(*uploads) if doc)
     
     # STEP 2: Verify all mandatory documents were uploaded
     doc_types_uploaded = [d["doc_type"] for d in documents]
@@ -987,7 +991,8 @@ async def create_client_with_documents(
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     
-    await db.clients.insert_one(client_doc)
+    await db.clients.insert_one(with_native_dates("clients", client_doc))
+    await refresh_search_index("clients", [client_doc["id"]])
     
     # Create audit log
     await create_audit_log(
@@ -1061,7 +1066,7 @@ async def upload_client_document(
         }
     )
     
-    # Also save locally for OCR processing (temporary)
+    # Also keep a local copy (may not persist)
     client_dir = UPLOAD_DIR / client_id
     client_dir.mkdir(exist_ok=True)
     file_path = client_dir / filename
@@ -1069,8 +1074,8 @@ async def upload_client_document(
     async with aiofiles.open(file_path, 'wb') as f:
         await f.write(content)
     
-    # Process OCR
-    ocr_data = await process_document_ocr(str(file_path), doc_type)
+    # Process OCR (cached by file hash)
+    ocr_data = await ocr_document_bytes(content, doc_type, file_ext)
     
     # Update client document record with GridFS file_id
     doc_record = {
@@ -1189,12 +1194,12 @@ async def upload_bank_proof(
 async def download_client_document(
     client_id: str,
     filename: str,
+    request: Request,
     current_user: dict = Depends(get_current_user),
     _: None = Depends(require_permission("clients.view_docs", "download client documents"))
 ):
     """Download a client document from GridFS or local storage."""
-    from fastapi.responses import Response
-    from services.file_storage import download_file_from_gridfs
+    from services.file_streaming import gridfs_file_response
     
     # Get client to find document
     client = await db.clients.find_one({"id": client_id}, {"_id": 0})
@@ -1215,16 +1220,12 @@ async def download_client_document(
     gridfs_id = document.get("file_id") or document.get("gridfs_id")
     if gridfs_id and gridfs_id not in ["None", "null", ""]:
         try:
-            content, metadata = await download_file_from_gridfs(gridfs_id)
-            content_type = metadata.get("content_type", "application/octet-stream")
             original_filename = document.get("original_filename") or document.get("filename", filename)
-            
-            return Response(
-                content=content,
-                media_type=content_type,
-                headers={
-                    "Content-Disposition": f'attachment; filename="{original_filename}"',
-                }
+            return await gridfs_file_response(
+                gridfs_id,
+                request,
+                disposition="attachment",
+                filename=original_filename
             )
         except Exception as e:
             # GridFS failed, try local file
@@ -1282,25 +1283,9 @@ async def ocr_preview(
     current_user: dict = Depends(get_current_user)
 ):
     """Process OCR on a document without saving - for auto-fill preview."""
-    import uuid as uuid_module
-    
-    temp_dir = UPLOAD_DIR / "temp"
-    temp_dir.mkdir(exist_ok=True)
-    
-    file_ext = Path(file.filename).suffix
-    temp_filename = f"temp_{uuid_module.uuid4()}{file_ext}"
-    temp_path = temp_dir / temp_filename
-    
-    try:
-        async with aiofiles.open(temp_path, 'wb') as f:
-            content = await file.read()
-            await f.write(content)
-        
-        ocr_data = await process_document_ocr(str(temp_path), doc_type)
-        return ocr_data
-    finally:
-        if temp_path.exists():
-            temp_path.unlink()
+    content = await file.read()
+    # The cached result is reused when the same file is then uploaded with the client
+    return await ocr_document_bytes(content, doc_type, Path(file.filename).suffix)
 
 
 @router.post("/clients/{client_id}/rerun-ocr")
@@ -1360,72 +1345,67 @@ async def rerun_client_ocr(
         "errors": []
     }
     
-    import tempfile
-    
-    for doc in target_docs:
+    async def rerun(doc: dict):
+        """Fetch one document from GridFS and OCR it afresh (bypassing the result cache)."""
         doc_type = doc.get("doc_type")
         file_id = doc.get("file_id")
-        old_ocr = doc.get("ocr_data", {})
-        
         if not file_id:
-            results["errors"].append(f"No file_id found for {doc_type}")
-            continue
+            return None, f"No file_id found for {doc_type}"
         
         try:
             # Retrieve file from GridFS
             file_result = await get_file_from_gridfs(file_id)
             if not file_result:
-                results["errors"].append(f"Could not retrieve file for {doc_type} from storage")
-                continue
+                return None, f"Could not retrieve file for {doc_type} from storage"
             
             # Extract actual content bytes from the result dict
             file_content = file_result.get("content") if isinstance(file_result, dict) else file_result
             if not file_content:
-                results["errors"].append(f"No content found in file for {doc_type}")
-                continue
+                return None, f"No content found in file for {doc_type}"
             
-            # Save to temp file for OCR processing
             file_ext = doc.get("filename", "file.jpg").split(".")[-1] or "jpg"
-            with tempfile.NamedTemporaryFile(delete=False, suffix=f".{file_ext}") as tmp:
-                tmp.write(file_content)
-                tmp_path = tmp.name
-            
-            try:
-                # Run OCR
-                new_ocr = await process_document_ocr(tmp_path, doc_type)
-                
-                # Store comparison
-                results["old_vs_new"][doc_type] = {
-                    "old_data": old_ocr.get("extracted_data", {}) if isinstance(old_ocr, dict) else {},
-                    "new_data": new_ocr.get("extracted_data", {}),
-                    "old_confidence": old_ocr.get("confidence", 0) if isinstance(old_ocr, dict) else 0,
-                    "new_confidence": new_ocr.get("confidence", 0)
-                }
-                
-                results["documents_processed"].append({
-                    "doc_type": doc_type,
-                    "old_confidence": old_ocr.get("confidence", 0) if isinstance(old_ocr, dict) else 0,
-                    "new_confidence": new_ocr.get("confidence", 0),
-                    "status": new_ocr.get("status", "unknown")
-                })
-                
-                # Update document OCR data in database
-                await db.clients.update_one(
-                    {"id": client_id, "documents.doc_type": doc_type},
-                    {
-                        "$set": {
-                            "documents.$.ocr_data": new_ocr,
-                            "documents.$.ocr_rerun_at": datetime.now(timezone.utc).isoformat(),
-                            "documents.$.ocr_rerun_by": current_user.get("id")
-                        }
+            return await ocr_document_bytes(file_content, doc_type, file_ext, use_cache=False), None
+        except Exception as e:
+            return None, f"Error processing {doc_type}: {str(e)}"
+    
+    # Documents are OCR'd concurrently (bounded by the OCR pipeline)
+    outcomes = await asyncio.gather(*[rerun(doc) for doc in target_docs])
+    
+    for doc, (new_ocr, error) in zip(target_docs, outcomes):
+        doc_type = doc.get("doc_type")
+        old_ocr = doc.get("ocr_data", {})
+        
+        if error:
+            results["errors"].append(error)
+            continue
+        
+        # Store comparison
+        results["old_vs_new"][doc_type] = {
+            "old_data": old_ocr.get("extracted_data", {}) if isinstance(old_ocr, dict) else {},
+            "new_data": new_ocr.get("extracted_data", {}),
+            "old_confidence": old_ocr.get("confidence", 0) if isinstance(old_ocr, dict) else 0,
+            "new_confidence": new_ocr.get("confidence", 0)
+        }
+        
+        results["documents_processed"].append({
+            "doc_type": doc_type,
+            "old_confidence": old_ocr.get("confidence", 0) if isinstance(old_ocr, dict) else 0,
+            "new_confidence": new_ocr.get("confidence", 0),
+            "status": new_ocr.get("status", "unknown")
+        })
+        
+        # Update document OCR data in database
+        try:
+            await db.clients.update_one(
+                {"id": client_id, "documents.doc_type": doc_type},
+                {
+                    "$set": {
+                        "documents.$.ocr_data": new_ocr,
+                        "documents.$.ocr_rerun_at": datetime.now(timezone.utc).isoformat(),
+                        "documents.$.ocr_rerun_by": current_user.get("id")
                     }
-                )
-                
-            finally:
-                # Clean up temp file
-                if os.path.exists(tmp_path):
-                    os.unlink(tmp_path)
-                    
+                }
+            )
         except Exception as e:
             results["errors"].append(f"Error processing {doc_type}: {str(e)}")
     
@@ -1497,6 +1477,7 @@ async def rerun_client_ocr(
                 {"id": client_id},
                 {"$set": updates}
             )
+            await refresh_search_index("clients", [client_id])
             results["update_applied"] = True
             results["fields_updated"] = list(updates.keys())
     
@@ -1884,7 +1865,8 @@ async def clone_client_vendor(
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     
-    await db.clients.insert_one(cloned_doc)
+    await db.clients.insert_one(with_native_dates("clients", cloned_doc))
+    await refresh_search_index("clients", [new_id])
     await create_audit_log(
         action="CLIENT_CREATE",
         entity_type=target_type,
@@ -2030,46 +2012,41 @@ async def export_clients(
     format: str = Query("xlsx", enum=["xlsx", "csv"]),
     is_vendor: bool = Query(False),
     approval_status: Optional[str] = Query(None),
+    background: bool = Query(False),
     current_user: dict = Depends(get_current_user),
+    loader: BatchLoader = Depends(get_batch_loader),
     _: None = Depends(require_permission("clients.view", "export clients"))
 ):
-    """Export clients to Excel or CSV"""
-    import io
-    from fastapi.responses import StreamingResponse
-    
+    """Export clients to Excel or CSV (streamed; background=true runs it as a job)"""
     # Build query
     query = {"is_vendor": is_vendor}
     if approval_status:
         query["approval_status"] = approval_status
     
-    # Get clients
-    clients_data = await db.clients.find(query, {"_id": 0}).sort("name", 1).to_list(10000)
-    
-    # Get mapped employees for lookup
-    users = {u["id"]: u for u in await db.users.find({}, {"_id": 0, "id": 1, "name": 1, "email": 1}).to_list(10000)}
-    
-    if format == "csv":
-        import csv
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Headers
-        headers = [
+    sheet = ExportSheet(
+        title="Vendors" if is_vendor else "Clients",
+        headers=[
             "OTC UCC", "Name", "PAN Number", "DP ID", "DP Type",
             "Email", "Phone", "Address", "PIN Code",
             "Approval Status", "Is Active", "Mapped To",
             "Bank Account", "IFSC Code", "Bank Name",
             "Created At", "Notes"
-        ]
-        writer.writerow(headers)
+        ],
+        header_fill="10B981",
+        column_widths=[14, 30, 14, 20, 10, 30, 15, 50, 10, 16, 10, 22, 20, 14, 25, 34, 40]
+    )
+    
+    async def to_rows(clients_data: List[dict]) -> List[list]:
+        # Mapped employees are resolved per batch
+        users = await loader.load_many("users", [c.get("mapped_employee_id") for c in clients_data], projection={"name": 1})
         
-        # Data rows
+        rows = []
         for client in clients_data:
             mapped_employee = users.get(client.get("mapped_employee_id"), {})
             bank_accounts = client.get("bank_accounts", [])
             primary_bank = bank_accounts[0] if bank_accounts else {}
             
-            row = [
+            rows.append([
                 client.get("otc_ucc", ""),
                 client.get("name", ""),
                 client.get("pan_number", ""),
@@ -2087,91 +2064,12 @@ async def export_clients(
                 primary_bank.get("bank_name", ""),
                 client.get("created_at", ""),
                 client.get("notes", "")
-            ]
-            writer.writerow(row)
-        
-        output.seek(0)
-        return StreamingResponse(
-            iter([output.getvalue()]),
-            media_type="text/csv",
-            headers={"Content-Disposition": "attachment; filename=clients_export.csv"}
-        )
+            ])
+        return rows
     
-    else:  # xlsx
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, Alignment, PatternFill
-        
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Vendors" if is_vendor else "Clients"
-        
-        # Headers
-        headers = [
-            "OTC UCC", "Name", "PAN Number", "DP ID", "DP Type",
-            "Email", "Phone", "Address", "PIN Code",
-            "Approval Status", "Is Active", "Mapped To",
-            "Bank Account", "IFSC Code", "Bank Name",
-            "Created At", "Notes"
-        ]
-        
-        # Style headers
-        header_fill = PatternFill(start_color="10B981", end_color="10B981", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF")
-        
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal="center")
-        
-        # Data rows
-        for row_num, client in enumerate(clients_data, 2):
-            mapped_employee = users.get(client.get("mapped_employee_id"), {})
-            bank_accounts = client.get("bank_accounts", [])
-            primary_bank = bank_accounts[0] if bank_accounts else {}
-            
-            data = [
-                client.get("otc_ucc", ""),
-                client.get("name", ""),
-                client.get("pan_number", ""),
-                client.get("dp_id", ""),
-                client.get("dp_type", ""),
-                client.get("email", ""),
-                client.get("phone", client.get("mobile", "")),
-                client.get("address", ""),
-                client.get("pin_code", ""),
-                client.get("approval_status", ""),
-                "Yes" if client.get("is_active") else "No",
-                mapped_employee.get("name", ""),
-                primary_bank.get("account_number", ""),
-                primary_bank.get("ifsc_code", ""),
-                primary_bank.get("bank_name", ""),
-                client.get("created_at", ""),
-                client.get("notes", "")
-            ]
-            
-            for col, value in enumerate(data, 1):
-                ws.cell(row=row_num, column=col, value=value)
-        
-        # Adjust column widths
-        for col in ws.columns:
-            max_length = 0
-            column = col[0].column_letter
-            for cell in col:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column].width = adjusted_width
-        
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        return StreamingResponse(
-            iter([output.getvalue()]),
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": "attachment; filename=clients_export.xlsx"}
-        )
+    filename = f"clients_export.{format}"
+    batches = cursor_batches(db.clients.find(query, {"_id": 0}).sort("name", 1), to_rows)
+    
+    if background:
+        return await submit_export_job("clients", sheet, batches, format, filename, current_user)
+    return stream_export(sheet, batches, format, filename)
@@ -14,6 +14,8 @@ from utils.auth import get_current_user
 from services.audit_service import create_audit_log
 from services.file_storage import upload_file_to_gridfs, get_file_url
 from services.permission_service import require_permission
+from services.auth_cache import invalidate_user
+from services.settings_cache import invalidate_setting
 
 router = APIRouter(prefix="/company-master", tags=["Company Master"])
 
@@ -272,6 +274,7 @@ By clicking "I Agree", you confirm that you have read, understood, and agree to
             "updated_by": current_user["name"]
         }
         await db.company_master.insert_one(master)
+        invalidate_setting("company")
     
     return CompanyMasterResponse(
         id=master.get("id", "company_settings"),
@@ -506,6 +509,7 @@ async def update_company_master(
         {"$set": update_data},
         upsert=True
     )
+    invalidate_setting("company")
     
     # Create audit log
     await create_audit_log(
@@ -596,6 +600,7 @@ async def upload_company_document(
         },
         upsert=True
     )
+    invalidate_setting("company")
     
     # Create audit log
     await create_audit_log(
@@ -680,6 +685,7 @@ async def upload_company_logo(
         },
         upsert=True
     )
+    invalidate_setting("company")
     
     # Create audit log
     await create_audit_log(
@@ -734,6 +740,7 @@ async def delete_company_logo(
             }
         }
     )
+    invalidate_setting("company")
     
     # Create audit log
     await create_audit_log(
@@ -792,6 +799,7 @@ async def delete_company_document(
             }
         }
     )
+    invalidate_setting("company")
     
     # Create audit log
     await create_audit_log(
@@ -823,6 +831,7 @@ async def accept_user_agreement(current_user: dict = Depends(get_current_user)):
             }
         }
     )
+    invalidate_user(current_user["id"])
     
     # Create audit log
     await create_audit_log(
@@ -853,6 +862,7 @@ async def decline_user_agreement(current_user: dict = Depends(get_current_user))
             }
         }
     )
+    invalidate_user(current_user["id"])
     
     # Create audit log
     await create_audit_log(
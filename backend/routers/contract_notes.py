@@ -4,11 +4,10 @@ Handles confirmation note generation and management
 Generated after DP transfer and sent to clients
 """
 import os
-import io
 import logging
 from typing import Optional
 from datetime import datetime, timezone
-from fastapi import APIRouter, HTTPException, Depends, Query, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Depends, Query, BackgroundTasks, Request
 from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
 
@@ -19,9 +18,13 @@ from utils.auth import get_current_user
 from services.audit_service import create_audit_log
 from services.contract_note_service import (
     generate_contract_note_pdf,
-    create_and_save_contract_note
+    create_and_save_contract_note,
+    generate_missing_contract_notes as generate_missing_notes,
+    submit_contract_note_job,
+    get_contract_note_job
 )
 from services.email_service import send_email
+from services.settings_cache import get_setting
 from services.file_storage import upload_file_to_gridfs, get_file_url
 from services.permission_service import (
     require_permission,
@@ -205,7 +208,8 @@ async def generate_contract_note(
         cn_doc = await create_and_save_contract_note(
             booking_id=booking_id,
             user_id=current_user["id"],
-            user_name=current_user["name"]
+            user_name=current_user["name"],
+            booking=booking
         )
         
         # Create audit log
@@ -237,6 +241,7 @@ async def generate_contract_note(
 
 @router.post("/generate-missing")
 async def generate_missing_contract_notes(
+    background: bool = Query(False),
     current_user: dict = Depends(get_current_user),
     _: None = Depends(require_permission("contract_notes.generate", "generate missing confirmation notes"))
 ):
@@ -245,77 +250,69 @@ async def generate_missing_contract_notes(
     - Have DP transfer complete (stock_transferred=True or dp_status=transferred)
     - Do not have a contract note yet
     
-    Useful for backfilling missing contract notes
+    Useful for backfilling missing contract notes. Notes are rendered in
+    parallel; with background=true the run is started as a job whose progress
+    can be polled at /contract-notes/jobs/{job_id}.
     """
-    # Find bookings with completed DP transfer but no contract note
-    transferred_bookings = await db.bookings.find({
-        "$or": [
-            {"stock_transferred": True},
-            {"dp_status": "transferred"}
-        ]
-    }, {"_id": 0, "id": 1, "booking_number": 1}).to_list(10000)
-    
-    results = {
-        "total_transferred": len(transferred_bookings),
-        "already_have_cn": 0,
-        "generated": 0,
-        "failed": 0,
-        "errors": []
-    }
-    
-    for booking in transferred_bookings:
-        booking_id = booking.get("id")
-        
-        # Check if contract note exists
-        existing = await db.contract_notes.find_one({"booking_id": booking_id}, {"_id": 0, "contract_note_number": 1})
-        if existing:
-            results["already_have_cn"] += 1
-            continue
+    async def run(progress=None) -> dict:
+        results = await generate_missing_notes(
+            user_id=current_user["id"],
+            user_name=current_user["name"],
+            progress=progress
+        )
         
-        # Generate contract note
-        try:
-            cn_doc = await create_and_save_contract_note(
-                booking_id=booking_id,
-                user_id=current_user["id"],
-                user_name=current_user["name"]
-            )
-            results["generated"] += 1
-            logger.info(f"Generated missing CN {cn_doc.get('contract_note_number')} for booking {booking_id}")
-        except Exception as e:
-            results["failed"] += 1
-            results["errors"].append({
-                "booking_id": booking_id,
-                "booking_number": booking.get("booking_number"),
-                "error": str(e)
-            })
-            logger.error(f"Failed to generate CN for booking {booking_id}: {str(e)}")
-    
-    # Create audit log
-    await create_audit_log(
-        action="MISSING_CONTRACT_NOTES_GENERATED",
-        entity_type="contract_note",
-        entity_id="batch_generation",
-        user_id=current_user["id"],
-        user_name=current_user["name"],
-        user_role=current_user.get("role", 6),
-        entity_name="Batch Generation",
-        details=results
-    )
+        # Create audit log
+        await create_audit_log(
+            action="MISSING_CONTRACT_NOTES_GENERATED",
+            entity_type="contract_note",
+            entity_id="batch_generation",
+            user_id=current_user["id"],
+            user_name=current_user["name"],
+            user_role=current_user.get("role", 6),
+            entity_name="Batch Generation",
+            details={k: v for k, v in results.items() if k != "errors"}
+        )
+        return results
     
+    if background:
+        job = await submit_contract_note_job("generate_missing", run, submitted_by=current_user["id"])
+        return {"message": "Generation of missing confirmation notes started", "job": job}
+    
+    results = await run()
     return {
         "message": f"Generated {results['generated']} missing confirmation notes",
         "results": results
     }
 
 
+@router.get("/jobs/{job_id}")
+async def get_contract_note_job_status(
+    job_id: str,
+    current_user: dict = Depends(get_current_user),
+    _: None = Depends(require_permission("contract_notes.generate", "view confirmation note jobs"))
+):
+    """
+    Poll a batch generation job.
+    
+    Status: queued, running, completed or failed. While running, progress
+    holds the processed/generated/failed counters; completed jobs carry the
+    full results (including errors).
+    """
+    job = await get_contract_note_job(job_id)
+    if not job or job.get("submitted_by") != current_user.get("id"):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
 @router.get("/download/{note_id}")
 async def download_contract_note(
     note_id: str,
+    request: Request,
     current_user: dict = Depends(get_current_user),
     _: None = Depends(require_permission("contract_notes.download", "download contract note"))
 ):
     """Download contract note PDF - tries GridFS first, then local file"""
-    from services.file_storage import download_file_from_gridfs
+    from services.file_streaming import gridfs_file_response
     
     note = await db.contract_notes.find_one({"id": note_id}, {"_id": 0})
     if not note:
@@ -328,11 +325,12 @@ async def download_contract_note(
     file_id = note.get("file_id")
     if file_id:
         try:
-            content, metadata = await download_file_from_gridfs(file_id)
-            return StreamingResponse(
-                io.BytesIO(content),
-                media_type="application/pdf",
-                headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+            return await gridfs_file_response(
+                file_id,
+                request,
+                disposition="attachment",
+                filename=filename,
+                media_type="application/pdf"
             )
         except Exception as e:
             logger.warning(f"GridFS download failed for {file_id}: {e}, trying local file")
@@ -420,7 +418,7 @@ async def send_contract_note_email(
     stock_symbol = stock.get("symbol", "N/A") if stock else "N/A"
     
     # Get company master
-    company = await db.company_master.find_one({"_id": "company_settings"})
+    company = await get_setting("company")
     company_name = company.get("company_name", "SMIFS Capital Markets") if company else "SMIFS Capital Markets"
     
     # Prepare email
@@ -2,6 +2,7 @@
 Dashboard Router
 Handles dashboard stats and overview endpoints
 """
+import asyncio
 from datetime import datetime, timezone, timedelta
 from fastapi import APIRouter, Depends
 import pytz
@@ -14,7 +15,9 @@ from services.permission_service import (
     is_pe_level,
     get_booking_visibility_filter
 )
+from utils.dates import date_range, ist_day_bounds, ist_today
 from utils.demo_isolation import add_demo_filter
+from services.dashboard_rollups import get_rollups, partition_for_user, rebuild_rollups, sum_rollups
 
 # IST timezone
 IST = pytz.timezone('Asia/Kolkata')
@@ -31,61 +34,45 @@ async def get_dashboard_stats(
     user_role = current_user.get("role", 6)
     user_id = current_user.get("id")
     
-    # Base query - PE level sees all, others see only their own
-    base_query = {}
-    if not is_pe_level(user_role):
-        base_query["created_by"] = user_id
-    
-    # CRITICAL: Add demo data isolation filter to all dashboard queries
-    # Demo users only see demo data stats, live users don't see demo data stats
-    demo_filter = add_demo_filter({}, current_user)
+    # Booking/purchase totals come from the rollups - PE level sees the whole
+    # book, others only their own. The demo/live partition keeps demo users on
+    # demo data and live users off it.
+    partition = partition_for_user(current_user)
+    booking_rollup_id = (
+        f"bookings:all:{partition}" if is_pe_level(user_role)
+        else f"bookings:employee:{user_id}:{partition}"
+    )
+    rollups = await get_rollups([booking_rollup_id, f"purchases:all:{partition}"])
+    booking_rollup = rollups[booking_rollup_id]
+    purchase_rollup = rollups[f"purchases:all:{partition}"]
     
     # Count totals with demo isolation
     client_query = add_demo_filter({"is_active": True, "is_vendor": False}, current_user)
     vendor_query = add_demo_filter({"is_active": True, "is_vendor": True}, current_user)
     stock_query = add_demo_filter({"is_active": True}, current_user)
-    booking_base_query = add_demo_filter({**base_query, "status": {"$ne": "cancelled"}}, current_user)
-    booking_open_query = add_demo_filter({**base_query, "status": "open", "is_voided": {"$ne": True}}, current_user)
-    booking_closed_query = add_demo_filter({**base_query, "status": "closed", "is_voided": {"$ne": True}}, current_user)
-    purchase_query = add_demo_filter({}, current_user)
-    
-    total_clients = await db.clients.count_documents(client_query)
-    total_vendors = await db.clients.count_documents(vendor_query)
-    total_stocks = await db.stocks.count_documents(stock_query)
-    total_bookings = await db.bookings.count_documents(booking_base_query)
-    open_bookings = await db.bookings.count_documents(booking_open_query)
-    closed_bookings = await db.bookings.count_documents(booking_closed_query)
-    total_purchases = await db.purchases.count_documents(purchase_query)
-    
-    # Calculate inventory value with demo isolation
     inventory_query = add_demo_filter({}, current_user)
-    inventory_items = await db.inventory.find(inventory_query, {"_id": 0, "total_value": 1}).to_list(10000)
-    total_inventory_value = sum(item.get("total_value", 0) for item in inventory_items)
     
-    # Calculate revenue and profit with demo isolation
-    profit_query = add_demo_filter({**base_query, "status": {"$ne": "cancelled"}, "is_voided": {"$ne": True}}, current_user)
-    bookings = await db.bookings.find(
-        profit_query,
-        {"_id": 0, "quantity": 1, "buying_price": 1, "selling_price": 1}
-    ).to_list(10000)
-    
-    total_profit_loss = 0
-    for booking in bookings:
-        qty = booking.get("quantity", 0)
-        selling = booking.get("selling_price", 0)
-        buying = booking.get("buying_price", 0)
-        total_profit_loss += qty * (selling - buying)
+    total_clients, total_vendors, total_stocks, inventory_value = await asyncio.gather(
+        db.clients.count_documents(client_query),
+        db.clients.count_documents(vendor_query),
+        db.stocks.count_documents(stock_query),
+        db.inventory.aggregate([
+            {"$match": inventory_query},
+            {"$group": {"_id": None, "total": {"$sum": "$total_value"}}}
+        ]).to_list(1)
+    )
+    total_inventory_value = inventory_value[0]["total"] if inventory_value else 0
     
     return DashboardStats(
         total_clients=total_clients,
         total_vendors=total_vendors,
         total_stocks=total_stocks,
-        total_bookings=total_bookings,
-        open_bookings=open_bookings,
-        closed_bookings=closed_bookings,
-        total_profit_loss=total_profit_loss,
+        total_bookings=int(booking_rollup.get("active", 0)),
+        open_bookings=int(booking_rollup.get("open", 0)),
+        closed_bookings=int(booking_rollup.get("closed", 0)),
+        total_profit_loss=round(booking_rollup.get("profit_loss", 0), 2),
         total_inventory_value=total_inventory_value,
-        total_purchases=total_purchases
+        total_purchases=int(purchase_rollup.get("count", 0))
     )
 
 
@@ -139,26 +126,35 @@ async def get_pe_dashboard(
     _: None = Depends(require_permission("dashboard.pe_view", "view PE dashboard"))
 ):
     """Get PE Desk/Manager specific dashboard data"""
-    # Pending approvals
-    pending_bookings = await db.bookings.count_documents({"approval_status": "pending"})
-    pending_loss_approval = await db.bookings.count_documents({"approval_status": "pending_loss_approval"})
-    pending_clients = await db.clients.count_documents({"approval_status": "pending"})
-    pending_rp_approval = await db.referral_partners.count_documents({"approval_status": "pending"})
-    pending_bp_overrides = await db.bookings.count_documents({"bp_override_approval_status": "pending"})
-    
-    # Today's activity
-    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-    today_bookings = await db.bookings.count_documents({"created_at": {"$regex": f"^{today}"}})
-    today_logins = await db.audit_logs.count_documents({
-        "action": "USER_LOGIN",
-        "timestamp": {"$regex": f"^{today}"}
-    })
+    # Booking counters from the rollups (demo and live, as before)
+    today = ist_today().isoformat()
+    rollups = await get_rollups([
+        "bookings:all:live", "bookings:all:demo",
+        f"bookings:day:{today}:live", f"bookings:day:{today}:demo"
+    ])
+    book = [rollups["bookings:all:live"], rollups["bookings:all:demo"]]
+    today_rollups = [rollups[f"bookings:day:{today}:live"], rollups[f"bookings:day:{today}:demo"]]
     
-    # User stats
-    total_users = await db.users.count_documents({"is_active": True})
-    online_users = await db.users.count_documents({
-        "last_activity": {"$gte": (datetime.now(timezone.utc) - timedelta(minutes=15)).isoformat()}
-    })
+    # Pending approvals
+    pending_bookings = int(sum_rollups(book, "by_approval.pending"))
+    pending_loss_approval = int(sum_rollups(book, "by_approval.pending_loss_approval"))
+    pending_bp_overrides = int(sum_rollups(book, "pending_bp_override"))
+    today_bookings = int(sum_rollups(today_rollups, "count"))
+    
+    pending_clients, pending_rp_approval, today_logins, total_users, online_users = await asyncio.gather(
+        db.clients.count_documents({"approval_status": "pending"}),
+        db.referral_partners.count_documents({"approval_status": "pending"}),
+        # Today's activity
+        db.audit_logs.count_documents({
+            "action": "USER_LOGIN",
+            **date_range("timestamp", *ist_day_bounds())
+        }),
+        # User stats
+        db.users.count_documents({"is_active": True}),
+        db.users.count_documents({
+            "last_activity": {"$gte": (datetime.now(timezone.utc) - timedelta(minutes=15)).isoformat()}
+        })
+    )
     
     # Recent pending items
     recent_pending_bookings = await db.bookings.find(
@@ -172,13 +168,7 @@ async def get_pe_dashboard(
     ).sort("created_at", -1).limit(5).to_list(5)
     
     # System health
-    total_bookings_value = 0
-    bookings = await db.bookings.find(
-        {"status": {"$ne": "cancelled"}, "is_voided": {"$ne": True}},
-        {"_id": 0, "quantity": 1, "buying_price": 1}
-    ).to_list(10000)
-    for b in bookings:
-        total_bookings_value += b.get("quantity", 0) * b.get("buying_price", 0)
+    total_bookings_value = round(sum_rollups(book, "buy_value"), 2)
     
     return {
         "pending_actions": {
@@ -210,74 +200,57 @@ async def get_finance_dashboard(
     _: None = Depends(require_permission("finance.view", "view finance dashboard"))
 ):
     """Get Finance specific dashboard data"""
-    
-    # Payment stats from bookings
-    bookings = await db.bookings.find(
-        {"status": {"$ne": "cancelled"}, "is_voided": {"$ne": True}},
-        {"_id": 0, "id": 1, "booking_number": 1, "client_name": 1, "quantity": 1, 
-         "buying_price": 1, "payments": 1, "payment_status": 1, "stock_symbol": 1}
-    ).to_list(10000)
-    
-    total_receivable = 0
-    total_received = 0
-    pending_collections = []
-    recent_payments = []
-    
-    for booking in bookings:
-        booking_value = booking.get("quantity", 0) * booking.get("buying_price", 0)
-        payments = booking.get("payments", [])
-        paid_amount = sum(p.get("amount", 0) for p in payments)
-        
-        total_receivable += booking_value
-        total_received += paid_amount
-        
-        if paid_amount < booking_value:
-            pending_collections.append({
-                "booking_number": booking.get("booking_number"),
-                "client_name": booking.get("client_name"),
-                "stock_symbol": booking.get("stock_symbol"),
-                "total_amount": booking_value,
-                "paid_amount": paid_amount,
-                "pending_amount": booking_value - paid_amount
-            })
-        
-        for payment in payments:
-            recent_payments.append({
-                "booking_number": booking.get("booking_number"),
-                "client_name": booking.get("client_name"),
-                "amount": payment.get("amount", 0),
-                "payment_date": payment.get("payment_date"),
-                "notes": payment.get("notes", "")
-            })
-    
-    # Sort recent payments by date
-    recent_payments.sort(key=lambda x: x.get("payment_date", ""), reverse=True)
-    
-    # Sort pending by amount (highest first)
-    pending_collections.sort(key=lambda x: x.get("pending_amount", 0), reverse=True)
-    
-    # Vendor payments from purchases
-    purchases = await db.purchases.find(
-        {},
-        {"_id": 0, "id": 1, "quantity": 1, "price_per_share": 1, "payments": 1}
-    ).to_list(10000)
-    
-    total_payable = 0
-    total_paid = 0
-    
-    for purchase in purchases:
-        purchase_value = purchase.get("quantity", 0) * purchase.get("price_per_share", 0)
-        payments = purchase.get("payments", [])
-        paid_amount = sum(p.get("amount", 0) for p in payments)
-        
-        total_payable += purchase_value
-        total_paid += paid_amount
+    rollups = await get_rollups([
+        "bookings:all:live", "bookings:all:demo", "purchases:all:live", "purchases:all:demo"
+    ])
+    book = [rollups["bookings:all:live"], rollups["bookings:all:demo"]]
+    purchase_book = [rollups["purchases:all:live"], rollups["purchases:all:demo"]]
+    
+    # Receivables from the booking rollups
+    total_receivable = round(sum_rollups(book, "buy_value"), 2)
+    total_received = round(sum_rollups(book, "received"), 2)
+    
+    live_bookings = {"status": {"$ne": "cancelled"}, "is_voided": {"$ne": True}}
+    
+    # Top outstanding bookings, computed server-side
+    pending_collections = await db.bookings.aggregate([
+        {"$match": live_bookings},
+        {"$project": {
+            "_id": 0,
+            "booking_number": 1,
+            "client_name": 1,
+            "stock_symbol": 1,
+            "total_amount": {"$multiply": [{"$ifNull": ["$quantity", 0]}, {"$ifNull": ["$buying_price", 0]}]},
+            "paid_amount": {"$sum": {"$ifNull": ["$payments.amount", []]}}
+        }},
+        {"$addFields": {"pending_amount": {"$subtract": ["$total_amount", "$paid_amount"]}}},
+        {"$match": {"pending_amount": {"$gt": 0}}},
+        {"$sort": {"pending_amount": -1}},
+        {"$limit": 10}
+    ]).to_list(10)
+    
+    # Most recent payment tranches across bookings
+    recent_payments = await db.bookings.aggregate([
+        {"$match": {**live_bookings, "payments.0": {"$exists": True}}},
+        {"$unwind": "$payments"},
+        {"$project": {
+            "_id": 0,
+            "booking_number": 1,
+            "client_name": 1,
+            "amount": {"$ifNull": ["$payments.amount", 0]},
+            "payment_date": {"$ifNull": ["$payments.payment_date", ""]},
+            "notes": {"$ifNull": ["$payments.notes", ""]}
+        }},
+        {"$sort": {"payment_date": -1}},
+        {"$limit": 10}
+    ]).to_list(10)
+    
+    # Vendor payments from the purchase rollups
+    total_payable = round(sum_rollups(purchase_book, "value"), 2)
+    total_paid = round(sum_rollups(purchase_book, "paid"), 2)
     
     # Refund requests
-    pending_refunds = await db.bookings.count_documents({
-        "refund_request": {"$exists": True},
-        "refund_request.status": "pending"
-    })
+    pending_refunds = int(sum_rollups(book, "pending_refund"))
     
     return {
         "receivables": {
@@ -292,8 +265,8 @@ async def get_finance_dashboard(
             "pending": total_payable - total_paid
         },
         "pending_refunds": pending_refunds,
-        "pending_collections": pending_collections[:10],
-        "recent_payments": recent_payments[:10]
+        "pending_collections": pending_collections,
+        "recent_payments": recent_payments
     }
 
 
@@ -316,7 +289,7 @@ async def get_employee_dashboard(
     
     my_client_ids = [c["id"] for c in my_clients]
     
-    # My bookings (created by me or for my clients)
+    # My bookings (created by me or for my clients) - counted server-side
     my_bookings_query = {
         "$or": [
             {"created_by": user_id},
@@ -326,12 +299,27 @@ async def get_employee_dashboard(
         "is_voided": {"$ne": True}
     }
     
-    my_bookings = await db.bookings.find(
-        my_bookings_query,
-        {"_id": 0, "id": 1, "booking_number": 1, "client_name": 1, "stock_symbol": 1, 
-         "quantity": 1, "buying_price": 1, "selling_price": 1, "status": 1, 
-         "approval_status": 1, "created_at": 1}
-    ).to_list(10000)
+    my_bookings_facets = await db.bookings.aggregate([
+        {"$match": my_bookings_query},
+        {"$facet": {
+            "totals": [{"$group": {
+                "_id": None,
+                "count": {"$sum": 1},
+                "pending": {"$sum": {"$cond": [{"$eq": ["$approval_status", "pending"]}, 1, 0]}},
+                "approved": {"$sum": {"$cond": [{"$eq": ["$approval_status", "approved"]}, 1, 0]}},
+                "value": {"$sum": {"$multiply": [{"$ifNull": ["$quantity", 0]}, {"$ifNull": ["$selling_price", 0]}]}}
+            }}],
+            "recent": [
+                {"$sort": {"created_at": -1}},
+                {"$limit": 5},
+                {"$project": {"_id": 0, "id": 1, "booking_number": 1, "client_name": 1, "stock_symbol": 1,
+                              "quantity": 1, "buying_price": 1, "selling_price": 1, "status": 1,
+                              "approval_status": 1, "created_at": 1}}
+            ]
+        }}
+    ]).to_list(1)
+    my_totals = (my_bookings_facets[0]["totals"] or [{}])[0] if my_bookings_facets else {}
+    recent_bookings = my_bookings_facets[0]["recent"] if my_bookings_facets else []
     
     # Get direct reports if the user is a manager
     direct_reports = await db.users.find(
@@ -341,51 +329,48 @@ async def get_employee_dashboard(
     
     direct_report_ids = [dr["id"] for dr in direct_reports]
     
-    # Get team clients (clients mapped to direct reports)
-    team_clients = []
-    if direct_report_ids:
-        team_clients = await db.clients.find(
-            {"mapped_employee_id": {"$in": direct_report_ids}, "is_active": True, "is_vendor": False},
-            {"_id": 0, "id": 1, "name": 1, "pan_number": 1, "approval_status": 1, "mapped_employee_id": 1, "mapped_employee_name": 1}
-        ).to_list(1000)
-    
-    # Get team bookings (created by direct reports)
-    team_bookings = []
+    # Team clients per direct report, and team bookings from the per-employee rollups
+    team_client_counts = {}
+    team_rollups = {}
     if direct_report_ids:
-        team_bookings = await db.bookings.find(
-            {"created_by": {"$in": direct_report_ids}, "status": {"$ne": "cancelled"}, "is_voided": {"$ne": True}},
-            {"_id": 0, "id": 1, "booking_number": 1, "client_name": 1, "stock_symbol": 1, 
-             "quantity": 1, "selling_price": 1, "approval_status": 1, "created_at": 1, "created_by": 1, "created_by_name": 1}
-        ).to_list(10000)
+        client_counts = await db.clients.aggregate([
+            {"$match": {"mapped_employee_id": {"$in": direct_report_ids}, "is_active": True, "is_vendor": False}},
+            {"$group": {"_id": "$mapped_employee_id", "count": {"$sum": 1}}}
+        ]).to_list(len(direct_report_ids))
+        team_client_counts = {c["_id"]: c["count"] for c in client_counts}
+        
+        rollups = await get_rollups([
+            f"bookings:employee:{report_id}:{partition}"
+            for report_id in direct_report_ids for partition in ("live", "demo")
+        ])
+        team_rollups = {
+            report_id: [rollups[f"bookings:employee:{report_id}:live"], rollups[f"bookings:employee:{report_id}:demo"]]
+            for report_id in direct_report_ids
+        }
     
     # Calculate metrics
-    total_bookings_value = sum(b.get("quantity", 0) * b.get("selling_price", 0) for b in my_bookings)
-    pending_bookings = [b for b in my_bookings if b.get("approval_status") == "pending"]
-    approved_bookings = [b for b in my_bookings if b.get("approval_status") == "approved"]
-    
-    team_bookings_value = sum(b.get("quantity", 0) * b.get("selling_price", 0) for b in team_bookings) if team_bookings else 0
+    total_bookings_value = my_totals.get("value", 0)
     
     # Get pending client approvals for my clients
     pending_clients = [c for c in my_clients if c.get("approval_status") == "pending"]
     
-    # Get recent bookings (last 5)
-    recent_bookings = sorted(my_bookings, key=lambda x: x.get("created_at", ""), reverse=True)[:5]
-    
     # Get team performance summary
     team_performance = []
     for report in direct_reports:
-        report_bookings = [b for b in team_bookings if b.get("created_by") == report["id"]]
-        report_value = sum(b.get("quantity", 0) * b.get("selling_price", 0) for b in report_bookings)
-        report_clients = [c for c in team_clients if c.get("mapped_employee_id") == report["id"]]
+        report_rollups = team_rollups.get(report["id"], [])
         team_performance.append({
             "id": report["id"],
             "name": report["name"],
             "email": report.get("email", ""),
-            "bookings_count": len(report_bookings),
-            "bookings_value": report_value,
-            "clients_count": len(report_clients)
+            "bookings_count": int(sum_rollups(report_rollups, "live")),
+            "bookings_value": round(sum_rollups(report_rollups, "sell_value"), 2),
+            "clients_count": team_client_counts.get(report["id"], 0)
         })
     
+    team_clients_count = sum(team_client_counts.values())
+    team_bookings_count = sum(p["bookings_count"] for p in team_performance)
+    team_bookings_value = sum(p["bookings_value"] for p in team_performance)
+    
     return {
         "user": {
             "id": user_id,
@@ -397,15 +382,15 @@ async def get_employee_dashboard(
         "my_stats": {
             "total_clients": len(my_clients),
             "pending_clients": len(pending_clients),
-            "total_bookings": len(my_bookings),
-            "pending_bookings": len(pending_bookings),
-            "approved_bookings": len(approved_bookings),
+            "total_bookings": my_totals.get("count", 0),
+            "pending_bookings": my_totals.get("pending", 0),
+            "approved_bookings": my_totals.get("approved", 0),
             "total_value": total_bookings_value
         },
         "team_stats": {
             "direct_reports_count": len(direct_reports),
-            "team_clients_count": len(team_clients),
-            "team_bookings_count": len(team_bookings),
+            "team_clients_count": team_clients_count,
+            "team_bookings_count": team_bookings_count,
             "team_value": team_bookings_value
         },
         "my_clients": my_clients[:10],  # Top 10
@@ -424,6 +409,7 @@ async def get_security_status(
 ):
     """Get security status and recent security events (PE Desk only)"""
     from middleware.security import rate_limiter, login_tracker
+    from middleware.bot_protection import threat_db
     
     # Get recent security events from database
     recent_events = await db.security_logs.find(
@@ -432,27 +418,27 @@ async def get_security_status(
     ).sort("timestamp", -1).limit(50).to_list(50)
     
     # Get failed login attempts in last hour
-    one_hour_ago = (datetime.now(timezone.utc) - timedelta(hours=1)).isoformat()
+    one_hour_ago = datetime.now(timezone.utc) - timedelta(hours=1)
     failed_logins_count = await db.security_logs.count_documents({
         "event_type": "LOGIN_FAILED",
-        "timestamp": {"$gte": one_hour_ago}
+        **date_range("timestamp", one_hour_ago)
     })
     
-    # Get blocked IPs
-    blocked_ips = list(rate_limiter.blocked_ips.keys())
+    # Get blocked IPs (rate limiter bans and threat auto-blocks, across all workers)
+    blocked_ips = list({**threat_db.blocked_ips, **rate_limiter.blocked_ips})
     
     # Get locked accounts
     locked_accounts = list(login_tracker.locked_accounts.keys())
     
     # Get login statistics for today
-    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    today = date_range("timestamp", *ist_day_bounds())
     successful_logins_today = await db.security_logs.count_documents({
         "event_type": "LOGIN_SUCCESS",
-        "timestamp": {"$regex": f"^{today}"}
+        **today
     })
     failed_logins_today = await db.security_logs.count_documents({
         "event_type": "LOGIN_FAILED",
-        "timestamp": {"$regex": f"^{today}"}
+        **today
     })
     
     return {
@@ -486,9 +472,11 @@ async def unblock_ip(
 ):
     """Unblock an IP address (requires security.manage_threats permission)"""
     from middleware.security import rate_limiter
+    from middleware.bot_protection import threat_db
     
-    if ip_address in rate_limiter.blocked_ips:
-        del rate_limiter.blocked_ips[ip_address]
+    unblocked = rate_limiter.unblock_ip(ip_address)
+    unblocked = threat_db.auto_blocked.unblock(ip_address) or unblocked
+    if unblocked:
         return {"message": f"IP {ip_address} has been unblocked"}
     
     return {"message": f"IP {ip_address} was not blocked"}
@@ -503,7 +491,7 @@ async def unlock_account(
     """Unlock a locked account (PE Desk only)"""
     from middleware.security import login_tracker
     
-    login_tracker.clear_attempts(email)
+    await login_tracker.clear_attempts(email)
     return {"message": f"Account {email} has been unlocked"}
 
 
@@ -698,6 +686,7 @@ async def clear_system_cache(
     Clear system cache and refresh data (PE Desk only)
     - Recalculates inventory weighted averages
     - Cleans up orphaned records
+    - Rebuilds the dashboard rollups
     - Resets temporary data
     """
     cleanup_results = {
@@ -745,6 +734,9 @@ async def clear_system_cache(
     orphaned_bookings = await db.bookings.count_documents({"client_id": {"$nin": valid_client_ids}})
     cleanup_results["orphaned_bookings_fixed"] = orphaned_bookings
     
+    # 4. Rebuild dashboard rollups from bookings and purchases
+    cleanup_results["dashboard_rollups"] = await rebuild_rollups()
+    
     # Log the cache clear action
     from services.audit_service import create_audit_log
     await create_audit_log(
@@ -8,23 +8,41 @@ from fastapi.responses import StreamingResponse
 from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime, timezone
+import asyncio
 import uuid
 import json
 import os
 import io
 import zipfile
 import shutil
+import tempfile
 import base64
 import logging
 
 from database import db
 from routers.auth import get_current_user
 from services.file_storage import upload_file_to_gridfs, download_file_from_gridfs, get_file_url
+from services.auth_cache import invalidate_all
+from services.dashboard_rollups import rebuild_rollups
+from services.hierarchy_service import check_hierarchy_closure
+from services.search_index import rebuild_search_index
+from services.settings_cache import invalidate_setting
+from services.backup_engine import (
+    BACKUP_STORAGE,
+    INTERNAL_COLLECTIONS,
+    apply_retention,
+    create_streaming_backup,
+    delete_streaming_backup,
+    iter_chunk_documents,
+    restore_streaming_backup,
+    write_collection_json,
+)
 from services.permission_service import (
     require_permission,
     is_pe_level,
     is_pe_desk
 )
+from utils.dates import with_native_dates
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/database", tags=["Database Management"])
@@ -33,6 +51,9 @@ router = APIRouter(prefix="/database", tags=["Database Management"])
 # Upload directory path (for backward compatibility)
 UPLOADS_DIR = "/app/uploads"
 
+# ZIP downloads of chunked backups spill to disk beyond this size
+ZIP_SPOOL_BYTES = 64 * 1024 * 1024
+
 # Collections to backup - comprehensive list
 BACKUP_COLLECTIONS = [
     "users",
@@ -125,61 +146,66 @@ async def create_backup(
     name: str,
     description: Optional[str] = None,
     include_all: bool = False,
+    incremental: bool = False,
+    base_backup_id: Optional[str] = None,
+    storage: Optional[str] = None,
     current_user: dict = Depends(get_current_user),
     _: None = Depends(require_permission("database_backup.create", "create database backups"))
 ):
     """Create a new database backup (requires database_backup.create permission)
     
+    Collections are streamed into compressed chunks (see services.backup_engine),
+    so the backup size is not limited by memory or the 16 MB document limit.
+    
     Args:
         name: Name for the backup
         description: Optional description
         include_all: If True, backup all collections dynamically (recommended)
+        incremental: If True, only store documents changed since the base backup
+        base_backup_id: Base for an incremental backup (defaults to the latest chunked backup)
+        storage: "gridfs" or "disk" (defaults to BACKUP_STORAGE)
     """
-    backup_id = str(uuid.uuid4())
-    backup_data = {}
-    record_counts = {}
-    total_size = 0
+    if storage and storage not in ("gridfs", "disk"):
+        raise HTTPException(status_code=400, detail="storage must be 'gridfs' or 'disk'")
     
     # Determine which collections to backup
     if include_all:
         all_collections = await db.list_collection_names()
-        # Exclude database_backups and fs.chunks (binary data) from backup
-        collections_to_backup = [c for c in all_collections if c not in ["database_backups", "fs.chunks"]]
+        # fs.chunks (binary data) is covered by the ultimate backup
+        collections_to_backup = [c for c in all_collections if c not in INTERNAL_COLLECTIONS and c != "fs.chunks"]
     else:
         collections_to_backup = BACKUP_COLLECTIONS
     
-    # Backup each collection
-    for collection_name in collections_to_backup:
-        try:
-            collection = db[collection_name]
-            documents = await collection.find({}, {"_id": 0}).to_list(100000)
-            backup_data[collection_name] = documents
-            record_counts[collection_name] = len(documents)
-            total_size += len(json.dumps(documents, default=str))
-        except Exception as e:
-            logger.error(f"Error backing up {collection_name}: {str(e)}")
-            backup_data[collection_name] = []
-            record_counts[collection_name] = 0
-    
-    # Store backup
-    backup_doc = {
-        "id": backup_id,
-        "name": name,
-        "description": description,
-        "created_at": datetime.now(timezone.utc).isoformat(),
-        "created_by": current_user["id"],
-        "created_by_name": current_user["name"],
-        "collections": collections_to_backup,
-        "record_counts": record_counts,
-        "size_bytes": total_size,
-        "include_all": include_all,
-        "data": backup_data
-    }
+    if incremental and not base_backup_id:
+        latest = await db.database_backups.find_one(
+            {"format": "chunked", "status": "completed"},
+            {"_id": 0, "id": 1},
+            sort=[("created_at", -1)]
+        )
+        if not latest:
+            raise HTTPException(status_code=400, detail="No completed backup to base an incremental backup on")
+        base_backup_id = latest["id"]
+    
+    try:
+        backup_doc = await create_streaming_backup(
+            name=name,
+            collections=collections_to_backup,
+            created_by=current_user["id"],
+            created_by_name=current_user["name"],
+            description=description,
+            base_backup_id=base_backup_id if incremental else None,
+            storage=storage or BACKUP_STORAGE,
+            extra={"include_all": include_all}
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    await db.database_backups.insert_one(backup_doc)
+    backup_id = backup_doc["id"]
+    record_counts = backup_doc["record_counts"]
+    total_size = backup_doc["size_bytes"]
     
     # Log the backup action
-    await db.audit_logs.insert_one({
+    await db.audit_logs.insert_one(with_native_dates("audit_logs", {
         "id": str(uuid.uuid4()),
         "action": "DATABASE_BACKUP",
         "entity_type": "database",
@@ -189,29 +215,32 @@ async def create_backup(
         "user_role": current_user.get("role", 5),
         "details": {
             "backup_name": name,
+            "backup_kind": backup_doc["backup_kind"],
+            "base_backup_id": backup_doc["base_backup_id"],
             "collections_count": len(collections_to_backup),
             "total_records": sum(record_counts.values()),
             "size_bytes": total_size
         },
         "timestamp": datetime.now(timezone.utc).isoformat()
-    })
+    }))
     
-    # Keep only last 10 backups to save space
-    all_backups = await db.database_backups.find({}, {"id": 1}).sort("created_at", -1).to_list(100)
-    if len(all_backups) > 10:
-        old_backup_ids = [b["id"] for b in all_backups[10:]]
-        await db.database_backups.delete_many({"id": {"$in": old_backup_ids}})
+    # Keep only last 10 backups to save space (and the bases they depend on)
+    await apply_retention(10)
     
     return {
-        "message": "Backup created successfully",
+        "message": "Backup created successfully" if not backup_doc["errors"] else "Backup created with some warnings",
         "backup": {
             "id": backup_id,
             "name": name,
+            "backup_kind": backup_doc["backup_kind"],
+            "base_backup_id": backup_doc["base_backup_id"],
             "collections_count": len(collections_to_backup),
             "record_counts": record_counts,
             "total_records": sum(record_counts.values()),
-            "size_bytes": total_size
-        }
+            "size_bytes": total_size,
+            "stored_bytes": backup_doc["stored_bytes"]
+        },
+        "warnings": backup_doc["errors"][:10]
     }
 
 
@@ -228,39 +257,10 @@ async def create_full_backup(
     - Ready for complete system restore
     """
     try:
-        backup_id = str(uuid.uuid4())
-        backup_data = {}
-        record_counts = {}
-        total_size = 0
-        errors = []
-        
         # Get ALL collections dynamically
         all_collections = await db.list_collection_names()
-        # Exclude database_backups and fs.chunks (binary data that breaks JSON serialization)
-        collections_to_backup = [c for c in all_collections if c not in ["database_backups", "fs.chunks"]]
-        
-        # Backup each collection
-        for collection_name in collections_to_backup:
-            try:
-                collection = db[collection_name]
-                # For fs.files, exclude binary fields
-                if collection_name == "fs.files":
-                    documents = await collection.find({}, {"_id": 0}).to_list(100000)
-                    # Convert ObjectId and datetime to strings
-                    for doc in documents:
-                        for key, value in list(doc.items()):
-                            if hasattr(value, '__str__') and not isinstance(value, (str, int, float, bool, list, dict, type(None))):
-                                doc[key] = str(value)
-                else:
-                    documents = await collection.find({}, {"_id": 0}).to_list(100000)
-                backup_data[collection_name] = documents
-                record_counts[collection_name] = len(documents)
-                total_size += len(json.dumps(documents, default=str))
-            except Exception as e:
-                logger.error(f"Error backing up {collection_name}: {str(e)}")
-                errors.append(f"Error backing up {collection_name}: {str(e)}")
-                backup_data[collection_name] = []
-                record_counts[collection_name] = 0
+        # fs.chunks (binary data) is covered by the ultimate backup
+        collections_to_backup = [c for c in all_collections if c not in INTERNAL_COLLECTIONS and c != "fs.chunks"]
         
         # Get file stats for metadata
         files_count, files_size = get_files_stats(UPLOADS_DIR)
@@ -278,34 +278,34 @@ async def create_full_backup(
                             "size_bytes": cat_size
                         }
         
-        # Store backup
         now = datetime.now(timezone.utc)
         backup_name = f"Full_Backup_{now.strftime('%Y%m%d_%H%M%S')}"
         
-        backup_doc = {
-            "id": backup_id,
-            "name": backup_name,
-            "description": f"Full system backup - {len(collections_to_backup)} collections, {sum(record_counts.values())} records",
-            "created_at": now.isoformat(),
-            "created_by": current_user["id"],
-            "created_by_name": current_user["name"],
-            "collections": collections_to_backup,
-            "record_counts": record_counts,
-            "size_bytes": total_size,
-            "include_all": True,
-            "is_full_backup": True,
-            "files_metadata": {
-                "total_count": files_count,
-                "total_size_bytes": files_size,
-                "by_category": files_by_category
-            },
-            "data": backup_data
-        }
+        backup_doc = await create_streaming_backup(
+            name=backup_name,
+            collections=collections_to_backup,
+            created_by=current_user["id"],
+            created_by_name=current_user["name"],
+            extra={
+                "include_all": True,
+                "is_full_backup": True,
+                "files_metadata": {
+                    "total_count": files_count,
+                    "total_size_bytes": files_size,
+                    "by_category": files_by_category
+                }
+            }
+        )
+        backup_id = backup_doc["id"]
+        record_counts = backup_doc["record_counts"]
+        total_size = backup_doc["size_bytes"]
+        errors = backup_doc["errors"]
         
-        await db.database_backups.insert_one(backup_doc)
+        description = f"Full system backup - {len(collections_to_backup)} collections, {sum(record_counts.values())} records"
+        await db.database_backups.update_one({"id": backup_id}, {"$set": {"description": description}})
         
         # Log the backup action
-        await db.audit_logs.insert_one({
+        await db.audit_logs.insert_one(with_native_dates("audit_logs", {
             "id": str(uuid.uuid4()),
             "action": "FULL_DATABASE_BACKUP",
             "entity_type": "database",
@@ -322,13 +322,10 @@ async def create_full_backup(
                 "files_size_bytes": files_size
             },
             "timestamp": now.isoformat()
-        })
+        }))
         
         # Keep only last 10 backups
-        all_backups = await db.database_backups.find({}, {"id": 1}).sort("created_at", -1).to_list(100)
-        if len(all_backups) > 10:
-            old_backup_ids = [b["id"] for b in all_backups[10:]]
-            await db.database_backups.delete_many({"id": {"$in": old_backup_ids}})
+        await apply_retention(10)
         
         return {
             "message": "Full backup created successfully" if not errors else "Backup created with some warnings",
@@ -340,6 +337,7 @@ async def create_full_backup(
                 "record_counts": record_counts,
                 "total_records": sum(record_counts.values()),
                 "size_bytes": total_size,
+                "stored_bytes": backup_doc["stored_bytes"],
                 "files_count": files_count,
                 "files_size_mb": round(files_size / (1024 * 1024), 2)
             },
@@ -376,11 +374,23 @@ async def delete_backup(
     _: None = Depends(require_permission("database_backup.delete", "delete backups"))
 ):
     """Delete a backup (requires database_backup.delete permission)"""
-    result = await db.database_backups.delete_one({"id": backup_id})
+    backup = await db.database_backups.find_one({"id": backup_id}, {"_id": 0, "id": 1, "format": 1})
     
-    if result.deleted_count == 0:
+    if not backup:
         raise HTTPException(status_code=404, detail="Backup not found")
     
+    dependent = await db.database_backups.find_one({"base_backup_id": backup_id}, {"_id": 0, "name": 1})
+    if dependent:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Backup is the base of incremental backup '{dependent['name']}'; delete that first"
+        )
+    
+    if backup.get("format") == "chunked":
+        await delete_streaming_backup(backup_id)
+    else:
+        await db.database_backups.delete_one({"id": backup_id})
+    
     return {"message": "Backup deleted successfully"}
 
 
@@ -406,6 +416,16 @@ async def restore_database(
     restored_counts = {}
     errors = []
     
+    if backup.get("format") == "chunked":
+        # Stream chunks back (following the incremental chain, if any)
+        try:
+            result = await restore_streaming_backup(backup, collections_to_restore)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        restored_counts = result["restored_counts"]
+        errors = result["errors"]
+        collections_to_restore = []
+    
     for collection_name in collections_to_restore:
         if collection_name not in backup_data:
             errors.append(f"Collection {collection_name} not found in backup")
@@ -437,8 +457,17 @@ async def restore_database(
             except Exception as e:
                 errors.append(f"Error restoring {collection_name}: {str(e)}")
     
+    # Users, roles and settings were replaced wholesale - drop cached state
+    invalidate_all()
+    invalidate_setting()
+    
+    # Bookings and purchases were replaced wholesale - recompute dashboard rollups
+    await rebuild_rollups()
+    await check_hierarchy_closure(repair=True)
+    await rebuild_search_index()
+    
     # Log the restore action
-    await db.audit_logs.insert_one({
+    await db.audit_logs.insert_one(with_native_dates("audit_logs", {
         "id": str(uuid.uuid4()),
         "action": "DATABASE_RESTORE",
         "entity_type": "database",
@@ -453,7 +482,7 @@ async def restore_database(
             "errors": errors
         },
         "timestamp": datetime.now(timezone.utc).isoformat()
-    })
+    }))
     
     return {
         "message": "Database restored successfully" if not errors else "Database restored with some errors",
@@ -638,8 +667,13 @@ async def clear_database(
         except Exception as e:
             errors.append(f"Error clearing {collection_name}: {str(e)}")
     
+    invalidate_setting()
+    await rebuild_rollups()
+    await check_hierarchy_closure(repair=True)
+    await rebuild_search_index()
+    
     # Log the clear action
-    await db.audit_logs.insert_one({
+    await db.audit_logs.insert_one(with_native_dates("audit_logs", {
         "id": str(uuid.uuid4()),
         "action": "DATABASE_CLEAR",
         "entity_type": "database",
@@ -658,7 +692,7 @@ async def clear_database(
             "errors": errors
         },
         "timestamp": datetime.now(timezone.utc).isoformat()
-    })
+    }))
     
     return {
         "message": "Selected collections cleared successfully" if not errors else "Collections cleared with some errors",
@@ -899,7 +933,7 @@ async def clear_uploaded_files(
     total_filesystem = sum(f["filesystem"] for f in cleared_files.values())
     
     # Log the action
-    await db.audit_logs.insert_one({
+    await db.audit_logs.insert_one(with_native_dates("audit_logs", {
         "id": str(uuid.uuid4()),
         "action": "FILES_CLEAR",
         "entity_type": "files",
@@ -915,7 +949,7 @@ async def clear_uploaded_files(
             "errors": errors
         },
         "timestamp": datetime.now(timezone.utc).isoformat()
-    })
+    }))
     
     return {
         "message": "Files cleared successfully" if not errors else "Files cleared with some errors",
@@ -989,6 +1023,18 @@ async def get_file_stats(
 
 
 # ============== Download Backup as ZIP ==============
+def iter_file(fileobj, block_size: int = 1024 * 1024):
+    """Stream a (temporary) file in blocks and close it when done."""
+    try:
+        while True:
+            block = fileobj.read(block_size)
+            if not block:
+                break
+            yield block
+    finally:
+        fileobj.close()
+
+
 def get_all_files_in_directory(directory: str) -> List[tuple]:
     """Get all files in a directory recursively with their relative paths"""
     files = []
@@ -1033,13 +1079,20 @@ async def download_backup(
     if not backup:
         raise HTTPException(status_code=404, detail="Backup not found")
     
+    is_chunked = backup.get("format") == "chunked"
+    if is_chunked and backup.get("backup_kind") == "incremental":
+        raise HTTPException(
+            status_code=400,
+            detail="Incremental backups only hold changes; restore them in place or download their base backup"
+        )
+    
     backup_data = backup.get("data", {})
     
     # Get file stats
     files_count, files_size = get_files_stats(UPLOADS_DIR) if include_files else (0, 0)
     
-    # Create ZIP file in memory
-    zip_buffer = io.BytesIO()
+    # Chunked backups can be larger than memory - build the ZIP in a spooled temp file
+    zip_buffer = tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_BYTES) if is_chunked else io.BytesIO()
     
     with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
         # Add metadata file
@@ -1065,6 +1118,11 @@ async def download_backup(
             json_content = json.dumps(documents, indent=2, default=str)
             zip_file.writestr(f"collections/{collection_name}.json", json_content)
         
+        if is_chunked:
+            for collection_name in backup.get("collection_stats", {}):
+                with zip_file.open(f"collections/{collection_name}.json", "w", force_zip64=True) as entry:
+                    await write_collection_json(backup, collection_name, entry)
+        
         # Add uploaded files if requested
         if include_files and os.path.exists(UPLOADS_DIR):
             all_files = get_all_files_in_directory(UPLOADS_DIR)
@@ -1082,7 +1140,7 @@ async def download_backup(
     filename = f"backup_{safe_name}{file_suffix}_{backup['created_at'][:10]}.zip"
     
     return StreamingResponse(
-        zip_buffer,
+        iter_file(zip_buffer) if is_chunked else zip_buffer,
         media_type="application/zip",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
@@ -1185,8 +1243,17 @@ async def restore_from_file(
                 except Exception as e:
                     errors.append(f"Error restoring {collection_name}: {str(e)}")
         
+        # Users, roles and settings were replaced wholesale - drop cached state
+        invalidate_all()
+        invalidate_setting()
+        
+        # Bookings and purchases were replaced wholesale - recompute dashboard rollups
+        await rebuild_rollups()
+        await check_hierarchy_closure(repair=True)
+        await rebuild_search_index()
+        
         # Log the restore action
-        await db.audit_logs.insert_one({
+        await db.audit_logs.insert_one(with_native_dates("audit_logs", {
             "id": str(uuid.uuid4()),
             "action": "DATABASE_RESTORE_FROM_FILE",
             "entity_type": "database",
@@ -1203,7 +1270,7 @@ async def restore_from_file(
                 "errors": errors + files_errors
             },
             "timestamp": datetime.now(timezone.utc).isoformat()
-        })
+        }))
         
         all_errors = errors + files_errors
         
@@ -1454,7 +1521,7 @@ async def restore_gridfs_from_backup(
                     errors.append(f"Error restoring {file_info.get('filename')}: {str(e)}")
         
         # Log the restore action
-        await db.audit_logs.insert_one({
+        await db.audit_logs.insert_one(with_native_dates("audit_logs", {
             "id": str(uuid.uuid4()),
             "action": "GRIDFS_RESTORE",
             "entity_type": "database",
@@ -1468,7 +1535,7 @@ async def restore_gridfs_from_backup(
                 "errors_count": len(errors)
             },
             "timestamp": datetime.now(timezone.utc).isoformat()
-        })
+        }))
         
         return {
             "message": "GridFS restore completed",
@@ -1539,67 +1606,35 @@ async def create_ultimate_backup(
     """
     Create an ULTIMATE full system backup including:
     - ALL database collections
-    - ALL GridFS files (stored as base64)
+    - ALL GridFS files (fs.files + fs.chunks, stored as compressed BSON chunks)
     - Environment settings
     - System configuration
     - Log file summaries
     
     This is the most comprehensive backup option.
     """
-    backup_id = str(uuid.uuid4())
     now = datetime.now(timezone.utc)
     backup_name = f"Ultimate_Backup_{now.strftime('%Y%m%d_%H%M%S')}"
-    
-    backup_data = {}
-    record_counts = {}
-    total_size = 0
     errors = []
     
-    # 1. Get ALL collections dynamically
+    # 1. Get ALL collections dynamically (GridFS chunks included - they are stored as BSON)
     all_collections = await db.list_collection_names()
-    collections_to_backup = [c for c in all_collections if c != "database_backups"]
+    collections_to_backup = [c for c in all_collections if c not in INTERNAL_COLLECTIONS]
     
-    # 2. Backup each collection (excluding GridFS chunks which are binary)
-    for collection_name in collections_to_backup:
-        if collection_name == "fs.chunks":
-            # Skip fs.chunks as we'll backup GridFS files separately
-            continue
-        try:
-            collection = db[collection_name]
-            documents = await collection.find({}, {"_id": 0}).to_list(100000)
-            backup_data[collection_name] = documents
-            record_counts[collection_name] = len(documents)
-            total_size += len(json.dumps(documents, default=str))
-        except Exception as e:
-            errors.append(f"Error backing up {collection_name}: {str(e)}")
-            backup_data[collection_name] = []
-            record_counts[collection_name] = 0
-    
-    # 3. Backup GridFS files with base64 content
-    gridfs_files = []
+    # 2. GridFS totals (file contents are backed up with fs.chunks)
+    gridfs_files_count = 0
     gridfs_total_size = 0
-    
     try:
-        async for file_doc in db["fs.files"].find({}):
-            file_id = str(file_doc["_id"])
-            try:
-                content, content_type = await download_file_from_gridfs(file_id)
-                gridfs_files.append({
-                    "file_id": file_id,
-                    "filename": file_doc.get("filename", ""),
-                    "length": file_doc.get("length", 0),
-                    "content_type": content_type,
-                    "upload_date": str(file_doc.get("uploadDate", "")),
-                    "metadata": file_doc.get("metadata", {}),
-                    "content_base64": base64.b64encode(content).decode('utf-8')
-                })
-                gridfs_total_size += file_doc.get("length", 0)
-            except Exception as e:
-                errors.append(f"Error backing up GridFS file {file_id}: {str(e)}")
+        totals = await db["fs.files"].aggregate([
+            {"$group": {"_id": None, "count": {"$sum": 1}, "size": {"$sum": "$length"}}}
+        ]).to_list(1)
+        if totals:
+            gridfs_files_count = totals[0]["count"]
+            gridfs_total_size = totals[0]["size"]
     except Exception as e:
         errors.append(f"Error reading GridFS files: {str(e)}")
     
-    # 4. Get environment/system settings
+    # 3. Get environment/system settings
     env_settings = {}
     env_files = ["/app/backend/.env", "/app/frontend/.env"]
     for env_file in env_files:
@@ -1623,7 +1658,7 @@ async def create_ultimate_backup(
             except Exception as e:
                 errors.append(f"Error reading {env_file}: {str(e)}")
     
-    # 5. Get log file stats (not full content to save space)
+    # 4. Get log file stats (not full content to save space)
     log_stats = {}
     log_dirs = ["/var/log/supervisor"]
     for log_dir in log_dirs:
@@ -1648,7 +1683,7 @@ async def create_ultimate_backup(
             except Exception as e:
                 errors.append(f"Error reading logs from {log_dir}: {str(e)}")
     
-    # 6. Get uploaded files from filesystem
+    # 5. Get uploaded files from filesystem
     files_metadata = {}
     if os.path.exists(UPLOADS_DIR):
         for root, dirs, files in os.walk(UPLOADS_DIR):
@@ -1664,33 +1699,30 @@ async def create_ultimate_backup(
                 except:
                     pass
     
-    # Store the ultimate backup
-    backup_doc = {
-        "id": backup_id,
-        "name": backup_name,
-        "description": f"Ultimate backup - {len(collections_to_backup)} collections, {len(gridfs_files)} GridFS files",
-        "created_at": now.isoformat(),
-        "created_by": current_user["id"],
-        "created_by_name": current_user["name"],
-        "backup_type": "ultimate",
-        "collections": collections_to_backup,
-        "record_counts": record_counts,
-        "size_bytes": total_size,
-        "gridfs_files_count": len(gridfs_files),
-        "gridfs_total_size": gridfs_total_size,
-        "filesystem_files_count": len(files_metadata),
-        "errors": errors,
-        "data": backup_data,
-        "gridfs_data": gridfs_files,
-        "env_settings": env_settings,
-        "log_stats": log_stats,
-        "files_metadata": files_metadata
-    }
-    
-    await db.database_backups.insert_one(backup_doc)
+    # 6. Stream all collections into the ultimate backup
+    backup_doc = await create_streaming_backup(
+        name=backup_name,
+        collections=collections_to_backup,
+        created_by=current_user["id"],
+        created_by_name=current_user["name"],
+        description=f"Ultimate backup - {len(collections_to_backup)} collections, {gridfs_files_count} GridFS files",
+        extra={
+            "backup_type": "ultimate",
+            "gridfs_files_count": gridfs_files_count,
+            "gridfs_total_size": gridfs_total_size,
+            "filesystem_files_count": len(files_metadata),
+            "env_settings": env_settings,
+            "log_stats": log_stats,
+            "files_metadata": files_metadata
+        }
+    )
+    backup_id = backup_doc["id"]
+    record_counts = backup_doc["record_counts"]
+    total_size = backup_doc["size_bytes"]
+    errors = errors + backup_doc["errors"]
     
     # Log the action
-    await db.audit_logs.insert_one({
+    await db.audit_logs.insert_one(with_native_dates("audit_logs", {
         "id": str(uuid.uuid4()),
         "action": "ULTIMATE_BACKUP",
         "entity_type": "database",
@@ -1701,12 +1733,12 @@ async def create_ultimate_backup(
         "details": {
             "backup_name": backup_name,
             "collections_count": len(collections_to_backup),
-            "gridfs_files_count": len(gridfs_files),
+            "gridfs_files_count": gridfs_files_count,
             "total_records": sum(record_counts.values()),
             "errors_count": len(errors)
         },
         "timestamp": now.isoformat()
-    })
+    }))
     
     return {
         "message": "Ultimate backup created successfully" if not errors else "Backup created with some warnings",
@@ -1715,16 +1747,65 @@ async def create_ultimate_backup(
             "name": backup_name,
             "collections_count": len(collections_to_backup),
             "total_records": sum(record_counts.values()),
-            "gridfs_files": len(gridfs_files),
+            "gridfs_files": gridfs_files_count,
             "gridfs_size_mb": round(gridfs_total_size / (1024 * 1024), 2),
             "filesystem_files": len(files_metadata),
-            "size_bytes": total_size
+            "size_bytes": total_size,
+            "stored_bytes": backup_doc["stored_bytes"]
         },
         "warnings": errors[:10] if errors else [],
         "download_url": f"/api/database/backups/{backup_id}/download-ultimate"
     }
 
 
+async def write_chunked_gridfs(backup: dict, zip_file: zipfile.ZipFile) -> List[dict]:
+    """
+    Rebuild GridFS files from a chunked backup's fs.files/fs.chunks into the ZIP.
+    
+    fs.chunks is stored sorted by (files_id, n), so each file is written as
+    one ZIP entry while streaming, without holding whole files in memory.
+    """
+    files_by_id = {}
+    async for docs in iter_chunk_documents(backup["id"], "fs.files"):
+        for file_doc in docs:
+            files_by_id[file_doc["_id"]] = file_doc
+    
+    manifest = []
+    current_id = None
+    entry = None
+    try:
+        async for docs in iter_chunk_documents(backup["id"], "fs.chunks"):
+            for chunk in docs:
+                if chunk["files_id"] != current_id:
+                    if entry is not None:
+                        entry.close()
+                        entry = None
+                    current_id = chunk["files_id"]
+                    file_doc = files_by_id.get(current_id)
+                    if file_doc is None:
+                        continue
+                    metadata = file_doc.get("metadata") or {}
+                    category = metadata.get("category", "uncategorized")
+                    filename = file_doc.get("filename") or str(current_id)
+                    zip_path = f"gridfs/{category}/{filename}"
+                    entry = zip_file.open(zip_path, "w", force_zip64=True)
+                    manifest.append({
+                        "file_id": str(current_id),
+                        "filename": file_doc.get("filename", ""),
+                        "length": file_doc.get("length", 0),
+                        "content_type": metadata.get("content_type", "application/octet-stream"),
+                        "upload_date": str(file_doc.get("uploadDate", "")),
+                        "metadata": metadata,
+                        "zip_path": zip_path
+                    })
+                if entry is not None:
+                    await asyncio.to_thread(entry.write, bytes(chunk["data"]))
+    finally:
+        if entry is not None:
+            entry.close()
+    return manifest
+
+
 @router.get("/backups/{backup_id}/download-ultimate")
 async def download_ultimate_backup(
     backup_id: str,
@@ -1741,8 +1822,12 @@ async def download_ultimate_backup(
     if not backup:
         raise HTTPException(status_code=404, detail="Backup not found")
     
-    # Create ZIP in memory
-    zip_buffer = io.BytesIO()
+    is_chunked = backup.get("format") == "chunked"
+    if is_chunked and backup.get("backup_kind") == "incremental":
+        raise HTTPException(status_code=400, detail="Incremental backups cannot be downloaded as an ultimate backup")
+    
+    # Chunked backups can be larger than memory - build the ZIP in a spooled temp file
+    zip_buffer = tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_BYTES) if is_chunked else io.BytesIO()
     
     with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
         # 1. Add metadata
@@ -1767,9 +1852,21 @@ async def download_ultimate_backup(
             json_content = json.dumps(documents, indent=2, default=str)
             zip_file.writestr(f"database/{collection_name}.json", json_content)
         
-        # 3. Add GridFS files (decode base64 and store as actual files)
+        if is_chunked:
+            for collection_name in backup.get("collection_stats", {}):
+                if collection_name == "fs.chunks":
+                    continue
+                with zip_file.open(f"database/{collection_name}.json", "w", force_zip64=True) as entry:
+                    await write_collection_json(backup, collection_name, entry)
+        
+        # 3. Add GridFS files (rebuilt from fs.chunks, or decoded from legacy base64 copies)
         gridfs_data = backup.get("gridfs_data", [])
         gridfs_manifest = []
+        if is_chunked and "fs.chunks" in backup.get("collection_stats", {}):
+            try:
+                gridfs_manifest = await write_chunked_gridfs(backup, zip_file)
+            except Exception as e:
+                gridfs_manifest.append({"error": f"Error rebuilding GridFS files: {str(e)}"})
         for gf in gridfs_data:
             try:
                 content = base64.b64decode(gf.get("content_base64", ""))
@@ -1863,7 +1960,7 @@ GridFS Files: {gridfs_count}
     filename = f"{safe_name}_{backup['created_at'][:10]}.zip"
     
     return StreamingResponse(
-        zip_buffer,
+        iter_file(zip_buffer) if is_chunked else zip_buffer,
         media_type="application/zip",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
@@ -1974,8 +2071,13 @@ async def restore_ultimate_backup(
                         except Exception as e:
                             errors.append(f"Error restoring file {filename}: {str(e)}")
         
+        invalidate_setting()
+        await rebuild_rollups()
+        await check_hierarchy_closure(repair=True)
+        await rebuild_search_index()
+        
         # Log the restore
-        await db.audit_logs.insert_one({
+        await db.audit_logs.insert_one(with_native_dates("audit_logs", {
             "id": str(uuid.uuid4()),
             "action": "ULTIMATE_RESTORE",
             "entity_type": "database",
@@ -1991,7 +2093,7 @@ async def restore_ultimate_backup(
                 "errors_count": len(errors)
             },
             "timestamp": datetime.now(timezone.utc).isoformat()
-        })
+        }))
         
         return {
             "message": "Ultimate restore completed successfully" if not errors else "Restore completed with some warnings",
@@ -13,6 +13,9 @@ from datetime import datetime, timedelta
 import random
 from database import db
 from utils.auth import hash_password, create_token
+from services.auth_cache import invalidate_user
+from services.dashboard_rollups import refresh_booking_rollups
+from services.search_index import refresh_search_index
 
 router = APIRouter(prefix="/demo", tags=["Demo"])
 
@@ -236,8 +239,10 @@ async def initialize_demo():
                     "agreement_accepted_at": datetime.utcnow().isoformat()
                 }}
             )
+            invalidate_user(DEMO_USER["id"])
         
         # Clear previous demo data
+        previous_booking_ids = await db.bookings.distinct("id", {"is_demo": True})
         await db.clients.delete_many({"is_demo": True})
         await db.stocks.delete_many({"is_demo": True})
         await db.bookings.delete_many({"is_demo": True})
@@ -273,6 +278,15 @@ async def initialize_demo():
                 {"$set": booking},
                 upsert=True
             )
+        
+        # Move the demo partition of the dashboard rollups to the new data
+        for booking_id in set(previous_booking_ids) | {b["id"] for b in bookings}:
+            await refresh_booking_rollups(booking_id)
+        
+        # Make the demo records searchable right away
+        await refresh_search_index("clients", [c["id"] for c in clients])
+        await refresh_search_index("stocks", [s["id"] for s in stocks])
+        await refresh_search_index("bookings", [b["id"] for b in bookings])
             
         for vendor in vendors:
             await db.vendors.update_one(
@@ -354,6 +368,7 @@ async def cleanup_demo():
         
         # Also delete the demo user
         await db.users.delete_one({"id": DEMO_USER["id"]})
+        invalidate_user(DEMO_USER["id"])
         deleted_counts["demo_user"] = 1
         
         return {
@@ -13,6 +13,7 @@ from services.permission_service import (
     require_permission,
     is_pe_level
 )
+from utils.dates import add_date_range, date_range
 
 router = APIRouter(prefix="/email-logs", tags=["Email Logs"])
 
@@ -23,7 +24,7 @@ class EmailLog(BaseModel):
     cc_email: Optional[str] = None
     subject: str
     template_key: Optional[str] = None
-    status: str  # "sent", "failed", "skipped"
+    status: str  # "queued", "sent", "failed", "skipped"
     error_message: Optional[str] = None
     variables: dict = {}
     related_entity_type: Optional[str] = None
@@ -78,13 +79,7 @@ async def get_email_logs(
         query["related_entity_type"] = related_entity_type
     if related_entity_id:
         query["related_entity_id"] = related_entity_id
-    if start_date:
-        query["created_at"] = {"$gte": start_date}
-    if end_date:
-        if "created_at" in query:
-            query["created_at"]["$lte"] = end_date + "T23:59:59"
-        else:
-            query["created_at"] = {"$lte": end_date + "T23:59:59"}
+    add_date_range(query, "created_at", start_date, end_date)
     
     total = await db.email_logs.count_documents(query)
     logs = await db.email_logs.find(query, {"_id": 0}).sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
@@ -104,11 +99,11 @@ async def get_email_log_stats(
     _: None = Depends(require_permission("email.view_logs", "view email statistics"))
 ):
     """Get email log statistics for the last N days (PE Level only)"""
-    start_date = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+    since = date_range("created_at", datetime.now(timezone.utc) - timedelta(days=days))
     
     # Get counts by status
     status_pipeline = [
-        {"$match": {"created_at": {"$gte": start_date}}},
+        {"$match": since},
         {"$group": {"_id": "$status", "count": {"$sum": 1}}}
     ]
     status_stats = await db.email_logs.aggregate(status_pipeline).to_list(10)
@@ -116,7 +111,7 @@ async def get_email_log_stats(
     
     # Get counts by template
     template_pipeline = [
-        {"$match": {"created_at": {"$gte": start_date}}},
+        {"$match": since},
         {"$group": {"_id": "$template_key", "count": {"$sum": 1}}},
         {"$sort": {"count": -1}},
         {"$limit": 20}
@@ -126,7 +121,7 @@ async def get_email_log_stats(
     
     # Get counts by entity type
     entity_pipeline = [
-        {"$match": {"created_at": {"$gte": start_date}, "related_entity_type": {"$ne": None}}},
+        {"$match": {**since, "related_entity_type": {"$ne": None}}},
         {"$group": {"_id": "$related_entity_type", "count": {"$sum": 1}}},
         {"$sort": {"count": -1}}
     ]
@@ -135,7 +130,7 @@ async def get_email_log_stats(
     
     # Get recent failures
     recent_failures = await db.email_logs.find(
-        {"status": "failed", "created_at": {"$gte": start_date}},
+        {"status": "failed", **since},
         {"_id": 0, "id": 1, "to_email": 1, "subject": 1, "error_message": 1, "created_at": 1}
     ).sort("created_at", -1).limit(10).to_list(10)
     
@@ -240,7 +235,7 @@ async def resend_email(
             raise HTTPException(status_code=400, detail="Cannot resend non-template emails. Original content not stored.")
         
         return {
-            "message": f"Email resent successfully to {to_email}",
+            "message": f"Email queued for resend to {to_email}",
             "to_email": to_email,
             "template_key": template_key,
             "resent_by": current_user.get("name"),
@@ -260,9 +255,9 @@ async def cleanup_old_email_logs(
     _: None = Depends(require_permission("email.delete_logs", "cleanup email logs"))
 ):
     """Delete email logs older than specified days (PE Desk only)"""
-    cutoff_date = (datetime.now(timezone.utc) - timedelta(days=days_to_keep)).isoformat()
+    cutoff_date = datetime.now(timezone.utc) - timedelta(days=days_to_keep)
     
-    result = await db.email_logs.delete_many({"created_at": {"$lt": cutoff_date}})
+    result = await db.email_logs.delete_many(date_range("created_at", end=cutoff_date))
     
     return {
         "message": f"Deleted {result.deleted_count} email logs older than {days_to_keep} days",
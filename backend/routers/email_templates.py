@@ -12,6 +12,7 @@ from routers.auth import get_current_user
 from email_templates import DEFAULT_EMAIL_TEMPLATES as EMAIL_TEMPLATES
 from services.email_service import render_template
 from services.permission_service import require_permission
+from utils.dates import with_native_dates
 
 router = APIRouter(prefix="/email-templates", tags=["Email Templates"])
 
@@ -75,7 +76,7 @@ async def sync_all_templates(
     deleted_count = result.deleted_count
     
     # Log the sync action
-    await db.audit_logs.insert_one({
+    await db.audit_logs.insert_one(with_native_dates("audit_logs", {
         "action": "EMAIL_TEMPLATES_SYNC",
         "entity_type": "email_templates",
         "entity_id": "all",
@@ -85,8 +86,8 @@ async def sync_all_templates(
             "templates_deleted": deleted_count,
             "total_templates": len(EMAIL_TEMPLATES)
         },
-        "created_at": datetime.now(timezone.utc).isoformat()
-    })
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }))
     
     return {
         "message": "All email templates synced to latest defaults",
@@ -0,0 +1,50 @@
+"""
+Exports Router
+Status and download of background export jobs (started with ?background=true
+on the bookings, clients, DP, finance and P&L export endpoints)
+"""
+from fastapi import APIRouter, Depends, HTTPException, Request
+
+from utils.auth import get_current_user
+from services.export_engine import get_export_job
+from services.file_streaming import gridfs_file_response
+
+router = APIRouter(prefix="/exports", tags=["Exports"])
+
+
+async def _get_own_job(job_id: str, current_user: dict) -> dict:
+    job = await get_export_job(job_id)
+    if not job or job.get("submitted_by") != current_user.get("id"):
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return job
+
+
+@router.get("/jobs/{job_id}")
+async def get_export_job_status(
+    job_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Poll an export job.
+
+    Status: queued, running, completed or failed. Completed jobs can be
+    downloaded from /exports/jobs/{job_id}/download until they expire.
+    """
+    return await _get_own_job(job_id, current_user)
+
+
+@router.get("/jobs/{job_id}/download")
+async def download_export(
+    job_id: str,
+    request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    """Download the file produced by a completed export job."""
+    job = await _get_own_job(job_id, current_user)
+    if job.get("status") != "completed" or not job.get("file_id"):
+        raise HTTPException(status_code=409, detail=f"Export is {job.get('status')}")
+
+    try:
+        return await gridfs_file_response(job["file_id"], request, disposition="attachment", filename=job["filename"])
+    except FileNotFoundError:
+        raise HTTPException(status_code=410, detail="Export file has expired")
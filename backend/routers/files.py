@@ -1,19 +1,19 @@
 """
 File Router - Serves files from GridFS and handles uploads
 """
-from fastapi import APIRouter, HTTPException, UploadFile, File, Depends, Query
-from fastapi.responses import Response
+from fastapi import APIRouter, HTTPException, UploadFile, File, Depends, Query, Request
 from typing import Optional
 from database import db
 from utils.auth import get_current_user
 from services.file_storage import (
     upload_file_to_gridfs,
-    download_file_from_gridfs,
     delete_file_from_gridfs,
     get_file_metadata,
     list_files_by_category,
     get_file_url
 )
+from services.file_streaming import gridfs_file_response
+from services.settings_cache import get_setting, invalidate_setting
 from services.permission_service import (
     require_permission,
     is_pe_level
@@ -103,7 +103,7 @@ async def scan_missing_files_legacy(
                 })
     
     # Scan company master for missing documents
-    company = await db.company_master.find_one({"_id": "company_settings"})
+    company = await get_setting("company")
     if company:
         doc_fields = ["logo", "cml_cdsl", "cml_nsdl", "cancelled_cheque", "pan_card"]
         for field in doc_fields:
@@ -189,24 +189,19 @@ async def scan_missing_files_legacy(
 # ============== Dynamic routes ==============
 
 @router.get("/{file_id}")
-async def download_file(file_id: str):
+async def download_file(file_id: str, request: Request):
     """
     Download a file from GridFS
     Public endpoint - files can be accessed by anyone with the file_id
+    
+    Streams the file and supports Range requests and If-None-Match (ETag).
     """
     try:
-        content, metadata = await download_file_from_gridfs(file_id)
-        
-        content_type = metadata.get("content_type", "application/octet-stream")
-        filename = metadata.get("original_filename") or metadata.get("filename", "download")
-        
-        return Response(
-            content=content,
-            media_type=content_type,
-            headers={
-                "Content-Disposition": f'inline; filename="{filename}"',
-                "Cache-Control": "public, max-age=31536000"  # Cache for 1 year
-            }
+        return await gridfs_file_response(
+            file_id,
+            request,
+            disposition="inline",
+            cache_control="public, max-age=31536000"  # Cache for 1 year
         )
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="File not found")
@@ -214,23 +209,12 @@ async def download_file(file_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/{file_id}/download")
-async def force_download_file(file_id: str):
+async def force_download_file(file_id: str, request: Request):
     """
     Download a file from GridFS with attachment disposition (force download)
     """
     try:
-        content, metadata = await download_file_from_gridfs(file_id)
-        
-        content_type = metadata.get("content_type", "application/octet-stream")
-        filename = metadata.get("original_filename") or metadata.get("filename", "download")
-        
-        return Response(
-            content=content,
-            media_type=content_type,
-            headers={
-                "Content-Disposition": f'attachment; filename="{filename}"',
-            }
-        )
+        return await gridfs_file_response(file_id, request, disposition="attachment")
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="File not found")
     except Exception as e:
@@ -364,7 +348,7 @@ async def scan_missing_files(
                 })
     
     # Scan company master for missing documents
-    company = await db.company_master.find_one({"_id": "company_settings"})
+    company = await get_setting("company")
     if company:
         doc_fields = ["logo", "cml_cdsl", "cml_nsdl", "cancelled_cheque", "pan_card"]
         for field in doc_fields:
@@ -503,6 +487,7 @@ async def reupload_file(
                 f"{doc_type}_url": file_url
             }}
         )
+        invalidate_setting("company")
     
     elif entity_type == "referral_partner":
         # Update referral partner document
@@ -5,17 +5,18 @@ Handles all finance-related operations including payments tracking, refund reque
 and financial reports/exports.
 """
 from fastapi import APIRouter, HTTPException, Depends, Query
-from fastapi.responses import StreamingResponse
 from typing import List, Optional
 from datetime import datetime, timezone
 from pydantic import BaseModel
 import uuid
-import io
 
 from database import db
 from config import is_pe_level, has_finance_access, can_manage_finance
 from utils.auth import get_current_user
 from services.permission_service import require_permission
+from services.batch_loader import BatchLoader, get_batch_loader
+from utils.dates import add_date_range
+from services.export_engine import ExportSheet, cursor_batches, stream_export, submit_export_job, workbook_response
 from openpyxl import Workbook
 from openpyxl.styles import Font, PatternFill, Alignment
 
@@ -33,7 +34,8 @@ async def get_all_payments(
     payment_type: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    loader: BatchLoader = Depends(get_batch_loader)
 ):
     """Get all payments (client and vendor) for finance dashboard."""
     if not has_finance_access(current_user.get("role", 6)):
@@ -48,9 +50,12 @@ async def get_all_payments(
             {"_id": 0}
         ).to_list(10000)
         
+        client_map = await loader.load_many("clients", [b.get("client_id") for b in bookings], projection={"name": 1})
+        stock_map = await loader.load_many("stocks", [b.get("stock_id") for b in bookings], projection={"symbol": 1})
+        
         for booking in bookings:
-            client = await db.clients.find_one({"id": booking["client_id"]}, {"_id": 0, "name": 1})
-            stock = await db.stocks.find_one({"id": booking["stock_id"]}, {"_id": 0, "symbol": 1})
+            client = client_map.get(booking["client_id"])
+            stock = stock_map.get(booking["stock_id"])
             
             for payment in booking.get("payments", []):
                 payment_date = payment.get("payment_date", "")
@@ -84,9 +89,12 @@ async def get_all_payments(
             {"_id": 0}
         ).to_list(10000)
         
+        vendor_map = await loader.load_many("clients", [p.get("vendor_id") for p in purchases], projection={"name": 1})
+        stock_map = await loader.load_many("stocks", [p.get("stock_id") for p in purchases], projection={"symbol": 1})
+        
         for purchase in purchases:
-            vendor = await db.clients.find_one({"id": purchase["vendor_id"]}, {"_id": 0, "name": 1})
-            stock = await db.stocks.find_one({"id": purchase["stock_id"]}, {"_id": 0, "symbol": 1})
+            vendor = vendor_map.get(purchase["vendor_id"])
+            stock = stock_map.get(purchase["stock_id"])
             
             for payment in purchase.get("payments", []):
                 payment_date = payment.get("payment_date", "")
@@ -241,7 +249,8 @@ async def update_refund_request(
 @router.get("/finance/tcs-payments")
 async def get_tcs_payments(
     financial_year: Optional[str] = None,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    loader: BatchLoader = Depends(get_batch_loader)
 ):
     """Get all vendor payments with TCS deducted."""
     if not has_finance_access(current_user.get("role", 6)):
@@ -256,13 +265,17 @@ async def get_tcs_payments(
     payments = await db.purchase_payments.find(query, {"_id": 0}).sort("payment_date", -1).to_list(1000)
     
     # Enrich with vendor details
+    vendor_map = await loader.load_many(
+        "clients", [p.get("vendor_id") for p in payments], projection={"name": 1, "pan_number": 1}
+    )
+    purchase_map = await loader.load_many(
+        "purchases", [p.get("purchase_id") for p in payments], projection={"stock_symbol": 1, "stock_name": 1}
+    )
+    
     enriched_payments = []
     for payment in payments:
-        vendor_id = payment.get("vendor_id")
-        purchase_id = payment.get("purchase_id")
-        
-        vendor = await db.clients.find_one({"id": vendor_id}, {"_id": 0, "name": 1, "pan_number": 1})
-        purchase = await db.purchases.find_one({"id": purchase_id}, {"_id": 0, "stock_symbol": 1, "stock_name": 1})
+        vendor = vendor_map.get(payment.get("vendor_id"))
+        purchase = purchase_map.get(payment.get("purchase_id"))
         
         enriched_payments.append({
             **payment,
@@ -278,7 +291,8 @@ async def get_tcs_payments(
 @router.get("/finance/tcs-summary")
 async def get_tcs_summary(
     financial_year: Optional[str] = None,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    loader: BatchLoader = Depends(get_batch_loader)
 ):
     """Get TCS summary grouped by vendor."""
     if not has_finance_access(current_user.get("role", 6)):
@@ -306,9 +320,13 @@ async def get_tcs_summary(
     results = await db.purchase_payments.aggregate(pipeline).to_list(1000)
     
     # Enrich with vendor details
+    vendor_map = await loader.load_many(
+        "clients", [r["_id"] for r in results], projection={"name": 1, "pan_number": 1}
+    )
+    
     summary = []
     for result in results:
-        vendor = await db.clients.find_one({"id": result["_id"]}, {"_id": 0, "name": 1, "pan_number": 1})
+        vendor = vendor_map.get(result["_id"])
         summary.append({
             "vendor_id": result["_id"],
             "vendor_name": vendor.get("name") if vendor else "Unknown",
@@ -477,13 +495,7 @@ async def get_employee_commissions(
     if status:
         query["employee_commission_status"] = status
     
-    if start_date:
-        query["created_at"] = {"$gte": start_date}
-    if end_date:
-        if "created_at" in query:
-            query["created_at"]["$lte"] = end_date
-        else:
-            query["created_at"] = {"$lte": end_date}
+    add_date_range(query, "created_at", start_date, end_date)
     
     bookings = await db.bookings.find(query, {"_id": 0}).sort("created_at", -1).to_list(5000)
     
@@ -793,77 +805,118 @@ async def update_bp_payment(
     return {"message": f"BP payment updated to {update_data.status}"}
 
 
+def _payment_rows_pipeline(
+    collection: str,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None
+) -> List[dict]:
+    """One row per embedded payment of bookings (client) or purchases (vendor)."""
+    date_filter = {}
+    if start_date:
+        date_filter["$gte"] = start_date
+    if end_date:
+        date_filter["$lte"] = end_date
+    
+    if collection == "bookings":
+        fields = {
+            "type": {"$literal": "client"},
+            "direction": {"$literal": "received"},
+            "entity_id": "$client_id",
+            "reference_number": {"$ifNull": ["$booking_number", ""]},
+        }
+    else:
+        fields = {
+            "type": {"$literal": "vendor"},
+            "direction": {"$literal": "sent"},
+            "entity_id": "$vendor_id",
+            "reference_number": {"$ifNull": ["$purchase_number", {"$toUpper": {"$substrCP": ["$id", 0, 8]}}]},
+        }
+    
+    pipeline = [
+        {"$match": {"payments": {"$exists": True, "$ne": []}}},
+        {"$unwind": "$payments"},
+    ]
+    if date_filter:
+        pipeline.append({"$match": {"payments.payment_date": date_filter}})
+    pipeline.append({"$project": {
+        "_id": 0,
+        **fields,
+        "stock_id": 1,
+        "amount": {"$ifNull": ["$payments.amount", 0]},
+        "payment_date": {"$ifNull": ["$payments.payment_date", ""]},
+        "notes": {"$ifNull": ["$payments.notes", ""]},
+        "recorded_by": {"$ifNull": ["$payments.recorded_by_name", ""]},
+    }})
+    return pipeline
+
+
 @router.get("/finance/export/excel")
 async def export_finance_excel(
     payment_type: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
-    current_user: dict = Depends(get_current_user)
+    background: bool = False,
+    current_user: dict = Depends(get_current_user),
+    loader: BatchLoader = Depends(get_batch_loader)
 ):
-    """Export finance data to Excel."""
+    """
+    Export finance data to Excel.
+    
+    Payments are unwound, filtered and sorted (newest first) in MongoDB and
+    streamed into the workbook; background=true runs the export as a job.
+    """
     if not has_finance_access(current_user.get("role", 6)):
         raise HTTPException(status_code=403, detail="Only PE Desk, PE Manager, or Finance can export finance data")
     
-    payments = await get_all_payments(payment_type, start_date, end_date, current_user)
-    
-    # Create workbook
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Payments Report"
-    
-    # Headers
-    headers = ["Date", "Type", "Direction", "Entity", "Reference", "Stock", "Amount", "Notes", "Recorded By"]
-    header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-    header_font = Font(bold=True, color="FFFFFF")
-    
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col, value=header)
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal="center")
-    
-    # Data rows
-    for row, payment in enumerate(payments, 2):
-        ws.cell(row=row, column=1, value=payment.get("payment_date", ""))
-        ws.cell(row=row, column=2, value=payment.get("type", "").title())
-        ws.cell(row=row, column=3, value=payment.get("direction", "").title())
-        ws.cell(row=row, column=4, value=payment.get("entity_name", ""))
-        ws.cell(row=row, column=5, value=payment.get("reference_number", ""))
-        ws.cell(row=row, column=6, value=payment.get("stock_symbol", ""))
-        ws.cell(row=row, column=7, value=payment.get("amount", 0))
-        ws.cell(row=row, column=8, value=payment.get("notes", ""))
-        ws.cell(row=row, column=9, value=payment.get("recorded_by", ""))
-    
-    # Adjust column widths
-    for col in ws.columns:
-        max_length = 0
-        column = col[0].column_letter
-        for cell in col:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except (TypeError, AttributeError):
-                pass
-        ws.column_dimensions[column].width = min(max_length + 2, 50)
-    
-    # Save to bytes
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
+    sheet = ExportSheet(
+        title="Payments Report",
+        headers=["Date", "Type", "Direction", "Entity", "Reference", "Stock", "Amount", "Notes", "Recorded By"],
+        header_fill="4472C4",
+        column_widths=[28, 10, 12, 30, 18, 14, 14, 40, 22]
+    )
+    
+    # Client payments come from bookings, vendor payments from purchases
+    sources = [name for name, kind in (("bookings", "client"), ("purchases", "vendor")) if payment_type in (None, kind)]
+    collection = db[sources[0] if sources else "bookings"]
+    pipeline = _payment_rows_pipeline(sources[0], start_date, end_date) if sources else [{"$match": {"_id": None}}]
+    for name in sources[1:]:
+        pipeline.append({"$unionWith": {"coll": name, "pipeline": _payment_rows_pipeline(name, start_date, end_date)}})
+    pipeline.append({"$sort": {"payment_date": -1}})
+    
+    async def to_rows(payments: List[dict]) -> List[list]:
+        entity_map = await loader.load_many("clients", [p.get("entity_id") for p in payments], projection={"name": 1})
+        stock_map = await loader.load_many("stocks", [p.get("stock_id") for p in payments], projection={"symbol": 1})
+        
+        rows = []
+        for payment in payments:
+            entity = entity_map.get(payment.get("entity_id"))
+            stock = stock_map.get(payment.get("stock_id"))
+            rows.append([
+                payment.get("payment_date", ""),
+                payment.get("type", "").title(),
+                payment.get("direction", "").title(),
+                entity["name"] if entity else "Unknown",
+                payment.get("reference_number", ""),
+                stock["symbol"] if stock else "Unknown",
+                payment.get("amount", 0),
+                payment.get("notes", ""),
+                payment.get("recorded_by", "")
+            ])
+        return rows
     
     filename = f"finance_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    batches = cursor_batches(collection.aggregate(pipeline, allowDiskUse=True), to_rows)
     
-    return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
-    )
+    if background:
+        return await submit_export_job("finance_payments", sheet, batches, "xlsx", filename, current_user)
+    return stream_export(sheet, batches, "xlsx", filename)
 
 
 @router.get("/finance/tcs-export")
 async def export_tcs_report(
     financial_year: Optional[str] = None,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    loader: BatchLoader = Depends(get_batch_loader)
 ):
     """
     Export TCS (Tax Collected at Source) report to Excel.
@@ -890,178 +943,177 @@ async def export_tcs_report(
     
     payments = await db.purchase_payments.find(query, {"_id": 0}).sort("payment_date", 1).to_list(10000)
     
-    # Create workbook
-    wb = Workbook()
-    
-    # ===== Sheet 1: TCS Summary by Vendor =====
-    ws_summary = wb.active
-    ws_summary.title = "TCS Summary"
-    
-    # Header styling
-    header_fill = PatternFill(start_color="F59E0B", end_color="F59E0B", fill_type="solid")  # Amber
-    header_font = Font(bold=True, color="000000")
-    subheader_fill = PatternFill(start_color="FEF3C7", end_color="FEF3C7", fill_type="solid")  # Light amber
-    
-    # Title row
-    ws_summary.merge_cells('A1:H1')
-    title_cell = ws_summary['A1']
-    title_cell.value = f"TCS COMPLIANCE REPORT - FY {financial_year}"
-    title_cell.font = Font(bold=True, size=14, color="000000")
-    title_cell.alignment = Alignment(horizontal="center")
-    title_cell.fill = PatternFill(start_color="FBBF24", end_color="FBBF24", fill_type="solid")
-    
-    # Generated on
-    ws_summary.merge_cells('A2:H2')
-    ws_summary['A2'].value = f"Generated on: {datetime.now().strftime('%d-%b-%Y %H:%M:%S')}"
-    ws_summary['A2'].alignment = Alignment(horizontal="center")
-    ws_summary['A2'].font = Font(italic=True)
-    
-    # TCS Rate info
-    ws_summary.merge_cells('A3:H3')
-    ws_summary['A3'].value = "TCS Rate: 0.1% under Section 194Q (applicable on payments exceeding ₹50 lakhs)"
-    ws_summary['A3'].alignment = Alignment(horizontal="center")
-    ws_summary['A3'].font = Font(italic=True, size=10)
-    
-    # Summary Headers (row 5)
-    summary_headers = ["S.No.", "Vendor Name", "PAN Number", "Total Payments (₹)", "TCS Collected (₹)", "No. of Transactions", "First Payment Date", "Last Payment Date"]
-    for col, header in enumerate(summary_headers, 1):
-        cell = ws_summary.cell(row=5, column=col, value=header)
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-    
-    # Aggregate by vendor
-    vendor_data = {}
-    for payment in payments:
-        vendor_id = payment.get("vendor_id")
-        if vendor_id not in vendor_data:
-            vendor_data[vendor_id] = {
-                "vendor_id": vendor_id,
-                "total_payments": 0,
-                "total_tcs": 0,
-                "payment_count": 0,
-                "first_date": payment.get("payment_date"),
-                "last_date": payment.get("payment_date")
-            }
+    vendor_map = await loader.load_many(
+        "clients", [p.get("vendor_id") for p in payments], projection={"name": 1, "pan_number": 1}
+    )
+    purchase_map = await loader.load_many(
+        "purchases", [p.get("purchase_id") for p in payments], projection={"purchase_number": 1, "stock_symbol": 1}
+    )
+    
+    # Build the workbook on an export thread, off the event loop
+    def build_workbook() -> Workbook:
+        wb = Workbook()
+        
+        # ===== Sheet 1: TCS Summary by Vendor =====
+        ws_summary = wb.active
+        ws_summary.title = "TCS Summary"
+        
+        # Header styling
+        header_fill = PatternFill(start_color="F59E0B", end_color="F59E0B", fill_type="solid")  # Amber
+        header_font = Font(bold=True, color="000000")
+        subheader_fill = PatternFill(start_color="FEF3C7", end_color="FEF3C7", fill_type="solid")  # Light amber
+        
+        # Title row
+        ws_summary.merge_cells('A1:H1')
+        title_cell = ws_summary['A1']
+        title_cell.value = f"TCS COMPLIANCE REPORT - FY {financial_year}"
+        title_cell.font = Font(bold=True, size=14, color="000000")
+        title_cell.alignment = Alignment(horizontal="center")
+        title_cell.fill = PatternFill(start_color="FBBF24", end_color="FBBF24", fill_type="solid")
+        
+        # Generated on
+        ws_summary.merge_cells('A2:H2')
+        ws_summary['A2'].value = f"Generated on: {datetime.now().strftime('%d-%b-%Y %H:%M:%S')}"
+        ws_summary['A2'].alignment = Alignment(horizontal="center")
+        ws_summary['A2'].font = Font(italic=True)
+        
+        # TCS Rate info
+        ws_summary.merge_cells('A3:H3')
+        ws_summary['A3'].value = "TCS Rate: 0.1% under Section 194Q (applicable on payments exceeding ₹50 lakhs)"
+        ws_summary['A3'].alignment = Alignment(horizontal="center")
+        ws_summary['A3'].font = Font(italic=True, size=10)
+        
+        # Summary Headers (row 5)
+        summary_headers = ["S.No.", "Vendor Name", "PAN Number", "Total Payments (₹)", "TCS Collected (₹)", "No. of Transactions", "First Payment Date", "Last Payment Date"]
+        for col, header in enumerate(summary_headers, 1):
+            cell = ws_summary.cell(row=5, column=col, value=header)
+            cell.fill = header_fill
+            cell.font = header_font
+            cell.alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
+        
+        # Aggregate by vendor
+        vendor_data = {}
+        for payment in payments:
+            vendor_id = payment.get("vendor_id")
+            if vendor_id not in vendor_data:
+                vendor_data[vendor_id] = {
+                    "vendor_id": vendor_id,
+                    "total_payments": 0,
+                    "total_tcs": 0,
+                    "payment_count": 0,
+                    "first_date": payment.get("payment_date"),
+                    "last_date": payment.get("payment_date")
+                }
+            
+            vendor_data[vendor_id]["total_payments"] += payment.get("amount", 0)
+            vendor_data[vendor_id]["total_tcs"] += payment.get("tcs_amount", 0)
+            vendor_data[vendor_id]["payment_count"] += 1
+            
+            # Track first and last dates
+            pdate = payment.get("payment_date", "")
+            if pdate < vendor_data[vendor_id]["first_date"]:
+                vendor_data[vendor_id]["first_date"] = pdate
+            if pdate > vendor_data[vendor_id]["last_date"]:
+                vendor_data[vendor_id]["last_date"] = pdate
         
-        vendor_data[vendor_id]["total_payments"] += payment.get("amount", 0)
-        vendor_data[vendor_id]["total_tcs"] += payment.get("tcs_amount", 0)
-        vendor_data[vendor_id]["payment_count"] += 1
+        # Fetch vendor details and write rows
+        row = 6
+        serial = 1
+        total_payments_sum = 0
+        total_tcs_sum = 0
+
+
+        for vendor_id, data in sorted(vendor_data.items(), key=lambda x: x[1]["total_tcs"], reverse=True):
+            vendor = vendor_map.get(vendor_id)
+            
+            ws_summary.cell(row=row, column=1, value=serial)
+            ws_summary.cell(row=row, column=2, value=vendor.get("name") if vendor else "Unknown")
+            ws_summary.cell(row=row, column=3, value=vendor.get("pan_number") if vendor else "N/A")
+            ws_summary.cell(row=row, column=4, value=round(data["total_payments"], 2))
+            ws_summary.cell(row=row, column=5, value=round(data["total_tcs"], 2))
+            ws_summary.cell(row=row, column=6, value=data["payment_count"])
+            ws_summary.cell(row=row, column=7, value=data["first_date"][:10] if data["first_date"] else "")
+            ws_summary.cell(row=row, column=8, value=data["last_date"][:10] if data["last_date"] else "")
+            
+            # Format numbers
+            ws_summary.cell(row=row, column=4).number_format = '#,##0.00'
+            ws_summary.cell(row=row, column=5).number_format = '#,##0.00'
+            
+            total_payments_sum += data["total_payments"]
+            total_tcs_sum += data["total_tcs"]
+            
+            row += 1
+            serial += 1
         
-        # Track first and last dates
-        pdate = payment.get("payment_date", "")
-        if pdate < vendor_data[vendor_id]["first_date"]:
-            vendor_data[vendor_id]["first_date"] = pdate
-        if pdate > vendor_data[vendor_id]["last_date"]:
-            vendor_data[vendor_id]["last_date"] = pdate
-    
-    # Fetch vendor details and write rows
-    row = 6
-    serial = 1
-    total_payments_sum = 0
-    total_tcs_sum = 0
-    
-    for vendor_id, data in sorted(vendor_data.items(), key=lambda x: x[1]["total_tcs"], reverse=True):
-        vendor = await db.clients.find_one({"id": vendor_id}, {"_id": 0, "name": 1, "pan_number": 1})
+        # Total row
+        total_row = row
+        ws_summary.cell(row=total_row, column=1, value="")
+        ws_summary.cell(row=total_row, column=2, value="TOTAL")
+        ws_summary.cell(row=total_row, column=3, value="")
+        ws_summary.cell(row=total_row, column=4, value=round(total_payments_sum, 2))
+        ws_summary.cell(row=total_row, column=5, value=round(total_tcs_sum, 2))
+        ws_summary.cell(row=total_row, column=6, value=len(payments))
         
-        ws_summary.cell(row=row, column=1, value=serial)
-        ws_summary.cell(row=row, column=2, value=vendor.get("name") if vendor else "Unknown")
-        ws_summary.cell(row=row, column=3, value=vendor.get("pan_number") if vendor else "N/A")
-        ws_summary.cell(row=row, column=4, value=round(data["total_payments"], 2))
-        ws_summary.cell(row=row, column=5, value=round(data["total_tcs"], 2))
-        ws_summary.cell(row=row, column=6, value=data["payment_count"])
-        ws_summary.cell(row=row, column=7, value=data["first_date"][:10] if data["first_date"] else "")
-        ws_summary.cell(row=row, column=8, value=data["last_date"][:10] if data["last_date"] else "")
+        for col in range(1, 9):
+            ws_summary.cell(row=total_row, column=col).fill = subheader_fill
+            ws_summary.cell(row=total_row, column=col).font = Font(bold=True)
+        ws_summary.cell(row=total_row, column=4).number_format = '#,##0.00'
+        ws_summary.cell(row=total_row, column=5).number_format = '#,##0.00'
         
-        # Format numbers
-        ws_summary.cell(row=row, column=4).number_format = '#,##0.00'
-        ws_summary.cell(row=row, column=5).number_format = '#,##0.00'
+        # Column widths for summary
+        summary_widths = [8, 35, 15, 22, 20, 18, 18, 18]
+        for i, width in enumerate(summary_widths, 1):
+            ws_summary.column_dimensions[chr(64 + i)].width = width
         
-        total_payments_sum += data["total_payments"]
-        total_tcs_sum += data["total_tcs"]
+        # ===== Sheet 2: Detailed TCS Transactions =====
+        ws_detail = wb.create_sheet(title="TCS Transactions")
         
-        row += 1
-        serial += 1
-    
-    # Total row
-    total_row = row
-    ws_summary.cell(row=total_row, column=1, value="")
-    ws_summary.cell(row=total_row, column=2, value="TOTAL")
-    ws_summary.cell(row=total_row, column=3, value="")
-    ws_summary.cell(row=total_row, column=4, value=round(total_payments_sum, 2))
-    ws_summary.cell(row=total_row, column=5, value=round(total_tcs_sum, 2))
-    ws_summary.cell(row=total_row, column=6, value=len(payments))
-    
-    for col in range(1, 9):
-        ws_summary.cell(row=total_row, column=col).fill = subheader_fill
-        ws_summary.cell(row=total_row, column=col).font = Font(bold=True)
-    ws_summary.cell(row=total_row, column=4).number_format = '#,##0.00'
-    ws_summary.cell(row=total_row, column=5).number_format = '#,##0.00'
-    
-    # Column widths for summary
-    summary_widths = [8, 35, 15, 22, 20, 18, 18, 18]
-    for i, width in enumerate(summary_widths, 1):
-        ws_summary.column_dimensions[chr(64 + i)].width = width
-    
-    # ===== Sheet 2: Detailed TCS Transactions =====
-    ws_detail = wb.create_sheet(title="TCS Transactions")
-    
-    detail_headers = ["S.No.", "Payment Date", "Vendor Name", "Vendor PAN", "Stock", "Purchase Ref", 
-                      "Payment Amount (₹)", "TCS Amount (₹)", "Net Payment (₹)", "FY Cumulative Before", "FY Cumulative After", "Reference #"]
-    
-    for col, header in enumerate(detail_headers, 1):
-        cell = ws_detail.cell(row=1, column=col, value=header)
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-    
-    # Detail rows
-    row = 2
-    for serial, payment in enumerate(payments, 1):
-        vendor_id = payment.get("vendor_id")
-        purchase_id = payment.get("purchase_id")
+        detail_headers = ["S.No.", "Payment Date", "Vendor Name", "Vendor PAN", "Stock", "Purchase Ref", 
+                          "Payment Amount (₹)", "TCS Amount (₹)", "Net Payment (₹)", "FY Cumulative Before", "FY Cumulative After", "Reference #"]
         
-        vendor = await db.clients.find_one({"id": vendor_id}, {"_id": 0, "name": 1, "pan_number": 1})
-        purchase = await db.purchases.find_one({"id": purchase_id}, {"_id": 0, "purchase_number": 1, "stock_symbol": 1})
+        for col, header in enumerate(detail_headers, 1):
+            cell = ws_detail.cell(row=1, column=col, value=header)
+            cell.fill = header_fill
+            cell.font = header_font
+            cell.alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
         
-        ws_detail.cell(row=row, column=1, value=serial)
-        ws_detail.cell(row=row, column=2, value=payment.get("payment_date", "")[:10] if payment.get("payment_date") else "")
-        ws_detail.cell(row=row, column=3, value=vendor.get("name") if vendor else "Unknown")
-        ws_detail.cell(row=row, column=4, value=vendor.get("pan_number") if vendor else "N/A")
-        ws_detail.cell(row=row, column=5, value=purchase.get("stock_symbol") if purchase else "N/A")
-        ws_detail.cell(row=row, column=6, value=purchase.get("purchase_number") if purchase else "N/A")
-        ws_detail.cell(row=row, column=7, value=round(payment.get("amount", 0), 2))
-        ws_detail.cell(row=row, column=8, value=round(payment.get("tcs_amount", 0), 2))
-        ws_detail.cell(row=row, column=9, value=round(payment.get("net_payment", 0), 2))
-        ws_detail.cell(row=row, column=10, value=round(payment.get("vendor_fy_cumulative_before", 0), 2))
-        ws_detail.cell(row=row, column=11, value=round(payment.get("vendor_fy_cumulative_after", 0), 2))
-        ws_detail.cell(row=row, column=12, value=payment.get("reference_number", ""))
+        # Detail rows
+        row = 2
+        for serial, payment in enumerate(payments, 1):
+            vendor = vendor_map.get(payment.get("vendor_id"))
+            purchase = purchase_map.get(payment.get("purchase_id"))
+            
+            ws_detail.cell(row=row, column=1, value=serial)
+            ws_detail.cell(row=row, column=2, value=payment.get("payment_date", "")[:10] if payment.get("payment_date") else "")
+            ws_detail.cell(row=row, column=3, value=vendor.get("name") if vendor else "Unknown")
+            ws_detail.cell(row=row, column=4, value=vendor.get("pan_number") if vendor else "N/A")
+            ws_detail.cell(row=row, column=5, value=purchase.get("stock_symbol") if purchase else "N/A")
+            ws_detail.cell(row=row, column=6, value=purchase.get("purchase_number") if purchase else "N/A")
+            ws_detail.cell(row=row, column=7, value=round(payment.get("amount", 0), 2))
+            ws_detail.cell(row=row, column=8, value=round(payment.get("tcs_amount", 0), 2))
+            ws_detail.cell(row=row, column=9, value=round(payment.get("net_payment", 0), 2))
+            ws_detail.cell(row=row, column=10, value=round(payment.get("vendor_fy_cumulative_before", 0), 2))
+            ws_detail.cell(row=row, column=11, value=round(payment.get("vendor_fy_cumulative_after", 0), 2))
+            ws_detail.cell(row=row, column=12, value=payment.get("reference_number", ""))
+            
+            # Format numbers
+            for c in [7, 8, 9, 10, 11]:
+                ws_detail.cell(row=row, column=c).number_format = '#,##0.00'
+            
+            row += 1
         
-        # Format numbers
-        for c in [7, 8, 9, 10, 11]:
-            ws_detail.cell(row=row, column=c).number_format = '#,##0.00'
+        # Column widths for detail
+        detail_widths = [8, 14, 35, 15, 12, 20, 18, 16, 16, 20, 20, 20]
+        for i, width in enumerate(detail_widths, 1):
+            ws_detail.column_dimensions[chr(64 + i) if i <= 26 else 'A' + chr(64 + i - 26)].width = width
         
-        row += 1
-    
-    # Column widths for detail
-    detail_widths = [8, 14, 35, 15, 12, 20, 18, 16, 16, 20, 20, 20]
-    for i, width in enumerate(detail_widths, 1):
-        ws_detail.column_dimensions[chr(64 + i) if i <= 26 else 'A' + chr(64 + i - 26)].width = width
-    
-    # Save to bytes
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
+        return wb
     
     # Parse FY for filename
     fy_short = financial_year.replace("-", "_") if financial_year else "current"
     filename = f"TCS_Report_FY{fy_short}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
     
-    return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
-    )
+    return await workbook_response(build_workbook, filename)
 
 
 # ==================== VENDOR TO PAY CALCULATIONS ====================
@@ -1120,6 +1172,7 @@ async def get_vendor_fy_cumulative(vendor_id: str, exclude_purchase_id: str = No
 async def get_vendor_to_pay_list(
     status: Optional[str] = Query(None, description="Filter by status"),
     current_user: dict = Depends(get_current_user),
+    loader: BatchLoader = Depends(get_batch_loader),
     _: None = Depends(require_permission("finance.view", "view vendor payments"))
 ):
     """
@@ -1141,15 +1194,22 @@ async def get_vendor_to_pay_list(
     result = []
     fy_start, fy_end, fy_label = get_current_fy_range()
     
+    vendor_map = await loader.load_many(
+        "clients", [p.get("vendor_id") for p in purchases], projection={"name": 1, "pan_number": 1, "dp_id": 1}
+    )
+    stock_map = await loader.load_many(
+        "stocks", [p.get("stock_id") for p in purchases], projection={"symbol": 1, "name": 1}
+    )
+    
     for purchase in purchases:
         vendor_id = purchase.get("vendor_id")
         stock_id = purchase.get("stock_id")
         
-        vendor = await db.clients.find_one({"id": vendor_id}, {"_id": 0, "name": 1, "pan_number": 1, "dp_id": 1})
+        vendor = vendor_map.get(vendor_id)
         if not vendor:
             continue
         
-        stock = await db.stocks.find_one({"id": stock_id}, {"_id": 0, "symbol": 1, "name": 1})
+        stock = stock_map.get(stock_id)
         
         price_per_unit = float(purchase.get("price_per_unit", 0))
         quantity = int(purchase.get("quantity", 0))
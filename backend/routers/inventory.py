@@ -2,7 +2,7 @@
 Inventory Router
 Handles inventory management endpoints
 """
-from typing import Optional
+from typing import Dict, List, Optional
 from datetime import datetime, timezone
 from fastapi import APIRouter, HTTPException, Depends, Query
 from pydantic import BaseModel
@@ -16,6 +16,9 @@ from services.permission_service import (
     is_pe_level
 )
 from utils.demo_isolation import add_demo_filter
+from services.batch_loader import BatchLoader, get_batch_loader
+from services.settings_cache import get_setting
+from services.search_index import search_ids
 
 logger = logging.getLogger(__name__)
 
@@ -66,12 +69,64 @@ async def calculate_weighted_avg_for_stock(stock_id: str) -> dict:
     }
 
 
+async def calculate_weighted_avg_for_stocks(
+    inventory_items: List[dict],
+    loader: BatchLoader
+) -> Dict[str, dict]:
+    """
+    Batched variant of calculate_weighted_avg_for_stock for a page of inventory rows.
+    
+    Purchase totals for every stock on the page are computed with a single
+    $group aggregation instead of one purchases query per row.
+    """
+    stock_ids = list({item.get("stock_id") for item in inventory_items if item.get("stock_id")})
+    if not stock_ids:
+        return {}
+    
+    totals = await loader.aggregate("purchases", [
+        {"$match": {"stock_id": {"$in": stock_ids}}},
+        {"$group": {
+            "_id": "$stock_id",
+            "total_quantity": {"$sum": {"$ifNull": ["$quantity", 0]}},
+            "total_purchase_value": {"$sum": {"$ifNull": ["$total_amount", 0]}}
+        }}
+    ])
+    totals_map = {t["_id"]: t for t in totals}
+    
+    result = {}
+    for item in inventory_items:
+        stock_id = item.get("stock_id")
+        if not stock_id:
+            continue
+        
+        total = totals_map.get(stock_id)
+        if not total:
+            # Fallback: Use stored inventory values if no purchases
+            result[stock_id] = {
+                "weighted_avg_price": item.get("weighted_avg_price", 0),
+                "total_value": item.get("total_value", 0)
+            }
+            continue
+        
+        total_quantity = total["total_quantity"]
+        weighted_avg = total["total_purchase_value"] / total_quantity if total_quantity > 0 else 0
+        total_value = item.get("available_quantity", 0) * weighted_avg
+        
+        result[stock_id] = {
+            "weighted_avg_price": round(weighted_avg, 2),
+            "total_value": round(total_value, 2)
+        }
+    
+    return result
+
+
 @router.get("")
 async def get_inventory(
     search: Optional[str] = None,
     skip: int = Query(0, ge=0),
     limit: int = Query(1000, ge=1, le=10000),
     current_user: dict = Depends(get_current_user),
+    loader: BatchLoader = Depends(get_batch_loader),
     _: None = Depends(require_permission("inventory.view", "view inventory"))
 ):
     """
@@ -93,19 +148,8 @@ async def get_inventory(
     query = add_demo_filter(query, current_user)
     
     # If search is provided, first find matching stock IDs
-    stock_filter = {}
     if search:
-        search_regex = {"$regex": search, "$options": "i"}
-        stock_filter = {"$or": [
-            {"symbol": search_regex},
-            {"name": search_regex},
-            {"isin": search_regex}
-        ]}
-    
-    # Get matching stock IDs
-    if stock_filter:
-        matching_stocks = await db.stocks.find(stock_filter, {"_id": 0, "id": 1}).to_list(10000)
-        matching_stock_ids = [s["id"] for s in matching_stocks]
+        matching_stock_ids = await search_ids("stocks", search, ["symbol", "name", "isin_number"], limit=10000)
         if matching_stock_ids:
             query["stock_id"] = {"$in": matching_stock_ids}
         else:
@@ -114,10 +158,9 @@ async def get_inventory(
     
     inventory = await db.inventory.find(query, {"_id": 0}).skip(skip).limit(limit).to_list(limit)
     
-    # Enrich with stock details
-    stock_ids = list(set(item.get("stock_id") for item in inventory if item.get("stock_id")))
-    stocks = await db.stocks.find({"id": {"$in": stock_ids}}, {"_id": 0}).to_list(1000)
-    stock_map = {s["id"]: s for s in stocks}
+    # Enrich with stock details and purchase-based pricing (batched per page)
+    stock_map = await loader.load_many("stocks", [item.get("stock_id") for item in inventory])
+    calc_map = await calculate_weighted_avg_for_stocks(inventory, loader)
     
     result = []
     for item in inventory:
@@ -132,7 +175,7 @@ async def get_inventory(
         item["stock_name"] = stock.get("name", "Unknown")
         
         # ALWAYS calculate weighted average dynamically from purchases
-        calc = await calculate_weighted_avg_for_stock(stock_id)
+        calc = calc_map[stock_id]
         
         # Get landing price (or default to WAP if not set)
         landing_price = item.get("landing_price")
@@ -549,7 +592,7 @@ async def send_consolidated_pe_report(
         raise HTTPException(status_code=400, detail="No valid inventory items found (all items have missing stock symbols)")
     
     # Get company master details
-    company = await db.company_master.find_one({"_id": "company_settings"}, {"_id": 0})
+    company = await get_setting("company")
     if not company:
         company = {
             "company_name": "SMIFS Private Equity",
@@ -818,6 +861,44 @@ async def recalculate_all_inventory(current_user: dict = Depends(get_current_use
     }
 
 
+@router.post("/reconcile")
+async def reconcile_inventory_ledger(
+    repair: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Verify the inventory ledger against a full recompute (PE Desk only).
+
+    With repair=false this only reports drift; with repair=true drifted stocks
+    are rebuilt from purchases and bookings. The same check runs on a schedule.
+    """
+    from services.permission_service import check_permission
+    from services.inventory_service import reconcile_inventory
+
+    await check_permission(current_user, "inventory.recalculate", "reconcile inventory")
+
+    summary = await reconcile_inventory(repair=repair, grace_seconds=0)
+
+    if repair and summary["repaired"]:
+        from services.audit_service import create_audit_log
+        await create_audit_log(
+            action="INVENTORY_RECONCILE",
+            entity_type="inventory",
+            entity_id="all",
+            user_id=current_user["id"],
+            user_name=current_user["name"],
+            user_role=current_user.get("role", 6),
+            entity_name="All Stocks",
+            details={
+                "checked": summary["checked"],
+                "drifted": summary["drifted"],
+                "repaired": summary["repaired"]
+            }
+        )
+
+    return summary
+
+
 
 # ========== DATA QUALITY ENDPOINTS ==========
 
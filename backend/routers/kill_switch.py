@@ -9,10 +9,12 @@ import uuid
 
 from database import db
 from routers.auth import get_current_user
+from services.settings_cache import get_setting, invalidate_setting
 from services.permission_service import (
     require_permission,
     is_pe_desk
 )
+from utils.dates import with_native_dates
 
 router = APIRouter(prefix="/kill-switch", tags=["Kill Switch"])
 
@@ -22,8 +24,8 @@ COOLDOWN_SECONDS = 180
 
 
 async def get_kill_switch_status():
-    """Get current kill switch status from database"""
-    status = await db.system_settings.find_one({"setting": "kill_switch"}, {"_id": 0})
+    """Get current kill switch status (settings cache, kept in sync with the database)"""
+    status = await get_setting("kill_switch")
     if not status:
         return {
             "is_active": False,
@@ -81,7 +83,8 @@ async def activate_kill_switch(
     if not is_pe_desk(current_user.get("role", 6)):
         raise HTTPException(status_code=403, detail="Only PE Desk can activate the kill switch")
     
-    # Check if already active
+    # Check if already active (re-read: another worker may have just changed it)
+    invalidate_setting("kill_switch")
     status = await get_kill_switch_status()
     if status.get("is_active"):
         raise HTTPException(status_code=400, detail="Kill switch is already active")
@@ -104,9 +107,11 @@ async def activate_kill_switch(
         {"$set": kill_switch_data},
         upsert=True
     )
+    # Other workers pick the change up from the settings change stream/poll
+    invalidate_setting("kill_switch")
     
     # Log the activation
-    await db.audit_logs.insert_one({
+    await db.audit_logs.insert_one(with_native_dates("audit_logs", {
         "id": str(uuid.uuid4()),
         "action": "KILL_SWITCH_ACTIVATED",
         "entity_type": "system",
@@ -119,7 +124,7 @@ async def activate_kill_switch(
             "cooldown_seconds": COOLDOWN_SECONDS
         },
         "timestamp": now.isoformat()
-    })
+    }))
     
     return {
         "message": "Kill switch activated - System is now frozen",
@@ -135,6 +140,7 @@ async def deactivate_kill_switch(current_user: dict = Depends(get_current_user))
     if not is_pe_desk(current_user.get("role", 6)):
         raise HTTPException(status_code=403, detail="Only PE Desk can deactivate the kill switch")
     
+    invalidate_setting("kill_switch")
     status = await get_kill_switch_status()
     
     if not status.get("is_active"):
@@ -161,9 +167,10 @@ async def deactivate_kill_switch(current_user: dict = Depends(get_current_user))
             "deactivated_by_name": current_user["name"]
         }}
     )
+    invalidate_setting("kill_switch")
     
     # Log the deactivation
-    await db.audit_logs.insert_one({
+    await db.audit_logs.insert_one(with_native_dates("audit_logs", {
         "id": str(uuid.uuid4()),
         "action": "KILL_SWITCH_DEACTIVATED",
         "entity_type": "system",
@@ -177,7 +184,7 @@ async def deactivate_kill_switch(current_user: dict = Depends(get_current_user))
             "reason_was": status.get("reason")
         },
         "timestamp": now.isoformat()
-    })
+    }))
     
     return {
         "message": "Kill switch deactivated - System is now operational",
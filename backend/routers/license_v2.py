@@ -321,9 +321,8 @@ async def check_usage_available(
     elif limit_type == "max_clients":
         current_count = await db.clients.count_documents({"status": {"$ne": "deleted"}})
     elif limit_type == "max_bookings_per_month":
-        from datetime import datetime, timedelta
-        month_start = datetime.now(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        current_count = await db.bookings.count_documents({"created_at": {"$gte": month_start.isoformat()}})
+        from utils.dates import date_range, ist_today
+        current_count = await db.bookings.count_documents(date_range("created_at", ist_today().replace(day=1)))
     elif limit_type == "max_fi_orders_per_month":
         from datetime import datetime, timedelta
         month_start = datetime.now(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
@@ -4,7 +4,7 @@ Handles purchase orders and vendor payments
 """
 from typing import List, Optional
 from datetime import datetime, timezone
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import uuid
@@ -19,11 +19,17 @@ from utils.auth import get_current_user
 from services.audit_service import create_audit_log
 from services.email_service import send_stock_transfer_request_email, send_email, get_email_template
 from services.contract_note_service import create_and_save_vendor_contract_note
+from services.dashboard_rollups import refresh_purchase_rollups
+from services.inventory_service import apply_purchase, reverse_purchase
+from services.settings_cache import get_setting
+from services.search_index import search_condition, search_ids
 from services.permission_service import (
     require_permission,
     is_pe_level
 )
+from utils.dates import with_native_dates
 from utils.demo_isolation import add_demo_filter, mark_as_demo
+from utils.pagination import keyset_query, keyset_sort, ndjson_response, set_next_cursor, wants_ndjson
 
 router = APIRouter(prefix="/purchases", tags=["Purchases"])
 
@@ -189,7 +195,11 @@ async def create_purchase(
     # Mark as demo data if created by demo user
     purchase_doc = mark_as_demo(purchase_doc, current_user)
     
-    await db.purchases.insert_one(purchase_doc)
+    # Add to the inventory ledger before the purchase becomes visible to recomputes
+    await apply_purchase(purchase_doc)
+    
+    await db.purchases.insert_one(with_native_dates("purchases", purchase_doc))
+    await refresh_purchase_rollups(purchase_id)
     
     await create_audit_log(
         action="PURCHASE_CREATE",
@@ -243,12 +253,16 @@ async def create_purchase(
 
 @router.get("", response_model=List[Purchase])
 async def get_purchases(
+    request: Request,
+    response: Response,
     status: Optional[str] = None,
     vendor_id: Optional[str] = None,
     stock_id: Optional[str] = None,
     search: Optional[str] = None,
     skip: int = Query(0, ge=0),
     limit: int = Query(1000, ge=1, le=10000),
+    cursor: Optional[str] = None,
+    format: Optional[str] = Query(None, description="ndjson to stream all rows as newline-delimited JSON"),
     current_user: dict = Depends(get_current_user),
     _: None = Depends(require_permission("purchases.view", "view purchases"))
 ):
@@ -256,8 +270,10 @@ async def get_purchases(
     
     Args:
         search: Search query to filter by vendor name, stock symbol, or purchase number
-        skip: Number of records to skip (for pagination)
+        skip: Number of records to skip (legacy offset pagination; prefer cursor)
         limit: Maximum number of records to return
+        cursor: Continuation token from the X-Next-Cursor header of the previous page
+        format: "ndjson" (or Accept: application/x-ndjson) streams every matching purchase
     """
     query = {}
     if status:
@@ -271,18 +287,15 @@ async def get_purchases(
     if search:
         search_regex = {"$regex": search, "$options": "i"}
         # Find matching vendor IDs
+        vendor_condition = await search_condition("clients", search, ["name"])
         matching_vendors = await db.clients.find(
-            {"name": search_regex, "is_vendor": True},
+            {"$and": [vendor_condition, {"is_vendor": True}]},
             {"_id": 0, "id": 1}
         ).to_list(1000)
         vendor_ids_match = [v["id"] for v in matching_vendors]
         
         # Find matching stock IDs
-        matching_stocks = await db.stocks.find(
-            {"symbol": search_regex},
-            {"_id": 0, "id": 1}
-        ).to_list(1000)
-        stock_ids_match = [s["id"] for s in matching_stocks]
+        stock_ids_match = await search_ids("stocks", search, ["symbol"])
         
         # Build search conditions
         search_conditions = [
@@ -304,63 +317,74 @@ async def get_purchases(
     # Demo users only see demo data, live users don't see demo data
     query = add_demo_filter(query, current_user)
     
-    purchases = await db.purchases.find(query, {"_id": 0}).sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
-    
-    if not purchases:
-        return []
-    
-    # Enrich with vendor and stock details
-    vendor_ids = list(set(p["vendor_id"] for p in purchases))
-    stock_ids = list(set(p["stock_id"] for p in purchases))
-    purchase_ids = [p["id"] for p in purchases]
+    query = keyset_query(query, cursor)
     
-    vendors = await db.clients.find({"id": {"$in": vendor_ids}}, {"_id": 0}).to_list(1000)
-    stocks = await db.stocks.find({"id": {"$in": stock_ids}}, {"_id": 0}).to_list(1000)
-    
-    # Get all payments for these purchases
-    all_payments = await db.purchase_payments.find(
-        {"purchase_id": {"$in": purchase_ids}},
-        {"_id": 0, "purchase_id": 1, "amount": 1}
-    ).to_list(10000)
-    
-    # Calculate total paid per purchase
-    payments_by_purchase = {}
-    for payment in all_payments:
-        pid = payment["purchase_id"]
-        if pid not in payments_by_purchase:
-            payments_by_purchase[pid] = 0
-        payments_by_purchase[pid] += payment.get("amount", 0)
-    
-    vendor_map = {v["id"]: v for v in vendors}
-    stock_map = {s["id"]: s for s in stocks}
-    
-    enriched_purchases = []
-    for p in purchases:
-        vendor = vendor_map.get(p["vendor_id"])
-        stock = stock_map.get(p["stock_id"])
+    async def to_rows(purchases: List[dict]) -> List[Purchase]:
+        # Enrich with vendor and stock details
+        vendor_ids = list(set(p["vendor_id"] for p in purchases))
+        stock_ids = list(set(p["stock_id"] for p in purchases))
+        purchase_ids = [p["id"] for p in purchases]
         
-        # Add vendor_name and stock_symbol if not present
-        p["vendor_name"] = p.get("vendor_name") or (vendor["name"] if vendor else "Unknown")
-        p["stock_symbol"] = p.get("stock_symbol") or (stock["symbol"] if stock else "Unknown")
+        vendors = await db.clients.find({"id": {"$in": vendor_ids}}, {"_id": 0}).to_list(1000)
+        stocks = await db.stocks.find({"id": {"$in": stock_ids}}, {"_id": 0}).to_list(1000)
         
-        # Calculate payment status
-        total_paid = round(payments_by_purchase.get(p["id"], 0), 2)
-        total_amount = round(p.get("total_amount", 0), 2)
+        # Get all payments for these purchases
+        all_payments = await db.purchase_payments.find(
+            {"purchase_id": {"$in": purchase_ids}},
+            {"_id": 0, "purchase_id": 1, "amount": 1}
+        ).to_list(10000)
         
-        p["total_paid"] = total_paid
-        p["total_amount"] = total_amount
-        p["price_per_share"] = round(p.get("price_per_share", 0), 2)
+        # Calculate total paid per purchase
+        payments_by_purchase = {}
+        for payment in all_payments:
+            pid = payment["purchase_id"]
+            if pid not in payments_by_purchase:
+                payments_by_purchase[pid] = 0
+            payments_by_purchase[pid] += payment.get("amount", 0)
         
-        if total_paid >= total_amount:
-            p["payment_status"] = "completed"
-        elif total_paid > 0:
-            p["payment_status"] = "partial"
-        else:
-            p["payment_status"] = "pending"
+        vendor_map = {v["id"]: v for v in vendors}
+        stock_map = {s["id"]: s for s in stocks}
+        
+        enriched_purchases = []
+        for p in purchases:
+            vendor = vendor_map.get(p["vendor_id"])
+            stock = stock_map.get(p["stock_id"])
+            
+            # Add vendor_name and stock_symbol if not present
+            p["vendor_name"] = p.get("vendor_name") or (vendor["name"] if vendor else "Unknown")
+            p["stock_symbol"] = p.get("stock_symbol") or (stock["symbol"] if stock else "Unknown")
+            
+            # Calculate payment status
+            total_paid = round(payments_by_purchase.get(p["id"], 0), 2)
+            total_amount = round(p.get("total_amount", 0), 2)
+            
+            p["total_paid"] = total_paid
+            p["total_amount"] = total_amount
+            p["price_per_share"] = round(p.get("price_per_share", 0), 2)
+            
+            if total_paid >= total_amount:
+                p["payment_status"] = "completed"
+            elif total_paid > 0:
+                p["payment_status"] = "partial"
+            else:
+                p["payment_status"] = "pending"
+            
+            enriched_purchases.append(Purchase(**p))
         
-        enriched_purchases.append(Purchase(**p))
+        return enriched_purchases
+    
+    if wants_ndjson(request, format):
+        return ndjson_response(db.purchases.find(query, {"_id": 0}).sort(keyset_sort()), to_rows)
+    
+    page = db.purchases.find(query, {"_id": 0}).sort(keyset_sort())
+    if skip and not cursor:
+        page = page.skip(skip)
+    purchases = await page.limit(limit).to_list(limit)
+    set_next_cursor(response, purchases, limit)
     
-    return enriched_purchases
+    if not purchases:
+        return []
+    return await to_rows(purchases)
 
 
 @router.get("/{purchase_id}/payments")
@@ -508,7 +532,7 @@ async def add_purchase_payment(
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     
-    await db.purchase_payments.insert_one(payment_doc)
+    await db.purchase_payments.insert_one(with_native_dates("purchase_payments", payment_doc))
     
     # Remove MongoDB _id from response
     payment_doc.pop("_id", None)
@@ -531,7 +555,7 @@ async def add_purchase_payment(
             {"_id": 0}
         )
         stock = await db.stocks.find_one({"id": purchase.get("stock_id")}, {"_id": 0})
-        company_master = await db.company_master.find_one({"_id": "company_settings"}, {"_id": 0})
+        company_master = await get_setting("company")
         
         if vendor and company_master:
             await send_stock_transfer_request_email(
@@ -574,7 +598,10 @@ async def delete_purchase(
             detail="Cannot delete purchase with existing payments. Delete payments first."
         )
     
+    await reverse_purchase(purchase)
+    
     await db.purchases.delete_one({"id": purchase_id})
+    await refresh_purchase_rollups(purchase_id)
     
     await create_audit_log(
         action="PURCHASE_DELETE",
@@ -700,48 +727,8 @@ async def mark_dp_received(
         }}
     )
     
-    # Update inventory - add received quantity and calculate weighted average price
-    stock = await db.stocks.find_one({"id": purchase.get("stock_id")}, {"_id": 0})
-    if stock:
-        new_quantity = purchase.get("quantity", 0)
-        new_total_value = purchase.get("total_amount", 0)
-        new_price_per_share = new_total_value / new_quantity if new_quantity > 0 else 0
-        
-        # Update inventory with received quantity and weighted average
-        inventory = await db.inventory.find_one({"stock_id": purchase.get("stock_id")}, {"_id": 0})
-        if inventory:
-            # Calculate new weighted average price
-            old_quantity = inventory.get("available_quantity", 0)
-            old_total_value = inventory.get("total_value", 0)
-            
-            # New totals
-            combined_quantity = old_quantity + new_quantity
-            combined_total_value = old_total_value + new_total_value
-            
-            # Weighted average price
-            weighted_avg_price = combined_total_value / combined_quantity if combined_quantity > 0 else 0
-            
-            await db.inventory.update_one(
-                {"stock_id": purchase.get("stock_id")},
-                {"$set": {
-                    "available_quantity": combined_quantity,
-                    "total_value": combined_total_value,
-                    "weighted_avg_price": round(weighted_avg_price, 2),
-                    "updated_at": datetime.now(timezone.utc).isoformat()
-                }}
-            )
-        else:
-            # Create new inventory record
-            weighted_avg_price = new_price_per_share
-            await db.inventory.insert_one({
-                "id": str(uuid.uuid4()),
-                "stock_id": purchase.get("stock_id"),
-                "available_quantity": new_quantity,
-                "blocked_quantity": 0,
-                "total_value": new_total_value,
-                "weighted_avg_price": round(weighted_avg_price, 2),
-                "created_at": datetime.now(timezone.utc).isoformat()
-            })
+    # Inventory already includes this purchase (added to the ledger when the
+    # purchase was created), so receiving the shares does not change the counters
     
     await create_audit_log(
         action="DP_RECEIVED",
@@ -764,6 +751,11 @@ async def mark_dp_received(
         {"_id": 0}
     )
     
+    stock = await db.stocks.find_one(
+        {"id": purchase.get("stock_id")},
+        {"_id": 0, "symbol": 1, "name": 1, "isin": 1}
+    ) if vendor and vendor.get("email") else None
+    
     if vendor and vendor.get("email"):
         template = await get_email_template("vendor_stock_received")
         
@@ -2,14 +2,14 @@
 Reports Router
 Handles P&L reports, exports (Excel, PDF), and financial reporting
 """
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime, timezone
 from fastapi import APIRouter, HTTPException, Depends, Query
 from fastapi.responses import StreamingResponse
 import io
 
 from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment
+from openpyxl.styles import Font, PatternFill
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
 from reportlab.lib.units import inch
@@ -24,6 +24,8 @@ from services.permission_service import (
     is_pe_level
 )
 from utils.demo_isolation import add_demo_filter
+from services.batch_loader import BatchLoader, get_batch_loader
+from services.export_engine import ExportSheet, cursor_batches, stream_export, submit_export_job
 
 router = APIRouter(prefix="/reports", tags=["Reports"])
 
@@ -34,7 +36,8 @@ async def get_pnl_report(
     end_date: Optional[str] = None,
     stock_id: Optional[str] = None,
     client_id: Optional[str] = None,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    loader: BatchLoader = Depends(get_batch_loader)
 ):
     """Get P&L report with optional filters"""
     query = {"status": {"$ne": "cancelled"}, "is_voided": {"$ne": True}}
@@ -56,6 +59,10 @@ async def get_pnl_report(
     
     bookings = await db.bookings.find(query, {"_id": 0}).to_list(10000)
     
+    # Resolve related entities in one query per collection
+    client_map = await loader.load_many("clients", [b.get("client_id") for b in bookings], projection={"name": 1})
+    stock_map = await loader.load_many("stocks", [b.get("stock_id") for b in bookings], projection={"symbol": 1, "name": 1})
+    
     # Calculate P&L
     total_revenue = 0
     total_cost = 0
@@ -74,8 +81,8 @@ async def get_pnl_report(
         total_cost += cost
         
         # Get related entities
-        client = await db.clients.find_one({"id": booking.get("client_id")}, {"_id": 0, "name": 1})
-        stock = await db.stocks.find_one({"id": booking.get("stock_id")}, {"_id": 0, "symbol": 1, "name": 1})
+        client = client_map.get(booking.get("client_id"))
+        stock = stock_map.get(booking.get("stock_id"))
         
         pnl_items.append({
             "booking_id": booking.get("id"),
@@ -110,9 +117,11 @@ async def export_pnl_excel(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     stock_id: Optional[str] = None,
-    current_user: dict = Depends(get_current_user)
+    background: bool = False,
+    current_user: dict = Depends(get_current_user),
+    loader: BatchLoader = Depends(get_batch_loader)
 ):
-    """Export P&L report to Excel"""
+    """Export P&L report to Excel (streamed; background=true runs it as a job)"""
     # Get P&L data
     query = {"status": {"$ne": "cancelled"}, "is_voided": {"$ne": True}}
     
@@ -126,85 +135,59 @@ async def export_pnl_excel(
     if stock_id:
         query["stock_id"] = stock_id
     
-    bookings = await db.bookings.find(query, {"_id": 0}).to_list(10000)
-    
-    # Create workbook
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "P&L Report"
-    
-    # Header style
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="064E3B", end_color="064E3B", fill_type="solid")
-    
-    # Headers
-    headers = ["Booking #", "Date", "Client", "Stock", "Qty", "Buy Price", "Sell Price", "Cost", "Revenue", "Profit/Loss"]
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = Alignment(horizontal="center")
+    sheet = ExportSheet(
+        title="P&L Report",
+        headers=["Booking #", "Date", "Client", "Stock", "Qty", "Buy Price", "Sell Price", "Cost", "Revenue", "Profit/Loss"],
+        column_widths=[18, 12, 30, 14, 8, 12, 12, 14, 14, 14]
+    )
     
-    # Data rows
-    total_revenue = 0
-    total_cost = 0
+    # Running totals for the summary row
+    totals = {"revenue": 0, "cost": 0}
     
-    for row_idx, booking in enumerate(bookings, 2):
-        client = await db.clients.find_one({"id": booking.get("client_id")}, {"_id": 0, "name": 1})
-        stock = await db.stocks.find_one({"id": booking.get("stock_id")}, {"_id": 0, "symbol": 1})
-        
-        qty = booking.get("quantity", 0)
-        buying = booking.get("buying_price", 0)
-        selling = booking.get("selling_price", 0)
-        cost = qty * buying
-        revenue = qty * selling
-        profit = revenue - cost
-        
-        total_revenue += revenue
-        total_cost += cost
+    async def to_rows(bookings: List[dict]) -> List[list]:
+        client_map = await loader.load_many("clients", [b.get("client_id") for b in bookings], projection={"name": 1})
+        stock_map = await loader.load_many("stocks", [b.get("stock_id") for b in bookings], projection={"symbol": 1})
         
-        ws.cell(row=row_idx, column=1, value=booking.get("booking_number", ""))
-        ws.cell(row=row_idx, column=2, value=booking.get("booking_date", ""))
-        ws.cell(row=row_idx, column=3, value=client.get("name") if client else "Unknown")
-        ws.cell(row=row_idx, column=4, value=stock.get("symbol") if stock else "Unknown")
-        ws.cell(row=row_idx, column=5, value=qty)
-        ws.cell(row=row_idx, column=6, value=buying)
-        ws.cell(row=row_idx, column=7, value=selling)
-        ws.cell(row=row_idx, column=8, value=cost)
-        ws.cell(row=row_idx, column=9, value=revenue)
-        ws.cell(row=row_idx, column=10, value=profit)
+        rows = []
+        for booking in bookings:
+            client = client_map.get(booking.get("client_id"))
+            stock = stock_map.get(booking.get("stock_id"))
+            
+            qty = booking.get("quantity", 0)
+            buying = booking.get("buying_price", 0)
+            selling = booking.get("selling_price", 0)
+            cost = qty * buying
+            revenue = qty * selling
+            profit = revenue - cost
+            
+            totals["revenue"] += revenue
+            totals["cost"] += cost
+            
+            rows.append([
+                booking.get("booking_number", ""),
+                booking.get("booking_date", ""),
+                client.get("name") if client else "Unknown",
+                stock.get("symbol") if stock else "Unknown",
+                qty,
+                buying,
+                selling,
+                cost,
+                revenue,
+                profit
+            ])
+        return rows
     
-    # Summary row
-    summary_row = len(bookings) + 3
-    ws.cell(row=summary_row, column=1, value="TOTALS").font = Font(bold=True)
-    ws.cell(row=summary_row, column=8, value=total_cost).font = Font(bold=True)
-    ws.cell(row=summary_row, column=9, value=total_revenue).font = Font(bold=True)
-    ws.cell(row=summary_row, column=10, value=total_revenue - total_cost).font = Font(bold=True)
-    
-    # Auto-adjust column widths
-    for column in ws.columns:
-        max_length = 0
-        column_letter = column[0].column_letter
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        ws.column_dimensions[column_letter].width = min(max_length + 2, 30)
-    
-    # Save to buffer
-    buffer = io.BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
+    def summary() -> List[list]:
+        # Blank row, then the totals
+        return [[], ["TOTALS", None, None, None, None, None, None,
+                     totals["cost"], totals["revenue"], totals["revenue"] - totals["cost"]]]
     
     filename = f"pnl_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    batches = cursor_batches(db.bookings.find(query, {"_id": 0}), to_rows)
     
-    return StreamingResponse(
-        buffer,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
-    )
+    if background:
+        return await submit_export_job("pnl", sheet, batches, "xlsx", filename, current_user, footer=summary)
+    return stream_export(sheet, batches, "xlsx", filename, footer=summary)
 
 
 @router.get("/export/pdf", dependencies=[Depends(require_permission("reports.export", "export P&L reports"))])
@@ -212,7 +195,8 @@ async def export_pnl_pdf(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     stock_id: Optional[str] = None,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    loader: BatchLoader = Depends(get_batch_loader)
 ):
     """Export P&L report to PDF"""
     # Get P&L data
@@ -256,10 +240,13 @@ async def export_pnl_pdf(
     # Table data
     table_data = [["Booking #", "Date", "Client", "Stock", "Qty", "P/L"]]
     
+    client_map = await loader.load_many("clients", [b.get("client_id") for b in bookings], projection={"name": 1})
+    stock_map = await loader.load_many("stocks", [b.get("stock_id") for b in bookings], projection={"symbol": 1})
+    
     total_profit = 0
     for booking in bookings:
-        client = await db.clients.find_one({"id": booking.get("client_id")}, {"_id": 0, "name": 1})
-        stock = await db.stocks.find_one({"id": booking.get("stock_id")}, {"_id": 0, "symbol": 1})
+        client = client_map.get(booking.get("client_id"))
+        stock = stock_map.get(booking.get("stock_id"))
         
         qty = booking.get("quantity", 0)
         profit = (booking.get("selling_price", 0) - booking.get("buying_price", 0)) * qty
@@ -312,7 +299,8 @@ async def export_pnl_pdf(
 @router.get("/client-portfolio/{client_id}", dependencies=[Depends(require_permission("reports.view", "view client portfolio"))])
 async def get_client_portfolio(
     client_id: str,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    loader: BatchLoader = Depends(get_batch_loader)
 ):
     """Get complete portfolio for a client"""
     client = await db.clients.find_one({"id": client_id}, {"_id": 0})
@@ -325,12 +313,14 @@ async def get_client_portfolio(
         {"_id": 0}
     ).to_list(10000)
     
+    stock_map = await loader.load_many("stocks", [b.get("stock_id") for b in bookings])
+    
     # Group by stock
     stock_holdings = {}
     for booking in bookings:
         stock_id = booking.get("stock_id")
         if stock_id not in stock_holdings:
-            stock = await db.stocks.find_one({"id": stock_id}, {"_id": 0})
+            stock = stock_map.get(stock_id)
             stock_holdings[stock_id] = {
                 "stock_id": stock_id,
                 "stock_symbol": stock.get("symbol") if stock else "Unknown",
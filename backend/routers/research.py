@@ -17,6 +17,7 @@ from services.permission_service import (
     require_permission,
     is_pe_level
 )
+from utils.dates import with_native_dates
 
 router = APIRouter(prefix="/research", tags=["Research"])
 
@@ -138,7 +139,7 @@ async def upload_research_report(
     await db.research_reports.insert_one(report)
     
     # Log audit
-    await db.audit_logs.insert_one({
+    await db.audit_logs.insert_one(with_native_dates("audit_logs", {
         "id": str(uuid.uuid4()),
         "action": "RESEARCH_REPORT_UPLOADED",
         "entity_type": "research_report",
@@ -152,7 +153,7 @@ async def upload_research_report(
             "file_name": file.filename
         },
         "timestamp": datetime.now(timezone.utc).isoformat()
-    })
+    }))
     
     return {
         "message": "Research report uploaded successfully",
@@ -228,7 +229,7 @@ async def delete_research_report(
     await db.research_reports.delete_one({"id": report_id})
     
     # Log audit
-    await db.audit_logs.insert_one({
+    await db.audit_logs.insert_one(with_native_dates("audit_logs", {
         "id": str(uuid.uuid4()),
         "action": "RESEARCH_REPORT_DELETED",
         "entity_type": "research_report",
@@ -241,7 +242,7 @@ async def delete_research_report(
             "stock_symbol": report.get("stock_symbol")
         },
         "timestamp": datetime.now(timezone.utc).isoformat()
-    })
+    }))
     
     return {"message": "Research report deleted successfully"}
 
@@ -304,7 +305,7 @@ Remember: This is for informational purposes only and should not be considered a
         response = await llm.send_message(msg)
         
         # Log the research query
-        await db.audit_logs.insert_one({
+        await db.audit_logs.insert_one(with_native_dates("audit_logs", {
             "id": str(uuid.uuid4()),
             "action": "AI_RESEARCH_QUERY",
             "entity_type": "ai_research",
@@ -317,7 +318,7 @@ Remember: This is for informational purposes only and should not be considered a
                 "stock_id": stock_id
             },
             "timestamp": datetime.now(timezone.utc).isoformat()
-        })
+        }))
         
         return {
             "response": response,
@@ -11,6 +11,9 @@ from database import db
 from utils.auth import get_current_user
 from config import ROLES
 from services.permission_service import require_permission, is_pe_level
+from services.batch_loader import BatchLoader, get_batch_loader
+from services.hierarchy_service import get_all_subordinates
+from utils.dates import add_date_range
 
 router = APIRouter(tags=["Revenue Dashboard"])
 
@@ -20,45 +23,15 @@ async def get_subordinate_user_ids(user_id: str, user_role: int) -> List[str]:
     
     Hierarchy:
     - PE Desk/Manager (1,2): Can see all users
-    - Zonal Manager (3): Can see Managers (4) and Employees (5) under them
-    - Manager (4): Can see Employees (5) under them
-    - Employee (5): Can only see themselves
+    - Everyone else: themselves plus everyone under them in the reports_to
+      hierarchy (materialized closure, see services.hierarchy_service)
     """
     if is_pe_level(user_role):
         # PE level can see all users
         all_users = await db.users.find({}, {"_id": 0, "id": 1}).to_list(10000)
         return [u["id"] for u in all_users]
     
-    subordinates = [user_id]  # Always include self
-    
-    if user_role == 3:  # Zonal Manager
-        # Get all managers under this zonal manager
-        managers = await db.users.find(
-            {"manager_id": user_id, "role": 4},
-            {"_id": 0, "id": 1}
-        ).to_list(1000)
-        manager_ids = [m["id"] for m in managers]
-        subordinates.extend(manager_ids)
-        
-        # Get all employees under these managers
-        if manager_ids:
-            employees = await db.users.find(
-                {"manager_id": {"$in": manager_ids}, "role": 5},
-                {"_id": 0, "id": 1}
-            ).to_list(10000)
-            subordinates.extend([e["id"] for e in employees])
-    
-    elif user_role == 4:  # Manager
-        # Get all employees under this manager
-        employees = await db.users.find(
-            {"manager_id": user_id, "role": 5},
-            {"_id": 0, "id": 1}
-        ).to_list(10000)
-        subordinates.extend([e["id"] for e in employees])
-    
-    # Role 5 (Employee) only sees themselves (already added)
-    
-    return list(set(subordinates))
+    return [user_id] + await get_all_subordinates(user_id)
 
 
 # ================== RP Revenue Dashboard ==================
@@ -113,13 +86,7 @@ async def get_rp_revenue_dashboard(
         "is_voided": {"$ne": True}
     }
     
-    if start_date:
-        booking_query["created_at"] = {"$gte": start_date}
-    if end_date:
-        if "created_at" in booking_query:
-            booking_query["created_at"]["$lte"] = end_date
-        else:
-            booking_query["created_at"] = {"$lte": end_date}
+    add_date_range(booking_query, "created_at", start_date, end_date)
     
     # Get bookings for these RPs
     bookings = await db.bookings.find(booking_query, {"_id": 0}).to_list(100000)
@@ -202,7 +169,8 @@ async def get_rp_bookings(
     rp_id: str,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    loader: BatchLoader = Depends(get_batch_loader)
 ):
     """Get detailed bookings for a specific RP."""
     user_role = current_user.get("role", 6)
@@ -225,25 +193,13 @@ async def get_rp_bookings(
         "is_voided": {"$ne": True}
     }
     
-    if start_date:
-        booking_query["created_at"] = {"$gte": start_date}
-    if end_date:
-        if "created_at" in booking_query:
-            booking_query["created_at"]["$lte"] = end_date
-        else:
-            booking_query["created_at"] = {"$lte": end_date}
+    add_date_range(booking_query, "created_at", start_date, end_date)
     
     bookings = await db.bookings.find(booking_query, {"_id": 0}).to_list(10000)
     
     # Enrich with client and stock details
-    client_ids = list(set(b.get("client_id") for b in bookings if b.get("client_id")))
-    stock_ids = list(set(b.get("stock_id") for b in bookings if b.get("stock_id")))
-    
-    clients = await db.clients.find({"id": {"$in": client_ids}}, {"_id": 0, "id": 1, "name": 1}).to_list(1000)
-    stocks = await db.stocks.find({"id": {"$in": stock_ids}}, {"_id": 0, "id": 1, "symbol": 1, "name": 1}).to_list(1000)
-    
-    client_map = {c["id"]: c for c in clients}
-    stock_map = {s["id"]: s for s in stocks}
+    client_map = await loader.load_many("clients", [b.get("client_id") for b in bookings], projection={"name": 1})
+    stock_map = await loader.load_many("stocks", [b.get("stock_id") for b in bookings], projection={"symbol": 1, "name": 1})
     
     enriched_bookings = []
     for b in bookings:
@@ -325,13 +281,7 @@ async def get_employee_revenue_dashboard(
         "is_voided": {"$ne": True}
     }
     
-    if start_date:
-        booking_query["created_at"] = {"$gte": start_date}
-    if end_date:
-        if "created_at" in booking_query:
-            booking_query["created_at"]["$lte"] = end_date
-        else:
-            booking_query["created_at"] = {"$lte": end_date}
+    add_date_range(booking_query, "created_at", start_date, end_date)
     
     # Get all bookings
     all_bookings = await db.bookings.find(booking_query, {"_id": 0}).to_list(100000)
@@ -437,7 +387,8 @@ async def get_employee_bookings(
     employee_id: str,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    loader: BatchLoader = Depends(get_batch_loader)
 ):
     """Get detailed bookings for a specific employee."""
     user_role = current_user.get("role", 6)
@@ -473,28 +424,16 @@ async def get_employee_bookings(
         "is_voided": {"$ne": True}
     }
     
-    if start_date:
-        booking_query["created_at"] = {"$gte": start_date}
-    if end_date:
-        if "created_at" in booking_query:
-            booking_query["created_at"]["$lte"] = end_date
-        else:
-            booking_query["created_at"] = {"$lte": end_date}
+    add_date_range(booking_query, "created_at", start_date, end_date)
     
     bookings = await db.bookings.find(booking_query, {"_id": 0}).to_list(10000)
     
-    # Get all client IDs from bookings for name lookup
-    all_client_ids = list(set(b.get("client_id") for b in bookings if b.get("client_id")))
-    all_clients = await db.clients.find(
-        {"id": {"$in": all_client_ids}},
-        {"_id": 0, "id": 1, "name": 1}
-    ).to_list(10000)
-    client_map = {c["id"]: c for c in all_clients}
+    # Get client names for all bookings (mapped clients are already known)
+    loader.prime("clients", clients, projection={"name": 1})
+    client_map = await loader.load_many("clients", [b.get("client_id") for b in bookings], projection={"name": 1})
     
     # Get stock details
-    stock_ids = list(set(b.get("stock_id") for b in bookings if b.get("stock_id")))
-    stocks = await db.stocks.find({"id": {"$in": stock_ids}}, {"_id": 0, "id": 1, "symbol": 1, "name": 1}).to_list(1000)
-    stock_map = {s["id"]: s for s in stocks}
+    stock_map = await loader.load_many("stocks", [b.get("stock_id") for b in bookings], projection={"symbol": 1, "name": 1})
     
     enriched_bookings = []
     for b in bookings:
@@ -555,7 +494,7 @@ async def get_my_team(current_user: dict = Depends(get_current_user)):
             "email": member.get("email"),
             "role": member.get("role"),
             "role_name": ROLES.get(member.get("role", 6), "Unknown"),
-            "manager_id": member.get("manager_id")
+            "manager_id": member.get("reports_to")
         })
     
     return {
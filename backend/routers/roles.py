@@ -15,6 +15,7 @@ from services.permission_service import (
     require_permission,
     is_pe_desk
 )
+from services.auth_cache import invalidate_role
 
 router = APIRouter(prefix="/roles", tags=["Roles"])
 
@@ -493,6 +494,7 @@ async def create_role(
     }
     
     await db.roles.insert_one(new_role)
+    invalidate_role(next_id)
     
     # Remove _id before returning
     new_role.pop("_id", None)
@@ -531,6 +533,7 @@ async def update_role(
     if existing:
         # Update existing record
         await db.roles.update_one({"id": role_id}, {"$set": update_data})
+        invalidate_role(role_id)
         updated = await db.roles.find_one({"id": role_id}, {"_id": 0})
     else:
         # Create new record for system role customization
@@ -541,6 +544,7 @@ async def update_role(
             
             new_record = {**default_role, **update_data}
             await db.roles.insert_one(new_record)
+            invalidate_role(role_id)
             updated = await db.roles.find_one({"id": role_id}, {"_id": 0})
         else:
             raise HTTPException(status_code=404, detail="Role not found")
@@ -569,6 +573,7 @@ async def delete_role(
     result = await db.roles.delete_one({"id": role_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Role not found")
+    invalidate_role(role_id)
     
     return {"message": "Role deleted successfully"}
 
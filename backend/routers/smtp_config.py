@@ -11,6 +11,7 @@ import smtplib
 from database import db
 from routers.auth import get_current_user
 from services.permission_service import require_permission
+from services.settings_cache import invalidate_setting
 
 router = APIRouter(prefix="/email-config", tags=["Email Configuration"])
 
@@ -169,6 +170,7 @@ async def update_smtp_config(
     else:
         update_data["created_at"] = datetime.now(timezone.utc).isoformat()
         await db.smtp_settings.insert_one(update_data)
+    invalidate_setting("smtp")
     
     return {"message": "SMTP configuration updated successfully", "is_configured": True}
 
@@ -12,62 +12,18 @@ from database import db
 from routers.auth import get_current_user
 from models import Stock, StockCreate, CorporateAction, CorporateActionCreate
 from services.email_service import send_email
+from services.inventory_service import update_inventory
+from services.search_index import and_search, refresh_search_index, search_condition
 from services.permission_service import (
     require_permission,
     is_pe_desk
 )
 from utils.demo_isolation import add_demo_filter, mark_as_demo, require_demo_access
+from utils.dates import with_native_dates
 
 router = APIRouter(tags=["Stocks"])
 
 
-# ============== Helper Functions ==============
-async def update_inventory(stock_id: str):
-    """Recalculate weighted average and available quantity for a stock."""
-    purchases = await db.purchases.find({"stock_id": stock_id}, {"_id": 0}).to_list(10000)
-    bookings = await db.bookings.find({"stock_id": stock_id}, {"_id": 0}).to_list(10000)
-    
-    total_purchased_qty = sum(p["quantity"] for p in purchases)
-    total_purchased_value = sum(p["quantity"] * p["price_per_unit"] for p in purchases)
-    
-    blocked_qty = sum(
-        b["quantity"] for b in bookings 
-        if b.get("approval_status") == "approved" 
-        and b.get("client_confirmed") == True
-        and not b.get("is_voided", False)
-        and not b.get("stock_transferred", False)
-    )
-    
-    transferred_qty = sum(
-        b["quantity"] for b in bookings 
-        if b.get("stock_transferred") == True
-        and not b.get("is_voided", False)
-    )
-    
-    available_qty = total_purchased_qty - transferred_qty - blocked_qty
-    weighted_avg = total_purchased_value / total_purchased_qty if total_purchased_qty > 0 else 0
-    
-    stock = await db.stocks.find_one({"id": stock_id}, {"_id": 0})
-    
-    inventory_data = {
-        "stock_id": stock_id,
-        "stock_symbol": stock["symbol"] if stock else "Unknown",
-        "stock_name": stock["name"] if stock else "Unknown",
-        "available_quantity": max(0, available_qty),
-        "blocked_quantity": blocked_qty,
-        "weighted_avg_price": weighted_avg,
-        "total_value": max(0, available_qty) * weighted_avg
-    }
-    
-    await db.inventory.update_one(
-        {"stock_id": stock_id},
-        {"$set": inventory_data},
-        upsert=True
-    )
-    
-    return inventory_data
-
-
 # ============== Stock Endpoints ==============
 @router.post("/stocks", response_model=Stock)
 async def create_stock(
@@ -99,6 +55,7 @@ async def create_stock(
     stock_doc = mark_as_demo(stock_doc, current_user)
     
     await db.stocks.insert_one(stock_doc)
+    await refresh_search_index("stocks", [stock_id])
     await update_inventory(stock_id)
     
     return Stock(**stock_doc)
@@ -125,17 +82,9 @@ async def get_stocks(
     
     # Server-side search filter
     if search:
-        search_regex = {"$regex": search, "$options": "i"}
-        search_conditions = [
-            {"symbol": search_regex},
-            {"name": search_regex},
-            {"isin_number": search_regex},
-            {"sector": search_regex}
-        ]
-        if "$and" not in query:
-            query = {"$and": [query, {"$or": search_conditions}]} if query else {"$or": search_conditions}
-        else:
-            query["$and"].append({"$or": search_conditions})
+        query = and_search(query, await search_condition(
+            "stocks", search, ["symbol", "name", "isin_number", "sector"]
+        ))
     
     # CRITICAL: Add demo data isolation filter
     # Demo users only see demo data, live users don't see demo data
@@ -185,6 +134,7 @@ async def update_stock(
     }
     
     await db.stocks.update_one({"id": stock_id}, {"$set": update_data})
+    await refresh_search_index("stocks", [stock_id])
     updated = await db.stocks.find_one({"id": stock_id}, {"_id": 0})
     return Stock(**updated)
 
@@ -246,6 +196,7 @@ async def bulk_upload_stocks(
             }
             
             await db.stocks.insert_one(stock_doc)
+            await refresh_search_index("stocks", [stock_doc["id"]])
             await update_inventory(stock_doc["id"])
             created += 1
         
@@ -324,7 +275,7 @@ async def create_corporate_action(
     await db.corporate_actions.insert_one(action_doc)
     
     # Log the action
-    await db.audit_logs.insert_one({
+    await db.audit_logs.insert_one(with_native_dates("audit_logs", {
         "id": str(uuid.uuid4()),
         "action": "CORPORATE_ACTION_CREATED",
         "entity_type": "corporate_action",
@@ -337,7 +288,7 @@ async def create_corporate_action(
             "record_date": action_data.record_date
         },
         "timestamp": datetime.now(timezone.utc).isoformat()
-    })
+    }))
     
     return CorporateAction(**action_doc)
 
@@ -504,7 +455,7 @@ async def send_corporate_action_notifications(
     background_tasks.add_task(notify_clients_for_corporate_action, action_id)
     
     # Log the action
-    await db.audit_logs.insert_one({
+    await db.audit_logs.insert_one(with_native_dates("audit_logs", {
         "id": str(uuid.uuid4()),
         "action": "CORPORATE_ACTION_NOTIFICATION_SENT",
         "entity_type": "corporate_action",
@@ -516,7 +467,7 @@ async def send_corporate_action_notifications(
             "action_type": action["action_type"]
         },
         "timestamp": datetime.now(timezone.utc).isoformat()
-    })
+    }))
     
     return {"message": "Notifications are being sent to clients", "action_id": action_id}
 
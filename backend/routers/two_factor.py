@@ -18,6 +18,7 @@ from utils.auth import get_current_user, verify_password
 from services.totp_service import TwoFactorManager, TOTPService, BackupCodeService
 from services.audit_service import create_audit_log
 from services.permission_service import is_pe_level
+from services.auth_cache import invalidate_user
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/auth/2fa", tags=["Two-Factor Authentication"])
@@ -120,6 +121,7 @@ async def enable_2fa(
             }
         }
     )
+    invalidate_user(current_user["id"])
     
     logger.info(f"2FA setup initiated for user {current_user['id']}")
     
@@ -181,6 +183,7 @@ async def verify_2fa_setup(
             }
         }
     )
+    invalidate_user(current_user["id"])
     
     # Create audit log
     await create_audit_log(
@@ -252,6 +255,7 @@ async def verify_2fa_code(
             }
         }
     )
+    invalidate_user(current_user["id"])
     
     logger.info(f"2FA code verified for user {current_user['id']}")
     
@@ -320,6 +324,7 @@ async def use_backup_code(
             }
         }
     )
+    invalidate_user(current_user["id"])
     
     # Log successful use
     await create_audit_log(
@@ -380,6 +385,7 @@ async def regenerate_backup_codes(
             }
         }
     )
+    invalidate_user(current_user["id"])
     
     # Log regeneration
     await create_audit_log(
@@ -438,6 +444,7 @@ async def disable_2fa(
             }
         }
     )
+    invalidate_user(current_user["id"])
     
     # Log disabling
     await create_audit_log(
@@ -18,6 +18,12 @@ from services.permission_service import (
     is_pe_desk,
     get_user_visibility_filter
 )
+from services.hierarchy_service import (
+    check_hierarchy_closure,
+    remove_from_hierarchy_closure,
+    update_hierarchy_closure
+)
+from services.auth_cache import invalidate_user
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
@@ -210,6 +216,8 @@ async def create_user(
     }
     
     await db.users.insert_one(user_doc)
+    if user_data.reports_to:
+        await update_hierarchy_closure(user_id, user_data.reports_to)
     
     return {
         "message": "User created successfully",
@@ -308,6 +316,9 @@ async def update_user(
         update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
         update_data["updated_by"] = current_user["id"]
         await db.users.update_one({"id": user_id}, {"$set": update_data})
+        invalidate_user(user_id)
+        if "reports_to" in update_data:
+            await update_hierarchy_closure(user_id, update_data["reports_to"])
     
     return {"message": "User updated successfully"}
 
@@ -356,6 +367,8 @@ async def update_user_hierarchy(
         update_data["reports_to"] = None
     
     await db.users.update_one({"id": user_id}, {"$set": update_data})
+    invalidate_user(user_id)
+    await update_hierarchy_closure(user_id, update_data["reports_to"])
     
     return {"message": "User hierarchy updated successfully"}
 
@@ -366,6 +379,16 @@ async def get_hierarchy_levels(current_user: dict = Depends(get_current_user)):
     return [{"level": k, "name": v} for k, v in HIERARCHY_LEVELS.items()]
 
 
+@router.get("/hierarchy/closure-check")
+async def check_hierarchy_consistency(
+    repair: bool = False,
+    current_user: dict = Depends(get_current_user),
+    _: None = Depends(require_permission("users.edit", "check hierarchy consistency"))
+):
+    """Compare the materialized hierarchy closure with reports_to links; optionally repair it"""
+    return await check_hierarchy_closure(repair=repair)
+
+
 @router.get("/hierarchy/potential-managers")
 async def get_potential_managers(
     current_user: dict = Depends(get_current_user),
@@ -464,6 +487,7 @@ async def update_user_role(
     result = await db.users.update_one({"id": user_id}, {"$set": {"role": role}})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    invalidate_user(user_id)
     
     role_name = await get_role_name(role)
     return {"message": f"User role updated to {role_name} successfully"}
@@ -489,6 +513,8 @@ async def delete_user(
         raise HTTPException(status_code=400, detail="Cannot delete your own account")
     
     await db.users.delete_one({"id": user_id})
+    invalidate_user(user_id)
+    await remove_from_hierarchy_closure(user_id)
     
     return {"message": f"User {user.get('name')} deleted successfully"}
 
@@ -520,6 +546,7 @@ async def reset_user_password(
             "password_reset_by": current_user["id"]
         }}
     )
+    invalidate_user(user_id)
     
     return {"message": f"Password reset successfully for {user.get('name')}"}
 
@@ -584,6 +611,8 @@ async def assign_manager(user_id: str, manager_id: Optional[str] = None, current
             {"id": user_id},
             {"$set": {"reports_to": None}, "$unset": {"manager_id": ""}}
         )
+        invalidate_user(user_id)
+        await update_hierarchy_closure(user_id, None)
         return {"message": f"Manager assignment removed for {user['name']}"}
     
     # Get the manager
@@ -614,6 +643,8 @@ async def assign_manager(user_id: str, manager_id: Optional[str] = None, current
         {"id": user_id},
         {"$set": {"reports_to": manager_id, "manager_id": manager_id}}
     )
+    invalidate_user(user_id)
+    await update_hierarchy_closure(user_id, manager_id)
     
     return {
         "message": f"{user['name']} now reports to {manager['name']}",
@@ -15,6 +15,7 @@ from database import db
 from utils.auth import get_current_user
 from services.permission_service import require_permission
 from services.audit_service import create_audit_log
+from services.settings_cache import invalidate_setting, settings_cache
 
 router = APIRouter(prefix="/whatsapp", tags=["WhatsApp Notifications"])
 logger = logging.getLogger(__name__)
@@ -447,8 +448,8 @@ async def get_wati_service() -> Optional[WatiService]:
     Uses hardcoded defaults if no database config exists.
     Database config can override defaults.
     """
-    # Try to get from database first
-    config = await db.system_config.find_one({"config_type": "whatsapp"})
+    # Try the database config first (via the settings cache)
+    config = await settings_cache.peek("whatsapp")
     
     # Use database values if present and not empty, otherwise use hardcoded defaults
     if config:
@@ -533,11 +534,13 @@ async def test_wati_connection(
                 "last_test": datetime.now(timezone.utc).isoformat()
             }}
         )
+        invalidate_setting("whatsapp")
     else:
         await db.system_config.update_one(
             {"config_type": "whatsapp"},
             {"$set": {"status": "disconnected", "last_error": result.get("message")}}
         )
+        invalidate_setting("whatsapp")
     
     return result
 
@@ -591,6 +594,7 @@ async def save_wati_config(
         }},
         upsert=True
     )
+    invalidate_setting("whatsapp")
     
     await create_audit_log(
         action="WHATSAPP_WATI_CONNECTED",
@@ -624,6 +628,7 @@ async def disconnect_whatsapp(
             "disconnected_at": datetime.now(timezone.utc).isoformat()
         }}
     )
+    invalidate_setting("whatsapp")
     
     await create_audit_log(
         action="WHATSAPP_DISCONNECTED",
@@ -1503,7 +1508,7 @@ async def get_webhook_info(
     Returns the webhook URL and setup instructions.
     """
     # Get the custom domain from company master or use frontend URL
-    company_master = await db.company_master.find_one({"_id": "company_settings"})
+    company_master = await settings_cache.peek("company")
     base_url = None
     
     if company_master and company_master.get("custom_domain"):
@@ -0,0 +1,197 @@
+"""
+Security Middleware Micro-benchmark
+Measures per-request overhead of the security policies in two layouts:
+
+- before: one BaseHTTPMiddleware layer per policy (kill switch, bot protection,
+  request validation, rate limit, security headers, auth no-cache), with the
+  attack/bot pattern lists matched one re.search at a time
+- after:  SecurityPipelineMiddleware (single raw-ASGI pass, combined patterns)
+
+Requests are driven straight through the ASGI interface (no network, no
+client library) against a trivial endpoint, so the numbers are middleware
+cost only. Paths stay outside /api so the kill switch does not need MongoDB.
+
+Run from the backend directory:
+    python -m scripts.benchmark_security_pipeline [--requests 5000]
+"""
+import argparse
+import asyncio
+import os
+import re
+import time
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "benchmark")
+
+from starlette.applications import Starlette
+from starlette.datastructures import QueryParams
+from starlette.middleware import Middleware
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from middleware.bot_protection import AttackDetector, BotDetector, check_bot_protection
+from middleware.kill_switch import check_kill_switch
+from middleware.security import (
+    InputSanitizer, check_rate_limit, check_request_validation, get_client_ip, response_security_headers
+)
+from middleware.security_pipeline import SecurityPipelineMiddleware
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+
+
+async def endpoint(request):
+    return JSONResponse({"ok": True})
+
+
+# ============== "Before": one layer per policy ==============
+class KillSwitchLayer(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        return await check_kill_switch(request.url.path, request.headers.get("authorization")) or await call_next(request)
+
+
+class BotProtectionLayer(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        blocked = await check_bot_protection(
+            path=request.url.path,
+            full_url=str(request.url),
+            query_string=str(request.query_params) if request.query_params else "",
+            client_ip=get_client_ip(request.headers, request.client),
+            user_agent=request.headers.get("user-agent", ""),
+            authorization=request.headers.get("authorization", ""),
+        )
+        return blocked or await call_next(request)
+
+
+class RequestValidationLayer(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        invalid = check_request_validation(request.url.path, request.headers.get("content-length"), request.query_params)
+        return invalid or await call_next(request)
+
+
+class RateLimitLayer(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        limited = check_rate_limit(get_client_ip(request.headers, request.client), request.url.path)
+        return limited or await call_next(request)
+
+
+class SecurityHeadersLayer(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        response = await call_next(request)
+        response.headers.update(response_security_headers(request.url.path))
+        return response
+
+
+class NoCacheAuthLayer(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        response = await call_next(request)
+        path = request.url.path.lower()
+        if '/auth/' in path or '/register' in path or '/login' in path:
+            response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
+        return response
+
+
+def legacy_app():
+    # Starlette applies the list outermost-first, matching the old add_middleware order
+    return Starlette(routes=[Route("/bench", endpoint)], middleware=[
+        Middleware(KillSwitchLayer),
+        Middleware(BotProtectionLayer),
+        Middleware(RequestValidationLayer),
+        Middleware(RateLimitLayer),
+        Middleware(SecurityHeadersLayer),
+        Middleware(NoCacheAuthLayer),
+    ])
+
+
+def pipeline_app():
+    return Starlette(routes=[Route("/bench", endpoint)], middleware=[Middleware(SecurityPipelineMiddleware)])
+
+
+# ============== Driver ==============
+async def drive(app, n: int) -> float:
+    """Send n GET requests through the ASGI app; return seconds per request."""
+    query = b"page=2&search=reliance+industries&sort=created_at"
+
+    async def one(i: int):
+        sent = [{"type": "http.request", "body": b"", "more_body": False}]
+
+        async def receive():
+            if sent:
+                return sent.pop()
+            await asyncio.Event().wait()
+
+        async def send(message):
+            pass
+
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": "GET", "scheme": "http", "server": ("bench", 80),
+            "path": "/bench", "raw_path": b"/bench", "root_path": "", "query_string": query,
+            # A distinct client per request keeps the rate limiter out of the way
+            "headers": [(b"user-agent", USER_AGENT.encode()), (b"x-forwarded-for", f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}".encode())],
+            "client": ("127.0.0.1", 5000),
+        }
+        await app(scope, receive, send)
+
+    for i in range(min(200, n)):  # warm up
+        await one(i)
+    start = time.perf_counter()
+    for i in range(n):
+        await one(n + i)
+    return (time.perf_counter() - start) / n
+
+
+def pattern_benchmark(n: int):
+    """Per-request pattern matching cost: per-pattern loops vs combined sets."""
+    path = "/api/bookings/7f3c2a10-5b7e-4c1d-9d8e-1a2b3c4d5e6f/payments"
+    url = f"http://bench{path}?page=2&search=reliance+industries"
+    query = str(QueryParams("page=2&search=reliance+industries"))
+    checks = [
+        (BotDetector.BOT_USER_AGENTS, USER_AGENT.lower()),
+        (AttackDetector.PATH_TRAVERSAL_PATTERNS, path),
+        (AttackDetector.DIRECTORY_ENUM_PATTERNS, path),
+        (AttackDetector.COMMAND_INJECTION_PATTERNS, url),
+        (AttackDetector.FILE_INCLUSION_PATTERNS, url),
+        (AttackDetector.SSRF_PATTERNS, query),
+        (InputSanitizer.SQL_INJECTION_PATTERNS, "reliance industries"),
+        (InputSanitizer.XSS_PATTERNS, "reliance industries"),
+    ]
+
+    start = time.perf_counter()
+    for _ in range(n):
+        for patterns, value in checks:
+            any(re.search(p, value, re.IGNORECASE) for p in patterns)
+    before = (time.perf_counter() - start) / n
+
+    start = time.perf_counter()
+    for _ in range(n):
+        BotDetector.is_bot(USER_AGENT)
+        AttackDetector.detect_path_traversal(path)
+        AttackDetector.detect_directory_enumeration(path)
+        AttackDetector.detect_command_injection(url)
+        AttackDetector.detect_file_inclusion(url)
+        AttackDetector.detect_ssrf(query)
+        InputSanitizer.detect_sql_injection("reliance industries")
+        InputSanitizer.detect_xss("reliance industries")
+    after = (time.perf_counter() - start) / n
+    return before, after
+
+
+async def main(n: int):
+    before = await drive(legacy_app(), n)
+    after = await drive(pipeline_app(), n)
+    patterns_before, patterns_after = pattern_benchmark(n)
+
+    print(f"Requests per layout: {n}")
+    print(f"  six BaseHTTPMiddleware layers : {before * 1e6:8.1f} us/request")
+    print(f"  SecurityPipelineMiddleware    : {after * 1e6:8.1f} us/request  ({before / after:.1f}x)")
+    print("Pattern matching only:")
+    print(f"  per-pattern re.search loops   : {patterns_before * 1e6:8.1f} us/request")
+    print(f"  combined PatternSets          : {patterns_after * 1e6:8.1f} us/request  ({patterns_before / patterns_after:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Security middleware micro-benchmark")
+    parser.add_argument("--requests", type=int, default=5000, help="Requests per layout (default: 5000)")
+    args = parser.parse_args()
+    asyncio.run(main(args.requests))
@@ -46,30 +46,6 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-# ====================
-# Cache Control Middleware for Auth Routes
-# ====================
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import Response
-
-class NoCacheAuthMiddleware(BaseHTTPMiddleware):
-    """Middleware to prevent caching of auth-related responses"""
-    
-    async def dispatch(self, request, call_next):
-        response = await call_next(request)
-        
-        # Add no-cache headers for auth routes
-        path = request.url.path.lower()
-        if '/auth/' in path or '/register' in path or '/login' in path:
-            response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
-            response.headers['Pragma'] = 'no-cache'
-            response.headers['Expires'] = '0'
-        
-        return response
-
-app.add_middleware(NoCacheAuthMiddleware)
-
-
 # ====================
 # Health Check Endpoint (No Auth Required)
 # ====================
@@ -150,7 +126,57 @@ async def health_check():
         "hostname": platform.node()
     }
     
-    # 6. WhatsApp/Wati check
+    # 6. Batched relation loader counters (DB round-trips per request)
+    from services.batch_loader import get_loader_stats
+    health["checks"]["batch_loader"] = {"status": "ok", **get_loader_stats()}
+    
+    # 7. Auth cache hit/miss counters
+    from services.auth_cache import get_auth_cache_stats
+    health["checks"]["auth_cache"] = {"status": "ok", **get_auth_cache_stats()}
+    
+    # 8. FI optimization pool (solves in flight, result cache)
+    from fixed_income.optimization_pool import get_optimization_pool_stats
+    health["checks"]["fi_optimization_pool"] = {"status": "ok", **get_optimization_pool_stats()}
+    
+    # 9. Contract note render pool (PDFs rendering / waiting)
+    from services.contract_note_service import get_render_pool_stats
+    health["checks"]["contract_note_render_pool"] = {"status": "ok", **get_render_pool_stats()}
+    
+    # 10. Email outbox (queue depth, SMTP pool)
+    try:
+        from services.email_outbox import get_email_outbox_stats
+        health["checks"]["email_outbox"] = {"status": "ok", **(await get_email_outbox_stats())}
+    except Exception as e:
+        health["checks"]["email_outbox"] = {"status": "error", "message": str(e)}
+    
+    # 11. Hot file cache (logos/templates served from memory)
+    from services.file_streaming import get_hot_file_cache_stats
+    health["checks"]["hot_file_cache"] = {"status": "ok", **get_hot_file_cache_stats()}
+    
+    # 12. Settings cache (kill switch, SMTP, company master, WhatsApp)
+    from services.settings_cache import get_settings_cache_stats
+    health["checks"]["settings_cache"] = {"status": "ok", **get_settings_cache_stats()}
+    
+    # 13. OCR pipeline (queue, result cache, PDF rasterization workers)
+    from services.ocr_service import get_ocr_pipeline_stats
+    health["checks"]["ocr_pipeline"] = {"status": "ok", **get_ocr_pipeline_stats()}
+    
+    # 14. Booking event outbox (undelivered side effects)
+    try:
+        from services.booking_events import get_booking_event_stats
+        health["checks"]["booking_events"] = {"status": "ok", **(await get_booking_event_stats())}
+    except Exception as e:
+        health["checks"]["booking_events"] = {"status": "error", "message": str(e)}
+    
+    # 15. Audit log writer (buffered entries, batch flushes)
+    from services.audit_service import get_audit_writer_stats
+    health["checks"]["audit_log_writer"] = {"status": "ok", **get_audit_writer_stats()}
+    
+    # 16. Analytics chart cache (hit rate, invalidations by booking writes)
+    from services.analytics_service import get_analytics_cache_stats
+    health["checks"]["analytics_cache"] = {"status": "ok", **get_analytics_cache_stats()}
+    
+    # 17. WhatsApp/Wati check
     try:
         wati_config = await db.system_config.find_one({"config_type": "whatsapp"}, {"_id": 0, "api_token": 0})
         health["checks"]["whatsapp"] = {
@@ -298,6 +324,50 @@ async def startup_tasks():
     from services.scheduler_service import init_scheduler
     init_scheduler()
     logging.info("Scheduler initialized for day-end reports at 6 PM IST")
+    
+    # Start draining the email outbox
+    from services.email_outbox import start_email_outbox
+    start_email_outbox()
+    
+    # Buffer audit log entries and write them in batches
+    from services.audit_service import start_audit_writer
+    start_audit_writer()
+    
+    # Fan booking state changes out to email, WhatsApp, notifications and audit
+    from services.booking_events import start_booking_event_dispatcher
+    start_booking_event_dispatcher()
+    
+    # Share rate limits, lockouts and IP blocks with the other workers
+    from middleware.shared_limits import start_shared_limits
+    start_shared_limits()
+    
+    # Keep kill switch and system settings in sync with the other workers
+    from services.settings_cache import start_settings_cache
+    start_settings_cache()
+    
+    # Backfill dashboard rollups on first start (no-op once built)
+    from services.dashboard_rollups import ensure_rollups
+    asyncio.create_task(ensure_rollups())
+    
+    # Build the org-hierarchy closure on first start (no-op once built)
+    from services.hierarchy_service import ensure_hierarchy_closure
+    asyncio.create_task(ensure_hierarchy_closure())
+    
+    # Build the search index on first start (no-op once built)
+    from services.search_index import ensure_search_index
+    asyncio.create_task(ensure_search_index())
+    
+    # Give documents written before the dual-write their native date fields (no-op once done)
+    from services.native_dates import ensure_native_dates
+    asyncio.create_task(ensure_native_dates())
+    
+    # Create the time-series price history and copy the old rows over (no-op once done)
+    from fixed_income.market_data_service import ensure_price_history
+    asyncio.create_task(ensure_price_history())
+    
+    # Materialize fixed income cash flow schedules (only new or changed instruments)
+    from fixed_income.cash_flow_store import ensure_cash_flow_schedules
+    asyncio.create_task(ensure_cash_flow_schedules())
 
 
 async def seed_license_admin_user():
@@ -351,6 +421,42 @@ async def shutdown_db_client():
     from services.scheduler_service import shutdown_scheduler
     shutdown_scheduler()
     
+    # Finish the email batch in progress; the rest stays queued in Mongo
+    from services.email_outbox import stop_email_outbox
+    await stop_email_outbox()
+    
+    # Finish the booking event batch in progress; the rest stays in Mongo
+    from services.booking_events import stop_booking_event_dispatcher
+    await stop_booking_event_dispatcher()
+    
+    # Flush rate limit hits and blocks not yet written to Mongo
+    from middleware.shared_limits import stop_shared_limits
+    await stop_shared_limits()
+    
+    # Stop following settings changes
+    from services.settings_cache import stop_settings_cache
+    await stop_settings_cache()
+    
+    # Stop optimization worker processes
+    from fixed_income.optimization_pool import shutdown_optimization_pool
+    shutdown_optimization_pool()
+    
+    # Cancel batch contract note jobs and stop PDF render workers
+    from services.contract_note_service import shutdown_render_pool
+    shutdown_render_pool()
+    
+    # Cancel background exports and stop export writer threads
+    from services.export_engine import shutdown_export_engine
+    shutdown_export_engine()
+    
+    # Stop OCR rasterization workers
+    from services.ocr_service import shutdown_ocr_pipeline
+    shutdown_ocr_pipeline()
+    
+    # Write audit entries still in the buffer (after everything that may log)
+    from services.audit_service import stop_audit_writer
+    await stop_audit_writer()
+    
     # Close database connection
     client.close()
 
@@ -570,6 +676,9 @@ from routers.demo import router as demo_router
 # Payments
 from routers.payments import router as payments_router
 
+# Background Export Jobs
+from routers.exports import router as exports_router
+
 # Register all routers with /api prefix
 app.include_router(auth_router, prefix="/api")
 app.include_router(users_router, prefix="/api")
@@ -608,6 +717,7 @@ app.include_router(bi_reports_router, prefix="/api")
 app.include_router(whatsapp_router, prefix="/api")
 app.include_router(demo_router, prefix="/api")
 app.include_router(payments_router, prefix="/api")
+app.include_router(exports_router, prefix="/api")
 
 # Fixed Income Module
 app.include_router(fi_instruments_router, prefix="/api")
@@ -640,45 +750,20 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # ====================
 # Security Middleware
 # ====================
 
-from middleware.security import (
-    SecurityHeadersMiddleware,
-    RateLimitMiddleware,
-    RequestValidationMiddleware
-)
-
-# Add security headers to all responses
-app.add_middleware(SecurityHeadersMiddleware)
-
-# Rate limiting to prevent brute force and DDoS
-app.add_middleware(RateLimitMiddleware)
-
-# Request validation and sanitization
-app.add_middleware(RequestValidationMiddleware)
-
-# ====================
-# Bot Protection Middleware
-# ====================
-
-from middleware.bot_protection import (
-    BotProtectionMiddleware,
-    ROBOTS_TXT_CONTENT
-)
-
-# Block bots, crawlers, and various attacks
-app.add_middleware(BotProtectionMiddleware)
-
-# ====================
-# Kill Switch Middleware
-# ====================
+# Kill switch, bot/attack protection, request validation, rate limiting and
+# security headers, run in one raw-ASGI pass (outermost, as the separate
+# layers were)
+from middleware.security_pipeline import SecurityPipelineMiddleware
+from middleware.bot_protection import ROBOTS_TXT_CONTENT
 
-from middleware.kill_switch import KillSwitchMiddleware
-app.add_middleware(KillSwitchMiddleware)
+app.add_middleware(SecurityPipelineMiddleware)
 
 
 # ====================
@@ -17,7 +17,7 @@ from .notification_service import (
     notify_roles
 )
 from .audit_service import create_audit_log
-from .ocr_service import process_document_ocr
+from .ocr_service import process_document_ocr, ocr_document_bytes
 from .inventory_service import (
     update_inventory,
     get_stock_weighted_avg_price,
@@ -42,6 +42,7 @@ __all__ = [
     'create_audit_log',
     # OCR
     'process_document_ocr',
+    'ocr_document_bytes',
     # Inventory
     'update_inventory',
     'get_stock_weighted_avg_price',
@@ -7,12 +7,12 @@ from typing import Optional
 import uuid
 
 from database import db
+from services.settings_cache import get_setting
 
 
 async def get_whatsapp_config():
     """Get WhatsApp configuration"""
-    config = await db.system_config.find_one({"config_type": "whatsapp"}, {"_id": 0})
-    return config
+    return await get_setting("whatsapp")
 
 
 async def log_whatsapp_message(phone_number: str, message: str, template_id: str, recipient_type: str, 
@@ -1,254 +1,438 @@
 """
 Analytics service for advanced dashboard
+
+Every chart is a single server-side aggregation. Bookings are matched, grouped
+and summed by MongoDB ($group), and stock and user details are joined inside
+the same pipeline ($lookup). Only the grouped rows come back to Python.
+get_analytics_summary() returns the whole dashboard payload from one $facet
+over bookings and one over clients, run concurrently.
+
+The stage builders (stock_stages, employee_stages, ...) are shared with the
+/analytics router, whose endpoints run the same pipelines with their own
+filters and response shapes.
+
+Results are cached per (chart, user, parameters) in a process-local LRU
+(cached_analytics). Booking writes call invalidate_analytics(), which happens
+through refresh_booking_rollups, the hook every booking write path already
+calls. Entries also expire after ANALYTICS_CACHE_TTL_SECONDS so that writes
+handled by other workers show up.
+
+Configuration (environment):
+    ANALYTICS_CACHE_TTL_SECONDS  - entry lifetime (default 60; 0 disables the cache)
+    ANALYTICS_CACHE_MAX_ENTRIES  - LRU bound (default 256)
 """
+import asyncio
+import copy
+import logging
+import os
+import time
+from collections import OrderedDict
 from datetime import datetime, timezone, timedelta
-from typing import List, Dict, Any
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
 from database import db
+from utils.dates import date_range, date_value_expression, ist_day_expression, ist_day_start, ist_today, IST_OFFSET
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_CACHE_TTL_SECONDS = float(os.environ.get("ANALYTICS_CACHE_TTL_SECONDS", "60"))
+ANALYTICS_CACHE_MAX_ENTRIES = int(os.environ.get("ANALYTICS_CACHE_MAX_ENTRIES", "256"))
+
+TOP_N = 10
+
+# quantity * price, treating missing fields as 0 (as the Python loops did)
+REVENUE = {"$multiply": [{"$ifNull": ["$selling_price", 0]}, {"$ifNull": ["$quantity", 0]}]}
+COST = {"$multiply": [{"$ifNull": ["$buying_price", 0]}, {"$ifNull": ["$quantity", 0]}]}
+PROFIT = {"$subtract": [REVENUE, COST]}
+
+
+# ============== Result cache ==============
+
+class AnalyticsCache:
+    """LRU of chart payloads with a TTL and a generation counter for invalidation."""
+
+    def __init__(self, ttl_seconds: float = ANALYTICS_CACHE_TTL_SECONDS,
+                 max_entries: int = ANALYTICS_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[float, int, Any]]" = OrderedDict()
+        # Bumped on every invalidation; computations started before a bump are not stored
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, generation, value = entry
+        if expires_at < time.monotonic() or generation != self.generation:
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None):
+        """Store a payload computed from data read at the given generation."""
+        if self.ttl_seconds <= 0:
+            return
+        if generation is not None and generation != self.generation:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, self.generation, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self):
+        self.generation += 1
+        self.invalidations += 1
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "invalidations": self.invalidations,
+            "generation": self.generation,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+analytics_cache = AnalyticsCache()
+
+
+def invalidate_analytics():
+    """Drop all cached chart payloads after a booking changed."""
+    analytics_cache.invalidate()
+
+
+def get_analytics_cache_stats() -> Dict[str, Any]:
+    return analytics_cache.stats()
+
+
+async def cached_analytics(chart: str, current_user: Optional[dict], params: Tuple,
+                           compute: Callable[[], Awaitable[Any]]) -> Any:
+    """Payload of chart for this user and parameters, from the cache or compute()."""
+    key = (chart, (current_user or {}).get("id"), params)
+    value = analytics_cache.get(key)
+    if value is None:
+        generation = analytics_cache.generation
+        value = await compute()
+        analytics_cache.set(key, value, generation)
+    # Callers get their own copy; the cached payload stays untouched
+    return copy.deepcopy(value)
+
+
+# ============== Pipeline stages ==============
+
+def totals_stages() -> List[dict]:
+    return [{"$group": {"_id": None, "count": {"$sum": 1}, "revenue": {"$sum": REVENUE}, "cost": {"$sum": COST}}}]
+
+
+def stock_stages(limit: Optional[int] = None) -> List[dict]:
+    """Per-stock quantity/revenue/cost, most profitable first, joined with the stock."""
+    stages = [
+        {"$match": {"stock_id": {"$nin": [None, ""]}}},
+        {"$group": {
+            "_id": "$stock_id",
+            "count": {"$sum": 1},
+            "quantity": {"$sum": {"$ifNull": ["$quantity", 0]}},
+            "revenue": {"$sum": REVENUE},
+            "cost": {"$sum": COST}
+        }},
+        {"$addFields": {"profit": {"$subtract": ["$revenue", "$cost"]}}},
+        {"$sort": {"profit": -1, "_id": 1}}
+    ]
+    if limit:
+        stages.append({"$limit": limit})
+    stages += [
+        {"$lookup": {"from": "stocks", "localField": "_id", "foreignField": "id", "as": "stock"}},
+        {"$addFields": {
+            "symbol": {"$arrayElemAt": ["$stock.symbol", 0]},
+            "name": {"$arrayElemAt": ["$stock.name", 0]}
+        }},
+        {"$project": {"stock": 0}}
+    ]
+    return stages
+
+
+def employee_stages(limit: Optional[int] = None, roles: Optional[List[int]] = None) -> List[dict]:
+    """Per-creator bookings/value/profit and distinct clients, joined with the user."""
+    stages = [
+        {"$match": {"created_by": {"$nin": [None, ""]}}},
+        {"$group": {
+            "_id": "$created_by",
+            "count": {"$sum": 1},
+            "revenue": {"$sum": REVENUE},
+            "profit": {"$sum": PROFIT},
+            "clients": {"$addToSet": "$client_id"}
+        }},
+        {"$addFields": {"clients_count": {"$size": "$clients"}}},
+        {"$project": {"clients": 0}}
+    ]
+    lookup = [
+        {"$lookup": {"from": "users", "localField": "_id", "foreignField": "id", "as": "user"}},
+        {"$addFields": {
+            "name": {"$arrayElemAt": ["$user.name", 0]},
+            "email": {"$arrayElemAt": ["$user.email", 0]},
+            "role": {"$arrayElemAt": ["$user.role", 0]}
+        }},
+        {"$project": {"user": 0}}
+    ]
+    if roles is not None:
+        # The role filter needs the join first
+        return stages + lookup + [{"$match": {"role": {"$in": roles}}}, {"$sort": {"profit": -1, "_id": 1}}]
+    stages.append({"$sort": {"profit": -1, "_id": 1}})
+    if limit:
+        stages.append({"$limit": limit})
+    return stages + lookup
+
+
+def sector_stages(unknown: str = "Unknown") -> List[dict]:
+    """Bookings and sell value per stock sector (missing/blank sector -> unknown)."""
+    sector = {"$arrayElemAt": ["$stock.sector", 0]}
+    return [
+        {"$group": {"_id": "$stock_id", "count": {"$sum": 1}, "value": {"$sum": REVENUE}}},
+        {"$lookup": {"from": "stocks", "localField": "_id", "foreignField": "id", "as": "stock"}},
+        {"$group": {
+            "_id": {"$cond": [{"$gt": [{"$ifNull": [sector, ""]}, ""]}, sector, unknown]},
+            "count": {"$sum": "$count"},
+            "value": {"$sum": "$value"}
+        }},
+        {"$sort": {"value": -1, "_id": 1}}
+    ]
+
+
+def daily_stages(closed_profit_only: bool = False) -> List[dict]:
+    """Bookings, sell value and profit per IST day of created_at."""
+    profit = {"$cond": [{"$eq": ["$status", "closed"]}, PROFIT, 0]} if closed_profit_only else PROFIT
+    return [
+        {"$group": {
+            "_id": ist_day_expression("created_at"),
+            "count": {"$sum": 1},
+            "revenue": {"$sum": REVENUE},
+            "profit": {"$sum": profit}
+        }},
+        {"$match": {"_id": {"$ne": None}}},
+        {"$sort": {"_id": 1}}
+    ]
+
+
+def _trend_days(days: int) -> List[str]:
+    today = ist_today()
+    return [(today - timedelta(days=i)).isoformat() for i in range(days, -1, -1)]
+
+
+def _growth_windows(days: int, now: datetime) -> List[Tuple[datetime, datetime]]:
+    """(start, end) of each 7-day window ending now, now - 7d, ... (newest first)."""
+    return [(now - timedelta(days=i + 7), now - timedelta(days=i)) for i in range(0, days, 7)]
 
-async def get_analytics_summary(days: int = 30) -> Dict[str, Any]:
-    """Get comprehensive analytics summary for PE Desk"""
-    start_date = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
-    
-    # Get all closed bookings
-    bookings = await db.bookings.find(
-        {"status": "closed", "approval_status": "approved"},
-        {"_id": 0}
-    ).to_list(10000)
-    
-    # Get recent bookings for trend
-    recent_bookings = [b for b in bookings if b.get("created_at", "") >= start_date]
-    
-    # Calculate totals
-    total_revenue = sum(b.get("selling_price", 0) * b.get("quantity", 0) for b in bookings)
-    total_cost = sum(b.get("buying_price", 0) * b.get("quantity", 0) for b in bookings)
-    total_profit = total_revenue - total_cost
-    
-    # Get clients count
-    clients_count = await db.clients.count_documents({"is_vendor": False, "is_active": True})
-    
-    avg_booking_value = total_revenue / len(bookings) if bookings else 0
-    profit_margin = (total_profit / total_revenue * 100) if total_revenue > 0 else 0
-    
-    # Get stock performance
-    stock_performance = await get_stock_performance(bookings)
-    
-    # Get employee performance
-    employee_performance = await get_employee_performance(bookings)
-    
-    # Get daily trend
-    daily_trend = await get_daily_trend(days)
-    
-    # Get client growth
-    client_growth = await get_client_growth(days)
-    
-    # Get sector distribution
-    sector_distribution = await get_sector_distribution(bookings)
-    
+
+def client_facets(days: int, now: datetime, trend_days: List[str]) -> Dict[str, List[dict]]:
+    """
+    $facet branches over non-vendor clients with a "_created" datetime field:
+    active count, new clients per IST day of the trend, and weekly growth.
+    """
+    windows = _growth_windows(days, now)
+    growth = {}
+    for i, (start, end) in enumerate(windows):
+        growth[f"new_{i}"] = {"$sum": {"$cond": [
+            {"$and": [{"$gte": ["$_created", start]}, {"$lt": ["$_created", end]}]}, 1, 0
+        ]}}
+        growth[f"total_{i}"] = {"$sum": {"$cond": [{"$lt": ["$_created", end]}, 1, 0]}}
+    first_day = ist_day_start(datetime.fromisoformat(trend_days[0]).date())
     return {
-        "total_revenue": round(total_revenue, 2),
-        "total_profit": round(total_profit, 2),
-        "total_bookings": len(bookings),
-        "total_clients": clients_count,
-        "avg_booking_value": round(avg_booking_value, 2),
-        "profit_margin": round(profit_margin, 2),
-        "top_stocks": stock_performance[:10],
-        "top_employees": employee_performance[:10],
-        "daily_trend": daily_trend,
-        "client_growth": client_growth,
-        "sector_distribution": sector_distribution
+        "active": [{"$match": {"is_active": True}}, {"$count": "count"}],
+        "daily": [
+            {"$match": {"_created": {"$gte": first_day}}},
+            {"$group": {
+                "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$_created", "timezone": IST_OFFSET}},
+                "count": {"$sum": 1}
+            }}
+        ],
+        "growth": [{"$group": {"_id": None, **growth}}] if growth else [{"$limit": 0}]
     }
 
-async def get_stock_performance(bookings: List[Dict]) -> List[Dict]:
-    """Get performance by stock"""
-    stock_stats = {}
-    
-    for booking in bookings:
-        stock_id = booking.get("stock_id")
-        if not stock_id:
-            continue
-            
-        if stock_id not in stock_stats:
-            stock_stats[stock_id] = {
-                "stock_id": stock_id,
-                "total_quantity": 0,
-                "total_revenue": 0,
-                "total_cost": 0
-            }
-        
-        qty = booking.get("quantity", 0)
-        stock_stats[stock_id]["total_quantity"] += qty
-        stock_stats[stock_id]["total_revenue"] += booking.get("selling_price", 0) * qty
-        stock_stats[stock_id]["total_cost"] += booking.get("buying_price", 0) * qty
-    
-    # Get stock details
-    stock_ids = list(stock_stats.keys())
-    stocks = await db.stocks.find({"id": {"$in": stock_ids}}, {"_id": 0}).to_list(1000)
-    stock_map = {s["id"]: s for s in stocks}
-    
-    result = []
-    for stock_id, stats in stock_stats.items():
-        stock = stock_map.get(stock_id, {})
-        profit = stats["total_revenue"] - stats["total_cost"]
-        margin = (profit / stats["total_revenue"] * 100) if stats["total_revenue"] > 0 else 0
-        
-        result.append({
-            "stock_id": stock_id,
-            "stock_symbol": stock.get("symbol", "Unknown"),
-            "stock_name": stock.get("name", "Unknown"),
-            "total_quantity_sold": stats["total_quantity"],
-            "total_revenue": round(stats["total_revenue"], 2),
-            "total_cost": round(stats["total_cost"], 2),
-            "profit_loss": round(profit, 2),
-            "profit_margin": round(margin, 2)
-        })
-    
-    # Sort by profit
-    result.sort(key=lambda x: x["profit_loss"], reverse=True)
-    return result
-
-async def get_employee_performance(bookings: List[Dict]) -> List[Dict]:
-    """Get performance by employee"""
-    emp_stats = {}
-    
-    for booking in bookings:
-        user_id = booking.get("created_by")
-        if not user_id:
-            continue
-            
-        if user_id not in emp_stats:
-            emp_stats[user_id] = {
-                "user_id": user_id,
-                "total_bookings": 0,
-                "total_value": 0,
-                "total_profit": 0,
-                "client_ids": set()
-            }
-        
-        qty = booking.get("quantity", 0)
-        revenue = booking.get("selling_price", 0) * qty
-        cost = booking.get("buying_price", 0) * qty
-        
-        emp_stats[user_id]["total_bookings"] += 1
-        emp_stats[user_id]["total_value"] += revenue
-        emp_stats[user_id]["total_profit"] += revenue - cost
-        emp_stats[user_id]["client_ids"].add(booking.get("client_id"))
-    
-    # Get user details
-    user_ids = list(emp_stats.keys())
-    users = await db.users.find({"id": {"$in": user_ids}}, {"_id": 0, "hashed_password": 0}).to_list(1000)
-    user_map = {u["id"]: u for u in users}
-    
-    result = []
-    for user_id, stats in emp_stats.items():
-        user = user_map.get(user_id, {})
-        result.append({
-            "user_id": user_id,
-            "user_name": user.get("name", "Unknown"),
-            "total_bookings": stats["total_bookings"],
-            "total_value": round(stats["total_value"], 2),
-            "total_profit": round(stats["total_profit"], 2),
-            "clients_count": len(stats["client_ids"])
-        })
-    
-    # Sort by profit
-    result.sort(key=lambda x: x["total_profit"], reverse=True)
-    return result
 
-async def get_daily_trend(days: int = 30) -> List[Dict]:
-    """Get daily booking trend"""
-    result = []
-    
-    for i in range(days, -1, -1):
-        date = (datetime.now(timezone.utc) - timedelta(days=i)).strftime("%Y-%m-%d")
-        date_start = f"{date}T00:00:00"
-        date_end = f"{date}T23:59:59"
-        
-        # Get bookings for this day
-        bookings = await db.bookings.find({
-            "created_at": {"$gte": date_start, "$lte": date_end},
-            "approval_status": "approved"
-        }, {"_id": 0}).to_list(1000)
-        
-        # Get new clients for this day
-        new_clients = await db.clients.count_documents({
-            "created_at": {"$gte": date_start, "$lte": date_end},
-            "is_vendor": False
-        })
-        
-        bookings_value = sum(b.get("selling_price", 0) * b.get("quantity", 0) for b in bookings)
-        profit_loss = sum(
-            (b.get("selling_price", 0) - b.get("buying_price", 0)) * b.get("quantity", 0)
-            for b in bookings if b.get("status") == "closed"
-        )
-        
-        result.append({
+async def _client_stats(days: int, now: datetime, trend_days: List[str], facets: List[str]) -> Dict[str, Any]:
+    branches = client_facets(days, now, trend_days)
+    pipeline = [
+        {"$match": {"is_vendor": False}},
+        {"$addFields": {"_created": date_value_expression("created_at")}},
+        {"$facet": {name: branches[name] for name in facets}}
+    ]
+    result = await db.clients.aggregate(pipeline).to_list(1)
+    return result[0] if result else {name: [] for name in facets}
+
+
+# ============== Row shaping ==============
+
+def _margin(profit: float, revenue: float) -> float:
+    return (profit / revenue * 100) if revenue > 0 else 0
+
+
+def _stock_rows(groups: List[dict]) -> List[Dict]:
+    return [
+        {
+            "stock_id": g["_id"],
+            "stock_symbol": g.get("symbol") or "Unknown",
+            "stock_name": g.get("name") or "Unknown",
+            "total_quantity_sold": g["quantity"],
+            "total_revenue": round(g["revenue"], 2),
+            "total_cost": round(g["cost"], 2),
+            "profit_loss": round(g["profit"], 2),
+            "profit_margin": round(_margin(g["profit"], g["revenue"]), 2)
+        }
+        for g in groups
+    ]
+
+
+def _employee_rows(groups: List[dict]) -> List[Dict]:
+    return [
+        {
+            "user_id": g["_id"],
+            "user_name": g.get("name") or "Unknown",
+            "total_bookings": g["count"],
+            "total_value": round(g["revenue"], 2),
+            "total_profit": round(g["profit"], 2),
+            "clients_count": g["clients_count"]
+        }
+        for g in groups
+    ]
+
+
+def _sector_rows(groups: List[dict]) -> List[Dict]:
+    return [
+        {"sector": g["_id"], "bookings_count": g["count"], "total_value": g["value"]}
+        for g in groups
+    ]
+
+
+def _trend_rows(trend_days: List[str], booking_days: List[dict], client_days: List[dict]) -> List[Dict]:
+    bookings = {g["_id"]: g for g in booking_days}
+    clients = {g["_id"]: g["count"] for g in client_days}
+    rows = []
+    for date in trend_days:
+        day = bookings.get(date, {})
+        rows.append({
             "date": date,
-            "bookings_count": len(bookings),
-            "bookings_value": round(bookings_value, 2),
-            "profit_loss": round(profit_loss, 2),
-            "new_clients": new_clients
+            "bookings_count": day.get("count", 0),
+            "bookings_value": round(day.get("revenue", 0), 2),
+            "profit_loss": round(day.get("profit", 0), 2),
+            "new_clients": clients.get(date, 0)
         })
-    
-    return result
+    return rows
+
+
+def _growth_rows(days: int, now: datetime, growth: List[dict]) -> List[Dict]:
+    counts = growth[0] if growth else {}
+    rows = [
+        {
+            "week": end.strftime("%Y-%m-%d"),
+            "new_clients": counts.get(f"new_{i}", 0),
+            "total_clients": counts.get(f"total_{i}", 0)
+        }
+        for i, (_, end) in enumerate(_growth_windows(days, now))
+    ]
+    rows.reverse()
+    return rows
+
+
+# ============== Charts ==============
+
+CLOSED = {"status": "closed"}
+
+
+def _trend_match(trend_days: List[str]) -> dict:
+    return {"approval_status": "approved", **date_range("created_at", trend_days[0], trend_days[-1])}
+
+
+async def get_analytics_summary(days: int = 30, current_user: Optional[dict] = None) -> Dict[str, Any]:
+    """Get comprehensive analytics summary for PE Desk (one bookings $facet + one clients $facet)"""
+    async def compute():
+        now = datetime.now(timezone.utc)
+        trend_days = _trend_days(days)
+        match = {"approval_status": "approved"}
+        if current_user is not None:
+            from utils.demo_isolation import add_demo_filter
+            match = add_demo_filter(match, current_user)
+        pipeline = [
+            {"$match": match},
+            {"$facet": {
+                "totals": [{"$match": CLOSED}, *totals_stages()],
+                "stocks": [{"$match": CLOSED}, *stock_stages(TOP_N)],
+                "employees": [{"$match": CLOSED}, *employee_stages(TOP_N)],
+                "sectors": [{"$match": CLOSED}, *sector_stages()],
+                "daily": [{"$match": _trend_match(trend_days)}, *daily_stages(closed_profit_only=True)]
+            }}
+        ]
+        booking_result, client_result = await asyncio.gather(
+            db.bookings.aggregate(pipeline).to_list(1),
+            _client_stats(days, now, trend_days, ["active", "daily", "growth"])
+        )
+        facets = booking_result[0] if booking_result else {}
+        totals = (facets.get("totals") or [{}])[0]
+        count = totals.get("count", 0)
+        revenue = totals.get("revenue", 0)
+        profit = revenue - totals.get("cost", 0)
+        active = client_result.get("active") or [{}]
+
+        return {
+            "total_revenue": round(revenue, 2),
+            "total_profit": round(profit, 2),
+            "total_bookings": count,
+            "total_clients": active[0].get("count", 0),
+            "avg_booking_value": round(revenue / count, 2) if count else 0,
+            "profit_margin": round(_margin(profit, revenue), 2),
+            "top_stocks": _stock_rows(facets.get("stocks", [])),
+            "top_employees": _employee_rows(facets.get("employees", [])),
+            "daily_trend": _trend_rows(trend_days, facets.get("daily", []), client_result.get("daily", [])),
+            "client_growth": _growth_rows(days, now, client_result.get("growth", [])),
+            "sector_distribution": _sector_rows(facets.get("sectors", []))
+        }
+
+    return await cached_analytics("dashboard_summary", current_user, (days,), compute)
+
+
+async def get_stock_performance(match: Optional[dict] = None, limit: Optional[int] = None) -> List[Dict]:
+    """Get performance by stock (closed, approved bookings unless match is given)"""
+    pipeline = [{"$match": match if match is not None else {**CLOSED, "approval_status": "approved"}}, *stock_stages(limit)]
+    return _stock_rows(await db.bookings.aggregate(pipeline).to_list(None))
+
+
+async def get_employee_performance(match: Optional[dict] = None, limit: Optional[int] = None) -> List[Dict]:
+    """Get performance by employee (closed, approved bookings unless match is given)"""
+    pipeline = [{"$match": match if match is not None else {**CLOSED, "approval_status": "approved"}}, *employee_stages(limit)]
+    return _employee_rows(await db.bookings.aggregate(pipeline).to_list(None))
+
+
+async def get_daily_trend(days: int = 30) -> List[Dict]:
+    """Get daily booking trend (IST days; one bookings and one clients aggregation)"""
+    trend_days = _trend_days(days)
+    booking_days, client_result = await asyncio.gather(
+        db.bookings.aggregate([{"$match": _trend_match(trend_days)}, *daily_stages(closed_profit_only=True)]).to_list(None),
+        _client_stats(days, datetime.now(timezone.utc), trend_days, ["daily"])
+    )
+    return _trend_rows(trend_days, booking_days, client_result.get("daily", []))
+
 
 async def get_client_growth(days: int = 30) -> List[Dict]:
-    """Get client growth over time"""
-    result = []
-    
-    # Group by week
-    for i in range(0, days, 7):
-        week_end = datetime.now(timezone.utc) - timedelta(days=i)
-        week_start = week_end - timedelta(days=7)
-        
-        # Count clients created in this period
-        count = await db.clients.count_documents({
-            "created_at": {
-                "$gte": week_start.isoformat(),
-                "$lte": week_end.isoformat()
-            },
-            "is_vendor": False
-        })
-        
-        # Total clients up to this point
-        total = await db.clients.count_documents({
-            "created_at": {"$lte": week_end.isoformat()},
-            "is_vendor": False
-        })
-        
-        result.append({
-            "week": week_end.strftime("%Y-%m-%d"),
-            "new_clients": count,
-            "total_clients": total
-        })
-    
-    result.reverse()
-    return result
-
-async def get_sector_distribution(bookings: List[Dict]) -> List[Dict]:
-    """Get booking distribution by sector"""
-    # Get all stocks with sectors
-    stock_ids = list(set(b.get("stock_id") for b in bookings if b.get("stock_id")))
-    stocks = await db.stocks.find({"id": {"$in": stock_ids}}, {"_id": 0}).to_list(1000)
-    stock_map = {s["id"]: s for s in stocks}
-    
-    sector_stats = {}
-    
-    for booking in bookings:
-        stock = stock_map.get(booking.get("stock_id"), {})
-        sector = stock.get("sector") or "Unknown"
-        
-        if sector not in sector_stats:
-            sector_stats[sector] = {
-                "sector": sector,
-                "bookings_count": 0,
-                "total_value": 0
-            }
-        
-        qty = booking.get("quantity", 0)
-        sector_stats[sector]["bookings_count"] += 1
-        sector_stats[sector]["total_value"] += booking.get("selling_price", 0) * qty
-    
-    result = list(sector_stats.values())
-    result.sort(key=lambda x: x["total_value"], reverse=True)
-    
-    return result
+    """Get client growth over time (weekly windows, one aggregation)"""
+    now = datetime.now(timezone.utc)
+    client_result = await _client_stats(days, now, _trend_days(days), ["growth"])
+    return _growth_rows(days, now, client_result.get("growth", []))
+
+
+async def get_sector_distribution(match: Optional[dict] = None) -> List[Dict]:
+    """Get booking distribution by sector (closed, approved bookings unless match is given)"""
+    pipeline = [{"$match": match if match is not None else {**CLOSED, "approval_status": "approved"}}, *sector_stages()]
+    return _sector_rows(await db.bookings.aggregate(pipeline).to_list(None))
@@ -1,13 +1,176 @@
 """
 Audit service for logging actions
+
+create_audit_log() does not write to Mongo itself: entries go into an
+in-process buffer (AuditLogWriter) that is flushed to db.audit_logs with one
+insert_many when it reaches AUDIT_LOG_BATCH_SIZE entries or
+AUDIT_LOG_FLUSH_SECONDS after the first buffered entry, whichever comes first.
+The buffer is drained on shutdown. A failed flush is retried on the next
+cycle; if Mongo stays unreachable the oldest entries beyond
+AUDIT_LOG_MAX_BUFFER are dropped (and counted) rather than growing without
+bound.
+
+Before the writer is started (scripts, one-off jobs) entries are inserted
+directly.
+
+Configuration (environment):
+    AUDIT_LOG_BATCH_SIZE     - entries per insert_many (default 200)
+    AUDIT_LOG_FLUSH_SECONDS  - maximum time an entry waits in the buffer (default 1)
+    AUDIT_LOG_MAX_BUFFER     - entries held while Mongo is unavailable (default 20000)
 """
+import asyncio
 import logging
+import os
 import uuid
 from datetime import datetime, timezone
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
+
+from pymongo.errors import BulkWriteError
 
 from database import db
 from config import AUDIT_ACTIONS
+from utils.dates import with_native_dates
+
+logger = logging.getLogger(__name__)
+
+AUDIT_LOG_BATCH_SIZE = int(os.environ.get("AUDIT_LOG_BATCH_SIZE", "200"))
+AUDIT_LOG_FLUSH_SECONDS = float(os.environ.get("AUDIT_LOG_FLUSH_SECONDS", "1"))
+AUDIT_LOG_MAX_BUFFER = int(os.environ.get("AUDIT_LOG_MAX_BUFFER", "20000"))
+
+
+class AuditLogWriter:
+    """Buffers audit entries and writes them in batches."""
+
+    def __init__(self, collection=None, batch_size: int = AUDIT_LOG_BATCH_SIZE,
+                 flush_seconds: float = AUDIT_LOG_FLUSH_SECONDS,
+                 max_buffer: int = AUDIT_LOG_MAX_BUFFER):
+        self._collection = collection
+        self.batch_size = max(1, batch_size)
+        self.flush_seconds = flush_seconds
+        self.max_buffer = max(self.batch_size, max_buffer)
+        self._buffer: List[Dict[str, Any]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._stopping = False
+        self.written = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.dropped = 0
+
+    @property
+    def collection(self):
+        return self._collection if self._collection is not None else db.audit_logs
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.running:
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._task = asyncio.create_task(self._run())
+            logger.info("Audit log writer started")
+
+    async def stop(self, timeout: float = 10.0):
+        """Stop the flush loop and write everything still buffered."""
+        self._stopping = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout=timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                self._task.cancel()
+            self._task = None
+        await self.flush()
+        if self._buffer:
+            logger.error(f"Audit log writer stopped with {len(self._buffer)} unwritten entries")
+
+    def write(self, entry: Dict[str, Any]):
+        """Buffer one entry; never blocks the caller."""
+        self._buffer.append(entry)
+        overflow = len(self._buffer) - self.max_buffer
+        if overflow > 0:
+            del self._buffer[:overflow]
+            self.dropped += overflow
+            logger.error(f"Audit log buffer full - dropped {overflow} oldest entries")
+        if self._wakeup is not None and (len(self._buffer) == 1 or len(self._buffer) >= self.batch_size):
+            # First entry starts the flush timer; a full batch flushes right away
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        """Write buffered entries in batches. Returns the number written."""
+        lock = self._flush_lock or asyncio.Lock()
+        written = 0
+        async with lock:
+            while self._buffer:
+                batch = self._buffer[:self.batch_size]
+                try:
+                    await self.collection.insert_many(batch, ordered=False)
+                except BulkWriteError as e:
+                    # insert_many set each entry's _id on the first attempt, so entries
+                    # that already made it in come back as duplicate keys on a retry
+                    errors = e.details.get("writeErrors", [])
+                    if any(err.get("code") != 11000 for err in errors):
+                        self.failed_flushes += 1
+                        logger.error(f"Failed to write {len(batch)} audit log entries: {e}")
+                        break
+                except Exception as e:
+                    self.failed_flushes += 1
+                    logger.error(f"Failed to write {len(batch)} audit log entries: {e}")
+                    break
+                del self._buffer[:len(batch)]
+                self.flushes += 1
+                self.written += len(batch)
+                written += len(batch)
+        return written
+
+    async def _run(self):
+        while not self._stopping:
+            self._wakeup.clear()
+            if not self._buffer:
+                await self._wakeup.wait()
+                continue
+
+            # Wait out the flush window unless a full batch (or stop) arrives first
+            if len(self._buffer) < self.batch_size and not self._stopping:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_seconds)
+                except asyncio.TimeoutError:
+                    pass
+
+            if await self.flush() == 0 and self._buffer:
+                # Mongo unavailable; back off before retrying
+                await asyncio.sleep(self.flush_seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "buffered": len(self._buffer),
+            "written": self.written,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "dropped": self.dropped
+        }
+
+
+audit_writer = AuditLogWriter()
+
+
+def start_audit_writer():
+    audit_writer.start()
+
+
+async def stop_audit_writer():
+    await audit_writer.stop()
+
+
+def get_audit_writer_stats() -> Dict[str, Any]:
+    return audit_writer.stats()
 
 
 async def create_audit_log(
@@ -21,7 +184,7 @@ async def create_audit_log(
     details: Optional[Dict[str, Any]] = None,
     ip_address: Optional[str] = None
 ):
-    """Create an audit log entry"""
+    """Create an audit log entry (buffered; written by the audit log writer)"""
     try:
         audit_doc = {
             "id": str(uuid.uuid4()),
@@ -37,7 +200,11 @@ async def create_audit_log(
             "ip_address": ip_address,
             "timestamp": datetime.now(timezone.utc).isoformat()
         }
-        await db.audit_logs.insert_one(audit_doc)
+        audit_doc = with_native_dates("audit_logs", audit_doc)
+        if audit_writer.running:
+            audit_writer.write(audit_doc)
+        else:
+            await db.audit_logs.insert_one(audit_doc)
         logging.info(f"Audit: {action} by {user_name} on {entity_type}/{entity_id}")
     except Exception as e:
         logging.error(f"Failed to create audit log: {e}")
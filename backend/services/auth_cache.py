@@ -0,0 +1,131 @@
+"""
+Auth Cache Service
+Per-process TTL cache for authenticated users and role permissions.
+
+Every authenticated request resolves the user (db.users) and, for permission
+checks, the role (db.roles). Both change rarely, so they are cached in memory
+for a short TTL. Writers call the invalidation hooks below so edits made
+through this worker take effect immediately; other workers pick them up when
+the TTL expires.
+
+Configuration (environment):
+    AUTH_CACHE_TTL_SECONDS   - entry lifetime (default 30)
+    AUTH_CACHE_MAX_ENTRIES   - LRU bound per cache (default 5000)
+"""
+import copy
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+AUTH_CACHE_TTL_SECONDS = float(os.environ.get("AUTH_CACHE_TTL_SECONDS", "30"))
+AUTH_CACHE_MAX_ENTRIES = int(os.environ.get("AUTH_CACHE_MAX_ENTRIES", "5000"))
+
+
+class TTLCache:
+    """Small LRU cache with a per-entry time-to-live and hit/miss counters."""
+
+    def __init__(self, name: str, ttl_seconds: float = AUTH_CACHE_TTL_SECONDS,
+                 max_entries: int = AUTH_CACHE_MAX_ENTRIES):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return a deep copy of the cached value, or None on miss/expiry."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        # Callers (e.g. get_current_user) mutate the returned dict
+        return copy.deepcopy(value)
+
+    def set(self, key: Hashable, value: Any):
+        """Store a deep copy of value under key."""
+        if self.ttl_seconds <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, copy.deepcopy(value))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        """Drop a single entry."""
+        if self._entries.pop(key, None) is not None:
+            self.invalidations += 1
+
+    def clear(self):
+        """Drop every entry."""
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+# User documents keyed by user id
+user_cache = TTLCache("users")
+
+# Role documents ({"name", "permissions"}) keyed by role id
+role_cache = TTLCache("roles")
+
+# Expanded permission sets keyed by role id
+expanded_permission_cache = TTLCache("expanded_permissions")
+
+
+def invalidate_user(user_id: Optional[str]):
+    """Evict a user after their document was modified."""
+    if user_id:
+        user_cache.invalidate(user_id)
+
+
+def invalidate_role(role_id: Optional[int]):
+    """Evict a role and its expanded permissions after it was modified."""
+    if role_id is None:
+        return
+    role_cache.invalidate(role_id)
+    expanded_permission_cache.invalidate(role_id)
+
+
+def invalidate_all():
+    """Evict everything (used after bulk operations such as restores)."""
+    user_cache.clear()
+    role_cache.clear()
+    expanded_permission_cache.clear()
+
+
+def get_auth_cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters for all auth caches."""
+    return {
+        "users": user_cache.stats(),
+        "roles": role_cache.stats(),
+        "expanded_permissions": expanded_permission_cache.stats(),
+    }
@@ -8,6 +8,8 @@ import requests
 from datetime import datetime, timezone
 from typing import Optional, Dict
 
+from services.auth_cache import invalidate_user
+
 
 class AzureADConfig:
     """Azure AD Configuration from environment variables"""
@@ -165,6 +167,7 @@ class AzureSSOService:
                     }
                 }
             )
+            invalidate_user(existing_user.get("id"))
             existing_user["azure_oid"] = azure_oid
             existing_user["auth_method"] = "azure_sso"
             return existing_user
@@ -0,0 +1,575 @@
+"""
+Streaming Backup Engine
+Chunked, compressed, optionally incremental database backups.
+
+A backup is a metadata document in db.database_backups ("format": "chunked")
+plus a series of chunks, each holding up to BACKUP_CHUNK_DOCS documents of one
+collection:
+
+- NDJSON (MongoDB relaxed extended JSON, so dates/ObjectIds round-trip) or raw
+  BSON for binary collections such as fs.chunks, gzip-compressed.
+- Stored in the "backup_chunks" GridFS bucket or under BACKUP_DIR on disk.
+- Indexed in db.database_backup_chunks (backup_id, collection, seq).
+
+Collections are read with cursors by up to BACKUP_PARALLEL_COLLECTIONS workers,
+so memory is bounded by one chunk per worker rather than the dataset size.
+
+Incremental backups store only documents whose updated_at/created_at is at or
+after the parent backup's start (minus a small skew), plus an _id manifest so a
+restore can also drop documents deleted since the parent. That is only done for
+the append-only collections in INCREMENTAL_COLLECTIONS: most write paths update
+documents in place without touching updated_at, so every other collection (and
+any collection with untimestamped documents) is copied in full.
+
+Restore streams chunks back through insert_many (full) or bulk upserts
+(incremental) in batches of BACKUP_RESTORE_BATCH.
+
+Configuration (environment):
+    BACKUP_STORAGE                 - "gridfs" (default) or "disk"
+    BACKUP_DIR                     - directory for disk storage (default /app/backups)
+    BACKUP_CHUNK_DOCS              - documents per chunk (default 5000)
+    BACKUP_CHUNK_BYTES             - uncompressed bytes per chunk (default 8 MB)
+    BACKUP_PARALLEL_COLLECTIONS    - collections processed concurrently (default 4)
+    BACKUP_RESTORE_BATCH           - documents per insert_many/bulk_write (default 1000)
+    BACKUP_WATERMARK_SKEW_SECONDS  - overlap between incremental windows (default 120)
+"""
+import asyncio
+import gzip
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import bson
+from bson import json_util
+from bson.json_util import JSONOptions, JSONMode
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from pymongo import ReplaceOne
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+BACKUP_STORAGE = os.environ.get("BACKUP_STORAGE", "gridfs")
+BACKUP_DIR = os.environ.get("BACKUP_DIR", "/app/backups")
+BACKUP_CHUNK_DOCS = int(os.environ.get("BACKUP_CHUNK_DOCS", "5000"))
+BACKUP_CHUNK_BYTES = int(os.environ.get("BACKUP_CHUNK_BYTES", str(8 * 1024 * 1024)))
+BACKUP_PARALLEL_COLLECTIONS = int(os.environ.get("BACKUP_PARALLEL_COLLECTIONS", "4"))
+BACKUP_RESTORE_BATCH = int(os.environ.get("BACKUP_RESTORE_BATCH", "1000"))
+BACKUP_WATERMARK_SKEW_SECONDS = float(os.environ.get("BACKUP_WATERMARK_SKEW_SECONDS", "120"))
+
+BACKUP_BUCKET = "backup_chunks"
+
+# Never back up the backups themselves
+INTERNAL_COLLECTIONS = {
+    "database_backups",
+    "database_backup_chunks",
+    f"{BACKUP_BUCKET}.files",
+    f"{BACKUP_BUCKET}.chunks",
+}
+
+# Binary collections are stored as BSON; everything else as NDJSON
+BSON_COLLECTIONS = {"fs.chunks"}
+
+# Insert-only collections, where created_at reliably marks every change.
+# Anything updated in place must stay out of this set or an incremental
+# backup would silently miss the update.
+INCREMENTAL_COLLECTIONS = {
+    "audit_logs",
+    "security_logs",
+    "blocked_threats",
+    "login_locations",
+    "lp_history",
+    "notification_logs",
+    "group_chat_messages",
+    "whatsapp_automation_logs",
+    "fi_transactions",
+    "purchase_payments",
+}
+
+# Read order per collection; fs.chunks is sorted so each file's chunks are contiguous
+COLLECTION_SORT = {"fs.chunks": [("files_id", 1), ("n", 1)]}
+
+SUPER_ADMIN_EMAIL = "pe@smifs.com"
+
+# Relaxed extended JSON keeps numbers readable while dates/ObjectIds round-trip
+NDJSON_OPTIONS = JSONOptions(json_mode=JSONMode.RELAXED, tz_aware=True, tzinfo=timezone.utc)
+
+
+# ====================
+# Chunk encoding
+# ====================
+
+def chunk_format(collection_name: str) -> str:
+    return "bson" if collection_name in BSON_COLLECTIONS else "ndjson"
+
+
+def encode_document(doc: Dict[str, Any], fmt: str) -> bytes:
+    if fmt == "bson":
+        return bson.encode(doc)
+    return json_util.dumps(doc, json_options=NDJSON_OPTIONS).encode("utf-8") + b"\n"
+
+
+def encode_chunk(encoded_docs: List[bytes]) -> bytes:
+    """Join already-encoded documents and gzip them (CPU-bound; run in a thread)."""
+    return gzip.compress(b"".join(encoded_docs), compresslevel=6)
+
+
+def decode_chunk(data: bytes, fmt: str) -> List[Dict[str, Any]]:
+    """Inverse of encode_chunk (CPU-bound; run in a thread)."""
+    raw = gzip.decompress(data)
+    if fmt == "bson":
+        return bson.decode_all(raw)
+    return [
+        json_util.loads(line, json_options=NDJSON_OPTIONS)
+        for line in raw.split(b"\n") if line
+    ]
+
+
+# ====================
+# Chunk storage
+# ====================
+
+class ChunkStore:
+    """Writes/reads compressed chunks to the GridFS backup bucket or to disk."""
+
+    def __init__(self, storage: str = BACKUP_STORAGE, base_dir: str = BACKUP_DIR):
+        if storage not in ("gridfs", "disk"):
+            raise ValueError(f"Unknown backup storage: {storage}")
+        self.storage = storage
+        self.base_dir = base_dir
+        self._bucket = None
+
+    @property
+    def bucket(self) -> AsyncIOMotorGridFSBucket:
+        if self._bucket is None:
+            self._bucket = AsyncIOMotorGridFSBucket(db, bucket_name=BACKUP_BUCKET)
+        return self._bucket
+
+    async def write(self, backup_id: str, name: str, data: bytes) -> Dict[str, Any]:
+        if self.storage == "disk":
+            path = os.path.join(self.base_dir, backup_id, name)
+            await asyncio.to_thread(self._write_file, path, data)
+            return {"storage": "disk", "path": path}
+
+        file_id = await self.bucket.upload_from_stream(
+            name, data, metadata={"backup_id": backup_id}
+        )
+        return {"storage": "gridfs", "file_id": file_id}
+
+    @staticmethod
+    def _write_file(path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    async def read(self, ref: Dict[str, Any]) -> bytes:
+        if ref["storage"] == "disk":
+            return await asyncio.to_thread(self._read_file, ref["path"])
+        stream = await self.bucket.open_download_stream(ref["file_id"])
+        return await stream.read()
+
+    @staticmethod
+    def _read_file(path: str) -> bytes:
+        with open(path, "rb") as f:
+            return f.read()
+
+    async def delete(self, ref: Dict[str, Any]):
+        try:
+            if ref["storage"] == "disk":
+                await asyncio.to_thread(os.remove, ref["path"])
+            else:
+                await self.bucket.delete(ref["file_id"])
+        except Exception as e:
+            logger.warning(f"Could not delete backup chunk {ref}: {e}")
+
+
+class ChunkWriter:
+    """Buffers encoded documents for one collection and flushes bounded chunks."""
+
+    def __init__(self, store: ChunkStore, backup_id: str, collection_name: str,
+                 kind: str = "data", fmt: Optional[str] = None,
+                 max_docs: int = BACKUP_CHUNK_DOCS, max_bytes: int = BACKUP_CHUNK_BYTES):
+        self.store = store
+        self.backup_id = backup_id
+        self.collection_name = collection_name
+        self.kind = kind
+        self.fmt = fmt or chunk_format(collection_name)
+        self.max_docs = max_docs
+        self.max_bytes = max_bytes
+        self._buffer: List[bytes] = []
+        self._buffer_bytes = 0
+        self.seq = 0
+        self.count = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+
+    async def add(self, doc: Dict[str, Any]):
+        encoded = encode_document(doc, self.fmt)
+        self._buffer.append(encoded)
+        self._buffer_bytes += len(encoded)
+        if len(self._buffer) >= self.max_docs or self._buffer_bytes >= self.max_bytes:
+            await self.flush()
+
+    async def flush(self):
+        if not self._buffer:
+            return
+        docs, raw_size = self._buffer, self._buffer_bytes
+        self._buffer, self._buffer_bytes = [], 0
+
+        data = await asyncio.to_thread(encode_chunk, docs)
+        ext = "bson" if self.fmt == "bson" else "ndjson"
+        name = f"{self.collection_name}.{self.kind}.{self.seq:05d}.{ext}.gz"
+        ref = await self.store.write(self.backup_id, name, data)
+
+        await db.database_backup_chunks.insert_one({
+            "backup_id": self.backup_id,
+            "collection": self.collection_name,
+            "kind": self.kind,
+            "seq": self.seq,
+            "format": self.fmt,
+            "count": len(docs),
+            "raw_bytes": raw_size,
+            "stored_bytes": len(data),
+            "ref": ref
+        })
+        self.seq += 1
+        self.count += len(docs)
+        self.raw_bytes += raw_size
+        self.stored_bytes += len(data)
+
+
+# ====================
+# Backup
+# ====================
+
+def _changed_since(since: datetime) -> Dict[str, Any]:
+    """Documents created or updated at/after `since` (ISO strings or native dates)."""
+    since_iso = since.isoformat()
+    return {"$or": [
+        {"updated_at": {"$gte": since_iso}},
+        {"updated_at": {"$gte": since}},
+        {"created_at": {"$gte": since_iso}},
+        {"created_at": {"$gte": since}},
+    ]}
+
+
+async def _has_untimestamped_documents(collection) -> bool:
+    doc = await collection.find_one(
+        {"updated_at": {"$exists": False}, "created_at": {"$exists": False}},
+        {"_id": 1}
+    )
+    return doc is not None
+
+
+async def _backup_query(collection_name: str, since: Optional[datetime]) -> Tuple[str, Dict[str, Any]]:
+    """(mode, query) for one collection; incremental only for append-only collections."""
+    if (
+        since is None
+        or collection_name not in INCREMENTAL_COLLECTIONS
+        or await _has_untimestamped_documents(db[collection_name])
+    ):
+        return "full", {}
+    return "incremental", _changed_since(since)
+
+
+async def _backup_collection(store: ChunkStore, backup_id: str, collection_name: str,
+                             since: Optional[datetime]) -> Dict[str, Any]:
+    collection = db[collection_name]
+    mode, query = await _backup_query(collection_name, since)
+
+    writer = ChunkWriter(store, backup_id, collection_name)
+    cursor = collection.find(query, batch_size=1000)
+    if collection_name in COLLECTION_SORT:
+        cursor = cursor.sort(COLLECTION_SORT[collection_name])
+    async for doc in cursor:
+        await writer.add(doc)
+    await writer.flush()
+
+    result = {
+        "mode": mode,
+        "count": writer.count,
+        "chunks": writer.seq,
+        "raw_bytes": writer.raw_bytes,
+        "stored_bytes": writer.stored_bytes
+    }
+
+    if mode == "incremental":
+        # _id manifest lets restore remove documents deleted since the parent backup
+        ids = ChunkWriter(store, backup_id, collection_name, kind="ids", fmt="bson",
+                          max_docs=BACKUP_CHUNK_DOCS * 10)
+        async for doc in collection.find({}, {"_id": 1}, batch_size=5000):
+            await ids.add(doc)
+        await ids.flush()
+        result["manifest_count"] = ids.count
+
+    return result
+
+
+async def create_streaming_backup(
+    name: str,
+    collections: List[str],
+    created_by: str,
+    created_by_name: str,
+    description: Optional[str] = None,
+    base_backup_id: Optional[str] = None,
+    storage: str = BACKUP_STORAGE,
+    extra: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Back up `collections` into chunks and return the backup metadata document.
+
+    With base_backup_id the backup is incremental relative to that backup.
+    """
+    store = ChunkStore(storage)
+    started_at = datetime.now(timezone.utc)
+    since = None
+    base = None
+
+    if base_backup_id:
+        base = await db.database_backups.find_one(
+            {"id": base_backup_id, "format": "chunked", "status": "completed"}, {"_id": 0}
+        )
+        if not base:
+            raise ValueError("Base backup not found or not a completed chunked backup")
+        since = datetime.fromisoformat(base["started_at"]) - timedelta(seconds=BACKUP_WATERMARK_SKEW_SECONDS)
+
+    collections = [c for c in collections if c not in INTERNAL_COLLECTIONS]
+    backup_id = str(uuid.uuid4())
+    backup_doc = {
+        "id": backup_id,
+        "name": name,
+        "description": description,
+        "format": "chunked",
+        "storage": storage,
+        "status": "in_progress",
+        "backup_kind": "incremental" if base else "full",
+        "base_backup_id": base["id"] if base else None,
+        "watermark": since.isoformat() if since else None,
+        "started_at": started_at.isoformat(),
+        "created_at": started_at.isoformat(),
+        "created_by": created_by,
+        "created_by_name": created_by_name,
+        "collections": collections,
+        "record_counts": {},
+        "size_bytes": 0,
+        **(extra or {})
+    }
+    await db.database_backups.insert_one(backup_doc.copy())
+
+    semaphore = asyncio.Semaphore(max(1, BACKUP_PARALLEL_COLLECTIONS))
+    errors = []
+
+    async def run(collection_name):
+        async with semaphore:
+            try:
+                return collection_name, await _backup_collection(store, backup_id, collection_name, since)
+            except Exception as e:
+                logger.error(f"Error backing up {collection_name}: {e}")
+                errors.append(f"Error backing up {collection_name}: {e}")
+                return collection_name, None
+
+    results = dict(await asyncio.gather(*[run(c) for c in collections]))
+    collection_stats = {c: r for c, r in results.items() if r is not None}
+
+    update = {
+        "status": "completed" if not errors else "completed_with_errors",
+        "completed_at": datetime.now(timezone.utc).isoformat(),
+        "collection_stats": collection_stats,
+        "record_counts": {c: r["count"] for c, r in collection_stats.items()},
+        "size_bytes": sum(r["raw_bytes"] for r in collection_stats.values()),
+        "stored_bytes": sum(r["stored_bytes"] for r in collection_stats.values()),
+        "errors": errors
+    }
+    await db.database_backups.update_one({"id": backup_id}, {"$set": update})
+    backup_doc.update(update)
+    return backup_doc
+
+
+# ====================
+# Reading / restore
+# ====================
+
+async def iter_chunk_documents(backup_id: str, collection_name: str,
+                               kind: str = "data") -> AsyncIterator[List[Dict[str, Any]]]:
+    """Yield the documents of one collection in a backup, one chunk at a time."""
+    store = ChunkStore()
+    cursor = db.database_backup_chunks.find(
+        {"backup_id": backup_id, "collection": collection_name, "kind": kind},
+        {"_id": 0}
+    ).sort("seq", 1)
+    async for chunk in cursor:
+        data = await store.read(chunk["ref"])
+        yield await asyncio.to_thread(decode_chunk, data, chunk["format"])
+
+
+async def get_backup_chain(backup: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """The full backup followed by each incremental up to `backup`."""
+    chain = [backup]
+    while chain[0].get("base_backup_id"):
+        parent = await db.database_backups.find_one({"id": chain[0]["base_backup_id"]}, {"_id": 0})
+        if not parent:
+            raise ValueError(f"Base backup {chain[0]['base_backup_id']} is missing; chain is broken")
+        chain.insert(0, parent)
+    return chain
+
+
+def _restore_filter(collection_name: str) -> Dict[str, Any]:
+    # Super admin is preserved across restores
+    if collection_name == "users":
+        return {"email": {"$ne": SUPER_ADMIN_EMAIL}}
+    return {}
+
+
+def _restorable(collection_name: str, doc: Dict[str, Any]) -> bool:
+    return not (collection_name == "users" and doc.get("email") == SUPER_ADMIN_EMAIL)
+
+
+async def _insert_batches(collection, docs: List[Dict[str, Any]], collection_name: str) -> int:
+    docs = [d for d in docs if _restorable(collection_name, d)]
+    for i in range(0, len(docs), BACKUP_RESTORE_BATCH):
+        await collection.insert_many(docs[i:i + BACKUP_RESTORE_BATCH], ordered=False)
+    return len(docs)
+
+
+async def _upsert_batches(collection, docs: List[Dict[str, Any]], collection_name: str) -> int:
+    docs = [d for d in docs if _restorable(collection_name, d)]
+    for i in range(0, len(docs), BACKUP_RESTORE_BATCH):
+        await collection.bulk_write(
+            [ReplaceOne({"_id": d["_id"]}, d, upsert=True) for d in docs[i:i + BACKUP_RESTORE_BATCH]],
+            ordered=False
+        )
+    return len(docs)
+
+
+async def _apply_manifest(collection, backup_id: str, collection_name: str) -> int:
+    """Delete documents that are absent from the backup's _id manifest."""
+    keep = set()
+    async for docs in iter_chunk_documents(backup_id, collection_name, kind="ids"):
+        keep.update(repr(d["_id"]) for d in docs)
+
+    removed = 0
+    stale = []
+    async for doc in collection.find(_restore_filter(collection_name), {"_id": 1}, batch_size=5000):
+        if repr(doc["_id"]) not in keep:
+            stale.append(doc["_id"])
+        if len(stale) >= BACKUP_RESTORE_BATCH:
+            removed += (await collection.delete_many({"_id": {"$in": stale}})).deleted_count
+            stale = []
+    if stale:
+        removed += (await collection.delete_many({"_id": {"$in": stale}})).deleted_count
+    return removed
+
+
+async def _restore_collection(chain: List[Dict[str, Any]], collection_name: str) -> int:
+    collection = db[collection_name]
+    restored = 0
+
+    for backup in chain:
+        stats = (backup.get("collection_stats") or {}).get(collection_name)
+        if stats is None:
+            continue
+
+        if stats["mode"] == "full":
+            await collection.delete_many(_restore_filter(collection_name))
+            restored = 0
+            async for docs in iter_chunk_documents(backup["id"], collection_name):
+                restored += await _insert_batches(collection, docs, collection_name)
+        else:
+            async for docs in iter_chunk_documents(backup["id"], collection_name):
+                restored += await _upsert_batches(collection, docs, collection_name)
+
+    last = (chain[-1].get("collection_stats") or {}).get(collection_name)
+    if last and last["mode"] == "incremental":
+        await _apply_manifest(collection, chain[-1]["id"], collection_name)
+        restored = await collection.count_documents({})
+
+    return restored
+
+
+async def restore_streaming_backup(backup: Dict[str, Any],
+                                   collections: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Restore a chunked backup (following its incremental chain)."""
+    chain = await get_backup_chain(backup)
+    available = backup.get("collections", [])
+    targets = collections or available
+
+    restored_counts = {}
+    errors = []
+    semaphore = asyncio.Semaphore(max(1, BACKUP_PARALLEL_COLLECTIONS))
+
+    async def run(collection_name):
+        if collection_name not in available:
+            errors.append(f"Collection {collection_name} not found in backup")
+            return
+        async with semaphore:
+            try:
+                restored_counts[collection_name] = await _restore_collection(chain, collection_name)
+            except Exception as e:
+                logger.error(f"Error restoring {collection_name}: {e}")
+                errors.append(f"Error restoring {collection_name}: {e}")
+
+    await asyncio.gather(*[run(c) for c in targets])
+    return {"restored_counts": restored_counts, "errors": errors, "chain": [b["id"] for b in chain]}
+
+
+# ====================
+# Export / lifecycle
+# ====================
+
+async def write_collection_json(backup: Dict[str, Any], collection_name: str, fileobj):
+    """
+    Write one collection of a (possibly incremental) backup as a JSON array,
+    chunk by chunk, for the ZIP download format.
+
+    Only the documents stored in this backup itself are written, so callers
+    should export full backups only.
+    """
+    await asyncio.to_thread(fileobj.write, b"[")
+    first = True
+    async for docs in iter_chunk_documents(backup["id"], collection_name):
+        payload = ",\n".join(
+            json.dumps({k: v for k, v in d.items() if k != "_id"}, default=str) for d in docs
+        )
+        if payload:
+            # Writes go through the zip compressor, so keep them off the event loop
+            await asyncio.to_thread(fileobj.write, (b"" if first else b",\n") + payload.encode("utf-8"))
+            first = False
+    await asyncio.to_thread(fileobj.write, b"]")
+
+
+async def delete_streaming_backup(backup_id: str):
+    """Delete a chunked backup's chunks and metadata."""
+    store = ChunkStore()
+    async for chunk in db.database_backup_chunks.find({"backup_id": backup_id}, {"ref": 1}):
+        await store.delete(chunk["ref"])
+    await db.database_backup_chunks.delete_many({"backup_id": backup_id})
+    await db.database_backups.delete_one({"id": backup_id})
+
+
+async def apply_retention(keep: int = 10):
+    """Keep the newest `keep` backups, plus any backup an incremental still depends on."""
+    backups = await db.database_backups.find(
+        {}, {"_id": 0, "id": 1, "format": 1, "base_backup_id": 1}
+    ).sort("created_at", -1).to_list(1000)
+
+    kept = backups[:keep]
+    needed = {b["id"] for b in kept}
+    by_id = {b["id"]: b for b in backups}
+    for b in kept:
+        base_id = b.get("base_backup_id")
+        while base_id and base_id in by_id and base_id not in needed:
+            needed.add(base_id)
+            base_id = by_id[base_id].get("base_backup_id")
+
+    for b in backups:
+        if b["id"] in needed:
+            continue
+        if b.get("format") == "chunked":
+            await delete_streaming_backup(b["id"])
+        else:
+            await db.database_backups.delete_one({"id": b["id"]})
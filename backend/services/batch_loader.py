@@ -0,0 +1,175 @@
+"""
+Batch Loader Service
+Request-scoped batching of related-entity lookups (DataLoader style).
+
+List endpoints used to call db.<collection>.find_one() once per row to resolve
+clients, stocks, vendors, etc. The BatchLoader collects the ids for a page,
+issues a single {"$in": ids} query per collection, and memoizes the results
+for the lifetime of the request so repeated lookups cost nothing.
+
+Usage:
+    @router.get("/bookings")
+    async def get_bookings(loader: BatchLoader = Depends(get_batch_loader)):
+        bookings = await db.bookings.find(query, {"_id": 0}).to_list(limit)
+        clients = await loader.load_many("clients", [b["client_id"] for b in bookings])
+        stocks = await loader.load_many("stocks", [b["stock_id"] for b in bookings])
+"""
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import Response
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of ids sent in a single $in query
+MAX_IN_BATCH = 1000
+
+# Process-wide counters (exposed for diagnostics)
+LOADER_STATS = {
+    "requests": 0,
+    "round_trips": 0,
+    "cache_hits": 0,
+    "documents_loaded": 0,
+}
+
+
+class BatchLoader:
+    """
+    Per-request loader that resolves related documents with one $in query per
+    collection and memoizes them.
+
+    Documents are cached per (collection, key_field, projection), so the same
+    id requested with two different projections is fetched twice, but never
+    more than that.
+    """
+
+    def __init__(self, database=None, response: Optional[Response] = None):
+        self._db = database if database is not None else db
+        self._response = response
+        self._cache: Dict[Tuple[str, str, Tuple], Dict[Any, Optional[dict]]] = {}
+        self.round_trips = 0
+        self.cache_hits = 0
+
+    @staticmethod
+    def _projection_key(projection: Optional[dict]) -> Tuple:
+        if not projection:
+            return ()
+        return tuple(sorted(projection.items()))
+
+    def _record_round_trip(self, documents: int):
+        self.round_trips += 1
+        LOADER_STATS["round_trips"] += 1
+        LOADER_STATS["documents_loaded"] += documents
+        if self._response is not None:
+            self._response.headers["X-DB-Round-Trips"] = str(self.round_trips)
+
+    async def load_many(
+        self,
+        collection: str,
+        ids: Iterable[Any],
+        key: str = "id",
+        projection: Optional[dict] = None,
+    ) -> Dict[Any, dict]:
+        """
+        Load documents whose `key` field is in `ids`.
+
+        Args:
+            collection: Collection name (e.g. "clients")
+            ids: Iterable of key values; None/empty values and duplicates are ignored
+            key: Field to match ids against (default "id")
+            projection: Optional Mongo projection. `_id` is excluded and `key`
+                        is always included so results can be mapped back.
+
+        Returns:
+            Dict mapping key value -> document for every id that exists
+        """
+        proj = {"_id": 0}
+        if projection:
+            proj.update(projection)
+            if any(v for k, v in projection.items() if k != "_id"):
+                proj[key] = 1
+
+        cache_key = (collection, key, self._projection_key(proj))
+        cache = self._cache.setdefault(cache_key, {})
+
+        wanted = []
+        seen = set()
+        for value in ids:
+            if value is None or value == "" or value in seen:
+                continue
+            seen.add(value)
+            if value in cache:
+                self.cache_hits += 1
+                LOADER_STATS["cache_hits"] += 1
+            else:
+                wanted.append(value)
+
+        for start in range(0, len(wanted), MAX_IN_BATCH):
+            chunk = wanted[start:start + MAX_IN_BATCH]
+            docs = await self._db[collection].find(
+                {key: {"$in": chunk}}, proj
+            ).to_list(len(chunk) * 2)
+            self._record_round_trip(len(docs))
+            for doc in docs:
+                cache[doc.get(key)] = doc
+            # Remember misses so they are not re-queried within this request
+            for value in chunk:
+                cache.setdefault(value, None)
+
+        return {value: cache[value] for value in seen if cache.get(value) is not None}
+
+    async def load(
+        self,
+        collection: str,
+        value: Any,
+        key: str = "id",
+        projection: Optional[dict] = None,
+    ) -> Optional[dict]:
+        """Load a single document through the same batching cache."""
+        if value is None or value == "":
+            return None
+        result = await self.load_many(collection, [value], key=key, projection=projection)
+        return result.get(value)
+
+    def prime(self, collection: str, documents: List[dict], key: str = "id", projection: Optional[dict] = None):
+        """Seed the cache with documents that were already fetched elsewhere."""
+        proj = {"_id": 0}
+        if projection:
+            proj.update(projection)
+            if any(v for k, v in projection.items() if k != "_id"):
+                proj[key] = 1
+        cache = self._cache.setdefault((collection, key, self._projection_key(proj)), {})
+        for doc in documents:
+            if doc.get(key) is not None:
+                cache[doc[key]] = doc
+
+    async def aggregate(self, collection: str, pipeline: List[dict], length: Optional[int] = None) -> List[dict]:
+        """Run an aggregation and count it as a round-trip for this request."""
+        docs = await self._db[collection].aggregate(pipeline).to_list(length)
+        self._record_round_trip(len(docs))
+        return docs
+
+    def stats(self) -> Dict[str, int]:
+        """Round-trip and cache-hit counters for this request."""
+        return {"round_trips": self.round_trips, "cache_hits": self.cache_hits}
+
+
+async def get_batch_loader(response: Response) -> BatchLoader:
+    """
+    FastAPI dependency returning a fresh BatchLoader for the current request.
+
+    The number of round-trips made by the loader is reported back to the
+    client in the X-DB-Round-Trips response header.
+    """
+    LOADER_STATS["requests"] += 1
+    return BatchLoader(response=response)
+
+
+def get_loader_stats() -> Dict[str, int]:
+    """Process-wide loader counters since startup."""
+    stats = dict(LOADER_STATS)
+    requests = stats["requests"] or 1
+    stats["avg_round_trips_per_request"] = round(stats["round_trips"] / requests, 2)
+    return stats
@@ -0,0 +1,795 @@
+"""
+Booking Event Outbox
+Durable, Mongo-backed side effects for booking state changes.
+
+Booking endpoints commit the state change (a conditional update on
+db.bookings), write one event to db.booking_events with emit_booking_event()
+and return. A background dispatcher in every API process claims batches of
+pending events, loads the clients, stocks and creators for the whole batch at
+once and fans each event out to the channel handlers registered for its type:
+client/role email (queued on the email outbox), WhatsApp activity alerts,
+in-app/WebSocket notifications and the audit log.
+
+Idempotency:
+- Every event carries an idempotency key (e.g. "booking:<id>:approved"); a
+  unique index turns a duplicate emit into a no-op.
+- Each channel's delivery is recorded on the event (deliveries.<channel>), so
+  a retried event only re-runs the channels that failed. Delivery is
+  at-least-once per channel: a worker that dies mid-batch has its claim
+  picked up again once the lease expires.
+
+Failed channels are retried with exponential backoff until
+BOOKING_EVENTS_MAX_ATTEMPTS, after which the event is kept as "failed" for
+inspection. Completed events are removed by a TTL index.
+
+Configuration (environment):
+    BOOKING_EVENTS_BATCH_SIZE          - events claimed per batch (default 50)
+    BOOKING_EVENTS_POLL_SECONDS        - idle poll interval (default 2)
+    BOOKING_EVENTS_MAX_ATTEMPTS        - attempts before an event is failed (default 6)
+    BOOKING_EVENTS_RETRY_BASE_SECONDS  - first retry delay, doubled per attempt (default 15)
+    BOOKING_EVENTS_LEASE_SECONDS       - claim lease (default 300)
+"""
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from database import db
+from services.batch_loader import BatchLoader
+from services.settings_cache import get_setting
+
+logger = logging.getLogger(__name__)
+
+BOOKING_EVENTS_BATCH_SIZE = int(os.environ.get("BOOKING_EVENTS_BATCH_SIZE", "50"))
+BOOKING_EVENTS_POLL_SECONDS = float(os.environ.get("BOOKING_EVENTS_POLL_SECONDS", "2"))
+BOOKING_EVENTS_MAX_ATTEMPTS = int(os.environ.get("BOOKING_EVENTS_MAX_ATTEMPTS", "6"))
+BOOKING_EVENTS_RETRY_BASE_SECONDS = float(os.environ.get("BOOKING_EVENTS_RETRY_BASE_SECONDS", "15"))
+BOOKING_EVENTS_LEASE_SECONDS = float(os.environ.get("BOOKING_EVENTS_LEASE_SECONDS", "300"))
+
+# Delivered events are kept briefly (idempotency window), failed ones for inspection
+DONE_RETENTION_HOURS = 72
+FAILED_RETENTION_DAYS = 7
+
+# Event types
+BOOKING_CREATED = "booking.created"
+BOOKING_APPROVED = "booking.approved"
+BOOKING_REJECTED = "booking.rejected"
+BOOKING_VOIDED = "booking.voided"
+BOOKING_PAYMENT_RECORDED = "booking.payment_recorded"
+BOOKING_DP_TRANSFERRED = "booking.dp_transferred"
+
+# handler(event, context) -> None; raising marks the channel for retry
+EventHandler = Callable[[Dict[str, Any], "BookingEventContext"], Awaitable[None]]
+
+_handlers: Dict[str, Dict[str, EventHandler]] = {}
+
+
+def event_handler(event_type: str, channel: str):
+    """Register the handler for one channel of an event type."""
+    def register(fn: EventHandler) -> EventHandler:
+        _handlers.setdefault(event_type, {})[channel] = fn
+        return fn
+    return register
+
+
+def get_client_emails(client: dict) -> list:
+    """Get all email addresses for a client"""
+    emails = []
+    if client.get("email"):
+        emails.append(client["email"])
+    if client.get("secondary_email"):
+        emails.append(client["secondary_email"])
+    if client.get("tertiary_email"):
+        emails.append(client["tertiary_email"])
+    return emails
+
+
+# ====================
+# Emit
+# ====================
+
+def event_actor(user: dict) -> Dict[str, Any]:
+    """The parts of current_user the handlers need (audit, CCs, exclusions)."""
+    return {
+        "id": user.get("id"),
+        "name": user.get("name"),
+        "role": user.get("role", 6),
+        "email": user.get("email")
+    }
+
+
+async def emit_booking_event(
+    event_type: str,
+    booking: Dict[str, Any],
+    actor: Dict[str, Any],
+    payload: Optional[Dict[str, Any]] = None,
+    idempotency_key: Optional[str] = None
+) -> Optional[str]:
+    """
+    Record a booking state change for the dispatcher and wake it.
+
+    Args:
+        event_type: One of the BOOKING_* event types
+        booking: Booking document as of the state change
+        actor: event_actor(current_user)
+        payload: Event-specific data; an "audit" entry (action, details,
+                 entity_name) is written to the audit log by the dispatcher
+        idempotency_key: Emitting the same key twice is a no-op
+
+    Returns:
+        The event id, or None if the key was already emitted
+    """
+    channels = list(_handlers.get(event_type, {}))
+    now = datetime.now(timezone.utc)
+    event_id = str(uuid.uuid4())
+    event = {
+        "id": event_id,
+        "idempotency_key": idempotency_key or event_id,
+        "event_type": event_type,
+        "booking_id": booking.get("id"),
+        "booking": booking,
+        "actor": actor,
+        "payload": payload or {},
+        "channels": channels,
+        "deliveries": {},
+        "last_errors": {},
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "claim_id": None,
+        "lease_until": None,
+        "created_at": now.isoformat()
+    }
+
+    try:
+        await db.booking_events.insert_one(event)
+    except DuplicateKeyError:
+        logger.info(f"Booking event {idempotency_key} already emitted")
+        return None
+
+    booking_event_dispatcher.notify()
+    return event_id
+
+
+# ====================
+# Dispatch
+# ====================
+
+class BookingEventContext:
+    """
+    Related documents for one batch of events.
+
+    Clients, stocks and creators are fetched with one $in query per
+    collection for the whole batch; the company master comes from the
+    settings cache.
+    """
+
+    def __init__(self, loader: Optional[BatchLoader] = None):
+        self.loader = loader or BatchLoader()
+
+    async def prefetch(self, events: List[Dict[str, Any]]):
+        bookings = [e.get("booking") or {} for e in events]
+        await asyncio.gather(
+            self.loader.load_many("clients", [b.get("client_id") for b in bookings]),
+            self.loader.load_many("stocks", [b.get("stock_id") for b in bookings]),
+            self.loader.load_many("users", [b.get("created_by") for b in bookings])
+        )
+
+    async def client(self, event: Dict[str, Any]) -> Optional[dict]:
+        return await self.loader.load("clients", event["booking"].get("client_id"))
+
+    async def stock(self, event: Dict[str, Any]) -> Optional[dict]:
+        return await self.loader.load("stocks", event["booking"].get("stock_id"))
+
+    async def creator(self, event: Dict[str, Any]) -> Optional[dict]:
+        return await self.loader.load("users", event["booking"].get("created_by"))
+
+    async def company(self) -> Optional[dict]:
+        return await get_setting("company")
+
+
+def pending_channels(event: Dict[str, Any]) -> List[str]:
+    """Channels not yet delivered for this event."""
+    deliveries = event.get("deliveries") or {}
+    return [c for c in event.get("channels", []) if deliveries.get(c) != "done"]
+
+
+def plan_event_update(event: Dict[str, Any], errors: Dict[str, Optional[str]],
+                      now: datetime) -> Tuple[str, Dict[str, Any]]:
+    """
+    The $set for an event after one dispatch attempt.
+
+    errors maps each attempted channel to its error (None on success).
+    Returns (outcome, $set) where outcome is "done", "retry" or "failed".
+    """
+    attempts = event.get("attempts", 0) + 1
+    update: Dict[str, Any] = {"attempts": attempts, "claim_id": None, "lease_until": None}
+    for channel, error in errors.items():
+        if error is None:
+            update[f"deliveries.{channel}"] = "done"
+            update[f"last_errors.{channel}"] = None
+        else:
+            update[f"last_errors.{channel}"] = error
+
+    if not any(errors.values()):
+        update.update({
+            "status": "done",
+            "completed_at": now.isoformat(),
+            "expires_at": now + timedelta(hours=DONE_RETENTION_HOURS)
+        })
+        return "done", update
+
+    if attempts >= BOOKING_EVENTS_MAX_ATTEMPTS:
+        update.update({
+            "status": "failed",
+            "expires_at": now + timedelta(days=FAILED_RETENTION_DAYS)
+        })
+        return "failed", update
+
+    delay = BOOKING_EVENTS_RETRY_BASE_SECONDS * (2 ** (attempts - 1))
+    update.update({"status": "pending", "next_attempt_at": now + timedelta(seconds=delay)})
+    return "retry", update
+
+
+async def dispatch_event(event: Dict[str, Any], context: BookingEventContext) -> Dict[str, Optional[str]]:
+    """Run the undelivered channels of one event concurrently; returns channel -> error."""
+    handlers = _handlers.get(event["event_type"], {})
+
+    async def run(channel: str) -> Optional[str]:
+        handler = handlers.get(channel)
+        if handler is None:
+            return None  # channel removed since the event was written
+        try:
+            await handler(event, context)
+            return None
+        except Exception as e:
+            logger.warning(f"Booking event {event['event_type']} ({event['id']}) channel {channel} failed: {e}")
+            return str(e) or type(e).__name__
+
+    channels = pending_channels(event)
+    errors = await asyncio.gather(*[run(c) for c in channels])
+    return dict(zip(channels, errors))
+
+
+class BookingEventDispatcher:
+    """Background task that drains db.booking_events in batches."""
+
+    def __init__(self, batch_size: int = BOOKING_EVENTS_BATCH_SIZE,
+                 poll_seconds: float = BOOKING_EVENTS_POLL_SECONDS):
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self.batches = 0
+        self.delivered = 0
+        self.retried = 0
+        self.failed = 0
+
+    def notify(self):
+        """Wake the dispatcher early (called after emit)."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Booking event dispatcher started ({self.worker_id})")
+
+    async def stop(self, timeout: float = 15.0):
+        """Finish the batch in progress, then stop. Undelivered events stay in Mongo."""
+        self._stopping = True
+        self.notify()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout=timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                processed = await self.process_batch()
+            except Exception as e:
+                logger.error(f"Booking event batch failed: {e}")
+                processed = 0
+
+            if processed >= self.batch_size:
+                continue  # more waiting; go straight to the next batch
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _claim(self) -> List[Dict[str, Any]]:
+        now = datetime.now(timezone.utc)
+        claimable = {"$or": [
+            {"status": "pending", "next_attempt_at": {"$lte": now}},
+            {"status": "processing", "lease_until": {"$lt": now}}
+        ]}
+        candidates = await db.booking_events.find(
+            claimable, {"_id": 0, "id": 1}
+        ).sort("next_attempt_at", 1).limit(self.batch_size).to_list(self.batch_size)
+        if not candidates:
+            return []
+
+        claim_id = f"{self.worker_id}:{uuid.uuid4()}"
+        await db.booking_events.update_many(
+            {"id": {"$in": [c["id"] for c in candidates]}, **claimable},
+            {"$set": {
+                "status": "processing",
+                "claim_id": claim_id,
+                "lease_until": now + timedelta(seconds=BOOKING_EVENTS_LEASE_SECONDS)
+            }}
+        )
+        events = await db.booking_events.find({"claim_id": claim_id}, {"_id": 0}).to_list(self.batch_size)
+        # Oldest first so a booking's created -> approved -> ... side effects keep their order within a batch
+        events.sort(key=lambda e: e.get("created_at", ""))
+        return events
+
+    async def process_batch(self) -> int:
+        """Claim and dispatch one batch. Returns the number of events handled."""
+        events = await self._claim()
+        if not events:
+            return 0
+        self.batches += 1
+
+        context = BookingEventContext()
+        await context.prefetch(events)
+
+        # Events for the same booking run in order; different bookings run concurrently
+        by_booking: Dict[Any, List[Dict[str, Any]]] = {}
+        for event in events:
+            by_booking.setdefault(event.get("booking_id"), []).append(event)
+
+        async def run_in_order(chain: List[Dict[str, Any]]):
+            return [(event, await dispatch_event(event, context)) for event in chain]
+
+        now = datetime.now(timezone.utc)
+        ops = []
+        for chain in await asyncio.gather(*[run_in_order(chain) for chain in by_booking.values()]):
+            for event, errors in chain:
+                outcome, update = plan_event_update(event, errors, now)
+                # Only while still ours: an expired lease may have been re-claimed by another worker
+                ops.append(UpdateOne({"id": event["id"], "claim_id": event["claim_id"]}, {"$set": update}))
+                if outcome == "done":
+                    self.delivered += 1
+                elif outcome == "retry":
+                    self.retried += 1
+                else:
+                    self.failed += 1
+                    logger.error(f"Booking event {event['event_type']} ({event['id']}) failed: {update.get('last_errors')}")
+
+        if ops:
+            await db.booking_events.bulk_write(ops, ordered=False)
+        return len(events)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "batches": self.batches,
+            "delivered": self.delivered,
+            "retried": self.retried,
+            "failed": self.failed
+        }
+
+
+booking_event_dispatcher = BookingEventDispatcher()
+
+
+def start_booking_event_dispatcher():
+    booking_event_dispatcher.start()
+
+
+async def stop_booking_event_dispatcher():
+    await booking_event_dispatcher.stop()
+
+
+async def get_booking_event_stats() -> Dict[str, Any]:
+    """Dispatcher counters plus queue depth."""
+    return {
+        **booking_event_dispatcher.stats(),
+        "pending": await db.booking_events.count_documents({"status": {"$in": ["pending", "processing"]}}),
+        "failed_retained": await db.booking_events.count_documents({"status": "failed"})
+    }
+
+
+# ====================
+# Handlers
+# ====================
+
+def _booking_number(event: Dict[str, Any]) -> str:
+    booking = event["booking"]
+    return booking.get("booking_number") or booking["id"][:8].upper()
+
+
+async def _write_audit(event: Dict[str, Any], context: BookingEventContext):
+    from services.audit_service import create_audit_log
+
+    audit = event["payload"].get("audit")
+    if not audit:
+        return
+    actor = event["actor"]
+    await create_audit_log(
+        action=audit["action"],
+        entity_type="booking",
+        entity_id=event["booking_id"],
+        user_id=actor["id"],
+        user_name=actor["name"],
+        user_role=actor["role"],
+        entity_name=audit.get("entity_name"),
+        details=audit.get("details")
+    )
+
+
+for _event_type in (BOOKING_CREATED, BOOKING_APPROVED, BOOKING_REJECTED, BOOKING_VOIDED, BOOKING_DP_TRANSFERRED):
+    event_handler(_event_type, "audit")(_write_audit)
+
+
+# ---- booking.created ----
+
+@event_handler(BOOKING_CREATED, "email")
+async def _created_email(event, context):
+    from services.email_service import send_templated_email
+
+    client = await context.client(event)
+    stock = await context.stock(event)
+    if not client or not client.get("email"):
+        return
+    await send_templated_email(
+        "booking_created",
+        client["email"],
+        {
+            "client_name": client["name"],
+            "booking_number": event["booking"].get("booking_number"),
+            "stock_symbol": stock["symbol"] if stock else "N/A",
+            "stock_name": stock["name"] if stock else "",
+            "quantity": event["booking"].get("quantity")
+        },
+        cc_email=event["actor"].get("email")
+    )
+
+
+@event_handler(BOOKING_CREATED, "whatsapp")
+async def _created_whatsapp(event, context):
+    from services.activity_alerts import notify_booking_created
+
+    booking = event["booking"]
+    client = await context.client(event)
+
+    rp_info = None
+    if booking.get("referral_partner_id"):
+        rp_info = await db.referral_partners.find_one({"id": booking["referral_partner_id"]}, {"_id": 0})
+
+    bp_data = None
+    if event["payload"].get("bp_id"):
+        bp_data = await db.business_partners.find_one({"id": event["payload"]["bp_id"]}, {"_id": 0})
+
+    await notify_booking_created(booking, client, rp=rp_info, bp=bp_data)
+
+
+@event_handler(BOOKING_CREATED, "websocket")
+async def _created_websocket(event, context):
+    from services.notification_service import notify_roles
+
+    booking = event["booking"]
+    client = await context.client(event) or {}
+    stock = await context.stock(event) or {}
+    booking_number = booking.get("booking_number")
+
+    # Real-time notification to PE Desk
+    await notify_roles(
+        [1],
+        "booking_pending",
+        "New Booking Pending Approval",
+        f"Booking {booking_number} for '{client.get('name')}' - {stock.get('symbol')} x {booking.get('quantity')} awaiting PE Desk approval",
+        {"booking_id": booking["id"], "booking_number": booking_number, "client_name": client.get("name"), "stock_symbol": stock.get("symbol")}
+    )
+
+
+@event_handler(BOOKING_CREATED, "email_roles")
+async def _created_role_email(event, context):
+    from services.role_notification_service import notify_new_booking
+
+    booking = event["booking"]
+    client = await context.client(event) or {}
+    stock = await context.stock(event) or {}
+    await notify_new_booking(
+        booking_number=booking.get("booking_number"),
+        client_name=client.get("name"),
+        stock_symbol=stock.get("symbol"),
+        stock_name=stock.get("name"),
+        quantity=booking.get("quantity"),
+        total_amount=booking.get("quantity", 0) * (booking.get("selling_price") or 0),
+        created_by=event["actor"]["name"],
+        exclude_user_id=event["actor"]["id"]
+    )
+
+
+# ---- booking.approved / booking.rejected ----
+
+@event_handler(BOOKING_APPROVED, "email")
+async def _approved_email(event, context):
+    """Confirmation request (accept/deny links), or the loss-review notice."""
+    from services.email_service import send_templated_email
+
+    booking = event["booking"]
+    client = await context.client(event)
+    client_emails = get_client_emails(client) if client else []
+    if not client_emails:
+        return
+    primary_email = client_emails[0]
+    additional_emails = client_emails[1:] if len(client_emails) > 1 else None
+
+    stock = await context.stock(event)
+    creator = await context.creator(event)
+    booking_id = booking["id"]
+    booking_number = _booking_number(event)
+
+    if booking.get("is_loss_booking") and booking.get("loss_approval_status") == "pending":
+        await send_templated_email(
+            "booking_pending_loss_review",
+            primary_email,
+            {
+                "client_name": client["name"],
+                "booking_number": booking_number,
+                "stock_symbol": stock["symbol"] if stock else "N/A"
+            },
+            cc_email=creator.get("email") if creator else None,
+            additional_emails=additional_emails
+        )
+        return
+
+    # Get frontend URL - Priority order:
+    # 1. custom_domain from Company Master (UI configurable)
+    # 2. FRONTEND_URL env variable
+    # 3. REACT_APP_BACKEND_URL env variable
+    # 4. Default fallback
+    company_master = await context.company()
+    frontend_url = (
+        (company_master.get("custom_domain") if company_master else None) or
+        os.environ.get('FRONTEND_URL') or
+        os.environ.get('REACT_APP_BACKEND_URL', 'https://live-nsdl-lookup.preview.emergentagent.com')
+    )
+    # Remove trailing slash if present
+    frontend_url = frontend_url.rstrip('/') if frontend_url else frontend_url
+    confirmation_token = booking.get("client_confirmation_token")
+
+    await send_templated_email(
+        "booking_confirmation_request",
+        primary_email,
+        {
+            "client_name": client["name"],
+            "booking_number": booking_number,
+            "otc_ucc": client.get("otc_ucc", "N/A"),
+            "stock_symbol": stock["symbol"] if stock else "N/A",
+            "stock_name": stock["name"] if stock else "",
+            "quantity": booking["quantity"],
+            "selling_price": f"{booking.get('selling_price', 0):,.2f}",
+            "total_value": f"{(booking.get('selling_price', 0) * booking.get('quantity', 0)):,.2f}",
+            "approved_by": event["actor"]["name"],
+            "accept_url": f"{frontend_url}/booking-confirm/{booking_id}/{confirmation_token}/accept",
+            "deny_url": f"{frontend_url}/booking-confirm/{booking_id}/{confirmation_token}/deny"
+        },
+        cc_email=creator.get("email") if creator else None,
+        additional_emails=additional_emails
+    )
+
+
+@event_handler(BOOKING_APPROVED, "email_payment_request")
+async def _approved_payment_request(event, context):
+    """Payment request with bank details and company documents."""
+    from services.email_service import send_payment_request_email
+
+    client = await context.client(event)
+    if not client or not get_client_emails(client):
+        return
+    company_master = await context.company()
+    if not company_master:
+        return
+    creator = await context.creator(event)
+    await send_payment_request_email(
+        booking_id=event["booking_id"],
+        client=client,
+        stock=await context.stock(event),
+        booking=event["booking"],
+        company_master=company_master,
+        approved_by=event["actor"]["name"],
+        cc_email=creator.get("email") if creator else None
+    )
+
+
+@event_handler(BOOKING_APPROVED, "websocket")
+async def _approved_websocket(event, context):
+    from services.notification_service import create_notification
+
+    booking = event["booking"]
+    if not booking.get("created_by"):
+        return
+    stock = await context.stock(event)
+    await create_notification(
+        booking["created_by"],
+        "booking_approved",
+        "Booking Approved - Awaiting Client Confirmation",
+        f"Your booking {_booking_number(event)} for '{stock['symbol'] if stock else 'N/A'}' has been approved.",
+        {"booking_id": booking["id"], "stock_symbol": stock['symbol'] if stock else None}
+    )
+
+
+@event_handler(BOOKING_APPROVED, "whatsapp")
+async def _approved_whatsapp(event, context):
+    from services.activity_alerts import notify_booking_approved
+
+    client = await context.client(event)
+    if client and client.get("id"):
+        await notify_booking_approved(event["booking"], client["id"])
+
+
+@event_handler(BOOKING_REJECTED, "websocket")
+async def _rejected_websocket(event, context):
+    from services.notification_service import create_notification
+
+    booking = event["booking"]
+    if not booking.get("created_by"):
+        return
+    stock = await context.stock(event)
+    await create_notification(
+        booking["created_by"],
+        "booking_rejected",
+        "Booking Rejected",
+        f"Your booking for '{stock['symbol'] if stock else 'N/A'}' has been rejected",
+        {"booking_id": booking["id"], "stock_symbol": stock['symbol'] if stock else None}
+    )
+
+
+@event_handler(BOOKING_REJECTED, "whatsapp")
+async def _rejected_whatsapp(event, context):
+    from services.activity_alerts import notify_booking_rejected
+
+    client = await context.client(event)
+    if client and client.get("id"):
+        await notify_booking_rejected(event["booking"], client["id"], "Booking did not meet approval criteria")
+
+
+# ---- booking.voided ----
+
+@event_handler(BOOKING_VOIDED, "email_refund")
+async def _voided_refund_email(event, context):
+    from services.email_service import send_templated_email
+
+    payload = event["payload"]
+    if not payload.get("refund_amount"):
+        return
+    client = await context.client(event)
+    if not client or not client.get("email"):
+        return
+    stock = await context.stock(event)
+    await send_templated_email(
+        "refund_request_created",
+        client["email"],
+        {
+            "client_name": client["name"],
+            "booking_number": event["booking"].get("booking_number", ""),
+            "stock_symbol": stock["symbol"] if stock else "Unknown",
+            "refund_amount": f"{payload['refund_amount']:,.2f}",
+            "void_reason": payload.get("reason")
+        }
+    )
+
+
+@event_handler(BOOKING_VOIDED, "email")
+async def _voided_email(event, context):
+    from services.email_service import send_templated_email
+
+    booking = event["booking"]
+    payload = event["payload"]
+    client = await context.client(event)
+    if not client or not client.get("email"):
+        return
+    stock = await context.stock(event)
+    await send_templated_email(
+        "booking_voided",
+        client["email"],
+        {
+            "client_name": client.get("name", "Valued Customer"),
+            "booking_number": booking.get("booking_number", booking["id"]),
+            "stock_symbol": stock.get("symbol", "Unknown") if stock else "Unknown",
+            "stock_name": stock.get("name", "") if stock else "",
+            "quantity": str(booking.get("quantity", 0)),
+            "booking_date": booking.get("created_at", "")[:10] if booking.get("created_at") else "",
+            "voided_date": payload["voided_at"][:10],
+            "voided_by": event["actor"].get("name") or "PE Desk",
+            "void_reason": payload.get("reason")
+        }
+    )
+
+
+# ---- booking.payment_recorded ----
+
+@event_handler(BOOKING_PAYMENT_RECORDED, "email_dp_ready")
+async def _payment_dp_ready_email(event, context):
+    """DP Ready email once the booking is fully paid."""
+    from services.email_service import send_dp_ready_email
+
+    if not event["payload"].get("payment_complete"):
+        return
+    client = await context.client(event)
+    stock = await context.stock(event)
+    if not client or not stock:
+        return
+    await send_dp_ready_email(
+        client=client,
+        booking=event["booking"],
+        stock=stock,
+        company_master=await context.company() or {},
+        cc_email=event["actor"].get("email")
+    )
+
+
+@event_handler(BOOKING_PAYMENT_RECORDED, "email_roles")
+async def _payment_role_email(event, context):
+    from services.role_notification_service import notify_payment_received
+
+    payload = event["payload"]
+    client = await context.client(event)
+    await notify_payment_received(
+        booking_number=event["booking"].get("booking_number", event["booking_id"]),
+        client_name=client.get("name", "Unknown") if client else "Unknown",
+        amount=payload["amount"],
+        payment_mode=payload["payment_mode"],
+        recorded_by=event["actor"]["name"],
+        exclude_user_id=event["actor"]["id"]
+    )
+
+
+# ---- booking.dp_transferred ----
+
+@event_handler(BOOKING_DP_TRANSFERRED, "email")
+async def _dp_transferred_email(event, context):
+    from services.email_service import send_stock_transferred_email
+
+    client = await context.client(event)
+    stock = await context.stock(event)
+    company_master = await context.company()
+    if not client or not stock or not company_master:
+        return
+    await send_stock_transferred_email(
+        booking_id=event["booking_id"],
+        client=client,
+        booking=event["booking"],
+        stock=stock,
+        dp_type=event["payload"]["dp_type"],
+        transfer_date=event["payload"]["transferred_at"],
+        company_master=company_master,
+        cc_email=event["actor"].get("email")
+    )
+
+
+@event_handler(BOOKING_DP_TRANSFERRED, "email_roles")
+async def _dp_transferred_role_email(event, context):
+    from services.role_notification_service import notify_dp_transfer
+
+    booking = event["booking"]
+    client = await context.client(event)
+    stock = await context.stock(event)
+    await notify_dp_transfer(
+        booking_number=booking.get("booking_number", booking["id"]),
+        client_name=client.get("name", "Unknown") if client else "Unknown",
+        stock_symbol=stock.get("symbol", "Unknown") if stock else "Unknown",
+        quantity=booking.get("quantity", 0),
+        dp_type=event["payload"]["dp_type"],
+        transferred_by=event["actor"]["name"],
+        exclude_user_id=event["actor"]["id"]
+    )
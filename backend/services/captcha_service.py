@@ -2,13 +2,18 @@
 CAPTCHA Service
 Provides simple math-based CAPTCHA for login protection
 No external API keys required
+
+Challenges are stored in db.captcha_challenges (TTL on expires_at) so a
+challenge issued by one API worker can be answered on another.
 """
 import random
 import hashlib
 import time
 import logging
-from typing import Dict, Tuple
-from datetime import datetime, timezone
+from typing import Tuple
+from datetime import datetime, timezone, timedelta
+
+from database import db
 
 logger = logging.getLogger(__name__)
 
@@ -19,24 +24,13 @@ class CaptchaService:
     """
     
     def __init__(self):
-        # Store active CAPTCHA challenges: {token: (answer, expiry_time, email)}
-        self.challenges: Dict[str, Tuple[int, float, str]] = {}
         self.challenge_expiry = 300  # 5 minutes
-        
-    def _cleanup_expired(self):
-        """Remove expired challenges"""
-        now = time.time()
-        expired = [token for token, (_, expiry, _) in self.challenges.items() if now > expiry]
-        for token in expired:
-            del self.challenges[token]
     
-    def generate_challenge(self, email: str) -> dict:
+    async def generate_challenge(self, email: str) -> dict:
         """
         Generate a new CAPTCHA challenge
         Returns: {token, question, image_data (optional)}
         """
-        self._cleanup_expired()
-        
         # Generate random math problem
         operation = random.choice(['addition', 'subtraction', 'multiplication'])
         
@@ -64,8 +58,12 @@ class CaptchaService:
         ).hexdigest()[:32]
         
         # Store challenge
-        expiry = time.time() + self.challenge_expiry
-        self.challenges[token] = (answer, expiry, email)
+        await db.captcha_challenges.insert_one({
+            "_id": token,
+            "answer": answer,
+            "email": email.lower(),
+            "expires_at": datetime.now(timezone.utc) + timedelta(seconds=self.challenge_expiry)
+        })
         
         logger.info(f"Generated CAPTCHA challenge for {email}")
         
@@ -76,38 +74,38 @@ class CaptchaService:
             "expires_in": self.challenge_expiry
         }
     
-    def verify_challenge(self, token: str, user_answer: str, email: str) -> Tuple[bool, str]:
+    async def verify_challenge(self, token: str, user_answer: str, email: str) -> Tuple[bool, str]:
         """
         Verify a CAPTCHA answer
         Returns: (is_valid, message)
         """
-        self._cleanup_expired()
-        
-        if not token or token not in self.challenges:
+        challenge = await db.captcha_challenges.find_one({"_id": token}) if token else None
+        if not challenge:
             return False, "CAPTCHA expired or invalid. Please request a new one."
         
-        correct_answer, expiry, challenge_email = self.challenges[token]
-        
-        # Check if expired
-        if time.time() > expiry:
-            del self.challenges[token]
+        # Check if expired (the TTL monitor only runs once a minute)
+        if datetime.now(timezone.utc) > challenge["expires_at"].replace(tzinfo=timezone.utc):
+            await db.captcha_challenges.delete_one({"_id": token})
             return False, "CAPTCHA has expired. Please request a new one."
         
         # Check if email matches
-        if challenge_email.lower() != email.lower():
+        if challenge["email"] != email.lower():
             return False, "CAPTCHA token does not match this email."
         
         # Verify answer
         try:
             user_int = int(user_answer.strip())
-            if user_int == correct_answer:
-                # Remove used challenge
-                del self.challenges[token]
-                return True, "CAPTCHA verified successfully."
-            else:
-                return False, "Incorrect CAPTCHA answer. Please try again."
         except ValueError:
             return False, "Please enter a valid number."
+        
+        if user_int != challenge["answer"]:
+            return False, "Incorrect CAPTCHA answer. Please try again."
+        
+        # Remove used challenge; only one concurrent request may redeem it
+        result = await db.captcha_challenges.delete_one({"_id": token})
+        if result.deleted_count == 0:
+            return False, "CAPTCHA expired or invalid. Please request a new one."
+        return True, "CAPTCHA verified successfully."
     
     def requires_captcha(self, failed_attempts: int) -> bool:
         """Check if CAPTCHA is required based on failed attempts"""
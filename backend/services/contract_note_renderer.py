@@ -0,0 +1,842 @@
+"""
+Contract Note Renderer
+Pure ReportLab rendering of confirmation notes, run inside the render pool's
+worker processes (see services/contract_note_service.py).
+
+The functions here take plain dicts that the service has already fetched
+(booking/purchase, company master, client/vendor, stock) and return the PDF
+bytes, so they are picklable and never touch the database.
+
+Paragraph styles, colours and table styles are built once per worker process
+(functools.lru_cache) instead of once per note. The notes use the built-in
+Helvetica faces, so there are no TrueType fonts to parse and register.
+"""
+import io
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Optional
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib import colors
+from reportlab.lib.units import cm
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.enums import TA_CENTER, TA_LEFT
+from reportlab.platypus import (
+    SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle,
+    HRFlowable
+)
+from num2words import num2words
+
+
+# Color scheme - Professional emerald green theme
+PRIMARY_COLOR = colors.Color(0.02, 0.31, 0.23)  # Dark emerald
+ACCENT_COLOR = colors.Color(0.85, 0.65, 0.13)  # Gold accent
+LIGHT_BG = colors.Color(0.97, 0.99, 0.97)  # Very light green tint
+BORDER_COLOR = colors.Color(0.8, 0.85, 0.8)  # Light border
+
+# Green theme of the vendor purchase note
+PURCHASE_COLOR = colors.HexColor('#065f46')
+
+
+def safe_str(value, default="N/A"):
+    """Safely convert value to string, returning default for None or empty values"""
+    if value is None or value == "":
+        return default
+    return str(value)
+
+
+def amount_to_words(amount: float) -> str:
+    """Convert amount to words in Indian format"""
+    try:
+        rupees = int(amount)
+        paise = int((amount - rupees) * 100)
+
+        words = num2words(rupees, lang='en_IN').replace(',', '').title()
+
+        if paise > 0:
+            paise_words = num2words(paise, lang='en_IN').title()
+            return f"{words} Rupees and {paise_words} Paise Only"
+        return f"{words} Rupees Only"
+    except (ValueError, TypeError):
+        return f"INR {amount:,.2f}"
+
+
+# ==================== CACHED LAYOUT ASSETS ====================
+
+@lru_cache(maxsize=1)
+def contract_note_styles() -> Dict[str, ParagraphStyle]:
+    """Paragraph styles of the client confirmation note (built once per process)."""
+    styles = getSampleStyleSheet()
+    grey = colors.Color(0.4, 0.4, 0.4)
+
+    return {
+        "title": ParagraphStyle(
+            'TitleStyle',
+            parent=styles['Heading1'],
+            fontSize=16,
+            alignment=TA_CENTER,
+            textColor=PRIMARY_COLOR,
+            spaceAfter=8,
+            fontName='Helvetica-Bold',
+            leading=20
+        ),
+        "subtitle": ParagraphStyle(
+            'SubtitleStyle',
+            parent=styles['Normal'],
+            fontSize=9,
+            alignment=TA_CENTER,
+            textColor=grey,
+            spaceAfter=6
+        ),
+        "section_title": ParagraphStyle(
+            'SectionTitle',
+            parent=styles['Heading3'],
+            fontSize=10,
+            textColor=PRIMARY_COLOR,
+            spaceBefore=12,
+            spaceAfter=6,
+            fontName='Helvetica-Bold',
+            borderPadding=4
+        ),
+        "label": ParagraphStyle(
+            'LabelStyle',
+            parent=styles['Normal'],
+            fontSize=8,
+            textColor=grey,
+            leading=10
+        ),
+        "value": ParagraphStyle(
+            'ValueStyle',
+            parent=styles['Normal'],
+            fontSize=9,
+            textColor=colors.Color(0.1, 0.1, 0.1),
+            leading=12,
+            fontName='Helvetica'
+        ),
+        "small": ParagraphStyle(
+            'SmallStyle',
+            parent=styles['Normal'],
+            fontSize=7,
+            leading=10,
+            textColor=colors.Color(0.45, 0.45, 0.45)
+        ),
+        "company_name": ParagraphStyle(
+            'CompanyName',
+            parent=styles['Normal'],
+            fontSize=14,
+            alignment=TA_CENTER,
+            textColor=PRIMARY_COLOR,
+            fontName='Helvetica-Bold',
+            spaceAfter=2
+        ),
+        "company_address": ParagraphStyle(
+            'CompanyAddr',
+            parent=styles['Normal'],
+            fontSize=8,
+            alignment=TA_CENTER,
+            textColor=grey,
+            spaceAfter=2
+        ),
+        "reg_details": ParagraphStyle(
+            'RegDetails',
+            parent=styles['Normal'],
+            fontSize=7,
+            alignment=TA_CENTER,
+            textColor=colors.Color(0.5, 0.5, 0.5)
+        ),
+        "contract_number": ParagraphStyle('Value', fontSize=9, textColor=PRIMARY_COLOR, fontName='Helvetica-Bold'),
+        "table_header": ParagraphStyle('TH', fontSize=8, textColor=colors.white, alignment=TA_CENTER),
+        "table_cell": ParagraphStyle('TD', fontSize=8, alignment=TA_CENTER),
+        "table_cell_multiline": ParagraphStyle('TD', fontSize=8, alignment=TA_CENTER, leading=10),
+        "table_cell_bold": ParagraphStyle('TD', fontSize=8, alignment=TA_CENTER, fontName='Helvetica-Bold'),
+        "amount": ParagraphStyle('Amount', fontSize=9, alignment=TA_CENTER),
+        "net_label": ParagraphStyle('NetLabel', fontSize=10, fontName='Helvetica-Bold', textColor=PRIMARY_COLOR),
+        "net_amount": ParagraphStyle('NetAmount', fontSize=10, alignment=TA_CENTER, fontName='Helvetica-Bold', textColor=PRIMARY_COLOR),
+        "amount_words": ParagraphStyle('AmountWords', fontSize=8, textColor=colors.Color(0.3, 0.3, 0.3), leading=12),
+        "sig_header": ParagraphStyle('SigHeader', fontSize=8, alignment=TA_CENTER, textColor=PRIMARY_COLOR),
+        "sig_line": ParagraphStyle('SigLine', fontSize=8, alignment=TA_CENTER),
+        "sig_label": ParagraphStyle('SigLabel', fontSize=7, alignment=TA_CENTER, textColor=colors.Color(0.5, 0.5, 0.5)),
+    }
+
+
+@lru_cache(maxsize=1)
+def contract_note_table_styles() -> Dict[str, TableStyle]:
+    """Table styles of the client confirmation note (built once per process)."""
+    party_style = TableStyle([
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('LEFTPADDING', (0, 0), (-1, -1), 4),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 4),
+        ('TOPPADDING', (0, 0), (-1, -1), 3),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+        ('LINEBELOW', (0, -1), (-1, -1), 0.5, BORDER_COLOR),
+    ])
+
+    return {
+        "info": TableStyle([
+            ('BACKGROUND', (0, 0), (-1, -1), LIGHT_BG),
+            ('BOX', (0, 0), (-1, -1), 1, BORDER_COLOR),
+            ('INNERGRID', (0, 0), (-1, -1), 0.5, BORDER_COLOR),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('LEFTPADDING', (0, 0), (-1, -1), 8),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 8),
+            ('TOPPADDING', (0, 0), (-1, -1), 6),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ]),
+        "buyer": party_style,
+        "seller": party_style,
+        "transaction": TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), PRIMARY_COLOR),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('BACKGROUND', (0, 1), (-1, 1), LIGHT_BG),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('GRID', (0, 0), (-1, -1), 0.5, BORDER_COLOR),
+            ('TOPPADDING', (0, 0), (-1, -1), 8),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ]),
+        "summary": TableStyle([
+            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('TOPPADDING', (0, 0), (-1, -1), 5),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
+            ('LINEABOVE', (0, -1), (-1, -1), 1.5, PRIMARY_COLOR),
+            ('BACKGROUND', (0, -1), (-1, -1), LIGHT_BG),
+            ('LEFTPADDING', (0, 0), (-1, -1), 8),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 8),
+        ]),
+        "bank": TableStyle([
+            ('BACKGROUND', (0, 0), (-1, -1), colors.Color(0.98, 0.97, 0.90)),  # Light cream
+            ('BOX', (0, 0), (-1, -1), 1, ACCENT_COLOR),
+            ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.Color(0.9, 0.85, 0.7)),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('LEFTPADDING', (0, 0), (-1, -1), 6),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 6),
+            ('TOPPADDING', (0, 0), (-1, -1), 6),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ]),
+        "signature": TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('TOPPADDING', (0, 0), (-1, -1), 4),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+        ]),
+    }
+
+
+@lru_cache(maxsize=1)
+def vendor_note_styles() -> Dict[str, ParagraphStyle]:
+    """Paragraph styles of the vendor purchase confirmation note (built once per process)."""
+    styles = getSampleStyleSheet()
+
+    return {
+        "title": ParagraphStyle(
+            'Title',
+            parent=styles['Title'],
+            fontSize=16,
+            spaceAfter=6,
+            alignment=TA_CENTER,
+            textColor=colors.HexColor('#1a1a1a'),
+            fontName='Helvetica-Bold'
+        ),
+        "section_title": ParagraphStyle(
+            'SectionTitle',
+            fontSize=10,
+            spaceAfter=8,
+            spaceBefore=10,
+            textColor=PURCHASE_COLOR,  # Green for purchase
+            fontName='Helvetica-Bold'
+        ),
+        "normal": ParagraphStyle(
+            'Normal',
+            fontSize=9,
+            leading=12,
+            alignment=TA_LEFT
+        ),
+        "small": ParagraphStyle(
+            'Small',
+            fontSize=8,
+            leading=10,
+            textColor=colors.HexColor('#666666')
+        ),
+        "address": ParagraphStyle('Address', fontSize=8, alignment=TA_CENTER),
+        "cin": ParagraphStyle('CIN', fontSize=7, alignment=TA_CENTER, textColor=colors.grey),
+        "doc_title": ParagraphStyle('DocTitle', fontSize=14, alignment=TA_CENTER, textColor=PURCHASE_COLOR, fontName='Helvetica-Bold'),
+        "doc_subtitle": ParagraphStyle('Subtitle', fontSize=9, alignment=TA_CENTER, textColor=colors.grey),
+    }
+
+
+def warm_renderer():
+    """Worker-process initializer: build the cached styles before the first note."""
+    contract_note_styles()
+    contract_note_table_styles()
+    vendor_note_styles()
+
+
+# ==================== CLIENT CONFIRMATION NOTE ====================
+
+def render_contract_note_pdf(booking: dict, company: dict, client: Optional[dict],
+                             stock: Optional[dict], contract_number: str) -> bytes:
+    """
+    Render the Conformation Note cum Bill for a booking.
+
+    Args:
+        booking: The booking document
+        company: Company master settings
+        client: The buyer (client) document
+        stock: The stock document
+        contract_number: Number printed on the note
+
+    Returns:
+        The PDF as bytes
+    """
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=A4,
+        rightMargin=1.5*cm,
+        leftMargin=1.5*cm,
+        topMargin=1.2*cm,
+        bottomMargin=1.2*cm
+    )
+
+    s = contract_note_styles()
+    ts = contract_note_table_styles()
+    label_style = s["label"]
+    value_style = s["value"]
+    section_title = s["section_title"]
+
+    elements = []
+
+    # ==================== HEADER SECTION ====================
+    company_name = safe_str(company.get("company_name"), "SMIFS Capital Markets Ltd")
+    company_address = safe_str(company.get("company_address"), "")
+
+    # Company name - large and prominent
+    elements.append(Paragraph(f"<b>{company_name}</b>", s["company_name"]))
+
+    # Company address
+    if company_address:
+        # Truncate long addresses
+        addr_display = company_address[:80] + "..." if len(company_address) > 80 else company_address
+        elements.append(Paragraph(addr_display, s["company_address"]))
+
+    # Registration details in a single line
+    reg_parts = []
+    cin = company.get("company_cin")
+    pan = company.get("company_pan")
+    gst = company.get("company_gst")
+    if cin:
+        reg_parts.append(f"CIN: {cin}")
+    if pan:
+        reg_parts.append(f"PAN: {pan}")
+    if gst:
+        reg_parts.append(f"GST: {gst}")
+
+    if reg_parts:
+        elements.append(Paragraph(" | ".join(reg_parts), s["reg_details"]))
+
+    elements.append(Spacer(1, 0.4*cm))
+
+    # Decorative divider
+    elements.append(HRFlowable(width="100%", thickness=2, color=PRIMARY_COLOR, spaceAfter=0.3*cm))
+
+    # ==================== DOCUMENT TITLE ====================
+    elements.append(Paragraph("<b>CONFORMATION NOTE CUM BILL</b>", s["title"]))
+    elements.append(Paragraph("(Sale of Unlisted Equity Shares)", s["subtitle"]))
+    elements.append(Spacer(1, 0.3*cm))
+
+    # ==================== DOCUMENT INFO BOX ====================
+    contract_date = booking.get("stock_transfer_date", datetime.now().strftime("%d-%b-%Y"))
+    trade_date = booking.get("booking_date", "")
+    settlement_date = booking.get("payment_completed_date", contract_date)
+
+    # Create a clean info box
+    info_data = [
+        [
+            Paragraph("<b>Conformation No:</b>", label_style),
+            Paragraph(f"<b>{contract_number}</b>", s["contract_number"]),
+            Paragraph("<b>Date:</b>", label_style),
+            Paragraph(contract_date, value_style)
+        ],
+        [
+            Paragraph("<b>Trade Date:</b>", label_style),
+            Paragraph(trade_date, value_style),
+            Paragraph("<b>Settlement:</b>", label_style),
+            Paragraph(settlement_date, value_style)
+        ]
+    ]
+
+    info_table = Table(info_data, colWidths=[3*cm, 5.5*cm, 3*cm, 5.5*cm])
+    info_table.setStyle(ts["info"])
+    elements.append(info_table)
+    elements.append(Spacer(1, 0.4*cm))
+
+    # ==================== BUYER DETAILS ====================
+    elements.append(Paragraph("BUYER DETAILS", section_title))
+
+    client_name = safe_str(client.get("name") if client else None)
+    client_pan = safe_str(client.get("pan_number") if client else None)
+    client_address = safe_str(client.get("address") if client else None)
+    # Truncate long addresses
+    if client_address != "N/A" and len(client_address) > 60:
+        client_address = client_address[:60] + "..."
+
+    buyer_data = [
+        [Paragraph("<b>Name</b>", label_style), Paragraph(client_name, value_style)],
+        [Paragraph("<b>PAN</b>", label_style), Paragraph(client_pan, value_style)],
+        [Paragraph("<b>Address</b>", label_style), Paragraph(client_address, value_style)],
+    ]
+
+    # Add demat details if available
+    if client:
+        dp_info_parts = []
+        dp_name = client.get("dp_name")
+        dp_id = client.get("dp_id")
+        cli_id = client.get("client_id") or client.get("otc_ucc")
+        if dp_name:
+            dp_info_parts.append(f"DP: {dp_name}")
+        if dp_id:
+            dp_info_parts.append(f"DP ID: {dp_id}")
+        if cli_id:
+            dp_info_parts.append(f"Client ID: {cli_id}")
+
+        if dp_info_parts:
+            buyer_data.append([
+                Paragraph("<b>Demat</b>", label_style),
+                Paragraph(" | ".join(dp_info_parts), value_style)
+            ])
+
+    buyer_table = Table(buyer_data, colWidths=[3*cm, 14*cm])
+    buyer_table.setStyle(ts["buyer"])
+    elements.append(buyer_table)
+    elements.append(Spacer(1, 0.3*cm))
+
+    # ==================== SELLER DETAILS ====================
+    elements.append(Paragraph("SELLER DETAILS", section_title))
+
+    seller_data = [
+        [Paragraph("<b>Name</b>", label_style), Paragraph(company_name, value_style)],
+        [Paragraph("<b>PAN</b>", label_style), Paragraph(company.get("company_pan") or "N/A", value_style)],
+    ]
+
+    # Add seller demat info
+    seller_demat_parts = []
+    if company.get("cdsl_dp_id"):
+        seller_demat_parts.append(f"CDSL: {company.get('cdsl_dp_id')}")
+    if company.get("nsdl_dp_id"):
+        seller_demat_parts.append(f"NSDL: {company.get('nsdl_dp_id')}")
+
+    if seller_demat_parts:
+        seller_data.append([
+            Paragraph("<b>Demat</b>", label_style),
+            Paragraph(" | ".join(seller_demat_parts), value_style)
+        ])
+
+    seller_table = Table(seller_data, colWidths=[3*cm, 14*cm])
+    seller_table.setStyle(ts["seller"])
+    elements.append(seller_table)
+    elements.append(Spacer(1, 0.4*cm))
+
+    # ==================== TRANSACTION DETAILS ====================
+    elements.append(Paragraph("TRANSACTION DETAILS", section_title))
+
+    stock_name = safe_str(stock.get("name") if stock else None)
+    stock_symbol = safe_str(stock.get("symbol") if stock else None)
+    isin = safe_str(stock.get("isin_number") if stock else None)
+    face_value = stock.get("face_value", 1) if stock else 1
+    if face_value is None:
+        face_value = 1
+
+    quantity = booking.get("quantity", 0) or 0
+    rate = booking.get("selling_price", 0) or 0
+    gross_amount = quantity * rate
+
+    # Truncate long stock names
+    stock_display = stock_symbol
+    if stock_name != "N/A" and len(stock_name) > 25:
+        stock_display = f"{stock_symbol}\n{stock_name[:25]}..."
+    elif stock_name != "N/A":
+        stock_display = f"{stock_symbol}\n{stock_name}"
+
+    # Transaction table header
+    th = s["table_header"]
+    td = s["table_cell"]
+    trans_header = [
+        Paragraph("<b>Script</b>", th),
+        Paragraph("<b>ISIN</b>", th),
+        Paragraph("<b>Face Value</b>", th),
+        Paragraph("<b>Qty</b>", th),
+        Paragraph("<b>Rate (₹)</b>", th),
+        Paragraph("<b>Amount (₹)</b>", th),
+    ]
+
+    trans_data = [
+        Paragraph(stock_display, s["table_cell_multiline"]),
+        Paragraph(isin, td),
+        Paragraph(f"₹{face_value:.2f}", td),
+        Paragraph(f"{quantity:,}", td),
+        Paragraph(f"₹{rate:,.2f}", td),
+        Paragraph(f"₹{gross_amount:,.2f}", s["table_cell_bold"]),
+    ]
+
+    trans_table = Table([trans_header, trans_data], colWidths=[3.5*cm, 3.5*cm, 2*cm, 2*cm, 2.5*cm, 3.5*cm])
+    trans_table.setStyle(ts["transaction"])
+    elements.append(trans_table)
+    elements.append(Spacer(1, 0.4*cm))
+
+    # ==================== FINANCIAL SUMMARY ====================
+    elements.append(Paragraph("FINANCIAL SUMMARY", section_title))
+
+    # Stamp duty calculation
+    stamp_duty_rate = 0.00015  # 0.015%
+    stamp_duty = round(gross_amount * stamp_duty_rate, 2)
+    net_amount = gross_amount  # Stamp duty shown separately
+
+    summary_data = [
+        [Paragraph("Gross Amount", value_style), Paragraph(f"₹ {gross_amount:,.2f}", s["amount"])],
+        [Paragraph("Stamp Duty (0.015%)", value_style), Paragraph(f"₹ {stamp_duty:,.2f}", s["amount"])],
+        [
+            Paragraph("<b>Net Payable Amount</b>", s["net_label"]),
+            Paragraph(f"<b>₹ {net_amount:,.2f}</b>", s["net_amount"])
+        ],
+    ]
+
+    summary_table = Table(summary_data, colWidths=[12*cm, 5*cm])
+    summary_table.setStyle(ts["summary"])
+    elements.append(summary_table)
+
+    # Amount in words
+    elements.append(Spacer(1, 0.2*cm))
+    amount_words = amount_to_words(net_amount)
+    elements.append(Paragraph(f"<b>Amount in Words:</b> <i>{amount_words}</i>", s["amount_words"]))
+    elements.append(Spacer(1, 0.4*cm))
+
+    # ==================== BANK DETAILS ====================
+    elements.append(Paragraph("PAYMENT DETAILS", section_title))
+
+    bank_data = [
+        [
+            Paragraph("<b>Bank Name</b>", label_style),
+            Paragraph(company.get("company_bank_name") or "N/A", value_style),
+            Paragraph("<b>Branch</b>", label_style),
+            Paragraph(company.get("company_bank_branch") or "N/A", value_style)
+        ],
+        [
+            Paragraph("<b>Account No.</b>", label_style),
+            Paragraph(company.get("company_bank_account") or "N/A", value_style),
+            Paragraph("<b>IFSC</b>", label_style),
+            Paragraph(company.get("company_bank_ifsc") or "N/A", value_style)
+        ],
+    ]
+
+    bank_table = Table(bank_data, colWidths=[2.8*cm, 5.7*cm, 2.8*cm, 5.7*cm])
+    bank_table.setStyle(ts["bank"])
+    elements.append(bank_table)
+    elements.append(Spacer(1, 0.4*cm))
+
+    # ==================== TERMS & CONDITIONS ====================
+    elements.append(Paragraph("TERMS & CONDITIONS", section_title))
+
+    terms = [
+        "1. This conformation note is issued for the sale of unlisted equity shares.",
+        "2. All FEMA related compliance (if any) is the sole responsibility of the purchaser.",
+        "3. The purchaser is responsible for all regulatory compliances including Income Tax and GST.",
+        "4. Unlisted securities may have limited liquidity and their value can fluctuate.",
+        "5. Payment should be made via RTGS/NEFT/IMPS to the bank account mentioned above.",
+        "6. Any discrepancy should be reported within 3 working days.",
+        "7. This document is computer generated and does not require physical signature.",
+    ]
+
+    for term in terms:
+        elements.append(Paragraph(term, s["small"]))
+        elements.append(Spacer(1, 0.1*cm))
+
+    elements.append(Spacer(1, 0.5*cm))
+
+    # ==================== SIGNATURES ====================
+    sig_data = [
+        [
+            Paragraph(f"<b>For {company_name}</b>", s["sig_header"]),
+            Paragraph("<b>For Purchaser</b>", s["sig_header"])
+        ],
+        ["", ""],
+        ["", ""],
+        [
+            Paragraph("_____________________", s["sig_line"]),
+            Paragraph("_____________________", s["sig_line"])
+        ],
+        [
+            Paragraph("Authorized Signatory", s["sig_label"]),
+            Paragraph("Authorized Signatory", s["sig_label"])
+        ]
+    ]
+
+    sig_table = Table(sig_data, colWidths=[8.5*cm, 8.5*cm])
+    sig_table.setStyle(ts["signature"])
+    elements.append(sig_table)
+
+    # Build PDF
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+# ==================== VENDOR PURCHASE CONFIRMATION NOTE ====================
+
+def render_vendor_purchase_contract_note_pdf(purchase: dict, company: dict, vendor: Optional[dict],
+                                             stock: Optional[dict], tcs_total: float) -> bytes:
+    """
+    Render the Purchase Confirmation Note for a vendor purchase.
+
+    Args:
+        purchase: The purchase document (with purchase_contract_note_number set)
+        company: Company master settings
+        vendor: The vendor (client) document
+        stock: The stock document
+        tcs_total: TCS deducted across the purchase's payments
+
+    Returns:
+        The PDF as bytes
+    """
+    buffer = io.BytesIO()
+
+    # Page setup
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=A4,
+        rightMargin=1.5*cm,
+        leftMargin=1.5*cm,
+        topMargin=1*cm,
+        bottomMargin=1*cm
+    )
+
+    s = vendor_note_styles()
+    section_title = s["section_title"]
+    normal_style = s["normal"]
+
+    elements = []
+
+    # Company details
+    company_name = company.get("company_name", "SMIFS Capital Markets Ltd")
+
+    # Header
+    elements.append(Paragraph(f"<b>{company_name}</b>", s["title"]))
+    elements.append(Paragraph(company.get("company_address", ""), s["address"]))
+
+    # CIN & Contact
+    cin_gstin = f"CIN: {company.get('company_cin', 'N/A')} | GSTIN: {company.get('company_gstin', 'N/A')}"
+    elements.append(Paragraph(cin_gstin, s["cin"]))
+
+    elements.append(Spacer(1, 0.3*cm))
+    elements.append(HRFlowable(width="100%", thickness=2, color=PURCHASE_COLOR))
+    elements.append(Spacer(1, 0.2*cm))
+
+    # Document Title
+    elements.append(Paragraph("<b>PURCHASE CONFIRMATION NOTE</b>", s["doc_title"]))
+    elements.append(Paragraph("(Stock Purchase Acknowledgment)", s["doc_subtitle"]))
+    elements.append(Spacer(1, 0.4*cm))
+
+    # Contract Note Details (Left) and Date (Right)
+    cn_number = purchase.get("purchase_contract_note_number", "")
+    cn_date = datetime.now().strftime('%d-%b-%Y')
+
+    header_data = [
+        [f"<b>PCN No:</b> {cn_number}", f"<b>Date:</b> {cn_date}"],
+        [f"<b>Purchase Order:</b> {purchase.get('purchase_number', '')}", f"<b>DP Type:</b> {purchase.get('dp_type', 'N/A')}"],
+    ]
+
+    header_table = Table(
+        [[Paragraph(c, normal_style) for c in row] for row in header_data],
+        colWidths=[9*cm, 6*cm]
+    )
+    header_table.setStyle(TableStyle([
+        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+    ]))
+    elements.append(header_table)
+    elements.append(Spacer(1, 0.4*cm))
+
+    # Vendor Details Section
+    elements.append(Paragraph("<b>VENDOR DETAILS (SELLER)</b>", section_title))
+
+    vendor_name = vendor.get("name", "N/A") if vendor else "N/A"
+    vendor_pan = vendor.get("pan_number", "N/A") if vendor else "N/A"
+    vendor_address = vendor.get("address", "N/A") if vendor else "N/A"
+    vendor_email = vendor.get("email", "N/A") if vendor else "N/A"
+    vendor_phone = vendor.get("phone", "N/A") if vendor else "N/A"
+
+    vendor_data = [
+        ["Name:", vendor_name],
+        ["PAN:", vendor_pan],
+        ["Address:", vendor_address],
+        ["Email:", vendor_email],
+        ["Phone:", vendor_phone],
+    ]
+
+    vendor_table = Table(vendor_data, colWidths=[3*cm, 12*cm])
+    vendor_table.setStyle(TableStyle([
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f0fdf4')),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+        ('TOPPADDING', (0, 0), (-1, -1), 4),
+        ('LEFTPADDING', (0, 0), (-1, -1), 8),
+        ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#86efac')),
+    ]))
+    elements.append(vendor_table)
+    elements.append(Spacer(1, 0.4*cm))
+
+    # Stock Details Section
+    elements.append(Paragraph("<b>STOCK DETAILS</b>", section_title))
+
+    stock_symbol = stock.get("symbol", "N/A") if stock else "N/A"
+    stock_name = stock.get("name", "N/A") if stock else "N/A"
+    stock_isin = stock.get("isin_number", "N/A") if stock else "N/A"
+
+    stock_data = [
+        ["Stock Symbol:", stock_symbol, "ISIN:", stock_isin],
+        ["Stock Name:", stock_name, "", ""],
+    ]
+
+    stock_table = Table(stock_data, colWidths=[3*cm, 6*cm, 2.5*cm, 3.5*cm])
+    stock_table.setStyle(TableStyle([
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+    ]))
+    elements.append(stock_table)
+    elements.append(Spacer(1, 0.4*cm))
+
+    # Transaction Details
+    elements.append(Paragraph("<b>TRANSACTION DETAILS</b>", section_title))
+
+    quantity = purchase.get("quantity", 0)
+    price_per_share = purchase.get("price_per_share", 0)
+    total_amount = purchase.get("total_amount", 0)
+
+    txn_data = [
+        ["Description", "Quantity", "Rate (₹)", "Amount (₹)"],
+        [f"Purchase of {stock_symbol} shares", f"{quantity:,}", f"{price_per_share:,.2f}", f"{total_amount:,.2f}"],
+    ]
+
+    txn_table = Table(txn_data, colWidths=[7*cm, 3*cm, 3*cm, 3*cm])
+    txn_table.setStyle(TableStyle([
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+        ('BACKGROUND', (0, 0), (-1, 0), PURCHASE_COLOR),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cccccc')),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ('TOPPADDING', (0, 0), (-1, -1), 6),
+    ]))
+    elements.append(txn_table)
+    elements.append(Spacer(1, 0.3*cm))
+
+    # Payment Summary
+    elements.append(Paragraph("<b>PAYMENT SUMMARY</b>", section_title))
+
+    total_paid = purchase.get("total_paid", 0)
+    net_paid = total_paid - tcs_total
+
+    summary_data = [
+        ["Total Purchase Amount:", f"₹{total_amount:,.2f}"],
+        ["Total Amount Paid:", f"₹{total_paid:,.2f}"],
+        ["TCS Deducted @0.1%:", f"₹{tcs_total:,.2f}"],
+        ["Net Amount Transferred:", f"₹{net_paid:,.2f}"],
+    ]
+
+    summary_table = Table(summary_data, colWidths=[10*cm, 5*cm])
+    summary_table.setStyle(TableStyle([
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTNAME', (1, -1), (1, -1), 'Helvetica-Bold'),
+        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+        ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#d1fae5')),
+    ]))
+    elements.append(summary_table)
+    elements.append(Spacer(1, 0.3*cm))
+
+    # Amount in Words
+    elements.append(Paragraph(f"<b>Amount in Words:</b> {amount_to_words(total_amount)}", normal_style))
+    elements.append(Spacer(1, 0.4*cm))
+
+    # DP Receipt Confirmation
+    elements.append(Paragraph("<b>DP RECEIPT CONFIRMATION</b>", section_title))
+
+    dp_received_at = purchase.get("dp_received_at", "")
+    if dp_received_at:
+        try:
+            dp_date = datetime.fromisoformat(dp_received_at.replace('Z', '+00:00')).strftime('%d-%b-%Y %H:%M')
+        except (ValueError, TypeError):
+            dp_date = dp_received_at
+    else:
+        dp_date = "N/A"
+
+    dp_data = [
+        ["Stock Received Via:", purchase.get("dp_type", "N/A")],
+        ["Received Date:", dp_date],
+        ["Received By:", purchase.get("dp_received_by_name", "N/A")],
+        ["Quantity Received:", f"{quantity:,} shares"],
+    ]
+
+    dp_table = Table(dp_data, colWidths=[4*cm, 11*cm])
+    dp_table.setStyle(TableStyle([
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#ecfdf5')),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+        ('TOPPADDING', (0, 0), (-1, -1), 4),
+        ('LEFTPADDING', (0, 0), (-1, -1), 8),
+        ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#10b981')),
+    ]))
+    elements.append(dp_table)
+    elements.append(Spacer(1, 0.5*cm))
+
+    # Terms & Conditions
+    elements.append(Paragraph("<b>TERMS & CONDITIONS</b>", section_title))
+
+    terms = [
+        "1. This purchase contract note confirms receipt of shares from the vendor.",
+        "2. TCS @0.1% has been deducted as per Section 194Q of the Income Tax Act (if applicable).",
+        "3. The shares have been credited to our depository account as per the DP type mentioned above.",
+        "4. Any discrepancy should be reported within 3 working days from receipt of this document.",
+        "5. This document is computer generated and does not require physical signature.",
+    ]
+
+    for term in terms:
+        elements.append(Paragraph(term, s["small"]))
+
+    elements.append(Spacer(1, 0.5*cm))
+
+    # Signatures
+    sig_data = [
+        [f"For {company_name}", f"For {vendor_name}"],
+        ["", ""],
+        ["", ""],
+        ["Authorized Signatory", "Vendor Acknowledgment"]
+    ]
+
+    sig_table = Table(sig_data, colWidths=[7.5*cm, 7.5*cm])
+    sig_table.setStyle(TableStyle([
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica'),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 15),
+    ]))
+    elements.append(sig_table)
+
+    # Build PDF
+    doc.build(elements)
+    return buffer.getvalue()
@@ -0,0 +1,358 @@
+"""
+Dashboard Rollups
+Pre-aggregated counters and sums for the dashboard endpoints.
+
+The dashboards used to pull up to 10,000 bookings/purchases into Python on
+every page load to sum quantity * price. Instead, every booking and purchase
+contributes a small set of metrics to a few rollup documents in
+db.dashboard_rollups:
+
+    bookings:all:<partition>                 whole book
+    bookings:employee:<created_by>:<partition>
+    bookings:stock:<stock_id>:<partition>
+    bookings:day:<YYYY-MM-DD>:<partition>    by created_at IST calendar day
+    purchases:all|stock|day:...:<partition>
+
+<partition> is "demo" or "live", so demo/live isolation is a key lookup.
+
+Write paths call refresh_booking_rollups()/refresh_purchase_rollups() after
+persisting a change. The refresh recomputes that document's contribution and
+atomically swaps it with the previous one kept in db.dashboard_rollup_sources
+(find_one_and_replace returning the old snapshot); the difference is then
+$inc-ed into the rollups. Concurrent refreshes of the same document therefore
+telescope correctly, and refreshing an unchanged document is a no-op.
+
+refresh_booking_rollups() also drops this worker's cached analytics charts
+(services/analytics_service.py), since every booking write path calls it.
+
+rebuild_rollups() recomputes everything from bookings and purchases (backfill,
+after restores, and nightly to clear float drift or a missed refresh). It also
+runs on start when the rollups were built by an older ROLLUP_VERSION.
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from pymongo import ReplaceOne, UpdateOne, ReturnDocument
+
+from database import db
+from services.analytics_service import invalidate_analytics
+from utils.dates import ist_date
+
+logger = logging.getLogger(__name__)
+
+# Snapshot/rollup writes are flushed in batches of this size during a rebuild
+REBUILD_BATCH_SIZE = 1000
+
+META_ID = "meta"
+
+# Bump when rollup keys change; 2: day rollups by IST day instead of the UTC date
+ROLLUP_VERSION = 2
+
+# Booking fields that feed the rollups
+BOOKING_FIELDS = {
+    "_id": 0, "id": 1, "is_demo": 1, "created_by": 1, "stock_id": 1, "created_at": 1,
+    "status": 1, "approval_status": 1, "is_voided": 1, "quantity": 1,
+    "buying_price": 1, "selling_price": 1, "payments": 1,
+    "bp_override_approval_status": 1, "refund_request": 1
+}
+
+PURCHASE_FIELDS = {
+    "_id": 0, "id": 1, "is_demo": 1, "stock_id": 1, "created_at": 1,
+    "quantity": 1, "price_per_share": 1, "payments": 1
+}
+
+
+def _partition(doc: Dict[str, Any]) -> str:
+    return "demo" if doc.get("is_demo") is True else "live"
+
+
+def partition_for_user(current_user: dict) -> str:
+    from utils.demo_isolation import is_demo_user
+    return "demo" if is_demo_user(current_user) else "live"
+
+
+def _day(value: Any) -> Optional[str]:
+    return ist_date(value)
+
+
+def _label(value: Any) -> str:
+    """Make a status value safe to use as a field name."""
+    if value in (None, ""):
+        return "none"
+    return str(value).replace(".", "_").replace("$", "_").replace("/", "_")
+
+
+def _paid(doc: Dict[str, Any]) -> float:
+    return sum((p or {}).get("amount", 0) or 0 for p in doc.get("payments") or [])
+
+
+def booking_metrics(booking: Dict[str, Any]) -> Dict[str, float]:
+    """Counters/sums one booking adds to each of its rollups (zeros omitted)."""
+    status = booking.get("status")
+    voided = booking.get("is_voided") is True
+    metrics: Dict[str, float] = {
+        "count": 1,
+        f"by_status.{_label(status)}": 1,
+        f"by_approval.{_label(booking.get('approval_status'))}": 1,
+    }
+    if status != "cancelled":
+        metrics["active"] = 1
+    if not voided and status == "open":
+        metrics["open"] = 1
+    if not voided and status == "closed":
+        metrics["closed"] = 1
+    if booking.get("bp_override_approval_status") == "pending":
+        metrics["pending_bp_override"] = 1
+    if (booking.get("refund_request") or {}).get("status") == "pending":
+        metrics["pending_refund"] = 1
+
+    # Live book: not cancelled and not voided
+    if status != "cancelled" and not voided:
+        qty = booking.get("quantity", 0) or 0
+        buying = booking.get("buying_price", 0) or 0
+        selling = booking.get("selling_price", 0) or 0
+        metrics.update({
+            "live": 1,
+            "quantity": qty,
+            "buy_value": qty * buying,
+            "sell_value": qty * selling,
+            "profit_loss": qty * (selling - buying),
+            "received": _paid(booking),
+        })
+    return {k: v for k, v in metrics.items() if v}
+
+
+def purchase_metrics(purchase: Dict[str, Any]) -> Dict[str, float]:
+    qty = purchase.get("quantity", 0) or 0
+    metrics = {
+        "count": 1,
+        "quantity": qty,
+        "value": qty * (purchase.get("price_per_share", 0) or 0),
+        "paid": _paid(purchase),
+    }
+    return {k: v for k, v in metrics.items() if v}
+
+
+def booking_contribution(booking: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    """Rollup id -> metrics for one booking."""
+    part = _partition(booking)
+    metrics = booking_metrics(booking)
+    keys = [f"bookings:all:{part}", f"bookings:employee:{booking.get('created_by')}:{part}"]
+    if booking.get("stock_id"):
+        keys.append(f"bookings:stock:{booking['stock_id']}:{part}")
+    day = _day(booking.get("created_at"))
+    if day:
+        keys.append(f"bookings:day:{day}:{part}")
+    return {key: metrics for key in keys}
+
+
+def purchase_contribution(purchase: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    part = _partition(purchase)
+    metrics = purchase_metrics(purchase)
+    keys = [f"purchases:all:{part}"]
+    if purchase.get("stock_id"):
+        keys.append(f"purchases:stock:{purchase['stock_id']}:{part}")
+    day = _day(purchase.get("created_at"))
+    if day:
+        keys.append(f"purchases:day:{day}:{part}")
+    return {key: metrics for key in keys}
+
+
+def contribution_delta(old: Dict[str, Dict[str, float]],
+                       new: Dict[str, Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+    """new - old, per rollup id and metric (zero entries dropped)."""
+    delta: Dict[str, Dict[str, float]] = {}
+    for key in set(old) | set(new):
+        before, after = old.get(key, {}), new.get(key, {})
+        changes = {}
+        for metric in set(before) | set(after):
+            diff = after.get(metric, 0) - before.get(metric, 0)
+            if diff:
+                changes[metric] = diff
+        if changes:
+            delta[key] = changes
+    return delta
+
+
+def _encode_snapshot(contribution: Dict[str, Dict[str, float]]) -> List[Dict[str, Any]]:
+    """Snapshot form stored in dashboard_rollup_sources (no dotted field names)."""
+    return [
+        {"id": rollup_id, "metrics": {k.replace(".", "/"): v for k, v in metrics.items()}}
+        for rollup_id, metrics in contribution.items()
+    ]
+
+
+def _decode_snapshot(snapshot: Optional[List[Dict[str, Any]]]) -> Dict[str, Dict[str, float]]:
+    return {
+        entry["id"]: {k.replace("/", "."): v for k, v in entry["metrics"].items()}
+        for entry in snapshot or []
+    }
+
+
+def _rollup_identity(rollup_id: str) -> Dict[str, Any]:
+    """Descriptive fields stored alongside the counters (for querying/debugging)."""
+    entity, scope, *rest = rollup_id.split(":")
+    partition = rest[-1] if rest else None
+    return {
+        "entity": entity,
+        "scope": scope,
+        "key": ":".join(rest[:-1]) or None,
+        "is_demo": partition == "demo",
+    }
+
+
+async def _apply_delta(delta: Dict[str, Dict[str, float]]):
+    if not delta:
+        return
+    now = datetime.now(timezone.utc).isoformat()
+    await db.dashboard_rollups.bulk_write([
+        UpdateOne(
+            {"_id": rollup_id},
+            {"$inc": changes, "$set": {"updated_at": now}, "$setOnInsert": _rollup_identity(rollup_id)},
+            upsert=True
+        )
+        for rollup_id, changes in delta.items()
+    ], ordered=False)
+
+
+async def _swap_contribution(source_id: str, contribution: Dict[str, Dict[str, float]]):
+    """Atomically store the new contribution and $inc the difference from the old one."""
+    if contribution:
+        previous = await db.dashboard_rollup_sources.find_one_and_replace(
+            {"_id": source_id},
+            {"_id": source_id, "rollups": _encode_snapshot(contribution)},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+    else:
+        previous = await db.dashboard_rollup_sources.find_one_and_delete({"_id": source_id})
+    old = _decode_snapshot((previous or {}).get("rollups"))
+    await _apply_delta(contribution_delta(old, contribution))
+
+
+async def refresh_booking_rollups(booking_id: str):
+    """Re-sync one booking's contribution (call after any booking write, including delete)."""
+    invalidate_analytics()
+    try:
+        booking = await db.bookings.find_one({"id": booking_id}, BOOKING_FIELDS)
+        await _swap_contribution(f"booking:{booking_id}", booking_contribution(booking) if booking else {})
+    except Exception as e:
+        # Never fail the write path; the nightly rebuild repairs any miss
+        logger.error(f"Dashboard rollup refresh failed for booking {booking_id}: {e}")
+
+
+async def refresh_purchase_rollups(purchase_id: str):
+    """Re-sync one purchase's contribution (call after create/delete)."""
+    try:
+        purchase = await db.purchases.find_one({"id": purchase_id}, PURCHASE_FIELDS)
+        await _swap_contribution(f"purchase:{purchase_id}", purchase_contribution(purchase) if purchase else {})
+    except Exception as e:
+        logger.error(f"Dashboard rollup refresh failed for purchase {purchase_id}: {e}")
+
+
+# ====================
+# Reading
+# ====================
+
+async def get_rollups(rollup_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Fetch rollup documents by id; missing ones come back as empty dicts."""
+    docs = await db.dashboard_rollups.find({"_id": {"$in": rollup_ids}}).to_list(len(rollup_ids))
+    found = {d["_id"]: d for d in docs}
+    return {rollup_id: found.get(rollup_id, {}) for rollup_id in rollup_ids}
+
+
+def sum_rollups(docs: List[Dict[str, Any]], metric: str) -> float:
+    """Sum a (possibly dotted) metric across rollup documents."""
+    total = 0
+    for doc in docs:
+        value = doc
+        for part in metric.split("."):
+            value = (value or {}).get(part)
+        total += value or 0
+    return total
+
+
+# ====================
+# Rebuild
+# ====================
+
+async def rebuild_rollups() -> Dict[str, int]:
+    """
+    Recompute every rollup and source snapshot from bookings and purchases.
+
+    Streams the source collections, so memory is bounded by the number of
+    rollup documents rather than the number of bookings. A write that lands
+    while the rebuild runs may be overwritten and is corrected by the next
+    refresh of that document or the next rebuild.
+    """
+    totals: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+    snapshots: List[ReplaceOne] = []
+    source_ids = set()
+    counts = {"bookings": 0, "purchases": 0}
+
+    async def flush_snapshots():
+        if snapshots:
+            await db.dashboard_rollup_sources.bulk_write(list(snapshots), ordered=False)
+            snapshots.clear()
+
+    async def add(source_id: str, contribution: Dict[str, Dict[str, float]]):
+        source_ids.add(source_id)
+        for rollup_id, metrics in contribution.items():
+            for metric, value in metrics.items():
+                totals[rollup_id][metric] += value
+        snapshots.append(ReplaceOne(
+            {"_id": source_id}, {"_id": source_id, "rollups": _encode_snapshot(contribution)}, upsert=True
+        ))
+        if len(snapshots) >= REBUILD_BATCH_SIZE:
+            await flush_snapshots()
+
+    async for booking in db.bookings.find({}, BOOKING_FIELDS, batch_size=REBUILD_BATCH_SIZE):
+        await add(f"booking:{booking.get('id')}", booking_contribution(booking))
+        counts["bookings"] += 1
+    async for purchase in db.purchases.find({}, PURCHASE_FIELDS, batch_size=REBUILD_BATCH_SIZE):
+        await add(f"purchase:{purchase.get('id')}", purchase_contribution(purchase))
+        counts["purchases"] += 1
+    await flush_snapshots()
+
+    # Snapshots of deleted bookings/purchases
+    stale_sources = []
+    async for doc in db.dashboard_rollup_sources.find({}, {"_id": 1}):
+        if doc["_id"] not in source_ids:
+            stale_sources.append(doc["_id"])
+    for i in range(0, len(stale_sources), REBUILD_BATCH_SIZE):
+        await db.dashboard_rollup_sources.delete_many({"_id": {"$in": stale_sources[i:i + REBUILD_BATCH_SIZE]}})
+
+    now = datetime.now(timezone.utc).isoformat()
+    rollup_writes = []
+    for rollup_id, metrics in totals.items():
+        doc = {"_id": rollup_id, **_rollup_identity(rollup_id), "updated_at": now}
+        for metric, value in metrics.items():
+            head, _, tail = metric.partition(".")
+            if tail:
+                doc.setdefault(head, {})[tail] = value
+            else:
+                doc[metric] = value
+        rollup_writes.append(ReplaceOne({"_id": rollup_id}, doc, upsert=True))
+    for i in range(0, len(rollup_writes), REBUILD_BATCH_SIZE):
+        await db.dashboard_rollups.bulk_write(rollup_writes[i:i + REBUILD_BATCH_SIZE], ordered=False)
+    await db.dashboard_rollups.delete_many({"_id": {"$nin": list(totals) + [META_ID]}})
+
+    await db.dashboard_rollups.replace_one(
+        {"_id": META_ID},
+        {"_id": META_ID, "entity": "meta", "version": ROLLUP_VERSION, "rebuilt_at": now, **counts, "rollups": len(totals)},
+        upsert=True
+    )
+    logger.info(f"Dashboard rollups rebuilt: {counts}, {len(totals)} rollup documents")
+    return {**counts, "rollups": len(totals)}
+
+
+async def ensure_rollups():
+    """Backfill the rollups if they have never been built (e.g. first deploy) or their keys changed."""
+    try:
+        meta = await db.dashboard_rollups.find_one({"_id": META_ID}, {"_id": 1, "version": 1})
+        if not meta or meta.get("version", 1) != ROLLUP_VERSION:
+            await rebuild_rollups()
+    except Exception as e:
+        logger.error(f"Dashboard rollup backfill failed: {e}")
@@ -8,6 +8,8 @@ from typing import List, Dict
 import uuid
 
 from database import db
+from services.hierarchy_service import get_all_subordinates, get_manager_ids
+from utils.dates import date_range, ist_today
 
 
 async def get_user_hierarchy(user_id: str) -> List[Dict]:
@@ -15,60 +17,23 @@ async def get_user_hierarchy(user_id: str) -> List[Dict]:
     Get the full hierarchy above a user (all managers up to PE Desk)
     Returns list of managers from immediate manager to top
     """
-    hierarchy = []
-    current_user_id = user_id
-    visited = set()  # Prevent infinite loops
-    
-    while current_user_id and current_user_id not in visited:
-        visited.add(current_user_id)
-        user = await db.users.find_one(
-            {"id": current_user_id},
-            {"_id": 0, "id": 1, "name": 1, "email": 1, "mobile_number": 1, "reports_to": 1, "role": 1}
-        )
-        
-        if not user:
-            break
-            
-        manager_id = user.get("reports_to")
-        if manager_id:
-            manager = await db.users.find_one(
-                {"id": manager_id},
-                {"_id": 0, "id": 1, "name": 1, "email": 1, "mobile_number": 1, "reports_to": 1, "role": 1}
-            )
-            if manager:
-                hierarchy.append(manager)
-        
-        current_user_id = manager_id
-    
-    return hierarchy
+    manager_ids = await get_manager_ids(user_id)
+    if not manager_ids:
+        return []
+    
+    managers = await db.users.find(
+        {"id": {"$in": manager_ids}},
+        {"_id": 0, "id": 1, "name": 1, "email": 1, "mobile_number": 1, "reports_to": 1, "role": 1}
+    ).to_list(None)
+    by_id = {m["id"]: m for m in managers}
+    return [by_id[m] for m in manager_ids if m in by_id]
 
 
 async def get_all_reportees(manager_id: str) -> List[str]:
     """
     Get all users who report to this manager (direct and indirect)
     """
-    all_reportees = []
-    to_check = [manager_id]
-    visited = set()
-    
-    while to_check:
-        current_id = to_check.pop(0)
-        if current_id in visited:
-            continue
-        visited.add(current_id)
-        
-        # Find direct reports
-        direct_reports = await db.users.find(
-            {"reports_to": current_id},
-            {"_id": 0, "id": 1}
-        ).to_list(1000)
-        
-        for report in direct_reports:
-            if report["id"] not in visited:
-                all_reportees.append(report["id"])
-                to_check.append(report["id"])
-    
-    return all_reportees
+    return await get_all_subordinates(manager_id)
 
 
 async def calculate_user_revenue(user_id: str, date_str: str) -> Dict:
@@ -78,7 +43,7 @@ async def calculate_user_revenue(user_id: str, date_str: str) -> Dict:
     # Get bookings created by this user on the date
     bookings = await db.bookings.find({
         "created_by": user_id,
-        "created_at": {"$regex": f"^{date_str}"},
+        **date_range("created_at", date_str, date_str),
         "is_voided": {"$ne": True},
         "status": {"$ne": "cancelled"}
     }, {"_id": 0}).to_list(1000)
@@ -91,7 +56,7 @@ async def calculate_user_revenue(user_id: str, date_str: str) -> Dict:
     # Get payments collected on the date
     payments = await db.payment_logs.find({
         "recorded_by": user_id,
-        "created_at": {"$regex": f"^{date_str}"}
+        **date_range("created_at", date_str, date_str)
     }, {"_id": 0}).to_list(1000)
     
     total_collections = sum(p.get("amount", 0) for p in payments)
@@ -345,10 +310,10 @@ async def send_day_end_reports():
     Main function to send day-end reports to all users
     Called by scheduler at 6 PM IST
     """
-    from services.email_service import send_email
+    from services.email_outbox import enqueue_emails
     from services.activity_alerts import log_whatsapp_message, get_whatsapp_config
     
-    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    today = ist_today().isoformat()
     
     # Get all active users
     users = await db.users.find(
@@ -361,6 +326,7 @@ async def send_day_end_reports():
     wa_enabled = wa_config and wa_config.get("status") == "connected" and wa_config.get("enabled")
     
     sent_count = 0
+    emails = []
     
     for user in users:
         try:
@@ -377,17 +343,16 @@ async def send_day_end_reports():
             if report["total"]["bookings_count"] == 0 and report["total"]["collections"] == 0:
                 continue
             
-            # Send email with CC to PE Desk
+            # Email with CC to PE Desk, queued in one batch after the loop
             try:
-                email_content = build_revenue_email(report, is_manager)
-                await send_email(
-                    to_email=user["email"],
-                    subject=f"Daily Revenue Report - {today}",
-                    body=email_content,
-                    cc_email="pe@smifs.com"
-                )
+                emails.append({
+                    "to_email": user["email"],
+                    "subject": f"Daily Revenue Report - {today}",
+                    "body": build_revenue_email(report, is_manager),
+                    "cc_email": "pe@smifs.com"
+                })
             except Exception as e:
-                print(f"Failed to send email to {user['email']}: {e}")
+                print(f"Failed to build email for {user['email']}: {e}")
             
             # Send WhatsApp if enabled and user has mobile
             if wa_enabled and user.get("mobile_number"):
@@ -408,6 +373,11 @@ async def send_day_end_reports():
         except Exception as e:
             print(f"Error processing report for {user.get('name', 'Unknown')}: {e}")
     
+    try:
+        await enqueue_emails(emails)
+    except Exception as e:
+        print(f"Failed to queue day-end report emails: {e}")
+    
     # Log the job completion
     await db.scheduled_jobs.insert_one({
         "id": str(uuid.uuid4()),
@@ -426,7 +396,7 @@ async def trigger_manual_report(user_id: str, date_str: str = None):
     Manually trigger a revenue report for a specific user
     """
     if not date_str:
-        date_str = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        date_str = ist_today().isoformat()
     
     user = await db.users.find_one({"id": user_id}, {"_id": 0})
     if not user:
@@ -0,0 +1,507 @@
+"""
+Email Outbox Service
+Durable, Mongo-backed queue for outbound email.
+
+Request handlers call enqueue_email()/enqueue_emails(), which only write to
+db.email_outbox (plus a "queued" row in db.email_logs) and return. A background
+worker in every API process claims batches from the outbox, checks the kill
+switch and loads the SMTP config and company branding (settings cache), sends
+the batch over a small pool of authenticated SMTP connections and records the
+outcome in bulk (email_outbox and email_logs).
+
+Failed sends are retried with exponential backoff; permanent SMTP errors (5xx,
+all recipients refused) fail immediately. Claims carry a lease, so messages
+held by a crashed worker are picked up again once the lease expires.
+
+Configuration (environment):
+    EMAIL_OUTBOX_BATCH_SIZE          - messages claimed per batch (default 50)
+    EMAIL_OUTBOX_POLL_SECONDS        - idle poll interval (default 5)
+    EMAIL_OUTBOX_MAX_ATTEMPTS        - attempts before a message is failed (default 5)
+    EMAIL_OUTBOX_RETRY_BASE_SECONDS  - first retry delay, doubled per attempt (default 30)
+    EMAIL_OUTBOX_LEASE_SECONDS       - claim lease (default 300)
+    EMAIL_SMTP_POOL_SIZE             - SMTP connections per process (default 3)
+    EMAIL_SMTP_IDLE_SECONDS          - idle connections older than this are reopened (default 60)
+"""
+import asyncio
+import logging
+import os
+import smtplib
+import socket
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import DeleteOne, UpdateOne
+
+from database import db
+from utils.dates import with_native_dates
+
+logger = logging.getLogger(__name__)
+
+EMAIL_OUTBOX_BATCH_SIZE = int(os.environ.get("EMAIL_OUTBOX_BATCH_SIZE", "50"))
+EMAIL_OUTBOX_POLL_SECONDS = float(os.environ.get("EMAIL_OUTBOX_POLL_SECONDS", "5"))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.environ.get("EMAIL_OUTBOX_MAX_ATTEMPTS", "5"))
+EMAIL_OUTBOX_RETRY_BASE_SECONDS = float(os.environ.get("EMAIL_OUTBOX_RETRY_BASE_SECONDS", "30"))
+EMAIL_OUTBOX_LEASE_SECONDS = float(os.environ.get("EMAIL_OUTBOX_LEASE_SECONDS", "300"))
+EMAIL_SMTP_POOL_SIZE = int(os.environ.get("EMAIL_SMTP_POOL_SIZE", "3"))
+EMAIL_SMTP_IDLE_SECONDS = float(os.environ.get("EMAIL_SMTP_IDLE_SECONDS", "60"))
+
+# Failed messages are kept this long for inspection before the TTL index removes them
+FAILED_RETENTION_DAYS = 7
+
+
+# ====================
+# SMTP connection pool
+# ====================
+
+def is_permanent_smtp_error(error: Exception) -> bool:
+    """True for errors a retry cannot fix (5xx replies, every recipient refused)."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return False  # credentials may be fixed in the SMTP config UI
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 500 <= error.smtp_code < 600
+    return False
+
+
+class SMTPConnectionPool:
+    """
+    Small pool of authenticated smtplib connections.
+
+    smtplib is blocking, so connect/login/sendmail run in worker threads;
+    at most `size` messages are in flight at once, one per connection.
+    """
+
+    def __init__(self, config: Dict[str, Any], size: int = EMAIL_SMTP_POOL_SIZE,
+                 idle_seconds: float = EMAIL_SMTP_IDLE_SECONDS):
+        self.config = config
+        self.size = max(1, size)
+        self.idle_seconds = idle_seconds
+        self._slots = asyncio.Semaphore(self.size)
+        self._idle: List[Tuple[smtplib.SMTP, float]] = []
+        self.connections_opened = 0
+        self.messages_sent = 0
+
+    @staticmethod
+    def fingerprint(config: Dict[str, Any]) -> tuple:
+        """Pools are rebuilt when any connection-relevant setting changes."""
+        return (
+            config.get("host"), config.get("port"), config.get("username"),
+            config.get("password"), config.get("use_tls"), config.get("use_ssl")
+        )
+
+    def _connect(self) -> smtplib.SMTP:
+        config = self.config
+        timeout = config.get("timeout", 30)
+        if config.get("use_ssl"):
+            server = smtplib.SMTP_SSL(config["host"], config["port"], timeout=timeout)
+        else:
+            server = smtplib.SMTP(config["host"], config["port"], timeout=timeout)
+            if config.get("use_tls"):
+                server.starttls()
+        try:
+            if config.get("username"):
+                server.login(config["username"], config["password"])
+        except Exception:
+            self._close_quietly(server)
+            raise
+        self.connections_opened += 1
+        return server
+
+    @staticmethod
+    def _close_quietly(server: Optional[smtplib.SMTP]):
+        if server is None:
+            return
+        try:
+            server.close()
+        except Exception:
+            pass
+
+    def _take_idle(self) -> Optional[smtplib.SMTP]:
+        now = time.monotonic()
+        while self._idle:
+            server, last_used = self._idle.pop()
+            if now - last_used <= self.idle_seconds:
+                return server
+            # Servers drop idle sessions; reopen rather than risk a stale socket
+            self._close_quietly(server)
+        return None
+
+    async def send(self, from_email: str, recipients: List[str], message: str):
+        """Send one message on a pooled connection, reconnecting once if it was dropped."""
+        async with self._slots:
+            server = self._take_idle()
+            try:
+                if server is None:
+                    server = await asyncio.to_thread(self._connect)
+                try:
+                    await asyncio.to_thread(server.sendmail, from_email, recipients, message)
+                except smtplib.SMTPServerDisconnected:
+                    self._close_quietly(server)
+                    server = None
+                    server = await asyncio.to_thread(self._connect)
+                    await asyncio.to_thread(server.sendmail, from_email, recipients, message)
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError):
+                # The session itself is still usable (smtplib has already sent RSET)
+                if server is not None:
+                    self._idle.append((server, time.monotonic()))
+                raise
+            except Exception:
+                self._close_quietly(server)
+                raise
+
+            self._idle.append((server, time.monotonic()))
+            self.messages_sent += 1
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for server, _ in idle:
+            try:
+                await asyncio.to_thread(server.quit)
+            except Exception:
+                self._close_quietly(server)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "idle_connections": len(self._idle),
+            "connections_opened": self.connections_opened,
+            "messages_sent": self.messages_sent
+        }
+
+
+def build_message(smtp_config: Dict[str, Any], company_info: Dict[str, Any],
+                  item: Dict[str, Any]) -> Tuple[List[str], str]:
+    """Build the branded MIME message for an outbox item; returns (recipients, message)."""
+    from services.email_service import wrap_email_with_branding
+
+    msg = MIMEMultipart()
+    msg['From'] = f"{smtp_config['from_name']} <{smtp_config['from_email']}>"
+    msg['To'] = item["to_email"]
+    if item.get("cc_email"):
+        msg['Cc'] = item["cc_email"]
+    msg['Subject'] = item["subject"]
+
+    # Attach HTML body with branding
+    msg.attach(MIMEText(wrap_email_with_branding(item["body"], company_info), 'html'))
+
+    for attachment in item.get("attachments") or []:
+        content = attachment.get('content')
+        if content:
+            filename = attachment.get('filename', 'attachment.pdf')
+            part = MIMEApplication(bytes(content), Name=filename)
+            part['Content-Disposition'] = f'attachment; filename="{filename}"'
+            msg.attach(part)
+
+    recipients = [item["to_email"]]
+    if item.get("cc_email"):
+        recipients.append(item["cc_email"])
+
+    return recipients, msg.as_string()
+
+
+# ====================
+# Enqueue
+# ====================
+
+async def enqueue_emails(messages: List[Dict[str, Any]]) -> List[str]:
+    """
+    Queue several messages with two bulk inserts and wake the outbox worker.
+
+    Each message takes the send_email() keyword arguments (to_email, subject,
+    body, cc_email, template_key, variables, related_entity_type,
+    related_entity_id, attachments). Returns the email_logs ids.
+    """
+    if not messages:
+        return []
+
+    now = datetime.now(timezone.utc)
+    logs = []
+    items = []
+    for message in messages:
+        log_id = str(uuid.uuid4())
+        logs.append({
+            "id": log_id,
+            "to_email": message["to_email"],
+            "cc_email": message.get("cc_email"),
+            "subject": message["subject"],
+            "template_key": message.get("template_key"),
+            "status": "queued",
+            "error_message": None,
+            "variables": message.get("variables") or {},
+            "related_entity_type": message.get("related_entity_type"),
+            "related_entity_id": message.get("related_entity_id"),
+            "created_at": now.isoformat()
+        })
+        items.append({
+            "id": str(uuid.uuid4()),
+            "log_id": log_id,
+            "to_email": message["to_email"],
+            "cc_email": message.get("cc_email"),
+            "subject": message["subject"],
+            "body": message["body"],
+            "template_key": message.get("template_key"),
+            "attachments": [
+                {
+                    "filename": a.get("filename", "attachment.pdf"),
+                    "content": a.get("content"),
+                    "content_type": a.get("content_type", "application/pdf")
+                }
+                for a in (message.get("attachments") or []) if a.get("content")
+            ],
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": now,
+            "claim_id": None,
+            "lease_until": None,
+            "last_error": None,
+            "created_at": now.isoformat()
+        })
+
+    await db.email_logs.insert_many([with_native_dates("email_logs", log) for log in logs], ordered=False)
+    await db.email_outbox.insert_many(items, ordered=False)
+    email_outbox_worker.notify()
+
+    return [log["id"] for log in logs]
+
+
+async def enqueue_email(to_email: str, subject: str, body: str, **fields) -> str:
+    """Queue a single message; see enqueue_emails()."""
+    ids = await enqueue_emails([{"to_email": to_email, "subject": subject, "body": body, **fields}])
+    return ids[0]
+
+
+# ====================
+# Worker
+# ====================
+
+class EmailOutboxWorker:
+    """Background task that drains db.email_outbox in batches."""
+
+    def __init__(self, batch_size: int = EMAIL_OUTBOX_BATCH_SIZE,
+                 poll_seconds: float = EMAIL_OUTBOX_POLL_SECONDS):
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._pool: Optional[SMTPConnectionPool] = None
+        self._pool_key: Optional[tuple] = None
+        self.batches = 0
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.skipped = 0
+
+    def notify(self):
+        """Wake the worker early (called after enqueue)."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Email outbox worker started ({self.worker_id})")
+
+    async def stop(self, timeout: float = 15.0):
+        """Finish the batch in progress, then stop. Unsent mail stays in the outbox."""
+        self._stopping = True
+        self.notify()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout=timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                self._task.cancel()
+            self._task = None
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                processed = await self.process_batch()
+            except Exception as e:
+                logger.error(f"Email outbox batch failed: {e}")
+                processed = 0
+
+            if processed >= self.batch_size:
+                continue  # more waiting; go straight to the next batch
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    def _get_pool(self, smtp_config: Dict[str, Any]) -> SMTPConnectionPool:
+        key = SMTPConnectionPool.fingerprint(smtp_config)
+        if self._pool is None or self._pool_key != key:
+            old_pool = self._pool
+            self._pool = SMTPConnectionPool(smtp_config)
+            self._pool_key = key
+            if old_pool is not None:
+                asyncio.create_task(old_pool.close())
+        else:
+            self._pool.config = smtp_config
+        return self._pool
+
+    async def _claim(self) -> List[Dict[str, Any]]:
+        now = datetime.now(timezone.utc)
+        claimable = {"$or": [
+            {"status": "pending", "next_attempt_at": {"$lte": now}},
+            {"status": "sending", "lease_until": {"$lt": now}}
+        ]}
+        candidates = await db.email_outbox.find(
+            claimable, {"_id": 0, "id": 1}
+        ).sort("next_attempt_at", 1).limit(self.batch_size).to_list(self.batch_size)
+        if not candidates:
+            return []
+
+        claim_id = f"{self.worker_id}:{uuid.uuid4()}"
+        await db.email_outbox.update_many(
+            {"id": {"$in": [c["id"] for c in candidates]}, **claimable},
+            {"$set": {
+                "status": "sending",
+                "claim_id": claim_id,
+                "lease_until": now + timedelta(seconds=EMAIL_OUTBOX_LEASE_SECONDS)
+            }}
+        )
+        return await db.email_outbox.find({"claim_id": claim_id}, {"_id": 0}).to_list(self.batch_size)
+
+    async def process_batch(self) -> int:
+        """Claim and send one batch. Returns the number of messages handled."""
+        from services.email_service import get_smtp_config, get_company_info
+        from services.settings_cache import get_kill_switch
+
+        items = await self._claim()
+        if not items:
+            return 0
+        self.batches += 1
+
+        # Kill switch, SMTP config and branding come from the settings cache
+        kill_switch = await get_kill_switch()
+
+        if kill_switch and kill_switch.get("is_active"):
+            logger.warning(f"Email blocked - Kill switch is active. Dropping {len(items)} queued message(s)")
+            await self._record([(item, "skipped", "Kill switch active - System frozen") for item in items])
+            return len(items)
+
+        smtp_config = await get_smtp_config()
+        if not smtp_config:
+            logger.warning("Email not configured - neither database config nor environment variables set")
+            await self._record([(item, "skipped", "Email not configured") for item in items])
+            return len(items)
+
+        company_info = await get_company_info()
+        pool = self._get_pool(smtp_config)
+
+        async def send_one(item):
+            try:
+                recipients, message = build_message(smtp_config, company_info, item)
+                await pool.send(smtp_config["from_email"], recipients, message)
+                return item, "sent", None
+            except Exception as e:
+                attempts = item.get("attempts", 0) + 1
+                if is_permanent_smtp_error(e) or attempts >= EMAIL_OUTBOX_MAX_ATTEMPTS:
+                    logger.error(f"Failed to send email to {item['to_email']}: {e}")
+                    return item, "failed", str(e)
+                return item, "retry", str(e)
+
+        results = await asyncio.gather(*[send_one(item) for item in items])
+        await self._record(results)
+        return len(items)
+
+    async def _record(self, results: List[Tuple[Dict[str, Any], str, Optional[str]]]):
+        """Apply a batch's outcomes with one bulk_write per collection."""
+        now = datetime.now(timezone.utc)
+        outbox_ops = []
+        log_ops = []
+
+        for item, outcome, error in results:
+            attempts = item.get("attempts", 0) + (0 if outcome == "skipped" else 1)
+            # Only while still ours: an expired lease may have been re-claimed by another worker
+            claimed = {"id": item["id"], "claim_id": item["claim_id"]}
+
+            if outcome == "retry":
+                delay = EMAIL_OUTBOX_RETRY_BASE_SECONDS * (2 ** (attempts - 1))
+                outbox_ops.append(UpdateOne(claimed, {"$set": {
+                    "status": "pending",
+                    "attempts": attempts,
+                    "next_attempt_at": now + timedelta(seconds=delay),
+                    "claim_id": None,
+                    "lease_until": None,
+                    "last_error": error
+                }}))
+                log_ops.append(UpdateOne({"id": item["log_id"]}, {"$set": {
+                    "error_message": error,
+                    "attempts": attempts
+                }}))
+                self.retried += 1
+                continue
+
+            if outcome == "failed":
+                outbox_ops.append(UpdateOne(claimed, {"$set": {
+                    "status": "failed",
+                    "attempts": attempts,
+                    "claim_id": None,
+                    "lease_until": None,
+                    "last_error": error,
+                    "expires_at": now + timedelta(days=FAILED_RETENTION_DAYS)
+                }}))
+                self.failed += 1
+            else:
+                outbox_ops.append(DeleteOne(claimed))
+                if outcome == "sent":
+                    self.sent += 1
+                else:
+                    self.skipped += 1
+
+            log_update = {"status": outcome, "error_message": error, "attempts": attempts}
+            if outcome == "sent":
+                log_update["sent_at"] = now.isoformat()
+            log_ops.append(UpdateOne({"id": item["log_id"]}, {"$set": log_update}))
+
+        if outbox_ops:
+            await db.email_outbox.bulk_write(outbox_ops, ordered=False)
+        if log_ops:
+            await db.email_logs.bulk_write(log_ops, ordered=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "batches": self.batches,
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "smtp_pool": self._pool.stats() if self._pool else None
+        }
+
+
+email_outbox_worker = EmailOutboxWorker()
+
+
+def start_email_outbox():
+    email_outbox_worker.start()
+
+
+async def stop_email_outbox():
+    await email_outbox_worker.stop()
+
+
+async def get_email_outbox_stats() -> Dict[str, Any]:
+    """Worker counters plus queue depth."""
+    return {
+        **email_outbox_worker.stats(),
+        "pending": await db.email_outbox.count_documents({"status": {"$in": ["pending", "sending"]}}),
+        "failed_retained": await db.email_outbox.count_documents({"status": "failed"})
+    }
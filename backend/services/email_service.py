@@ -2,15 +2,11 @@
 Email service for sending notifications with audit logging
 """
 import logging
-import smtplib
 import random
 import string
 import uuid
 import os
 from datetime import datetime, timezone, timedelta
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.application import MIMEApplication
 from typing import Optional, Dict, Any, List
 
 from config import (
@@ -28,14 +24,11 @@ async def get_base_url() -> str:
     2. FRONTEND_URL environment variable
     3. Default fallback
     """
-    from database import db
+    from services.settings_cache import settings_cache
     
     # First check if there's a custom domain in company_master
     try:
-        company = await db.company_master.find_one(
-            {"_id": "company_settings"}, 
-            {"custom_domain": 1}
-        )
+        company = await settings_cache.peek("company")
         if company and company.get("custom_domain"):
             custom_domain = company["custom_domain"].rstrip('/')
             # Ensure it has https://
@@ -57,9 +50,9 @@ async def get_base_url() -> str:
 
 async def get_company_info():
     """Get company master info for email branding"""
-    from database import db
+    from services.settings_cache import settings_cache
     try:
-        company = await db.company_master.find_one({"_id": "company_settings"}, {"_id": 0})
+        company = await settings_cache.peek("company")
         if company:
             # Get base URL for constructing full logo URL
             base_url = await get_base_url()
@@ -185,6 +178,16 @@ async def send_to_all_client_emails(
             "message": "No email addresses found for this client"
         }
     
+    from services.email_outbox import enqueue_emails
+    
+    attachments = None
+    if attachment:
+        attachments = [{
+            "filename": attachment_name or "attachment.pdf",
+            "content": attachment,
+            "content_type": "application/pdf"
+        }]
+    
     results = {
         "success": True,
         "sent": 0,
@@ -193,22 +196,24 @@ async def send_to_all_client_emails(
         "errors": []
     }
     
-    for email in emails:
-        try:
-            await send_email(
-                to_email=email,
-                subject=subject,
-                body=body,
-                cc_email=cc_email,
-                attachment=attachment,
-                attachment_name=attachment_name
-            )
-            results["sent"] += 1
-            results["emails"].append(email)
-        except Exception as e:
-            results["failed"] += 1
-            results["errors"].append({"email": email, "error": str(e)})
-            logging.error(f"Failed to send email to {email}: {e}")
+    # "sent" counts messages accepted into the outbox; delivery is tracked in email_logs
+    try:
+        await enqueue_emails([
+            {
+                "to_email": email,
+                "subject": subject,
+                "body": body,
+                "cc_email": cc_email,
+                "attachments": attachments
+            }
+            for email in emails
+        ])
+        results["sent"] = len(emails)
+        results["emails"] = list(emails)
+    except Exception as e:
+        results["failed"] = len(emails)
+        results["errors"].append({"email": ", ".join(emails), "error": str(e)})
+        logging.error(f"Failed to queue emails for {client.get('name', 'Unknown')}: {e}")
     
     results["success"] = results["sent"] > 0
     results["message"] = f"Sent to {results['sent']}/{len(emails)} email addresses"
@@ -296,6 +301,7 @@ async def log_email(
 ):
     """Log email sending attempt to database for audit purposes"""
     from database import db
+    from utils.dates import with_native_dates
     
     log_entry = {
         "id": str(uuid.uuid4()),
@@ -312,17 +318,17 @@ async def log_email(
     }
     
     try:
-        await db.email_logs.insert_one(log_entry)
+        await db.email_logs.insert_one(with_native_dates("email_logs", log_entry))
     except Exception as e:
         logging.error(f"Failed to log email: {e}")
 
 
 async def get_smtp_config():
     """Get SMTP configuration from database or fall back to environment variables"""
-    from database import db
+    from services.settings_cache import settings_cache
     
     # Try smtp_settings collection first (new format from SMTP config UI)
-    config = await db.smtp_settings.find_one({}, {"_id": 0})
+    config = await settings_cache.peek("smtp")
     
     if config and config.get("is_enabled") and config.get("smtp_password"):
         return {
@@ -338,7 +344,7 @@ async def get_smtp_config():
         }
     
     # Try legacy email_config collection
-    legacy_config = await db.email_config.find_one({"_id": "smtp_config"})
+    legacy_config = await settings_cache.peek("smtp_legacy")
     
     if legacy_config and legacy_config.get("is_enabled") and legacy_config.get("smtp_password"):
         return {
@@ -452,40 +458,27 @@ async def send_templated_email(
     
     subject, body = render_template(template, variables)
     
-    # Collect all recipients
-    all_recipients = [to_email] if to_email else []
-    if additional_emails:
-        for email in additional_emails:
-            if email and email not in all_recipients:
-                all_recipients.append(email)
-    
-    # Send to primary recipient with CC
+    # Primary recipient gets the CC; additional emails are sent without it to avoid duplicates
+    messages = []
     if to_email:
-        await send_email(
-            to_email, 
-            subject, 
-            body, 
-            cc_email,
-            template_key=template_key,
-            variables=variables,
-            related_entity_type=related_entity_type,
-            related_entity_id=related_entity_id
-        )
-    
-    # Send to additional emails (without CC to avoid duplicates)
-    if additional_emails:
-        for email in additional_emails:
-            if email and email != to_email:
-                await send_email(
-                    email, 
-                    subject, 
-                    body, 
-                    None,
-                    template_key=template_key,
-                    variables=variables,
-                    related_entity_type=related_entity_type,
-                    related_entity_id=related_entity_id
-                )
+        messages.append({"to_email": to_email, "cc_email": cc_email})
+    for email in additional_emails or []:
+        if email and email != to_email and all(m["to_email"] != email for m in messages):
+            messages.append({"to_email": email, "cc_email": None})
+    
+    from services.email_outbox import enqueue_emails
+    await enqueue_emails([
+        {
+            **recipient,
+            "subject": subject,
+            "body": body,
+            "template_key": template_key,
+            "variables": variables,
+            "related_entity_type": related_entity_type,
+            "related_entity_id": related_entity_id
+        }
+        for recipient in messages
+    ])
     
     return True
 
@@ -502,7 +495,11 @@ async def send_email(
     attachments: Optional[List[Dict[str, Any]]] = None
 ):
     """
-    Send email via SMTP with optional CC and attachments
+    Queue an email for delivery with optional CC and attachments
+    
+    The message is written to the email outbox and sent by the outbox worker
+    (services/email_outbox.py), which applies the kill switch, SMTP config and
+    company branding at send time and records the result in email_logs.
     
     Args:
         to_email: Recipient email
@@ -518,124 +515,30 @@ async def send_email(
             - 'content': Bytes content of the file
             - 'content_type': MIME type (default: application/pdf)
     """
-    from database import db
+    from services.email_outbox import enqueue_email
     
-    # Check kill switch status - block all emails if system is frozen
     try:
-        kill_switch = await db.system_settings.find_one({"setting": "kill_switch"}, {"_id": 0})
-        if kill_switch and kill_switch.get("is_active"):
-            logging.warning(f"Email blocked - Kill switch is active. Would have sent to: {to_email}")
-            await log_email(
-                to_email=to_email,
-                subject=subject,
-                template_key=template_key,
-                status="skipped",
-                error_message="Kill switch active - System frozen",
-                cc_email=cc_email,
-                variables=variables,
-                related_entity_type=related_entity_type,
-                related_entity_id=related_entity_id
-            )
-            return
-    except Exception as e:
-        logging.error(f"Error checking kill switch: {e}")
-    
-    smtp_config = await get_smtp_config()
-    
-    if not smtp_config:
-        logging.warning("Email not configured - neither database config nor environment variables set")
-        await log_email(
+        await enqueue_email(
             to_email=to_email,
             subject=subject,
-            template_key=template_key,
-            status="skipped",
-            error_message="Email not configured",
+            body=body,
             cc_email=cc_email,
-            variables=variables,
-            related_entity_type=related_entity_type,
-            related_entity_id=related_entity_id
-        )
-        return
-    
-    try:
-        # Get company info for branding
-        company_info = await get_company_info()
-        
-        # Wrap body with company logo and footer
-        branded_body = wrap_email_with_branding(body, company_info)
-        
-        msg = MIMEMultipart()
-        from_display = f"{smtp_config['from_name']} <{smtp_config['from_email']}>"
-        msg['From'] = from_display
-        msg['To'] = to_email
-        if cc_email:
-            msg['Cc'] = cc_email
-        msg['Subject'] = subject
-        
-        # Attach HTML body with branding
-        msg.attach(MIMEText(branded_body, 'html'))
-        
-        # Attach files if provided
-        if attachments:
-            for attachment in attachments:
-                filename = attachment.get('filename', 'attachment.pdf')
-                content = attachment.get('content')
-                content_type = attachment.get('content_type', 'application/pdf')
-                
-                if content:
-                    # Create attachment part
-                    part = MIMEApplication(content, Name=filename)
-                    part['Content-Disposition'] = f'attachment; filename="{filename}"'
-                    msg.attach(part)
-        
-        recipients = [to_email]
-        if cc_email:
-            recipients.append(cc_email)
-        
-        # Connect using appropriate method
-        if smtp_config['use_ssl']:
-            server = smtplib.SMTP_SSL(
-                smtp_config['host'], 
-                smtp_config['port'], 
-                timeout=smtp_config['timeout']
-            )
-        else:
-            server = smtplib.SMTP(
-                smtp_config['host'], 
-                smtp_config['port'], 
-                timeout=smtp_config['timeout']
-            )
-            if smtp_config['use_tls']:
-                server.starttls()
-        
-        server.login(smtp_config['username'], smtp_config['password'])
-        server.sendmail(smtp_config['from_email'], recipients, msg.as_string())
-        server.quit()
-        
-        logging.info(f"Email sent successfully to {to_email}" + (f" with {len(attachments)} attachment(s)" if attachments else ""))
-        
-        # Log successful email
-        await log_email(
-            to_email=to_email,
-            subject=subject,
             template_key=template_key,
-            status="sent",
-            cc_email=cc_email,
             variables=variables,
             related_entity_type=related_entity_type,
-            related_entity_id=related_entity_id
+            related_entity_id=related_entity_id,
+            attachments=attachments
         )
-        
+        logging.info(f"Email queued for {to_email}" + (f" with {len(attachments)} attachment(s)" if attachments else ""))
     except Exception as e:
-        logging.error(f"Failed to send email: {e}")
+        logging.error(f"Failed to queue email: {e}")
         
-        # Log failed email
         await log_email(
             to_email=to_email,
             subject=subject,
             template_key=template_key,
             status="failed",
-            error_message=str(e),
+            error_message=f"Could not queue email: {e}",
             cc_email=cc_email,
             variables=variables,
             related_entity_type=related_entity_type,
@@ -1263,11 +1166,11 @@ async def send_payment_whatsapp_notification(
     """
     Send payment request notification via WhatsApp using Wati.io API
     """
-    from database import db
+    from services.settings_cache import settings_cache
     
     try:
         # Check if WhatsApp is configured
-        wa_config = await db.system_config.find_one({"config_type": "whatsapp"}, {"_id": 0})
+        wa_config = await settings_cache.peek("whatsapp")
         if not wa_config or not wa_config.get("enabled"):
             logging.info("WhatsApp not enabled - skipping payment notification")
             return
@@ -1726,10 +1629,10 @@ async def send_dp_ready_email(
 
 async def send_dp_ready_whatsapp(client: dict, booking: dict, stock: dict):
     """Send DP Ready notification via WhatsApp"""
-    from database import db
+    from services.settings_cache import settings_cache
     
     try:
-        wa_config = await db.system_config.find_one({"config_type": "whatsapp"}, {"_id": 0})
+        wa_config = await settings_cache.peek("whatsapp")
         if not wa_config or not wa_config.get("enabled"):
             return
         
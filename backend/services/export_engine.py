@@ -0,0 +1,444 @@
+"""
+Export Engine
+Streams Excel/CSV exports from MongoDB cursors without holding the export in
+memory or blocking the event loop.
+
+The export endpoints used to load up to 10,000 documents plus complete
+clients/stocks/users maps and build an openpyxl workbook on the event loop.
+With the engine an endpoint supplies:
+
+- an ExportSheet (title, headers, header colours, column widths),
+- an async iterator of row batches - usually cursor_batches(), which reads the
+  cursor in batches and lets the endpoint resolve related documents per batch
+  (BatchLoader) instead of preloading whole collections,
+- optionally a footer() callable for totals computed while streaming.
+
+CSV is encoded batch by batch and sent as it is produced. XLSX rows are handed
+through a bounded queue to a writer thread that appends them to an openpyxl
+write-only workbook on a temporary file, so memory stays flat and a slow
+client or a large workbook never blocks other requests; the file is then
+streamed out in chunks and removed.
+
+Large exports can run as background jobs instead (?background=true): the
+artifact is stored in GridFS and the job in db.export_jobs, polled through
+/exports/jobs/{job_id} and downloaded from /exports/jobs/{job_id}/download.
+
+Configuration (environment):
+    EXPORT_BATCH_SIZE             - documents read per cursor batch (default 500)
+    EXPORT_QUEUE_BATCHES          - batches buffered ahead of the writer thread (default 8)
+    EXPORT_WORKERS                - concurrent XLSX writer threads (default 4)
+    EXPORT_JOB_RETENTION_HOURS    - lifetime of background export artifacts (default 24)
+"""
+import asyncio
+import csv
+import io
+import logging
+import os
+import queue
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence
+
+import aiofiles
+from fastapi.responses import StreamingResponse
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+from openpyxl.utils import get_column_letter
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", "500"))
+EXPORT_QUEUE_BATCHES = int(os.environ.get("EXPORT_QUEUE_BATCHES", "8"))
+EXPORT_WORKERS = int(os.environ.get("EXPORT_WORKERS", "4"))
+EXPORT_JOB_RETENTION_HOURS = float(os.environ.get("EXPORT_JOB_RETENTION_HOURS", "24"))
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CSV_MEDIA_TYPE = "text/csv"
+FILE_CHUNK_BYTES = 256 * 1024
+
+_THIN = Side(style="thin")
+_BORDER = Border(left=_THIN, right=_THIN, top=_THIN, bottom=_THIN)
+
+# Queue markers for the writer thread
+_DONE = object()
+_ABORT = object()
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+class ExportSheet:
+    """Layout of a streamed worksheet (CSV uses only the headers)."""
+
+    def __init__(
+        self,
+        title: str,
+        headers: Sequence[str],
+        header_fill: str = "064E3B",
+        header_font_color: str = "FFFFFF",
+        column_widths: Optional[Sequence[float]] = None,
+        right_aligned: Sequence[int] = (),
+        bordered: bool = False,
+    ):
+        self.title = title
+        self.headers = list(headers)
+        self.header_fill = header_fill
+        self.header_font_color = header_font_color
+        self.column_widths = list(column_widths) if column_widths else [15] * len(self.headers)
+        # 1-based column numbers, as in the original exports
+        self.right_aligned = set(right_aligned)
+        self.bordered = bordered
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix="export")
+    return _executor
+
+
+async def cursor_batches(
+    cursor,
+    transform: Callable[[List[dict]], Awaitable[List[list]]],
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> AsyncIterator[List[list]]:
+    """Read a Motor cursor in batches and turn each batch into export rows."""
+    batch = []
+    async for doc in cursor.batch_size(batch_size):
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield await transform(batch)
+            batch = []
+    if batch:
+        yield await transform(batch)
+
+
+# ============== Writers ==============
+
+def _csv_chunk(rows: List[list]) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode("utf-8")
+
+
+async def _csv_stream(sheet: ExportSheet, batches: AsyncIterator[List[list]],
+                      footer: Optional[Callable[[], List[list]]] = None) -> AsyncIterator[bytes]:
+    yield _csv_chunk([sheet.headers])
+    async for rows in batches:
+        if rows:
+            yield _csv_chunk(rows)
+    if footer:
+        yield _csv_chunk(footer())
+
+
+def _write_workbook(sheet: ExportSheet, rows_queue: "queue.Queue", path: str) -> bool:
+    """Writer thread: drain row batches into a write-only workbook at path."""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(sheet.title)
+    for col, width in enumerate(sheet.column_widths, 1):
+        ws.column_dimensions[get_column_letter(col)].width = width
+
+    header_font = Font(bold=True, color=sheet.header_font_color)
+    header_fill = PatternFill(start_color=sheet.header_fill, end_color=sheet.header_fill, fill_type="solid")
+    header_alignment = Alignment(horizontal="center", vertical="center")
+    right = Alignment(horizontal="right")
+    bold = Font(bold=True)
+
+    def header_cell(value):
+        cell = WriteOnlyCell(ws, value=value)
+        cell.font, cell.fill, cell.alignment = header_font, header_fill, header_alignment
+        if sheet.bordered:
+            cell.border = _BORDER
+        return cell
+
+    def styled(row):
+        cells = []
+        for col, value in enumerate(row, 1):
+            cell = WriteOnlyCell(ws, value=value)
+            if sheet.bordered:
+                cell.border = _BORDER
+            if col in sheet.right_aligned:
+                cell.alignment = right
+            cells.append(cell)
+        return cells
+
+    plain = not sheet.bordered and not sheet.right_aligned
+    saved = False
+    try:
+        ws.append([header_cell(h) for h in sheet.headers])
+        while True:
+            item = rows_queue.get()
+            if item is _ABORT:
+                return False
+            if item is _DONE:
+                break
+            kind, rows = item
+            for row in rows:
+                if kind == "footer":
+                    cells = [WriteOnlyCell(ws, value=value) for value in row]
+                    for cell in cells:
+                        cell.font = bold
+                    ws.append(cells)
+                else:
+                    ws.append(row if plain else styled(row))
+        wb.save(path)
+        saved = True
+        return True
+    finally:
+        if not saved:
+            _discard_workbook(wb, ws)
+
+
+def _discard_workbook(wb: Workbook, ws):
+    """Close an unsaved write-only workbook; openpyxl only removes the sheet's temp file on save."""
+    writer = getattr(ws, "_writer", None)
+    try:
+        if writer is not None:
+            writer.close()
+            writer.cleanup()
+        wb.close()
+    except (OSError, ValueError) as e:
+        logger.debug(f"Export workbook cleanup: {e}")
+
+
+async def _put(rows_queue: "queue.Queue", item: Any, writer: asyncio.Future):
+    """Hand an item to the writer thread, waiting (not blocking) while the queue is full."""
+    while True:
+        if writer.done():
+            writer.result()  # re-raise a writer failure
+            raise RuntimeError("Export writer stopped early")
+        try:
+            rows_queue.put_nowait(item)
+            return
+        except queue.Full:
+            await asyncio.sleep(0.005)
+
+
+def _abort(rows_queue: "queue.Queue"):
+    while True:
+        try:
+            rows_queue.put_nowait(_ABORT)
+            return
+        except queue.Full:
+            try:
+                rows_queue.get_nowait()
+            except queue.Empty:
+                pass
+
+
+async def write_xlsx(sheet: ExportSheet, batches: AsyncIterator[List[list]], path: str,
+                     footer: Optional[Callable[[], List[list]]] = None) -> int:
+    """Write all batches to an XLSX file via the writer thread; returns the row count."""
+    rows_queue: "queue.Queue" = queue.Queue(maxsize=EXPORT_QUEUE_BATCHES)
+    loop = asyncio.get_running_loop()
+    writer = loop.run_in_executor(_get_executor(), _write_workbook, sheet, rows_queue, path)
+    count = 0
+    try:
+        async for rows in batches:
+            if rows:
+                await _put(rows_queue, ("rows", rows), writer)
+                count += len(rows)
+        if footer:
+            await _put(rows_queue, ("footer", footer()), writer)
+        await _put(rows_queue, _DONE, writer)
+    except BaseException:
+        _abort(rows_queue)
+        raise
+    await writer
+    return count
+
+
+async def write_csv(sheet: ExportSheet, batches: AsyncIterator[List[list]], path: str,
+                    footer: Optional[Callable[[], List[list]]] = None) -> int:
+    """Write all batches to a CSV file; returns the row count."""
+    count = 0
+    async with aiofiles.open(path, "wb") as f:
+        await f.write(_csv_chunk([sheet.headers]))
+        async for rows in batches:
+            if rows:
+                await f.write(_csv_chunk(rows))
+                count += len(rows)
+        if footer:
+            await f.write(_csv_chunk(footer()))
+    return count
+
+
+def _temp_path(suffix: str) -> str:
+    fd, path = tempfile.mkstemp(prefix="export_", suffix=suffix)
+    os.close(fd)
+    return path
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+async def _file_chunks(path: str) -> AsyncIterator[bytes]:
+    try:
+        async with aiofiles.open(path, "rb") as f:
+            while True:
+                chunk = await f.read(FILE_CHUNK_BYTES)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        _remove(path)
+
+
+async def _xlsx_stream(sheet: ExportSheet, batches: AsyncIterator[List[list]],
+                       footer: Optional[Callable[[], List[list]]] = None) -> AsyncIterator[bytes]:
+    path = _temp_path(".xlsx")
+    try:
+        await write_xlsx(sheet, batches, path, footer)
+    except BaseException:
+        _remove(path)
+        raise
+    async for chunk in _file_chunks(path):
+        yield chunk
+
+
+def _attachment(filename: str) -> Dict[str, str]:
+    return {"Content-Disposition": f"attachment; filename={filename}"}
+
+
+def stream_export(sheet: ExportSheet, batches: AsyncIterator[List[list]], format: str, filename: str,
+                  footer: Optional[Callable[[], List[list]]] = None) -> StreamingResponse:
+    """StreamingResponse for an export in "csv" or "xlsx" format."""
+    if format == "csv":
+        return StreamingResponse(_csv_stream(sheet, batches, footer), media_type=CSV_MEDIA_TYPE,
+                                 headers=_attachment(filename))
+    return StreamingResponse(_xlsx_stream(sheet, batches, footer), media_type=XLSX_MEDIA_TYPE,
+                             headers=_attachment(filename))
+
+
+async def workbook_response(build: Callable[[], Workbook], filename: str) -> StreamingResponse:
+    """
+    For exports whose layout needs a regular workbook (merged titles, several
+    sheets): build and save it on a writer thread, then stream the file.
+    """
+    path = _temp_path(".xlsx")
+
+    def build_and_save():
+        build().save(path)
+
+    try:
+        await asyncio.get_running_loop().run_in_executor(_get_executor(), build_and_save)
+    except BaseException:
+        _remove(path)
+        raise
+    return StreamingResponse(_file_chunks(path), media_type=XLSX_MEDIA_TYPE, headers=_attachment(filename))
+
+
+# ============== Background jobs ==============
+
+_jobs: Dict[str, asyncio.Task] = {}
+
+
+async def submit_export_job(kind: str, sheet: ExportSheet, batches: AsyncIterator[List[list]], format: str,
+                            filename: str, current_user: dict,
+                            footer: Optional[Callable[[], List[list]]] = None) -> Dict:
+    """Run an export in the background; the artifact is kept in GridFS."""
+    await purge_expired_exports()
+    now = datetime.now(timezone.utc)
+    job = {
+        "id": str(uuid.uuid4()),
+        "kind": kind,
+        "format": format,
+        "filename": filename,
+        "status": "queued",
+        "submitted_by": current_user.get("id"),
+        "created_at": now.isoformat(),
+        "started_at": None,
+        "completed_at": None,
+        "rows": None,
+        "file_id": None,
+        "error": None,
+        "expires_at": now + timedelta(hours=EXPORT_JOB_RETENTION_HOURS),
+    }
+    await db.export_jobs.insert_one(job.copy())
+
+    task = asyncio.create_task(_run_export_job(job, sheet, batches, footer))
+    _jobs[job["id"]] = task
+    task.add_done_callback(lambda _: _jobs.pop(job["id"], None))
+
+    job.pop("expires_at")
+    return {
+        **job,
+        "poll_url": f"/api/exports/jobs/{job['id']}",
+        "download_url": f"/api/exports/jobs/{job['id']}/download",
+    }
+
+
+async def _run_export_job(job: Dict, sheet: ExportSheet, batches: AsyncIterator[List[list]],
+                          footer: Optional[Callable[[], List[list]]]):
+    from services.file_storage import get_gridfs_bucket
+
+    job_id = job["id"]
+    await db.export_jobs.update_one(
+        {"id": job_id}, {"$set": {"status": "running", "started_at": datetime.now(timezone.utc).isoformat()}}
+    )
+    path = _temp_path(f".{job['format']}")
+    update = {}
+    try:
+        writer = write_csv if job["format"] == "csv" else write_xlsx
+        rows = await writer(sheet, batches, path, footer)
+
+        grid_in = get_gridfs_bucket().open_upload_stream(job["filename"], metadata={
+            "category": "export",
+            "content_type": CSV_MEDIA_TYPE if job["format"] == "csv" else XLSX_MEDIA_TYPE,
+            "export_job_id": job_id,
+            "uploaded_by": job["submitted_by"],
+            "expires_at": job["expires_at"],
+        })
+        async with aiofiles.open(path, "rb") as f:
+            while True:
+                chunk = await f.read(FILE_CHUNK_BYTES)
+                if not chunk:
+                    break
+                await grid_in.write(chunk)
+        await grid_in.close()
+        update.update({"status": "completed", "rows": rows, "file_id": str(grid_in._id)})
+    except Exception as e:
+        logger.error(f"Export job {job_id} ({job['kind']}) failed: {e}")
+        update.update({"status": "failed", "error": str(e)})
+    finally:
+        _remove(path)
+
+    update["completed_at"] = datetime.now(timezone.utc).isoformat()
+    await db.export_jobs.update_one({"id": job_id}, {"$set": update})
+
+
+async def get_export_job(job_id: str) -> Optional[Dict]:
+    return await db.export_jobs.find_one({"id": job_id}, {"_id": 0, "expires_at": 0})
+
+
+async def purge_expired_exports():
+    """Delete export artifacts whose job has passed its retention period."""
+    from services.file_storage import delete_file_from_gridfs
+
+    try:
+        expired = await db.fs.files.find(
+            {"metadata.category": "export", "metadata.expires_at": {"$lt": datetime.now(timezone.utc)}},
+            {"_id": 1}
+        ).to_list(100)
+        for f in expired:
+            await delete_file_from_gridfs(str(f["_id"]))
+    except Exception as e:
+        logger.warning(f"Export artifact cleanup failed: {e}")
+
+
+def shutdown_export_engine():
+    """Cancel running export jobs and stop writer threads (application shutdown)."""
+    global _executor
+    for task in list(_jobs.values()):
+        task.cancel()
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -91,10 +91,13 @@ async def delete_file_from_gridfs(file_id: str) -> bool:
     Returns:
         True if deleted successfully
     """
+    from services.file_streaming import invalidate_hot_file
+    
     bucket = get_gridfs_bucket()
     
     try:
         await bucket.delete(ObjectId(file_id))
+        invalidate_hot_file(file_id)
         return True
     except Exception as e:
         print(f"Error deleting file {file_id}: {e}")
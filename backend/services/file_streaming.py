@@ -0,0 +1,256 @@
+"""
+GridFS File Streaming
+Serves GridFS files chunk by chunk with HTTP Range and ETag support.
+
+download_file_from_gridfs() reads a whole file into memory before the response
+starts, so a large KYC PDF or research report costs its full size per request
+and delays the first byte. gridfs_file_response() instead:
+
+- answers If-None-Match with 304 Not Modified using a strong ETag built from
+  the GridFS md5 (when present) or _id/length/uploadDate,
+- serves a single "Range: bytes=..." request as 206 Partial Content
+  (416 when unsatisfiable; multi-range requests get the full file),
+- streams the body from open_download_stream() one GridFS chunk at a time,
+- keeps small files of hot categories (logos, templates) in an in-memory LRU.
+
+GridFS files are immutable (a re-upload gets a new _id), so cached entries only
+go stale on delete; the TTL bounds that window for other workers.
+
+Configuration (environment):
+    HOT_FILE_CACHE_CATEGORIES   - comma-separated metadata.category values to cache
+                                  (default "company_logo,email_templates")
+    HOT_FILE_CACHE_MAX_FILE_BYTES - largest file that is cached (default 512 KB)
+    HOT_FILE_CACHE_MAX_BYTES    - total cache budget (default 32 MB)
+    HOT_FILE_CACHE_TTL_SECONDS  - entry lifetime (default 600)
+"""
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from bson import ObjectId
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+
+from database import db
+from services.file_storage import get_gridfs_bucket
+
+HOT_FILE_CACHE_CATEGORIES = {
+    c.strip() for c in os.environ.get("HOT_FILE_CACHE_CATEGORIES", "company_logo,email_templates").split(",")
+    if c.strip()
+}
+HOT_FILE_CACHE_MAX_FILE_BYTES = int(os.environ.get("HOT_FILE_CACHE_MAX_FILE_BYTES", str(512 * 1024)))
+HOT_FILE_CACHE_MAX_BYTES = int(os.environ.get("HOT_FILE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+HOT_FILE_CACHE_TTL_SECONDS = float(os.environ.get("HOT_FILE_CACHE_TTL_SECONDS", "600"))
+
+
+class RangeNotSatisfiable(Exception):
+    """Raised when a Range header lies entirely outside the file."""
+
+
+class HotFileCache:
+    """Byte-budgeted LRU of small, frequently served files (content + file document)."""
+
+    def __init__(self, max_bytes: int = HOT_FILE_CACHE_MAX_BYTES, ttl_seconds: float = HOT_FILE_CACHE_TTL_SECONDS):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, dict, bytes]]" = OrderedDict()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, file_id: str) -> Optional[Tuple[dict, bytes]]:
+        entry = self._entries.get(file_id)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self.invalidate(file_id)
+            # Misses are counted by the caller, only for files that are cacheable
+            return None
+        self._entries.move_to_end(file_id)
+        self.hits += 1
+        return entry[1], entry[2]
+
+    def set(self, file_id: str, file_doc: dict, content: bytes):
+        if len(content) > self.max_bytes or self.ttl_seconds <= 0:
+            return
+        self.invalidate(file_id)
+        self._entries[file_id] = (time.monotonic() + self.ttl_seconds, file_doc, content)
+        self.size_bytes += len(content)
+        while self.size_bytes > self.max_bytes:
+            _, (_, _, evicted) = self._entries.popitem(last=False)
+            self.size_bytes -= len(evicted)
+
+    def invalidate(self, file_id: str):
+        entry = self._entries.pop(file_id, None)
+        if entry is not None:
+            self.size_bytes -= len(entry[2])
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "size_bytes": self.size_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+hot_file_cache = HotFileCache()
+
+
+def get_hot_file_cache_stats() -> Dict[str, Any]:
+    return hot_file_cache.stats()
+
+
+def invalidate_hot_file(file_id: str):
+    hot_file_cache.invalidate(str(file_id))
+
+
+def is_hot_file(file_doc: dict) -> bool:
+    category = (file_doc.get("metadata") or {}).get("category")
+    return (
+        category in HOT_FILE_CACHE_CATEGORIES
+        and (file_doc.get("length") or 0) <= HOT_FILE_CACHE_MAX_FILE_BYTES
+    )
+
+
+def make_etag(file_doc: dict) -> str:
+    """Strong ETag for a GridFS file document."""
+    if file_doc.get("md5"):
+        return f'"{file_doc["md5"]}"'
+    upload_date = file_doc.get("uploadDate")
+    stamp = upload_date.isoformat() if hasattr(upload_date, "isoformat") else str(upload_date)
+    digest = hashlib.sha1(f"{file_doc['_id']}:{file_doc.get('length')}:{stamp}".encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as If-None-Match requires
+    candidates = [t.strip() for t in if_none_match.split(",")]
+    return any(c.removeprefix("W/") == etag for c in candidates)
+
+
+def parse_range(range_header: Optional[str], length: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single "bytes=" range into an inclusive (start, end).
+
+    Returns None when the header is absent, malformed or asks for several
+    ranges (the full file is served then). Raises RangeNotSatisfiable when the
+    range starts past the end of the file.
+    """
+    if not range_header or not range_header.startswith("bytes="):
+        return None
+    spec = range_header[len("bytes="):].strip()
+    if "," in spec or "-" not in spec:
+        return None
+
+    start_text, end_text = (part.strip() for part in spec.split("-", 1))
+    try:
+        if not start_text:
+            # Suffix range: the last N bytes
+            suffix = int(end_text)
+            if suffix <= 0:
+                raise RangeNotSatisfiable(range_header)
+            return max(0, length - suffix), length - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else length - 1
+    except ValueError:
+        return None
+
+    if start >= length:
+        raise RangeNotSatisfiable(range_header)
+    if start > end:
+        return None
+    return start, min(end, length - 1)
+
+
+async def _stream_gridfs(file_id: ObjectId, start: int, end: int) -> AsyncIterator[bytes]:
+    """Yield bytes [start, end] of a GridFS file, at most one chunk per read."""
+    grid_out = await get_gridfs_bucket().open_download_stream(file_id)
+    if start:
+        grid_out.seek(start)
+    remaining = end - start + 1
+    chunk_size = grid_out.chunk_size or 255 * 1024
+    while remaining > 0:
+        data = await grid_out.read(min(chunk_size, remaining))
+        if not data:
+            break
+        remaining -= len(data)
+        yield data
+
+
+async def gridfs_file_response(
+    file_id: str,
+    request: Request,
+    disposition: str = "inline",
+    filename: Optional[str] = None,
+    media_type: Optional[str] = None,
+    cache_control: Optional[str] = None
+) -> Response:
+    """
+    Build a streaming (or 206/304/416) response for a GridFS file.
+
+    Raises FileNotFoundError if the file does not exist.
+    """
+    cached = hot_file_cache.get(file_id)
+    if cached is not None:
+        file_doc, content = cached
+    else:
+        content = None
+        try:
+            file_doc = await db.fs.files.find_one({"_id": ObjectId(file_id)})
+        except Exception:
+            file_doc = None
+        if not file_doc:
+            raise FileNotFoundError(f"File not found: {file_id}")
+
+    metadata = file_doc.get("metadata") or {}
+    length = file_doc.get("length") or 0
+    etag = make_etag(file_doc)
+    filename = filename or metadata.get("original_filename") or file_doc.get("filename") or "download"
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f'{disposition}; filename="{filename}"',
+    }
+    if cache_control:
+        headers["Cache-Control"] = cache_control
+    media_type = media_type or metadata.get("content_type", "application/octet-stream")
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if if_range is None or if_range.strip() == etag:
+        try:
+            byte_range = parse_range(request.headers.get("range"), length)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{length}"})
+
+    if content is None and is_hot_file(file_doc):
+        hot_file_cache.misses += 1
+        grid_out = await get_gridfs_bucket().open_download_stream(file_doc["_id"])
+        content = await grid_out.read()
+        hot_file_cache.set(file_id, file_doc, content)
+
+    start, end = byte_range if byte_range else (0, length - 1)
+    status_code = 200
+    if byte_range:
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{length}"
+    headers["Content-Length"] = str(max(0, end - start + 1))
+
+    if content is not None:
+        return Response(content=content[start:end + 1], status_code=status_code,
+                        media_type=media_type, headers=headers)
+
+    body = _stream_gridfs(file_doc["_id"], start, end) if length else iter(())
+    return StreamingResponse(body, status_code=status_code, media_type=media_type, headers=headers)
@@ -1,9 +1,25 @@
 """
 Hierarchy Service
 Manages organizational hierarchy for users (Employee → Manager → Zonal Head → Regional Manager → Business Head)
+
+The reports_to links are materialized in db.hierarchy_closure: one row per
+(ancestor_id, descendant_id) pair with the number of levels between them
+(depth 1 = direct report). "All subordinates of X" and "managers above X" are
+single indexed queries, and a full tree is built in memory from one users
+query. The closure is updated incrementally whenever reports_to changes
+(update_hierarchy_closure / remove_from_hierarchy_closure) and
+check_hierarchy_closure() compares it with the users collection and repairs
+drift (run nightly and after restores).
 """
-from typing import List, Optional, Set
+import logging
+from typing import Dict, List, Optional, Set, Tuple
+
+from pymongo import DeleteOne, UpdateOne
+
 from database import db
+from services.auth_cache import invalidate_user
+
+logger = logging.getLogger(__name__)
 
 # Hierarchy Levels
 HIERARCHY_LEVELS = {
@@ -35,29 +51,176 @@ async def get_direct_reports(manager_id: str) -> List[str]:
     return [u["id"] for u in users]
 
 
-async def get_all_subordinates(manager_id: str, visited: Set[str] = None) -> List[str]:
+# ============== Closure table ==============
+
+def compute_closure(parents: Dict[str, Optional[str]]) -> Dict[Tuple[str, str], int]:
     """
-    Recursively get all subordinates (direct and indirect) under a manager.
-    Returns list of user IDs including all levels below.
+    Full closure from a {user_id: reports_to} map: {(ancestor, descendant): depth}.
+    Links to users that do not exist end the chain; cycles are cut.
     """
-    if visited is None:
-        visited = set()
-    
-    # Prevent infinite loops
-    if manager_id in visited:
-        return []
-    visited.add(manager_id)
-    
-    subordinates = []
-    direct_reports = await get_direct_reports(manager_id)
-    
-    for report_id in direct_reports:
-        subordinates.append(report_id)
-        # Recursively get subordinates of this report
-        sub_subordinates = await get_all_subordinates(report_id, visited)
-        subordinates.extend(sub_subordinates)
-    
-    return subordinates
+    closure = {}
+    for user_id in parents:
+        seen = {user_id}
+        current, depth = parents[user_id], 1
+        while current and current in parents and current not in seen:
+            closure[(current, user_id)] = depth
+            seen.add(current)
+            current, depth = parents[current], depth + 1
+    return closure
+
+
+def closure_rows_for_move(subtree: Dict[str, int], ancestors: Dict[str, int]) -> Dict[Tuple[str, str], int]:
+    """
+    Rows linking a subtree under its new manager.
+
+    subtree maps the moved user (depth 0) and their descendants to their depth
+    below the moved user; ancestors maps the new manager (depth 0) and everyone
+    above them to their depth above the new manager.
+    """
+    return {
+        (ancestor, descendant): above + 1 + below
+        for ancestor, above in ancestors.items()
+        for descendant, below in subtree.items()
+    }
+
+
+def diff_closure(expected: Dict[Tuple[str, str], int], stored: Dict[Tuple[str, str], int]) -> dict:
+    """Rows to add, rows to remove and rows whose depth is wrong."""
+    return {
+        "missing": [key for key in expected if key not in stored],
+        "extra": [key for key in stored if key not in expected],
+        "wrong_depth": [key for key in expected if key in stored and stored[key] != expected[key]],
+    }
+
+
+def _upsert_rows(rows: Dict[Tuple[str, str], int]) -> List[UpdateOne]:
+    return [
+        UpdateOne(
+            {"ancestor_id": ancestor, "descendant_id": descendant},
+            {"$set": {"depth": depth}},
+            upsert=True
+        )
+        for (ancestor, descendant), depth in rows.items()
+    ]
+
+
+async def _subtree(user_id: str) -> Dict[str, int]:
+    """The user (depth 0) and all their descendants with depth below the user."""
+    rows = await db.hierarchy_closure.find(
+        {"ancestor_id": user_id}, {"_id": 0, "descendant_id": 1, "depth": 1}
+    ).to_list(None)
+    subtree = {row["descendant_id"]: row["depth"] for row in rows}
+    subtree[user_id] = 0
+    return subtree
+
+
+async def _detach(subtree: Dict[str, int]):
+    """Drop the links between a subtree and everyone above its root."""
+    members = list(subtree)
+    await db.hierarchy_closure.delete_many(
+        {"descendant_id": {"$in": members}, "ancestor_id": {"$nin": members}}
+    )
+
+
+async def update_hierarchy_closure(user_id: str, reports_to: Optional[str]):
+    """
+    Re-link a user (and everyone under them) after their reports_to changed.
+    Call after the users document has been written.
+    """
+    subtree = await _subtree(user_id)
+    await _detach(subtree)
+    if not reports_to:
+        return
+
+    ancestor_rows = await db.hierarchy_closure.find(
+        {"descendant_id": reports_to}, {"_id": 0, "ancestor_id": 1, "depth": 1}
+    ).to_list(None)
+    ancestors = {row["ancestor_id"]: row["depth"] for row in ancestor_rows}
+    ancestors[reports_to] = 0
+
+    if any(member in ancestors for member in subtree):
+        # Circular reporting line slipped past validation - recompute from users
+        logger.warning(f"Circular reporting line at user {user_id}; rebuilding hierarchy closure")
+        await check_hierarchy_closure(repair=True)
+        return
+
+    rows = closure_rows_for_move(subtree, ancestors)
+    if rows:
+        await db.hierarchy_closure.bulk_write(_upsert_rows(rows), ordered=False)
+
+
+async def remove_from_hierarchy_closure(user_id: str):
+    """Drop a deleted user; their reports keep their own sub-teams."""
+    await _detach(await _subtree(user_id))
+    await db.hierarchy_closure.delete_many({"$or": [{"ancestor_id": user_id}, {"descendant_id": user_id}]})
+
+
+async def check_hierarchy_closure(repair: bool = False) -> dict:
+    """
+    Compare the closure with the reports_to links in db.users.
+    With repair=True, missing/extra/wrong rows are fixed in place.
+    """
+    users = await db.users.find({}, {"_id": 0, "id": 1, "reports_to": 1}).to_list(None)
+    expected = compute_closure({u["id"]: u.get("reports_to") for u in users if u.get("id")})
+
+    stored = {}
+    async for row in db.hierarchy_closure.find({}, {"_id": 0, "ancestor_id": 1, "descendant_id": 1, "depth": 1}):
+        stored[(row["ancestor_id"], row["descendant_id"])] = row.get("depth")
+
+    diff = diff_closure(expected, stored)
+    report = {
+        "users": len(users),
+        "rows": len(stored),
+        "expected_rows": len(expected),
+        "missing": len(diff["missing"]),
+        "extra": len(diff["extra"]),
+        "wrong_depth": len(diff["wrong_depth"]),
+        "consistent": not any(diff.values()),
+        "repaired": False,
+    }
+
+    if repair and not report["consistent"]:
+        operations = _upsert_rows({key: expected[key] for key in diff["missing"] + diff["wrong_depth"]})
+        operations += [
+            DeleteOne({"ancestor_id": ancestor, "descendant_id": descendant})
+            for ancestor, descendant in diff["extra"]
+        ]
+        for start in range(0, len(operations), 1000):
+            await db.hierarchy_closure.bulk_write(operations[start:start + 1000], ordered=False)
+        report["repaired"] = True
+        logger.info(f"Hierarchy closure repaired: {report}")
+
+    return report
+
+
+async def ensure_hierarchy_closure():
+    """Build the closure once if it has never been built (e.g. first deploy)."""
+    try:
+        if not await db.hierarchy_closure.find_one({}, {"_id": 1}):
+            await check_hierarchy_closure(repair=True)
+    except Exception as e:
+        logger.error(f"Hierarchy closure backfill failed: {e}")
+
+
+# ============== Lookups ==============
+
+async def get_all_subordinates(manager_id: str) -> List[str]:
+    """
+    Get all subordinates (direct and indirect) under a manager.
+    Returns list of user IDs including all levels below, nearest level first.
+    """
+    rows = await db.hierarchy_closure.find(
+        {"ancestor_id": manager_id}, {"_id": 0, "descendant_id": 1}
+    ).sort("depth", 1).to_list(None)
+    return [row["descendant_id"] for row in rows]
+
+
+async def get_manager_ids(user_id: str) -> List[str]:
+    """IDs of the managers above a user, from immediate manager to top."""
+    rows = await db.hierarchy_closure.find(
+        {"descendant_id": user_id}, {"_id": 0, "ancestor_id": 1}
+    ).sort("depth", 1).to_list(None)
+    return [row["ancestor_id"] for row in rows]
 
 
 async def get_team_user_ids(user_id: str, include_self: bool = True) -> List[str]:
@@ -121,44 +284,41 @@ async def can_edit_user_data(editor_id: str, target_user_id: str) -> bool:
     return editor.get("role") in [1, 2]
 
 
+def _build_tree(root: dict, reports_by_manager: Dict[str, List[dict]], visited: Set[str]) -> dict:
+    visited.add(root["id"])
+    root["direct_reports"] = [
+        _build_tree(report, reports_by_manager, visited)
+        for report in reports_by_manager.get(root["id"], [])
+        if report["id"] not in visited
+    ]
+    return root
+
+
 async def get_hierarchy_tree(root_user_id: str = None) -> List[dict]:
     """
     Get the full hierarchy tree starting from root (or all Business Heads if no root).
     Returns nested structure with user info and their reports.
     """
     if root_user_id:
-        # Get tree starting from specific user
-        user = await db.users.find_one({"id": root_user_id}, {"_id": 0, "password": 0})
-        if not user:
-            return []
-        
-        direct_reports = await db.users.find(
-            {"reports_to": root_user_id},
-            {"_id": 0, "password": 0}
-        ).to_list(1000)
-        
-        user["direct_reports"] = []
-        for report in direct_reports:
-            report_tree = await get_hierarchy_tree(report["id"])
-            if report_tree:
-                user["direct_reports"].append(report_tree[0])
-            else:
-                user["direct_reports"].append(report)
-        
-        return [user]
+        # The root and everyone under it, in one query
+        member_ids = [root_user_id] + await get_all_subordinates(root_user_id)
+        users = await db.users.find({"id": {"$in": member_ids}}, {"_id": 0, "password": 0}).to_list(None)
     else:
-        # Get all users without a manager (top level)
-        top_users = await db.users.find(
-            {"$or": [{"reports_to": None}, {"reports_to": {"$exists": False}}]},
-            {"_id": 0, "password": 0}
-        ).to_list(1000)
-        
-        result = []
-        for user in top_users:
-            tree = await get_hierarchy_tree(user["id"])
-            result.extend(tree)
-        
-        return result
+        users = await db.users.find({}, {"_id": 0, "password": 0}).to_list(None)
+
+    reports_by_manager: Dict[str, List[dict]] = {}
+    for user in users:
+        if user.get("reports_to"):
+            reports_by_manager.setdefault(user["reports_to"], []).append(user)
+
+    if root_user_id:
+        roots = [u for u in users if u.get("id") == root_user_id]
+    else:
+        # All users without a manager (top level)
+        roots = [u for u in users if not u.get("reports_to")]
+
+    visited: Set[str] = set()
+    return [_build_tree(user, reports_by_manager, visited) for user in roots]
 
 
 async def get_manager_chain(user_id: str) -> List[dict]:
@@ -166,26 +326,12 @@ async def get_manager_chain(user_id: str) -> List[dict]:
     Get the chain of managers above a user (up to Business Head).
     Returns list from immediate manager to top.
     """
-    chain = []
-    current_id = user_id
-    visited = set()
-    
-    while current_id and current_id not in visited:
-        visited.add(current_id)
-        user = await db.users.find_one({"id": current_id}, {"_id": 0, "password": 0})
-        if not user:
-            break
-        
-        reports_to = user.get("reports_to")
-        if reports_to:
-            manager = await db.users.find_one({"id": reports_to}, {"_id": 0, "password": 0})
-            if manager:
-                chain.append(manager)
-            current_id = reports_to
-        else:
-            break
-    
-    return chain
+    manager_ids = await get_manager_ids(user_id)
+    if not manager_ids:
+        return []
+    managers = await db.users.find({"id": {"$in": manager_ids}}, {"_id": 0, "password": 0}).to_list(None)
+    by_id = {m["id"]: m for m in managers}
+    return [by_id[m] for m in manager_ids if m in by_id]
 
 
 async def update_user_hierarchy(user_id: str, reports_to: Optional[str], hierarchy_level: int) -> bool:
@@ -216,6 +362,8 @@ async def update_user_hierarchy(user_id: str, reports_to: Optional[str], hierarc
             "hierarchy_level": hierarchy_level
         }}
     )
+    invalidate_user(user_id)
+    await update_hierarchy_closure(user_id, reports_to)
     
     return result.modified_count > 0
 
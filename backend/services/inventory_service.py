@@ -1,149 +1,366 @@
 """
 Inventory Service with High-Concurrency Support
 
-This service handles all inventory operations with proper locking and atomic updates
-to prevent race conditions during simultaneous booking requests.
+Inventory is maintained as an incremental ledger so that booking operations are
+O(1) and safe across multiple uvicorn workers:
+
+- db.inventory holds the materialized counters per stock (purchased_qty,
+  purchased_value, blocked_qty, transferred_qty). Every event applies a $inc-style
+  delta and recomputes the derived fields (available, weighted average, total
+  value) in the same atomic pipeline update.
+- db.inventory_ledger is an append-only log of applied events. Each event has a
+  deterministic _id ("reserve:<booking_id>", "purchase:<purchase_id>", ...), so
+  replaying the same event is a no-op.
+- Reservations are a conditional find_one_and_update guarded on the available
+  quantity; two workers can never both reserve the last units.
+
+Callers apply the inventory event *before* persisting the corresponding
+booking/purchase change, so a full recompute never sees a change twice.
+A scheduled reconciler (reconcile_inventory) verifies the ledger against a full
+recompute from purchases and bookings and repairs any drift.
 """
-import asyncio
-from datetime import datetime, timezone
-from typing import Optional, Dict, Any, Tuple
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import Optional, Dict, Any, Tuple, List
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from database import db
 import logging
 
 logger = logging.getLogger(__name__)
 
-# In-memory locks for inventory operations (per stock)
-_inventory_locks: Dict[str, asyncio.Lock] = {}
+# Optimistic-concurrency retries for full rebuilds
+REBUILD_MAX_RETRIES = 5
 
+# Stocks touched within this window are skipped by the reconciler, since an
+# event may have been applied while its booking/purchase write is still in flight
+RECONCILE_GRACE_SECONDS = 120
 
-def get_inventory_lock(stock_id: str) -> asyncio.Lock:
-    """Get or create a lock for a specific stock's inventory."""
-    if stock_id not in _inventory_locks:
-        _inventory_locks[stock_id] = asyncio.Lock()
-    return _inventory_locks[stock_id]
+# Counters stored on the inventory document and compared by the reconciler
+LEDGER_COUNTERS = ("purchased_qty", "purchased_value", "blocked_qty", "transferred_qty")
 
 
-async def update_inventory(stock_id: str) -> Dict[str, Any]:
+def _purchase_price(purchase: Dict[str, Any]) -> float:
+    """Unit price of a purchase (UI purchases store price_per_share, bulk uploads price_per_unit)."""
+    price = purchase.get("price_per_unit")
+    if price is None:
+        price = purchase.get("price_per_share", 0)
+    return price or 0
+
+
+def _derived_fields_stage() -> Dict[str, Any]:
+    """Pipeline stage recomputing derived inventory fields from the ledger counters."""
+    raw_available = {"$subtract": ["$purchased_qty", {"$add": ["$transferred_qty", "$blocked_qty"]}]}
+    weighted_avg = {
+        "$cond": [
+            {"$gt": ["$purchased_qty", 0]},
+            {"$divide": ["$purchased_value", "$purchased_qty"]},
+            0
+        ]
+    }
+    return {"$set": {
+        "available_qty": {"$max": [0, raw_available]},
+        "available_quantity": {"$max": [0, raw_available]},  # Alias for compatibility
+        "blocked_quantity": "$blocked_qty",  # Alias for compatibility
+        "weighted_avg_price": {"$round": [weighted_avg, 2]},
+        "total_value": {"$round": [{"$multiply": [{"$max": [0, raw_available]}, weighted_avg]}, 2]},
+        "last_updated": datetime.now(timezone.utc).isoformat(),
+        "ledger_version": {"$add": ["$ledger_version", 1]}
+    }}
+
+
+def _delta_pipeline(deltas: Dict[str, float]) -> List[Dict[str, Any]]:
+    """Aggregation-pipeline update adding deltas to the ledger counters."""
+    increments = {
+        field: {"$add": [{"$ifNull": [f"${field}", 0]}, deltas.get(field, 0)]}
+        for field in LEDGER_COUNTERS
+    }
+    return [{"$set": increments}, _derived_fields_stage()]
+
+
+async def compute_inventory_from_source(stock_id: str) -> Dict[str, Any]:
     """
-    Recalculate inventory for a stock (backward compatible function).
-    
-    This function recalculates:
-    - available_quantity: Stock available for new bookings
-    - blocked_quantity: Stock reserved for approved bookings
-    - weighted_avg_price: Average purchase price
-    
-    Returns the updated inventory data.
+    Compute inventory counters for a stock from purchases and bookings.
+
+    This is the full (O(history)) recompute used to bootstrap the ledger and by
+    the reconciler. It does not write anything.
     """
-    lock = get_inventory_lock(stock_id)
-    
-    async with lock:
-        return await _recalculate_inventory_internal(stock_id)
-
-
-async def _recalculate_inventory_internal(stock_id: str) -> Dict[str, Any]:
-    """Internal recalculation without lock (caller must hold lock)."""
-    # Get all purchases for this stock
-    purchases = await db.purchases.find({"stock_id": stock_id}, {"_id": 0}).to_list(10000)
-    
-    # Get all bookings for this stock
-    bookings = await db.bookings.find({"stock_id": stock_id}, {"_id": 0}).to_list(10000)
-    
-    # Calculate total purchased (handle missing price_per_unit field gracefully)
-    total_purchased_qty = sum(p.get("quantity", 0) for p in purchases)
-    total_purchased_value = sum(p.get("quantity", 0) * p.get("price_per_unit", 0) for p in purchases)
-    
-    # Calculate blocked quantity (approved bookings not yet transferred)
-    blocked_qty = sum(
-        b.get("quantity", 0) for b in bookings 
-        if b.get("approval_status") == "approved" 
-        and not b.get("is_voided", False)
-        and not b.get("stock_transferred", False)
-    )
-    
-    # Calculate transferred quantity (completed sales)
-    transferred_qty = sum(
-        b.get("quantity", 0) for b in bookings 
-        if b.get("stock_transferred") == True
-        and not b.get("is_voided", False)
-    )
-    
-    # Available = purchased - transferred - blocked
-    available_qty = total_purchased_qty - transferred_qty - blocked_qty
-    
-    # Calculate weighted average from total purchases
-    weighted_avg = total_purchased_value / total_purchased_qty if total_purchased_qty > 0 else 0
-    
-    # Get stock details
-    stock = await db.stocks.find_one({"id": stock_id}, {"_id": 0})
-    
-    # Update or insert inventory
-    inventory_data = {
-        "stock_id": stock_id,
-        "stock_symbol": stock["symbol"] if stock else "Unknown",
-        "stock_name": stock["name"] if stock else "Unknown",
-        "purchased_qty": total_purchased_qty,
-        "available_qty": max(0, available_qty),
-        "available_quantity": max(0, available_qty),  # Alias for compatibility
-        "blocked_qty": blocked_qty,
-        "blocked_quantity": blocked_qty,  # Alias for compatibility
-        "transferred_qty": transferred_qty,
-        "weighted_avg_price": round(weighted_avg, 2),
-        "total_value": round(max(0, available_qty) * weighted_avg, 2),
-        "last_updated": datetime.now(timezone.utc).isoformat()
+    purchased = await db.purchases.aggregate([
+        {"$match": {"stock_id": stock_id}},
+        {"$project": {
+            "quantity": {"$ifNull": ["$quantity", 0]},
+            "price": {"$ifNull": ["$price_per_unit", {"$ifNull": ["$price_per_share", 0]}]}
+        }},
+        {"$group": {
+            "_id": None,
+            "qty": {"$sum": "$quantity"},
+            "value": {"$sum": {"$multiply": ["$quantity", "$price"]}}
+        }}
+    ]).to_list(1)
+
+    # Blocked = approved bookings not yet transferred; transferred = completed sales
+    booked = await db.bookings.aggregate([
+        {"$match": {"stock_id": stock_id, "is_voided": {"$ne": True}}},
+        {"$group": {
+            "_id": None,
+            "blocked": {"$sum": {"$cond": [
+                {"$and": [
+                    {"$eq": ["$approval_status", "approved"]},
+                    {"$ne": ["$stock_transferred", True]}
+                ]},
+                {"$ifNull": ["$quantity", 0]},
+                0
+            ]}},
+            "transferred": {"$sum": {"$cond": [
+                {"$eq": ["$stock_transferred", True]},
+                {"$ifNull": ["$quantity", 0]},
+                0
+            ]}}
+        }}
+    ]).to_list(1)
+
+    purchased = purchased[0] if purchased else {}
+    booked = booked[0] if booked else {}
+    return {
+        "purchased_qty": purchased.get("qty", 0),
+        "purchased_value": round(purchased.get("value", 0), 2),
+        "blocked_qty": booked.get("blocked", 0),
+        "transferred_qty": booked.get("transferred", 0)
     }
-    
-    await db.inventory.update_one(
-        {"stock_id": stock_id},
-        {"$set": inventory_data},
-        upsert=True
+
+
+async def _rebuild_inventory(stock_id: str) -> Dict[str, Any]:
+    """
+    Rebuild the inventory document for a stock from a full recompute.
+
+    Uses optimistic concurrency on ledger_version: if another worker applies an
+    event between the read and the write, the rebuild is retried so the event
+    is not lost.
+    """
+    stock = await db.stocks.find_one({"id": stock_id}, {"_id": 0, "symbol": 1, "name": 1})
+
+    for _ in range(REBUILD_MAX_RETRIES):
+        current = await db.inventory.find_one({"stock_id": stock_id}, {"_id": 0, "ledger_version": 1})
+        version = current.get("ledger_version") if current else None
+        counters = await compute_inventory_from_source(stock_id)
+
+        available_qty = counters["purchased_qty"] - counters["transferred_qty"] - counters["blocked_qty"]
+        weighted_avg = counters["purchased_value"] / counters["purchased_qty"] if counters["purchased_qty"] > 0 else 0
+
+        inventory_data = {
+            "stock_id": stock_id,
+            "stock_symbol": stock["symbol"] if stock else "Unknown",
+            "stock_name": stock["name"] if stock else "Unknown",
+            **counters,
+            "available_qty": max(0, available_qty),
+            "available_quantity": max(0, available_qty),  # Alias for compatibility
+            "blocked_quantity": counters["blocked_qty"],  # Alias for compatibility
+            "weighted_avg_price": round(weighted_avg, 2),
+            "total_value": round(max(0, available_qty) * weighted_avg, 2),
+            "ledger_version": (version or 0) + 1,
+            "last_updated": datetime.now(timezone.utc).isoformat()
+        }
+
+        guard = {"stock_id": stock_id}
+        if version is None:
+            guard["ledger_version"] = {"$exists": False}
+        else:
+            guard["ledger_version"] = version
+
+        try:
+            result = await db.inventory.update_one(guard, {"$set": inventory_data}, upsert=current is None)
+        except DuplicateKeyError:
+            continue
+        if result.matched_count or result.upserted_id is not None:
+            logger.info(
+                f"Inventory rebuilt for stock {stock_id}: purchased={counters['purchased_qty']}, "
+                f"available={available_qty}, blocked={counters['blocked_qty']}, transferred={counters['transferred_qty']}"
+            )
+            return inventory_data
+
+    logger.warning(f"Inventory rebuild for stock {stock_id} kept conflicting after {REBUILD_MAX_RETRIES} attempts")
+    return await db.inventory.find_one({"stock_id": stock_id}, {"_id": 0}) or {}
+
+
+async def dedupe_inventory_documents() -> List[str]:
+    """
+    Collapse duplicate inventory documents (one per stock is required by the
+    unique stock_id index) and rebuild the survivors from source.
+
+    Returns the stock ids that had duplicates.
+    """
+    duplicates = await db.inventory.aggregate([
+        {"$sort": {"ledger_version": -1, "last_updated": -1}},
+        {"$group": {"_id": "$stock_id", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}}
+    ]).to_list(length=None)
+
+    for group in duplicates:
+        # Keep the most recently versioned document; its counters are rebuilt below
+        await db.inventory.delete_many({"_id": {"$in": group["ids"][1:]}})
+        await _rebuild_inventory(group["_id"])
+        logger.warning(f"Removed {group['count'] - 1} duplicate inventory documents for stock {group['_id']}")
+    return [group["_id"] for group in duplicates]
+
+
+async def ensure_ledger(stock_id: str) -> Dict[str, Any]:
+    """Return the ledger-backed inventory document, bootstrapping it if needed."""
+    inventory = await db.inventory.find_one({"stock_id": stock_id}, {"_id": 0})
+    if inventory and inventory.get("ledger_version") is not None:
+        return inventory
+    return await _rebuild_inventory(stock_id)
+
+
+async def _record_event(event_id: str, stock_id: str, event_type: str, quantity: int, **details) -> bool:
+    """
+    Append an event to the ledger.
+
+    Returns False if the event was already recorded (idempotent replay).
+    """
+    try:
+        await db.inventory_ledger.insert_one({
+            "_id": event_id,
+            "stock_id": stock_id,
+            "type": event_type,
+            "quantity": quantity,
+            **details,
+            "created_at": datetime.now(timezone.utc).isoformat()
+        })
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+async def _apply_delta(stock_id: str, deltas: Dict[str, float], guard: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """Atomically apply counter deltas to a ledger-backed inventory document."""
+    await ensure_ledger(stock_id)
+    query = {"stock_id": stock_id, "ledger_version": {"$exists": True}}
+    if guard:
+        query.update(guard)
+    return await db.inventory.find_one_and_update(
+        query,
+        _delta_pipeline(deltas),
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
     )
-    
-    logger.info(f"Inventory updated for stock {stock_id}: purchased={total_purchased_qty}, available={available_qty}, blocked={blocked_qty}, transferred={transferred_qty}")
-    return inventory_data
+
+
+async def update_inventory(stock_id: str) -> Dict[str, Any]:
+    """
+    Recalculate inventory for a stock from purchases and bookings (backward compatible function).
+
+    This is a full recompute; use it after edits that cannot be expressed as a
+    single ledger event (e.g. a booking edit changing stock or quantity).
+
+    Returns the updated inventory data.
+    """
+    return await _rebuild_inventory(stock_id)
+
+
+async def apply_purchase(purchase: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Add a purchase to the inventory ledger.
+
+    Call before inserting the purchase document.
+
+    Args:
+        purchase: Purchase document (id, stock_id, quantity, price)
+
+    Returns:
+        Updated inventory data
+    """
+    stock_id = purchase["stock_id"]
+    quantity = purchase.get("quantity", 0)
+    value = round(quantity * _purchase_price(purchase), 2)
+
+    await ensure_ledger(stock_id)
+    if not await _record_event(f"purchase:{purchase['id']}", stock_id, "purchase", quantity,
+                               purchase_id=purchase["id"], value=value):
+        return await db.inventory.find_one({"stock_id": stock_id}, {"_id": 0})
+
+    inventory = await _apply_delta(stock_id, {"purchased_qty": quantity, "purchased_value": value})
+    logger.info(f"Inventory ledger: +{quantity} units of stock {stock_id} from purchase {purchase['id']}")
+    return inventory
+
+
+async def reverse_purchase(purchase: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Remove a purchase from the inventory ledger.
+
+    Call before deleting the purchase document.
+    """
+    stock_id = purchase["stock_id"]
+    quantity = purchase.get("quantity", 0)
+    value = round(quantity * _purchase_price(purchase), 2)
+
+    await ensure_ledger(stock_id)
+    if not await _record_event(f"purchase_reversal:{purchase['id']}", stock_id, "purchase_reversal", quantity,
+                               purchase_id=purchase["id"], value=value):
+        return await db.inventory.find_one({"stock_id": stock_id}, {"_id": 0})
+
+    inventory = await _apply_delta(stock_id, {"purchased_qty": -quantity, "purchased_value": -value})
+    logger.info(f"Inventory ledger: -{quantity} units of stock {stock_id} for deleted purchase {purchase['id']}")
+    return inventory
 
 
 async def check_and_reserve_inventory(
-    stock_id: str, 
+    stock_id: str,
     quantity: int,
     booking_id: str
-) -> Tuple[bool, str, Optional[Dict[str, Any]]]:
+) -> Tuple[bool, str, Optional[Dict[str, Any]], bool]:
     """
-    Check inventory availability for a booking.
-    
-    This uses in-memory locking to prevent race conditions when multiple 
-    bookings try to reserve the same stock.
-    
-    Note: Inventory blocked/available quantities are calculated dynamically
-    based on approved bookings, not through atomic increments. This prevents
-    double-counting issues.
-    
+    Atomically reserve inventory for a booking approval.
+
+    The reservation is a single find_one_and_update guarded on
+    available_qty >= quantity, so concurrent approvals on any worker cannot
+    oversell. Replaying the same booking_id does not reserve twice.
+
+    The reserve event is recorded with applied=False and flagged once the
+    counters are updated. A replay only reports success for an applied
+    reservation; one still in flight on another request is reported as a
+    failure, so two approvals of one booking never both proceed on a single
+    reservation attempt.
+
+    Call before marking the booking as approved.
+
     Args:
         stock_id: The stock to check
         quantity: Amount needed
         booking_id: The booking ID making the reservation
-    
+
     Returns:
-        Tuple of (success, message, inventory_data)
+        Tuple of (success, message, inventory_data, reserved) where reserved
+        is True only if this call applied the reservation. Only then may the
+        caller release it when its own booking update loses a race.
     """
-    lock = get_inventory_lock(stock_id)
-    
-    async with lock:
-        # Recalculate inventory to get accurate counts
-        # This counts blocked_qty from approved bookings in the database
-        inventory = await _recalculate_inventory_internal(stock_id)
-        
-        if not inventory:
-            return False, "Inventory record not found for this stock", None
-        
-        available = inventory.get("available_quantity", 0)
-        
-        if available < quantity:
-            return False, f"Insufficient inventory. Available: {available}, Requested: {quantity}", inventory
-        
-        # No need to do atomic $inc - the booking approval will update the booking status
-        # and the next recalculation will reflect the blocked quantity correctly
-        logger.info(f"Inventory check passed for {quantity} units of stock {stock_id} for booking {booking_id}. Available: {available}")
-        return True, "Inventory available", inventory
+    inventory = await ensure_ledger(stock_id)
+    if not inventory:
+        return False, "Inventory record not found for this stock", None, False
+
+    event_id = f"reserve:{booking_id}"
+    if not await _record_event(event_id, stock_id, "reserve", quantity, booking_id=booking_id, applied=False):
+        event = await db.inventory_ledger.find_one({"_id": event_id}, {"applied": 1, "created_at": 1})
+        stale = (datetime.now(timezone.utc) - timedelta(seconds=RECONCILE_GRACE_SECONDS)).isoformat()
+        if event and not event.get("applied", True) and event.get("created_at", "") < stale:
+            # Left behind by a request that died between recording and applying
+            await db.inventory_ledger.delete_one({"_id": event_id, "applied": False})
+            return await check_and_reserve_inventory(stock_id, quantity, booking_id)
+        if not event or not event.get("applied", True):
+            return False, "A reservation for this booking is in progress. Please retry.", None, False
+        logger.info(f"Reservation for booking {booking_id} already recorded; skipping")
+        return True, "Inventory already reserved", await db.inventory.find_one({"stock_id": stock_id}, {"_id": 0}), False
+
+    inventory = await _apply_delta(stock_id, {"blocked_qty": quantity}, guard={"available_qty": {"$gte": quantity}})
+    if inventory is None:
+        # Guard failed - drop the (unapplied) event so a later attempt can retry
+        await db.inventory_ledger.delete_one({"_id": event_id, "applied": False})
+        current = await db.inventory.find_one({"stock_id": stock_id}, {"_id": 0})
+        available = current.get("available_quantity", 0) if current else 0
+        return False, f"Insufficient inventory. Available: {available}, Requested: {quantity}", current, False
+
+    await db.inventory_ledger.update_one({"_id": event_id}, {"$set": {"applied": True}})
+    logger.info(f"Reserved {quantity} units of stock {stock_id} for booking {booking_id}. Available: {inventory.get('available_quantity')}")
+    return True, "Inventory available", inventory, True
 
 
 async def release_inventory_reservation(
@@ -152,71 +369,69 @@ async def release_inventory_reservation(
     booking_id: str
 ) -> Tuple[bool, str]:
     """
-    Recalculate inventory after a booking is voided/rejected.
-    
+    Release a booking's reservation back to available inventory.
+
     Used when:
     - Booking is voided
-    - Booking is rejected
-    - Booking fails validation
-    
-    Note: We just recalculate inventory from bookings data rather than
-    doing atomic decrements. This ensures consistency.
-    
+    - Booking is deleted after approval
+
+    Call before persisting the void/delete.
+
     Args:
         stock_id: The stock to update
-        quantity: Amount that was reserved (for logging)
+        quantity: Amount that was reserved
         booking_id: The booking ID releasing the reservation
-    
+
     Returns:
         Tuple of (success, message)
     """
-    lock = get_inventory_lock(stock_id)
-    
-    async with lock:
-        # Recalculate inventory from actual booking data
-        # This ensures blocked_qty is accurate based on approved bookings
-        inventory = await _recalculate_inventory_internal(stock_id)
-        
-        if inventory:
-            logger.info(f"Inventory recalculated after releasing {quantity} units from booking {booking_id}. Available: {inventory.get('available_quantity')}, Blocked: {inventory.get('blocked_quantity')}")
-            return True, "Inventory updated successfully"
-        else:
-            logger.warning(f"Failed to recalculate inventory for stock {stock_id}, booking {booking_id}")
-            return False, "Failed to update inventory"
+    if not await _record_event(f"release:{booking_id}", stock_id, "release", quantity, booking_id=booking_id):
+        return True, "Reservation already released"
+
+    inventory = await _apply_delta(stock_id, {"blocked_qty": -quantity})
+    if inventory:
+        logger.info(f"Released {quantity} units from booking {booking_id}. Available: {inventory.get('available_quantity')}, Blocked: {inventory.get('blocked_quantity')}")
+        return True, "Inventory updated successfully"
+
+    logger.warning(f"Failed to release inventory for stock {stock_id}, booking {booking_id}")
+    return False, "Failed to update inventory"
 
 
 async def transfer_inventory(
     stock_id: str,
     quantity: int,
-    booking_id: str
+    booking_id: str,
+    reserved: bool = True
 ) -> Tuple[bool, str]:
     """
-    Recalculate inventory after stock transfer (completed sale).
-    
-    The booking's stock_transferred flag should already be set to True
-    before calling this function. We just recalculate to update counts.
-    
+    Move a booking's quantity to transferred (completed sale).
+
+    Call before setting the booking's stock_transferred flag.
+
     Args:
         stock_id: The stock being transferred
-        quantity: Amount being transferred (for logging)
+        quantity: Amount being transferred
         booking_id: The booking ID for the transfer
-    
+        reserved: Whether the quantity is currently blocked by an approval
+
     Returns:
         Tuple of (success, message)
     """
-    lock = get_inventory_lock(stock_id)
-    
-    async with lock:
-        # Recalculate inventory from actual booking data
-        # transferred_qty is calculated from bookings with stock_transferred=True
-        inventory = await _recalculate_inventory_internal(stock_id)
-        
-        if inventory:
-            logger.info(f"Inventory recalculated after transfer of {quantity} units for booking {booking_id}. Available: {inventory.get('available_quantity')}, Blocked: {inventory.get('blocked_quantity')}")
-            return True, "Inventory transferred successfully"
-        else:
-            logger.warning(f"Failed to recalculate inventory for stock {stock_id}, booking {booking_id}")
-            return False, "Failed to mark inventory as transferred"
+    if not await _record_event(f"transfer:{booking_id}", stock_id, "transfer", quantity,
+                               booking_id=booking_id, reserved=reserved):
+        return True, "Inventory already transferred"
+
+    deltas = {"transferred_qty": quantity}
+    if reserved:
+        deltas["blocked_qty"] = -quantity
+
+    inventory = await _apply_delta(stock_id, deltas)
+    if inventory:
+        logger.info(f"Transferred {quantity} units for booking {booking_id}. Available: {inventory.get('available_quantity')}, Blocked: {inventory.get('blocked_quantity')}")
+        return True, "Inventory transferred successfully"
+
+    logger.warning(f"Failed to transfer inventory for stock {stock_id}, booking {booking_id}")
+    return False, "Failed to mark inventory as transferred"
 
 
 async def get_stock_weighted_avg_price(stock_id: str) -> float:
@@ -230,44 +445,40 @@ async def get_stock_weighted_avg_price(stock_id: str) -> float:
 async def check_stock_availability(stock_id: str, required_qty: int) -> Tuple[bool, int, float]:
     """
     Check if stock has sufficient quantity available.
-    
+
+    This is an O(1) read of the ledger; the binding check happens at approval
+    time in check_and_reserve_inventory.
+
     Returns: (is_available, available_qty, weighted_avg_price)
     """
-    lock = get_inventory_lock(stock_id)
-    
-    async with lock:
-        # Recalculate to get accurate inventory counts
-        inventory = await _recalculate_inventory_internal(stock_id)
-        if not inventory:
-            return False, 0, 0
-        
-        available_qty = inventory.get("available_quantity", 0)
-        weighted_avg = inventory.get("weighted_avg_price", 0)
-        
-        return available_qty >= required_qty, available_qty, weighted_avg
+    inventory = await ensure_ledger(stock_id)
+    if not inventory:
+        return False, 0, 0
+
+    available_qty = inventory.get("available_quantity", 0)
+    weighted_avg = inventory.get("weighted_avg_price", 0)
+
+    return available_qty >= required_qty, available_qty, weighted_avg
 
 
 async def get_inventory_with_lock(stock_id: str) -> Optional[Dict[str, Any]]:
     """
-    Get inventory data with a lock to prevent concurrent reads during critical operations.
-    Recalculates inventory to ensure accuracy.
+    Get the ledger-backed inventory for a stock.
+
+    Kept for backward compatibility; ledger updates are atomic so no lock is needed.
     """
-    lock = get_inventory_lock(stock_id)
-    
-    async with lock:
-        inventory = await _recalculate_inventory_internal(stock_id)
-        return inventory
+    return await ensure_ledger(stock_id)
 
 
 async def batch_check_inventory(stock_ids: list) -> Dict[str, Dict[str, Any]]:
     """
     Check inventory for multiple stocks at once.
-    
+
     Useful for bulk operations or dashboard views.
-    
+
     Args:
         stock_ids: List of stock IDs to check
-    
+
     Returns:
         Dictionary mapping stock_id to inventory data
     """
@@ -275,5 +486,60 @@ async def batch_check_inventory(stock_ids: list) -> Dict[str, Dict[str, Any]]:
         {"stock_id": {"$in": stock_ids}},
         {"_id": 0}
     ).to_list(len(stock_ids))
-    
+
     return {inv["stock_id"]: inv for inv in inventories}
+
+
+async def reconcile_inventory(
+    stock_ids: Optional[List[str]] = None,
+    repair: bool = True,
+    grace_seconds: int = RECONCILE_GRACE_SECONDS
+) -> Dict[str, Any]:
+    """
+    Verify ledger counters against a full recompute and repair drift.
+
+    Stocks updated within grace_seconds are skipped because an event may have
+    been applied while its booking/purchase write is still in flight.
+
+    Args:
+        stock_ids: Stocks to check (default: every stock with an inventory record)
+        repair: Rebuild drifted stocks from source when True
+        grace_seconds: Skip stocks whose ledger changed more recently than this
+
+    Returns:
+        Summary with checked/skipped counts and per-stock drift details
+    """
+    if stock_ids is None:
+        stock_ids = await db.inventory.distinct("stock_id")
+
+    cutoff = (datetime.now(timezone.utc) - timedelta(seconds=grace_seconds)).isoformat()
+    summary = {"checked": 0, "skipped_in_flight": 0, "drifted": 0, "repaired": 0, "drift": []}
+
+    for stock_id in stock_ids:
+        inventory = await db.inventory.find_one({"stock_id": stock_id}, {"_id": 0})
+        if inventory and inventory.get("last_updated", "") > cutoff:
+            summary["skipped_in_flight"] += 1
+            continue
+
+        summary["checked"] += 1
+        expected = await compute_inventory_from_source(stock_id)
+        actual = {field: (inventory or {}).get(field) for field in LEDGER_COUNTERS}
+
+        mismatched = {
+            field: {"ledger": actual[field], "expected": expected[field]}
+            for field in LEDGER_COUNTERS
+            if actual[field] is None or abs((actual[field] or 0) - expected[field]) > 0.01
+        }
+        if not mismatched:
+            continue
+
+        summary["drifted"] += 1
+        summary["drift"].append({"stock_id": stock_id, "stock_symbol": (inventory or {}).get("stock_symbol"), "fields": mismatched})
+        logger.warning(f"Inventory drift for stock {stock_id}: {mismatched}")
+
+        if repair:
+            await _rebuild_inventory(stock_id)
+            await _record_event(f"reconcile:{stock_id}:{uuid.uuid4()}", stock_id, "reconcile", 0, fields=mismatched)
+            summary["repaired"] += 1
+
+    return summary
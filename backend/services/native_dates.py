@@ -0,0 +1,87 @@
+"""
+Native Date Backfill
+
+Documents written before the dual-write layer (utils/dates.py
+with_native_dates) carry their dates only as ISO strings. This module gives
+them native <field>_dt twins with batched unordered bulk updates, so the
+$gte/$lt range filters and their indexes cover old rows too.
+
+ensure_native_dates() runs at startup and backfills every collection whose
+registered fields (NATIVE_DATE_FIELDS) have not been backfilled yet, recording
+completion in db.native_dates_state. It is idempotent: only documents still
+missing a _dt twin are touched, so it can be re-run (rebuild_native_dates)
+after bulk imports that bypassed the write paths.
+
+Configuration (environment):
+    NATIVE_DATES_BATCH_SIZE - updates per bulk_write (default 1000)
+"""
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional
+
+from pymongo import UpdateOne
+
+from database import db
+from utils.dates import NATIVE_DATE_FIELDS, native_field, parse_datetime
+
+logger = logging.getLogger(__name__)
+
+NATIVE_DATES_BATCH_SIZE = int(os.environ.get("NATIVE_DATES_BATCH_SIZE", "1000"))
+
+
+async def backfill_field(collection: str, field: str) -> Dict[str, int]:
+    """Set <field>_dt on every document that only has the string."""
+    native = native_field(field)
+    updated = unparseable = 0
+    operations = []
+    cursor = db[collection].find(
+        {native: {"$exists": False}, field: {"$type": "string"}},
+        {"_id": 1, field: 1}
+    ).batch_size(NATIVE_DATES_BATCH_SIZE)
+    async for doc in cursor:
+        parsed = parse_datetime(doc.get(field))
+        if parsed is None:
+            unparseable += 1
+            continue
+        operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": {native: parsed}}))
+        if len(operations) >= NATIVE_DATES_BATCH_SIZE:
+            await db[collection].bulk_write(operations, ordered=False)
+            updated += len(operations)
+            operations = []
+    if operations:
+        await db[collection].bulk_write(operations, ordered=False)
+        updated += len(operations)
+    return {"updated": updated, "unparseable": unparseable}
+
+
+async def rebuild_native_dates(collections: Optional[Iterable[str]] = None) -> dict:
+    """Backfill the native date twins of the given (default: all registered) collections."""
+    report = {}
+    for collection in list(collections or NATIVE_DATE_FIELDS):
+        fields = NATIVE_DATE_FIELDS[collection]
+        report[collection] = {field: await backfill_field(collection, field) for field in fields}
+        await db.native_dates_state.update_one(
+            {"_id": collection},
+            {"$set": {"fields": list(fields), "backfilled_at": datetime.now(timezone.utc).isoformat()}},
+            upsert=True,
+        )
+    logger.info(f"Native date backfill: {report}")
+    return report
+
+
+async def ensure_native_dates():
+    """Backfill collections whose registered date fields were never backfilled (e.g. first deploy)."""
+    try:
+        done = {
+            state["_id"]: state.get("fields", [])
+            async for state in db.native_dates_state.find({}, {"_id": 1, "fields": 1})
+        }
+        missing = [
+            collection for collection, fields in NATIVE_DATE_FIELDS.items()
+            if done.get(collection) != list(fields)
+        ]
+        if missing:
+            await rebuild_native_dates(missing)
+    except Exception as e:
+        logger.error(f"Native date backfill failed: {e}")
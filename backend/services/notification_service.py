@@ -8,6 +8,7 @@ from typing import Dict, List, Any, Optional
 from fastapi import WebSocket
 
 from database import db
+from utils.dates import with_native_dates
 
 
 class ConnectionManager:
@@ -133,7 +134,7 @@ async def create_notification(
     }
     
     # Insert a copy to avoid _id being added to original dict
-    await db.notifications.insert_one(notification.copy())
+    await db.notifications.insert_one(with_native_dates("notifications", notification.copy()))
     
     # Send via WebSocket (without _id)
     await ws_manager.send_to_user(user_id, {
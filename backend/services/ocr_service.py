@@ -1,20 +1,59 @@
 """
 OCR service for document processing
 Enhanced with robust extraction and validation
+
+Documents are OCR'd through a small job pipeline:
+
+- Rasterization: the first page of a PDF is rendered to PNG in a process
+  pool (pdf2image/poppler never runs on the event loop).
+- Extraction: the image goes to a pluggable extractor. The default sends it
+  to the vision LLM; set_ocr_extractor() swaps in any
+  async (image_base64, prompt, system_message) -> str callable, e.g. a local
+  stub in tests.
+- Bounded parallelism: at most OCR_MAX_CONCURRENCY documents are OCR'd at
+  once; concurrent requests for identical bytes share one run.
+- Result cache: successful results are stored in db.ocr_cache keyed by the
+  SHA-256 of the file bytes + doc type, so re-uploaded and cloned documents
+  are not OCR'd again. An explicit rerun bypasses the cache and refreshes it.
+
+Configuration (environment):
+    OCR_RASTER_WORKERS   - rasterization worker processes (default min(2, cpu count));
+                           0 rasterizes on a thread instead
+    OCR_MAX_CONCURRENCY  - documents OCR'd at once (default 4)
+    OCR_PDF_DPI          - PDF rasterization DPI (default 200)
+    OCR_CACHE_TTL_HOURS  - how long cached results are kept (default 720)
 """
+import asyncio
+import hashlib
+import json
 import logging
+import os
 import uuid
 import base64
 import io
 import re
-from datetime import datetime, timezone
-from typing import Dict, Any, Optional, List
+from datetime import datetime, timezone, timedelta
+from typing import Awaitable, Callable, Dict, Any, Optional, List, Tuple
 import aiofiles
 
 from config import EMERGENT_LLM_KEY
+from utils.process_pool import WorkerPool
 
 logger = logging.getLogger(__name__)
 
+OCR_RASTER_WORKERS = int(os.environ.get("OCR_RASTER_WORKERS", str(max(1, min(2, os.cpu_count() or 1)))))
+OCR_MAX_CONCURRENCY = int(os.environ.get("OCR_MAX_CONCURRENCY", "4"))
+OCR_PDF_DPI = int(os.environ.get("OCR_PDF_DPI", "200"))
+OCR_CACHE_TTL_HOURS = float(os.environ.get("OCR_CACHE_TTL_HOURS", "720"))
+
+# Bump when prompts or post-processing change so stale cached results are ignored
+OCR_CACHE_VERSION = 1
+
+OCR_SYSTEM_MESSAGE = "You are an expert OCR specialist for Indian financial documents. Extract information with extreme accuracy. CRITICAL: Always respond with ONLY valid JSON, no explanations, no markdown code blocks, just the raw JSON object."
+
+# async (image_base64, prompt, system_message) -> raw model response
+OcrExtractor = Callable[[str, str, str], Awaitable[str]]
+
 
 def validate_pan_number(pan: str) -> bool:
     """Validate PAN number format: AAAAA0000A"""
@@ -66,35 +105,51 @@ def normalize_name(name: str) -> str:
     return name.title()
 
 
-async def convert_file_to_base64(file_path: str) -> tuple:
-    """Convert file to base64, handling PDF conversion"""
-    file_ext = file_path.lower().split('.')[-1]
-    
-    if file_ext == 'pdf':
+def rasterize_pdf_first_page(pdf_bytes: bytes, dpi: int = OCR_PDF_DPI) -> Optional[bytes]:
+    """Render the first page of a PDF to PNG bytes (runs in a worker process)"""
+    from pdf2image import convert_from_bytes
+    images = convert_from_bytes(pdf_bytes, first_page=1, last_page=1, dpi=dpi)
+    if not images:
+        return None
+    img_byte_arr = io.BytesIO()
+    images[0].save(img_byte_arr, format='PNG', optimize=True)
+    return img_byte_arr.getvalue()
+
+
+class OcrRasterPool(WorkerPool):
+    """Process pool for PDF rasterization."""
+
+    def __init__(self, workers: int = OCR_RASTER_WORKERS):
+        # On a thread (workers=0) the document limit is the only bound
+        super().__init__(workers, max_concurrency=workers or OCR_MAX_CONCURRENCY)
+
+
+raster_pool = OcrRasterPool()
+
+
+async def convert_bytes_to_base64(content: bytes, file_ext: str) -> Tuple[Optional[str], Optional[str]]:
+    """Convert document bytes to a base64 image, rasterizing PDFs in the worker pool"""
+    if file_ext.lower().lstrip('.') == 'pdf':
         try:
-            from pdf2image import convert_from_path
-            # Convert PDF to images with higher DPI for better OCR
-            images = convert_from_path(file_path, first_page=1, last_page=1, dpi=200)
-            if not images:
+            image_bytes = await raster_pool.run(rasterize_pdf_first_page, content, OCR_PDF_DPI)
+            if not image_bytes:
                 return None, "Could not convert PDF to image"
-            
-            img_byte_arr = io.BytesIO()
-            images[0].save(img_byte_arr, format='PNG', optimize=True)
-            image_bytes = img_byte_arr.getvalue()
-            image_base64 = base64.b64encode(image_bytes).decode('utf-8')
             logger.info("Converted PDF to image for OCR processing")
-            return image_base64, None
+            return base64.b64encode(image_bytes).decode('utf-8'), None
         except Exception as e:
             logger.error(f"PDF conversion failed: {e}")
             return None, f"PDF conversion failed: {str(e)}"
-    else:
-        try:
-            async with aiofiles.open(file_path, 'rb') as f:
-                image_bytes = await f.read()
-            image_base64 = base64.b64encode(image_bytes).decode('utf-8')
-            return image_base64, None
-        except Exception as e:
-            return None, f"Failed to read file: {str(e)}"
+    return base64.b64encode(content).decode('utf-8'), None
+
+
+async def convert_file_to_base64(file_path: str) -> tuple:
+    """Convert file to base64, handling PDF conversion"""
+    try:
+        async with aiofiles.open(file_path, 'rb') as f:
+            content = await f.read()
+    except Exception as e:
+        return None, f"Failed to read file: {str(e)}"
+    return await convert_bytes_to_base64(content, file_path.split('.')[-1])
 
 
 def get_pan_card_prompt() -> str:
@@ -398,103 +453,182 @@ Return ONLY this JSON structure:
 NO explanations, NO markdown code blocks, ONLY the raw JSON object."""
 
 
-async def process_document_ocr(file_path: str, doc_type: str, retry_count: int = 0) -> Optional[Dict[str, Any]]:
+def get_ocr_prompt(doc_type: str) -> str:
+    """Prompt for a document type"""
+    if doc_type == "pan_card":
+        return get_pan_card_prompt()
+    if doc_type == "cancelled_cheque":
+        return get_cancelled_cheque_prompt()
+    if doc_type in ["bank_statement", "passbook", "bank_passbook"]:
+        return get_bank_statement_prompt()
+    if doc_type == "cml_copy":
+        return get_cml_copy_prompt()
+    return "Extract all text and relevant information from this document. Return as JSON."
+
+
+async def emergent_vision_extractor(image_base64: str, prompt: str, system_message: str) -> str:
+    """Default extractor: GPT-4o vision through the Emergent LLM gateway"""
+    from emergentintegrations.llm.chat import LlmChat, UserMessage, ImageContent
+
+    chat = LlmChat(
+        api_key=EMERGENT_LLM_KEY,
+        session_id=f"ocr-{uuid.uuid4()}",
+        system_message=system_message
+    ).with_model("openai", "gpt-4o")
+
+    image_content = ImageContent(image_base64=image_base64)
+    return await chat.send_message(UserMessage(text=prompt, file_contents=[image_content]))
+
+
+_ocr_extractor: OcrExtractor = emergent_vision_extractor
+
+
+def set_ocr_extractor(extractor: Optional[OcrExtractor]) -> OcrExtractor:
     """
-    Process document OCR using AI vision model
-    
-    Args:
-        file_path: Path to the document file
-        doc_type: Type of document (pan_card, cancelled_cheque, cml_copy)
-        retry_count: Number of retry attempts for better accuracy
+    Replace the extraction step; None restores the LLM extractor.
+
+    Returns the previous extractor so callers (tests) can put it back.
     """
+    global _ocr_extractor
+    previous = _ocr_extractor
+    _ocr_extractor = extractor or emergent_vision_extractor
+    return previous
+
+
+def parse_ocr_response(response: str, doc_type: str) -> Tuple[Dict[str, Any], int]:
+    """Parse the raw model response and validate it for the document type"""
+    try:
+        # Clean response - remove markdown code blocks if present
+        cleaned = response.strip()
+
+        # Remove markdown code blocks
+        if cleaned.startswith('```'):
+            lines = cleaned.split('\n')
+            lines = lines[1:]
+            if lines and lines[-1].strip() == '```':
+                lines = lines[:-1]
+            cleaned = '\n'.join(lines).strip()
+
+        # Handle case where it starts with 'json' without backticks
+        if cleaned.lower().startswith('json'):
+            cleaned = cleaned[4:].strip()
+
+        # Find JSON object in the response
+        if not cleaned.startswith('{'):
+            start_idx = cleaned.find('{')
+            end_idx = cleaned.rfind('}')
+            if start_idx != -1 and end_idx != -1:
+                cleaned = cleaned[start_idx:end_idx+1]
+
+        extracted_data = json.loads(cleaned)
+        logger.info(f"OCR extracted data for {doc_type}: {extracted_data}")
+    except json.JSONDecodeError as e:
+        logger.warning(f"Failed to parse OCR JSON response: {e}. Raw: {response[:500]}")
+        return {"raw_text": response, "parse_error": str(e)}, 0
+
+    # Post-processing and validation based on document type
+    if doc_type == "pan_card":
+        return post_process_pan_card(extracted_data)
+    if doc_type == "cancelled_cheque":
+        return post_process_cancelled_cheque(extracted_data)
+    if doc_type in ["bank_statement", "passbook", "bank_passbook"]:
+        return post_process_bank_statement(extracted_data)
+    if doc_type == "cml_copy":
+        return post_process_cml(extracted_data)
+    return extracted_data, 70
+
+
+def _ocr_error(doc_type: str, error: str) -> Dict[str, Any]:
+    return {
+        "processed_at": datetime.now(timezone.utc).isoformat(),
+        "doc_type": doc_type,
+        "status": "error",
+        "error": error,
+        "extracted_data": {},
+        "confidence": 0
+    }
+
+
+# ---------------------------------------------------------------------------
+# Result cache (db.ocr_cache)
+# ---------------------------------------------------------------------------
+
+def ocr_cache_key(content: bytes, doc_type: str) -> str:
+    """SHA-256 of the file bytes + doc type (+ prompt version)"""
+    return f"{hashlib.sha256(content).hexdigest()}:{doc_type}:v{OCR_CACHE_VERSION}"
+
+
+async def _cache_get(key: str) -> Optional[Dict[str, Any]]:
+    from database import db
+    entry = await db.ocr_cache.find_one(
+        {"key": key, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+        {"_id": 0, "result": 1}
+    )
+    return entry["result"] if entry else None
+
+
+async def _cache_put(key: str, doc_type: str, result: Dict[str, Any]):
+    from database import db
+    now = datetime.now(timezone.utc)
+    await db.ocr_cache.update_one(
+        {"key": key},
+        {"$set": {
+            "key": key,
+            "doc_type": doc_type,
+            "result": result,
+            "created_at": now,
+            "expires_at": now + timedelta(hours=OCR_CACHE_TTL_HOURS)
+        }},
+        upsert=True
+    )
+
+
+def _is_cacheable(result: Dict[str, Any]) -> bool:
+    # Errors and unparseable responses are retried next time instead of being pinned
+    return result.get("status") == "processed" and (result.get("confidence") or 0) > 0
+
+
+# ---------------------------------------------------------------------------
+# Job pipeline
+# ---------------------------------------------------------------------------
+
+_ocr_semaphore: Optional[asyncio.Semaphore] = None
+_inflight: Dict[str, asyncio.Future] = {}
+_ocr_stats = {
+    "active": 0,
+    "waiting": 0,
+    "completed": 0,
+    "errors": 0,
+    "cache_hits": 0,
+    "deduplicated": 0
+}
+
+
+def _get_ocr_semaphore() -> asyncio.Semaphore:
+    global _ocr_semaphore
+    if _ocr_semaphore is None:
+        _ocr_semaphore = asyncio.Semaphore(max(1, OCR_MAX_CONCURRENCY))
+    return _ocr_semaphore
+
+
+async def _run_ocr(content: bytes, doc_type: str, file_ext: str, retry_count: int) -> Dict[str, Any]:
+    """Rasterize + extract + validate one document, holding an OCR slot"""
+    semaphore = _get_ocr_semaphore()
+    _ocr_stats["waiting"] += 1
     try:
-        from emergentintegrations.llm.chat import LlmChat, UserMessage, ImageContent
-        
-        # Convert file to base64
-        image_base64, error = await convert_file_to_base64(file_path)
+        await semaphore.acquire()
+    finally:
+        _ocr_stats["waiting"] -= 1
+
+    _ocr_stats["active"] += 1
+    try:
+        image_base64, error = await convert_bytes_to_base64(content, file_ext)
         if error:
-            return {
-                "processed_at": datetime.now(timezone.utc).isoformat(),
-                "doc_type": doc_type,
-                "status": "error",
-                "error": error,
-                "extracted_data": {},
-                "confidence": 0
-            }
-        
-        # Get appropriate prompt based on document type
-        if doc_type == "pan_card":
-            prompt = get_pan_card_prompt()
-        elif doc_type == "cancelled_cheque":
-            prompt = get_cancelled_cheque_prompt()
-        elif doc_type in ["bank_statement", "passbook", "bank_passbook"]:
-            prompt = get_bank_statement_prompt()
-        elif doc_type == "cml_copy":
-            prompt = get_cml_copy_prompt()
-        else:
-            prompt = "Extract all text and relevant information from this document. Return as JSON."
-        
-        # Use AI for OCR with higher quality model
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id=f"ocr-{uuid.uuid4()}",
-            system_message="You are an expert OCR specialist for Indian financial documents. Extract information with extreme accuracy. CRITICAL: Always respond with ONLY valid JSON, no explanations, no markdown code blocks, just the raw JSON object."
-        ).with_model("openai", "gpt-4o")
-        
-        # Create ImageContent for vision processing
-        image_content = ImageContent(image_base64=image_base64)
-        user_message = UserMessage(text=prompt, file_contents=[image_content])
-        
-        response = await chat.send_message(user_message)
-        
-        # Parse the response as JSON
-        import json
-        extracted_data = {}
-        confidence = 0
-        
-        try:
-            # Clean response - remove markdown code blocks if present
-            cleaned = response.strip()
-            
-            # Remove markdown code blocks
-            if cleaned.startswith('```'):
-                lines = cleaned.split('\n')
-                lines = lines[1:]
-                if lines and lines[-1].strip() == '```':
-                    lines = lines[:-1]
-                cleaned = '\n'.join(lines).strip()
-            
-            # Handle case where it starts with 'json' without backticks
-            if cleaned.lower().startswith('json'):
-                cleaned = cleaned[4:].strip()
-            
-            # Find JSON object in the response
-            if not cleaned.startswith('{'):
-                start_idx = cleaned.find('{')
-                end_idx = cleaned.rfind('}')
-                if start_idx != -1 and end_idx != -1:
-                    cleaned = cleaned[start_idx:end_idx+1]
-            
-            extracted_data = json.loads(cleaned)
-            logger.info(f"OCR extracted data for {doc_type}: {extracted_data}")
-            
-            # Post-processing and validation based on document type
-            if doc_type == "pan_card":
-                extracted_data, confidence = post_process_pan_card(extracted_data)
-            elif doc_type == "cancelled_cheque":
-                extracted_data, confidence = post_process_cancelled_cheque(extracted_data)
-            elif doc_type in ["bank_statement", "passbook", "bank_passbook"]:
-                extracted_data, confidence = post_process_bank_statement(extracted_data)
-            elif doc_type == "cml_copy":
-                extracted_data, confidence = post_process_cml(extracted_data)
-            else:
-                confidence = 70
-                
-        except json.JSONDecodeError as e:
-            logger.warning(f"Failed to parse OCR JSON response: {e}. Raw: {response[:500]}")
-            extracted_data = {"raw_text": response, "parse_error": str(e)}
-            confidence = 0
-        
+            return _ocr_error(doc_type, error)
+
+        response = await _ocr_extractor(image_base64, get_ocr_prompt(doc_type), OCR_SYSTEM_MESSAGE)
+        extracted_data, confidence = parse_ocr_response(response, doc_type)
+
         return {
             "processed_at": datetime.now(timezone.utc).isoformat(),
             "doc_type": doc_type,
@@ -503,17 +637,106 @@ async def process_document_ocr(file_path: str, doc_type: str, retry_count: int =
             "confidence": confidence,
             "retry_count": retry_count
         }
-        
     except Exception as e:
         logger.error(f"OCR processing failed: {str(e)}")
-        return {
-            "processed_at": datetime.now(timezone.utc).isoformat(),
-            "doc_type": doc_type,
-            "status": "error",
-            "error": str(e),
-            "extracted_data": {},
-            "confidence": 0
-        }
+        return _ocr_error(doc_type, str(e))
+    finally:
+        _ocr_stats["active"] -= 1
+        semaphore.release()
+
+
+async def ocr_document_bytes(content: bytes, doc_type: str, file_ext: str,
+                             retry_count: int = 0, use_cache: bool = True) -> Dict[str, Any]:
+    """
+    OCR a document held in memory
+
+    Args:
+        content: Raw file bytes
+        doc_type: Type of document (pan_card, cancelled_cheque, cml_copy)
+        file_ext: File extension, used to detect PDFs
+        retry_count: Number of retry attempts for better accuracy
+        use_cache: Reuse a cached result for identical bytes; False forces a
+            fresh run (explicit rerun) and refreshes the cache
+    """
+    key = ocr_cache_key(content, doc_type)
+
+    if use_cache:
+        # Same bytes already being OCR'd (e.g. one file uploaded for two requests at once)
+        pending = _inflight.get(key)
+        if pending is not None:
+            _ocr_stats["deduplicated"] += 1
+            try:
+                return dict(await asyncio.shield(pending))
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # The first caller went away mid-run; do the work ourselves
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        cached = None
+        if use_cache:
+            try:
+                cached = await _cache_get(key)
+            except Exception as e:
+                logger.warning(f"OCR cache lookup failed: {e}")
+        if cached:
+            _ocr_stats["cache_hits"] += 1
+            result = {**cached, "cached": True}
+            future.set_result(result)
+            return result
+
+        result = await _run_ocr(content, doc_type, file_ext, retry_count)
+        if _is_cacheable(result):
+            try:
+                await _cache_put(key, doc_type, result)
+            except Exception as e:
+                logger.warning(f"OCR cache write failed: {e}")
+        _ocr_stats["completed" if result.get("status") == "processed" else "errors"] += 1
+        future.set_result(result)
+        return result
+    except BaseException:
+        if not future.done():
+            future.cancel()
+        raise
+    finally:
+        if _inflight.get(key) is future:
+            del _inflight[key]
+
+
+async def process_document_ocr(file_path: str, doc_type: str, retry_count: int = 0,
+                               use_cache: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    Process document OCR using AI vision model
+
+    Args:
+        file_path: Path to the document file
+        doc_type: Type of document (pan_card, cancelled_cheque, cml_copy)
+        retry_count: Number of retry attempts for better accuracy
+        use_cache: Reuse a cached result for identical file bytes
+    """
+    try:
+        async with aiofiles.open(file_path, 'rb') as f:
+            content = await f.read()
+    except Exception as e:
+        return _ocr_error(doc_type, f"Failed to read file: {str(e)}")
+    return await ocr_document_bytes(content, doc_type, file_path.split('.')[-1], retry_count, use_cache)
+
+
+def get_ocr_pipeline_stats() -> Dict[str, Any]:
+    """Queue, cache and rasterization counters for the health check"""
+    return {
+        **_ocr_stats,
+        "max_concurrency": OCR_MAX_CONCURRENCY,
+        "in_flight": len(_inflight),
+        "raster_pool": raster_pool.stats()
+    }
+
+
+def shutdown_ocr_pipeline():
+    """Stop the rasterization workers"""
+    raster_pool.shutdown()
 
 
 def post_process_pan_card(data: Dict[str, Any]) -> tuple:
@@ -759,27 +982,28 @@ def post_process_cml(data: Dict[str, Any]) -> tuple:
 async def rerun_ocr_for_client(client_id: str, doc_types: List[str] = None) -> Dict[str, Any]:
     """
     Rerun OCR for a client's documents
-    
+
+    Documents are OCR'd concurrently (bounded by OCR_MAX_CONCURRENCY) and the
+    cache is bypassed, since a rerun is an explicit request for a fresh read.
+
     Args:
         client_id: The client ID
         doc_types: List of document types to rerun OCR for (if None, rerun all)
-    
+
     Returns:
         Dictionary with rerun results
     """
     from database import db
     from services.file_storage import get_file_from_gridfs
-    import tempfile
-    import os
-    
+
     client = await db.clients.find_one({"id": client_id}, {"_id": 0})
     if not client:
         return {"status": "error", "error": "Client not found"}
-    
+
     documents = client.get('documents', [])
     if not documents:
         return {"status": "error", "error": "No documents found for client"}
-    
+
     results = {
         "client_id": client_id,
         "client_name": client.get('name'),
@@ -788,56 +1012,46 @@ async def rerun_ocr_for_client(client_id: str, doc_types: List[str] = None) -> D
         "extracted_data": {},
         "errors": []
     }
-    
+
     # Filter documents by type if specified
     if doc_types:
         documents = [d for d in documents if d.get('doc_type') in doc_types]
-    
-    for doc in documents:
+
+    async def rerun(doc: Dict[str, Any]):
         doc_type = doc.get('doc_type')
         file_id = doc.get('file_id')
-        
+
         if not file_id:
-            results['errors'].append(f"No file_id for {doc_type}")
-            continue
-        
+            return doc_type, None, f"No file_id for {doc_type}"
+
         try:
-            # Get file from GridFS
             file_data = await get_file_from_gridfs(file_id)
             if not file_data:
-                results['errors'].append(f"Could not retrieve file for {doc_type}")
-                continue
-            
-            # Save to temp file
+                return doc_type, None, f"Could not retrieve file for {doc_type}"
+
             file_ext = doc.get('filename', 'file').split('.')[-1] or 'jpg'
-            with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{file_ext}') as tmp:
-                tmp.write(file_data)
-                tmp_path = tmp.name
-            
-            try:
-                # Run OCR
-                ocr_result = await process_document_ocr(tmp_path, doc_type, retry_count=1)
-                
-                results['documents_processed'].append({
-                    "doc_type": doc_type,
-                    "status": ocr_result.get('status'),
-                    "confidence": ocr_result.get('confidence', 0)
-                })
-                
-                if ocr_result.get('status') == 'processed':
-                    results['extracted_data'][doc_type] = ocr_result.get('extracted_data', {})
-                else:
-                    results['errors'].append(f"OCR failed for {doc_type}: {ocr_result.get('error')}")
-                    
-            finally:
-                # Clean up temp file
-                if os.path.exists(tmp_path):
-                    os.unlink(tmp_path)
-                    
+            ocr_result = await ocr_document_bytes(file_data["content"], doc_type, file_ext, retry_count=1, use_cache=False)
+            return doc_type, ocr_result, None
         except Exception as e:
             logger.error(f"Error processing {doc_type}: {e}")
-            results['errors'].append(f"Error processing {doc_type}: {str(e)}")
-    
+            return doc_type, None, f"Error processing {doc_type}: {str(e)}"
+
+    for doc_type, ocr_result, error in await asyncio.gather(*[rerun(doc) for doc in documents]):
+        if error:
+            results['errors'].append(error)
+            continue
+
+        results['documents_processed'].append({
+            "doc_type": doc_type,
+            "status": ocr_result.get('status'),
+            "confidence": ocr_result.get('confidence', 0)
+        })
+
+        if ocr_result.get('status') == 'processed':
+            results['extracted_data'][doc_type] = ocr_result.get('extracted_data', {})
+        else:
+            results['errors'].append(f"OCR failed for {doc_type}: {ocr_result.get('error')}")
+
     results['status'] = 'completed' if results['documents_processed'] else 'failed'
     return results
 
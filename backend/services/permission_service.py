@@ -8,6 +8,7 @@ based on their assigned role and the permissions defined in the roles collection
 
 from typing import List, Set
 from database import db
+from services.auth_cache import role_cache, expanded_permission_cache
 import logging
 
 logger = logging.getLogger(__name__)
@@ -103,6 +104,20 @@ DEFAULT_ROLES = {
 }
 
 
+async def _get_role_doc(role_id: int) -> dict:
+    """
+    Get the stored role document ({"name", "permissions"}) for a role.
+    
+    Results (including "not in DB") are cached per process; role edits call
+    services.auth_cache.invalidate_role().
+    """
+    role = role_cache.get(role_id)
+    if role is None:
+        role = await db.roles.find_one({"id": role_id}, {"_id": 0, "name": 1, "permissions": 1}) or {}
+        role_cache.set(role_id, role)
+    return role
+
+
 async def get_role_permissions(role_id: int) -> List[str]:
     """
     Get permissions for a role from database or fallback to defaults.
@@ -113,8 +128,8 @@ async def get_role_permissions(role_id: int) -> List[str]:
     Returns:
         List of permission strings
     """
-    # Try to get from database first
-    role = await db.roles.find_one({"id": role_id}, {"_id": 0, "permissions": 1})
+    # Try to get from database first (through the per-process role cache)
+    role = await _get_role_doc(role_id)
     
     if role and "permissions" in role:
         return role["permissions"]
@@ -264,7 +279,7 @@ async def check_permission(user: dict, permission: str, action_name: str = "perf
 
 async def get_role_name(role_id: int) -> str:
     """Get the name of a role by ID."""
-    role = await db.roles.find_one({"id": role_id}, {"_id": 0, "name": 1})
+    role = await _get_role_doc(role_id)
     if role:
         return role.get("name", "Unknown")
     return DEFAULT_ROLES.get(role_id, {}).get("name", "Unknown")
@@ -281,8 +296,12 @@ async def get_user_all_permissions(user: dict) -> Set[str]:
         Set of all permission strings the user has
     """
     role_id = user.get("role", 7)
-    raw_permissions = await get_role_permissions(role_id)
-    return expand_permissions(raw_permissions)
+    expanded = expanded_permission_cache.get(role_id)
+    if expanded is None:
+        raw_permissions = await get_role_permissions(role_id)
+        expanded = expand_permissions(raw_permissions)
+        expanded_permission_cache.set(role_id, expanded)
+    return expanded
 
 
 # Backward compatibility functions that check dynamic permissions
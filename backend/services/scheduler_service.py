@@ -5,6 +5,7 @@ Handles scheduled jobs like day-end reports at 6 PM IST
 from datetime import datetime
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 import pytz
 
 # IST timezone
@@ -166,6 +167,147 @@ async def check_license_expiry():
         return {"error": str(e)}
 
 
+async def run_inventory_reconciliation():
+    """
+    Job function to verify the inventory ledger against a full recompute.
+    Runs every 30 minutes; drifted stocks are rebuilt from purchases and bookings.
+    """
+    from services.inventory_service import reconcile_inventory
+    from database import db
+    
+    print(f"[{datetime.now(IST)}] Starting inventory reconciliation job...")
+    
+    try:
+        summary = await reconcile_inventory(repair=True)
+        result = {key: summary[key] for key in ("checked", "skipped_in_flight", "drifted", "repaired")}
+        print(f"[{datetime.now(IST)}] Inventory reconciliation completed: {result}")
+    
+        # Log job execution
+        await db.scheduled_job_runs.insert_one({
+            "job_name": "inventory_reconciliation",
+            "status": "success",
+            "result": result,
+            "drift": summary["drift"][:50],
+            "executed_at": datetime.now(IST).isoformat(),
+            "executed_at_utc": datetime.utcnow().isoformat()
+        })
+    
+        return result
+    
+    except Exception as e:
+        print(f"[{datetime.now(IST)}] Inventory reconciliation failed: {e}")
+    
+        # Log job failure
+        try:
+            await db.scheduled_job_runs.insert_one({
+                "job_name": "inventory_reconciliation",
+                "status": "failed",
+                "error": str(e),
+                "executed_at": datetime.now(IST).isoformat(),
+                "executed_at_utc": datetime.utcnow().isoformat()
+            })
+        except Exception:
+            pass
+    
+        return {"error": str(e)}
+
+
+async def run_dashboard_rollup_rebuild():
+    """
+    Job function to rebuild the dashboard rollups from bookings and purchases.
+    Runs nightly to clear floating-point drift and any missed incremental update.
+    """
+    from services.dashboard_rollups import rebuild_rollups
+    from database import db
+    
+    print(f"[{datetime.now(IST)}] Starting dashboard rollup rebuild...")
+    
+    try:
+        result = await rebuild_rollups()
+        print(f"[{datetime.now(IST)}] Dashboard rollup rebuild completed: {result}")
+    
+        await db.scheduled_job_runs.insert_one({
+            "job_name": "dashboard_rollup_rebuild",
+            "status": "success",
+            "result": result,
+            "executed_at": datetime.now(IST).isoformat(),
+            "executed_at_utc": datetime.utcnow().isoformat()
+        })
+    
+        return result
+    
+    except Exception as e:
+        print(f"[{datetime.now(IST)}] Dashboard rollup rebuild failed: {e}")
+    
+        try:
+            await db.scheduled_job_runs.insert_one({
+                "job_name": "dashboard_rollup_rebuild",
+                "status": "failed",
+                "error": str(e),
+                "executed_at": datetime.now(IST).isoformat(),
+                "executed_at_utc": datetime.utcnow().isoformat()
+            })
+        except Exception:
+            pass
+    
+        return {"error": str(e)}
+
+
+async def run_hierarchy_closure_check():
+    """
+    Job function to verify the org-hierarchy closure against users.reports_to
+    and repair any drift (e.g. from concurrent reassignments).
+    """
+    from services.hierarchy_service import check_hierarchy_closure
+    from database import db
+    
+    try:
+        result = await check_hierarchy_closure(repair=True)
+        if result["repaired"]:
+            print(f"[{datetime.now(IST)}] Hierarchy closure repaired: {result}")
+    
+        await db.scheduled_job_runs.insert_one({
+            "job_name": "hierarchy_closure_check",
+            "status": "success",
+            "result": result,
+            "executed_at": datetime.now(IST).isoformat(),
+            "executed_at_utc": datetime.utcnow().isoformat()
+        })
+    
+        return result
+    
+    except Exception as e:
+        print(f"[{datetime.now(IST)}] Hierarchy closure check failed: {e}")
+        return {"error": str(e)}
+
+
+async def run_search_index_rebuild():
+    """
+    Job function to rebuild the search index, picking up documents written
+    by paths that do not refresh it and dropping entries of deleted documents.
+    """
+    from services.search_index import rebuild_search_index
+    from database import db
+    
+    try:
+        result = await rebuild_search_index()
+        print(f"[{datetime.now(IST)}] Search index rebuilt: {result}")
+    
+        await db.scheduled_job_runs.insert_one({
+            "job_name": "search_index_rebuild",
+            "status": "success",
+            "result": result,
+            "executed_at": datetime.now(IST).isoformat(),
+            "executed_at_utc": datetime.utcnow().isoformat()
+        })
+    
+        return result
+    
+    except Exception as e:
+        print(f"[{datetime.now(IST)}] Search index rebuild failed: {e}")
+        return {"error": str(e)}
+
+
 def init_scheduler():
     """Initialize and start the scheduler"""
     global scheduler
@@ -207,6 +349,50 @@ def init_scheduler():
         misfire_grace_time=3600  # 1 hour grace period if missed
     )
     
+    # Verify the inventory ledger against a full recompute every 30 minutes
+    scheduler.add_job(
+        run_inventory_reconciliation,
+        trigger=IntervalTrigger(minutes=30, timezone=IST),
+        id='inventory_reconciliation',
+        name='Inventory Ledger Reconciliation',
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True
+    )
+    
+    # Rebuild dashboard rollups nightly at 2:30 AM IST
+    scheduler.add_job(
+        run_dashboard_rollup_rebuild,
+        trigger=CronTrigger(hour=2, minute=30, timezone=IST),
+        id='dashboard_rollup_rebuild',
+        name='Dashboard Rollup Rebuild',
+        replace_existing=True,
+        max_instances=1,
+        misfire_grace_time=3600
+    )
+    
+    # Verify the org-hierarchy closure nightly at 2:45 AM IST
+    scheduler.add_job(
+        run_hierarchy_closure_check,
+        trigger=CronTrigger(hour=2, minute=45, timezone=IST),
+        id='hierarchy_closure_check',
+        name='Hierarchy Closure Check',
+        replace_existing=True,
+        max_instances=1,
+        misfire_grace_time=3600
+    )
+    
+    # Rebuild the search index nightly at 3:00 AM IST
+    scheduler.add_job(
+        run_search_index_rebuild,
+        trigger=CronTrigger(hour=3, minute=0, timezone=IST),
+        id='search_index_rebuild',
+        name='Search Index Rebuild',
+        replace_existing=True,
+        max_instances=1,
+        misfire_grace_time=3600
+    )
+    
     # Start the scheduler
     scheduler.start()
     
@@ -214,6 +400,10 @@ def init_scheduler():
     print("Day-end reports scheduled for 6:00 PM IST daily")
     print("WhatsApp automations scheduled for 10:00 AM IST daily")
     print("License expiry check scheduled for 12:05 AM IST daily")
+    print("Inventory reconciliation scheduled every 30 minutes")
+    print("Dashboard rollup rebuild scheduled for 2:30 AM IST daily")
+    print("Hierarchy closure check scheduled for 2:45 AM IST daily")
+    print("Search index rebuild scheduled for 3:00 AM IST daily")
     
     # Print next run times
     for job in scheduler.get_jobs():
@@ -0,0 +1,216 @@
+"""
+Search Index Service
+Indexed substring search for clients, stocks, bookings and FI instruments.
+
+The list endpoints search with an unanchored, case-insensitive regex, which
+MongoDB can only answer with a collection scan. Instead, every searchable
+document gets one entry in db.search_index holding the lowercased bigrams and
+trigrams of its searchable fields (SEARCH_FIELDS). A search for "reli" becomes
+
+    search_index {collection: "stocks", keys: {$all: ["rel", "eli"]}}
+
+on the (collection, keys) multikey index, which yields a small candidate set of
+ids. The endpoint query then matches {"id": {"$in": candidates}} together with
+the original regex, so results are exactly what the regex alone returned and
+the existing visibility and demo filters still apply.
+
+The plain regex is used when the index cannot help: one-character searches,
+searches containing regex metacharacters, fields that are not indexed, a
+collection whose index has not been built yet, or more than
+SEARCH_INDEX_MAX_CANDIDATES candidates (a non-selective search scans anyway).
+
+Entries are refreshed by the write paths (refresh_search_index) and rebuilt
+from scratch on first start and nightly (rebuild_search_index), which also
+repairs entries missed by writers that bypass the hooks.
+
+Configuration (environment):
+    SEARCH_INDEX_ENABLED            - set to "false" to always search with regex (default true)
+    SEARCH_INDEX_MAX_CANDIDATES     - candidate ids above which the regex is used (default 5000)
+"""
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+from pymongo import DeleteOne, ReplaceOne
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+SEARCH_INDEX_ENABLED = os.environ.get("SEARCH_INDEX_ENABLED", "true").lower() != "false"
+SEARCH_INDEX_MAX_CANDIDATES = int(os.environ.get("SEARCH_INDEX_MAX_CANDIDATES", "5000"))
+
+# collection -> fields whose substrings are searchable
+SEARCH_FIELDS: Dict[str, tuple] = {
+    "clients": ("name", "pan_number", "email", "phone", "otc_ucc"),
+    "stocks": ("symbol", "name", "isin_number", "sector"),
+    "bookings": ("booking_number", "created_by_name"),
+    "fi_instruments": ("isin", "issuer_name"),
+}
+
+_REGEX_METACHARACTERS = set(".^$*+?{}[]\\|()")
+_BATCH_SIZE = 1000
+
+# Collections whose index is known to be complete in this process
+_built: Set[str] = set()
+
+
+# ============== Keys ==============
+
+def ngrams(value: str) -> Set[str]:
+    """Lowercased bigrams and trigrams of a field value (whole value if shorter)."""
+    text = str(value).lower()
+    if len(text) < 2:
+        return set()
+    grams = {text[i:i + 2] for i in range(len(text) - 1)}
+    grams.update(text[i:i + 3] for i in range(len(text) - 2))
+    return grams
+
+
+def search_keys(collection: str, doc: dict) -> List[str]:
+    """Index keys for a document: the n-grams of all its searchable fields."""
+    keys: Set[str] = set()
+    for field in SEARCH_FIELDS[collection]:
+        value = doc.get(field)
+        if value not in (None, ""):
+            keys |= ngrams(value)
+    return sorted(keys)
+
+
+def query_grams(search: str) -> Optional[List[str]]:
+    """
+    Keys every match of an unanchored search must carry, or None when the
+    index cannot answer the search (too short or a regex pattern).
+    """
+    text = search.lower()
+    if len(text) < 2 or _REGEX_METACHARACTERS.intersection(text):
+        return None
+    if len(text) <= 3:
+        return [text]
+    return sorted({text[i:i + 3] for i in range(len(text) - 2)})
+
+
+def regex_condition(search: str, fields: Sequence[str]) -> dict:
+    """The original case-insensitive substring filter over fields."""
+    search_regex = {"$regex": search, "$options": "i"}
+    return {"$or": [{field: search_regex} for field in fields]}
+
+
+def _entry(collection: str, doc: dict) -> dict:
+    return {
+        "_id": f"{collection}:{doc['id']}",
+        "collection": collection,
+        "doc_id": doc["id"],
+        "keys": search_keys(collection, doc),
+    }
+
+
+# ============== Queries ==============
+
+async def search_condition(collection: str, search: str, fields: Sequence[str]) -> dict:
+    """
+    Filter matching documents where any of fields contains search
+    (case-insensitive), narrowed through the search index when possible.
+    Combine it with the endpoint's own filters via $and.
+    """
+    condition = regex_condition(search, fields)
+    grams = query_grams(search)
+    if (
+        grams is None
+        or not SEARCH_INDEX_ENABLED
+        or collection not in _built
+        or not set(fields) <= set(SEARCH_FIELDS.get(collection, ()))
+    ):
+        return condition
+
+    entries = await db.search_index.find(
+        {"collection": collection, "keys": {"$all": grams}}, {"_id": 0, "doc_id": 1}
+    ).limit(SEARCH_INDEX_MAX_CANDIDATES + 1).to_list(None)
+    if len(entries) > SEARCH_INDEX_MAX_CANDIDATES:
+        return condition
+
+    return {"$and": [{"id": {"$in": [e["doc_id"] for e in entries]}}, condition]}
+
+
+async def search_ids(collection: str, search: str, fields: Sequence[str], limit: int = 1000) -> List[str]:
+    """IDs of documents matching the search (e.g. clients for a booking search)."""
+    condition = await search_condition(collection, search, fields)
+    docs = await db[collection].find(condition, {"_id": 0, "id": 1}).to_list(limit)
+    return [d["id"] for d in docs]
+
+
+def and_search(query: dict, condition: dict) -> dict:
+    """Add a search condition to an endpoint query without disturbing its keys."""
+    if not query:
+        return condition
+    if "$and" in query:
+        query["$and"].append(condition)
+        return query
+    return {"$and": [query, condition]}
+
+
+# ============== Maintenance ==============
+
+async def refresh_search_index(collection: str, ids: Iterable[str]):
+    """Re-index documents after they were created or their searchable fields changed."""
+    ids = [doc_id for doc_id in ids if doc_id]
+    if not ids or collection not in SEARCH_FIELDS:
+        return
+    try:
+        projection = {"_id": 0, "id": 1, **{field: 1 for field in SEARCH_FIELDS[collection]}}
+        docs = await db[collection].find({"id": {"$in": ids}}, projection).to_list(None)
+        found = {d["id"] for d in docs}
+        operations = [ReplaceOne({"_id": f"{collection}:{d['id']}"}, _entry(collection, d), upsert=True) for d in docs]
+        operations += [DeleteOne({"_id": f"{collection}:{doc_id}"}) for doc_id in ids if doc_id not in found]
+        await db.search_index.bulk_write(operations, ordered=False)
+    except Exception as e:
+        # The nightly rebuild repairs anything missed here
+        logger.warning(f"Search index refresh failed ({collection}): {e}")
+
+
+async def rebuild_search_index(collections: Optional[Iterable[str]] = None) -> dict:
+    """Re-index whole collections and drop entries of deleted documents."""
+    report = {}
+    for collection in list(collections or SEARCH_FIELDS):
+        projection = {"_id": 0, "id": 1, **{field: 1 for field in SEARCH_FIELDS[collection]}}
+        seen: Set[str] = set()
+        operations = []
+        async for doc in db[collection].find({"id": {"$exists": True}}, projection).batch_size(_BATCH_SIZE):
+            seen.add(doc["id"])
+            operations.append(ReplaceOne({"_id": f"{collection}:{doc['id']}"}, _entry(collection, doc), upsert=True))
+            if len(operations) >= _BATCH_SIZE:
+                await db.search_index.bulk_write(operations, ordered=False)
+                operations = []
+        if operations:
+            await db.search_index.bulk_write(operations, ordered=False)
+
+        stale = [
+            DeleteOne({"_id": entry["_id"]})
+            async for entry in db.search_index.find({"collection": collection}, {"_id": 1, "doc_id": 1})
+            if entry["doc_id"] not in seen
+        ]
+        for start in range(0, len(stale), _BATCH_SIZE):
+            await db.search_index.bulk_write(stale[start:start + _BATCH_SIZE], ordered=False)
+
+        await db.search_index_state.update_one(
+            {"_id": collection},
+            {"$set": {"documents": len(seen), "built_at": datetime.now(timezone.utc).isoformat()}},
+            upsert=True,
+        )
+        _built.add(collection)
+        report[collection] = {"documents": len(seen), "removed": len(stale)}
+    logger.info(f"Search index rebuilt: {report}")
+    return report
+
+
+async def ensure_search_index():
+    """Build the index for collections that were never indexed (e.g. first deploy)."""
+    try:
+        built = {state["_id"] async for state in db.search_index_state.find({}, {"_id": 1})}
+        _built.update(built & set(SEARCH_FIELDS))
+        missing = [collection for collection in SEARCH_FIELDS if collection not in built]
+        if missing:
+            await rebuild_search_index(missing)
+    except Exception as e:
+        logger.error(f"Search index backfill failed: {e}")
@@ -0,0 +1,217 @@
+"""
+Settings Cache Service
+Process-local copy of the small, rarely written system settings that are read
+on hot paths:
+
+- kill_switch     db.system_settings {"setting": "kill_switch"} (every API request)
+- smtp            db.smtp_settings (single document, SMTP config UI)
+- smtp_legacy     db.email_config {"_id": "smtp_config"}
+- company         db.company_master {"_id": "company_settings"}
+- whatsapp        db.system_config {"config_type": "whatsapp"}
+
+Reads are dictionary lookups. A background task in every API process keeps
+the copies fresh:
+
+- On a replica set it follows a MongoDB change stream on the settings
+  collections and reloads a setting as soon as its collection changes, so a
+  kill switch activation reaches every worker well within a second.
+- On a standalone server (no change streams) it falls back to reloading all
+  settings every SETTINGS_CACHE_POLL_SECONDS.
+
+Writers also call invalidate_setting() so the worker that handled the write
+reloads before its next read. If MongoDB is unreachable the last loaded value
+is kept; a setting that was never loaded reads as None (the kill switch fails
+open, as before).
+
+Configuration (environment):
+    SETTINGS_CACHE_POLL_SECONDS    - polling interval without change streams (default 1)
+    SETTINGS_CACHE_CHANGE_STREAM   - set to "false" to always poll (default true)
+"""
+import asyncio
+import copy
+import logging
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from pymongo.errors import OperationFailure
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+SETTINGS_CACHE_POLL_SECONDS = float(os.environ.get("SETTINGS_CACHE_POLL_SECONDS", "1"))
+SETTINGS_CACHE_CHANGE_STREAM = os.environ.get("SETTINGS_CACHE_CHANGE_STREAM", "true").lower() != "false"
+
+# setting name -> (collection, filter)
+SETTINGS_SOURCES: Dict[str, tuple] = {
+    "kill_switch": ("system_settings", {"setting": "kill_switch"}),
+    "smtp": ("smtp_settings", {}),
+    "smtp_legacy": ("email_config", {"_id": "smtp_config"}),
+    "company": ("company_master", {"_id": "company_settings"}),
+    "whatsapp": ("system_config", {"config_type": "whatsapp"}),
+}
+
+
+class SettingsCache:
+    """Cached settings documents keyed by setting name."""
+
+    def __init__(self, sources: Dict[str, tuple] = SETTINGS_SOURCES):
+        self.sources = sources
+        self._values: Dict[str, Optional[dict]] = {}
+        # Names whose cached value must be reloaded before the next read
+        self._stale: Set[str] = set(sources)
+        self.hits = 0
+        self.reloads = 0
+        self.errors = 0
+        self.mode = "idle"
+        self.last_refresh: Optional[float] = None
+
+    @property
+    def collections(self) -> List[str]:
+        return sorted({collection for collection, _ in self.sources.values()})
+
+    async def _fetch(self, name: str) -> Optional[dict]:
+        collection, query = self.sources[name]
+        doc = await db[collection].find_one(query)
+        if doc is not None:
+            doc.pop("_id", None)
+        return doc
+
+    async def reload(self, name: str):
+        """Load one setting from MongoDB; keeps the old value on failure."""
+        try:
+            self._values[name] = await self._fetch(name)
+            self._stale.discard(name)
+            self.reloads += 1
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Settings cache reload failed ({name}): {e}")
+
+    async def refresh(self, names: Optional[Iterable[str]] = None):
+        """Reload the given settings (default: all)."""
+        names = list(self.sources if names is None else names)
+        await asyncio.gather(*(self.reload(name) for name in names))
+        self.last_refresh = time.time()
+
+    def invalidate(self, *names: str):
+        """Mark settings stale (all when no names are given)."""
+        self._stale.update(names or self.sources)
+
+    def names_for_collection(self, collection: str) -> List[str]:
+        return [name for name, (coll, _) in self.sources.items() if coll == collection]
+
+    async def peek(self, name: str) -> Optional[dict]:
+        """
+        Cached document without copying - callers must not mutate it.
+        Only reaches MongoDB when the setting is stale.
+        """
+        if name in self._stale:
+            await self.reload(name)
+        self.hits += 1
+        return self._values.get(name)
+
+    async def get(self, name: str) -> Optional[dict]:
+        """Private copy of the cached document."""
+        return copy.deepcopy(await self.peek(name))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "settings": sorted(self.sources),
+            "loaded": sorted(name for name in self.sources if name in self._values),
+            "stale": sorted(self._stale),
+            "hits": self.hits,
+            "reloads": self.reloads,
+            "errors": self.errors,
+            "last_refresh": self.last_refresh,
+        }
+
+
+settings_cache = SettingsCache()
+
+
+async def get_setting(name: str) -> Optional[dict]:
+    """Cached copy of a settings document (see SETTINGS_SOURCES), or None."""
+    return await settings_cache.get(name)
+
+
+async def get_kill_switch() -> Optional[dict]:
+    """Cached kill switch document; read-only, checked on every API request."""
+    return await settings_cache.peek("kill_switch")
+
+
+def invalidate_setting(*names: str):
+    """Reload the named settings (all when none given) on this worker's next read."""
+    settings_cache.invalidate(*names)
+
+
+# ====================
+# Background refresh
+# ====================
+
+_refresh_task: Optional[asyncio.Task] = None
+
+
+async def _watch_changes():
+    """Follow a change stream on the settings collections until it fails."""
+    pipeline = [{"$match": {"ns.coll": {"$in": settings_cache.collections}}}]
+    async with db.watch(pipeline) as stream:
+        # Load after the stream is open so no write falls in between
+        await settings_cache.refresh()
+        settings_cache.mode = "change_stream"
+        async for change in stream:
+            if change.get("operationType") in ("drop", "dropDatabase", "rename", "invalidate"):
+                await settings_cache.refresh()
+                return
+            names = settings_cache.names_for_collection(change.get("ns", {}).get("coll", ""))
+            if names:
+                await settings_cache.refresh(names)
+
+
+async def _run_refresh():
+    use_change_stream = SETTINGS_CACHE_CHANGE_STREAM
+    while True:
+        if use_change_stream:
+            try:
+                await _watch_changes()
+                continue
+            except OperationFailure as e:
+                # Standalone servers do not support change streams
+                logger.info(f"Settings change stream unavailable ({e}); polling every {SETTINGS_CACHE_POLL_SECONDS}s")
+                use_change_stream = False
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Settings change stream interrupted: {e}")
+
+        settings_cache.mode = "poll"
+        await settings_cache.refresh()
+        await asyncio.sleep(SETTINGS_CACHE_POLL_SECONDS)
+
+
+def start_settings_cache():
+    global _refresh_task
+    if _refresh_task is None or _refresh_task.done():
+        _refresh_task = asyncio.create_task(_run_refresh())
+        logger.info("Settings cache refresh started")
+
+
+async def stop_settings_cache():
+    global _refresh_task
+    if _refresh_task is not None:
+        _refresh_task.cancel()
+        try:
+            await _refresh_task
+        except asyncio.CancelledError:
+            pass
+        _refresh_task = None
+    settings_cache.mode = "idle"
+
+
+def get_settings_cache_stats() -> Dict[str, Any]:
+    return {
+        "refresh_running": _refresh_task is not None and not _refresh_task.done(),
+        "poll_interval_seconds": SETTINGS_CACHE_POLL_SECONDS,
+        **settings_cache.stats(),
+    }
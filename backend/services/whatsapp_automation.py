@@ -9,6 +9,7 @@ import logging
 import asyncio
 
 from database import db
+from services.settings_cache import settings_cache
 from services.wati_service import WatiService
 
 logger = logging.getLogger(__name__)
@@ -26,7 +27,7 @@ AUTOMATION_TRIGGERS = {
 
 async def get_wati_service() -> Optional[WatiService]:
     """Get configured Wati service if available"""
-    config = await db.system_config.find_one({"config_type": "whatsapp"}, {"_id": 0})
+    config = await settings_cache.peek("whatsapp")
     if not config or not config.get("enabled") or config.get("status") != "connected":
         return None
     
@@ -0,0 +1,229 @@
+"""
+Analytics Aggregation - Unit Tests and 100k-Booking Benchmark
+=============================================================
+1. Cached chart payloads are served until a booking write invalidates them
+2. A payload computed across an invalidation is not cached; callers get copies
+3. The dashboard summary is one $facet over bookings with every chart branch
+4. Benchmark (opt-in): 100k synthetic bookings, pipelines match a Python reference
+
+The benchmark needs a MongoDB server and runs only when
+ANALYTICS_BENCHMARK_MONGO_URL is set, e.g.
+
+    ANALYTICS_BENCHMARK_MONGO_URL=mongodb://localhost:27017 \
+        pytest tests/test_analytics_aggregation.py -k benchmark -s
+
+It seeds a throwaway database and drops it afterwards.
+"""
+
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+pytest.importorskip("motor")
+
+import services.analytics_service as analytics
+from services.analytics_service import AnalyticsCache, cached_analytics, invalidate_analytics
+from utils.dates import ist_date, with_native_dates
+
+BENCHMARK_MONGO_URL = os.environ.get("ANALYTICS_BENCHMARK_MONGO_URL")
+BENCHMARK_BOOKINGS = 100_000
+
+USER = {"id": "user-1", "role": 1}
+
+
+class FakeCursor:
+    def __init__(self, result):
+        self.result = result
+
+    async def to_list(self, length):
+        return self.result
+
+
+class RecordingBookings:
+    """Captures aggregate() pipelines and returns an empty facet result"""
+
+    def __init__(self):
+        self.pipelines = []
+
+    def aggregate(self, pipeline):
+        self.pipelines.append(pipeline)
+        return FakeCursor([{}])
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(analytics, "analytics_cache", AnalyticsCache(ttl_seconds=60))
+    yield analytics.analytics_cache
+
+
+def synthetic_bookings(count, now, seed=42):
+    """Deterministic bookings spread over the last 60 days"""
+    rng = random.Random(seed)
+    bookings = []
+    for i in range(count):
+        created = now - timedelta(seconds=rng.randint(0, 60 * 86400))
+        bookings.append(with_native_dates("bookings", {
+            "id": f"bench-{i}",
+            "stock_id": f"stock-{rng.randint(0, 199)}",
+            "client_id": f"client-{rng.randint(0, 4999)}",
+            "created_by": f"user-{rng.randint(0, 49)}",
+            "quantity": rng.randint(1, 500),
+            "buying_price": round(rng.uniform(10, 500), 2),
+            "selling_price": round(rng.uniform(10, 550), 2),
+            "status": rng.choice(["open", "closed", "closed", "cancelled"]),
+            "approval_status": rng.choice(["approved", "approved", "approved", "pending"]),
+            "created_at": created.isoformat()
+        }))
+    return bookings
+
+
+def reference_stock_profit(bookings):
+    """The old Python loop: profit per stock over closed, approved bookings"""
+    stats = {}
+    for b in bookings:
+        if b["status"] != "closed" or b["approval_status"] != "approved":
+            continue
+        qty = b["quantity"]
+        stats[b["stock_id"]] = stats.get(b["stock_id"], 0) + (b["selling_price"] - b["buying_price"]) * qty
+    return stats
+
+
+class TestAnalyticsCache:
+    """Per-(chart, user, params) cache with write invalidation"""
+
+    def test_01_cached_until_invalidated(self, fresh_cache):
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            return {"total": len(calls)}
+
+        async def scenario():
+            first = await cached_analytics("summary", USER, ("2026-02-01", None), compute)
+            second = await cached_analytics("summary", USER, ("2026-02-01", None), compute)
+            other_range = await cached_analytics("summary", USER, ("2026-01-01", None), compute)
+            other_user = await cached_analytics("summary", {"id": "user-2"}, ("2026-02-01", None), compute)
+            invalidate_analytics()
+            after_write = await cached_analytics("summary", USER, ("2026-02-01", None), compute)
+            return first, second, other_range, other_user, after_write
+
+        first, second, other_range, other_user, after_write = asyncio.run(scenario())
+        assert first == second == {"total": 1}
+        assert other_range == {"total": 2} and other_user == {"total": 3}
+        assert after_write == {"total": 4}
+        assert fresh_cache.stats()["invalidations"] == 1
+        print("✓ Payload cached per user and range until a booking write")
+
+    def test_02_race_and_copies(self, fresh_cache):
+        async def racing_compute():
+            # A booking is written while the pipeline runs
+            invalidate_analytics()
+            return {"rows": [1, 2, 3]}
+
+        async def scenario():
+            return await cached_analytics("daily_trend", USER, (30,), racing_compute)
+
+        asyncio.run(scenario())
+        assert fresh_cache.stats()["size"] == 0
+
+        async def compute():
+            return {"rows": [1, 2, 3]}
+
+        async def mutate():
+            payload = await cached_analytics("daily_trend", USER, (30,), compute)
+            payload["rows"].clear()
+            return await cached_analytics("daily_trend", USER, (30,), compute)
+
+        assert asyncio.run(mutate()) == {"rows": [1, 2, 3]}
+        print("✓ Stale computations not cached; callers cannot mutate the cache")
+
+
+class TestAnalyticsPipelines:
+    """Pipeline shape (no MongoDB required)"""
+
+    def test_03_summary_single_facet(self, monkeypatch):
+        bookings = RecordingBookings()
+        clients = RecordingBookings()
+        monkeypatch.setattr(analytics, "db", type("FakeDb", (), {"bookings": bookings, "clients": clients})())
+
+        summary = asyncio.run(analytics.get_analytics_summary(days=14))
+
+        assert len(bookings.pipelines) == 1 and len(clients.pipelines) == 1
+        match, facet = bookings.pipelines[0]
+        assert match == {"$match": {"approval_status": "approved"}}
+        assert set(facet["$facet"]) == {"totals", "stocks", "employees", "sectors", "daily"}
+        assert set(clients.pipelines[0][-1]["$facet"]) == {"active", "daily", "growth"}
+        assert len(summary["daily_trend"]) == 15 and len(summary["client_growth"]) == 2
+        assert summary["total_bookings"] == 0 and summary["top_stocks"] == []
+
+        # Second call within the TTL is served from the cache
+        asyncio.run(analytics.get_analytics_summary(days=14))
+        assert len(bookings.pipelines) == 1
+        print("✓ Whole dashboard payload from one bookings $facet")
+
+
+@pytest.mark.skipif(not BENCHMARK_MONGO_URL, reason="ANALYTICS_BENCHMARK_MONGO_URL not set")
+class TestAnalyticsBenchmark:
+    """100k synthetic bookings against a real MongoDB"""
+
+    def test_04_benchmark(self, monkeypatch):
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        now = datetime.now(timezone.utc)
+        bookings = synthetic_bookings(BENCHMARK_BOOKINGS, now)
+        stocks = [{"id": f"stock-{i}", "symbol": f"STK{i}", "name": f"Stock {i}", "sector": f"Sector {i % 12}"}
+                  for i in range(200)]
+        users = [{"id": f"user-{i}", "name": f"User {i}", "role": 3 + i % 2} for i in range(50)]
+
+        async def scenario():
+            client = AsyncIOMotorClient(BENCHMARK_MONGO_URL)
+            bench_db = client[f"analytics_benchmark_{uuid.uuid4().hex[:8]}"]
+            monkeypatch.setattr(analytics, "db", bench_db)
+            try:
+                for start in range(0, len(bookings), 10_000):
+                    await bench_db.bookings.insert_many([dict(b) for b in bookings[start:start + 10_000]], ordered=False)
+                await bench_db.stocks.insert_many(stocks)
+                await bench_db.users.insert_many(users)
+                await bench_db.bookings.create_index([("created_at_dt", -1)])
+
+                timings = {}
+                started = time.perf_counter()
+                summary = await analytics.get_analytics_summary(days=30)
+                timings["summary"] = time.perf_counter() - started
+
+                started = time.perf_counter()
+                await analytics.get_analytics_summary(days=30)
+                timings["summary_cached"] = time.perf_counter() - started
+
+                started = time.perf_counter()
+                stock_rows = await analytics.get_stock_performance()
+                timings["stock_performance"] = time.perf_counter() - started
+                return summary, stock_rows, timings
+            finally:
+                await client.drop_database(bench_db.name)
+                client.close()
+
+        summary, stock_rows, timings = asyncio.run(scenario())
+
+        reference = reference_stock_profit(bookings)
+        assert len(stock_rows) == len(reference)
+        for row in stock_rows:
+            assert row["profit_loss"] == pytest.approx(round(reference[row["stock_id"]], 2), abs=0.05)
+        assert [r["stock_id"] for r in summary["top_stocks"]] == [r["stock_id"] for r in stock_rows[:10]]
+
+        closed = [b for b in bookings if b["status"] == "closed" and b["approval_status"] == "approved"]
+        assert summary["total_bookings"] == len(closed)
+        trend_days = {row["date"] for row in summary["daily_trend"]}
+        in_trend = [b for b in bookings if b["approval_status"] == "approved" and ist_date(b["created_at"]) in trend_days]
+        assert sum(row["bookings_count"] for row in summary["daily_trend"]) == len(in_trend)
+
+        assert timings["summary_cached"] < timings["summary"]
+        print(f"✓ {BENCHMARK_BOOKINGS} bookings: " + ", ".join(f"{k} {v * 1000:.1f} ms" for k, v in timings.items()))
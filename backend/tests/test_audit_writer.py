@@ -0,0 +1,137 @@
+"""
+Audit Log Writer - Unit Tests (in-memory collection, no MongoDB required)
+=========================================================================
+1. A full batch is written with one insert_many without waiting for the timer
+2. A partial batch is written once the flush window elapses
+3. stop() drains everything still buffered
+4. A failed flush keeps the entries; the retry treats already-written ones as done
+5. The buffer is bounded while Mongo is unavailable
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+pytest.importorskip("motor")
+
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+from services.audit_service import AuditLogWriter
+
+
+class FakeAuditCollection:
+    """Records insert_many batches; can fail the next N calls"""
+
+    def __init__(self):
+        self.batches = []
+        self.ids = set()
+        self.fail_next = 0
+        self.write_before_failing = False
+
+    async def insert_many(self, docs, ordered=True):
+        for doc in docs:
+            doc.setdefault("_id", f"oid-{doc['id']}")
+        if self.fail_next:
+            self.fail_next -= 1
+            if self.write_before_failing:
+                # Connection dropped after the server applied the write
+                self.ids.update(d["_id"] for d in docs)
+            raise AutoReconnect("connection reset")
+        duplicates = [{"index": i, "code": 11000} for i, d in enumerate(docs) if d["_id"] in self.ids]
+        self.ids.update(d["_id"] for d in docs)
+        self.batches.append([d["id"] for d in docs])
+        if duplicates:
+            raise BulkWriteError({"writeErrors": duplicates})
+
+
+def entry(i):
+    return {"id": f"audit-{i}", "action": "BOOKING_CREATE", "timestamp": f"2026-02-01T10:00:{i:02d}"}
+
+
+class TestAuditLogWriter:
+    """Size/time flushes, drain and retries"""
+
+    def test_01_full_batch_flushes_immediately(self):
+        collection = FakeAuditCollection()
+        writer = AuditLogWriter(collection, batch_size=5, flush_seconds=30)
+
+        async def scenario():
+            writer.start()
+            for i in range(5):
+                writer.write(entry(i))
+            await asyncio.sleep(0.05)
+            flushed = list(collection.batches)
+            await writer.stop()
+            return flushed
+
+        flushed = asyncio.run(scenario())
+        assert flushed == [[f"audit-{i}" for i in range(5)]]
+        print("✓ Full batch written with one insert_many")
+
+    def test_02_partial_batch_after_window(self):
+        collection = FakeAuditCollection()
+        writer = AuditLogWriter(collection, batch_size=100, flush_seconds=0.05)
+
+        async def scenario():
+            writer.start()
+            writer.write(entry(1))
+            writer.write(entry(2))
+            await asyncio.sleep(0.01)
+            before = len(collection.batches)
+            await asyncio.sleep(0.1)
+            after = list(collection.batches)
+            await writer.stop()
+            return before, after
+
+        before, after = asyncio.run(scenario())
+        assert before == 0
+        assert after == [["audit-1", "audit-2"]]
+        print("✓ Partial batch written after the flush window")
+
+    def test_03_stop_drains(self):
+        collection = FakeAuditCollection()
+        writer = AuditLogWriter(collection, batch_size=4, flush_seconds=30)
+
+        async def scenario():
+            writer.start()
+            for i in range(10):
+                writer.write(entry(i))
+            await writer.stop()
+
+        asyncio.run(scenario())
+        written = [i for batch in collection.batches for i in batch]
+        assert written == [f"audit-{i}" for i in range(10)]
+        assert writer.stats()["buffered"] == 0 and writer.written == 10
+        print("✓ Buffered entries drained on stop")
+
+    def test_04_retry_after_failure(self):
+        collection = FakeAuditCollection()
+        collection.fail_next = 1
+        collection.write_before_failing = True
+        writer = AuditLogWriter(collection, batch_size=10, flush_seconds=30)
+
+        async def scenario():
+            for i in range(3):
+                writer.write(entry(i))
+            first = await writer.flush()
+            second = await writer.flush()
+            return first, second
+
+        first, second = asyncio.run(scenario())
+        assert first == 0 and writer.failed_flushes == 1
+        # The retry hits duplicate keys only, so the batch counts as written once
+        assert second == 3 and writer.written == 3
+        assert writer.stats()["buffered"] == 0
+        print("✓ Failed flush retried without duplicating entries")
+
+    def test_05_bounded_buffer(self):
+        writer = AuditLogWriter(FakeAuditCollection(), batch_size=2, flush_seconds=30, max_buffer=5)
+        for i in range(8):
+            writer.write(entry(i))
+        assert writer.stats()["buffered"] == 5 and writer.dropped == 3
+        assert writer._buffer[0]["id"] == "audit-3"
+        print("✓ Oldest entries dropped once the buffer is full")
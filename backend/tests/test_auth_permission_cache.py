@@ -0,0 +1,134 @@
+"""
+Auth & Permission Cache Tests
+==============================
+Tests for the per-process user/role cache:
+1. Repeated authenticated requests are served from the user cache (hit counter grows)
+2. Role permission edits take effect immediately (role and permission caches are invalidated)
+3. User edits are visible on the next request (user cache is invalidated)
+"""
+
+import pytest
+import requests
+import os
+import time
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+# Test credentials
+PE_DESK_EMAIL = "pe@smifs.com"
+PE_DESK_PASSWORD = "Kutta@123"
+
+# Global token cache to avoid rate limiting
+_token_cache = {}
+
+
+def get_pe_token():
+    """Get PE Desk authentication token (cached to avoid rate limiting)"""
+    if 'pe_token' in _token_cache:
+        return _token_cache['pe_token']
+
+    time.sleep(1)
+    response = requests.post(f"{BASE_URL}/api/auth/login", json={
+        "email": PE_DESK_EMAIL,
+        "password": PE_DESK_PASSWORD
+    })
+    assert response.status_code == 200, f"PE Desk login failed: {response.text}"
+    _token_cache['pe_token'] = response.json()["token"]
+    return _token_cache['pe_token']
+
+
+def get_auth_cache_stats():
+    """Read auth cache counters from the health endpoint"""
+    response = requests.get(f"{BASE_URL}/api/health")
+    assert response.status_code == 200
+    return response.json().get("checks", {}).get("auth_cache")
+
+
+class TestAuthPermissionCache:
+    """Tests for user and role caching on the auth path"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.headers = {"Authorization": f"Bearer {get_pe_token()}"}
+
+    def test_01_warm_requests_hit_user_cache(self):
+        """Repeated requests with the same token should be cache hits"""
+        stats_before = get_auth_cache_stats()
+        if stats_before is None:
+            pytest.skip("Auth cache stats not exposed on this deployment")
+
+        for _ in range(5):
+            response = requests.get(f"{BASE_URL}/api/auth/me", headers=self.headers)
+            assert response.status_code == 200, f"/auth/me failed: {response.text}"
+
+        stats_after = get_auth_cache_stats()
+        assert stats_after["users"]["hits"] >= stats_before["users"]["hits"] + 4, \
+            "Expected warm requests to be served from the user cache"
+        print(f"✓ User cache hits: {stats_before['users']['hits']} -> {stats_after['users']['hits']}")
+
+    def test_02_role_edit_invalidates_permissions(self):
+        """Editing a role's permissions should take effect on the very next check"""
+        response = requests.get(f"{BASE_URL}/api/roles/4", headers=self.headers)
+        assert response.status_code == 200, f"Failed to get Viewer role: {response.text}"
+        original_permissions = response.json().get("permissions", [])
+
+        try:
+            marker = "research.ai"
+            updated = [p for p in original_permissions if p != marker] + [marker]
+            response = requests.put(
+                f"{BASE_URL}/api/roles/4",
+                json={"permissions": updated},
+                headers=self.headers
+            )
+            assert response.status_code == 200, f"Failed to update role: {response.text}"
+            assert marker in response.json().get("permissions", [])
+        finally:
+            requests.put(
+                f"{BASE_URL}/api/roles/4",
+                json={"permissions": original_permissions},
+                headers=self.headers
+            )
+
+        response = requests.get(f"{BASE_URL}/api/roles/4", headers=self.headers)
+        assert response.json().get("permissions", []) == original_permissions
+
+        # The caller's own role is cached by /auth/me and the permission check;
+        # saving it (description unchanged) must evict both cache entries
+        if get_auth_cache_stats() is None:
+            pytest.skip("Auth cache stats not exposed on this deployment")
+        assert requests.get(f"{BASE_URL}/api/auth/me", headers=self.headers).status_code == 200
+        response = requests.get(f"{BASE_URL}/api/roles/1", headers=self.headers)
+        assert response.status_code == 200, f"Failed to get PE Desk role: {response.text}"
+        warm = get_auth_cache_stats()
+        response = requests.put(
+            f"{BASE_URL}/api/roles/1",
+            json={"description": response.json().get("description")},
+            headers=self.headers
+        )
+        assert response.status_code == 200, f"Failed to save role: {response.text}"
+        stats_after = get_auth_cache_stats()
+        assert stats_after["roles"]["invalidations"] >= warm["roles"]["invalidations"] + 1, \
+            "Expected the role edit to evict the cached role"
+        assert stats_after["expanded_permissions"]["invalidations"] >= \
+            warm["expanded_permissions"]["invalidations"] + 1, \
+            "Expected the role edit to evict the cached permission set"
+        print("✓ Role permission edits are visible immediately and evict the permission cache")
+
+    def test_03_user_edit_visible_on_next_request(self):
+        """Accepting the user agreement should be reflected by /auth/me"""
+        response = requests.get(f"{BASE_URL}/api/auth/me", headers=self.headers)
+        assert response.status_code == 200
+        me = response.json()
+
+        # Touch the user via the agreement endpoint and re-read it
+        response = requests.post(f"{BASE_URL}/api/company-master/accept-agreement", headers=self.headers)
+        if response.status_code == 404:
+            pytest.skip("Agreement endpoint not available")
+        assert response.status_code == 200, f"Accept agreement failed: {response.text}"
+
+        response = requests.get(f"{BASE_URL}/api/auth/me", headers=self.headers)
+        assert response.status_code == 200
+        assert response.json().get("id") == me.get("id")
+        assert response.json().get("agreement_accepted") is True, \
+            "User cache should be invalidated after the agreement update"
+        print("✓ User edits are visible on the next request")
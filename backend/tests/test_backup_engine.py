@@ -0,0 +1,131 @@
+"""
+Streaming Backup Engine - Chunk Format Tests (no MongoDB required)
+==================================================================
+1. NDJSON chunks round-trip dates, ObjectIds and nested documents
+2. BSON chunks round-trip binary GridFS data and are gzip-compressed
+3. Disk chunk store writes atomically and reads back the same bytes
+4. Incremental query matches both ISO-string and native datetime timestamps
+5. Only append-only collections are backed up incrementally
+"""
+
+import asyncio
+import gzip
+import os
+import sys
+from datetime import datetime, timezone, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+pytest.importorskip("motor")
+
+from bson import Binary, ObjectId
+
+from services.backup_engine import (
+    ChunkStore, chunk_format, decode_chunk, encode_chunk, encode_document, _changed_since
+)
+import services.backup_engine as engine
+
+
+def sample_booking(i):
+    return {
+        "_id": ObjectId(),
+        "id": f"booking-{i}",
+        "booking_number": f"BK-{i:05d}",
+        "quantity": i * 10,
+        "selling_price": 125.5,
+        "created_at": datetime(2026, 1, 15, 10, 30, tzinfo=timezone.utc).isoformat(),
+        "approved_at": datetime(2026, 1, 16, 9, 0, tzinfo=timezone.utc),
+        "payments": [{"amount": 1000.0, "mode": "neft"}],
+    }
+
+
+class TestChunkEncoding:
+    """Chunk encode/decode"""
+
+    def test_01_ndjson_round_trip(self):
+        docs = [sample_booking(i) for i in range(50)]
+        fmt = chunk_format("bookings")
+        data = encode_chunk([encode_document(d, fmt) for d in docs])
+
+        assert fmt == "ndjson"
+        assert gzip.decompress(data).count(b"\n") == 50
+        decoded = decode_chunk(data, fmt)
+        assert len(decoded) == 50
+        assert decoded[0]["_id"] == docs[0]["_id"]
+        assert decoded[0]["approved_at"] == docs[0]["approved_at"]
+        assert decoded[7]["payments"] == docs[7]["payments"]
+        print("✓ NDJSON chunk round-trips ObjectId/datetime/nested fields")
+
+    def test_02_bson_round_trip(self):
+        files_id = ObjectId()
+        payload = os.urandom(1024) + b"\x00" * 64 * 1024
+        docs = [{"_id": ObjectId(), "files_id": files_id, "n": n, "data": Binary(payload)} for n in range(4)]
+        fmt = chunk_format("fs.chunks")
+        data = encode_chunk([encode_document(d, fmt) for d in docs])
+
+        assert fmt == "bson"
+        assert len(data) < len(payload) * 4
+        decoded = decode_chunk(data, fmt)
+        assert [d["n"] for d in decoded] == [0, 1, 2, 3]
+        assert all(bytes(d["data"]) == payload for d in decoded)
+        print(f"✓ BSON chunk round-trips binary data ({len(data)} bytes stored)")
+
+
+class TestChunkStore:
+    """Disk storage backend"""
+
+    def test_03_disk_store(self, tmp_path):
+        store = ChunkStore("disk", base_dir=str(tmp_path))
+        blob = encode_chunk([encode_document(sample_booking(1), "ndjson")])
+
+        async def scenario():
+            ref = await store.write("backup-1", "bookings.data.00000.ndjson.gz", blob)
+            assert await store.read(ref) == blob
+            await store.delete(ref)
+            return ref
+
+        ref = asyncio.run(scenario())
+        assert ref["storage"] == "disk"
+        assert not os.path.exists(ref["path"])
+        assert not os.path.exists(ref["path"] + ".tmp")
+        with pytest.raises(ValueError):
+            ChunkStore("s3")
+        print("✓ Disk chunk store write/read/delete")
+
+    def test_04_incremental_query(self):
+        since = datetime(2026, 2, 1, tzinfo=timezone.utc) - timedelta(seconds=120)
+        query = _changed_since(since)
+
+        clauses = query["$or"]
+        assert {"updated_at": {"$gte": since.isoformat()}} in clauses
+        assert {"updated_at": {"$gte": since}} in clauses
+        assert {"created_at": {"$gte": since.isoformat()}} in clauses
+        assert {"created_at": {"$gte": since}} in clauses
+        print("✓ Incremental filter covers string and native timestamps")
+
+    def test_05_incremental_only_for_append_only(self, monkeypatch):
+        class FakeCollection:
+            def __init__(self, untimestamped):
+                self.untimestamped = untimestamped
+
+            async def find_one(self, query, projection=None):
+                return {"_id": 1} if self.untimestamped else None
+
+        collections = {
+            "audit_logs": FakeCollection(False),
+            "security_logs": FakeCollection(True),
+            "bookings": FakeCollection(False),
+        }
+        monkeypatch.setattr(engine, "db", collections)
+        since = datetime(2026, 2, 1, tzinfo=timezone.utc)
+
+        async def modes():
+            return [(await engine._backup_query(name, since))[0] for name in collections] + [
+                (await engine._backup_query("audit_logs", None))[0]
+            ]
+
+        assert asyncio.run(modes()) == ["incremental", "full", "full", "full"]
+        assert "bookings" not in engine.INCREMENTAL_COLLECTIONS
+        print("✓ Collections updated in place are always copied in full")
@@ -0,0 +1,148 @@
+"""
+Batch Loader - Unit Tests (no MongoDB required)
+===============================================
+1. Ids are deduplicated (None/empty dropped) into one $in query, chunked at MAX_IN_BATCH
+2. Cached and primed documents are not fetched again; projections are cached separately
+3. Missing keys are left out of the result and remembered as misses
+4. A failing query reaches every waiter and nothing is cached, so a retry queries again
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+pytest.importorskip("motor")
+
+import services.batch_loader as batch_loader
+from services.batch_loader import BatchLoader
+
+
+class FakeCursor:
+    def __init__(self, collection, docs):
+        self.collection = collection
+        self.docs = docs
+
+    async def to_list(self, length):
+        await asyncio.sleep(0)
+        if self.collection.error is not None:
+            raise self.collection.error
+        return self.docs
+
+
+class FakeCollection:
+    def __init__(self, docs):
+        self.docs = docs
+        self.queries = []
+        self.error = None
+
+    def find(self, query, projection=None):
+        self.queries.append((query, projection))
+        ((key, condition),) = query.items()
+        wanted = set(condition["$in"])
+        return FakeCursor(self, [dict(d) for d in self.docs if d.get(key) in wanted])
+
+
+class FakeDb:
+    def __init__(self, **collections):
+        self.collections = {name: FakeCollection(docs) for name, docs in collections.items()}
+
+    def __getitem__(self, name):
+        return self.collections[name]
+
+
+def clients(count):
+    return [{"id": f"c{i}", "name": f"Client {i}", "pan_number": f"PAN{i}"} for i in range(count)]
+
+
+class TestBatching:
+    """One $in query per collection"""
+
+    def test_01_dedup_and_chunking(self, monkeypatch):
+        db = FakeDb(clients=clients(5))
+        loader = BatchLoader(database=db)
+
+        found = asyncio.run(loader.load_many("clients", ["c1", "c2", "c1", None, "", "c2", "c3"]))
+
+        (query, projection), = db["clients"].queries
+        assert query == {"id": {"$in": ["c1", "c2", "c3"]}}
+        assert projection == {"_id": 0}
+        assert sorted(found) == ["c1", "c2", "c3"] and loader.round_trips == 1
+
+        monkeypatch.setattr(batch_loader, "MAX_IN_BATCH", 2)
+        chunked = BatchLoader(database=db)
+        asyncio.run(chunked.load_many("clients", [f"c{i}" for i in range(5)]))
+        assert [q["id"]["$in"] for q, _ in db["clients"].queries[1:]] == [["c0", "c1"], ["c2", "c3"], ["c4"]]
+        assert chunked.round_trips == 3
+        print("✓ Duplicate and empty ids collapse into one chunked $in query")
+
+    def test_02_cache_prime_and_projection(self):
+        db = FakeDb(clients=clients(3))
+        loader = BatchLoader(database=db)
+
+        async def scenario():
+            await loader.load_many("clients", ["c0", "c1"])
+            again = await loader.load_many("clients", ["c1", "c0"])
+            single = await loader.load("clients", "c1")
+            loader.prime("clients", [{"id": "c9", "name": "Primed"}])
+            primed = await loader.load("clients", "c9")
+            narrow = await loader.load_many("clients", ["c0"], projection={"name": 1})
+            return again, single, primed, narrow
+
+        again, single, primed, narrow = asyncio.run(scenario())
+        assert sorted(again) == ["c0", "c1"] and single["name"] == "Client 1"
+        assert primed == {"id": "c9", "name": "Primed"}
+        assert len(db["clients"].queries) == 2 and loader.cache_hits == 4
+        # The key field is always projected so results map back to their ids
+        assert db["clients"].queries[1][1] == {"_id": 0, "name": 1, "id": 1}
+        assert narrow["c0"]["name"] == "Client 0"
+        print("✓ Cached and primed ids cost nothing; each projection is fetched once")
+
+
+class TestMissingKeys:
+    """Ids without a document"""
+
+    def test_03_missing_keys(self):
+        db = FakeDb(clients=clients(2))
+        loader = BatchLoader(database=db)
+
+        async def scenario():
+            found = await loader.load_many("clients", ["c0", "gone", "c1"])
+            single = await loader.load("clients", "gone")
+            empty = await loader.load("clients", None)
+            return found, single, empty
+
+        found, single, empty = asyncio.run(scenario())
+        assert sorted(found) == ["c0", "c1"]
+        assert single is None and empty is None
+        assert len(db["clients"].queries) == 1
+        print("✓ Missing ids are omitted and not queried again")
+
+
+class TestErrors:
+    """Query failures"""
+
+    def test_04_error_reaches_all_waiters(self):
+        db = FakeDb(clients=clients(3))
+        db["clients"].error = ConnectionError("mongo unavailable")
+        loader = BatchLoader(database=db)
+
+        async def scenario():
+            return await asyncio.gather(
+                loader.load("clients", "c0"),
+                loader.load_many("clients", ["c0", "c1"]),
+                loader.load("clients", "c2"),
+                return_exceptions=True
+            )
+
+        results = asyncio.run(scenario())
+        assert all(isinstance(r, ConnectionError) for r in results)
+
+        db["clients"].error = None
+        recovered = asyncio.run(loader.load_many("clients", ["c0", "c1", "c2"]))
+        assert sorted(recovered) == ["c0", "c1", "c2"]
+        assert loader.round_trips == 1
+        print("✓ Every waiter sees the failure; failed ids are retried, not cached as misses")
@@ -0,0 +1,159 @@
+"""
+Booking Event Outbox - Unit Tests (no MongoDB required)
+=======================================================
+1. Every booking event type has audit/notification channels registered
+2. A dispatch runs each undelivered channel once; delivered channels are skipped
+3. A failed channel is retried with backoff; the event fails after max attempts
+4. A fully delivered event is marked done and scheduled for TTL removal
+5. A batch only records outcomes on events its claim still holds
+"""
+
+import asyncio
+import os
+import sys
+from datetime import datetime, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+pytest.importorskip("motor")
+
+import services.booking_events as be
+from services.booking_events import (
+    BOOKING_APPROVED,
+    BOOKING_CREATED,
+    BOOKING_DP_TRANSFERRED,
+    BOOKING_PAYMENT_RECORDED,
+    BOOKING_REJECTED,
+    BOOKING_VOIDED,
+    dispatch_event,
+    event_handler,
+    pending_channels,
+    plan_event_update
+)
+
+TEST_EVENT = "booking.test_event"
+NOW = datetime(2026, 2, 1, 10, 0, tzinfo=timezone.utc)
+
+
+def make_event(**fields):
+    event = {
+        "id": "evt-1",
+        "event_type": TEST_EVENT,
+        "booking_id": "booking-1",
+        "booking": {"id": "booking-1", "client_id": "client-1", "stock_id": "stock-1"},
+        "actor": {"id": "user-1", "name": "PE Desk", "role": 1, "email": None},
+        "payload": {},
+        "channels": ["email", "whatsapp"],
+        "deliveries": {},
+        "attempts": 0
+    }
+    event.update(fields)
+    return event
+
+
+@pytest.fixture
+def test_handlers():
+    """Register stub handlers for a throwaway event type"""
+    calls = []
+    failing = set()
+
+    async def email(event, context):
+        calls.append("email")
+
+    async def whatsapp(event, context):
+        calls.append("whatsapp")
+        if "whatsapp" in failing:
+            raise RuntimeError("Wati timeout")
+
+    event_handler(TEST_EVENT, "email")(email)
+    event_handler(TEST_EVENT, "whatsapp")(whatsapp)
+    yield calls, failing
+    be._handlers.pop(TEST_EVENT, None)
+
+
+class TestBookingEvents:
+    """Channel fan-out, retries and idempotent re-delivery"""
+
+    def test_01_channels_registered(self):
+        assert set(be._handlers[BOOKING_CREATED]) == {"audit", "email", "whatsapp", "websocket", "email_roles"}
+        assert set(be._handlers[BOOKING_APPROVED]) == {"audit", "email", "email_payment_request", "websocket", "whatsapp"}
+        assert set(be._handlers[BOOKING_REJECTED]) == {"audit", "websocket", "whatsapp"}
+        assert set(be._handlers[BOOKING_VOIDED]) == {"audit", "email_refund", "email"}
+        assert set(be._handlers[BOOKING_PAYMENT_RECORDED]) == {"email_dp_ready", "email_roles"}
+        assert set(be._handlers[BOOKING_DP_TRANSFERRED]) == {"audit", "email", "email_roles"}
+        print("✓ Booking lifecycle events fan out to their channels")
+
+    def test_02_delivered_channels_skipped(self, test_handlers):
+        calls, _ = test_handlers
+
+        errors = asyncio.run(dispatch_event(make_event(), context=None))
+        assert errors == {"email": None, "whatsapp": None}
+        assert sorted(calls) == ["email", "whatsapp"]
+
+        calls.clear()
+        redelivery = make_event(deliveries={"email": "done"})
+        assert pending_channels(redelivery) == ["whatsapp"]
+        asyncio.run(dispatch_event(redelivery, context=None))
+        assert calls == ["whatsapp"]
+        print("✓ Re-dispatch only runs undelivered channels")
+
+    def test_03_retry_then_fail(self, test_handlers):
+        _, failing = test_handlers
+        failing.add("whatsapp")
+
+        event = make_event()
+        errors = asyncio.run(dispatch_event(event, context=None))
+        outcome, update = plan_event_update(event, errors, NOW)
+
+        assert outcome == "retry"
+        assert update["status"] == "pending"
+        assert update["deliveries.email"] == "done"
+        assert "deliveries.whatsapp" not in update
+        assert update["last_errors.whatsapp"] == "Wati timeout"
+        assert (update["next_attempt_at"] - NOW).total_seconds() == be.BOOKING_EVENTS_RETRY_BASE_SECONDS
+
+        second = make_event(attempts=1, deliveries={"email": "done"})
+        _, update = plan_event_update(second, {"whatsapp": "Wati timeout"}, NOW)
+        assert (update["next_attempt_at"] - NOW).total_seconds() == be.BOOKING_EVENTS_RETRY_BASE_SECONDS * 2
+
+        last = make_event(attempts=be.BOOKING_EVENTS_MAX_ATTEMPTS - 1)
+        outcome, update = plan_event_update(last, {"whatsapp": "Wati timeout"}, NOW)
+        assert outcome == "failed" and update["status"] == "failed" and "expires_at" in update
+        print("✓ Failed channel retried with backoff, then the event is failed")
+
+    def test_04_done(self):
+        outcome, update = plan_event_update(make_event(), {"email": None, "whatsapp": None}, NOW)
+        assert outcome == "done"
+        assert update["status"] == "done"
+        assert update["deliveries.email"] == update["deliveries.whatsapp"] == "done"
+        assert update["expires_at"] > NOW and update["claim_id"] is None
+        print("✓ Delivered event marked done with a TTL")
+
+    def test_05_outcome_written_under_claim(self, test_handlers, monkeypatch):
+        writes = []
+
+        class FakeEvents:
+            async def bulk_write(self, operations, ordered=True):
+                writes.extend(operations)
+
+        class FakeDb:
+            booking_events = FakeEvents()
+
+        async def claim():
+            return [make_event(claim_id="worker-1:abc")]
+
+        async def prefetch(self, events):
+            pass
+
+        monkeypatch.setattr(be, "db", FakeDb())
+        monkeypatch.setattr(be.BookingEventContext, "prefetch", prefetch)
+        dispatcher = be.BookingEventDispatcher()
+        monkeypatch.setattr(dispatcher, "_claim", claim)
+
+        assert asyncio.run(dispatcher.process_batch()) == 1
+        (op,) = writes
+        assert op._filter == {"id": "evt-1", "claim_id": "worker-1:abc"}
+        assert op._doc["$set"]["status"] == "done"
+        print("✓ Outcome only applied while the batch still holds the claim")
@@ -0,0 +1,142 @@
+"""
+Contract Note Render Pool - Unit Tests (no MongoDB required)
+============================================================
+1. The renderer produces client and vendor notes from plain dicts
+2. Paragraph and table styles are built once per process
+3. ContractNoteRenderPool renders in a worker process and bounds concurrency
+4. A render that exceeds the timeout raises ContractNoteRenderTimeout
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+pytest.importorskip("reportlab")
+pytest.importorskip("num2words")
+
+from services.contract_note_renderer import (
+    contract_note_styles,
+    contract_note_table_styles,
+    render_contract_note_pdf,
+    render_vendor_purchase_contract_note_pdf
+)
+
+COMPANY = {
+    "company_name": "SMIFS Management Services Limited",
+    "company_address": "14th Floor, Mahendra Chambers, 8A Royd Street, Kolkata - 700016",
+    "company_pan": "AAACS2814G",
+    "company_bank_name": "HDFC Bank",
+    "cdsl_dp_id": "12345678"
+}
+CLIENT = {"name": "Test Buyer Pvt Ltd", "pan_number": "ABCDE1234F", "address": "Mumbai", "dp_id": "IN300000"}
+STOCK = {"name": "Test Unlisted Co", "symbol": "TUC", "isin_number": "INE000T01010", "face_value": 10}
+BOOKING = {
+    "id": "booking-001",
+    "booking_number": "BK/25-26/0001",
+    "quantity": 1500,
+    "selling_price": 245.5,
+    "booking_date": "01-Feb-2026",
+    "stock_transfer_date": "03-Feb-2026"
+}
+
+
+def slow_render(seconds):
+    """Stand-in for a render that hangs"""
+    time.sleep(seconds)
+    return b"%PDF-late"
+
+
+class TestRenderer:
+    """Rendering from prefetched data"""
+
+    def test_01_client_and_vendor_notes(self):
+        pdf = render_contract_note_pdf(BOOKING, COMPANY, CLIENT, STOCK, "SMIFS/CN/25-26/0001")
+        assert pdf.startswith(b"%PDF") and len(pdf) > 1000
+
+        purchase = {
+            "id": "purchase-001",
+            "purchase_number": "PO/25-26/0001",
+            "purchase_contract_note_number": "SMIFS/PCN/25-26/0001",
+            "quantity": 800,
+            "price_per_share": 120.0,
+            "total_amount": 96000.0,
+            "total_paid": 96000.0,
+            "dp_type": "CDSL"
+        }
+        pdf = render_vendor_purchase_contract_note_pdf(purchase, COMPANY, {"name": "Vendor"}, STOCK, 96.0)
+        assert pdf.startswith(b"%PDF")
+
+        # Missing client/stock render as N/A instead of failing
+        assert render_contract_note_pdf(BOOKING, COMPANY, None, None, "SMIFS/CN/25-26/0002").startswith(b"%PDF")
+        print("✓ Client and vendor notes rendered from plain dicts")
+
+    def test_02_styles_cached_per_process(self):
+        render_contract_note_pdf(BOOKING, COMPANY, CLIENT, STOCK, "SMIFS/CN/25-26/0003")
+        styles = contract_note_styles()
+        table_styles = contract_note_table_styles()
+        render_contract_note_pdf(BOOKING, COMPANY, CLIENT, STOCK, "SMIFS/CN/25-26/0004")
+        assert contract_note_styles() is styles
+        assert contract_note_table_styles() is table_styles
+        assert contract_note_styles.cache_info().hits >= 2
+        print("✓ Styles built once and reused across notes")
+
+
+class TestRenderPool:
+    """Process pool with bounded concurrency"""
+
+    @pytest.fixture(autouse=True)
+    def _requires_motor(self):
+        pytest.importorskip("motor")
+
+    def test_03_renders_in_worker_process(self):
+        from services.contract_note_service import ContractNoteRenderPool
+
+        pool = ContractNoteRenderPool(workers=2, max_concurrency=2, timeout_seconds=120)
+
+        async def scenario():
+            peak = 0
+
+            async def one(i):
+                return await pool.run(render_contract_note_pdf, BOOKING, COMPANY, CLIENT, STOCK, f"SMIFS/CN/25-26/{i:04d}")
+
+            async def watch():
+                nonlocal peak
+                while True:
+                    peak = max(peak, pool.active)
+                    await asyncio.sleep(0.001)
+
+            watcher = asyncio.create_task(watch())
+            pdfs = await asyncio.gather(*[one(i) for i in range(8)])
+            watcher.cancel()
+            return pdfs, peak
+
+        try:
+            pdfs, peak = asyncio.run(scenario())
+        finally:
+            pool.shutdown()
+
+        assert len(pdfs) == 8 and all(p.startswith(b"%PDF") for p in pdfs)
+        assert 1 <= peak <= 2
+        assert pool.completed == 8 and pool.active == 0
+        print(f"✓ 8 notes rendered in worker processes (peak concurrency {peak})")
+
+    def test_04_timeout(self):
+        from services.contract_note_service import ContractNoteRenderPool, ContractNoteRenderTimeout
+
+        pool = ContractNoteRenderPool(workers=0, max_concurrency=1, timeout_seconds=0.2)
+
+        async def scenario():
+            with pytest.raises(ContractNoteRenderTimeout):
+                await pool.run(slow_render, 1.0)
+            # The slot is released once the hung render finishes
+            await asyncio.sleep(1.2)
+            return await pool.run(slow_render, 0)
+
+        assert asyncio.run(scenario()) == b"%PDF-late"
+        assert pool.timeouts == 1 and pool.active == 0
+        print("✓ Slow render times out and frees its slot when done")
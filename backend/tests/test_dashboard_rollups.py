@@ -0,0 +1,124 @@
+"""
+Dashboard Rollups - Contribution Tests (no MongoDB required)
+============================================================
+1. A booking contributes to all/employee/stock/day rollups in its demo or live partition
+2. Cancelled and voided bookings are counted but kept out of the live book values
+3. Contribution deltas telescope: old -> new -> deleted nets back to zero
+4. Source snapshots round-trip dotted metric names; sum_rollups reads dotted paths
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+pytest.importorskip("motor")
+
+from services.dashboard_rollups import (
+    booking_contribution, booking_metrics, contribution_delta, purchase_contribution,
+    sum_rollups, _decode_snapshot, _encode_snapshot, _rollup_identity
+)
+
+
+def sample_booking(**overrides):
+    booking = {
+        "id": "booking-1",
+        "created_by": "emp-1",
+        "stock_id": "stock-1",
+        "quantity": 100,
+        "buying_price": 50.0,
+        "selling_price": 60.0,
+        "status": "open",
+        "approval_status": "approved",
+        "payments": [{"amount": 2500.0}, {"amount": 500.0}],
+        "created_at": "2026-03-04T10:15:00+00:00",
+    }
+    booking.update(overrides)
+    return booking
+
+
+class TestContributions:
+    """Per-document contributions"""
+
+    def test_01_booking_keys_and_partition(self):
+        live = booking_contribution(sample_booking())
+        assert set(live) == {
+            "bookings:all:live",
+            "bookings:employee:emp-1:live",
+            "bookings:stock:stock-1:live",
+            "bookings:day:2026-03-04:live",
+        }
+        metrics = live["bookings:all:live"]
+        assert metrics["sell_value"] == 6000.0
+        assert metrics["profit_loss"] == 1000.0
+        assert metrics["received"] == 3000.0
+        assert metrics["by_status.open"] == 1
+
+        demo = booking_contribution(sample_booking(is_demo=True))
+        assert all(key.endswith(":demo") for key in demo)
+        assert _rollup_identity("bookings:employee:emp-1:demo") == {
+            "entity": "bookings", "scope": "employee", "key": "emp-1", "is_demo": True
+        }
+
+        purchases = purchase_contribution({"stock_id": "stock-1", "quantity": 10, "price_per_share": 40.0})
+        assert set(purchases) == {"purchases:all:live", "purchases:stock:stock-1:live"}
+        assert purchases["purchases:all:live"]["value"] == 400.0
+        print("✓ Booking/purchase contributions keyed by scope and partition")
+
+    def test_02_cancelled_and_voided(self):
+        cancelled = booking_metrics(sample_booking(status="cancelled"))
+        voided = booking_metrics(sample_booking(is_voided=True, approval_status="rejected"))
+
+        assert cancelled["count"] == 1 and cancelled["by_status.cancelled"] == 1
+        assert "active" not in cancelled and "live" not in cancelled and "sell_value" not in cancelled
+        assert voided["active"] == 1 and voided["by_approval.rejected"] == 1
+        assert "open" not in voided and "live" not in voided and "received" not in voided
+        assert booking_metrics(sample_booking(status="a.b$c/d"))["by_status.a_b_c_d"] == 1
+        print("✓ Cancelled/voided bookings excluded from live book values")
+
+
+class TestDeltas:
+    """Swapping snapshots"""
+
+    def test_03_deltas_telescope(self):
+        created = booking_contribution(sample_booking())
+        edited = booking_contribution(sample_booking(quantity=120, created_by="emp-2", status="closed"))
+
+        step1 = contribution_delta({}, created)
+        step2 = contribution_delta(created, edited)
+        step3 = contribution_delta(edited, {})
+
+        assert step2["bookings:employee:emp-1:live"]["count"] == -1
+        assert step2["bookings:employee:emp-2:live"]["count"] == 1
+        assert step2["bookings:all:live"] == {
+            "quantity": 20, "buy_value": 1000.0, "sell_value": 1200.0, "profit_loss": 200.0,
+            "by_status.open": -1, "by_status.closed": 1, "open": -1, "closed": 1,
+        }
+
+        totals = {}
+        for delta in (step1, step2, step3):
+            for key, changes in delta.items():
+                for metric, value in changes.items():
+                    totals[(key, metric)] = totals.get((key, metric), 0) + value
+        assert all(value == 0 for value in totals.values())
+        print("✓ Create/edit/delete deltas net to zero")
+
+    def test_04_snapshot_round_trip_and_sum(self):
+        contribution = booking_contribution(sample_booking())
+        encoded = _encode_snapshot(contribution)
+
+        assert all("." not in metric for entry in encoded for metric in entry["metrics"])
+        assert _decode_snapshot(encoded) == contribution
+        assert _decode_snapshot(None) == {}
+
+        docs = [
+            {"count": 3, "by_status": {"open": 2}},
+            {"count": 2, "by_status": {"closed": 1}},
+            {},
+        ]
+        assert sum_rollups(docs, "count") == 5
+        assert sum_rollups(docs, "by_status.open") == 2
+        assert sum_rollups(docs, "by_status.pending") == 0
+        print("✓ Snapshots round-trip; dotted metrics summed across rollups")
@@ -0,0 +1,213 @@
+"""
+Email Outbox - SMTP Pool Tests (against a local aiosmtpd server)
+================================================================
+1. A batch of messages is sent over at most `size` authenticated connections
+2. A connection dropped by the server is reopened transparently
+3. Refused recipients raise a permanent error and leave the connection reusable
+4. build_message adds CC, branding and attachments
+5. A batch whose claim expired leaves a re-claimed message untouched
+
+The SMTP server tests are skipped when the test-only aiosmtpd package is missing.
+"""
+
+import asyncio
+import os
+import smtplib
+import socket
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+pytest.importorskip("motor")
+
+import services.email_outbox as outbox
+from services.email_outbox import EmailOutboxWorker, SMTPConnectionPool, build_message, is_permanent_smtp_error
+
+USERNAME = "outbox@test.local"
+PASSWORD = "secret"
+
+
+class RecordingHandler:
+    """Collects delivered messages; refuses recipients at the 'blocked.test' domain"""
+
+    def __init__(self):
+        self.messages = []
+        self.sessions = set()
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.endswith("@blocked.test"):
+            return "550 5.1.1 Mailbox unavailable"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.sessions.add(id(session))
+        self.messages.append(envelope)
+        return "250 Message accepted for delivery"
+
+
+def authenticator(server, session, envelope, mechanism, auth_data):
+    from aiosmtpd.smtp import AuthResult
+
+    ok = auth_data.login.decode() == USERNAME and auth_data.password.decode() == PASSWORD
+    return AuthResult(success=ok)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server():
+    Controller = pytest.importorskip("aiosmtpd.controller").Controller
+    handler = RecordingHandler()
+    controller = Controller(
+        handler, hostname="127.0.0.1", port=free_port(),
+        authenticator=authenticator, auth_require_tls=False
+    )
+    controller.start()
+    yield controller, handler
+    controller.stop()
+
+
+def smtp_config(controller):
+    return {
+        "host": controller.hostname,
+        "port": controller.port,
+        "username": USERNAME,
+        "password": PASSWORD,
+        "from_email": "noreply@test.local",
+        "from_name": "Privity Test",
+        "use_tls": False,
+        "use_ssl": False,
+        "timeout": 10
+    }
+
+
+def outbox_item(to_email, **extra):
+    return {"to_email": to_email, "subject": "Outbox test", "body": "<p>Hello</p>", **extra}
+
+
+COMPANY = {"name": "SMIFS Private Equity", "logo_url": ""}
+
+
+class TestSMTPConnectionPool:
+    """Pooled SMTP delivery"""
+
+    def test_01_batch_reuses_connections(self, smtp_server):
+        controller, handler = smtp_server
+        config = smtp_config(controller)
+        pool = SMTPConnectionPool(config, size=2)
+
+        async def scenario():
+            sends = []
+            for i in range(20):
+                recipients, message = build_message(config, COMPANY, outbox_item(f"user{i}@test.local"))
+                sends.append(pool.send(config["from_email"], recipients, message))
+            await asyncio.gather(*sends)
+            await pool.close()
+
+        asyncio.run(scenario())
+        assert len(handler.messages) == 20
+        assert pool.connections_opened <= 2
+        assert len(handler.sessions) <= 2
+        print(f"✓ 20 messages over {pool.connections_opened} connection(s)")
+
+    def test_02_reconnects_after_disconnect(self, smtp_server):
+        controller, handler = smtp_server
+        config = smtp_config(controller)
+        pool = SMTPConnectionPool(config, size=1)
+
+        async def scenario():
+            recipients, message = build_message(config, COMPANY, outbox_item("first@test.local"))
+            await pool.send(config["from_email"], recipients, message)
+
+            # Simulate the server dropping the idle session
+            pool._idle[0][0].sock.shutdown(socket.SHUT_RDWR)
+
+            recipients, message = build_message(config, COMPANY, outbox_item("second@test.local"))
+            await pool.send(config["from_email"], recipients, message)
+            await pool.close()
+
+        asyncio.run(scenario())
+        assert len(handler.messages) == 2
+        assert pool.connections_opened == 2
+        print("✓ Dropped connection reopened")
+
+    def test_03_refused_recipient_is_permanent(self, smtp_server):
+        controller, handler = smtp_server
+        config = smtp_config(controller)
+        pool = SMTPConnectionPool(config, size=1)
+
+        async def scenario():
+            recipients, message = build_message(config, COMPANY, outbox_item("nobody@blocked.test"))
+            with pytest.raises(smtplib.SMTPRecipientsRefused) as exc:
+                await pool.send(config["from_email"], recipients, message)
+            assert is_permanent_smtp_error(exc.value)
+
+            recipients, message = build_message(config, COMPANY, outbox_item("ok@test.local"))
+            await pool.send(config["from_email"], recipients, message)
+            await pool.close()
+
+        asyncio.run(scenario())
+        assert len(handler.messages) == 1
+        assert pool.connections_opened == 1
+        print("✓ Refused recipient failed permanently, connection kept")
+
+    def test_04_build_message(self):
+        config = {"from_email": "noreply@test.local", "from_name": "Privity Test"}
+        recipients, message = build_message(config, COMPANY, outbox_item(
+            "client@test.local",
+            cc_email="rm@test.local",
+            attachments=[{"filename": "Contract_Note_1.pdf", "content": b"%PDF-1.4", "content_type": "application/pdf"}]
+        ))
+        assert recipients == ["client@test.local", "rm@test.local"]
+        assert "Cc: rm@test.local" in message
+        assert 'filename="Contract_Note_1.pdf"' in message
+        assert "SMIFS Private Equity" in message
+        assert not is_permanent_smtp_error(smtplib.SMTPServerDisconnected("gone"))
+        print("✓ Message built with CC, branding and attachment")
+
+
+class FakeCollection:
+    """Applies UpdateOne/DeleteOne with plain equality filters"""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def bulk_write(self, operations, ordered=True):
+        for op in operations:
+            matched = [d for d in self.docs if all(d.get(k) == v for k, v in op._filter.items())]
+            if type(op).__name__ == "DeleteOne":
+                self.docs[:] = [d for d in self.docs if d not in matched[:1]]
+            else:
+                for doc in matched[:1]:
+                    doc.update(op._doc["$set"])
+
+
+class TestOutboxWorker:
+    """Outcomes are written under the batch's claim"""
+
+    def test_05_stale_claim_leaves_reclaimed_message(self, monkeypatch):
+        # Re-claimed by another worker after this batch's lease expired
+        message = {"id": "m1", "log_id": "l1", "status": "sending", "claim_id": "worker-2:new", "attempts": 1}
+        log = {"id": "l1", "status": "sending"}
+        db = type("FakeDb", (), {})()
+        db.email_outbox = FakeCollection([message])
+        db.email_logs = FakeCollection([log])
+        monkeypatch.setattr(outbox, "db", db)
+
+        stale = {"id": "m1", "log_id": "l1", "claim_id": "worker-1:old", "attempts": 0}
+        worker = EmailOutboxWorker()
+        for outcome in ("sent", "failed", "retry"):
+            asyncio.run(worker._record([(stale, outcome, None)]))
+        assert db.email_outbox.docs == [message]
+        assert message["status"] == "sending" and message["claim_id"] == "worker-2:new"
+
+        asyncio.run(worker._record([(dict(message), "sent", None)]))
+        assert db.email_outbox.docs == []
+        print("✓ A stale batch cannot delete or reset a message another worker holds")
@@ -0,0 +1,174 @@
+"""
+Export Engine - Unit Tests (no MongoDB required)
+================================================
+1. CSV is produced batch by batch from the cursor, with an optional footer
+2. XLSX rows go through the writer thread into a write-only workbook
+3. A failing row source stops the writer thread instead of leaving it blocked,
+   and the aborted workbook's temp file is removed
+4. Streamed XLSX responses keep the event loop responsive and remove their temp file
+"""
+
+import asyncio
+import csv
+import io
+import os
+import sys
+import tempfile
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+pytest.importorskip("motor")
+
+from openpyxl import load_workbook
+from openpyxl.worksheet._writer import ALL_TEMP_FILES
+
+import services.export_engine as engine
+from services.export_engine import ExportSheet, cursor_batches, stream_export, write_xlsx
+
+
+class FakeCursor:
+    """Async-iterable stand-in for a Motor cursor."""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.requested_batch_size = None
+
+    def batch_size(self, size):
+        self.requested_batch_size = size
+        return self
+
+    def __aiter__(self):
+        async def gen():
+            for doc in self.docs:
+                yield doc
+        return gen()
+
+
+SHEET = ExportSheet(
+    title="Bookings",
+    headers=["Booking #", "Client", "Qty", "Amount"],
+    column_widths=[15, 25, 8, 12],
+    right_aligned=[3, 4],
+    bordered=True
+)
+
+
+def booking_docs(n):
+    return [{"booking_number": f"BK-{i:05d}", "client": f"Client {i % 7}", "qty": i, "price": 10.5} for i in range(n)]
+
+
+async def to_rows(batch):
+    return [[b["booking_number"], b["client"], b["qty"], b["qty"] * b["price"]] for b in batch]
+
+
+async def collect(response):
+    return b"".join([chunk async for chunk in response.body_iterator])
+
+
+class TestCsv:
+    """CSV streaming"""
+
+    def test_01_csv_batches(self):
+        cursor = FakeCursor(booking_docs(7))
+        transformed = []
+
+        async def counting_rows(batch):
+            transformed.append(len(batch))
+            return await to_rows(batch)
+
+        response = stream_export(SHEET, cursor_batches(cursor, counting_rows, batch_size=3), "csv",
+                                 "bookings.csv", footer=lambda: [["TOTAL", "", 21, 220.5]])
+        assert response.media_type == "text/csv"
+        assert response.headers["content-disposition"] == "attachment; filename=bookings.csv"
+
+        body = asyncio.run(collect(response)).decode()
+        rows = list(csv.reader(io.StringIO(body)))
+        assert rows[0] == SHEET.headers
+        assert rows[1] == ["BK-00000", "Client 0", "0", "0.0"]
+        assert len(rows) == 1 + 7 + 1 and rows[-1][0] == "TOTAL"
+        assert transformed == [3, 3, 1] and cursor.requested_batch_size == 3
+        print("✓ CSV streamed per cursor batch with footer")
+
+
+class TestXlsx:
+    """Writer thread and workbook output"""
+
+    def test_02_write_only_workbook(self, tmp_path):
+        path = str(tmp_path / "bookings.xlsx")
+
+        async def scenario():
+            batches = cursor_batches(FakeCursor(booking_docs(1200)), to_rows, batch_size=250)
+            return await write_xlsx(SHEET, batches, path, footer=lambda: [[], ["TOTALS", None, None, 99.0]])
+
+        assert asyncio.run(scenario()) == 1200
+
+        ws = load_workbook(path).active
+        assert ws.title == "Bookings"
+        assert [c.value for c in ws[1]] == SHEET.headers
+        assert ws["A1"].font.bold and ws["A1"].fill.start_color.rgb.endswith("064E3B")
+        assert ws["A2"].value == "BK-00000" and ws["D1201"].value == 1199 * 10.5
+        assert ws["C2"].alignment.horizontal == "right" and ws["A2"].border.left.style == "thin"
+        assert ws["A1203"].value == "TOTALS" and ws["A1203"].font.bold
+        assert ws.column_dimensions["B"].width == 25
+        print("✓ 1200 rows written through the writer thread with header, styles and footer")
+
+    def test_03_failing_source_stops_writer(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(engine, "EXPORT_QUEUE_BATCHES", 1)
+        path = str(tmp_path / "broken.xlsx")
+
+        async def broken_batches():
+            for i in range(5):
+                yield [[f"BK-{i}", "x", 1, 1.0]] * 100
+            raise RuntimeError("cursor died")
+
+        async def scenario():
+            with pytest.raises(RuntimeError, match="cursor died"):
+                await asyncio.wait_for(write_xlsx(SHEET, broken_batches(), path), timeout=10)
+
+        temp_files = set(ALL_TEMP_FILES)
+        asyncio.run(scenario())
+        assert not os.path.exists(path)
+        # The writer thread finishes its cleanup after write_xlsx has raised
+        deadline = time.monotonic() + 5
+        while set(ALL_TEMP_FILES) - temp_files and time.monotonic() < deadline:
+            time.sleep(0.01)
+        leaked = set(ALL_TEMP_FILES) - temp_files
+        assert leaked == set() and not any(os.path.exists(f) for f in leaked)
+        print("✓ Failed export aborts the writer thread; no partial workbook or temp file left")
+
+
+class TestStreaming:
+    """StreamingResponse for XLSX"""
+
+    def test_04_event_loop_stays_responsive(self):
+        before = set(os.listdir(tempfile.gettempdir()))
+
+        async def scenario():
+            ticks = 0
+            done = asyncio.Event()
+
+            async def ticker():
+                nonlocal ticks
+                while not done.is_set():
+                    ticks += 1
+                    await asyncio.sleep(0.001)
+
+            task = asyncio.create_task(ticker())
+            response = stream_export(SHEET, cursor_batches(FakeCursor(booking_docs(20000)), to_rows), "xlsx", "big.xlsx")
+            body = await collect(response)
+            done.set()
+            await task
+            return response, body, ticks
+
+        response, body, ticks = asyncio.run(scenario())
+        assert response.media_type == engine.XLSX_MEDIA_TYPE
+        assert body[:2] == b"PK"  # zip container
+        # Streamed workbooks carry no dimension record, so count the rows
+        assert sum(1 for _ in load_workbook(io.BytesIO(body), read_only=True).active.iter_rows()) == 20001
+        assert ticks > 10
+        leftovers = {f for f in set(os.listdir(tempfile.gettempdir())) - before if f.startswith("export_")}
+        assert leftovers == set()
+        print(f"✓ 20k-row XLSX streamed; event loop ticked {ticks} times; temp file removed")
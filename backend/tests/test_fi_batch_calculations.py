@@ -0,0 +1,163 @@
+"""
+Vectorized Bond Analytics - Parity Tests
+=========================================
+Checks the NumPy batch engine (fixed_income/batch_calculations.py) against the
+scalar Decimal engine (fixed_income/calculations.py):
+
+1. YTM from clean price agrees to 1e-6 for coupon and zero-coupon bonds
+2. Price from yield agrees to 1e-6
+3. Macaulay and modified duration agree to 1e-6
+4. Convexity is consistent with the second derivative of price
+5. Unpriceable rows (no price / bad dates) come back as None at the Decimal edge
+"""
+
+import os
+import sys
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+np = pytest.importorskip("numpy")
+
+from fixed_income.models import CouponFrequency, DayCountConvention
+from fixed_income.calculations import (
+    calculate_ytm,
+    price_from_yield,
+    calculate_duration,
+    calculate_modified_duration
+)
+from fixed_income.batch_calculations import BondBatch, to_decimal
+
+TOLERANCE = 1e-6
+SETTLEMENT = date(2025, 6, 15)
+
+
+def build_bonds(count=60, seed=42):
+    """Random but reproducible bond universe covering all frequencies and conventions"""
+    rng = random.Random(seed)
+    frequencies = list(CouponFrequency)
+    conventions = list(DayCountConvention)
+    bonds = []
+    for _ in range(count):
+        bonds.append({
+            "face_value": rng.choice([100, 1000, 10000]),
+            "coupon_rate": round(rng.uniform(5, 12), 2),
+            "coupon_frequency": rng.choice(frequencies),
+            "day_count_convention": rng.choice(conventions),
+            "maturity_date": SETTLEMENT + timedelta(days=rng.randint(120, 365 * 15)),
+        })
+    for bond in bonds:
+        bond["current_market_price"] = round(bond["face_value"] * rng.uniform(0.85, 1.12), 2)
+    return bonds
+
+
+def make_batch(bonds):
+    return BondBatch(
+        face_values=[b["face_value"] for b in bonds],
+        coupon_rates=[b["coupon_rate"] for b in bonds],
+        frequencies=[b["coupon_frequency"] for b in bonds],
+        maturity_dates=[b["maturity_date"] for b in bonds],
+        settlement_date=SETTLEMENT,
+        conventions=[b["day_count_convention"] for b in bonds],
+        prices=[b["current_market_price"] for b in bonds]
+    )
+
+
+def scalar_args(bond):
+    return {
+        "face_value": Decimal(str(bond["face_value"])),
+        "coupon_rate": Decimal(str(bond["coupon_rate"])),
+        "settlement_date": SETTLEMENT,
+        "maturity_date": bond["maturity_date"],
+        "frequency": bond["coupon_frequency"],
+        "convention": bond["day_count_convention"],
+    }
+
+
+class TestBatchParity:
+    """Batch engine vs scalar engine"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.bonds = build_bonds()
+        self.batch = make_batch(self.bonds)
+
+    def test_01_ytm_parity(self):
+        """Batch YTM rounds to the same Decimal as calculate_ytm"""
+        batch_ytm = to_decimal(self.batch.ytm())
+        for bond, ytm in zip(self.bonds, batch_ytm):
+            expected = calculate_ytm(clean_price=Decimal(str(bond["current_market_price"])), **scalar_args(bond))
+            assert abs(float(ytm) - float(expected)) <= TOLERANCE, \
+                f"YTM mismatch for {bond}: batch={ytm} scalar={expected}"
+        print(f"✓ YTM parity for {len(self.bonds)} bonds")
+
+    def test_02_price_from_yield_parity(self):
+        """Batch price from yield matches price_from_yield"""
+        yields = [round(b["coupon_rate"] + 0.75, 4) for b in self.bonds]
+        batch_price = to_decimal(self.batch.price(np.array(yields)))
+        for bond, target, price in zip(self.bonds, yields, batch_price):
+            expected = price_from_yield(target_ytm=Decimal(str(target)), **scalar_args(bond))
+            assert abs(float(price) - float(expected)) <= TOLERANCE, \
+                f"Price mismatch for {bond}: batch={price} scalar={expected}"
+        print(f"✓ Price-from-yield parity for {len(self.bonds)} bonds")
+
+    def test_03_duration_parity(self):
+        """Batch Macaulay and modified duration match the scalar functions"""
+        yields = np.array([b["coupon_rate"] for b in self.bonds])
+        durations = self.batch.duration(yields)
+        batch_duration = to_decimal(durations)
+
+        scalar_durations = []
+        for bond, ytm, duration in zip(self.bonds, yields, batch_duration):
+            expected = calculate_duration(
+                clean_price=Decimal(str(bond["current_market_price"])),
+                ytm=Decimal(str(ytm)),
+                **scalar_args(bond)
+            )
+            scalar_durations.append(expected)
+            expected = expected.quantize(Decimal("0.0001"))
+            assert abs(float(duration) - float(expected)) <= TOLERANCE, \
+                f"Duration mismatch for {bond}: batch={duration} scalar={expected}"
+
+        # Modified duration from the same Macaulay inputs
+        batch_modified = to_decimal(self.batch.modified_duration(np.array([float(d) for d in scalar_durations]), yields))
+        for bond, ytm, macaulay, modified in zip(self.bonds, yields, scalar_durations, batch_modified):
+            expected = calculate_modified_duration(macaulay, Decimal(str(ytm)), bond["coupon_frequency"])
+            expected = expected.quantize(Decimal("0.0001"))  # zero-coupon passes duration through unrounded
+            assert abs(float(modified) - float(expected)) <= TOLERANCE, \
+                f"Modified duration mismatch for {bond}: batch={modified} scalar={expected}"
+        print(f"✓ Duration parity for {len(self.bonds)} bonds")
+
+    def test_04_convexity_matches_price_curvature(self):
+        """Convexity ~ P''(y) / P for coupon bonds (finite difference on batch prices)"""
+        coupon_bonds = [b for b in self.bonds if b["coupon_frequency"] != CouponFrequency.ZERO_COUPON]
+        batch = make_batch(coupon_bonds)
+        yields = np.array([b["coupon_rate"] for b in coupon_bonds])
+        h = 0.01  # 1bp in percentage points
+
+        price = batch.price(yields)
+        curvature = (batch.price(yields + h) - 2 * price + batch.price(yields - h)) / (h / 100.0) ** 2 / price
+        convexity = batch.convexity(yields)
+        assert np.allclose(convexity, curvature, rtol=1e-3), "Convexity inconsistent with price curvature"
+        print(f"✓ Convexity consistent for {len(coupon_bonds)} coupon bonds")
+
+    def test_05_invalid_rows_are_none(self):
+        """Rows without a price or with bad dates produce None at the Decimal edge"""
+        instruments = [
+            {"face_value": 1000, "coupon_rate": 9.0, "coupon_frequency": "annual",
+             "maturity_date": "2030-06-15", "current_market_price": 1010},
+            {"face_value": 1000, "coupon_rate": 9.0, "coupon_frequency": "annual",
+             "maturity_date": "2030-06-15", "current_market_price": None},
+            {"face_value": 1000, "coupon_rate": 9.0, "coupon_frequency": "annual",
+             "maturity_date": "not-a-date", "current_market_price": 1000},
+        ]
+        batch = BondBatch.from_instruments(instruments, settlement_date=SETTLEMENT)
+        ytm = to_decimal(batch.ytm())
+        assert ytm[0] is not None
+        assert ytm[1] is None
+        assert ytm[2] is None
+        print("✓ Invalid rows handled")
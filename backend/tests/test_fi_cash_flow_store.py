@@ -0,0 +1,251 @@
+"""
+Materialized Cash Flow Schedule Tests (no MongoDB required)
+===========================================================
+1. Per-unit rows times a quantity reproduce generate_cash_flow_schedule exactly
+2. Zero coupon and unparseable instruments
+3. refresh_cash_flow_schedules() only rewrites instruments whose terms changed
+4. A window for loaded holdings is one range query joined with quantities
+5. Without holdings, only holders of instruments paying in the window are fetched
+6. Overlapping refreshes of one instrument leave one row per (isin, date, type)
+"""
+
+import asyncio
+import os
+import sys
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+pytest.importorskip("motor")
+pytest.importorskip("dateutil")
+
+import fixed_income.cash_flow_store as store
+from fixed_income.calculations import generate_cash_flow_schedule
+from fixed_income.cash_flow_store import cash_flow_amounts, schedule_rows, schedule_terms_key
+from fixed_income.models import CouponFrequency
+
+SEMI_ANNUAL = {
+    "isin": "INE001", "face_value": "1000", "coupon_rate": "8.37",
+    "coupon_frequency": "semi_annual", "issue_date": "2024-01-31", "maturity_date": "2029-01-31"
+}
+QUARTERLY = {
+    "isin": "INE002", "face_value": 100, "coupon_rate": 9.15,
+    "coupon_frequency": "quarterly", "issue_date": "2025-03-15", "maturity_date": "2028-03-15"
+}
+ZERO = {
+    "isin": "INE003", "face_value": 1000, "coupon_rate": 0,
+    "coupon_frequency": "zero_coupon", "issue_date": "2025-01-01", "maturity_date": "2027-01-01"
+}
+
+
+def matches(doc, query):
+    for key, condition in query.items():
+        value = doc.get(key)
+        if isinstance(condition, dict):
+            if "$in" in condition and value not in condition["$in"]:
+                return False
+            if "$gte" in condition and not value >= condition["$gte"]:
+                return False
+            if "$lte" in condition and not value <= condition["$lte"]:
+                return False
+            if "$gt" in condition and not value > condition["$gt"]:
+                return False
+            if "$ne" in condition and value == condition["$ne"]:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, keys):
+        for key, direction in reversed(keys):
+            self.docs.sort(key=lambda d: d[key], reverse=direction < 0)
+        return self
+
+    async def to_list(self, length):
+        return self.docs
+
+    def __aiter__(self):
+        self._iter = iter(self.docs)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class FakeCollection:
+    def __init__(self, docs=None, key="_id", interleave=False):
+        self.docs = list(docs or [])
+        self.key = key
+        self.queries = []
+        self.bulk_writes = 0
+        # Let other tasks run between operations, as a server applies a bulk_write
+        self.interleave = interleave
+
+    def find(self, query, projection=None):
+        self.queries.append(query)
+        return FakeCursor([dict(d) for d in self.docs if matches(d, query)])
+
+    async def bulk_write(self, operations, ordered=True):
+        self.bulk_writes += 1
+        for op in operations:
+            if self.interleave:
+                await asyncio.sleep(0)
+            name = type(op).__name__
+            if name == "DeleteMany":
+                self.docs = [d for d in self.docs if not matches(d, op._filter)]
+            else:
+                existing = next((d for d in self.docs if matches(d, op._filter)), None)
+                if existing is None:
+                    existing = dict(op._filter)
+                    self.docs.append(existing)
+                existing.update(op._doc["$set"])
+
+    async def delete_many(self, query):
+        self.docs = [d for d in self.docs if not matches(d, query)]
+
+
+class FakeDb:
+    def __init__(self, instruments=(), holdings=()):
+        self.fi_instruments = FakeCollection(instruments)
+        self.fi_holdings = FakeCollection(holdings)
+        self.fi_cash_flows = FakeCollection()
+        self.fi_cash_flow_state = FakeCollection()
+
+
+class TestScheduleRows:
+    """Per-unit materialization"""
+
+    @pytest.mark.parametrize("instrument,frequency", [
+        (SEMI_ANNUAL, CouponFrequency.SEMI_ANNUAL),
+        (QUARTERLY, CouponFrequency.QUARTERLY),
+    ])
+    def test_01_matches_generated_schedule(self, instrument, frequency):
+        settlement = date(2026, 2, 10)
+        quantity = 37
+        expected = generate_cash_flow_schedule(
+            face_value=Decimal(str(instrument["face_value"])),
+            coupon_rate=Decimal(str(instrument["coupon_rate"])),
+            settlement_date=settlement,
+            issue_date=date.fromisoformat(instrument["issue_date"]),
+            maturity_date=date.fromisoformat(instrument["maturity_date"]),
+            frequency=frequency,
+            quantity=quantity
+        )
+        rows = [r for r in schedule_rows(instrument) if r["date"] > settlement.isoformat()]
+
+        assert [r["date"] for r in rows] == [cf.date.isoformat() for cf in expected]
+        assert [r["type"] for r in rows] == [cf.type for cf in expected]
+        assert [sum(cash_flow_amounts(r, quantity)) for r in rows] == [cf.amount for cf in expected]
+        assert rows[-1]["type"] == "both"
+        print(f"✓ {frequency.value}: {len(rows)} stored rows match the generated schedule")
+
+    def test_02_zero_coupon_and_bad_terms(self):
+        (row,) = schedule_rows(ZERO)
+        assert row["type"] == "principal" and row["date"] == "2027-01-01"
+        assert cash_flow_amounts(row, 3) == (Decimal("0.00"), Decimal("3000"))
+        assert schedule_rows({**ZERO, "maturity_date": "soon"}) == []
+        assert schedule_rows({**ZERO, "coupon_frequency": "weekly"}) == []
+        print("✓ Zero coupon pays principal only; unusable terms give no rows")
+
+
+class TestMaterialization:
+    """Refresh on create or term change"""
+
+    def test_03_refresh_only_changed(self, monkeypatch):
+        fake = FakeDb(instruments=[dict(SEMI_ANNUAL), dict(QUARTERLY)])
+        monkeypatch.setattr(store, "db", fake)
+
+        first = asyncio.run(store.refresh_cash_flow_schedules())
+        assert first == {"materialized": 2, "unchanged": 0, "removed": 0}
+        rows_before = len(fake.fi_cash_flows.docs)
+
+        again = asyncio.run(store.refresh_cash_flow_schedules(["INE001", "INE002"]))
+        assert again == {"materialized": 0, "unchanged": 2, "removed": 0}
+
+        # Maturity extended: only that instrument's rows are rewritten
+        fake.fi_instruments.docs[0]["maturity_date"] = "2030-01-31"
+        changed = asyncio.run(store.refresh_cash_flow_schedules(["INE001"]))
+        assert changed["materialized"] == 1
+        assert len(fake.fi_cash_flows.docs) == rows_before + 2
+        assert {r["terms_key"] for r in fake.fi_cash_flows.docs if r["isin"] == "INE001"} == {
+            schedule_terms_key(fake.fi_instruments.docs[0])
+        }
+
+        # Deleted instrument
+        fake.fi_instruments.docs = fake.fi_instruments.docs[:1]
+        removed = asyncio.run(store.refresh_cash_flow_schedules(["INE002"]))
+        assert removed["removed"] == 1
+        assert not [r for r in fake.fi_cash_flows.docs if r["isin"] == "INE002"]
+        print("✓ Only new, changed or deleted instruments touch the store")
+
+
+class TestQueries:
+    """Date windows joined with holdings"""
+
+    def test_04_window_for_holdings(self, monkeypatch):
+        fake = FakeDb(instruments=[dict(SEMI_ANNUAL), dict(QUARTERLY), dict(ZERO)])
+        monkeypatch.setattr(store, "db", fake)
+        asyncio.run(store.refresh_cash_flow_schedules())
+
+        holdings = [
+            {"client_id": "c1", "isin": "INE001", "quantity": 10},
+            {"client_id": "c1", "isin": "INE002", "quantity": 4},
+            {"client_id": "c1", "isin": "INE009", "quantity": 1},
+        ]
+        flows = asyncio.run(store.get_scheduled_cash_flows(date(2026, 3, 1), date(2026, 8, 31), holdings=holdings))
+
+        (query,) = fake.fi_cash_flows.queries
+        assert set(query["isin"]["$in"]) == {"INE001", "INE002", "INE009"}
+        assert query["date"] == {"$gte": "2026-03-01", "$lte": "2026-08-31"}
+        assert [(f["date"].isoformat(), f["isin"]) for f in flows] == [
+            ("2026-03-15", "INE002"), ("2026-06-15", "INE002"), ("2026-07-31", "INE001")
+        ]
+        assert flows[2]["coupon"] == Decimal("418.50") and flows[2]["principal"] == 0
+        assert flows[0]["amount"] == (Decimal("100") * Decimal("9.15") / 100 / 4 * 4).quantize(Decimal("0.01"))
+        print("✓ One range query for the held ISINs, amounts scaled by quantity")
+
+    def test_05_window_across_holders(self, monkeypatch):
+        fake = FakeDb(
+            instruments=[dict(SEMI_ANNUAL), dict(QUARTERLY), dict(ZERO)],
+            holdings=[
+                {"client_id": "c1", "isin": "INE001", "quantity": 10},
+                {"client_id": "c2", "isin": "INE001", "quantity": 2},
+                {"client_id": "c3", "isin": "INE002", "quantity": 5},
+                {"client_id": "c4", "isin": "INE003", "quantity": 1},
+            ]
+        )
+        monkeypatch.setattr(store, "db", fake)
+        asyncio.run(store.refresh_cash_flow_schedules())
+
+        flows = asyncio.run(store.get_scheduled_cash_flows(date(2026, 7, 25), date(2026, 8, 1)))
+
+        (holding_query,) = fake.fi_holdings.queries
+        assert holding_query["isin"] == {"$in": ["INE001"]}
+        assert sorted(f["holding"]["client_id"] for f in flows) == ["c1", "c2"]
+        assert sum(f["amount"] for f in flows) == Decimal("502.20")
+        print("✓ Only holders of instruments paying in the window are read")
+
+    def test_06_overlapping_refreshes(self, monkeypatch):
+        fake = FakeDb(instruments=[dict(SEMI_ANNUAL)])
+        fake.fi_cash_flows.interleave = True
+        monkeypatch.setattr(store, "db", fake)
+
+        async def overlapping():
+            await asyncio.gather(store.refresh_cash_flow_schedules(["INE001"]),
+                                 store.refresh_cash_flow_schedules(["INE001"]))
+
+        asyncio.run(overlapping())
+        keys = [(r["isin"], r["date"], r["type"]) for r in fake.fi_cash_flows.docs]
+        assert len(keys) == len(set(keys)) == len(schedule_rows(SEMI_ANNUAL))
+        print("✓ Concurrent refreshes upsert the same rows instead of duplicating them")
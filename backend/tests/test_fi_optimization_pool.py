@@ -0,0 +1,137 @@
+"""
+FI Optimization Pool & Parallel Frontier Tests
+==============================================
+1. Warm-started frontier segment gives the same yields as solving every point
+2. Frontier split into segments (as the pool runs it) matches the single pass
+3. OptimizationPool.run executes in a worker process and enforces the timeout
+4. Identical concurrent requests share one solve through the result cache
+"""
+
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+np = pytest.importorskip("numpy")
+optimize = pytest.importorskip("scipy.optimize")
+pytest.importorskip("motor")
+
+from fixed_income.advanced_portfolio_optimizer import (
+    AdvancedPortfolioOptimizer, run_frontier_segment
+)
+from fixed_income.optimization_pool import OptimizationPool, OptimizationTimeout
+
+RATINGS = ["AAA", "AA+", "AA", "AA-", "A+", "A", "BBB+", "BBB"]
+
+
+def build_universe(count=80, seed=7):
+    rng = random.Random(seed)
+    today = date.today()
+    universe = []
+    for i in range(count):
+        rating = rng.choice(RATINGS)
+        coupon = round(6.5 + RATINGS.index(rating) * 0.4 + rng.uniform(-0.5, 0.5), 2)
+        universe.append({
+            "isin": f"INE{i:06d}TEST",
+            "issuer_name": f"Issuer {i % 25}",
+            "coupon_rate": coupon,
+            "ytm": round(coupon + rng.uniform(-0.3, 0.6), 2),
+            "credit_rating": rating,
+            "maturity_date": (today + timedelta(days=rng.randint(200, 365 * 12))).isoformat()
+        })
+    return universe
+
+
+def naive_frontier_yields(optimizer, targets, max_duration):
+    """One linprog per point, as the frontier was computed before warm-starting"""
+    yields, durations, risk_scores = optimizer._frontier_inputs()
+    n = len(yields)
+    out = []
+    for target in targets:
+        result = optimize.linprog(
+            -yields, A_ub=np.vstack([risk_scores, durations]), b_ub=np.array([target, max_duration]),
+            A_eq=np.ones((1, n)), b_eq=np.array([1.0]), bounds=[(0, 0.3)] * n, method="highs"
+        )
+        if result.success:
+            out.append(round(-result.fun, 4))
+    return out
+
+
+def slow_square(x, delay):
+    time.sleep(delay)
+    return x * x
+
+
+class TestParallelFrontier:
+    """Frontier correctness with warm start and segmentation"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.universe = build_universe()
+        self.optimizer = AdvancedPortfolioOptimizer()
+        self.optimizer.available_instruments = self.universe
+        self.targets = self.optimizer.frontier_risk_targets(30)
+
+    def test_01_warm_start_matches_naive(self):
+        points = self.optimizer.solve_frontier_segment(self.targets, 8.0)
+        expected = naive_frontier_yields(self.optimizer, self.targets, 8.0)
+
+        assert [p["expected_yield"] for p in points] == pytest.approx(expected, abs=1e-4)
+        print(f"✓ {len(points)} frontier points match per-point solves")
+
+    def test_02_segments_match_single_pass(self):
+        single = run_frontier_segment(self.universe, self.targets, 8.0)
+        segmented = []
+        for chunk in np.array_split(self.targets, 4):
+            segmented.extend(run_frontier_segment(self.universe, list(chunk), 8.0))
+
+        assert [p["expected_yield"] for p in segmented] == pytest.approx(
+            [p["expected_yield"] for p in single], abs=1e-4
+        )
+        print("✓ Segmented frontier matches single pass")
+
+
+class TestOptimizationPool:
+    """Process pool execution, timeout and result cache"""
+
+    def test_03_run_and_timeout(self):
+        pool = OptimizationPool(workers=1, max_concurrency=1, timeout_seconds=30)
+
+        async def scenario():
+            assert await pool.run(slow_square, 7, 0) == 49
+            with pytest.raises(OptimizationTimeout):
+                await pool.run(slow_square, 3, 2, timeout=0.2)
+
+        try:
+            asyncio.run(scenario())
+        finally:
+            pool.shutdown()
+        assert pool.completed == 1
+        assert pool.timeouts == 1
+        print("✓ Pool runs in worker and enforces timeout")
+
+    def test_04_cached_dedups_concurrent_requests(self):
+        pool = OptimizationPool(workers=1, max_concurrency=1, cache_ttl_seconds=60)
+        calls = []
+
+        async def factory():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {"frontier_points": [1, 2, 3]}
+
+        async def scenario():
+            results = await asyncio.gather(*[pool.cached("same-key", factory) for _ in range(5)])
+            again = await pool.cached("same-key", factory)
+            return results, again
+
+        results, again = asyncio.run(scenario())
+        assert len(calls) == 1
+        assert all(r == {"frontier_points": [1, 2, 3]} for r in results)
+        assert again == {"frontier_points": [1, 2, 3]}
+        print("✓ Concurrent identical requests share one solve")
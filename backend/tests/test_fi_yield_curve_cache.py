@@ -0,0 +1,89 @@
+"""
+Yield Curve Cache & Vectorized Evaluation Tests
+================================================
+1. YieldCurve.get_rates evaluates a tenor array in one call and matches a fresh CubicSpline
+2. Parametric (Nelson-Siegel) curves evaluate arrays, including tenor 0
+3. CurveCache returns cached curves until invalidated
+4. A build that started before an invalidation is not cached
+"""
+
+import os
+import sys
+from datetime import date
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+np = pytest.importorskip("numpy")
+interpolate = pytest.importorskip("scipy.interpolate")
+pytest.importorskip("motor")
+
+from fixed_income.yield_curve_analytics import (
+    YieldCurve, YieldCurveAnalytics, CurveType, InterpolationMethod
+)
+from fixed_income.curve_cache import CurveCache
+
+
+def benchmark_curve(method=InterpolationMethod.CUBIC_SPLINE):
+    analytics = YieldCurveAnalytics()
+    points = analytics._get_benchmark_gsec_points()
+    params = {}
+    if method in (InterpolationMethod.NELSON_SIEGEL, InterpolationMethod.SVENSSON):
+        params = analytics._fit_parametric_model(points, method)
+    return YieldCurve(
+        curve_type=CurveType.SPOT,
+        curve_date=date(2025, 6, 15),
+        points=points,
+        interpolation_method=method,
+        model_params=params
+    )
+
+
+class TestVectorizedCurve:
+    """Array evaluation of fitted curves"""
+
+    def test_01_cubic_spline_matches_fresh_fit(self):
+        curve = benchmark_curve()
+        tenors = np.array([i * 0.5 for i in range(1, 61)])
+        spline = interpolate.CubicSpline([p.tenor for p in curve.points], [p.rate for p in curve.points])
+
+        assert np.allclose(curve.get_rates(tenors), spline(tenors), atol=1e-12)
+        assert curve.get_rate(4.2) == pytest.approx(float(spline(4.2)), abs=1e-12)
+        print("✓ Cubic spline array evaluation matches")
+
+    def test_02_parametric_curve_arrays(self):
+        curve = benchmark_curve(InterpolationMethod.NELSON_SIEGEL)
+        rates = curve.get_rates([0, 1, 5, 10])
+        params = curve.model_params
+
+        assert rates[0] == pytest.approx(params["beta0"] + params["beta1"])
+        assert [curve.get_rate(t) for t in (1, 5, 10)] == pytest.approx(rates[1:].tolist())
+        print("✓ Nelson-Siegel array evaluation matches scalar")
+
+
+class TestCurveCache:
+    """LRU behaviour of the fitted curve cache"""
+
+    def test_03_hit_until_invalidated(self):
+        cache = CurveCache(ttl_seconds=60, max_entries=4)
+        key = CurveCache.key("gsec", date(2025, 6, 15), "cubic_spline")
+        curve = benchmark_curve()
+
+        assert cache.get(key) is None
+        cache.set(key, curve, cache.generation)
+        assert cache.get(key) is curve
+
+        cache.invalidate()
+        assert cache.get(key) is None
+        print("✓ Cache hit until invalidation")
+
+    def test_04_stale_build_not_cached(self):
+        cache = CurveCache(ttl_seconds=60, max_entries=4)
+        key = CurveCache.key("AAA", date(2025, 6, 15), "cubic_spline")
+
+        generation = cache.generation
+        cache.invalidate()  # fi_instruments changed while the curve was being built
+        cache.set(key, benchmark_curve(), generation)
+        assert cache.get(key) is None
+        print("✓ Stale builds are discarded")
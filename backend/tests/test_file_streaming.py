@@ -0,0 +1,99 @@
+"""
+GridFS File Streaming Tests (no MongoDB required)
+=================================================
+1. Range headers: explicit, open-ended, suffix, clamped, multi-range, unsatisfiable
+2. ETags: md5-based when present, stable fallback, If-None-Match matching
+3. Hot file cache: byte budget eviction, TTL expiry, invalidation
+4. Only small files of hot categories are cached
+"""
+
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+pytest.importorskip("motor")
+
+from bson import ObjectId
+
+from services.file_streaming import (
+    HotFileCache, RangeNotSatisfiable, etag_matches, is_hot_file, make_etag, parse_range
+)
+
+
+def file_doc(length=1000, category="client_documents", md5=None):
+    doc = {
+        "_id": ObjectId("65a1b2c3d4e5f6a7b8c9d0e1"),
+        "filename": "kyc.pdf",
+        "length": length,
+        "uploadDate": datetime(2026, 1, 10, tzinfo=timezone.utc),
+        "metadata": {"category": category, "content_type": "application/pdf"},
+    }
+    if md5:
+        doc["md5"] = md5
+    return doc
+
+
+class TestRangeAndETag:
+    """Request header handling"""
+
+    def test_01_parse_range(self):
+        assert parse_range(None, 1000) is None
+        assert parse_range("bytes=0-99", 1000) == (0, 99)
+        assert parse_range("bytes=500-", 1000) == (500, 999)
+        assert parse_range("bytes=-100", 1000) == (900, 999)
+        assert parse_range("bytes=-5000", 1000) == (0, 999)
+        assert parse_range("bytes=900-5000", 1000) == (900, 999)
+        assert parse_range("bytes=0-1,5-9", 1000) is None
+        assert parse_range("bytes=abc-", 1000) is None
+        assert parse_range("items=0-5", 1000) is None
+        with pytest.raises(RangeNotSatisfiable):
+            parse_range("bytes=1000-", 1000)
+        print("✓ Range parsing")
+
+    def test_02_etags(self):
+        assert make_etag(file_doc(md5="abc123")) == '"abc123"'
+        fallback = make_etag(file_doc())
+        assert fallback == make_etag(file_doc())
+        assert fallback != make_etag(file_doc(length=1001))
+        assert fallback.startswith('"') and fallback.endswith('"')
+
+        assert etag_matches(fallback, fallback)
+        assert etag_matches(f'"other", W/{fallback}', fallback)
+        assert etag_matches("*", fallback)
+        assert not etag_matches('"other"', fallback)
+        assert not etag_matches(None, fallback)
+        print("✓ ETag generation and If-None-Match matching")
+
+
+class TestHotFileCache:
+    """In-memory cache for logos/templates"""
+
+    def test_03_budget_ttl_invalidate(self):
+        cache = HotFileCache(max_bytes=250, ttl_seconds=60)
+        for i in range(3):
+            cache.set(f"f{i}", {"length": 100}, b"x" * 100)
+        assert cache.get("f0") is None          # evicted to stay under 250 bytes
+        assert cache.get("f2")[1] == b"x" * 100
+        assert cache.size_bytes == 200
+
+        cache.invalidate("f2")
+        assert cache.get("f2") is None
+        assert cache.size_bytes == 100
+
+        short = HotFileCache(max_bytes=1000, ttl_seconds=0.01)
+        short.set("logo", {"length": 3}, b"png")
+        time.sleep(0.02)
+        assert short.get("logo") is None
+        assert short.size_bytes == 0
+        print("✓ Byte budget, TTL and invalidation")
+
+    def test_04_hot_file_policy(self):
+        assert is_hot_file(file_doc(length=20_000, category="company_logo"))
+        assert not is_hot_file(file_doc(length=20_000, category="client_documents"))
+        assert not is_hot_file(file_doc(length=50 * 1024 * 1024, category="company_logo"))
+        print("✓ Only small files of hot categories are cached")
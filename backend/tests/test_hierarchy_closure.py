@@ -0,0 +1,112 @@
+"""
+Hierarchy Closure - Unit Tests (no MongoDB required)
+====================================================
+1. Closure rows and depths follow reports_to; dangling links and cycles end chains
+2. Incremental re-linking of a moved subtree matches a full recompute
+3. The consistency diff finds missing, extra and wrong-depth rows
+4. The in-memory tree builder nests reports and cannot loop
+"""
+
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+pytest.importorskip("motor")
+
+from services.hierarchy_service import _build_tree, closure_rows_for_move, compute_closure, diff_closure
+
+# Business Head -> Regional -> Zonal -> Manager -> Employees
+ORG = {
+    "bh": None,
+    "rm": "bh",
+    "zh": "rm",
+    "mgr": "zh",
+    "emp1": "mgr",
+    "emp2": "mgr",
+    "solo": None,
+}
+
+
+def apply_move(closure, user_id, reports_to):
+    """Pure-Python mirror of update_hierarchy_closure()."""
+    subtree = {d: depth for (a, d), depth in closure.items() if a == user_id}
+    subtree[user_id] = 0
+    closure = {(a, d): depth for (a, d), depth in closure.items() if not (d in subtree and a not in subtree)}
+    if reports_to:
+        ancestors = {a: depth for (a, d), depth in closure.items() if d == reports_to}
+        ancestors[reports_to] = 0
+        closure.update(closure_rows_for_move(subtree, ancestors))
+    return closure
+
+
+class TestClosure:
+    """Closure construction and maintenance"""
+
+    def test_01_compute_closure(self):
+        closure = compute_closure(ORG)
+        assert closure[("mgr", "emp1")] == 1
+        assert closure[("bh", "emp2")] == 4
+        assert closure[("rm", "mgr")] == 2
+        assert ("solo", "emp1") not in closure
+        assert len(closure) == 4 + 4 + 3 + 2 + 1  # ancestors of emp1, emp2, mgr, zh, rm
+        assert sorted(d for (a, d) in closure if a == "zh") == ["emp1", "emp2", "mgr"]
+
+        # Manager deleted: the chain stops at the missing user
+        assert compute_closure({"a": "ghost", "b": "a"}) == {("a", "b"): 1}
+        # A cycle is cut instead of looping
+        assert compute_closure({"a": "b", "b": "a"}) == {("b", "a"): 1, ("a", "b"): 1}
+        print("✓ Closure depths follow reports_to")
+
+    def test_02_incremental_matches_recompute(self):
+        rng = random.Random(7)
+        parents = {f"u{i}": (f"u{rng.randrange(i)}" if i and rng.random() < 0.9 else None) for i in range(60)}
+        closure = compute_closure(parents)
+
+        for _ in range(200):
+            user_id = rng.choice(list(parents))
+            candidates = [None] + [
+                u for u in parents
+                if u != user_id and (user_id, u) not in closure  # no cycles (validated by callers)
+            ]
+            reports_to = rng.choice(candidates)
+            parents[user_id] = reports_to
+            closure = apply_move(closure, user_id, reports_to)
+            assert closure == compute_closure(parents)
+        print("✓ 200 incremental moves match full recomputes")
+
+
+class TestConsistency:
+    """Checker and tree assembly"""
+
+    def test_03_diff_closure(self):
+        expected = compute_closure(ORG)
+        stored = dict(expected)
+        del stored[("bh", "emp1")]
+        stored[("solo", "emp2")] = 1
+        stored[("rm", "mgr")] = 5
+
+        diff = diff_closure(expected, stored)
+        assert diff == {"missing": [("bh", "emp1")], "extra": [("solo", "emp2")], "wrong_depth": [("rm", "mgr")]}
+        assert diff_closure(expected, dict(expected)) == {"missing": [], "extra": [], "wrong_depth": []}
+        print("✓ Consistency diff reports missing/extra/wrong-depth rows")
+
+    def test_04_build_tree(self):
+        users = [{"id": user_id, "reports_to": manager} for user_id, manager in ORG.items()]
+        reports_by_manager = {}
+        for user in users:
+            if user["reports_to"]:
+                reports_by_manager.setdefault(user["reports_to"], []).append(user)
+
+        tree = _build_tree(users[0], reports_by_manager, set())
+        mgr = tree["direct_reports"][0]["direct_reports"][0]["direct_reports"][0]
+        assert mgr["id"] == "mgr"
+        assert [r["id"] for r in mgr["direct_reports"]] == ["emp1", "emp2"]
+
+        looped = {"a": [{"id": "b", "reports_to": "a"}], "b": [{"id": "a", "reports_to": "b"}]}
+        root = _build_tree({"id": "a", "reports_to": "b"}, looped, set())
+        assert root["direct_reports"][0]["direct_reports"] == []
+        print("✓ Tree built in memory without revisiting users")
@@ -0,0 +1,87 @@
+"""
+Test Inventory Ledger & Reconciliation
+Tests the incremental inventory ledger and the POST /api/inventory/reconcile endpoint.
+
+Features tested:
+1. Recalculated inventory records carry the ledger counters (purchased_qty, purchased_value, ledger_version)
+2. Derived fields stay consistent with the counters (available = purchased - transferred - blocked)
+3. Reconcile (dry run) reports no drift right after a full recalculation
+4. Viewer (role 4) cannot reconcile inventory (returns 403)
+"""
+
+import pytest
+import requests
+import os
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+
+class TestInventoryLedger:
+    """Tests for the ledger-backed inventory counters"""
+
+    @pytest.fixture(scope="class")
+    def pe_desk_token(self):
+        """Get PE Desk authentication token"""
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "email": "pe@smifs.com",
+            "password": "Kutta@123"
+        })
+        if response.status_code == 200:
+            return response.json().get("token")
+        pytest.skip("PE Desk authentication failed")
+
+    @pytest.fixture(scope="class")
+    def viewer_token(self):
+        """Get Viewer authentication token"""
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "email": "testuser@smifs.com",
+            "password": "Test@123"
+        })
+        if response.status_code == 200:
+            return response.json().get("token")
+        pytest.skip("Viewer authentication failed")
+
+    def test_01_recalculate_populates_ledger_counters(self, pe_desk_token):
+        """Full recalculation should write ledger counters for every stock"""
+        headers = {"Authorization": f"Bearer {pe_desk_token}"}
+        response = requests.post(f"{BASE_URL}/api/inventory/recalculate", headers=headers)
+        assert response.status_code == 200, f"Recalculate failed: {response.text}"
+
+        response = requests.get(f"{BASE_URL}/api/inventory", headers=headers)
+        assert response.status_code == 200
+        items = response.json()
+        if not items:
+            pytest.skip("No inventory records to verify")
+
+        for item in items:
+            if "purchased_qty" not in item:
+                continue
+            expected_available = max(0, item["purchased_qty"] - item.get("transferred_qty", 0) - item.get("blocked_qty", 0))
+            assert item["available_quantity"] == expected_available, \
+                f"Available quantity mismatch for {item.get('stock_symbol')}"
+        print(f"✓ Ledger counters consistent for {len(items)} inventory records")
+
+    def test_02_reconcile_dry_run_reports_no_drift(self, pe_desk_token):
+        """Right after a recalculation the ledger should match a full recompute"""
+        headers = {"Authorization": f"Bearer {pe_desk_token}"}
+        response = requests.post(f"{BASE_URL}/api/inventory/recalculate", headers=headers)
+        assert response.status_code == 200
+
+        response = requests.post(f"{BASE_URL}/api/inventory/reconcile?repair=false", headers=headers)
+        assert response.status_code == 200, f"Reconcile failed: {response.text}"
+
+        data = response.json()
+        for key in ("checked", "skipped_in_flight", "drifted", "repaired", "drift"):
+            assert key in data
+        assert data["repaired"] == 0, "Dry run must not repair anything"
+        assert data["drifted"] == 0, f"Unexpected drift: {data['drift'][:3]}"
+        print(f"✓ Reconcile checked {data['checked']} stocks, {data['skipped_in_flight']} skipped as in-flight")
+
+    def test_03_viewer_cannot_reconcile(self, viewer_token):
+        """Viewer (role 4) should not be able to reconcile inventory"""
+        response = requests.post(
+            f"{BASE_URL}/api/inventory/reconcile",
+            headers={"Authorization": f"Bearer {viewer_token}"}
+        )
+        assert response.status_code == 403, f"Expected 403, got {response.status_code}: {response.text}"
+        print("✓ Viewer correctly blocked from reconciling inventory")
@@ -0,0 +1,114 @@
+"""
+Inventory Reservation Idempotency - Unit Tests (no MongoDB required)
+====================================================================
+1. Only the call that applied a reservation reports reserved=True
+2. A replay while the first reservation is still in flight fails instead of succeeding
+3. A reservation event left behind by a dead request is cleared and retried
+4. A failed availability guard drops the unapplied event
+"""
+
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+pytest.importorskip("motor")
+
+import services.inventory_service as inv
+from pymongo.errors import DuplicateKeyError
+
+
+class FakeLedger:
+    def __init__(self):
+        self.events = {}
+
+    async def insert_one(self, doc):
+        if doc["_id"] in self.events:
+            raise DuplicateKeyError("duplicate")
+        self.events[doc["_id"]] = dict(doc)
+
+    async def find_one(self, query, projection=None):
+        event = self.events.get(query["_id"])
+        return dict(event) if event else None
+
+    async def delete_one(self, query):
+        event = self.events.get(query["_id"])
+        if event and all(event.get(k) == v for k, v in query.items()):
+            del self.events[query["_id"]]
+
+    async def update_one(self, query, update):
+        self.events[query["_id"]].update(update["$set"])
+
+
+class FakeInventory:
+    async def find_one(self, query, projection=None):
+        return {"stock_id": query["stock_id"], "available_quantity": 5}
+
+
+class FakeDb:
+    def __init__(self):
+        self.inventory_ledger = FakeLedger()
+        self.inventory = FakeInventory()
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    db = FakeDb()
+    state = {"available": 10, "blocked": 0}
+
+    async def ensure_ledger(stock_id):
+        return {"stock_id": stock_id}
+
+    async def apply_delta(stock_id, deltas, guard=None):
+        qty = deltas["blocked_qty"]
+        if guard and state["available"] < guard["available_qty"]["$gte"]:
+            return None
+        state["available"] -= qty
+        state["blocked"] += qty
+        return {"available_quantity": state["available"]}
+
+    monkeypatch.setattr(inv, "db", db)
+    monkeypatch.setattr(inv, "ensure_ledger", ensure_ledger)
+    monkeypatch.setattr(inv, "_apply_delta", apply_delta)
+    return db, state
+
+
+class TestReservation:
+    def test_01_only_the_applier_reserved(self, fake):
+        db, state = fake
+        first = asyncio.run(inv.check_and_reserve_inventory("s1", 4, "b1"))
+        replay = asyncio.run(inv.check_and_reserve_inventory("s1", 4, "b1"))
+        assert first[0] and first[3] is True
+        assert replay[0] and replay[3] is False
+        assert state["blocked"] == 4 and db.inventory_ledger.events["reserve:b1"]["applied"] is True
+        print("✓ Replays report success without claiming the reservation")
+
+    def test_02_in_flight_replay_fails(self, fake):
+        db, state = fake
+        db.inventory_ledger.events["reserve:b1"] = {
+            "_id": "reserve:b1", "applied": False,
+            "created_at": datetime.now(timezone.utc).isoformat()
+        }
+        success, message, _, reserved = asyncio.run(inv.check_and_reserve_inventory("s1", 4, "b1"))
+        assert not success and not reserved and "in progress" in message
+        assert state["blocked"] == 0
+        print("✓ A reservation still being applied is not reported as done")
+
+    def test_03_stale_event_retried(self, fake):
+        db, state = fake
+        old = datetime.now(timezone.utc) - timedelta(seconds=inv.RECONCILE_GRACE_SECONDS + 60)
+        db.inventory_ledger.events["reserve:b1"] = {"_id": "reserve:b1", "applied": False, "created_at": old.isoformat()}
+        success, _, _, reserved = asyncio.run(inv.check_and_reserve_inventory("s1", 4, "b1"))
+        assert success and reserved and state["blocked"] == 4
+        print("✓ Abandoned reservation events are cleared")
+
+    def test_04_guard_failure_drops_event(self, fake):
+        db, state = fake
+        success, _, _, reserved = asyncio.run(inv.check_and_reserve_inventory("s1", 50, "b1"))
+        assert not success and not reserved
+        assert "reserve:b1" not in db.inventory_ledger.events
+        print("✓ Insufficient inventory leaves no event behind")
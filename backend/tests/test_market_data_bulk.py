@@ -0,0 +1,400 @@
+"""
+Market Data Bulk Ingestion & Time-Series History Tests (no MongoDB required)
+============================================================================
+1. The mock provider quotes a whole batch from one instrument query
+2. A refresh writes each batch with one bulk_write and one insert_many;
+   ISINs a provider quoted are not quoted again by the mock fallback
+3. Price ticks carry the ISIN as metadata and exact Decimal128 prices
+4. Daily price bars come from one windowed aggregation over the time series
+5. Benchmark: 5,000 ISINs through the mock provider with 1 ms per round trip
+6. Concurrent startups copy the legacy history once; a failed copy is retried
+7. A copy whose lease ran out is taken over and redone without duplicate ticks
+"""
+
+import asyncio
+import math
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+from types import SimpleNamespace
+from decimal import Decimal
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+pytest.importorskip("motor")
+
+import fixed_income.market_data_service as mds
+from bson.decimal128 import Decimal128
+from pymongo.errors import DuplicateKeyError
+from fixed_income.market_data_service import (
+    MarketDataConfig,
+    MarketDataService,
+    MarketQuote,
+    MockMarketDataProvider,
+    PRICE_TICKS_COLLECTION
+)
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return self.docs
+
+
+class FakeCollection:
+    """Counts round trips; latency simulates the network"""
+
+    def __init__(self, docs=None, latency=0.0):
+        self.docs = docs or []
+        self.latency = latency
+        self.calls = []
+        self.written = []
+        self.pipelines = []
+        self.aggregate_result = []
+
+    def find(self, query, projection=None):
+        self.calls.append("find")
+        if "isin" in query:
+            wanted = set(query["isin"]["$in"])
+            docs = [dict(d) for d in self.docs if d["isin"] in wanted]
+        else:
+            docs = [{"isin": d["isin"]} for d in self.docs if d.get("is_active")]
+        return self._cursor(docs)
+
+    def _cursor(self, docs):
+        collection = self
+
+        class Cursor(FakeCursor):
+            async def to_list(self, length):
+                await asyncio.sleep(collection.latency)
+                return self.docs
+
+        return Cursor(docs)
+
+    async def bulk_write(self, operations, ordered=True):
+        assert ordered is False
+        await asyncio.sleep(self.latency)
+        self.calls.append("bulk_write")
+        self.written.extend(operations)
+
+    async def insert_many(self, docs, ordered=True):
+        assert ordered is False
+        await asyncio.sleep(self.latency)
+        self.calls.append("insert_many")
+        self.written.extend(docs)
+
+    async def update_one(self, *args, **kwargs):
+        self.calls.append("update_one")
+
+    async def insert_one(self, *args, **kwargs):
+        self.calls.append("insert_one")
+
+    def aggregate(self, pipeline):
+        self.pipelines.append(pipeline)
+        return FakeCursor(self.aggregate_result)
+
+
+class FakeDb:
+    def __init__(self, instruments, latency=0.0):
+        self.fi_instruments = FakeCollection(instruments, latency)
+        self.ticks = FakeCollection(latency=latency)
+
+    def __getitem__(self, name):
+        assert name == PRICE_TICKS_COLLECTION
+        return self.ticks
+
+    def round_trips(self):
+        return len(self.fi_instruments.calls) + len(self.ticks.calls)
+
+
+class HalfProvider:
+    """A real provider that only quotes every other ISIN"""
+
+    config = MarketDataConfig(provider="nse")
+
+    def __init__(self):
+        self.requested = []
+
+    async def get_bulk_quotes(self, isins):
+        self.requested.append(list(isins))
+        return [quote(isin, "101.50", "NSE") for isin in isins[::2]]
+
+
+def instruments(count):
+    return [
+        {"isin": f"INE{i:09d}", "is_active": True, "face_value": 100, "coupon_rate": 8.5,
+         "current_market_price": "100.00"}
+        for i in range(count)
+    ]
+
+
+def quote(isin, price, exchange="MOCK"):
+    return MarketQuote(isin=isin, last_price=Decimal(price), last_yield=Decimal("8.37"),
+                       volume=100, trade_date=date(2026, 2, 2), exchange=exchange)
+
+
+def service():
+    svc = MarketDataService()
+    svc.mock_provider = MockMarketDataProvider(MarketDataConfig(provider="mock"))
+    return svc
+
+
+class TestBulkIngestion:
+    """Batched provider calls and unordered bulk writes"""
+
+    def test_01_mock_bulk_quotes_one_query(self, monkeypatch):
+        fake = FakeDb(instruments(50))
+        monkeypatch.setattr(mds, "db", fake)
+
+        isins = [d["isin"] for d in fake.fi_instruments.docs]
+        quotes = asyncio.run(MockMarketDataProvider(MarketDataConfig(provider="mock")).get_bulk_quotes(isins))
+
+        assert sorted(q.isin for q in quotes) == sorted(isins)
+        assert fake.fi_instruments.calls == ["find"]
+        assert all(Decimal("99.4") <= q.last_price <= Decimal("100.6") for q in quotes)
+        print("✓ 50 mock quotes from one instrument query")
+
+    def test_02_refresh_batches_and_fallback(self, monkeypatch):
+        fake = FakeDb(instruments(25))
+        monkeypatch.setattr(mds, "db", fake)
+        monkeypatch.setattr(mds, "MARKET_DATA_BATCH_SIZE", 10)
+        svc = service()
+        provider = HalfProvider()
+        svc.providers = [provider]
+
+        result = asyncio.run(svc.update_all_prices())
+
+        assert result["updated"] == 25 and result["errors"] == 0
+        assert [len(batch) for batch in provider.requested] == [10, 10, 5]
+        assert "update_one" not in fake.fi_instruments.calls and "insert_one" not in fake.ticks.calls
+        # 3 provider batches (13 quoted) + 2 mock batches (12 left)
+        assert fake.fi_instruments.calls.count("bulk_write") == 5
+        assert fake.ticks.calls.count("insert_many") == 5
+
+        ticks = {t["isin"]: t for t in fake.ticks.written}
+        assert len(ticks) == 25 and len(fake.ticks.written) == 25
+        assert ticks["INE000000000"]["exchange"] == "NSE"
+        assert ticks["INE000000001"]["exchange"] == "MOCK"
+        print("✓ Provider batches written in bulk; only unquoted ISINs fall back to mock")
+
+    def test_03_tick_and_instrument_documents(self, monkeypatch):
+        fake = FakeDb([])
+        monkeypatch.setattr(mds, "db", fake)
+
+        saved = asyncio.run(service().save_quotes([
+            quote("INE1", "101.10"), quote("INE1", "101.25"), quote("INE2", "99.80")
+        ]))
+
+        assert saved == 2
+        update = fake.fi_instruments.written[0]
+        assert update._filter == {"isin": "INE1"}
+        assert update._doc["$set"]["current_market_price"] == "101.25"
+        tick = fake.ticks.written[0]
+        assert tick["isin"] == "INE1" and tick["price"] == Decimal128("101.25")
+        assert tick["yield"] == Decimal128("8.37") and tick["ts"].tzinfo is not None
+        print("✓ One update and one tick per ISIN, last quote wins")
+
+
+class TestPriceHistory:
+    """Reads from the time-series collection"""
+
+    def test_04_daily_bars(self, monkeypatch):
+        fake = FakeDb([])
+        fake.ticks.aggregate_result = [
+            {"_id": "2026-02-02", "open": Decimal128("100.10"), "high": Decimal128("100.90"),
+             "low": Decimal128("99.95"), "close": Decimal128("100.50"), "yield": Decimal128("8.41"),
+             "volume": 1200, "exchange": "NSE", "moving_average": Decimal128("100.50"),
+             "previous_close": None},
+            {"_id": "2026-02-03", "open": Decimal128("100.50"), "high": Decimal128("101.00"),
+             "low": Decimal128("100.40"), "close": Decimal128("100.80"), "yield": Decimal128("8.39"),
+             "volume": 900, "exchange": "NSE", "moving_average": Decimal128("100.65"),
+             "previous_close": Decimal128("100.50")},
+        ]
+        monkeypatch.setattr(mds, "db", fake)
+
+        history = asyncio.run(mds.get_daily_prices("INE1", date(2026, 2, 1), date(2026, 2, 3)))
+
+        (pipeline,) = fake.ticks.pipelines
+        match = pipeline[0]["$match"]
+        assert match["isin"] == "INE1"
+        assert match["ts"]["$gte"] == datetime(2026, 1, 31, 18, 30, tzinfo=timezone.utc)
+        assert match["ts"]["$lt"] == datetime(2026, 2, 3, 18, 30, tzinfo=timezone.utc)
+        assert any("$setWindowFields" in stage for stage in pipeline)
+        assert [row["date"] for row in history] == ["2026-02-02", "2026-02-03"]
+        assert history[1]["close"] == history[1]["price"] == "100.80"
+        assert history[1]["sma_5"] == "100.65" and history[1]["change"] == "0.30"
+        assert history[0]["change"] is None
+        print("✓ Daily OHLC bars with moving average from one aggregation")
+
+
+class TestBulkBenchmark:
+    """Round trips of a full refresh through the mock provider"""
+
+    def test_05_benchmark(self, monkeypatch):
+        count = 5000
+        fake = FakeDb(instruments(count), latency=0.001)
+        monkeypatch.setattr(mds, "db", fake)
+
+        started = time.perf_counter()
+        result = asyncio.run(service().update_all_prices())
+        elapsed = time.perf_counter() - started
+
+        batches = math.ceil(count / mds.MARKET_DATA_BATCH_SIZE)
+        assert result["updated"] == count
+        # One active-ISIN query, then per batch: instrument query, bulk_write, insert_many
+        assert fake.round_trips() == 1 + 3 * batches
+        # The per-quote path needed a find_one, update_one and insert_one per ISIN
+        per_quote_estimate = 1 + 3 * count
+        print(f"✓ {count} ISINs: {fake.round_trips()} round trips in {elapsed * 1000:.0f} ms "
+              f"(per-quote path: {per_quote_estimate} round trips, "
+              f"~{per_quote_estimate * fake.ticks.latency:.1f} s of latency alone)")
+
+
+def matches(doc, query):
+    for key, value in query.items():
+        if isinstance(value, dict) and "$lt" in value:
+            if key not in doc or not doc[key] < value["$lt"]:
+                return False
+        elif doc.get(key) != value:
+            return False
+    return True
+
+
+class FakeStateCollection:
+    def __init__(self):
+        self.docs = {}
+
+    async def insert_one(self, doc):
+        await asyncio.sleep(0)
+        if doc["_id"] in self.docs:
+            raise DuplicateKeyError("duplicate")
+        self.docs[doc["_id"]] = dict(doc)
+
+    async def update_one(self, query, update):
+        doc = self.docs.get(query["_id"])
+        if not doc or not matches(doc, query):
+            return SimpleNamespace(matched_count=0)
+        doc.update(update["$set"])
+        for key in update.get("$unset", {}):
+            doc.pop(key, None)
+        return SimpleNamespace(matched_count=1)
+
+    async def find_one_and_update(self, query, update):
+        doc = self.docs.get(query["_id"])
+        if not doc or not matches(doc, query):
+            return None
+        before = dict(doc)
+        doc.update(update["$set"])
+        return before
+
+    async def delete_one(self, query):
+        doc = self.docs.get(query["_id"])
+        if doc and matches(doc, query):
+            del self.docs[query["_id"]]
+
+
+class FakeLegacyCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def batch_size(self, size):
+        return self
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for row in self.rows:
+            yield dict(row)
+
+
+class FakeTickCollection(FakeCollection):
+    async def delete_many(self, query):
+        self.written = [t for t in self.written if not matches(t, query)]
+
+
+class FakeMigrationDb(FakeDb):
+    def __init__(self):
+        super().__init__([])
+        self.ticks = FakeTickCollection()
+        self.market_data_state = FakeStateCollection()
+        self.fi_price_history = SimpleNamespace(find=lambda query, projection: FakeLegacyCursor(self.legacy))
+        self.legacy = []
+
+    async def list_collection_names(self, filter=None):
+        return [PRICE_TICKS_COLLECTION]
+
+    async def create_index(self, *args, **kwargs):
+        pass
+
+
+class TestLegacyCopy:
+    """One-time copy of fi_price_history"""
+
+    def test_06_copy_claimed_once(self, monkeypatch):
+        fake = FakeMigrationDb()
+        fake.ticks.create_index = fake.create_index
+        monkeypatch.setattr(mds, "db", fake)
+        copies = []
+
+        async def copy(claim_id):
+            copies.append(claim_id)
+            await asyncio.sleep(0.01)
+            if len(copies) == 1:
+                raise RuntimeError("connection reset")
+            return 7
+
+        monkeypatch.setattr(mds, "copy_legacy_price_history", copy)
+
+        async def startups():
+            await asyncio.gather(mds.ensure_price_history(), mds.ensure_price_history())
+
+        asyncio.run(startups())
+        assert len(copies) == 1 and "price_history" not in fake.market_data_state.docs
+
+        asyncio.run(startups())
+        state = fake.market_data_state.docs["price_history"]
+        assert len(copies) == 2
+        assert state["status"] == "copied" and state["legacy_rows"] == 7
+        print("✓ Concurrent startups copy the legacy history once; a failure releases the claim")
+
+    def test_07_stale_claim_taken_over(self, monkeypatch):
+        fake = FakeMigrationDb()
+        fake.ticks.create_index = fake.create_index
+        monkeypatch.setattr(mds, "db", fake)
+        monkeypatch.setattr(mds, "MARKET_DATA_BATCH_SIZE", 2)
+        fake.legacy = [
+            {"isin": "INE000000001", "price": 100.5 + i, "date": f"2024-01-0{i + 1}"}
+            for i in range(5)
+        ]
+        live = {"ts": datetime.now(timezone.utc), "isin": "INE000000001", "price": Decimal128("101.00")}
+        # A worker was killed after copying two rows; a live tick arrived since
+        fake.ticks.written = [
+            {"ts": datetime(2024, 1, 1, tzinfo=timezone.utc), "isin": "INE000000001", "source": "legacy"},
+            {"ts": datetime(2024, 1, 2, tzinfo=timezone.utc), "isin": "INE000000001", "source": "legacy"},
+            live
+        ]
+        now = datetime.now(timezone.utc)
+        held = {"_id": "price_history", "status": "copying", "claim_id": "dead",
+                "started_at": now.isoformat(), "lease_until": now + timedelta(seconds=60)}
+        fake.market_data_state.docs["price_history"] = dict(held)
+
+        asyncio.run(mds.ensure_price_history())
+        assert fake.market_data_state.docs["price_history"]["claim_id"] == "dead"
+        assert len(fake.ticks.written) == 3
+
+        fake.market_data_state.docs["price_history"]["lease_until"] = now - timedelta(seconds=1)
+        asyncio.run(mds.ensure_price_history())
+
+        state = fake.market_data_state.docs["price_history"]
+        assert state["status"] == "copied" and state["legacy_rows"] == 5
+        assert state["claim_id"] != "dead" and "lease_until" not in state
+        legacy = [t for t in fake.ticks.written if t.get("source") == "legacy"]
+        assert sorted(t["trade_date"] for t in legacy) == [r["date"] for r in fake.legacy]
+        assert live in fake.ticks.written and len(fake.ticks.written) == 6
+        print("✓ An expired claim is taken over and the legacy copy is redone without duplicates")
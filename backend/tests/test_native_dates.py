@@ -0,0 +1,141 @@
+"""
+Native Date Fields - Unit Tests (no MongoDB required)
+=====================================================
+1. ISO strings, naive timestamps and bare dates parse to aware UTC datetimes
+2. IST day bounds: a bare date covers IST midnight to the next IST midnight
+3. date_range() filters the _dt field and falls back to the string on legacy rows
+4. add_date_range() keeps an existing $or; inserts carry the native twins
+5. The backfill sets _dt on string-only documents in bulk and skips garbage
+"""
+
+import asyncio
+import os
+import sys
+from datetime import date, datetime, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+pytest.importorskip("motor")
+
+import services.native_dates as nd
+from utils.dates import (
+    add_date_range,
+    date_range,
+    ist_date,
+    ist_day_bounds,
+    parse_datetime,
+    with_native_dates
+)
+
+UTC = timezone.utc
+
+
+class FakeCollection:
+    """find() over in-memory documents; bulk_write applies $set updates"""
+
+    def __init__(self, docs):
+        self.docs = {doc["_id"]: doc for doc in docs}
+        self.bulk_writes = 0
+
+    def find(self, query, projection=None):
+        native = next(key for key in query if key.endswith("_dt"))
+        field = native[:-3]
+        matches = [
+            dict(doc) for doc in self.docs.values()
+            if native not in doc and isinstance(doc.get(field), str)
+        ]
+        return FakeCursor(matches)
+
+    async def bulk_write(self, operations, ordered=True):
+        self.bulk_writes += 1
+        for op in operations:
+            self.docs[op._filter["_id"]].update(op._doc["$set"])
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def batch_size(self, size):
+        return self
+
+    def __aiter__(self):
+        self._iter = iter(self.docs)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class TestNativeDates:
+    """Parsing, IST ranges, dual-write and backfill"""
+
+    def test_01_parse(self):
+        expected = datetime(2026, 2, 1, 10, 0, tzinfo=UTC)
+        assert parse_datetime("2026-02-01T10:00:00+00:00") == expected
+        assert parse_datetime("2026-02-01T10:00:00Z") == expected
+        assert parse_datetime("2026-02-01T10:00:00") == expected
+        assert parse_datetime("2026-02-01T15:30:00+05:30") == expected
+        assert parse_datetime("2026-02-01") == datetime(2026, 1, 31, 18, 30, tzinfo=UTC)
+        assert parse_datetime("not a date") is None and parse_datetime(None) is None
+        # 20:00 UTC is already the next day in IST
+        assert ist_date("2026-02-01T20:00:00+00:00") == "2026-02-02"
+        print("✓ Stored date values parse to UTC datetimes")
+
+    def test_02_ist_day_bounds(self):
+        start, end = ist_day_bounds(date(2026, 2, 1))
+        assert start == datetime(2026, 1, 31, 18, 30, tzinfo=UTC)
+        assert end == datetime(2026, 2, 1, 18, 30, tzinfo=UTC)
+        assert ist_day_bounds(date(2026, 2, 1))[0] is start
+        print("✓ IST day bounds computed once per date")
+
+    def test_03_date_range(self):
+        condition = date_range("created_at", "2026-02-01", "2026-02-03")
+        native, legacy = condition["$or"]
+        assert native == {"created_at_dt": {
+            "$gte": datetime(2026, 1, 31, 18, 30, tzinfo=UTC),
+            "$lt": datetime(2026, 2, 3, 18, 30, tzinfo=UTC)
+        }}
+        assert legacy == {
+            "created_at_dt": {"$exists": False},
+            "created_at": {"$gte": "2026-01-31T18:30:00+00:00", "$lt": "2026-02-03T18:30:00+00:00"}
+        }
+        since = datetime(2026, 2, 1, 9, 0, tzinfo=UTC)
+        assert date_range("timestamp", since)["$or"][0] == {"timestamp_dt": {"$gte": since}}
+        assert date_range("created_at") == {}
+        print("✓ Ranges on the native field with a string fallback")
+
+    def test_04_add_date_range_and_dual_write(self):
+        query = {"$or": [{"client_id": "c1"}, {"created_by": "u1"}], "is_voided": {"$ne": True}}
+        add_date_range(query, "created_at", "2026-02-01", None)
+        assert query["$or"] == [{"client_id": "c1"}, {"created_by": "u1"}]
+        assert len(query["$and"]) == 1 and "$or" in query["$and"][0]
+
+        booking = {"id": "b1", "created_at": "2026-02-01T10:00:00+00:00"}
+        stored = with_native_dates("bookings", booking)
+        assert stored["created_at_dt"] == datetime(2026, 2, 1, 10, 0, tzinfo=UTC)
+        assert "created_at_dt" not in booking
+        assert with_native_dates("stocks", {"created_at": "2026-02-01"}) == {"created_at": "2026-02-01"}
+        print("✓ Existing $or kept; inserts carry native dates without touching the caller's dict")
+
+    def test_05_backfill(self, monkeypatch):
+        collection = FakeCollection([
+            {"_id": 1, "created_at": "2026-02-01T10:00:00+00:00"},
+            {"_id": 2, "created_at": "2026-02-02T10:00:00"},
+            {"_id": 3, "created_at": "garbage"},
+            {"_id": 4, "created_at": "2026-02-03T10:00:00", "created_at_dt": datetime(2026, 2, 3, 10, 0)},
+        ])
+        monkeypatch.setattr(nd, "db", {"bookings": collection})
+        monkeypatch.setattr(nd, "NATIVE_DATES_BATCH_SIZE", 1)
+
+        result = asyncio.run(nd.backfill_field("bookings", "created_at"))
+        assert result == {"updated": 2, "unparseable": 1}
+        assert collection.bulk_writes == 2
+        assert collection.docs[2]["created_at_dt"] == datetime(2026, 2, 2, 10, 0, tzinfo=UTC)
+        assert "created_at_dt" not in collection.docs[3]
+        print("✓ Backfill adds native dates in batches and skips unparseable strings")
@@ -0,0 +1,151 @@
+"""
+OCR Pipeline - Unit Tests (local stub extractor, no LLM or MongoDB required)
+============================================================================
+1. A stub extractor's response is parsed and post-processed like the LLM's
+2. Identical bytes + doc type hit the result cache; an explicit rerun bypasses it
+3. Unparseable responses are not cached
+4. At most OCR_MAX_CONCURRENCY documents are OCR'd at once
+5. Concurrent requests for the same bytes share one extraction
+"""
+
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+pytest.importorskip("motor")
+pytest.importorskip("aiofiles")
+
+import services.ocr_service as ocr
+from services.ocr_service import ocr_document_bytes, set_ocr_extractor
+
+PAN_RESPONSE = json.dumps({
+    "pan_number": "abcde 1234f",
+    "name": "MR RAHUL SHARMA",
+    "father_name": "SURESH SHARMA",
+    "date_of_birth": "01-02-1985"
+})
+
+
+class StubExtractor:
+    """Records calls; returns a fixed response after an optional delay"""
+
+    def __init__(self, response=PAN_RESPONSE, delay=0.0):
+        self.response = response
+        self.delay = delay
+        self.calls = 0
+        self.active = 0
+        self.peak = 0
+
+    async def __call__(self, image_base64, prompt, system_message):
+        self.calls += 1
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            return self.response
+        finally:
+            self.active -= 1
+
+
+@pytest.fixture(autouse=True)
+def memory_cache(monkeypatch):
+    """Swap db.ocr_cache for a dict and reset pipeline state between tests"""
+    store = {}
+
+    async def cache_get(key):
+        return store.get(key)
+
+    async def cache_put(key, doc_type, result):
+        store[key] = result
+
+    monkeypatch.setattr(ocr, "_cache_get", cache_get)
+    monkeypatch.setattr(ocr, "_cache_put", cache_put)
+    monkeypatch.setattr(ocr, "_ocr_semaphore", None)
+    previous = set_ocr_extractor(None)
+    yield store
+    set_ocr_extractor(previous)
+
+
+class TestOcrPipeline:
+    """Stub extraction, caching, concurrency"""
+
+    def test_01_stub_extractor_post_processed(self):
+        set_ocr_extractor(StubExtractor())
+        result = asyncio.run(ocr_document_bytes(b"\x89PNG pan", "pan_card", ".png"))
+
+        assert result["status"] == "processed"
+        assert result["extracted_data"]["pan_number"] == "ABCDE1234F"
+        assert result["extracted_data"]["name"] == "Rahul Sharma"
+        assert result["confidence"] == 100
+        assert "cached" not in result
+        print("✓ Stub response parsed and validated as a PAN card")
+
+    def test_02_cache_hit_and_rerun(self, memory_cache):
+        stub = StubExtractor()
+        set_ocr_extractor(stub)
+
+        async def scenario():
+            first = await ocr_document_bytes(b"same-bytes", "pan_card", "jpg")
+            second = await ocr_document_bytes(b"same-bytes", "pan_card", "jpg")
+            other_type = await ocr_document_bytes(b"same-bytes", "cml_copy", "jpg")
+            rerun = await ocr_document_bytes(b"same-bytes", "pan_card", "jpg", use_cache=False)
+            return first, second, other_type, rerun
+
+        first, second, other_type, rerun = asyncio.run(scenario())
+
+        assert second["cached"] is True
+        assert second["extracted_data"] == first["extracted_data"]
+        assert "cached" not in other_type
+        assert "cached" not in rerun
+        # pan_card once, cml_copy once, explicit rerun once
+        assert stub.calls == 3
+        assert len(memory_cache) == 2
+        print("✓ Re-upload served from cache; rerun and other doc types extract again")
+
+    def test_03_unparseable_not_cached(self, memory_cache):
+        stub = StubExtractor(response="sorry, I cannot read this")
+        set_ocr_extractor(stub)
+
+        async def scenario():
+            await ocr_document_bytes(b"blurry", "pan_card", "jpg")
+            return await ocr_document_bytes(b"blurry", "pan_card", "jpg")
+
+        result = asyncio.run(scenario())
+        assert result["confidence"] == 0 and "parse_error" in result["extracted_data"]
+        assert stub.calls == 2 and not memory_cache
+        print("✓ Failed extractions are retried instead of cached")
+
+    def test_04_bounded_concurrency(self, monkeypatch):
+        monkeypatch.setattr(ocr, "OCR_MAX_CONCURRENCY", 2)
+        stub = StubExtractor(delay=0.05)
+        set_ocr_extractor(stub)
+
+        async def scenario():
+            return await asyncio.gather(*[
+                ocr_document_bytes(f"doc-{i}".encode(), "pan_card", "jpg") for i in range(6)
+            ])
+
+        results = asyncio.run(scenario())
+        assert all(r["status"] == "processed" for r in results)
+        assert stub.calls == 6 and stub.peak == 2
+        print(f"✓ 6 documents OCR'd with peak concurrency {stub.peak}")
+
+    def test_05_inflight_deduplicated(self):
+        stub = StubExtractor(delay=0.05)
+        set_ocr_extractor(stub)
+
+        async def scenario():
+            return await asyncio.gather(*[
+                ocr_document_bytes(b"uploaded-twice", "pan_card", "jpg") for _ in range(3)
+            ])
+
+        results = asyncio.run(scenario())
+        assert stub.calls == 1
+        assert all(r["extracted_data"] == results[0]["extracted_data"] for r in results)
+        assert not ocr._inflight
+        print("✓ Concurrent identical documents share one extraction")
@@ -0,0 +1,158 @@
+"""
+Search Index - Unit Tests (no MongoDB required)
+===============================================
+1. Keys are the lowercased bigrams/trigrams of the searchable fields
+2. Narrowing by query grams never loses a regex match (randomized)
+3. Searches the index cannot answer fall back to the plain regex
+4. Index candidates are combined with the regex and the endpoint filters
+"""
+
+import asyncio
+import os
+import random
+import re
+import string
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+pytest.importorskip("motor")
+
+import services.search_index as search_module
+from services.search_index import (
+    and_search, ngrams, query_grams, regex_condition, search_condition, search_keys
+)
+
+
+class FakeFind:
+    def __init__(self, rows):
+        self.rows = rows
+        self.limit_value = None
+
+    def limit(self, n):
+        self.limit_value = n
+        return self
+
+    async def to_list(self, length):
+        return self.rows[:self.limit_value]
+
+
+class FakeSearchIndex:
+    """db.search_index stand-in answering {collection, keys: {$all: grams}}."""
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.queries = []
+
+    def find(self, query, projection=None):
+        self.queries.append(query)
+        grams = set(query["keys"]["$all"])
+        return FakeFind([
+            {"doc_id": e["doc_id"]} for e in self.entries
+            if e["collection"] == query["collection"] and grams <= set(e["keys"])
+        ])
+
+
+class FakeDb:
+    def __init__(self, entries):
+        self.search_index = FakeSearchIndex(entries)
+
+
+@pytest.fixture
+def index(monkeypatch):
+    clients = [
+        {"id": "c1", "name": "Reliance Capital", "pan_number": "AAACR1234K", "email": "ops@reliance.in"},
+        {"id": "c2", "name": "Relaxo Footwears", "pan_number": "AAACR9876Q", "phone": "9820012345"},
+        {"id": "c3", "name": "Tata Motors", "pan_number": "AAACT5555T"},
+    ]
+    entries = [{"collection": "clients", "doc_id": c["id"], "keys": search_keys("clients", c)} for c in clients]
+    fake = FakeDb(entries)
+    monkeypatch.setattr(search_module, "db", fake)
+    monkeypatch.setattr(search_module, "_built", {"clients"})
+    return fake
+
+
+class TestKeys:
+    """Key generation and query grams"""
+
+    def test_01_keys(self):
+        assert ngrams("TCS") == {"tc", "cs", "tcs"}
+        assert ngrams("A") == set()
+        keys = search_keys("stocks", {"symbol": "INFY", "name": "Infosys", "sector": None})
+        assert "inf" in keys and "sys" in keys and "fy" in keys
+        assert keys == sorted(keys)
+
+        assert query_grams("Re") == ["re"]
+        assert query_grams("RELI") == ["eli", "rel"]
+        assert query_grams("a") is None
+        assert query_grams("rel.*") is None and query_grams("(tata)") is None
+        print("✓ Lowercased bigram/trigram keys; regex and 1-char searches not indexed")
+
+    def test_02_no_false_negatives(self):
+        rng = random.Random(16)
+        alphabet = string.ascii_letters + string.digits + " @-"
+        docs = [
+            {"id": str(i), "name": "".join(rng.choice(alphabet) for _ in range(rng.randrange(0, 25))),
+             "pan_number": "".join(rng.choice(string.ascii_uppercase + string.digits) for _ in range(10))}
+            for i in range(300)
+        ]
+        keys = {d["id"]: set(search_keys("clients", d)) for d in docs}
+
+        for _ in range(500):
+            source = rng.choice(docs)[rng.choice(["name", "pan_number"])]
+            if len(source) < 2:
+                continue
+            start = rng.randrange(len(source) - 1)
+            search = source[start:start + rng.randrange(2, 8)].swapcase()
+            grams = query_grams(search)
+            if grams is None:
+                continue
+            regex = re.compile(re.escape(search), re.IGNORECASE)
+            expected = {d["id"] for d in docs if regex.search(d["name"]) or regex.search(d["pan_number"])}
+            candidates = {doc_id for doc_id, k in keys.items() if set(grams) <= k}
+            assert expected <= candidates
+        print("✓ Index candidates always include every regex match")
+
+
+class TestQueries:
+    """Query construction"""
+
+    def test_03_regex_fallback(self, index, monkeypatch):
+        fields = ["name", "pan_number"]
+
+        async def scenario():
+            return [
+                await search_condition("clients", "r", fields),             # too short
+                await search_condition("clients", "rel.*cap", fields),      # regex pattern
+                await search_condition("clients", "reli", ["name", "city"]),  # unindexed field
+                await search_condition("stocks", "reli", ["name"]),         # index not built
+            ]
+
+        results = asyncio.run(scenario())
+        assert results[0] == regex_condition("r", fields)
+        assert results[1] == regex_condition("rel.*cap", fields)
+        assert results[2] == regex_condition("reli", ["name", "city"])
+        assert results[3] == regex_condition("reli", ["name"])
+        assert index.search_index.queries == []
+
+        monkeypatch.setattr(search_module, "SEARCH_INDEX_MAX_CANDIDATES", 1)
+        assert asyncio.run(search_condition("clients", "aaac", fields)) == regex_condition("aaac", fields)
+        print("✓ Short, regex, unindexed and non-selective searches use the plain regex")
+
+    def test_04_candidates_and_filters(self, index):
+        condition = asyncio.run(search_condition("clients", "RELI", ["name", "pan_number"]))
+        assert condition == {"$and": [{"id": {"$in": ["c1"]}}, regex_condition("RELI", ["name", "pan_number"])]}
+        assert index.search_index.queries == [{"collection": "clients", "keys": {"$all": ["eli", "rel"]}}]
+
+        relx = asyncio.run(search_condition("clients", "rel", ["name"]))
+        assert relx["$and"][0] == {"id": {"$in": ["c1", "c2"]}}
+
+        visibility = {"$or": [{"mapped_employee_id": "u1"}, {"created_by": "u1"}], "is_vendor": False}
+        query = and_search(dict(visibility), condition)
+        assert query == {"$and": [visibility, condition]}
+        assert and_search({}, condition) is condition
+        with_and = and_search({"$and": [{"is_demo": {"$ne": True}}]}, condition)
+        assert with_and["$and"] == [{"is_demo": {"$ne": True}}, condition]
+        print("✓ Candidates narrowed by id, regex kept, visibility/demo filters preserved")
@@ -0,0 +1,204 @@
+"""
+Security Pipeline - Raw ASGI Middleware Tests (no MongoDB required)
+===================================================================
+1. Combined pattern sets agree with the per-pattern re.search loops
+2. Streaming bodies pass through chunk by chunk with security headers added
+3. Bots, enumeration, injection and oversized requests are rejected in one pass
+4. Rate limit returns 429; websocket/lifespan scopes bypass the pipeline
+5. A GridFS file's own Cache-Control and ETag survive the pipeline, so repeat
+   downloads get 304 Not Modified
+"""
+
+import asyncio
+import os
+import re
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+pytest.importorskip("motor")
+
+from bson import ObjectId
+from starlette.requests import Request
+from starlette.responses import StreamingResponse
+
+from middleware.bot_protection import AttackDetector, BotDetector, threat_db
+from middleware.patterns import PatternSet
+from middleware.security import RATE_LIMITS, InputSanitizer
+from middleware.security_pipeline import SecurityPipelineMiddleware
+
+BROWSER_UA = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+
+
+async def streaming_app(scope, receive, send):
+    if scope["type"] != "http":
+        scope["reached_app"] = True
+        return
+
+    async def chunks():
+        for i in range(3):
+            yield f"chunk-{i};".encode()
+
+    response = StreamingResponse(chunks(), media_type="text/plain", headers={"server": "uvicorn"})
+    await response(scope, receive, send)
+
+
+def call(path, headers=None, query=b"", client_ip=None, app=streaming_app):
+    """Run one request through the pipeline; return (status, headers, body messages)."""
+    raw_headers = [(b"user-agent", BROWSER_UA.encode())]
+    for name, value in (headers or {}).items():
+        raw_headers = [h for h in raw_headers if h[0] != name.lower().encode()]
+        raw_headers.append((name.lower().encode(), value.encode()))
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "server": ("testserver", 80),
+        "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": query, "headers": raw_headers,
+        "client": (client_ip or f"10.0.{uuid.uuid4().int % 250}.{uuid.uuid4().int % 250}", 5000),
+    }
+    messages = []
+    requests = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive():
+        if requests:
+            return requests.pop()
+        await asyncio.Event().wait()  # client stays connected
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(SecurityPipelineMiddleware(app)(scope, receive, send))
+    start = messages[0]
+    headers = {k.decode().lower(): v.decode() for k, v in start["headers"]}
+    return start["status"], headers, [m for m in messages[1:] if m["type"] == "http.response.body"]
+
+
+class TestPatternSets:
+    """Combined alternation vs per-pattern search"""
+
+    def test_01_combined_matches_loop(self):
+        samples = [
+            "/api/bookings", "/../etc/passwd", "/wp-admin/setup.php", "/backup.sql",
+            "q=1; cat /etc/shadow", "file=php://input", "url=http://127.0.0.1/x",
+            "googlebot/2.1 spider", "spider then googlebot", "name=John O'Brien",
+            "<script>alert(1)</script>", "1 OR 1=1", "filter={\"$where\": 1}", "",
+        ]
+        pattern_lists = [
+            AttackDetector.PATH_TRAVERSAL_PATTERNS, AttackDetector.DIRECTORY_ENUM_PATTERNS,
+            AttackDetector.COMMAND_INJECTION_PATTERNS, AttackDetector.FILE_INCLUSION_PATTERNS,
+            AttackDetector.SSRF_PATTERNS, BotDetector.BOT_USER_AGENTS,
+            InputSanitizer.SQL_INJECTION_PATTERNS, InputSanitizer.XSS_PATTERNS,
+            InputSanitizer.NOSQL_INJECTION_PATTERNS,
+        ]
+        for patterns in pattern_lists:
+            pattern_set = PatternSet(patterns)
+            for sample in samples:
+                expected = next((p for p in patterns if re.search(p, sample, re.IGNORECASE)), None)
+                assert pattern_set.first_match(sample) == expected, (sample, expected)
+                assert pattern_set.matches(sample) == (expected is not None)
+
+        # Category is still taken from the first pattern in list order
+        assert BotDetector.is_bot("spider then googlebot") == (True, "search_engine_crawler")
+        assert BotDetector.is_suspicious_user_agent(BROWSER_UA + " /bin/sh") == (True, "Command injection in user agent")
+        print("✓ Combined pattern sets match the ordered per-pattern loops")
+
+
+class TestPipeline:
+    """Request handling through the single ASGI middleware"""
+
+    @pytest.fixture(autouse=True)
+    def no_threat_sync(self):
+        # Keep blocked-request records in memory (no MongoDB here)
+        threat_db.last_sync = time.time() + 3600
+        yield
+        for ip in threat_db.blocked_ips:
+            threat_db.auto_blocked.unblock(ip)
+
+    def test_02_streaming_passthrough(self):
+        status, headers, bodies = call("/api/health")
+
+        assert status == 200
+        assert [m["body"] for m in bodies if m["body"]] == [b"chunk-0;", b"chunk-1;", b"chunk-2;"]
+        assert headers["x-frame-options"] == "DENY"
+        assert headers["cache-control"] == "no-cache, no-store, must-revalidate"
+        assert "server" not in headers
+
+        _, headers, _ = call("/auth/login")
+        assert headers["cache-control"] == "no-store, no-cache, must-revalidate, max-age=0"
+        print("✓ Streaming body forwarded unbuffered with security headers")
+
+    def test_03_rejections(self):
+        status, headers, _ = call("/dashboard", headers={"user-agent": "curl/8.4.0"})
+        assert status == 403 and headers["x-content-type-options"] == "nosniff"
+
+        status, _, _ = call("/wp-admin/install.php")
+        assert status == 404
+
+        status, _, _ = call("/search", query=b"q=1%20OR%201%3D1")
+        assert status == 400
+
+        status, _, _ = call("/upload", headers={"content-length": str(11 * 1024 * 1024)})
+        assert status == 413
+        status, _, _ = call("/upload", headers={"content-length": "abc"})
+        assert status == 400
+
+        # Authenticated scripts skip bot detection but not attack checks
+        token = "Bearer " + "x" * 40
+        status, _, _ = call("/reports", headers={"user-agent": "curl/8.4.0", "authorization": token})
+        assert status == 200
+        status, _, _ = call("/reports", headers={"authorization": token}, query=b"u=php://filter")
+        assert status == 403
+        print("✓ Bots, enumeration, injection and size limits rejected")
+
+    def test_04_rate_limit_and_other_scopes(self):
+        limit, window = RATE_LIMITS["default"]
+        ip = f"192.0.2.{uuid.uuid4().int % 250}"
+        statuses = [call("/rate-limited", client_ip=ip)[0] for _ in range(limit)]
+        assert statuses == [200] * limit
+
+        status, headers, _ = call("/rate-limited", client_ip=ip)
+        assert status == 429 and headers["retry-after"] == str(window)
+
+        for scope_type in ("websocket", "lifespan"):
+            scope = {"type": scope_type, "path": "/api/ws/notifications"}
+            asyncio.run(SecurityPipelineMiddleware(streaming_app)(scope, None, None))
+            assert scope["reached_app"]
+        print("✓ Rate limit enforced; non-HTTP scopes bypass the pipeline")
+
+    def test_05_file_cache_headers_survive(self):
+        from services.file_streaming import gridfs_file_response, hot_file_cache
+
+        file_id = "65a1b2c3d4e5f6a7b8c9d0e1"
+        hot_file_cache.set(file_id, {
+            "_id": ObjectId(file_id), "filename": "logo.png", "length": 4, "md5": "abc123",
+            "uploadDate": datetime(2026, 1, 10, tzinfo=timezone.utc),
+            "metadata": {"category": "company_logo", "content_type": "image/png"},
+        }, b"\x89PNG")
+
+        async def files_app(scope, receive, send):
+            # As routers/files.py: inline views are cacheable, forced downloads are not
+            cache_control = None if scope["path"].endswith("/download") else "public, max-age=31536000"
+            response = await gridfs_file_response(file_id, Request(scope, receive), cache_control=cache_control)
+            await response(scope, receive, send)
+
+        try:
+            status, headers, _ = call(f"/api/files/{file_id}", app=files_app)
+            assert status == 200 and headers["etag"] == '"abc123"'
+            assert headers["cache-control"] == "public, max-age=31536000"
+            assert "pragma" not in headers and "expires" not in headers
+            assert headers["x-frame-options"] == "DENY"
+
+            status, headers, bodies = call(f"/api/files/{file_id}", {"If-None-Match": '"abc123"'}, app=files_app)
+            assert status == 304 and not b"".join(m.get("body", b"") for m in bodies)
+            assert headers["cache-control"] == "public, max-age=31536000"
+
+            _, headers, _ = call(f"/api/files/{file_id}/download", app=files_app)
+            assert headers["cache-control"] == "no-cache, no-store, must-revalidate"
+        finally:
+            hot_file_cache.invalidate(file_id)
+        print("✓ File downloads keep their Cache-Control through the pipeline and revalidate with 304")
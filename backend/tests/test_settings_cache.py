@@ -0,0 +1,168 @@
+"""
+Settings Cache - Unit Tests (no MongoDB required)
+=================================================
+1. Settings load once, then reads are dictionary lookups (copies for get)
+2. Invalidation reloads; a failed reload keeps the last value
+3. Kill switch middleware reads the cache (503, allowed paths, PE Desk bypass)
+4. Without change streams the refresh loop polls and picks up changes
+"""
+
+import asyncio
+import os
+import sys
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+pytest.importorskip("motor")
+
+from pymongo.errors import OperationFailure
+
+import services.settings_cache as settings_module
+from middleware.kill_switch import check_kill_switch
+from services.auth_cache import user_cache
+from services.settings_cache import get_setting, invalidate_setting, settings_cache
+
+
+@pytest.fixture
+def store(monkeypatch):
+    """Back the process-wide settings cache with an in-memory document store."""
+    docs = {name: None for name in settings_cache.sources}
+    fetches = []
+
+    async def fake_fetch(name):
+        fetches.append(name)
+        if isinstance(docs[name], Exception):
+            raise docs[name]
+        return dict(docs[name]) if docs[name] is not None else None
+
+    monkeypatch.setattr(settings_cache, "_fetch", fake_fetch)
+    settings_cache._values.clear()
+    settings_cache.invalidate()
+    yield docs, fetches
+    settings_cache._values.clear()
+    settings_cache.invalidate()
+
+
+class TestSettingsCache:
+    """Cached reads and invalidation"""
+
+    def test_01_load_once(self, store):
+        docs, fetches = store
+        docs["company"] = {"company_name": "SMIFS", "custom_domain": "pe.smifs.com"}
+
+        async def scenario():
+            first = await get_setting("company")
+            first["company_name"] = "mutated"
+            second = await get_setting("company")
+            peeked = await settings_cache.peek("company")
+            return second, peeked
+
+        second, peeked = asyncio.run(scenario())
+        assert second["company_name"] == "SMIFS"
+        assert peeked is settings_cache._values["company"]
+        assert fetches == ["company"]
+        assert settings_cache.names_for_collection("company_master") == ["company"]
+        print("✓ Setting loaded once; get() hands out private copies")
+
+    def test_02_invalidate_and_failures(self, store):
+        docs, fetches = store
+        docs["smtp"] = {"smtp_host": "smtp.office365.com"}
+
+        async def scenario():
+            await get_setting("smtp")
+            docs["smtp"] = {"smtp_host": "smtp.gmail.com"}
+            unchanged = await get_setting("smtp")
+
+            invalidate_setting("smtp")
+            reloaded = await get_setting("smtp")
+
+            docs["smtp"] = ConnectionError("mongo down")
+            invalidate_setting("smtp")
+            kept = await get_setting("smtp")
+            return unchanged, reloaded, kept
+
+        unchanged, reloaded, kept = asyncio.run(scenario())
+        assert unchanged["smtp_host"] == "smtp.office365.com"
+        assert reloaded["smtp_host"] == "smtp.gmail.com"
+        assert kept["smtp_host"] == "smtp.gmail.com"
+        assert fetches == ["smtp", "smtp", "smtp"]
+        assert settings_cache.errors >= 1
+        print("✓ Invalidation reloads; failed reloads keep the last value")
+
+
+class TestKillSwitch:
+    """Middleware check served from the cache"""
+
+    def test_03_kill_switch_check(self, store):
+        docs, fetches = store
+        docs["kill_switch"] = {"setting": "kill_switch", "is_active": True,
+                               "activated_by_name": "PE Desk", "reason": "Drill"}
+        pe_desk_id, employee_id = str(uuid.uuid4()), str(uuid.uuid4())
+        user_cache.set(pe_desk_id, {"id": pe_desk_id, "role": 1})
+        user_cache.set(employee_id, {"id": employee_id, "role": 6})
+
+        import jwt
+        secret = os.environ.get("JWT_SECRET", "your-secret-key")
+
+        def bearer(user_id):
+            return "Bearer " + jwt.encode({"user_id": user_id}, secret, algorithm="HS256")
+
+        async def scenario():
+            frozen = [await check_kill_switch("/api/bookings", None) for _ in range(50)]
+            allowed = await check_kill_switch("/api/kill-switch/status", None)
+            pe_desk = await check_kill_switch("/api/bookings", bearer(pe_desk_id))
+            employee = await check_kill_switch("/api/bookings", bearer(employee_id))
+
+            docs["kill_switch"] = {"setting": "kill_switch", "is_active": False}
+            invalidate_setting("kill_switch")
+            released = await check_kill_switch("/api/bookings", None)
+            return frozen, allowed, pe_desk, employee, released
+
+        frozen, allowed, pe_desk, employee, released = asyncio.run(scenario())
+        assert all(r.status_code == 503 for r in frozen)
+        assert allowed is None and pe_desk is None and released is None
+        assert employee.status_code == 503
+        assert fetches == ["kill_switch", "kill_switch"]
+
+        # Never loaded and MongoDB down: fail open
+        settings_cache._values.clear()
+        settings_cache.invalidate()
+        docs["kill_switch"] = ConnectionError("mongo down")
+        assert asyncio.run(check_kill_switch("/api/bookings", None)) is None
+        print("✓ Kill switch check is a cache lookup; PE Desk bypass and fail-open kept")
+
+
+class TestRefreshLoop:
+    """Change stream unavailable -> polling fallback"""
+
+    def test_04_polling_fallback(self, store, monkeypatch):
+        docs, _ = store
+        docs["kill_switch"] = {"setting": "kill_switch", "is_active": False}
+
+        async def no_change_streams():
+            raise OperationFailure("The $changeStream stage is only supported on replica sets")
+
+        monkeypatch.setattr(settings_module, "_watch_changes", no_change_streams)
+        monkeypatch.setattr(settings_module, "SETTINGS_CACHE_POLL_SECONDS", 0.05)
+
+        async def scenario():
+            settings_module.start_settings_cache()
+            await asyncio.sleep(0.1)
+            before = (await settings_cache.peek("kill_switch"))["is_active"]
+
+            # Another worker activates the switch
+            docs["kill_switch"] = {"setting": "kill_switch", "is_active": True}
+            await asyncio.sleep(0.2)
+            after = (await settings_cache.peek("kill_switch"))["is_active"]
+            stats = settings_module.get_settings_cache_stats()
+            await settings_module.stop_settings_cache()
+            return before, after, stats
+
+        before, after, stats = asyncio.run(scenario())
+        assert before is False and after is True
+        assert stats["mode"] == "poll" and stats["refresh_running"]
+        assert not settings_module.get_settings_cache_stats()["refresh_running"]
+        print("✓ Standalone deployments poll; changes propagate within the interval")
@@ -0,0 +1,153 @@
+"""
+Shared Rate Limits - Local Shadow Tests (no MongoDB required)
+=============================================================
+1. Sliding-window counter allows `limit` hits, then weights the previous bucket down
+2. Key count is capped by LRU eviction (fixed memory under scanning)
+3. Block lists expire and unblock locally, queueing writes for the shared store
+4. Rate limiter and threat auto-block use the bounded structures
+5. A failed sync keeps its pending writes without losing newer ones
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+pytest.importorskip("motor")
+
+import middleware.shared_limits as shared_limits
+from middleware.shared_limits import SharedBlockList, SlidingWindowCounter, _key_id
+
+
+class FailingCollection:
+    async def bulk_write(self, operations, ordered=True):
+        await asyncio.sleep(0)
+        raise ConnectionError("mongo unavailable")
+
+
+class FailingDb:
+    rate_limit_counters = FailingCollection()
+    security_blocks = FailingCollection()
+
+
+class FakeClock:
+    def __init__(self, now=1_000_020.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestSlidingWindowCounter:
+    """Bucketed counters"""
+
+    def test_01_sliding_window(self):
+        clock = FakeClock(600.0)  # start of a 60s bucket
+        counter = SlidingWindowCounter("test", 60, clock=clock)
+
+        assert all(counter.allow("ip:/api/x", 10) for _ in range(10))
+        assert not counter.allow("ip:/api/x", 10)
+        assert counter.count("ip:/api/x") == 10
+
+        # Half-way through the next window half of the previous bucket still counts
+        clock.now += 90
+        assert counter.count("ip:/api/x") == pytest.approx(5.0)
+        assert sum(counter.allow("ip:/api/x", 10) for _ in range(10)) == 5
+
+        # Two windows later nothing is left
+        clock.now += 120
+        assert counter.count("ip:/api/x") == 0
+        assert counter.hit("ip:/api/x") == 1
+        print("✓ Sliding window limits and decays")
+
+    def test_02_lru_bound(self):
+        counter = SlidingWindowCounter("scan", 60, max_keys=100, clock=FakeClock())
+        for i in range(10_000):
+            counter.allow(f"198.51.100.7:/probe/{i}", 200)
+
+        assert len(counter) == 100
+        assert counter.evictions == 9_900
+        assert counter.count("198.51.100.7:/probe/9999") == 1
+        assert counter.count("198.51.100.7:/probe/0") == 0
+        assert len(_key_id("k" * 5000)) < 50
+        print("✓ Counter memory bounded by LRU eviction")
+
+
+class TestBlockList:
+    """Time-limited blocks"""
+
+    def test_03_block_expiry_and_unblock(self):
+        clock = FakeClock()
+        blocks = SharedBlockList("ip", clock=clock)
+
+        blocks.block("203.0.113.9", 60, reason="scanner")
+        assert blocks.is_blocked("203.0.113.9")
+        assert blocks.active()["203.0.113.9"]["reason"] == "scanner"
+        assert blocks.stats()["pending"] == 1
+
+        clock.now += 61
+        assert not blocks.is_blocked("203.0.113.9")
+
+        blocks.block("203.0.113.10", 60)
+        assert blocks.unblock("203.0.113.10")
+        assert not blocks.unblock("203.0.113.10")
+        assert not blocks.is_blocked("203.0.113.10")
+        print("✓ Blocks expire and unblock")
+
+    def test_04_rate_limiter_and_threats(self):
+        from middleware.bot_protection import ThreatDatabase
+        from middleware.security import RateLimiter
+
+        limiter = RateLimiter()
+        assert not any(limiter.is_rate_limited("10.1.1.1:/api/auth/login", 3, 60) for _ in range(3))
+        assert limiter.is_rate_limited("10.1.1.1:/api/auth/login", 3, 60)
+        limiter.block_ip("10.1.1.2", 60)
+        assert limiter.is_ip_blocked("10.1.1.2") and "10.1.1.2" in limiter.blocked_ips
+        assert limiter.unblock_ip("10.1.1.2") and not limiter.is_ip_blocked("10.1.1.2")
+
+        threats = ThreatDatabase()
+        threats.last_sync = float("inf")  # keep records in memory (no MongoDB here)
+
+        async def violate(n):
+            for _ in range(n):
+                await threats.record_blocked_request("10.2.2.2", "path_traversal", "ua", "/../x")
+
+        asyncio.run(violate(ThreatDatabase.AUTO_BLOCK_THRESHOLD - 1))
+        assert not threats.is_ip_blocked("10.2.2.2")
+        asyncio.run(violate(1))
+        assert threats.is_ip_blocked("10.2.2.2")
+        assert threats.get_stats()["blocked_ips_count"] == 1
+        print("✓ Rate limiter and threat auto-block on shared structures")
+
+
+class TestSyncFailure:
+    """Pending writes survive an unreachable store"""
+
+    def test_05_failed_sync_requeues(self, monkeypatch):
+        monkeypatch.setattr(shared_limits, "db", FailingDb())
+        clock = FakeClock(600.0)
+        counter = SlidingWindowCounter("test", 60, clock=clock)
+        blocks = SharedBlockList("ip", clock=clock)
+
+        async def scenario():
+            counter.hit("k")
+            counter.hit("k")
+            blocks.block("203.0.113.9", 60)
+            blocks.block("203.0.113.10", 60)
+            counter_sync = asyncio.ensure_future(counter.sync())
+            blocks_sync = asyncio.ensure_future(blocks.sync())
+            await asyncio.sleep(0)
+            assert not counter._pending and not blocks._pending
+            # Recorded while the syncs are in flight
+            counter.hit("k")
+            blocks.unblock("203.0.113.10")
+            await asyncio.gather(counter_sync, blocks_sync)
+
+        asyncio.run(scenario())
+        assert counter._pending == {("k", 10): 3} and counter.sync_errors == 1
+        assert blocks._pending["203.0.113.9"][0] == 660.0
+        assert blocks._pending["203.0.113.10"] is None and blocks.sync_errors == 1
+        print("✓ Failed syncs requeue their writes under newer ones")
@@ -9,6 +9,7 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
 from config import JWT_SECRET, JWT_ALGORITHM, JWT_EXPIRATION_HOURS, ROLE_PERMISSIONS
 from database import db
+from services.auth_cache import user_cache
 
 security = HTTPBearer()
 
@@ -78,9 +79,13 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         if not user_id:
             raise HTTPException(status_code=401, detail="Invalid token")
         
-        user = await db.users.find_one({"id": user_id}, {"_id": 0})
-        if not user:
-            raise HTTPException(status_code=401, detail="User not found")
+        # Warm requests are served from the per-process user cache
+        user = user_cache.get(user_id)
+        if user is None:
+            user = await db.users.find_one({"id": user_id}, {"_id": 0})
+            if not user:
+                raise HTTPException(status_code=401, detail="User not found")
+            user_cache.set(user_id, user)
         
         # Check if this is a proxy session
         if payload.get('is_proxy'):
@@ -0,0 +1,172 @@
+"""
+Native Date Fields and IST Day Ranges
+
+Timestamps are stored as ISO-8601 strings (created_at, timestamp). Every date
+field that is filtered on also gets a native BSON datetime twin named
+<field>_dt (created_at -> created_at_dt), written next to the string on insert
+(with_native_dates) and backfilled for older documents at startup
+(services/native_dates.py). The range indexes are on the _dt fields.
+
+Date filters go through date_range(), which always produces a $gte/$lt range on
+the _dt field. A bare date ("2026-02-01") means the IST calendar day, from IST
+midnight to the next IST midnight; its UTC bounds are computed once per date
+and cached. Until every document carries its _dt twin, the filter also matches
+documents that only have the string, comparing against the same bounds as ISO
+strings, so reads stay correct while the migration is in flight.
+
+Configuration (environment):
+    NATIVE_DATES_LEGACY_FALLBACK - also match string-only documents (default 1);
+                                   set to 0 once the backfill has completed
+"""
+import os
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+
+IST = timezone(timedelta(hours=5, minutes=30), "IST")
+IST_OFFSET = "+05:30"
+NATIVE_SUFFIX = "_dt"
+NATIVE_DATES_LEGACY_FALLBACK = os.environ.get("NATIVE_DATES_LEGACY_FALLBACK", "1").lower() not in ("0", "false", "no")
+
+# String date fields that are range-filtered, per collection
+NATIVE_DATE_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "bookings": ("created_at",),
+    "clients": ("created_at",),
+    "purchases": ("created_at",),
+    "purchase_payments": ("created_at",),
+    "payment_logs": ("created_at",),
+    "audit_logs": ("timestamp",),
+    "security_logs": ("timestamp",),
+    "notifications": ("created_at",),
+    "email_logs": ("created_at",),
+}
+
+
+def native_field(field: str) -> str:
+    return field + NATIVE_SUFFIX
+
+
+@lru_cache(maxsize=4096)
+def ist_day_start(day: date) -> datetime:
+    """IST midnight at the start of day, as an aware UTC datetime."""
+    return datetime(day.year, day.month, day.day, tzinfo=IST).astimezone(timezone.utc)
+
+
+def ist_today() -> date:
+    return datetime.now(IST).date()
+
+
+def ist_day_bounds(day: Optional[date] = None) -> Tuple[datetime, datetime]:
+    """[start, end) of an IST calendar day (today by default) in UTC."""
+    day = day or ist_today()
+    return ist_day_start(day), ist_day_start(day + timedelta(days=1))
+
+
+def parse_datetime(value: Any) -> Optional[datetime]:
+    """
+    Aware UTC datetime from a stored date value: datetime, date (IST midnight)
+    or ISO string. Naive values are taken as UTC, which is how the write paths
+    produce them. None for anything unparseable.
+    """
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+    if isinstance(value, date):
+        return ist_day_start(value)
+    if not isinstance(value, str) or not value.strip():
+        return None
+    text = value.strip()
+    if text.endswith("Z"):
+        text = text[:-1] + "+00:00"
+    try:
+        if len(text) == 10:
+            return ist_day_start(date.fromisoformat(text))
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    return parse_datetime(parsed)
+
+
+def ist_date(value: Any) -> Optional[str]:
+    """IST calendar day ("YYYY-MM-DD") of a stored date value."""
+    parsed = parse_datetime(value)
+    return parsed.astimezone(IST).strftime("%Y-%m-%d") if parsed else None
+
+
+def with_native_dates(collection: str, doc: dict) -> dict:
+    """Copy of doc with the native _dt twins of its registered date fields."""
+    native = {}
+    for field in NATIVE_DATE_FIELDS.get(collection, ()):
+        parsed = parse_datetime(doc.get(field))
+        if parsed is not None:
+            native[native_field(field)] = parsed
+    return {**doc, **native} if native else doc
+
+
+def _bound(value: Any, upper: bool) -> datetime:
+    """A bare date is a whole IST day: its start, or the next day's start for an upper bound."""
+    if isinstance(value, str) and len(value.strip()) == 10:
+        try:
+            day = date.fromisoformat(value.strip())
+        except ValueError:
+            day = None
+        if day is not None:
+            return ist_day_start(day + timedelta(days=1)) if upper else ist_day_start(day)
+    if isinstance(value, date) and not isinstance(value, datetime):
+        return ist_day_start(value + timedelta(days=1)) if upper else ist_day_start(value)
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise HTTPException(status_code=400, detail=f"Invalid date: {value}")
+    return parsed
+
+
+def date_range(field: str, start: Any = None, end: Any = None) -> dict:
+    """
+    Filter on field between start (inclusive) and end. Bounds may be datetimes,
+    ISO timestamps (end exclusive) or bare dates (IST days, end day included).
+    """
+    bounds = {}
+    if start is not None and start != "":
+        bounds["$gte"] = _bound(start, upper=False)
+    if end is not None and end != "":
+        bounds["$lt"] = _bound(end, upper=True)
+    if not bounds:
+        return {}
+    native = {native_field(field): bounds}
+    if not NATIVE_DATES_LEGACY_FALLBACK:
+        return native
+    legacy = {
+        native_field(field): {"$exists": False},
+        field: {op: value.isoformat() for op, value in bounds.items()}
+    }
+    return {"$or": [native, legacy]}
+
+
+def date_value_expression(field: str) -> dict:
+    """
+    Aggregation expression for the datetime of field: the _dt twin, or for
+    legacy rows the string parsed to the second (write paths store UTC).
+    """
+    return {"$ifNull": [f"${native_field(field)}", {"$dateFromString": {
+        "dateString": {"$substrCP": [f"${field}", 0, 19]},
+        "format": "%Y-%m-%dT%H:%M:%S",
+        "timezone": "UTC",
+        "onError": None,
+        "onNull": None
+    }}]}
+
+
+def ist_day_expression(field: str) -> dict:
+    """Aggregation expression for the IST day ("YYYY-MM-DD") of field."""
+    return {"$dateToString": {"format": "%Y-%m-%d", "date": date_value_expression(field), "timezone": IST_OFFSET}}
+
+
+def add_date_range(query: dict, field: str, start: Any = None, end: Any = None) -> dict:
+    """Add a date_range() condition to query (in place), keeping any $or it already has."""
+    condition = date_range(field, start, end)
+    if "$or" in condition and "$or" in query:
+        query["$and"] = query.get("$and", []) + [condition]
+    else:
+        query.update(condition)
+    return query
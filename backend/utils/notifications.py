@@ -7,6 +7,7 @@ from fastapi import WebSocket
 from datetime import datetime, timezone
 import uuid
 from database import db
+from utils.dates import with_native_dates
 
 class ConnectionManager:
     def __init__(self):
@@ -80,7 +81,7 @@ async def create_notification(
     }
     
     # Store in database
-    await db.notifications.insert_one({**notification, "_id": notification["id"]})
+    await db.notifications.insert_one(with_native_dates("notifications", {**notification, "_id": notification["id"]}))
     
     # Send via WebSocket
     await manager.send_to_user(user_id, {
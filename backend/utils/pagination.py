@@ -0,0 +1,116 @@
+"""
+Keyset Pagination and NDJSON Streaming for List Endpoints
+
+List endpoints page on (created_at, id) descending instead of skip/limit, so
+fetching page N costs the same as page 1. The position is handed to the client
+as an opaque continuation token:
+
+- A full page sets the X-Next-Cursor response header; passing it back as
+  ?cursor=... returns the next page. No header means the last page.
+- Tokens are URL-safe base64 of the last row's (created_at, id), encoded with
+  bson.json_util so BSON datetimes round-trip as well as ISO strings.
+
+With ?format=ndjson (or "Accept: application/x-ndjson") the endpoint instead
+streams every matching row as one JSON document per line, straight from the
+Motor cursor in small batches, so memory stays flat and the first byte goes out
+after the first batch.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+
+from bson import json_util
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+STREAM_BATCH_SIZE = 500
+
+
+def encode_cursor(doc: dict, field: str = "created_at") -> str:
+    """Opaque continuation token for the position just after doc."""
+    raw = json_util.dumps([doc.get(field), doc.get("id")]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[Any, Optional[str]]:
+    """(sort value, id) from a token; 400 on anything malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        value, doc_id = json_util.loads(raw)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    return value, doc_id
+
+
+def keyset_sort(field: str = "created_at") -> List[Tuple[str, int]]:
+    return [(field, -1), ("id", -1)]
+
+
+def _lower_type_conditions(field: str, value: Any) -> List[dict]:
+    """
+    Rows whose sort value is of a lower BSON type than value come after it in a
+    descending sort but are not matched by $lt (type bracketing).
+    """
+    if isinstance(value, datetime):
+        return [{field: {"$type": "string"}}, {field: None}]
+    if value is not None:
+        return [{field: None}]
+    return []
+
+
+def keyset_query(query: dict, cursor: Optional[str], field: str = "created_at") -> dict:
+    """Restrict query to rows after the cursor in (field, id) descending order."""
+    if not cursor:
+        return query
+    value, doc_id = decode_cursor(cursor)
+    after = [{field: value, "id": {"$lt": doc_id}}]
+    if value is not None:
+        after.insert(0, {field: {"$lt": value}})
+    after += _lower_type_conditions(field, value)
+    return {"$and": [query, {"$or": after}]} if query else {"$or": after}
+
+
+def set_next_cursor(response: Response, page: List[dict], limit: int, field: str = "created_at"):
+    """Advertise the next page when this one is full."""
+    if page and len(page) >= limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(page[-1], field)
+
+
+def wants_ndjson(request: Request, format: Optional[str] = None) -> bool:
+    if format:
+        return format.lower() == "ndjson"
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def _dump_line(item: Any) -> bytes:
+    if isinstance(item, BaseModel):
+        return item.model_dump_json().encode() + b"\n"
+    return json.dumps(item, default=str).encode() + b"\n"
+
+
+async def _ndjson_lines(cursor, transform: Callable[[List[dict]], Awaitable[List[Any]]],
+                        batch_size: int) -> AsyncIterator[bytes]:
+    batch = []
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield b"".join(_dump_line(item) for item in await transform(batch))
+            batch = []
+    if batch:
+        yield b"".join(_dump_line(item) for item in await transform(batch))
+
+
+def ndjson_response(cursor, transform: Callable[[List[dict]], Awaitable[List[Any]]],
+                    batch_size: int = STREAM_BATCH_SIZE) -> StreamingResponse:
+    """
+    Stream a Motor cursor as NDJSON. transform() turns each batch of raw
+    documents into the rows the list endpoint would return (enrichment, models).
+    """
+    return StreamingResponse(
+        _ndjson_lines(cursor.batch_size(batch_size), transform, batch_size),
+        media_type=NDJSON_MEDIA_TYPE,
+    )
@@ -0,0 +1,144 @@
+"""
+Bounded Worker Process Pools
+
+One pool class for CPU-bound work that must stay off the event loop
+(portfolio optimization solves, contract note rendering, PDF rasterization):
+
+- Worker processes are started lazily with the spawn context (the API process
+  has Motor/APScheduler threads running, so fork is unsafe), optionally with
+  an initializer that warms per-process state.
+- workers=0 runs jobs on a thread instead, e.g. where processes are unwanted.
+- Bounded concurrency: at most max_concurrency jobs run at once; further jobs
+  wait their turn. A job's slot is held until it finishes, even if the caller
+  gave up on it.
+- Per-job timeout: callers get the pool's timeout_error once the timeout
+  passes. A job cannot be interrupted, only abandoned.
+- A broken pool (a worker died, e.g. OOM) is replaced once on submit and
+  dropped after a failed job, so the next job starts fresh workers.
+
+Configuration is per pool; see the modules that create them.
+"""
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+
+
+class WorkerPoolTimeout(Exception):
+    """Raised when a job does not finish within the pool's timeout."""
+
+
+class WorkerPool:
+    """Process pool + semaphore + per-job timeout."""
+
+    timeout_error = WorkerPoolTimeout
+    timeout_message = "Job did not finish within {timeout:.0f}s"
+
+    def __init__(self, workers: int, max_concurrency: Optional[int] = None,
+                 timeout_seconds: Optional[float] = None,
+                 initializer: Optional[Callable[[], None]] = None):
+        self.workers = max(0, workers)
+        self.max_concurrency = max(1, self.workers if max_concurrency is None else max_concurrency)
+        self.timeout_seconds = timeout_seconds
+        self.initializer = initializer
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.active = 0
+        self.waiting = 0
+        self.completed = 0
+        self.timeouts = 0
+        self.failures = 0
+
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers == 0:
+            return None
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=self.initializer
+            )
+        return self._executor
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def _submit(self, fn: Callable, *args) -> asyncio.Future:
+        executor = self._get_executor()
+        if executor is None:
+            return asyncio.ensure_future(asyncio.to_thread(fn, *args))
+        try:
+            return asyncio.wrap_future(executor.submit(fn, *args))
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM); start a fresh pool once
+            self._executor = None
+            return asyncio.wrap_future(self._get_executor().submit(fn, *args))
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None) -> Any:
+        """
+        Run fn(*args) in a worker process.
+
+        fn and args must be picklable (module-level function, plain data).
+        """
+        semaphore = self._get_semaphore()
+        timeout = self.timeout_seconds if timeout is None else timeout
+
+        self.waiting += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        try:
+            future = self._submit(fn, *args)
+        except BaseException:
+            self.active -= 1
+            semaphore.release()
+            raise
+
+        def _release(_):
+            self.active -= 1
+            semaphore.release()
+
+        # The slot is held until the job is done, even if the caller gave up
+        future.add_done_callback(_release)
+
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), timeout=timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            # Consume the eventual result/exception so it is not logged as unretrieved
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            raise self.timeout_error(self.timeout_message.format(timeout=timeout))
+        except BrokenProcessPool:
+            self.failures += 1
+            self._executor = None
+            raise
+        except Exception:
+            self.failures += 1
+            raise
+
+        self.completed += 1
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "max_concurrency": self.max_concurrency,
+            "timeout_seconds": self.timeout_seconds,
+            "active": self.active,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "timeouts": self.timeouts,
+            "failures": self.failures
+        }
+
+    def shutdown(self):
+        """Stop worker processes (called on application shutdown)."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None